@@ -0,0 +1,174 @@
+"""Add composite and partial indexes for hot queries
+
+Revision ID: 004_indices_compuestos
+Revises: 003_add_evento_paciente
+Create Date: 2026-02-02 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+# revision identifiers, used by Alembic.
+revision: str = '004_indices_compuestos'
+down_revision: Union[str, None] = '003_add_evento_paciente'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Columnas del modelo que ninguna migración anterior crea: solo existen en
+# bases creadas con SQLModel.metadata.create_all. Si faltan, sus índices se
+# omiten con un aviso; cualquier otra columna faltante es un error.
+COLUMNAS_OPCIONALES = {
+    ('paciente', 'observacion_inicio'),
+    ('paciente', 'monitorizacion_inicio'),
+}
+
+# (nombre, tabla, columnas, condición parcial o None)
+INDICES = [
+    # Lista de espera por hospital ordenada por prioridad
+    (
+        'ix_paciente_lista_espera_prioridad',
+        'paciente',
+        ['hospital_id', sa.text('prioridad_calculada DESC')],
+        'en_lista_espera',
+    ),
+    # Pacientes en lista con cama destino (pendientes de traslado)
+    (
+        'ix_paciente_espera_cama_destino',
+        'paciente',
+        ['hospital_id', 'cama_destino_id'],
+        'en_lista_espera AND cama_destino_id IS NOT NULL',
+    ),
+    # Derivados hacia un hospital por estado
+    (
+        'ix_paciente_derivacion_destino_estado',
+        'paciente',
+        ['derivacion_hospital_destino_id', 'derivacion_estado'],
+        'derivacion_hospital_destino_id IS NOT NULL',
+    ),
+    # Timers de observación, monitorización y espera de oxígeno
+    (
+        'ix_paciente_observacion_activa',
+        'paciente',
+        ['observacion_inicio'],
+        'observacion_inicio IS NOT NULL',
+    ),
+    (
+        'ix_paciente_monitorizacion_activa',
+        'paciente',
+        ['monitorizacion_inicio'],
+        'monitorizacion_inicio IS NOT NULL',
+    ),
+    (
+        'ix_paciente_espera_oxigeno',
+        'paciente',
+        ['oxigeno_desactivado_at'],
+        'esperando_evaluacion_oxigeno AND oxigeno_desactivado_at IS NOT NULL',
+    ),
+    # Camas en limpieza (proceso automático) y libres desde (subutilización)
+    (
+        'ix_cama_en_limpieza',
+        'cama',
+        ['limpieza_inicio'],
+        "estado = 'EN_LIMPIEZA'",
+    ),
+    (
+        'ix_cama_libre_desde',
+        'cama',
+        ['estado_updated_at'],
+        "estado = 'LIBRE'",
+    ),
+    # Eventos por tipo en un rango de fechas (estadísticas)
+    (
+        'ix_evento_paciente_tipo_timestamp',
+        'evento_paciente',
+        ['tipo_evento', 'timestamp'],
+        None,
+    ),
+    # Historial de un paciente en orden cronológico (trazabilidad)
+    (
+        'ix_evento_paciente_paciente_timestamp',
+        'evento_paciente',
+        ['paciente_id', 'timestamp'],
+        None,
+    ),
+]
+
+
+def _columnas_requeridas(columnas, condicion) -> set:
+    """Nombres de columna usados por el índice (incluye la condición parcial)."""
+    nombres = set()
+    for columna in columnas:
+        nombres.add(str(columna).split()[0])
+    if condicion:
+        for token in condicion.replace('(', ' ').replace(')', ' ').split():
+            if token.islower() and token.isidentifier() and token not in ('and', 'or', 'not', 'is', 'null'):
+                nombres.add(token)
+    return nombres
+
+
+def upgrade() -> None:
+    """
+    Crea índices compuestos y parciales para las consultas más frecuentes.
+
+    En PostgreSQL se crean con CONCURRENTLY (fuera de transacción) para no
+    bloquear escrituras en tablas con datos. Los índices sobre
+    COLUMNAS_OPCIONALES se omiten si la columna no existe; si falta otra
+    columna la migración falla.
+    """
+    bind = op.get_bind()
+    es_postgres = bind.dialect.name == 'postgresql'
+    inspector = sa.inspect(bind)
+    columnas_por_tabla = {
+        tabla: {c['name'] for c in inspector.get_columns(tabla)}
+        for tabla in {t for _, t, _, _ in INDICES}
+    }
+
+    # Se valida todo antes de crear nada: en PostgreSQL cada índice se confirma por separado
+    omitidos = set()
+    for nombre, tabla, columnas, condicion in INDICES:
+        faltantes = _columnas_requeridas(columnas, condicion) - columnas_por_tabla[tabla]
+        if faltantes - {c for t, c in COLUMNAS_OPCIONALES if t == tabla}:
+            raise RuntimeError(f"No se puede crear {nombre}: faltan columnas {sorted(faltantes)} en {tabla}")
+        if faltantes:
+            logger.warning(f"Omitiendo {nombre}: faltan columnas {sorted(faltantes)} en {tabla}")
+            omitidos.add(nombre)
+
+    with op.get_context().autocommit_block():
+        for nombre, tabla, columnas, condicion in INDICES:
+            if nombre in omitidos:
+                continue
+            kwargs = {}
+            if condicion is not None:
+                kwargs['postgresql_where'] = sa.text(condicion)
+                kwargs['sqlite_where'] = sa.text(condicion)
+            if es_postgres:
+                kwargs['postgresql_concurrently'] = True
+                kwargs['if_not_exists'] = True
+            op.create_index(nombre, tabla, columnas, **kwargs)
+
+
+def downgrade() -> None:
+    """Elimina los índices compuestos y parciales (los omitidos no existen)."""
+    bind = op.get_bind()
+    es_postgres = bind.dialect.name == 'postgresql'
+    inspector = sa.inspect(bind)
+    existentes = {
+        tabla: {i['name'] for i in inspector.get_indexes(tabla)}
+        for tabla in {t for _, t, _, _ in INDICES}
+    }
+
+    with op.get_context().autocommit_block():
+        for nombre, tabla, _, _ in reversed(INDICES):
+            if nombre not in existentes[tabla]:
+                continue
+            kwargs = {}
+            if es_postgres:
+                kwargs['postgresql_concurrently'] = True
+                kwargs['if_exists'] = True
+            op.drop_index(nombre, table_name=tabla, **kwargs)
@@ -0,0 +1,60 @@
+"""Add transactional outbox for WebSocket notifications
+
+Revision ID: 005_notificacion_outbox
+Revises: 004_indices_compuestos
+Create Date: 2026-02-03 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '005_notificacion_outbox'
+down_revision: Union[str, None] = '004_indices_compuestos'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Crea las tablas del outbox de notificaciones y de secuencias por hospital.
+    """
+    op.create_table(
+        'notificacion_outbox',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('hospital_id', sa.String(), nullable=True),
+        sa.Column('solo_hospital', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('payload', sa.String(), nullable=False),
+        sa.Column('secuencia', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('publicado_at', sa.DateTime(), nullable=True),
+        sa.Column('intentos', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notificacion_outbox_hospital_id', 'notificacion_outbox', ['hospital_id'])
+    op.create_index('ix_notificacion_outbox_publicado_at', 'notificacion_outbox', ['publicado_at'])
+    op.create_index(
+        'ix_notificacion_outbox_pendientes',
+        'notificacion_outbox',
+        ['id'],
+        postgresql_where=sa.text('publicado_at IS NULL'),
+        sqlite_where=sa.text('publicado_at IS NULL'),
+    )
+
+    op.create_table(
+        'secuencia_outbox',
+        sa.Column('clave', sa.String(), nullable=False),
+        sa.Column('ultima', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('clave')
+    )
+
+
+def downgrade() -> None:
+    """Elimina las tablas del outbox."""
+    op.drop_table('secuencia_outbox')
+    op.drop_index('ix_notificacion_outbox_pendientes', table_name='notificacion_outbox')
+    op.drop_index('ix_notificacion_outbox_publicado_at', table_name='notificacion_outbox')
+    op.drop_index('ix_notificacion_outbox_hospital_id', table_name='notificacion_outbox')
+    op.drop_table('notificacion_outbox')
@@ -0,0 +1,63 @@
+"""Add daily statistics rollup tables
+
+Revision ID: 006_estadistica_diaria
+Revises: 005_notificacion_outbox
+Create Date: 2026-02-04 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '006_estadistica_diaria'
+down_revision: Union[str, None] = '005_notificacion_outbox'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Crea la tabla de agregados diarios por día clínico y la tabla de
+    cobertura. Después de migrar, ejecutar scripts/backfill_estadisticas.py.
+    """
+    op.create_table(
+        'estadistica_diaria',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('dia_clinico', sa.DateTime(), nullable=False),
+        sa.Column('hospital_id', sa.String(), nullable=False),
+        sa.Column('servicio_origen_id', sa.String(), nullable=False, server_default=''),
+        sa.Column('servicio_destino_id', sa.String(), nullable=False, server_default=''),
+        sa.Column('tipo_evento', sa.String(), nullable=False),
+        sa.Column('metrica', sa.String(), nullable=False, server_default='eventos'),
+        sa.Column('cantidad', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('duracion_suma', sa.Float(), nullable=True),
+        sa.Column('duracion_suma_cuadrados', sa.Float(), nullable=True),
+        sa.Column('duracion_min', sa.Float(), nullable=True),
+        sa.Column('duracion_max', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint(
+            'dia_clinico', 'hospital_id', 'servicio_origen_id', 'servicio_destino_id',
+            'tipo_evento', 'metrica',
+            name='uq_estadistica_diaria_clave'
+        )
+    )
+    op.create_index('ix_estadistica_diaria_dia_clinico', 'estadistica_diaria', ['dia_clinico'])
+    op.create_index('ix_estadistica_diaria_hospital_id', 'estadistica_diaria', ['hospital_id'])
+
+    op.create_table(
+        'cobertura_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('desde', sa.DateTime(), nullable=False),
+        sa.Column('actualizado_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Elimina las tablas de rollups."""
+    op.drop_table('cobertura_rollup')
+    op.drop_index('ix_estadistica_diaria_hospital_id', table_name='estadistica_diaria')
+    op.drop_index('ix_estadistica_diaria_dia_clinico', table_name='estadistica_diaria')
+    op.drop_table('estadistica_diaria')
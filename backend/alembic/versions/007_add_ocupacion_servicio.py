@@ -0,0 +1,51 @@
+"""Add per-service bed occupancy counters
+
+Revision ID: 007_ocupacion_servicio
+Revises: 006_estadistica_diaria
+Create Date: 2026-02-11 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '007_ocupacion_servicio'
+down_revision: Union[str, None] = '006_estadistica_diaria'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Crea los contadores de ocupación por (servicio, estado) y los inicializa
+    desde la tabla cama.
+    """
+    op.create_table(
+        'ocupacion_servicio',
+        sa.Column('servicio_id', sa.String(), nullable=False),
+        sa.Column('estado', sa.String(), nullable=False),
+        sa.Column('hospital_id', sa.String(), nullable=False),
+        sa.Column('cantidad', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('actualizado_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('servicio_id', 'estado')
+    )
+    op.create_index('ix_ocupacion_servicio_hospital_id', 'ocupacion_servicio', ['hospital_id'])
+
+    op.execute(
+        """
+        INSERT INTO ocupacion_servicio (servicio_id, estado, hospital_id, cantidad, actualizado_at)
+        SELECT s.id, CAST(c.estado AS VARCHAR), s.hospital_id, COUNT(*), CURRENT_TIMESTAMP
+        FROM cama c
+        JOIN sala sa ON sa.id = c.sala_id
+        JOIN servicio s ON s.id = sa.servicio_id
+        GROUP BY s.id, CAST(c.estado AS VARCHAR), s.hospital_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Elimina los contadores de ocupación."""
+    op.drop_index('ix_ocupacion_servicio_hospital_id', table_name='ocupacion_servicio')
+    op.drop_table('ocupacion_servicio')
@@ -0,0 +1,51 @@
+"""Add partial index for special-case patient counts
+
+Revision ID: 008_indice_casos_especiales
+Revises: 007_ocupacion_servicio
+Create Date: 2026-02-12 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '008_indice_casos_especiales'
+down_revision: Union[str, None] = '007_ocupacion_servicio'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDICE = 'ix_paciente_casos_especiales'
+CONDICION = 'casos_especiales IS NOT NULL'
+
+
+def upgrade() -> None:
+    """
+    Índice parcial (hospital_id, casos_especiales) para contar casos
+    especiales agrupando por valor sin recorrer la tabla paciente.
+
+    En PostgreSQL se crea con CONCURRENTLY (fuera de transacción).
+    """
+    kwargs = {
+        'postgresql_where': sa.text(CONDICION),
+        'sqlite_where': sa.text(CONDICION),
+    }
+    if op.get_bind().dialect.name == 'postgresql':
+        kwargs['postgresql_concurrently'] = True
+        kwargs['if_not_exists'] = True
+
+    with op.get_context().autocommit_block():
+        op.create_index(INDICE, 'paciente', ['hospital_id', 'casos_especiales'], **kwargs)
+
+
+def downgrade() -> None:
+    """Elimina el índice de casos especiales."""
+    kwargs = {}
+    if op.get_bind().dialect.name == 'postgresql':
+        kwargs['postgresql_concurrently'] = True
+        kwargs['if_exists'] = True
+
+    with op.get_context().autocommit_block():
+        op.drop_index(INDICE, table_name='paciente', **kwargs)
@@ -0,0 +1,49 @@
+"""Add hourly historical occupancy cache
+
+Revision ID: 009_ocupacion_horaria
+Revises: 008_indice_casos_especiales
+Create Date: 2026-02-13 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '009_ocupacion_horaria'
+down_revision: Union[str, None] = '008_indice_casos_especiales'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Crea la caché horaria de ocupación histórica y su tabla de cobertura.
+    Se llena bajo demanda al consultar /estadisticas/ocupacion/historica.
+    """
+    op.create_table(
+        'ocupacion_horaria',
+        sa.Column('nivel', sa.String(), nullable=False),
+        sa.Column('hora', sa.DateTime(), nullable=False),
+        sa.Column('grupo_id', sa.String(), nullable=False),
+        sa.Column('hospital_id', sa.String(), nullable=True),
+        sa.Column('promedio', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('maximo', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('nivel', 'hora', 'grupo_id')
+    )
+
+    op.create_table(
+        'cobertura_ocupacion_horaria',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('desde', sa.DateTime(), nullable=False),
+        sa.Column('hasta', sa.DateTime(), nullable=False),
+        sa.Column('actualizado_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Elimina la caché horaria de ocupación."""
+    op.drop_table('cobertura_ocupacion_horaria')
+    op.drop_table('ocupacion_horaria')
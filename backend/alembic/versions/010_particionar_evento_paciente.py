@@ -0,0 +1,142 @@
+"""Partition evento_paciente by month
+
+Revision ID: 010_particionar_eventos
+Revises: 009_ocupacion_horaria
+Create Date: 2026-02-20 00:00:00.000000
+
+"""
+from datetime import datetime
+from typing import List, Sequence, Tuple, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '010_particionar_eventos'
+down_revision: Union[str, None] = '009_ocupacion_horaria'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Copia congelada de la conversión de app/services/particiones_eventos.py al
+# crear esta revisión: la migración no debe cambiar si el servicio cambia.
+TABLA = 'evento_paciente'
+TABLA_ARCHIVO = 'evento_paciente_archivo'
+PARTICION_DEFAULT = f'{TABLA}_default'
+MESES_FUTUROS = 3
+
+
+def _sumar_meses(mes: datetime, meses: int) -> datetime:
+    indice = mes.year * 12 + mes.month - 1 + meses
+    return datetime(indice // 12, indice % 12 + 1, 1)
+
+
+def _meses_entre(desde: datetime, hasta: datetime) -> List[datetime]:
+    meses = []
+    mes = datetime(desde.year, desde.month, 1)
+    while mes <= hasta:
+        meses.append(mes)
+        mes = _sumar_meses(mes, 1)
+    return meses
+
+
+def _limites_sql(mes: datetime) -> str:
+    return (
+        f"FROM ('{mes:%Y-%m-%d %H:%M:%S}') "
+        f"TO ('{_sumar_meses(mes, 1):%Y-%m-%d %H:%M:%S}')"
+    )
+
+
+def _es_particionada(conexion, tabla: str) -> bool:
+    return conexion.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:tabla)"),
+        {"tabla": tabla},
+    ).scalar() == 'p'
+
+
+def _definiciones(conexion, tabla: str) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """Índices (salvo la PK) y claves foráneas de `tabla`, como (nombre, SQL)."""
+    indices = [
+        (nombre, definicion.replace(' ON ONLY ', ' ON '))
+        for nombre, definicion in conexion.execute(
+            sa.text("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = :tabla AND indexname <> :pk"),
+            {"tabla": tabla, "pk": f'{tabla}_pkey'},
+        ).all()
+    ]
+    foraneas = conexion.execute(sa.text(
+        """
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(:tabla) AND contype = 'f'
+        """
+    ), {"tabla": tabla}).all()
+    return indices, [tuple(f) for f in foraneas]
+
+
+def _recrear(conexion, tabla: str, indices, foraneas, particionada: bool) -> None:
+    for _, definicion in indices:
+        if particionada and definicion.startswith('CREATE UNIQUE') and '"timestamp"' not in definicion:
+            # Un índice único de una tabla particionada debe incluir la clave de partición
+            continue
+        conexion.execute(sa.text(definicion))
+    for nombre, definicion in foraneas:
+        conexion.execute(sa.text(f'ALTER TABLE {tabla} ADD CONSTRAINT "{nombre}" {definicion}'))
+
+
+def upgrade() -> None:
+    """
+    Convierte evento_paciente en una tabla particionada por RANGE mensual
+    sobre timestamp (PK pasa a ser (id, timestamp)), con particiones desde
+    el evento más antiguo hasta MESES_FUTUROS meses adelante
+    y una partición DEFAULT. Copia todas las filas bajo ACCESS EXCLUSIVE:
+    en tablas grandes, ejecutar en una ventana de mantenimiento.
+
+    En SQLite la tabla sigue siendo simple.
+    """
+    conexion = op.get_bind()
+    if conexion.dialect.name != 'postgresql' or _es_particionada(conexion, TABLA):
+        return
+    ahora = datetime.utcnow()
+
+    conexion.execute(sa.text(f'LOCK TABLE {TABLA} IN ACCESS EXCLUSIVE MODE'))
+    indices, foraneas = _definiciones(conexion, TABLA)
+    minimo = conexion.execute(sa.text(f'SELECT min("timestamp") FROM {TABLA}')).scalar()
+
+    nueva = f'{TABLA}_particionada'
+    conexion.execute(sa.text(
+        f'CREATE TABLE {nueva} (LIKE {TABLA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE ("timestamp")'
+    ))
+    conexion.execute(sa.text(f'ALTER TABLE {nueva} ADD CONSTRAINT {nueva}_pkey PRIMARY KEY (id, "timestamp")'))
+    hasta = _sumar_meses(datetime(ahora.year, ahora.month, 1), MESES_FUTUROS)
+    for mes in _meses_entre(min(minimo or ahora, ahora), hasta):
+        conexion.execute(sa.text(
+            f'CREATE TABLE {TABLA}_p{mes:%Y_%m} PARTITION OF {nueva} FOR VALUES {_limites_sql(mes)}'
+        ))
+    conexion.execute(sa.text(f'CREATE TABLE {PARTICION_DEFAULT} PARTITION OF {nueva} DEFAULT'))
+
+    conexion.execute(sa.text(f'INSERT INTO {nueva} SELECT * FROM {TABLA}'))
+    conexion.execute(sa.text(f'DROP TABLE {TABLA}'))
+    conexion.execute(sa.text(f'ALTER TABLE {nueva} RENAME TO {TABLA}'))
+    conexion.execute(sa.text(f'ALTER TABLE {TABLA} RENAME CONSTRAINT {nueva}_pkey TO {TABLA}_pkey'))
+    _recrear(conexion, TABLA, indices, foraneas, particionada=True)
+
+
+def downgrade() -> None:
+    """Vuelve a una tabla simple con PK (id), incluyendo las filas archivadas."""
+    conexion = op.get_bind()
+    if conexion.dialect.name != 'postgresql' or not _es_particionada(conexion, TABLA):
+        return
+
+    conexion.execute(sa.text(f'LOCK TABLE {TABLA} IN ACCESS EXCLUSIVE MODE'))
+    indices, foraneas = _definiciones(conexion, TABLA)
+    nueva = f'{TABLA}_simple'
+    conexion.execute(sa.text(f'CREATE TABLE {nueva} (LIKE {TABLA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    conexion.execute(sa.text(f'INSERT INTO {nueva} SELECT * FROM {TABLA}'))
+    if _es_particionada(conexion, TABLA_ARCHIVO):
+        conexion.execute(sa.text(f'INSERT INTO {nueva} SELECT * FROM {TABLA_ARCHIVO}'))
+        conexion.execute(sa.text(f'DROP TABLE {TABLA_ARCHIVO}'))
+
+    conexion.execute(sa.text(f'DROP TABLE {TABLA}'))
+    conexion.execute(sa.text(f'ALTER TABLE {nueva} RENAME TO {TABLA}'))
+    conexion.execute(sa.text(f'ALTER TABLE {TABLA} ADD CONSTRAINT {TABLA}_pkey PRIMARY KEY (id)'))
+    _recrear(conexion, TABLA, indices, foraneas, particionada=False)
@@ -0,0 +1,94 @@
+"""Add estancia_servicio table
+
+Revision ID: 011_estancia_servicio
+Revises: 010_particionar_eventos
+Create Date: 2026-02-27 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '011_estancia_servicio'
+down_revision: Union[str, None] = '010_particionar_eventos'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Copia congelada de los criterios de app/services/estancias_service.py al
+# crear esta revisión: la migración no debe cambiar si el servicio cambia.
+TIPOS_LLEGADA = ('CAMA_ASIGNADA', 'TRASLADO_COMPLETADO', 'DERIVACION_COMPLETADA')
+TIPOS_SALIDA = ('TRASLADO_COMPLETADO', 'ALTA_COMPLETADA', 'DERIVACION_EGRESO_CONFIRMADO', 'FALLECIDO_EGRESADO')
+TIPOS_BORDE = tuple(dict.fromkeys(TIPOS_LLEGADA + TIPOS_SALIDA))
+
+
+def _lista_sql(tipos) -> str:
+    return ", ".join(f"'{t}'" for t in tipos)
+
+
+def _llenar_estancias() -> None:
+    """Una estancia por llegada a un servicio, cerrada por el siguiente borde del paciente."""
+    if op.get_bind().dialect.name == 'sqlite':
+        duracion = 'round((julianday(salida) - julianday("timestamp")) * 86400.0, 3)'
+    else:
+        duracion = 'CAST(EXTRACT(epoch FROM salida - "timestamp") AS FLOAT)'
+    op.execute(sa.text(
+        f"""
+        INSERT INTO estancia_servicio (
+            evento_entrada_id, paciente_id, hospital_id, servicio_id, cama_id,
+            tipo_entrada, entrada, evento_salida_id, tipo_salida, salida, duracion_segundos
+        )
+        SELECT id, paciente_id, hospital_id, servicio_destino_id, cama_destino_id,
+               tipo_evento, "timestamp", salida_id, tipo_salida, salida, {duracion}
+        FROM (
+            SELECT id, paciente_id, hospital_id, servicio_destino_id, cama_destino_id,
+                   tipo_evento, "timestamp",
+                   LEAD(id) OVER w AS salida_id,
+                   LEAD(tipo_evento) OVER w AS tipo_salida,
+                   LEAD("timestamp") OVER w AS salida
+            FROM evento_paciente
+            WHERE tipo_evento IN ({_lista_sql(TIPOS_BORDE)})
+            WINDOW w AS (PARTITION BY paciente_id ORDER BY "timestamp", id)
+        ) bordes
+        WHERE tipo_evento IN ({_lista_sql(TIPOS_LLEGADA)})
+          AND servicio_destino_id IS NOT NULL
+        """
+    ))
+
+
+def upgrade() -> None:
+    """
+    Crea la tabla de estancias por servicio y la llena desde
+    evento_paciente. Desde aquí la mantiene el escritor de eventos.
+    """
+    op.create_table(
+        'estancia_servicio',
+        sa.Column('evento_entrada_id', sa.String(), nullable=False),
+        sa.Column('paciente_id', sa.String(), nullable=False),
+        sa.Column('hospital_id', sa.String(), nullable=False),
+        sa.Column('servicio_id', sa.String(), nullable=False),
+        sa.Column('cama_id', sa.String(), nullable=True),
+        sa.Column('tipo_entrada', sa.String(), nullable=False),
+        sa.Column('entrada', sa.DateTime(), nullable=False),
+        sa.Column('evento_salida_id', sa.String(), nullable=True),
+        sa.Column('tipo_salida', sa.String(), nullable=True),
+        sa.Column('salida', sa.DateTime(), nullable=True),
+        sa.Column('duracion_segundos', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['paciente_id'], ['paciente.id']),
+        sa.PrimaryKeyConstraint('evento_entrada_id')
+    )
+    op.create_index('ix_estancia_servicio_paciente_entrada', 'estancia_servicio', ['paciente_id', 'entrada'])
+    op.create_index('ix_estancia_servicio_servicio_salida', 'estancia_servicio', ['servicio_id', 'salida'])
+    op.create_index('ix_estancia_servicio_hospital_salida', 'estancia_servicio', ['hospital_id', 'salida'])
+
+    _llenar_estancias()
+
+
+def downgrade() -> None:
+    """Elimina la tabla de estancias por servicio."""
+    op.drop_index('ix_estancia_servicio_hospital_salida', table_name='estancia_servicio')
+    op.drop_index('ix_estancia_servicio_servicio_salida', table_name='estancia_servicio')
+    op.drop_index('ix_estancia_servicio_paciente_entrada', table_name='estancia_servicio')
+    op.drop_table('estancia_servicio')
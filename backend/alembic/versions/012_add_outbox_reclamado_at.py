@@ -0,0 +1,30 @@
+"""Add claim timestamp to notification outbox
+
+Revision ID: 012_outbox_reclamado_at
+Revises: 011_estancia_servicio
+Create Date: 2026-03-02 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '012_outbox_reclamado_at'
+down_revision: Union[str, None] = '011_estancia_servicio'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Agrega reclamado_at: el despachador reclama y confirma el lote antes de
+    publicarlo, sin mantener bloqueos durante los envíos WebSocket.
+    """
+    op.add_column('notificacion_outbox', sa.Column('reclamado_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Elimina la columna reclamado_at."""
+    op.drop_column('notificacion_outbox', 'reclamado_at')
@@ -0,0 +1,39 @@
+"""Add pending-deletion table for content-addressed documents
+
+Revision ID: 013_documento_pendiente
+Revises: 012_outbox_reclamado_at
+Create Date: 2026-03-09 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '013_documento_pendiente'
+down_revision: Union[str, None] = '012_outbox_reclamado_at'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Crea documento_pendiente_borrado: los documentos reemplazados se borran
+    en diferido, tras volver a contar sus referencias.
+    """
+    op.create_table(
+        'documento_pendiente_borrado',
+        sa.Column('clave', sa.String(), nullable=False),
+        sa.Column('marcado_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('clave')
+    )
+    op.create_index(
+        'ix_documento_pendiente_borrado_marcado_at', 'documento_pendiente_borrado', ['marcado_at']
+    )
+
+
+def downgrade() -> None:
+    """Elimina la tabla documento_pendiente_borrado."""
+    op.drop_index('ix_documento_pendiente_borrado_marcado_at', table_name='documento_pendiente_borrado')
+    op.drop_table('documento_pendiente_borrado')
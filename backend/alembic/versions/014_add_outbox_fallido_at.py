@@ -0,0 +1,47 @@
+"""Add dead-letter timestamp to notification outbox
+
+Revision ID: 014_outbox_fallido_at
+Revises: 013_documento_pendiente
+Create Date: 2026-03-10 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '014_outbox_fallido_at'
+down_revision: Union[str, None] = '013_documento_pendiente'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Agrega fallido_at: una notificación que supera OUTBOX_MAX_INTENTOS se
+    descarta en vez de bloquear la secuencia de su hospital. El índice
+    parcial de pendientes la excluye.
+    """
+    op.add_column('notificacion_outbox', sa.Column('fallido_at', sa.DateTime(), nullable=True))
+    op.drop_index('ix_notificacion_outbox_pendientes', table_name='notificacion_outbox')
+    op.create_index(
+        'ix_notificacion_outbox_pendientes',
+        'notificacion_outbox',
+        ['id'],
+        postgresql_where=sa.text('publicado_at IS NULL AND fallido_at IS NULL'),
+        sqlite_where=sa.text('publicado_at IS NULL AND fallido_at IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    """Restaura el índice de pendientes y elimina la columna fallido_at."""
+    op.drop_index('ix_notificacion_outbox_pendientes', table_name='notificacion_outbox')
+    op.create_index(
+        'ix_notificacion_outbox_pendientes',
+        'notificacion_outbox',
+        ['id'],
+        postgresql_where=sa.text('publicado_at IS NULL'),
+        sqlite_where=sa.text('publicado_at IS NULL'),
+    )
+    op.drop_column('notificacion_outbox', 'fallido_at')
@@ -7,7 +7,7 @@ from sqlmodel import Session
 from app.core.database import get_session
 from app.core.auth_dependencies import get_current_user
 from app.core.rbac_service import rbac_service
-from app.core.websocket_manager import manager
+from app.core.outbox import encolar_broadcast
 from app.core.exceptions import PacienteNotFoundError, ValidationError
 from app.models.usuario import Usuario, PermisoEnum, RolEnum
 from app.schemas.responses import MessageResponse
@@ -42,12 +42,6 @@ async def iniciar_alta(
     try:
         resultado = service.iniciar_alta(paciente_id)
         
-        await manager.broadcast({
-            "tipo": "alta_iniciada",
-            "paciente_id": paciente_id,
-            "cama_id": resultado.cama_id
-        })
-        
         return MessageResponse(success=True, message=resultado.mensaje)
         
     except PacienteNotFoundError:
@@ -81,15 +75,6 @@ async def ejecutar_alta(
     try:
         resultado = service.ejecutar_alta(paciente_id)
         
-        await manager.send_notification(
-            {
-                "tipo": "alta_completada",
-                "paciente_id": paciente_id,
-                "cama_id": resultado.cama_id
-            },
-            notification_type="success"
-        )
-        
         return MessageResponse(success=True, message=resultado.mensaje)
         
     except PacienteNotFoundError:
@@ -109,11 +94,6 @@ async def cancelar_alta(
     try:
         resultado = service.cancelar_alta(paciente_id)
         
-        await manager.broadcast({
-            "tipo": "alta_cancelada",
-            "paciente_id": paciente_id
-        })
-        
         return MessageResponse(success=True, message=resultado.mensaje)
         
     except PacienteNotFoundError:
@@ -131,12 +111,12 @@ async def omitir_pausa_oxigeno(
     service = OxigenoService(session)
     
     try:
-        paciente = service.omitir_espera_oxigeno(paciente_id)
-        
-        await manager.broadcast({
+        # El servicio confirma la notificación junto con el cambio
+        encolar_broadcast(session, {
             "tipo": "pausa_oxigeno_omitida",
             "paciente_id": paciente_id
         })
+        paciente = service.omitir_espera_oxigeno(paciente_id)
         
         return MessageResponse(
             success=True,
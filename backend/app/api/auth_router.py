@@ -10,9 +10,12 @@ from sqlmodel import Session, select
 from app.core.database import get_session
 from app.models.usuario import Usuario, RolEnum, PermisoEnum, PERMISOS_POR_ROL
 from app.services.auth_service import auth_service
+from app.core.pool_contrasenas import PoolSaturado
+from app.core.principal import invalidar_principal
 from app.core.auth_dependencies import (
     get_current_user,
     get_current_user_optional,
+    get_current_usuario,
     require_permissions,
     require_roles,
     can_manage_user
@@ -50,7 +53,14 @@ async def login(
     Inicia sesión con username/email y contraseña.
     Retorna access_token y refresh_token.
     """
-    user = auth_service.authenticate_user(data.username, data.password, session)
+    try:
+        user = await auth_service.authenticate_user_async(data.username, data.password, session)
+    except PoolSaturado as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados inicios de sesión simultáneos, reintenta en unos segundos",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     
     if not user:
         raise HTTPException(
@@ -167,7 +177,7 @@ async def logout_all_sessions(
 
 @router.get("/me", response_model=UserResponse)
 async def get_me(
-    current_user: Usuario = Depends(get_current_user)
+    current_user: Usuario = Depends(get_current_usuario)
 ):
     """
     Obtiene la información del usuario actual.
@@ -191,14 +201,14 @@ async def get_me(
 @router.put("/me/password", response_model=MessageResponse)
 async def change_password(
     data: PasswordChangeRequest,
-    current_user: Usuario = Depends(get_current_user),
+    current_user: Usuario = Depends(get_current_usuario),
     session: Session = Depends(get_session)
 ):
     """
     Cambia la contraseña del usuario actual.
     """
     # Verificar contraseña actual
-    if not auth_service.verify_password(data.current_password, current_user.hashed_password):
+    if not await auth_service.verify_password_async(data.current_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Contraseña actual incorrecta"
@@ -212,7 +222,7 @@ async def change_password(
         )
     
     # Actualizar contraseña
-    auth_service.update_password(current_user, data.new_password, session)
+    await auth_service.update_password_async(current_user, data.new_password, session)
     
     # Revocar todos los tokens (forzar re-login)
     auth_service.revoke_all_user_tokens(current_user.id, session)
@@ -318,7 +328,7 @@ async def create_user(
         )
     
     # Crear usuario
-    user = auth_service.create_user(
+    user = await auth_service.create_user_async(
         username=data.username,
         email=data.email,
         password=data.password,
@@ -459,6 +469,8 @@ async def update_user(
     session.add(user)
     session.commit()
     session.refresh(user)
+    # Rol, hospital, servicio o estado pueden haber cambiado
+    invalidar_principal(user.id)
     
     return UserResponse(
         id=user.id,
@@ -559,7 +571,7 @@ async def reset_user_password(
     # Nueva contraseña temporal
     temp_password = f"{user.username}123"
     
-    auth_service.update_password(user, temp_password, session)
+    await auth_service.update_password_async(user, temp_password, session)
     auth_service.revoke_all_user_tokens(user.id, session)
     
     return MessageResponse(
@@ -5,19 +5,65 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session
 from typing import List
 
+from app.config import settings
 from app.core.database import get_session
-from app.core.websocket_manager import manager
+from app.core.outbox import encolar_broadcast
 from app.core.auth_dependencies import get_current_user
 from app.core.rbac_service import rbac_service
 from app.models.usuario import Usuario, PermisoEnum
 from app.models.enums import EstadoCamaEnum
-from app.schemas.cama import CamaResponse, CamaBloquearRequest
+from app.schemas.cama import CamaResponse, CamaBloquearRequest, CamasLoteRequest, CamasLoteResponse
 from app.schemas.responses import MessageResponse
 from app.repositories.cama_repo import CamaRepository
+from app.services.operaciones_camas_service import (
+    LoteDemasiadoGrandeError,
+    OperacionesCamasService,
+    OperacionNoPermitidaError,
+)
 
 router = APIRouter()
 
 
+@router.post("/lote", response_model=CamasLoteResponse)
+def operar_camas_lote(
+    lote: CamasLoteRequest,
+    current_user: Usuario = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """
+    Operaciones masivas sobre camas (bloqueo de una sala por mantención,
+    liberación de un servicio tras limpieza, etc.).
+
+    Cada operación (BLOQUEAR, DESBLOQUEAR, INICIAR_LIMPIEZA, FINALIZAR_LIMPIEZA)
+    se aplica a las camas indicadas por id, sala o servicio. Todo ocurre en una
+    transacción con un solo recálculo del sexo de las salas y un único broadcast
+    "camas_actualizadas". Las camas que no admiten la transición o pertenecen a
+    un hospital sin permisos se omiten con su motivo; con todo_o_nada=True
+    cualquier omisión descarta el lote completo (409).
+    """
+    try:
+        resultado = OperacionesCamasService(session).aplicar(
+            [op.model_dump() for op in lote.operaciones],
+            current_user,
+            todo_o_nada=lote.todo_o_nada,
+            max_camas=settings.CAMAS_LOTE_MAX,
+        )
+    except OperacionNoPermitidaError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except LoteDemasiadoGrandeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    respuesta = CamasLoteResponse(
+        aplicado=resultado.aplicado,
+        modificadas=resultado.modificadas if resultado.aplicado else 0,
+        omitidas=resultado.omitidas,
+        resultados=[vars(r) for r in resultado.resultados],
+    )
+    if not resultado.aplicado:
+        raise HTTPException(status_code=409, detail=respuesta.model_dump(mode="json"))
+    return respuesta
+
+
 @router.get("/{cama_id}", response_model=CamaResponse)
 def obtener_cama(cama_id: str, session: Session = Depends(get_session)):
     """Obtiene una cama específica."""
@@ -87,28 +133,29 @@ async def bloquear_cama(
             detail=f"No tienes permisos para bloquear camas en este hospital. Solo el Gestor de Camas (Puerto Montt) o equipo medicoquirúrgico (Llanquihue/Calbuco) pueden hacerlo."
         )
 
+    if request.bloquear and cama.estado != EstadoCamaEnum.LIBRE:
+        raise HTTPException(
+            status_code=400,
+            detail="Solo se pueden bloquear camas libres"
+        )
+    if not request.bloquear and cama.estado != EstadoCamaEnum.BLOQUEADA:
+        raise HTTPException(
+            status_code=400,
+            detail="La cama no está bloqueada"
+        )
+
+    # Se confirma en el mismo commit que el cambio de estado
+    encolar_broadcast(session, {
+        "tipo": "cama_actualizada",
+        "cama_id": cama_id
+    })
     if request.bloquear:
-        if cama.estado != EstadoCamaEnum.LIBRE:
-            raise HTTPException(
-                status_code=400,
-                detail="Solo se pueden bloquear camas libres"
-            )
         repo.cambiar_estado(cama, EstadoCamaEnum.BLOQUEADA, "Bloqueada")
         mensaje = "Cama bloqueada correctamente"
     else:
-        if cama.estado != EstadoCamaEnum.BLOQUEADA:
-            raise HTTPException(
-                status_code=400,
-                detail="La cama no está bloqueada"
-            )
         repo.cambiar_estado(cama, EstadoCamaEnum.LIBRE)
         mensaje = "Cama desbloqueada correctamente"
 
-    await manager.broadcast({
-        "tipo": "cama_actualizada",
-        "cama_id": cama_id
-    })
-
     return MessageResponse(success=True, message=mensaje)
 
 
@@ -6,7 +6,8 @@ from fastapi import APIRouter, Depends
 from sqlmodel import Session
 
 from app.core.database import get_session
-from app.core.websocket_manager import manager
+from app.core.outbox import encolar_broadcast
+from app.core.cache import cachear_respuesta, TAG_CONFIGURACION
 from app.schemas.responses import MessageResponse
 from app.repositories.configuracion_repo import ConfiguracionRepository
 
@@ -51,6 +52,7 @@ def minutos_a_segundos(minutos: int) -> int:
 # ENDPOINTS
 # ============================================
 @router.get("", response_model=ConfiguracionResponseMinutos)
+@cachear_respuesta("configuracion", tags=[TAG_CONFIGURACION])
 def obtener_configuracion(session: Session = Depends(get_session)):
     """
     Obtiene la configuración del sistema.
@@ -90,18 +92,19 @@ async def actualizar_configuracion(
     if config_update.tiempo_espera_oxigeno_minutos is not None:
         tiempo_oxigeno_seg = minutos_a_segundos(config_update.tiempo_espera_oxigeno_minutos)
     
+    # Notificar cambio de configuración (se confirma con la actualización)
+    actual = repo.obtener_o_crear()
+    encolar_broadcast(session, {
+        "tipo": "configuracion_actualizada",
+        "modo_manual": actual.modo_manual if config_update.modo_manual is None else config_update.modo_manual
+    })
+    
     config = repo.actualizar_configuracion(
         modo_manual=config_update.modo_manual,
         tiempo_limpieza=tiempo_limpieza_seg,
         tiempo_oxigeno=tiempo_oxigeno_seg
     )
     
-    # Notificar cambio de configuración
-    await manager.broadcast({
-        "tipo": "configuracion_actualizada",
-        "modo_manual": config.modo_manual
-    })
-    
     return ConfiguracionResponseMinutos(
         modo_manual=config.modo_manual,
         tiempo_limpieza_minutos=segundos_a_minutos(config.tiempo_limpieza_segundos),
@@ -116,12 +119,11 @@ async def toggle_modo_manual(session: Session = Depends(get_session)):
     config = repo.obtener_o_crear()
     
     nuevo_modo = not config.modo_manual
-    config = repo.actualizar_configuracion(modo_manual=nuevo_modo)
-    
-    await manager.broadcast({
+    encolar_broadcast(session, {
         "tipo": "modo_cambiado",
         "modo_manual": nuevo_modo
     })
+    config = repo.actualizar_configuracion(modo_manual=nuevo_modo)
     
     modo_texto = "manual" if nuevo_modo else "automático"
     return MessageResponse(
@@ -7,8 +7,10 @@ from typing import List
 
 from app.core.database import get_session
 from app.core.auth_dependencies import get_current_user
+from app.core.cache import tag_pacientes_hospital, TAG_ESTRUCTURA
+from app.core.versiones import etag_condicional
 from app.core.rbac_service import rbac_service
-from app.core.websocket_manager import manager
+from app.core.outbox import encolar_broadcast, encolar_notificacion
 from app.core.exceptions import PacienteNotFoundError, ValidationError
 from app.models.usuario import Usuario, PermisoEnum, RolEnum
 from app.schemas.derivacion import DerivacionRequest, DerivacionAccionRequest
@@ -19,8 +21,15 @@ from app.repositories.paciente_repo import PacienteRepository
 
 router = APIRouter()
 
+# Derivaciones hacia el hospital; el tiempo en lista cambia con el reloj (un render por minuto)
+etag_derivados = etag_condicional(
+    "derivados",
+    lambda params, session: [tag_pacientes_hospital(params["hospital_id"]), TAG_ESTRUCTURA],
+    granularidad_segundos=60,
+)
 
-@router.get("/hospital/{hospital_id}", response_model=List[PacienteDerivadoResponse])
+
+@router.get("/hospital/{hospital_id}", response_model=List[PacienteDerivadoResponse], dependencies=[Depends(etag_derivados)])
 def obtener_derivados(
     hospital_id: str,
     current_user: Usuario = Depends(get_current_user),
@@ -174,16 +183,6 @@ async def solicitar_derivacion(
             cama_reservada_id=request.cama_reservada_id  # Pasar cama reservada si existe
         )
 
-        await manager.send_notification(
-            {
-                "tipo": "derivacion_solicitada",
-                "paciente_id": paciente_id,
-                "hospital_destino_id": request.hospital_destino_id,
-            },
-            notification_type="info",
-            hospital_id=request.hospital_destino_id
-        )
-
         return MessageResponse(success=True, message=resultado.mensaje)
 
     except PacienteNotFoundError:
@@ -223,25 +222,25 @@ async def accion_derivacion(
     service = DerivacionService(session)
     
     try:
-        if request.accion == "aceptar":
-            resultado = service.aceptar_derivacion(paciente_id)
-            notification_type = "success"
-        else:
-            if not request.motivo_rechazo:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Debe indicar el motivo del rechazo"
-                )
-            resultado = service.rechazar_derivacion(paciente_id, request.motivo_rechazo)
-            notification_type = "warning"
-        
-        await manager.send_notification(
+        if request.accion != "aceptar" and not request.motivo_rechazo:
+            raise HTTPException(
+                status_code=400,
+                detail="Debe indicar el motivo del rechazo"
+            )
+
+        # El servicio confirma la notificación junto con el cambio
+        encolar_notificacion(
+            session,
             {
                 "tipo": f"derivacion_{request.accion}da",
                 "paciente_id": paciente_id,
             },
-            notification_type=notification_type
+            notification_type="success" if request.accion == "aceptar" else "warning"
         )
+        if request.accion == "aceptar":
+            resultado = service.aceptar_derivacion(paciente_id)
+        else:
+            resultado = service.rechazar_derivacion(paciente_id, request.motivo_rechazo)
         
         return MessageResponse(success=True, message=resultado.mensaje)
         
@@ -260,12 +259,11 @@ async def confirmar_egreso_derivacion(
     service = DerivacionService(session)
 
     try:
-        resultado = service.confirmar_egreso_derivacion(paciente_id)
-
-        await manager.broadcast({
+        encolar_broadcast(session, {
             "tipo": "egreso_confirmado",
             "paciente_id": paciente_id
         })
+        resultado = service.confirmar_egreso_derivacion(paciente_id)
 
         return MessageResponse(success=True, message=resultado.mensaje)
 
@@ -291,12 +289,11 @@ async def cancelar_derivacion_desde_origen(
     service = DerivacionService(session)
     
     try:
-        resultado = service.cancelar_derivacion_desde_origen(paciente_id)
-        
-        await manager.broadcast({
+        encolar_broadcast(session, {
             "tipo": "derivacion_cancelada_origen",
             "paciente_id": paciente_id
         })
+        resultado = service.cancelar_derivacion_desde_origen(paciente_id)
         
         return MessageResponse(success=True, message=resultado.mensaje)
         
@@ -338,6 +335,41 @@ def verificar_viabilidad_derivacion(
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+@router.get("/{paciente_id}/viabilidad-red")
+def verificar_viabilidad_red(
+    paciente_id: str,
+    session: Session = Depends(get_session)
+):
+    """
+    Verifica la viabilidad de derivar al paciente a cada hospital de la red
+    en una sola llamada (reemplaza una llamada a verificar-viabilidad por
+    hospital candidato).
+
+    Incluye la capacidad de cada hospital (complejidad máxima, tipos de
+    servicio, salas individuales, pediatría y obstetricia).
+    """
+    service = DerivacionService(session)
+
+    try:
+        resultados = service.verificar_viabilidad_red(paciente_id)
+    except PacienteNotFoundError:
+        raise HTTPException(status_code=404, detail="Paciente no encontrado")
+
+    return {
+        "paciente_id": paciente_id,
+        "hospitales": [
+            {
+                "hospital_id": r.hospital_destino_id,
+                "hospital_nombre": r.hospital_destino_nombre,
+                "es_viable": r.es_viable,
+                "mensaje": r.mensaje,
+                "motivos_rechazo": r.motivos_rechazo,
+                "capacidad": r.capacidad.a_dict() if r.capacidad else None,
+            }
+            for r in resultados
+        ],
+    }
+
 @router.post("/{paciente_id}/cancelar", response_model=MessageResponse)
 async def cancelar_derivacion(
     paciente_id: str,
@@ -365,12 +397,11 @@ async def cancelar_derivacion(
     
     try:
         # Usar rechazo sin motivo para cancelar
-        resultado = service.rechazar_derivacion(paciente_id, "Cancelada por el usuario")
-        
-        await manager.broadcast({
+        encolar_broadcast(session, {
             "tipo": "derivacion_cancelada",
             "paciente_id": paciente_id
         })
+        resultado = service.rechazar_derivacion(paciente_id, "Cancelada por el usuario")
         
         return MessageResponse(success=True, message="Derivación cancelada")
         
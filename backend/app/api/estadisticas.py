@@ -1,17 +1,25 @@
 """
 Endpoints de Estadísticas.
 """
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
 from typing import List, Optional
 from datetime import datetime, timedelta
+import json
 
 from app.core.database import get_session
+from app.core.auth_dependencies import get_current_user_optional
+from app.core.cache import cachear_respuesta, TAG_ESTADISTICAS, _alcance_rbac
+from app.core.exceptions import ValidationError
+from app.config import settings
 from app.models.hospital import Hospital
 from app.models.cama import Cama
 from app.models.paciente import Paciente
 from app.models.sala import Sala
 from app.models.servicio import Servicio
+from app.models.usuario import Usuario
 from app.models.enums import EstadoCamaEnum, ESTADOS_CAMA_OCUPADA
 from app.schemas.responses import (
     EstadisticasHospitalResponse,
@@ -25,13 +33,33 @@ from app.schemas.paciente import ListaEsperaResponse, PacienteListaEsperaRespons
 from app.repositories.hospital_repo import HospitalRepository
 from app.repositories.paciente_repo import PacienteRepository
 from app.services.prioridad_service import gestor_colas_global, PrioridadService
+from app.services import analitica_duraciones, ocupacion_historica, ocupacion_service
 from app.services.estadisticas_service import EstadisticasService
-from app.utils.helpers import calcular_estadisticas_camas
+from app.services.motor_duraciones import METRICAS_DURACION
+from app.services.reporte_estadisticas import generador_reporte
+from app.utils.helpers import estadisticas_desde_conteos
 
 router = APIRouter()
 
 
+DESCRIPCION_PERCENTILES = "Percentiles separados por coma (ej: 50,90,95,99)"
+
+
+def _parsear_percentiles(valor: Optional[str]) -> Optional[List[float]]:
+    """Convierte "50,90,99" en [50.0, 90.0, 99.0]; 400 si no son válidos."""
+    if not valor:
+        return None
+    try:
+        percentiles = [float(p) for p in valor.split(",") if p.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Percentiles inválidos: {valor}")
+    if not percentiles or any(not 0 <= p <= 100 for p in percentiles):
+        raise HTTPException(status_code=400, detail="Los percentiles deben estar entre 0 y 100")
+    return percentiles
+
+
 @router.get("", response_model=EstadisticasGlobalesResponse)
+@cachear_respuesta("estadisticas:globales", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 def obtener_estadisticas_globales(session: Session = Depends(get_session)):
     """Obtiene estadísticas globales del sistema."""
     hospital_repo = HospitalRepository(session)
@@ -42,9 +70,10 @@ def obtener_estadisticas_globales(session: Session = Depends(get_session)):
     total_ocupadas = 0
     total_pacientes = 0
     
+    conteos_hospitales = ocupacion_service.conteos_por_hospital(session)
+    
     for hospital in hospitales:
-        camas = hospital_repo.obtener_camas_hospital(hospital.id)
-        stats = calcular_estadisticas_camas(camas)
+        stats = estadisticas_desde_conteos(conteos_hospitales.get(hospital.id, {}))
         
         cola = gestor_colas_global.obtener_cola(hospital.id)
         pacientes_espera = cola.tamano()
@@ -87,6 +116,7 @@ def obtener_estadisticas_globales(session: Session = Depends(get_session)):
 
 
 @router.get("/hospital/{hospital_id}", response_model=EstadisticasHospitalResponse)
+@cachear_respuesta("estadisticas:hospital", tags=[TAG_ESTADISTICAS, "hospital:{hospital_id}"], ttl=settings.CACHE_ESTADISTICAS_TTL)
 def obtener_estadisticas_hospital(
     hospital_id: str,
     session: Session = Depends(get_session)
@@ -99,8 +129,7 @@ def obtener_estadisticas_hospital(
         from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Hospital no encontrado")
     
-    camas = hospital_repo.obtener_camas_hospital(hospital_id)
-    stats = calcular_estadisticas_camas(camas)
+    stats = estadisticas_desde_conteos(ocupacion_service.conteos(session, hospital_id=hospital_id))
     
     cola = gestor_colas_global.obtener_cola(hospital_id)
     
@@ -128,6 +157,7 @@ def obtener_estadisticas_hospital(
 
 
 @router.get("/lista-espera/{hospital_id}", response_model=ListaEsperaResponse)
+@cachear_respuesta("estadisticas:lista_espera", tags=[TAG_ESTADISTICAS, "hospital:{hospital_id}"], ttl=30)
 def obtener_lista_espera(
     hospital_id: str,
     session: Session = Depends(get_session)
@@ -208,64 +238,40 @@ def obtener_lista_espera(
 # ============================================
 
 @router.get("/avanzadas/completas", response_model=EstadisticasCompletasResponse)
+@cachear_respuesta("estadisticas:avanzadas:completas", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_estadisticas_completas(
     dias: int = Query(7, description="Días hacia atrás para calcular estadísticas"),
-    session: Session = Depends(get_session)
+    current_user: Optional[Usuario] = Depends(get_current_user_optional),
 ):
     """
     Obtiene todas las estadísticas avanzadas del sistema.
     Incluye ingresos, egresos, tiempos, ocupación, flujos, demanda, etc.
+
+    Las secciones se calculan en paralelo y el reporte se comparte entre
+    peticiones concurrentes (ver reporte_estadisticas).
     """
-    fecha_fin = datetime.utcnow()
-    fecha_inicio = fecha_fin - timedelta(days=dias)
+    reporte = await generador_reporte.obtener(dias, _alcance_rbac(current_user))
+    return EstadisticasCompletasResponse(**reporte)
 
-    # Ingresos y Egresos
-    ingresos_red = await EstadisticasService.calcular_ingresos_red(session, fecha_inicio, fecha_fin)
-    egresos_red = await EstadisticasService.calcular_egresos_red(session, fecha_inicio, fecha_fin)
-
-    # Tiempos
-    tiempo_espera_cama = await EstadisticasService.calcular_tiempo_espera_cama(session, fecha_inicio, fecha_fin)
-    tiempo_derivacion = await EstadisticasService.calcular_tiempo_derivacion_pendiente(session, fecha_inicio, fecha_fin)
-    tiempo_traslado = await EstadisticasService.calcular_tiempo_traslado_saliente(session, fecha_inicio, fecha_fin)
-    tiempo_confirmacion = await EstadisticasService.calcular_tiempo_confirmacion_traslado(session, fecha_inicio, fecha_fin)
-    tiempo_alta = await EstadisticasService.calcular_tiempo_alta(session, fecha_inicio, fecha_fin)
-    tiempo_fallecido = await EstadisticasService.calcular_tiempo_fallecido(session, fecha_inicio, fecha_fin)
-    tiempo_hosp_red = await EstadisticasService.calcular_tiempo_hospitalizacion(session, None, None, fecha_inicio, fecha_fin)
-
-    # Tasas de Ocupación
-    tasa_red = await EstadisticasService.calcular_tasa_ocupacion_red(session)
-
-    # Flujos y Demanda
-    flujos = await EstadisticasService.calcular_flujos_mas_repetidos(session, fecha_inicio, fecha_fin)
-    demanda = await EstadisticasService.calcular_servicios_mayor_demanda(session)
-
-    # Casos Especiales
-    casos = await EstadisticasService.calcular_casos_especiales(session)
-
-    # Subutilización
-    camas_sub = await EstadisticasService.calcular_camas_subutilizadas(session)
-    servicios_sub = await EstadisticasService.calcular_servicios_subutilizados(session)
-
-    return EstadisticasCompletasResponse(
-        ingresos_red=ingresos_red,
-        egresos_red=egresos_red,
-        tiempo_espera_cama=tiempo_espera_cama,
-        tiempo_derivacion_pendiente=tiempo_derivacion,
-        tiempo_traslado_saliente=tiempo_traslado,
-        tiempo_confirmacion_traslado=tiempo_confirmacion,
-        tiempo_alta=tiempo_alta,
-        tiempo_fallecido=tiempo_fallecido,
-        tiempo_hospitalizacion_red=tiempo_hosp_red,
-        tasa_ocupacion_red=tasa_red,
-        flujos_mas_repetidos=flujos,
-        servicios_mayor_demanda=demanda,
-        casos_especiales=casos,
-        camas_subutilizadas=camas_sub,
-        servicios_subutilizados=servicios_sub
-    )
+
+@router.get("/avanzadas/completas/stream")
+async def stream_estadisticas_completas(
+    dias: int = Query(7, description="Días hacia atrás para calcular estadísticas"),
+    current_user: Optional[Usuario] = Depends(get_current_user_optional),
+):
+    """
+    Variante incremental de /avanzadas/completas: entrega una línea NDJSON
+    {"seccion": ..., "datos": ...} por cada sección a medida que termina.
+    """
+    async def _lineas():
+        async for nombre, datos in generador_reporte.secciones_a_medida(dias, _alcance_rbac(current_user)):
+            yield json.dumps({"seccion": nombre, "datos": jsonable_encoder(datos)}) + "\n"
+
+    return StreamingResponse(_lineas(), media_type="application/x-ndjson")
 
 
 @router.get("/ingresos/red")
+@cachear_respuesta("estadisticas:ingresos:red", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_ingresos_red(
     dias: int = Query(1, description="Días hacia atrás"),
     session: Session = Depends(get_session)
@@ -277,6 +283,7 @@ async def obtener_ingresos_red(
 
 
 @router.get("/ingresos/hospital/{hospital_id}")
+@cachear_respuesta("estadisticas:ingresos:hospital", tags=[TAG_ESTADISTICAS, "hospital:{hospital_id}"], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_ingresos_hospital(
     hospital_id: str,
     dias: int = Query(1, description="Días hacia atrás"),
@@ -289,6 +296,7 @@ async def obtener_ingresos_hospital(
 
 
 @router.get("/ingresos/servicio/{servicio_id}")
+@cachear_respuesta("estadisticas:ingresos:servicio", tags=[TAG_ESTADISTICAS, "servicio:{servicio_id}"], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_ingresos_servicio(
     servicio_id: str,
     dias: int = Query(1, description="Días hacia atrás"),
@@ -301,6 +309,7 @@ async def obtener_ingresos_servicio(
 
 
 @router.get("/egresos/red")
+@cachear_respuesta("estadisticas:egresos:red", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_egresos_red(
     dias: int = Query(1, description="Días hacia atrás"),
     session: Session = Depends(get_session)
@@ -312,6 +321,7 @@ async def obtener_egresos_red(
 
 
 @router.get("/egresos/hospital/{hospital_id}")
+@cachear_respuesta("estadisticas:egresos:hospital", tags=[TAG_ESTADISTICAS, "hospital:{hospital_id}"], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_egresos_hospital(
     hospital_id: str,
     dias: int = Query(1, description="Días hacia atrás"),
@@ -324,6 +334,7 @@ async def obtener_egresos_hospital(
 
 
 @router.get("/egresos/servicio/{servicio_id}")
+@cachear_respuesta("estadisticas:egresos:servicio", tags=[TAG_ESTADISTICAS, "servicio:{servicio_id}"], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_egresos_servicio(
     servicio_id: str,
     dias: int = Query(1, description="Días hacia atrás"),
@@ -336,93 +347,168 @@ async def obtener_egresos_servicio(
 
 
 @router.get("/tiempos/espera-cama", response_model=TiempoEstadisticaResponse)
+@cachear_respuesta("estadisticas:tiempos:espera_cama", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_tiempo_espera_cama(
     dias: int = Query(7, description="Días hacia atrás"),
+    percentiles: Optional[str] = Query(None, description=DESCRIPCION_PERCENTILES),
     session: Session = Depends(get_session)
 ):
     """Obtiene estadísticas de tiempo de espera de cama."""
     fecha_fin = datetime.utcnow()
     fecha_inicio = fecha_fin - timedelta(days=dias)
-    return await EstadisticasService.calcular_tiempo_espera_cama(session, fecha_inicio, fecha_fin)
+    return await EstadisticasService.calcular_tiempo_espera_cama(
+        session, fecha_inicio, fecha_fin, _parsear_percentiles(percentiles)
+    )
 
 
 @router.get("/tiempos/derivacion-pendiente", response_model=TiempoEstadisticaResponse)
+@cachear_respuesta("estadisticas:tiempos:derivacion_pendiente", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_tiempo_derivacion_pendiente(
     dias: int = Query(7, description="Días hacia atrás"),
+    percentiles: Optional[str] = Query(None, description=DESCRIPCION_PERCENTILES),
     session: Session = Depends(get_session)
 ):
     """Obtiene estadísticas de tiempo en espera de respuesta de derivación."""
     fecha_fin = datetime.utcnow()
     fecha_inicio = fecha_fin - timedelta(days=dias)
-    return await EstadisticasService.calcular_tiempo_derivacion_pendiente(session, fecha_inicio, fecha_fin)
+    return await EstadisticasService.calcular_tiempo_derivacion_pendiente(
+        session, fecha_inicio, fecha_fin, _parsear_percentiles(percentiles)
+    )
 
 
 @router.get("/tiempos/traslado-saliente", response_model=TiempoEstadisticaResponse)
+@cachear_respuesta("estadisticas:tiempos:traslado_saliente", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_tiempo_traslado_saliente(
     dias: int = Query(7, description="Días hacia atrás"),
+    percentiles: Optional[str] = Query(None, description=DESCRIPCION_PERCENTILES),
     session: Session = Depends(get_session)
 ):
     """Obtiene estadísticas de tiempo de paciente hospitalizado en espera de cama."""
     fecha_fin = datetime.utcnow()
     fecha_inicio = fecha_fin - timedelta(days=dias)
-    return await EstadisticasService.calcular_tiempo_traslado_saliente(session, fecha_inicio, fecha_fin)
+    return await EstadisticasService.calcular_tiempo_traslado_saliente(
+        session, fecha_inicio, fecha_fin, _parsear_percentiles(percentiles)
+    )
 
 
 @router.get("/tiempos/confirmacion-traslado", response_model=TiempoEstadisticaResponse)
+@cachear_respuesta("estadisticas:tiempos:confirmacion_traslado", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_tiempo_confirmacion_traslado(
     dias: int = Query(7, description="Días hacia atrás"),
+    percentiles: Optional[str] = Query(None, description=DESCRIPCION_PERCENTILES),
     session: Session = Depends(get_session)
 ):
     """Obtiene estadísticas de tiempo de confirmación de traslado (cama en espera)."""
     fecha_fin = datetime.utcnow()
     fecha_inicio = fecha_fin - timedelta(days=dias)
-    return await EstadisticasService.calcular_tiempo_confirmacion_traslado(session, fecha_inicio, fecha_fin)
+    return await EstadisticasService.calcular_tiempo_confirmacion_traslado(
+        session, fecha_inicio, fecha_fin, _parsear_percentiles(percentiles)
+    )
 
 
 @router.get("/tiempos/alta")
+@cachear_respuesta("estadisticas:tiempos:alta", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_tiempos_alta(
     dias: int = Query(7, description="Días hacia atrás"),
+    percentiles: Optional[str] = Query(None, description=DESCRIPCION_PERCENTILES),
     session: Session = Depends(get_session)
 ):
     """Obtiene estadísticas de tiempos de alta (sugerida y completada)."""
     fecha_fin = datetime.utcnow()
     fecha_inicio = fecha_fin - timedelta(days=dias)
-    return await EstadisticasService.calcular_tiempo_alta(session, fecha_inicio, fecha_fin)
+    return await EstadisticasService.calcular_tiempo_alta(
+        session, fecha_inicio, fecha_fin, _parsear_percentiles(percentiles)
+    )
 
 
 @router.get("/tiempos/fallecido", response_model=TiempoEstadisticaResponse)
+@cachear_respuesta("estadisticas:tiempos:fallecido", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_tiempo_fallecido(
     dias: int = Query(7, description="Días hacia atrás"),
+    percentiles: Optional[str] = Query(None, description=DESCRIPCION_PERCENTILES),
     session: Session = Depends(get_session)
 ):
     """Obtiene estadísticas de tiempo de egreso de fallecido."""
     fecha_fin = datetime.utcnow()
     fecha_inicio = fecha_fin - timedelta(days=dias)
-    return await EstadisticasService.calcular_tiempo_fallecido(session, fecha_inicio, fecha_fin)
+    return await EstadisticasService.calcular_tiempo_fallecido(
+        session, fecha_inicio, fecha_fin, _parsear_percentiles(percentiles)
+    )
 
 
 @router.get("/tiempos/hospitalizacion", response_model=TiempoEstadisticaResponse)
+@cachear_respuesta("estadisticas:tiempos:hospitalizacion", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_tiempo_hospitalizacion(
     hospital_id: Optional[str] = Query(None, description="ID del hospital (None para toda la red)"),
     solo_casos_especiales: Optional[bool] = Query(None, description="True para solo casos especiales, False para sin casos especiales, None para todos"),
     dias: int = Query(30, description="Días hacia atrás"),
+    percentiles: Optional[str] = Query(None, description=DESCRIPCION_PERCENTILES),
     session: Session = Depends(get_session)
 ):
     """Obtiene estadísticas de tiempo de hospitalización."""
     fecha_fin = datetime.utcnow()
     fecha_inicio = fecha_fin - timedelta(days=dias)
     return await EstadisticasService.calcular_tiempo_hospitalizacion(
-        session, hospital_id, solo_casos_especiales, fecha_inicio, fecha_fin
+        session, hospital_id, solo_casos_especiales, fecha_inicio, fecha_fin,
+        _parsear_percentiles(percentiles)
+    )
+
+
+@router.get("/tiempos/estancia-servicio")
+@cachear_respuesta("estadisticas:tiempos:estancia_servicio", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
+async def obtener_tiempo_estancia_servicio(
+    hospital_id: Optional[str] = Query(None, description="ID del hospital (None para toda la red)"),
+    servicio_id: Optional[str] = Query(None, description="ID del servicio (None para todos)"),
+    dias: int = Query(30, description="Días hacia atrás"),
+    session: Session = Depends(get_session)
+):
+    """Tiempo de estancia por servicio (estancias terminadas en la ventana)."""
+    fecha_fin = datetime.utcnow()
+    fecha_inicio = fecha_fin - timedelta(days=dias)
+    return await EstadisticasService.calcular_estancia_servicios(
+        session, hospital_id, servicio_id, fecha_inicio, fecha_fin
+    )
+
+
+@router.get("/tiempos/{metrica}/distribucion")
+@cachear_respuesta("estadisticas:tiempos:distribucion", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
+async def obtener_distribucion_tiempo(
+    metrica: str,
+    dias: int = Query(7, description="Días hacia atrás"),
+    hospital_id: Optional[str] = Query(None, description="ID del hospital (None para toda la red)"),
+    percentiles: Optional[str] = Query(None, description=DESCRIPCION_PERCENTILES),
+    bins: int = Query(analitica_duraciones.BINS_POR_DEFECTO, ge=1, le=200, description="Intervalos del histograma"),
+    session: Session = Depends(get_session)
+):
+    """
+    Distribución de una métrica de tiempo: percentiles, histograma y
+    desglose por hospital y servicio.
+
+    Métricas: espera_cama, derivacion_pendiente, traslado_saliente,
+    confirmacion_traslado, alta_sugerida, alta_completada, fallecido,
+    hospitalizacion.
+    """
+    nombre = metrica.replace("-", "_")
+    if nombre not in METRICAS_DURACION:
+        raise HTTPException(status_code=404, detail=f"Métrica de tiempo desconocida: {metrica}")
+    fecha_fin = datetime.utcnow()
+    fecha_inicio = fecha_fin - timedelta(days=dias)
+    return analitica_duraciones.analizar(
+        session, nombre, fecha_inicio, fecha_fin, hospital_id,
+        _parsear_percentiles(percentiles) or analitica_duraciones.PERCENTILES_POR_DEFECTO,
+        bins,
     )
 
 
 @router.get("/ocupacion/red", response_model=TasaOcupacionResponse)
+@cachear_respuesta("estadisticas:ocupacion:red", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_tasa_ocupacion_red(session: Session = Depends(get_session)):
     """Obtiene la tasa de ocupación de toda la red."""
     return await EstadisticasService.calcular_tasa_ocupacion_red(session)
 
 
 @router.get("/ocupacion/hospital/{hospital_id}", response_model=TasaOcupacionResponse)
+@cachear_respuesta("estadisticas:ocupacion:hospital", tags=[TAG_ESTADISTICAS, "hospital:{hospital_id}"], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_tasa_ocupacion_hospital(
     hospital_id: str,
     session: Session = Depends(get_session)
@@ -432,6 +518,7 @@ async def obtener_tasa_ocupacion_hospital(
 
 
 @router.get("/ocupacion/servicio/{servicio_id}", response_model=TasaOcupacionResponse)
+@cachear_respuesta("estadisticas:ocupacion:servicio", tags=[TAG_ESTADISTICAS, "servicio:{servicio_id}"], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_tasa_ocupacion_servicio(
     servicio_id: str,
     session: Session = Depends(get_session)
@@ -440,7 +527,34 @@ async def obtener_tasa_ocupacion_servicio(
     return await EstadisticasService.calcular_tasa_ocupacion_servicio(session, servicio_id)
 
 
+@router.get("/ocupacion/historica")
+@cachear_respuesta("estadisticas:ocupacion:historica", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
+async def obtener_ocupacion_historica(
+    dias: int = Query(7, ge=1, description="Días hacia atrás (si no se indica fecha_inicio)"),
+    fecha_inicio: Optional[datetime] = Query(None, description="Inicio de la serie"),
+    fecha_fin: Optional[datetime] = Query(None, description="Fin de la serie (por defecto, ahora)"),
+    resolucion: str = Query("1d", description="Ancho de cada punto: 1h, 6h, 1d, 1w..."),
+    nivel: str = Query(ocupacion_historica.NIVEL_SERVICIO, description="servicio, hospital o red"),
+    hospital_id: Optional[str] = Query(None, description="ID del hospital (None para toda la red)"),
+    servicio_id: Optional[str] = Query(None, description="ID del servicio (nivel servicio)"),
+    session: Session = Depends(get_session)
+):
+    """
+    Serie histórica de camas ocupadas reconstruida desde los eventos de
+    pacientes: promedio ponderado por tiempo y pico de cada intervalo.
+    """
+    fecha_fin = fecha_fin or datetime.utcnow()
+    fecha_inicio = fecha_inicio or fecha_fin - timedelta(days=dias)
+    try:
+        return ocupacion_historica.serie_ocupacion(
+            session, fecha_inicio, fecha_fin, resolucion, nivel, hospital_id, servicio_id
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+
 @router.get("/flujos/mas-repetidos")
+@cachear_respuesta("estadisticas:flujos:mas_repetidos", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_flujos_mas_repetidos(
     dias: int = Query(30, description="Días hacia atrás"),
     limite: int = Query(10, description="Número de flujos a retornar"),
@@ -453,12 +567,14 @@ async def obtener_flujos_mas_repetidos(
 
 
 @router.get("/demanda/servicios")
+@cachear_respuesta("estadisticas:demanda:servicios", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_servicios_mayor_demanda(session: Session = Depends(get_session)):
     """Obtiene los servicios con mayor demanda."""
     return await EstadisticasService.calcular_servicios_mayor_demanda(session)
 
 
 @router.get("/casos-especiales")
+@cachear_respuesta("estadisticas:casos_especiales", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_casos_especiales(
     hospital_id: Optional[str] = Query(None, description="ID del hospital (None para todos)"),
     session: Session = Depends(get_session)
@@ -468,6 +584,7 @@ async def obtener_casos_especiales(
 
 
 @router.get("/subutilizacion/camas")
+@cachear_respuesta("estadisticas:subutilizacion:camas", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_camas_subutilizadas(
     hospital_id: Optional[str] = Query(None, description="ID del hospital (None para todos)"),
     dias: int = Query(1, description="Días mínimos libre"),
@@ -478,6 +595,7 @@ async def obtener_camas_subutilizadas(
 
 
 @router.get("/subutilizacion/servicios")
+@cachear_respuesta("estadisticas:subutilizacion:servicios", tags=[TAG_ESTADISTICAS], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_servicios_subutilizados(
     hospital_id: Optional[str] = Query(None, description="ID del hospital (None para todos)"),
     session: Session = Depends(get_session)
@@ -487,6 +605,7 @@ async def obtener_servicios_subutilizados(
 
 
 @router.get("/trazabilidad/paciente/{paciente_id}", response_model=List[TrazabilidadServicioResponse])
+@cachear_respuesta("estadisticas:trazabilidad:paciente", tags=[TAG_ESTADISTICAS, "paciente:{paciente_id}"], ttl=settings.CACHE_ESTADISTICAS_TTL)
 async def obtener_trazabilidad_paciente(
     paciente_id: str,
     session: Session = Depends(get_session)
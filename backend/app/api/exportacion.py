@@ -0,0 +1,60 @@
+"""
+Endpoints de exportación masiva (eventos y estancias por servicio).
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+from typing import Callable, Optional
+from datetime import datetime, timedelta
+
+from app.core.auth_dependencies import require_permissions
+from app.core.exceptions import ValidationError
+from app.models.usuario import PermisoEnum
+from app.services import exportacion_service
+
+router = APIRouter()
+
+
+def get_fabrica_sesiones() -> Callable[[], Session]:
+    """
+    Fábrica de sesiones de lectura para la exportación.
+
+    No se usa get_session: la respuesta se transmite después de que las
+    dependencias terminan, así que la sesión la abre y cierra el propio
+    generador mientras lee.
+    """
+    return exportacion_service.sesion_lectura
+
+
+@router.get(
+    "/{tipo}",
+    dependencies=[Depends(require_permissions(PermisoEnum.ESTADISTICAS_EXPORTAR))],
+)
+def exportar(
+    tipo: str,
+    formato: str = Query("csv", description="csv, ndjson o parquet"),
+    fecha_inicio: Optional[datetime] = Query(None, description="Inicio del rango (por defecto, hace `dias` días)"),
+    fecha_fin: Optional[datetime] = Query(None, description="Fin del rango, exclusivo (por defecto, ahora)"),
+    dias: int = Query(30, ge=1, description="Días hacia atrás si no se indica fecha_inicio"),
+    hospital_id: Optional[str] = Query(None, description="ID del hospital (None para toda la red)"),
+    fabrica_sesiones: Callable[[], Session] = Depends(get_fabrica_sesiones),
+):
+    """
+    Exporta eventos (`eventos`) o estancias por servicio (`estancias`) de un
+    rango de fechas, transmitidos por lotes con memoria constante.
+    """
+    fecha_fin = fecha_fin or datetime.utcnow()
+    fecha_inicio = fecha_inicio or fecha_fin - timedelta(days=dias)
+    try:
+        bloques = exportacion_service.exportar(
+            tipo, formato, fecha_inicio, fecha_fin, hospital_id, session_factory=fabrica_sesiones
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+    archivo = exportacion_service.nombre_archivo(tipo, formato, fecha_inicio, fecha_fin)
+    return StreamingResponse(
+        bloques,
+        media_type=exportacion_service.FORMATOS[formato][0],
+        headers={"Content-Disposition": f'attachment; filename="{archivo}"'},
+    )
@@ -8,7 +8,21 @@ from datetime import datetime
 from typing import Dict, Any
 
 from app.config import settings
-from app.core.database import check_database_health, check_redis_health, get_redis
+from app.core.database import (
+    check_database_health, check_redis_health, estado_recursos, get_redis, get_session_direct,
+)
+from app.core.arranque import estado_arranque
+from app.core.cache import response_cache
+from app.core.versiones import versiones_recursos
+from app.core.topologia import topologia_actual
+from app.core.outbox import despachador_outbox
+from app.core.pool_contrasenas import pool_contrasenas
+from app.core.almacenamiento import almacen_documentos
+from app.core.principal import cache_principales
+from app.services.documentos_service import barredor_documentos
+from app.services.evento_writer import cola_eventos
+from app.services.ocupacion_service import metricas_tiempo_real
+from app.services.snapshot_colas import snapshot_colas
 
 router = APIRouter(
     prefix="/health",
@@ -83,18 +97,29 @@ async def readiness_probe() -> JSONResponse:
     - Base de datos
     - Redis (si está habilitado)
 
-    Si falla, Kubernetes no enviará tráfico a este pod.
+    Si falla, Kubernetes no enviará tráfico a este pod. Mientras dura el
+    calentamiento de arranque responde 503 sin consultar los componentes.
     """
+    if not estado_arranque.iniciado:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "status": "warming_up",
+                "timestamp": datetime.now().isoformat(),
+                "arranque": estado_arranque.resumen(),
+            }
+        )
+
     # Verificar base de datos
     db_health = check_database_health()
 
     # Verificar Redis
     redis_health = check_redis_health()
 
-    # Determinar estado general
+    # Determinar estado general (Redis caído degrada, pero no saca de servicio)
     all_healthy = (
         db_health.get("status") == "healthy" and
-        (redis_health.get("status") in ["healthy", "disabled"])
+        (redis_health.get("status") in ["healthy", "disabled", "unavailable"])
     )
 
     status_code = status.HTTP_200_OK if all_healthy else status.HTTP_503_SERVICE_UNAVAILABLE
@@ -107,7 +132,8 @@ async def readiness_probe() -> JSONResponse:
             "components": {
                 "database": db_health,
                 "redis": redis_health
-            }
+            },
+            "arranque": estado_arranque.resumen(),
         }
     )
 
@@ -138,7 +164,7 @@ async def detailed_health_check() -> JSONResponse:
     # Determinar estado general
     all_healthy = (
         db_health.get("status") == "healthy" and
-        (redis_health.get("status") in ["healthy", "disabled"])
+        (redis_health.get("status") in ["healthy", "disabled", "unavailable"])
     )
 
     # Información adicional del sistema
@@ -187,15 +213,13 @@ async def startup_probe() -> JSONResponse:
     """
     Startup probe para Kubernetes.
 
-    Verifica que la aplicación terminó de inicializar.
-    Útil para aplicaciones que tardan en iniciar.
+    Verifica que la aplicación terminó de inicializar: el calentamiento de
+    arranque (engine, Redis y restauración de colas) ya corrió. No abre
+    conexiones: solo informa el estado registrado.
 
     Si falla, Kubernetes esperará más tiempo antes de enviar tráfico.
     """
-    # Verificar base de datos (componente crítico para el inicio)
-    db_health = check_database_health()
-
-    is_started = db_health.get("status") == "healthy"
+    is_started = estado_arranque.iniciado
 
     status_code = status.HTTP_200_OK if is_started else status.HTTP_503_SERVICE_UNAVAILABLE
 
@@ -204,7 +228,8 @@ async def startup_probe() -> JSONResponse:
         content={
             "status": "started" if is_started else "starting",
             "timestamp": datetime.now().isoformat(),
-            "database": db_health
+            "arranque": estado_arranque.resumen(),
+            "recursos": estado_recursos(),
         }
     )
 
@@ -231,8 +256,30 @@ async def metrics() -> Dict[str, Any]:
         "timestamp": datetime.now().isoformat(),
         "app_version": settings.APP_VERSION,
         "environment": settings.APP_ENV,
+        "cache_respuestas": response_cache.estadisticas(),
+        "etag": versiones_recursos.estadisticas(),
+        "outbox": despachador_outbox.estadisticas(),
+        "cola_eventos": cola_eventos.estadisticas(),
+        "cache_principales": cache_principales.estadisticas(),
+        "pool_contrasenas": pool_contrasenas.estadisticas(),
+        "documentos": {**almacen_documentos.estadisticas(), "barrido": barredor_documentos.estadisticas()},
+        "snapshot_colas": snapshot_colas.estadisticas(),
     }
 
+    topologia = topologia_actual()
+    if topologia is not None:
+        metrics_data["topologia"] = topologia.resumen()
+
+    # Ocupación en tiempo real desde los contadores (una fila por servicio y estado)
+    try:
+        session = get_session_direct()
+        try:
+            metrics_data["ocupacion"] = metricas_tiempo_real(session)
+        finally:
+            session.close()
+    except Exception:
+        pass
+
     # Si Redis está disponible, obtener estadísticas
     if redis_client:
         try:
@@ -10,8 +10,20 @@ from typing import Optional, List
 from datetime import datetime, timezone
 
 from app.core.database import get_session
+from app.core.outbox import encolar_broadcast
+from app.core.cache import (
+    cachear_respuesta,
+    tags_hospitales_en_respuesta,
+    tag_hospital,
+    tag_pacientes_hospital,
+    TAG_ESTRUCTURA,
+    TAG_HOSPITALES,
+)
+from app.core.versiones import etag_condicional
 from app.core.auth_dependencies import get_current_user, require_not_readonly
-from app.core.rbac_service import rbac_service
+from app.core.rbac_service import rbac_service, CODIGO_HOSPITAL_MAP, CODIGO_SERVICIO_MAP
+from app.core.alcance_rbac import predicado_camas, predicado_pacientes
+from app.core.topologia import obtener_topologia, topologia_actual
 from app.models.usuario import Usuario, PermisoEnum, RolEnum
 from app.models.hospital import Hospital
 from app.models.servicio import Servicio
@@ -24,31 +36,32 @@ from app.schemas.cama import CamaResponse
 from app.repositories.hospital_repo import HospitalRepository
 from app.repositories.cama_repo import CamaRepository
 from app.services.prioridad_service import gestor_colas_global, PrioridadService
-from app.utils.helpers import calcular_estadisticas_camas, crear_paciente_response
+from app.services import ocupacion_service
+from app.utils.helpers import estadisticas_desde_conteos, crear_paciente_response
 from pydantic import BaseModel
 
 router = APIRouter()
 
 
-# Mapeo de códigos largos a códigos cortos de la BD
-CODIGO_HOSPITAL_MAP = {
-    "puerto_montt": "PM",
-    "llanquihue": "LL",
-    "calbuco": "CA",
-}
+# Versiones de las que depende cada vista (ETag, ver app/core/versiones.py)
+def _tags_lista_hospitales(params, session) -> List[str]:
+    hospital_ids = obtener_topologia(session).hospitales
+    return [TAG_HOSPITALES, TAG_ESTRUCTURA] + [tag_hospital(h) for h in sorted(hospital_ids)]
 
-CODIGO_SERVICIO_MAP = {
-    "medicina": "Med",
-    "cirugia": "Cirug",
-    "uci": "UCI",
-    "uti": "UTI",
-    "pediatria": "Ped",
-    "obstetricia": "Obst",
-    "aislamiento": "Aisl",
-    "medicoquirurgico": "MQ",
-    "urgencias": "Urg",
-    "ambulatorio": "Amb",
-}
+
+def _tags_pacientes_hospital(params, session) -> List[str]:
+    return [tag_pacientes_hospital(params["hospital_id"]), TAG_ESTRUCTURA]
+
+
+etag_hospitales = etag_condicional("hospitales", _tags_lista_hospitales)
+# Los pacientes del mapa de camas traen tiempos que dependen del reloj (tiempo
+# restante de observación/monitorización, minutos de espera): el ETag cambia
+# también cada minuto para no servir cuentas regresivas congeladas
+etag_camas = etag_condicional(
+    "camas", lambda params, session: [tag_hospital(params["hospital_id"])], granularidad_segundos=60,
+)
+# El tiempo de espera en minutos cambia con el reloj: a lo sumo un render por minuto
+etag_lista_espera = etag_condicional("lista_espera", _tags_pacientes_hospital, granularidad_segundos=60)
 
 
 def puede_acceder_hospital_por_codigo(user: Usuario, hospital: Hospital) -> bool:
@@ -58,6 +71,12 @@ def puede_acceder_hospital_por_codigo(user: Usuario, hospital: Hospital) -> bool
     if not user.hospital_id:
         return True
 
+    topologia = topologia_actual()
+    if topologia is not None:
+        user_hospital_uuid = topologia.resolver_hospital_id(user.hospital_id)
+        if user_hospital_uuid:
+            return user_hospital_uuid == hospital.id
+
     # Normalizar código del usuario (convertir formato largo a corto)
     user_hospital_codigo = CODIGO_HOSPITAL_MAP.get(user.hospital_id, user.hospital_id)
 
@@ -67,7 +86,8 @@ def puede_acceder_hospital_por_codigo(user: Usuario, hospital: Hospital) -> bool
             user.hospital_id == hospital.codigo)
 
 
-@router.get("", response_model=List[HospitalResponse])
+@router.get("", response_model=List[HospitalResponse], dependencies=[Depends(etag_hospitales)])
+@cachear_respuesta("hospitales:lista", tags=[tags_hospitales_en_respuesta])
 def obtener_hospitales(
     current_user: Usuario = Depends(get_current_user),
     session: Session = Depends(get_session)
@@ -97,10 +117,10 @@ def obtener_hospitales(
                         h.codigo in hospitales_permitidos_normalizados]
 
     resultado = []
+    conteos_hospitales = ocupacion_service.conteos_por_hospital(session)
     
     for hospital in hospitales:
-        camas = repo.obtener_camas_hospital(hospital.id)
-        stats = calcular_estadisticas_camas(camas)
+        stats = estadisticas_desde_conteos(conteos_hospitales.get(hospital.id, {}))
         
         # Contar pacientes en espera (incluye los que tienen cama destino asignada)
         cola = gestor_colas_global.obtener_cola(hospital.id)
@@ -142,6 +162,7 @@ def obtener_hospitales(
 
 
 @router.get("/disponibles-para-derivacion", response_model=List[HospitalResponse])
+@cachear_respuesta("hospitales:disponibles_derivacion", tags=[tags_hospitales_en_respuesta])
 def obtener_hospitales_disponibles_para_derivacion(
     current_user: Usuario = Depends(get_current_user),
     session: Session = Depends(get_session)
@@ -171,6 +192,8 @@ def obtener_hospitales_disponibles_para_derivacion(
     repo = HospitalRepository(session)
     hospitales_todos = repo.obtener_todos()
 
+    conteos_hospitales = ocupacion_service.conteos_por_hospital(session)
+
     # Filtrar hospitales: mostrar todos EXCEPTO el hospital del usuario actual
     hospitales = []
 
@@ -194,8 +217,7 @@ def obtener_hospitales_disponibles_para_derivacion(
                 continue  # Saltar el hospital actual
 
         # Agregar hospital con sus estadísticas
-        camas = repo.obtener_camas_hospital(hospital.id)
-        stats = calcular_estadisticas_camas(camas)
+        stats = estadisticas_desde_conteos(conteos_hospitales.get(hospital.id, {}))
 
         # Contar pacientes en espera
         cola = gestor_colas_global.obtener_cola(hospital.id)
@@ -235,6 +257,7 @@ def obtener_hospitales_disponibles_para_derivacion(
 
 
 @router.get("/{hospital_id}", response_model=HospitalResponse)
+@cachear_respuesta("hospitales:detalle", tags=["hospital:{hospital_id}"])
 def obtener_hospital(
     hospital_id: str,
     current_user: Usuario = Depends(get_current_user),
@@ -254,8 +277,7 @@ def obtener_hospital(
             detail="No tienes permisos para acceder a este hospital"
         )
 
-    camas = repo.obtener_camas_hospital(hospital.id)
-    stats = calcular_estadisticas_camas(camas)
+    stats = estadisticas_desde_conteos(ocupacion_service.conteos(session, hospital_id=hospital.id))
     cola = gestor_colas_global.obtener_cola(hospital.id)
     
     return HospitalResponse(
@@ -272,6 +294,7 @@ def obtener_hospital(
 
 
 @router.get("/{hospital_id}/servicios", response_model=List[ServicioResponse])
+@cachear_respuesta("hospitales:servicios", tags=["hospital:{hospital_id}"])
 def obtener_servicios(
     hospital_id: str,
     current_user: Usuario = Depends(get_current_user),
@@ -324,7 +347,7 @@ def obtener_servicios(
     return resultado
 
 
-@router.get("/{hospital_id}/camas", response_model=List[CamaResponse])
+@router.get("/{hospital_id}/camas", response_model=List[CamaResponse], dependencies=[Depends(etag_camas)])
 def obtener_camas_hospital(
     hospital_id: str,
     current_user: Usuario = Depends(get_current_user),
@@ -344,25 +367,14 @@ def obtener_camas_hospital(
             detail="No tienes permisos para acceder a este hospital"
         )
 
-    camas = repo.obtener_camas_hospital(hospital_id)
+    # Restricción por servicio del usuario aplicada en la consulta
+    camas = repo.obtener_camas_hospital(hospital_id, filtro=predicado_camas(current_user))
     
     resultado = []
     for cama in camas:
         sala = cama.sala
         servicio = sala.servicio if sala else None
 
-        # Filtrar por servicio si el usuario tiene restricción de servicio
-        # Soporta comparación por código o UUID (normaliza códigos largos a cortos)
-        if servicio and current_user.servicio_id:
-            # Normalizar código del usuario
-            user_servicio_codigo = CODIGO_SERVICIO_MAP.get(current_user.servicio_id, current_user.servicio_id)
-
-            servicio_coincide = (current_user.servicio_id == servicio.id or
-                                user_servicio_codigo == servicio.codigo or
-                                current_user.servicio_id == servicio.codigo)
-            if not servicio_coincide:
-                continue
-
         # Obtener paciente actual
         paciente = None
         paciente_entrante = None
@@ -413,7 +425,8 @@ def obtener_camas_hospital(
 # incluye pacientes con cama_destino_id asignada
 # que están pendientes de completar el traslado físico.
 # ============================================
-@router.get("/{hospital_id}/lista-espera")
+@router.get("/{hospital_id}/lista-espera", dependencies=[Depends(etag_lista_espera)])
+@cachear_respuesta("hospitales:lista_espera", tags=["hospital:{hospital_id}"], ttl=30)
 def obtener_lista_espera(
     hospital_id: str,
     current_user: Usuario = Depends(get_current_user),
@@ -449,26 +462,38 @@ def obtener_lista_espera(
     # OBTENER PACIENTES DE MÚLTIPLES FUENTES
     # ============================================
     
+    # Visibilidad RBAC del usuario (servicio de origen/destino) como
+    # predicado SQL: solo se cargan los pacientes que puede ver
+    filtro_rbac = predicado_pacientes(current_user)
+
+    def visibles(query):
+        return query.where(filtro_rbac) if filtro_rbac is not None else query
+
     # Fuente 1: Cola de prioridad (pacientes esperando asignación)
     cola = gestor_colas_global.obtener_cola(hospital_id)
     pacientes_en_cola = cola.obtener_todos_ordenados()  # List[Tuple[paciente_id, prioridad]]
     pacientes_ids_en_cola = {pid for pid, _ in pacientes_en_cola}
+    pacientes_cola_visibles = {
+        p.id: p for p in session.exec(
+            visibles(select(Paciente).where(Paciente.id.in_(pacientes_ids_en_cola)))
+        ).all()
+    } if pacientes_ids_en_cola else {}
     
     # Fuente 2: Pacientes con cama_destino_id asignada (pendientes de traslado)
     # Estos pueden no estar en la cola pero deben mostrarse
-    query_pendientes_traslado = select(Paciente).where(
+    query_pendientes_traslado = visibles(select(Paciente).where(
         Paciente.hospital_id == hospital_id,
         Paciente.en_lista_espera == True,
         Paciente.cama_destino_id != None
-    )
+    ))
     pacientes_pendientes_traslado = session.exec(query_pendientes_traslado).all()
     
     # Fuente 3: Pacientes derivados aceptados que están en lista de espera
-    query_derivados_aceptados = select(Paciente).where(
+    query_derivados_aceptados = visibles(select(Paciente).where(
         Paciente.hospital_id == hospital_id,
         Paciente.en_lista_espera == True,
         Paciente.derivacion_estado == "aceptada"
-    )
+    ))
     pacientes_derivados = session.exec(query_derivados_aceptados).all()
     
     # ============================================
@@ -479,7 +504,7 @@ def obtener_lista_espera(
     
     # Agregar pacientes de la cola con su prioridad
     for paciente_id, prioridad in pacientes_en_cola:
-        paciente = session.get(Paciente, paciente_id)
+        paciente = pacientes_cola_visibles.get(paciente_id)
         if paciente:
             pacientes_dict[paciente_id] = (paciente, prioridad)
     
@@ -509,30 +534,6 @@ def obtener_lista_espera(
     cama_repo = CamaRepository(session)
 
     for posicion, (paciente, prioridad) in enumerate(pacientes_ordenados, 1):
-        # Filtrar pacientes según acceso del usuario usando RBAC service
-        # Determinar servicio de origen y destino para el filtrado
-        paciente_servicio_origen = None
-        paciente_servicio_destino = getattr(paciente, 'servicio_destino', None)
-
-        # Obtener servicio origen desde cama_id si existe
-        if paciente.cama_id:
-            cama_origen = cama_repo.obtener_por_id(paciente.cama_id)
-            if cama_origen and cama_origen.sala and cama_origen.sala.servicio:
-                paciente_servicio_origen = cama_origen.sala.servicio.nombre
-        # Si no tiene cama, usar tipo_paciente para determinar origen
-        elif paciente.tipo_paciente == TipoPacienteEnum.URGENCIA:
-            paciente_servicio_origen = "Urgencias"
-        elif paciente.tipo_paciente == TipoPacienteEnum.AMBULATORIO:
-            paciente_servicio_origen = "Ambulatorio"
-
-        # Aplicar filtro RBAC
-        if not rbac_service.puede_ver_paciente(
-            current_user,
-            paciente_servicio_origen,
-            paciente_servicio_destino,
-            paciente.hospital_id
-        ):
-            continue
         # Calcular tiempo de espera
         tiempo_espera_min = 0
         if paciente.timestamp_lista_espera:
@@ -796,6 +797,7 @@ class HospitalConTelefonosResponse(BaseModel):
 # ============================================
 
 @router.get("/{hospital_id}/telefonos", response_model=HospitalConTelefonosResponse)
+@cachear_respuesta("hospitales:telefonos", tags=["hospital:{hospital_id}"])
 def obtener_telefonos_hospital(hospital_id: str, session: Session = Depends(get_session)):
     """
     Obtiene todos los teléfonos de un hospital:
@@ -876,14 +878,14 @@ async def actualizar_telefonos_hospital(
         hospital.telefono_ambulatorio = data.telefono_ambulatorio.strip() if data.telefono_ambulatorio.strip() else None
     
     session.add(hospital)
-    session.commit()
-    session.refresh(hospital)
     
     # Notificar cambio
-    await manager.broadcast({
+    encolar_broadcast(session, {
         "tipo": "hospital_telefonos_actualizados",
         "hospital_id": hospital_id
     })
+    session.commit()
+    session.refresh(hospital)
     
     return {
         "success": True,
@@ -900,6 +902,7 @@ async def actualizar_telefonos_hospital(
 # ============================================
 
 @router.get("/{hospital_id}/servicios-telefonos", response_model=List[ServicioConTelefonoResponse])
+@cachear_respuesta("hospitales:servicios_telefonos", tags=["hospital:{hospital_id}"])
 def obtener_servicios_con_telefonos(hospital_id: str, session: Session = Depends(get_session)):
     """
     Obtiene los servicios de un hospital con sus teléfonos.
@@ -970,6 +973,13 @@ async def actualizar_telefono_servicio(
     servicio.telefono = data.telefono.strip() if data.telefono and data.telefono.strip() else None
     
     session.add(servicio)
+    
+    # Notificar cambio
+    encolar_broadcast(session, {
+        "tipo": "servicio_actualizado",
+        "servicio_id": servicio_id,
+        "hospital_id": hospital_id
+    })
     session.commit()
     session.refresh(servicio)
     
@@ -978,13 +988,6 @@ async def actualizar_telefono_servicio(
     camas = cama_repo.obtener_por_servicio(servicio.id)
     camas_libres = len([c for c in camas if c.estado == EstadoCamaEnum.LIBRE])
     
-    # Notificar cambio
-    await manager.broadcast({
-        "tipo": "servicio_actualizado",
-        "servicio_id": servicio_id,
-        "hospital_id": hospital_id
-    })
-    
     return ServicioConTelefonoResponse(
         id=servicio.id,
         nombre=servicio.nombre,
@@ -1064,13 +1067,12 @@ async def actualizar_telefonos_batch(
         session.add(servicio)
         actualizados.append(servicio.nombre)
     
-    session.commit()
-    
     # Notificar cambio
-    await manager.broadcast({
+    encolar_broadcast(session, {
         "tipo": "telefonos_hospital_actualizados",
         "hospital_id": hospital_id
     })
+    session.commit()
     
     return {
         "success": True,
@@ -10,7 +10,7 @@ import logging
 from app.core.database import get_session
 from app.core.auth_dependencies import get_current_user
 from app.core.rbac_service import rbac_service
-from app.core.websocket_manager import manager
+from app.core.outbox import encolar_broadcast, encolar_notificacion
 from app.core.exceptions import PacienteNotFoundError, ValidationError, CamaNotFoundError
 from app.models.usuario import Usuario, PermisoEnum, RolEnum
 from app.schemas.traslado import TrasladoManualRequest, IntercambioRequest
@@ -48,12 +48,9 @@ async def asignar_manual_desde_cama(
     service = TrasladoService(session)
     
     try:
-        resultado = service.traslado_manual(
-            request.paciente_id,
-            request.cama_destino_id
-        )
-        
-        await manager.send_notification(
+        # El servicio confirma la notificación junto con el cambio
+        encolar_notificacion(
+            session,
             {
                 "tipo": "asignacion_manual",
                 "paciente_id": request.paciente_id,
@@ -62,6 +59,10 @@ async def asignar_manual_desde_cama(
             notification_type="asignacion",
             play_sound=True
         )
+        resultado = service.traslado_manual(
+            request.paciente_id,
+            request.cama_destino_id
+        )
         
         return MessageResponse(success=True, message=resultado.mensaje)
         
@@ -111,13 +112,8 @@ async def asignar_manual_desde_lista(
         raise HTTPException(status_code=400, detail=f"La cama {cama.identificador} no está libre")
     
     try:
-        # CORRECCIÓN: Usar asignar_cama con los IDs correctos
-        resultado = service.asignar_cama(request.paciente_id, request.cama_destino_id)
-        
-        if not resultado.exito:
-            raise HTTPException(status_code=400, detail=resultado.mensaje)
-        
-        await manager.send_notification(
+        encolar_notificacion(
+            session,
             {
                 "tipo": "asignacion_manual_lista",
                 "paciente_id": request.paciente_id,
@@ -127,6 +123,11 @@ async def asignar_manual_desde_lista(
             notification_type="asignacion",
             play_sound=True
         )
+        # CORRECCIÓN: Usar asignar_cama con los IDs correctos
+        resultado = service.asignar_cama(request.paciente_id, request.cama_destino_id)
+        
+        if not resultado.exito:
+            raise HTTPException(status_code=400, detail=resultado.mensaje)
         
         return MessageResponse(success=True, message=resultado.mensaje)
         
@@ -159,12 +160,8 @@ async def traslado_manual(
     service = TrasladoService(session)
     
     try:
-        resultado = service.traslado_manual(
-            request.paciente_id,
-            request.cama_destino_id
-        )
-        
-        await manager.send_notification(
+        encolar_notificacion(
+            session,
             {
                 "tipo": "traslado_manual",
                 "paciente_id": request.paciente_id,
@@ -172,6 +169,10 @@ async def traslado_manual(
             },
             notification_type="success"
         )
+        resultado = service.traslado_manual(
+            request.paciente_id,
+            request.cama_destino_id
+        )
         
         return MessageResponse(success=True, message=resultado.mensaje)
         
@@ -203,16 +204,15 @@ async def intercambiar_pacientes(
     service = TrasladoService(session)
     
     try:
-        resultado = service.intercambiar_pacientes(
-            request.paciente_a_id,
-            request.paciente_b_id
-        )
-        
-        await manager.broadcast({
+        encolar_broadcast(session, {
             "tipo": "intercambio_completado",
             "paciente_a_id": request.paciente_a_id,
             "paciente_b_id": request.paciente_b_id
         })
+        resultado = service.intercambiar_pacientes(
+            request.paciente_a_id,
+            request.paciente_b_id
+        )
         
         return MessageResponse(success=True, message=resultado.mensaje)
         
@@ -244,11 +244,6 @@ async def egresar_manual(
     try:
         resultado = service.egreso_manual(paciente_id)
         
-        await manager.broadcast({
-            "tipo": "egreso_manual",
-            "paciente_id": paciente_id
-        })
-        
         return MessageResponse(success=True, message=resultado.mensaje)
         
     except PacienteNotFoundError:
@@ -304,6 +299,13 @@ async def egresar_de_lista(
     es_derivado = paciente.derivacion_estado == "aceptada"
     tiene_cama = paciente.cama_id is not None
     
+    # Se confirma con el commit de cualquiera de los flujos
+    encolar_broadcast(session, {
+        "tipo": "paciente_removido_lista",
+        "paciente_id": paciente_id,
+        "hospital_id": hospital_id
+    })
+    
     # Liberar cama destino si existe
     if paciente.cama_destino_id:
         cama_destino = cama_repo.obtener_por_id(paciente.cama_destino_id)
@@ -345,12 +347,6 @@ async def egresar_de_lista(
         session.commit()
         mensaje = "Paciente removido de la lista de espera"
     
-    await manager.broadcast({
-        "tipo": "paciente_removido_lista",
-        "paciente_id": paciente_id,
-        "hospital_id": hospital_id
-    })
-    
     return MessageResponse(
         success=True,
         message=mensaje
@@ -446,17 +442,15 @@ async def completar_egreso_fallecido(
         session.add(cama)
         session.commit()
     
-    # Eliminar el paciente
+    # Eliminar el paciente y notificar via WebSocket
     session.delete(paciente)
-    session.commit()
-    
-    # Notificar via WebSocket
-    await manager.broadcast({
+    encolar_broadcast(session, {
         "tipo": "egreso_fallecido_completado",
         "cama_id": cama_id,
         "cama_identificador": cama_identificador,
         "reload": True
     })
+    session.commit()
     
     return MessageResponse(
         success=True,
@@ -529,13 +523,12 @@ async def cancelar_fallecimiento(
     paciente.estado_cama_anterior_fallecimiento = None
     paciente.updated_at = datetime.utcnow()
     session.add(paciente)
-    session.commit()
-    
-    await manager.broadcast({
+    encolar_broadcast(session, {
         "tipo": "fallecimiento_cancelado",
         "paciente_id": paciente_id,
         "hospital_id": hospital_id
     })
+    session.commit()
     
     return MessageResponse(
         success=True,
@@ -616,13 +609,12 @@ async def cancelar_asignacion_desde_lista(
         derivacion_service = DerivacionService(session)
 
         try:
-            resultado = derivacion_service.cancelar_derivacion_desde_lista_espera(paciente_id)
-
-            await manager.broadcast({
+            encolar_broadcast(session, {
                 "tipo": "derivacion_cancelada_lista_espera",
                 "paciente_id": paciente_id,
                 "reload": True
             })
+            resultado = derivacion_service.cancelar_derivacion_desde_lista_espera(paciente_id)
 
             return MessageResponse(success=True, message=resultado.mensaje)
 
@@ -665,6 +657,14 @@ async def cancelar_asignacion_desde_lista(
     paciente.updated_at = datetime.utcnow()
     session.add(paciente)
     
+    # Notificar via WebSocket
+    encolar_broadcast(session, {
+        "tipo": "asignacion_cancelada",
+        "paciente_id": paciente_id,
+        "hospital_id": hospital_id,
+        "cama_destino_id": cama_destino_id,
+        "reload": True
+    })
     session.commit()
     
     # Mensaje según el caso
@@ -679,15 +679,6 @@ async def cancelar_asignacion_desde_lista(
         f"tiene_cama_origen={tiene_cama_origen}"
     )
     
-    # Notificar via WebSocket
-    await manager.broadcast({
-        "tipo": "asignacion_cancelada",
-        "paciente_id": paciente_id,
-        "hospital_id": hospital_id,
-        "cama_destino_id": cama_destino_id,
-        "reload": True
-    })
-    
     return MessageResponse(
         success=True,
         message=mensaje,
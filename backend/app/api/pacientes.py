@@ -1,28 +1,30 @@
 """
 Endpoints de Pacientes.
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlmodel import Session
 from typing import Optional, List
 from datetime import datetime
 from fastapi import HTTPException, status
 import os
-import uuid
 import json
 import logging
+from urllib.parse import quote
+
+import anyio
 
 from app.config import settings
+from app.core.almacenamiento import SubidaRechazada, almacen_documentos, separar_nombre_documento
 from app.core.database import get_session
 from app.core.auth_dependencies import get_current_user, require_not_readonly
 from app.core.rbac_service import rbac_service
-from app.core.websocket_manager import manager
+from app.core.outbox import encolar_broadcast
 from app.core.exceptions import PacienteNotFoundError, ValidationError
 from app.models.usuario import Usuario, PermisoEnum, RolEnum
 from app.models.paciente import Paciente
 from app.models.cama import Cama
 from app.models.configuracion import ConfiguracionSistema
 from app.models.enums import (
-    EdadCategoriaEnum, 
     TipoPacienteEnum,
     EstadoCamaEnum,
     NIVEL_COMPLEJIDAD_OXIGENO,
@@ -30,6 +32,8 @@ from app.models.enums import (
 )
 from app.schemas.paciente import (
     PacienteCreate, 
+    PacienteLoteRequest,
+    PacienteLoteResponse,
     PacienteUpdate, 
     PacienteResponse,
     ListaEsperaResponse,
@@ -42,6 +46,8 @@ from app.repositories.hospital_repo import HospitalRepository
 from app.services.asignacion_service import AsignacionService
 from app.services.prioridad_service import PrioridadService
 from app.services.derivacion_service import DerivacionService
+from app.services.documentos_service import marcar_para_borrado, reservar_contenido
+from app.services.ingreso_service import IngresoLoteService, construir_paciente
 from app.utils.helpers import crear_paciente_response
 from sqlmodel import select
 
@@ -49,16 +55,6 @@ router = APIRouter()
 logger = logging.getLogger("gestion_camas.pacientes")
 
 
-def determinar_edad_categoria(edad: int) -> EdadCategoriaEnum:
-    """Determina la categoría de edad."""
-    if edad < 15:
-        return EdadCategoriaEnum.PEDIATRICO
-    elif edad < 60:
-        return EdadCategoriaEnum.ADULTO
-    else:
-        return EdadCategoriaEnum.ADULTO_MAYOR
-
-
 def obtener_nivel_oxigeno_maximo(requerimientos: List[str]) -> int:
     """
     Obtiene el nivel máximo de oxígeno de una lista de requerimientos.
@@ -198,68 +194,18 @@ async def crear_paciente(
             detail="Solo se permite registrar pacientes de tipo Urgencia o Ambulatorio"
         )
     
-    edad_categoria = determinar_edad_categoria(paciente_data.edad)
-    
-    paciente = Paciente(
-        nombre=paciente_data.nombre,
-        run=paciente_data.run,
-        sexo=paciente_data.sexo,
-        edad=paciente_data.edad,
-        edad_categoria=edad_categoria,
-        es_embarazada=paciente_data.es_embarazada,
-        diagnostico=paciente_data.diagnostico,
-        tipo_enfermedad=paciente_data.tipo_enfermedad,
-        tipo_aislamiento=paciente_data.tipo_aislamiento,
-        notas_adicionales=paciente_data.notas_adicionales,
-        requerimientos_no_definen=json.dumps(paciente_data.requerimientos_no_definen),
-        requerimientos_baja=json.dumps(paciente_data.requerimientos_baja),
-        requerimientos_uti=json.dumps(paciente_data.requerimientos_uti),
-        requerimientos_uci=json.dumps(paciente_data.requerimientos_uci),
-        casos_especiales=json.dumps(paciente_data.casos_especiales),
-        motivo_observacion=paciente_data.motivo_observacion,
-        justificacion_observacion=paciente_data.justificacion_observacion,
-        motivo_monitorizacion=paciente_data.motivo_monitorizacion,
-        justificacion_monitorizacion=paciente_data.justificacion_monitorizacion,
-        procedimiento_invasivo=paciente_data.procedimiento_invasivo,
-        preparacion_quirurgica_detalle=paciente_data.preparacion_quirurgica_detalle,
-        tipo_paciente=paciente_data.tipo_paciente,
-        hospital_id=paciente_data.hospital_id,
-        en_lista_espera=True,
-        timestamp_lista_espera=datetime.utcnow(),
-        observacion_tiempo_horas=paciente_data.observacion_tiempo_horas,
-        monitorizacion_tiempo_horas=paciente_data.monitorizacion_tiempo_horas,
-        motivo_ingreso_ambulatorio=paciente_data.motivo_ingreso_ambulatorio,
-    )
-    
-    paciente.complejidad_requerida = service.calcular_complejidad(paciente)
-    
-    # ============================================
-    # INICIAR TIMERS SI SE ESPECIFICARON
-    # ============================================
-    
-    # Timer de observación clínica
-    if paciente_data.observacion_tiempo_horas and paciente_data.observacion_tiempo_horas > 0:
-        paciente.observacion_tiempo_horas = paciente_data.observacion_tiempo_horas
-        paciente.observacion_inicio = datetime.utcnow()
-        logger.info(
-            f"Timer de observación iniciado para {paciente.nombre}: "
-            f"{paciente_data.observacion_tiempo_horas} horas"
-        )
-    
-    # Timer de monitorización
-    if paciente_data.monitorizacion_tiempo_horas and paciente_data.monitorizacion_tiempo_horas > 0:
-        paciente.monitorizacion_tiempo_horas = paciente_data.monitorizacion_tiempo_horas
-        paciente.monitorizacion_inicio = datetime.utcnow()
-        logger.info(
-            f"Timer de monitorización iniciado para {paciente.nombre}: "
-            f"{paciente_data.monitorizacion_tiempo_horas} horas"
-        )
+    paciente = construir_paciente(paciente_data, service)
     
     session.add(paciente)
     session.commit()
     session.refresh(paciente)
     
-    # Agregar a cola de prioridad
+    # Agregar a cola de prioridad (su commit confirma también la notificación)
+    encolar_broadcast(session, {
+        "tipo": "paciente_creado",
+        "hospital_id": paciente.hospital_id,
+        "reload": True
+    })
     service.agregar_a_cola(paciente)
     
     # Si se solicitó derivación, procesarla
@@ -272,33 +218,52 @@ async def crear_paciente(
                 paciente_data.derivacion_motivo or "Derivación solicitada al registrar paciente"
             )
             
-            # Notificar al hospital destino
-            await manager.send_notification(
-                {
-                    "tipo": "derivacion_solicitada",
-                    "paciente_id": paciente.id,
-                    "paciente_nombre": paciente.nombre,
-                    "hospital_destino_id": paciente_data.derivacion_hospital_destino_id,
-                },
-                notification_type="info",
-                hospital_id=paciente_data.derivacion_hospital_destino_id
-            )
-            
             logger.info(f"Derivación solicitada para paciente {paciente.nombre}: {resultado.mensaje}")
             
         except Exception as e:
             logger.error(f"Error al solicitar derivación para {paciente.nombre}: {e}")
             # No fallar la creación del paciente por error en derivación
     
-    await manager.broadcast({
-        "tipo": "paciente_creado",
-        "hospital_id": paciente.hospital_id,
-        "reload": True
-    })
-    
     return crear_paciente_response(paciente)
 
 
+@router.post("/lote", response_model=PacienteLoteResponse)
+def crear_pacientes_lote(
+    lote: PacienteLoteRequest,
+    current_user: Usuario = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """
+    Ingreso masivo de pacientes (censo de urgencias, lote del HIS).
+
+    Cada fila tiene el formato de POST /pacientes y se valida por separado:
+    las filas con error se reportan con su índice y el resto se inserta en
+    una sola transacción, con prioridades calculadas y encoladas en bloque
+    y una notificación "pacientes_creados" por hospital.
+    """
+    if not current_user.tiene_permiso(PermisoEnum.PACIENTE_CREAR):
+        raise HTTPException(
+            status_code=403,
+            detail="No tienes permisos para crear pacientes"
+        )
+
+    if len(lote.pacientes) > settings.PACIENTES_LOTE_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"El lote supera el máximo de {settings.PACIENTES_LOTE_MAX} pacientes"
+        )
+
+    resultado = IngresoLoteService(session).ingresar(lote.pacientes, current_user)
+
+    return PacienteLoteResponse(
+        total=len(lote.pacientes),
+        creados=resultado.creados,
+        errores=resultado.errores,
+        por_hospital=resultado.por_hospital,
+        resultados=[vars(r) for r in resultado.resultados],
+    )
+
+
 @router.get("/{paciente_id}", response_model=PacienteResponse)
 def obtener_paciente(
     paciente_id: str,
@@ -763,31 +728,43 @@ async def actualizar_paciente(
     # el servicio de derivación hace su propio commit interno
     # que incluirá todos los cambios pendientes de la sesión
     # ============================================
-    derivacion_procesada = False
-    if paciente_data.derivacion_hospital_destino_id and not derivacion_activa:
+    solicitar_derivacion = bool(paciente_data.derivacion_hospital_destino_id and not derivacion_activa)
+    
+    # La notificación viaja en el mismo commit que los cambios (del servicio
+    # de derivación o el commit normal)
+    aviso = encolar_broadcast(session, {
+        "tipo": "paciente_actualizado",
+        "paciente_id": paciente_id,
+        "hospital_id": paciente.hospital_id,
+        "mensaje": "Derivación solicitada a hospital destino" if solicitar_derivacion else mensaje_broadcast,
+        "reload": True
+    })
+    
+    if solicitar_derivacion:
         try:
             derivacion_service = DerivacionService(session)
             
             # El servicio de derivación:
             # 1. Cambia la cama a ESPERA_DERIVACION
             # 2. Actualiza el paciente con derivacion_estado, etc.
-            # 3. Hace commit (que incluye TODOS los cambios pendientes)
+            # 3. Encola el aviso al hospital destino
+            # 4. Hace commit (que incluye TODOS los cambios pendientes)
             resultado = derivacion_service.solicitar_derivacion(
                 paciente.id,
                 paciente_data.derivacion_hospital_destino_id,
                 paciente_data.derivacion_motivo or "Derivación solicitada en reevaluación"
             )
-            
-            derivacion_procesada = True
-            mensaje_broadcast = f"Derivación solicitada a hospital destino"
+            if not resultado.exito:
+                raise ValidationError(resultado.mensaje)
             
             logger.info(f"Derivación procesada para paciente {paciente.nombre}: {resultado.mensaje}")
             
         except Exception as e:
             logger.error(f"Error al solicitar derivación para {paciente.nombre}: {e}")
             # Si falla la derivación, hacer commit de los cambios del paciente sin derivación
+            aviso.payload = json.dumps({**aviso.get_payload(), "mensaje": mensaje_broadcast}, default=str)
+            session.add(aviso)
             session.commit()
-            derivacion_procesada = False
     else:
         # No hay derivación: hacer commit normal
         session.commit()
@@ -795,32 +772,6 @@ async def actualizar_paciente(
     # Refrescar el paciente después del commit
     session.refresh(paciente)
     
-    # ============================================
-    # NOTIFICACIONES POST-COMMIT
-    # ============================================
-    if derivacion_procesada:
-        try:
-            await manager.send_notification(
-                {
-                    "tipo": "derivacion_solicitada",
-                    "paciente_id": paciente.id,
-                    "paciente_nombre": paciente.nombre,
-                    "hospital_destino_id": paciente_data.derivacion_hospital_destino_id,
-                },
-                notification_type="info",
-                hospital_id=paciente_data.derivacion_hospital_destino_id
-            )
-        except Exception as e:
-            logger.error(f"Error al enviar notificación de derivación: {e}")
-    
-    await manager.broadcast({
-        "tipo": "paciente_actualizado",
-        "paciente_id": paciente_id,
-        "hospital_id": paciente.hospital_id,
-        "mensaje": mensaje_broadcast,
-        "reload": True
-    })
-    
     return crear_paciente_response(paciente)
 
 
@@ -869,13 +820,13 @@ async def buscar_cama_paciente(
             )
     
     try:
-        resultado = service.iniciar_busqueda_cama(paciente_id)
-        
-        await manager.broadcast({
+        # El servicio confirma la notificación junto con el cambio
+        encolar_broadcast(session, {
             "tipo": "busqueda_iniciada",
             "paciente_id": paciente_id,
             "reload": True
         })
+        resultado = service.iniciar_busqueda_cama(paciente_id)
         
         return MessageResponse(success=True, message=resultado.mensaje)
         
@@ -991,13 +942,12 @@ async def cancelar_busqueda(
     service = AsignacionService(session)
     
     try:
-        resultado = service.cancelar_busqueda(paciente_id)
-        
-        await manager.broadcast({
+        encolar_broadcast(session, {
             "tipo": "busqueda_cancelada",
             "paciente_id": paciente_id,
             "reload": True
         })
+        resultado = service.cancelar_busqueda(paciente_id)
         
         return MessageResponse(success=True, message=resultado.mensaje)
         
@@ -1042,13 +992,12 @@ async def cancelar_busqueda_y_volver_a_cama(
 
         try:
             derivacion_service = DerivacionService(session)
-            resultado = derivacion_service.cancelar_derivacion_desde_lista_espera(paciente_id)
-
-            await manager.broadcast({
+            encolar_broadcast(session, {
                 "tipo": "derivacion_cancelada_lista_espera",
                 "paciente_id": paciente_id,
                 "reload": True
             })
+            resultado = derivacion_service.cancelar_derivacion_desde_lista_espera(paciente_id)
 
             return MessageResponse(success=True, message=resultado.mensaje)
 
@@ -1110,18 +1059,14 @@ async def cancelar_busqueda_y_volver_a_cama(
         paciente.en_lista_espera = False
         session.add(paciente)
         
-        session.commit()
-        
         # Notificar cambios via WebSocket
-        try:
-            await manager.broadcast({
-                "tipo": "cama_actualizada",
-                "cama_id": str(cama.id) if cama else None,
-                "estado": "ocupada",
-                "reload": True
-            })
-        except Exception as ws_error:
-            logger.warning(f"Error al notificar WebSocket: {ws_error}")
+        encolar_broadcast(session, {
+            "tipo": "cama_actualizada",
+            "cama_id": str(cama.id) if cama else None,
+            "estado": "ocupada",
+            "reload": True
+        })
+        session.commit()
         
         return {
             "message": f"Búsqueda cancelada. Paciente volvió a cama {cama.identificador if cama else 'anterior'}",
@@ -1199,22 +1144,17 @@ async def eliminar_paciente_sin_cama(
                 cama_destino.paciente_entrante_id = None
                 session.add(cama_destino)
         
-        # Eliminar el paciente
+        # Eliminar el paciente y notificar via WebSocket
         session.delete(paciente)
+        encolar_broadcast(session, {
+            "tipo": "paciente_eliminado",
+            "paciente_id": paciente_id,
+            "reload": True
+        })
         session.commit()
         
         logger.info(f"Paciente {nombre_paciente} ({paciente_id}) eliminado del sistema")
         
-        # Notificar cambios via WebSocket
-        try:
-            await manager.broadcast({
-                "tipo": "paciente_eliminado",
-                "paciente_id": paciente_id,
-                "reload": True
-            })
-        except Exception as ws_error:
-            logger.warning(f"Error al notificar WebSocket: {ws_error}")
-        
         return {
             "message": f"Paciente {nombre_paciente} eliminado del sistema",
             "paciente_id": paciente_id
@@ -1302,9 +1242,7 @@ async def omitir_pausa_oxigeno(
     
     session.add(cama)
     session.add(paciente)
-    session.commit()
-    
-    await manager.broadcast({
+    encolar_broadcast(session, {
         "tipo": "pausa_oxigeno_omitida",
         "paciente_id": paciente_id,
         "hospital_id": paciente.hospital_id,
@@ -1313,6 +1251,7 @@ async def omitir_pausa_oxigeno(
         "reload": True,
         "play_sound": True
     })
+    session.commit()
     
     return MessageResponse(success=True, message=mensaje)
 
@@ -1378,54 +1317,89 @@ def obtener_prioridad_paciente(
     }
 
 
-@router.post("/{paciente_id}/documento", response_model=MessageResponse)
+_SUBIDA_PDF_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
+
+
+def _liberar_documento(session: Session, nombre: str, clave_nueva: str) -> Optional[str]:
+    """
+    Libera el documento reemplazado. El contenido direccionado por hash se
+    marca para el borrado diferido (documentos_service), en la transacción
+    en curso; los documentos antiguos no se comparten y se retorna su ruta
+    para borrarla tras el commit.
+    """
+    partes = separar_nombre_documento(nombre)
+    if partes is None:
+        # Documento antiguo (<uuid>_<nombre> en UPLOAD_DIR)
+        return os.path.join(settings.UPLOAD_DIR, os.path.basename(nombre))
+    if partes[0] != clave_nueva:
+        marcar_para_borrado(session, partes[0])
+    return None
+
+
+@router.post("/{paciente_id}/documento", response_model=MessageResponse, openapi_extra=_SUBIDA_PDF_OPENAPI)
 async def subir_documento(
     paciente_id: str,
-    file: UploadFile = File(...),
+    request: Request,
     session: Session = Depends(get_session)
 ):
-    """Sube un documento adjunto para un paciente."""
+    """
+    Sube un documento adjunto para un paciente (campo multipart "file").
+
+    El cuerpo se procesa en streaming: se corta al superar MAX_UPLOAD_SIZE
+    (413) y el contenido se guarda por hash, compartido entre pacientes.
+    """
     repo = PacienteRepository(session)
     paciente = repo.obtener_por_id(paciente_id)
     
     if not paciente:
         raise HTTPException(status_code=404, detail="Paciente no encontrado")
     
-    if not file.filename.lower().endswith('.pdf'):
-        raise HTTPException(
-            status_code=400,
-            detail="Solo se permiten archivos PDF"
-        )
-    
-    filename = f"{uuid.uuid4()}_{file.filename}"
-    filepath = os.path.join(settings.UPLOAD_DIR, filename)
+    try:
+        archivo = await almacen_documentos.recibir(request)
+    except SubidaRechazada as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detalle)
     
-    with open(filepath, "wb") as f:
-        content = await file.read()
-        if len(content) > settings.MAX_UPLOAD_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail="El archivo excede el tamaño máximo permitido"
-            )
-        f.write(content)
+    # Retirar la marca de borrado del contenido antes de guardarlo, para que
+    # el barredor no lo elimine mientras esta subida lo referencia
+    try:
+        reservar_contenido(session, archivo.sha256)
+        await almacen_documentos.guardar(archivo)
+    except BaseException:
+        archivo.descartar()
+        session.rollback()
+        raise
     
-    # Eliminar documento anterior si existe
-    if paciente.documento_adjunto:
-        old_filepath = os.path.join(settings.UPLOAD_DIR, paciente.documento_adjunto)
-        if os.path.exists(old_filepath):
-            try:
-                os.remove(old_filepath)
-            except Exception as e:
-                logger.warning(f"No se pudo eliminar documento anterior: {e}")
+    filename = archivo.nombre_documento
+    anterior = paciente.documento_adjunto
     
     paciente.documento_adjunto = filename
     session.add(paciente)
+    ruta_antigua = None
+    if anterior and anterior != filename:
+        ruta_antigua = _liberar_documento(session, anterior, archivo.sha256)
     session.commit()
     
+    if ruta_antigua:
+        try:
+            await anyio.to_thread.run_sync(os.remove, ruta_antigua)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"No se pudo eliminar documento anterior: {e}")
+    
     return MessageResponse(
         success=True,
         message="Documento subido correctamente",
-        data={"filename": filename}
+        data={"filename": filename, "sha256": archivo.sha256, "tamano": archivo.tamano}
     )
 
 
@@ -1447,7 +1421,7 @@ def obtener_documento(
     return {
         "paciente_id": paciente_id,
         "filename": paciente.documento_adjunto,
-        "url": f"/uploads/{paciente.documento_adjunto}"
+        "url": f"/api/documentos/{quote(paciente.documento_adjunto)}"
     }
 
 @router.get("/{paciente_id}/estado-timers")
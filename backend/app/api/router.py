@@ -1,13 +1,15 @@
 """
 Router principal que agrupa todos los sub-routers.
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import FileResponse
 from urllib.parse import unquote
 from app.api.auth_router import router as auth_router
 
 import os
 
+from app.core.almacenamiento import almacen_documentos, separar_nombre_documento
+
 from app.api import health
 from app.api import hospitales
 from app.api import camas
@@ -17,6 +19,7 @@ from app.api import derivaciones
 from app.api import altas
 from app.api import manual
 from app.api import estadisticas
+from app.api import exportacion
 from app.api import configuracion
 from app.api import websocket
 from app.api import dev_init  # Endpoint temporal para inicialización
@@ -36,27 +39,33 @@ api_router.include_router(auth_router)
 UPLOAD_DIR = getattr(settings, 'UPLOAD_DIR', 'uploads/documentos')
 
 @api_router.get("/documentos/{filename:path}")
-async def obtener_documento(filename: str):
+async def obtener_documento(filename: str, request: Request):
     """
     Obtiene un documento PDF por su nombre de archivo.
     
     El parámetro :path permite capturar el nombre completo incluyendo caracteres especiales.
     Se decodifica la URL para manejar espacios (%20) y otros caracteres.
+
+    Los documentos direccionados por contenido (``<sha256>_<nombre>``) se
+    sirven desde el almacenamiento con ETag, caché y soporte de Range; los
+    nombres antiguos se buscan en UPLOAD_DIR.
     """
     # Decodificar el nombre del archivo (convierte %20 a espacio, etc.)
-    decoded_filename = unquote(filename)
+    decoded_filename = os.path.basename(unquote(filename))
+
+    partes = separar_nombre_documento(decoded_filename)
+    if partes is not None:
+        clave, nombre = partes
+        respuesta = await almacen_documentos.respuesta(request, clave, nombre)
+        if respuesta.status_code == 404:
+            raise HTTPException(status_code=404, detail="Documento no encontrado")
+        return respuesta
     
     # Construir la ruta del archivo
     filepath = os.path.join(UPLOAD_DIR, decoded_filename)
     
     # Verificar que el archivo existe
     if not os.path.exists(filepath):
-        # Log para debugging
-        print(f"[DEBUG] Documento no encontrado: {filepath}")
-        print(f"[DEBUG] Filename original: {filename}")
-        print(f"[DEBUG] Filename decodificado: {decoded_filename}")
-        print(f"[DEBUG] UPLOAD_DIR: {UPLOAD_DIR}")
-        
         # Intentar buscar en directorio alternativo si no se encuentra
         alt_filepath = os.path.join("uploads", decoded_filename)
         if os.path.exists(alt_filepath):
@@ -127,6 +136,12 @@ api_router.include_router(
     tags=["Estadísticas"]
 )
 
+api_router.include_router(
+    exportacion.router,
+    prefix="/exportacion",
+    tags=["Exportación"]
+)
+
 api_router.include_router(
     configuracion.router,
     prefix="/configuracion",
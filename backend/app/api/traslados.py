@@ -11,7 +11,7 @@ from sqlmodel import Session
 from app.core.database import get_session
 from app.core.auth_dependencies import get_current_user
 from app.core.rbac_service import rbac_service
-from app.core.websocket_manager import manager
+from app.core.outbox import encolar_broadcast
 from app.core.exceptions import PacienteNotFoundError, ValidationError, CamaNotFoundError
 from app.models.usuario import Usuario, PermisoEnum, RolEnum
 from app.schemas.responses import MessageResponse
@@ -48,16 +48,6 @@ async def completar_traslado(
     try:
         resultado = service.completar_traslado(paciente_id)
         
-        await manager.send_notification(
-            {
-                "tipo": "traslado_completado",
-                "paciente_id": paciente_id,
-                "cama_destino_id": resultado.cama_destino_id,
-                "reload": True,
-            },
-            notification_type="success"
-        )
-        
         return MessageResponse(
             success=True,
             message=resultado.mensaje,
@@ -98,13 +88,13 @@ async def cancelar_traslado(
     service = TrasladoService(session)
     
     try:
-        resultado = service.cancelar_traslado(paciente_id)
-        
-        await manager.broadcast({
+        # El servicio confirma la notificación junto con el cambio
+        encolar_broadcast(session, {
             "tipo": "traslado_cancelado",
             "paciente_id": paciente_id,
             "reload": True
         })
+        resultado = service.cancelar_traslado(paciente_id)
         
         return MessageResponse(success=True, message=resultado.mensaje)
         
@@ -121,13 +111,12 @@ async def cancelar_traslado_desde_origen(
     service = TrasladoService(session)
 
     try:
-        resultado = service.cancelar_traslado_desde_origen(paciente_id)
-
-        await manager.broadcast({
+        encolar_broadcast(session, {
             "tipo": "traslado_cancelado_origen",
             "paciente_id": paciente_id,
             "reload": True
         })
+        resultado = service.cancelar_traslado_desde_origen(paciente_id)
 
         return MessageResponse(success=True, message=resultado.mensaje)
 
@@ -144,13 +133,12 @@ async def cancelar_traslado_desde_destino(
     service = TrasladoService(session)
     
     try:
-        resultado = service.cancelar_traslado(paciente_id)
-        
-        await manager.broadcast({
+        encolar_broadcast(session, {
             "tipo": "traslado_cancelado_destino",
             "paciente_id": paciente_id,
             "reload": True
         })
+        resultado = service.cancelar_traslado(paciente_id)
         
         return MessageResponse(success=True, message=resultado.mensaje)
         
@@ -182,14 +170,13 @@ async def cancelar_traslado_confirmado(
     service = TrasladoService(session)
     
     try:
-        resultado = service.cancelar_traslado_confirmado(paciente_id)
-        
-        await manager.broadcast({
+        encolar_broadcast(session, {
             "tipo": "traslado_confirmado_cancelado",
             "paciente_id": paciente_id,
             "reload": True,
             "play_sound": True
         })
+        resultado = service.cancelar_traslado_confirmado(paciente_id)
         
         return MessageResponse(
             success=True, 
@@ -42,6 +42,16 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://localhost:6379/0"
     REDIS_CACHE_TTL: int = 300  # 5 minutos por defecto
     REDIS_ENABLED: bool = True  # Permitir deshabilitar en desarrollo
+    REDIS_REINTENTO_SEGUNDOS: int = 30  # Si no conecta, el arranque reintenta en segundo plano con este intervalo
+
+    # Caché de respuestas de endpoints de lectura
+    CACHE_BACKEND: str = "redis"  # redis, memoria, deshabilitado
+    CACHE_RESPUESTAS_TTL: int = 60  # segundos
+    CACHE_ESTADISTICAS_TTL: int = 120  # segundos
+    ETAG_HABILITADO: bool = True  # GET condicionales con versiones por recurso (If-None-Match -> 304)
+
+    # Topología en memoria (hospitales/servicios/salas/camas)
+    TOPOLOGIA_VERIFICAR_SEGUNDOS: int = 30  # Cada cuánto comparar versión con otros workers
     
     # ============================================
     # MULTI-TENANCY (Preparación para múltiples hospitales/redes)
@@ -86,7 +96,27 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "uploads"
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS: List[str] = [".pdf"]
+
+    # Documentos direccionados por contenido (app/core/almacenamiento.py)
+    DOCUMENTOS_BACKEND: str = "local"  # local (UPLOAD_DIR) o s3
+    DOCUMENTOS_CHUNK_BYTES: int = 64 * 1024  # lectura de descargas
+    DOCUMENTOS_BUFFER_BYTES: int = 1024 * 1024  # escritura de subidas al temporal
+    DOCUMENTOS_CACHE_MAX_AGE: int = 31536000  # segundos; el contenido no cambia
+    DOCUMENTOS_S3_BUCKET: Optional[str] = None
+    DOCUMENTOS_S3_ENDPOINT_URL: Optional[str] = None  # MinIO u otro compatible
+    DOCUMENTOS_S3_PREFIJO: str = "documentos/"
+    # Borrado diferido del contenido reemplazado (app/services/documentos_service.py)
+    DOCUMENTOS_BARRIDO_HABILITADO: bool = True
+    DOCUMENTOS_BARRIDO_INTERVALO: int = 600  # segundos entre barridos
+    DOCUMENTOS_BARRIDO_GRACIA: int = 300  # segundos que una marca espera antes de barrerse
+    DOCUMENTOS_BARRIDO_LOTE: int = 500  # marcas por barrido
     
+    # ============================================
+    # OPERACIONES MASIVAS
+    # ============================================
+    PACIENTES_LOTE_MAX: int = 500  # pacientes por petición a /pacientes/lote
+    CAMAS_LOTE_MAX: int = 2000  # camas afectadas por petición a /camas/lote
+
     # ============================================
     # PROCESOS AUTOMÁTICOS
     # ============================================
@@ -94,11 +124,62 @@ class Settings(BaseSettings):
     TIEMPO_LIMPIEZA_DEFAULT: int = 60  # segundos
     TIEMPO_ESPERA_OXIGENO_DEFAULT: int = 120  # segundos (2 minutos)
     
+    # ============================================
+    # ARRANQUE
+    # ============================================
+    # Engine/Redis y colas se preparan en segundo plano tras iniciar (ver /health/startup);
+    # sin calentamiento Redis no se conecta (get_redis() nunca conecta desde una petición)
+    ARRANQUE_CALENTAMIENTO_HABILITADO: bool = True
+    # Snapshot de las colas de prioridad (restauración rápida al reiniciar)
+    COLAS_SNAPSHOT_HABILITADO: bool = True
+    COLAS_SNAPSHOT_INTERVALO: int = 60  # segundos entre snapshots
+    COLAS_SNAPSHOT_RUTA: str = "snapshots/colas.json"  # además de Redis, si está disponible
+
+    # ============================================
+    # EVENTOS DE PACIENTES
+    # ============================================
+    EVENTOS_MODO_ASINCRONO: bool = False  # True: cola acotada en vez de la transacción del llamador
+    EVENTOS_COLA_MAX: int = 10000
+    EVENTOS_LOTE_MAX: int = 500
+    EVENTOS_FLUSH_SEGUNDOS: float = 1.0
+    EVENTOS_REINTENTO_MAX_SEGUNDOS: float = 30.0  # espera máxima entre reintentos de un lote fallido
+    EVENTOS_DETENER_ESPERA_SEGUNDOS: float = 30.0  # al detener; luego lo pendiente va a disco
+    EVENTOS_DESBORDE_DIRECTORIO: str = "eventos_desborde"  # JSONL reproducidos al iniciar
+    # Particiones mensuales de evento_paciente (solo PostgreSQL, migración 010)
+    EVENTOS_MANTENIMIENTO_HABILITADO: bool = True
+    EVENTOS_MANTENIMIENTO_INTERVALO: int = 21600  # segundos (6 horas)
+    EVENTOS_PARTICIONES_FUTURAS: int = 3  # meses creados por adelantado
+    EVENTOS_RETENCION_MESES: int = 0  # meses en la tabla principal; 0 = sin archivado
+    EVENTOS_ARCHIVO_DESTINO: str = "tabla"  # "tabla" (evento_paciente_archivo) o "parquet"
+    EVENTOS_ARCHIVO_DIRECTORIO: str = "archivo_eventos"  # destino de los .parquet
+
+    # ============================================
+    # ESTADÍSTICAS
+    # ============================================
+    # Reporte /estadisticas/avanzadas/completas
+    ESTADISTICAS_REPORTE_HILOS: int = 4  # secciones calculadas en paralelo
+    ESTADISTICAS_REPORTE_TTL: int = 30  # segundos, caché local por (dias, alcance)
+    # Exportación masiva (/exportacion, scripts/exportar_eventos.py)
+    EXPORTACION_TAMANO_LOTE: int = 5000  # filas por lote del cursor
+    # Contadores de ocupación (ocupacion_servicio)
+    OCUPACION_RECONCILIACION_HABILITADA: bool = True
+    OCUPACION_RECONCILIACION_INTERVALO: int = 300  # segundos entre reconciliaciones
+    # Series históricas de ocupación (/estadisticas/ocupacion/historica)
+    OCUPACION_HISTORICA_MAX_PUNTOS: int = 2000  # puntos por serie
+
     # ============================================
     # WEBSOCKET
     # ============================================
     WS_RECONNECT_INTERVAL: int = 3  # segundos
     WS_MAX_RECONNECT_ATTEMPTS: int = 10
+
+    # Outbox de notificaciones
+    OUTBOX_DESPACHADOR_HABILITADO: bool = True
+    OUTBOX_LOTE_MAX: int = 200
+    OUTBOX_INTERVALO_SEGUNDOS: float = 1.0  # Sondeo si no llega aviso de commit
+    OUTBOX_RETENCION_HORAS: int = 24  # Notificaciones publicadas que se conservan
+    OUTBOX_RECLAMO_SEGUNDOS: int = 60  # Tras esto otro despachador retoma un lote reclamado
+    OUTBOX_MAX_INTENTOS: int = 5  # Envíos fallidos antes de descartarla (fallido_at)
     
     # ============================================
     # LOGGING
@@ -113,7 +194,12 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 30  # 30 minutos
     JWT_REFRESH_TOKEN_EXPIRE_DAYS: int = 7     # 7 días
-    
+
+    # Caché de principales autenticados (0 = deshabilitada)
+    AUTH_CACHE_PRINCIPALES_TTL: int = 60  # Segundos
+    AUTH_CACHE_PRINCIPALES_MAX: int = 10000  # Usuarios
+    AUTH_CACHE_PRINCIPALES_VERIFICAR_SEGUNDOS: int = 5  # Cada cuánto mirar invalidaciones de otros workers
+
     # ============================================
     # SEGURIDAD
     # ============================================
@@ -127,6 +213,10 @@ class Settings(BaseSettings):
     MAX_LOGIN_ATTEMPTS: int = 5
     LOGIN_LOCKOUT_MINUTES: int = 15
 
+    # Pool de bcrypt (fuera del event loop)
+    AUTH_HASH_HILOS: int = 2
+    AUTH_HASH_PENDIENTES_MAX: int = 32  # Sobre esto, login responde 429
+
     # Rate Limiting (peticiones por minuto)
     RATE_LIMIT_ENABLED: bool = True
     RATE_LIMIT_PER_MINUTE: int = 100  # Peticiones generales
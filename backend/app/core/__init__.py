@@ -1,7 +1,7 @@
 """
 Módulo core: funcionalidades centrales del sistema.
 """
-from app.core.database import create_db_and_tables, get_session, get_session_direct, engine
+from app.core.database import create_db_and_tables, get_session, get_session_direct
 from app.core.websocket_manager import manager, ConnectionManager
 from app.core.exceptions import (
     BaseAppException,
@@ -29,4 +29,12 @@ __all__ = [
     "CamaNoDisponibleError",
     "EstadoInvalidoError",
     "HospitalNotFoundError",
-]
\ No newline at end of file
+]
+
+
+def __getattr__(nombre):
+    # `engine` se crea en el primer uso (ver app.core.database)
+    if nombre == "engine":
+        from app.core import database
+        return database.engine
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
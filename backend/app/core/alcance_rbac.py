@@ -0,0 +1,161 @@
+"""
+Alcance RBAC como predicados SQL.
+
+rbac_service decide fila por fila en Python (puede_ver_paciente), lo que
+obliga a cargar y enriquecer todas las filas para después descartar las que
+el usuario no ve. Este módulo compila las mismas reglas a expresiones
+SQLAlchemy para aplicarlas en el WHERE, antes de cargar nada:
+
+- predicado_pacientes(): reglas de puede_ver_paciente (hospital para la
+  capa 2; servicio de origen/destino para la capa 3, con los casos de
+  Urgencias, Ambulatorio y Obstetricia). El servicio de origen es el de la
+  cama actual del paciente o, sin cama, el que indica su tipo.
+- predicado_camas(): restricción por servicio del usuario en el listado de
+  camas de un hospital.
+
+Ambas retornan None cuando el usuario no tiene restricción. La
+normalización de nombres/códigos de servicio (RBACService.normalizar_servicio)
+se traduce al conjunto exacto de valores que normalizan al servicio del
+usuario, así que el resultado coincide con el filtro en Python.
+
+Uso:
+    filtro = predicado_pacientes(current_user)
+    query = select(Paciente).where(Paciente.hospital_id == hospital_id)
+    if filtro is not None:
+        query = query.where(filtro)
+"""
+from typing import Any, Optional
+
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.core.rbac_service import (
+    CODIGO_SERVICIO_MAP,
+    NOMBRE_SERVICIO_TO_CODIGO,
+    ROLES_ACCESO_GLOBAL,
+    ROLES_ACCESO_HOSPITAL,
+    ROLES_ACCESO_SERVICIO,
+    RBACService,
+    codigos_servicio,
+)
+from app.models.cama import Cama
+from app.models.enums import TipoPacienteEnum
+from app.models.paciente import Paciente
+from app.models.sala import Sala
+from app.models.servicio import Servicio
+
+
+# Valores que normalizar_servicio no resuelve con lower(): nombres y códigos cortos
+_VALORES_MAPEADOS = set(NOMBRE_SERVICIO_TO_CODIGO) | set(CODIGO_SERVICIO_MAP.values())
+
+
+# ============================================
+# SERVICIOS
+# ============================================
+
+def servicio_normalizado_es(expresion: Any, objetivo: str) -> ColumnElement:
+    """
+    Predicado SQL equivalente a ``normalizar_servicio(expresion) == objetivo``.
+
+    normalizar_servicio pasa a minúsculas todo lo que no sea un nombre o un
+    código corto conocido; los nombres y códigos cortos se comparan como
+    lista cerrada de valores.
+    """
+    normalizar = RBACService.normalizar_servicio
+    incluidos = sorted(v for v in _VALORES_MAPEADOS if normalizar(v) == objetivo)
+    excluidos = sorted(v for v in _VALORES_MAPEADOS if v.lower() == objetivo and normalizar(v) != objetivo)
+
+    por_minusculas = func.lower(expresion) == objetivo
+    if excluidos:
+        por_minusculas = and_(por_minusculas, expresion.not_in(excluidos))
+    if incluidos:
+        return or_(expresion.in_(incluidos), por_minusculas)
+    return por_minusculas
+
+
+def servicio_origen_paciente() -> ColumnElement:
+    """
+    Servicio de origen de un paciente, como en la lista de espera: el
+    nombre del servicio de su cama actual o, sin cama, "Urgencias" /
+    "Ambulatorio" según su tipo.
+    """
+    servicio_cama = (
+        select(Servicio.nombre)
+        .join(Sala, Sala.servicio_id == Servicio.id)
+        .join(Cama, Cama.sala_id == Sala.id)
+        .where(Cama.id == Paciente.cama_id)
+        .scalar_subquery()
+    )
+    return case(
+        (Paciente.cama_id.is_not(None), servicio_cama),
+        (Paciente.tipo_paciente == TipoPacienteEnum.URGENCIA, "Urgencias"),
+        (Paciente.tipo_paciente == TipoPacienteEnum.AMBULATORIO, "Ambulatorio"),
+        else_=None,
+    )
+
+
+# ============================================
+# PACIENTES
+# ============================================
+
+def predicado_pacientes(
+    user: Any,
+    origen: Optional[Any] = None,
+    destino: Optional[Any] = None,
+) -> Optional[ColumnElement]:
+    """
+    Predicado SQL con las reglas de RBACService.puede_ver_paciente.
+
+    Args:
+        user: Usuario o Principal
+        origen: Expresión del servicio de origen (por defecto servicio_origen_paciente())
+        destino: Expresión del servicio de destino (por defecto Paciente.servicio_destino)
+
+    Returns:
+        None si el usuario ve todos los pacientes
+    """
+    # Capa 1: todos los pacientes
+    if user.rol in ROLES_ACCESO_GLOBAL:
+        return None
+
+    # Capa 2: pacientes del hospital
+    if user.rol in ROLES_ACCESO_HOSPITAL:
+        if user.hospital_id:
+            return or_(Paciente.hospital_id.is_(None), Paciente.hospital_id == user.hospital_id)
+        return None
+
+    # Capa 3: por servicio de origen/destino
+    if user.rol in ROLES_ACCESO_SERVICIO:
+        if not user.servicio_id:
+            return None
+
+        servicio_usuario = getattr(user, "servicio_normalizado", None) or RBACService.normalizar_servicio(user.servicio_id)
+        origen = origen if origen is not None else servicio_origen_paciente()
+        destino = destino if destino is not None else Paciente.servicio_destino
+
+        if servicio_usuario in ("urgencias", "ambulatorio"):
+            return servicio_normalizado_es(origen, servicio_usuario)
+        return or_(
+            servicio_normalizado_es(origen, servicio_usuario),
+            servicio_normalizado_es(destino, servicio_usuario),
+        )
+
+    return None
+
+
+# ============================================
+# CAMAS
+# ============================================
+
+def predicado_camas(user: Any) -> Optional[ColumnElement]:
+    """
+    Restricción por servicio del listado de camas (consulta unida a
+    Servicio): el servicio coincide por id o por código (largo o corto).
+
+    Returns:
+        None si el usuario no tiene servicio asignado
+    """
+    if not user.servicio_id:
+        return None
+    codigos = getattr(user, "servicios", None) or codigos_servicio(user.servicio_id)
+    return or_(Servicio.id == user.servicio_id, Servicio.codigo.in_(sorted(codigos)))
@@ -0,0 +1,575 @@
+"""
+Almacenamiento de documentos adjuntos (PDF de pacientes).
+
+Las subidas se leen del cuerpo de la petición en bloques, sin cargar el
+archivo completo en memoria: cada bloque se hashea (SHA-256) y se escribe a
+un archivo temporal en un hilo, y la subida se corta apenas supera
+MAX_UPLOAD_SIZE (o antes de leer nada si Content-Length ya lo excede).
+
+El contenido se guarda direccionado por su hash, así que dos pacientes con
+el mismo PDF comparten un solo objeto. El nombre que se guarda en
+Paciente.documento_adjunto es ``<sha256>_<nombre original>``; el hash es la
+clave en el almacenamiento y el nombre solo se usa para la descarga.
+
+Backends:
+- LocalDocumentosBackend: ``UPLOAD_DIR/cas/ab/cd/<sha256>`` en disco.
+- S3DocumentosBackend: cualquier servicio compatible con S3 (AWS, MinIO...)
+  a través de un cliente con la interfaz de boto3.
+
+Como el contenido se comparte, reemplazar un documento no lo borra: se
+marca como pendiente y el barredor de app/services/documentos_service.py lo
+elimina si, al volver a contar, ningún paciente lo referencia.
+
+Las descargas (AlmacenDocumentos.respuesta) soportan Range/If-Range, ETag (el hash)
+con 304 y cabeceras de caché de contenido inmutable.
+"""
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import quote
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+
+import anyio
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from app.config import settings
+
+try:
+    import multipart
+    from multipart.multipart import parse_options_header
+except ImportError:
+    multipart = None
+    parse_options_header = None
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+logger = logging.getLogger("gestion_camas.documentos")
+
+
+# Holgura para las cabeceras multipart al comparar Content-Length con el máximo
+MARGEN_MULTIPART = 16 * 1024
+
+# Campos de formulario que no son archivo (se descartan, pero acotados)
+MAX_CAMPO_BYTES = 64 * 1024
+
+_PATRON_NOMBRE = re.compile(r"^([0-9a-f]{64})_(.+)$")
+
+
+class SubidaRechazada(Exception):
+    """La subida no es válida (tamaño, tipo o formato)."""
+
+    def __init__(self, status_code: int, detalle: str):
+        self.status_code = status_code
+        self.detalle = detalle
+        super().__init__(detalle)
+
+
+@dataclass
+class ArchivoRecibido:
+    """Archivo subido, ya escrito en un temporal y hasheado."""
+    ruta_temporal: str
+    nombre: str
+    sha256: str
+    tamano: int
+    tipo_contenido: Optional[str] = None
+
+    @property
+    def nombre_documento(self) -> str:
+        return nombre_documento(self.sha256, self.nombre)
+
+    def descartar(self) -> None:
+        try:
+            os.unlink(self.ruta_temporal)
+        except FileNotFoundError:
+            pass
+
+
+def nombre_documento(clave: str, nombre: str) -> str:
+    """Nombre que se guarda en el paciente: ``<sha256>_<nombre>``."""
+    nombre = os.path.basename(nombre.replace("\\", "/")).strip() or "documento.pdf"
+    return f"{clave}_{nombre}"
+
+
+def separar_nombre_documento(nombre: str) -> Optional[Tuple[str, str]]:
+    """
+    Retorna (clave, nombre original) de un documento direccionado por
+    contenido, o None si es un nombre antiguo (``<uuid>_<nombre>``).
+    """
+    coincidencia = _PATRON_NOMBRE.match(nombre or "")
+    if not coincidencia:
+        return None
+    return coincidencia.group(1), coincidencia.group(2)
+
+
+# ============================================
+# BACKENDS
+# ============================================
+
+class DocumentosBackend:
+    """Interfaz de un backend de almacenamiento direccionado por contenido."""
+
+    async def guardar(self, archivo: ArchivoRecibido) -> bool:
+        """Mueve el temporal al almacenamiento. Retorna False si ya existía."""
+        raise NotImplementedError
+
+    async def tamano(self, clave: str) -> Optional[int]:
+        """Tamaño en bytes, o None si no existe."""
+        raise NotImplementedError
+
+    def leer(self, clave: str, inicio: int, fin: int) -> AsyncIterator[bytes]:
+        """Bytes [inicio, fin] (inclusive) en bloques."""
+        raise NotImplementedError
+
+    async def eliminar(self, clave: str) -> None:
+        raise NotImplementedError
+
+    def ruta_local(self, clave: str) -> Optional[str]:
+        """Ruta en disco si el backend es local (permite FileResponse)."""
+        return None
+
+    def directorio_temporal(self) -> Optional[str]:
+        """Dónde crear los temporales de subida (None = el del sistema)."""
+        return None
+
+
+class LocalDocumentosBackend(DocumentosBackend):
+    """Sistema de archivos local: ``<directorio>/cas/ab/cd/<sha256>``."""
+
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        self._tmp = os.path.join(directorio, "tmp")
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, "cas", clave[:2], clave[2:4], clave)
+
+    def ruta_local(self, clave: str) -> Optional[str]:
+        return self._ruta(clave)
+
+    def directorio_temporal(self) -> Optional[str]:
+        # Mismo sistema de archivos que el destino: os.replace es atómico
+        os.makedirs(self._tmp, exist_ok=True)
+        return self._tmp
+
+    async def guardar(self, archivo: ArchivoRecibido) -> bool:
+        return await anyio.to_thread.run_sync(self._guardar, archivo)
+
+    def _guardar(self, archivo: ArchivoRecibido) -> bool:
+        destino = self._ruta(archivo.sha256)
+        if os.path.exists(destino):
+            archivo.descartar()
+            return False
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(archivo.ruta_temporal, destino)
+        return True
+
+    async def tamano(self, clave: str) -> Optional[int]:
+        try:
+            return (await anyio.to_thread.run_sync(os.stat, self._ruta(clave))).st_size
+        except FileNotFoundError:
+            return None
+
+    async def leer(self, clave: str, inicio: int, fin: int) -> AsyncIterator[bytes]:
+        bloque = settings.DOCUMENTOS_CHUNK_BYTES
+        archivo = await anyio.to_thread.run_sync(open, self._ruta(clave), "rb")
+        try:
+            await anyio.to_thread.run_sync(archivo.seek, inicio)
+            restante = fin - inicio + 1
+            while restante > 0:
+                datos = await anyio.to_thread.run_sync(archivo.read, min(bloque, restante))
+                if not datos:
+                    break
+                restante -= len(datos)
+                yield datos
+        finally:
+            await anyio.to_thread.run_sync(archivo.close)
+
+    async def eliminar(self, clave: str) -> None:
+        try:
+            await anyio.to_thread.run_sync(os.unlink, self._ruta(clave))
+        except FileNotFoundError:
+            pass
+
+
+def _es_no_encontrado(error: Exception) -> bool:
+    """Reconoce el 404 de un cliente S3 (botocore.ClientError o equivalente)."""
+    codigo = str(getattr(error, "response", {}).get("Error", {}).get("Code", ""))
+    return codigo in ("404", "NoSuchKey", "NotFound")
+
+
+class S3DocumentosBackend(DocumentosBackend):
+    """
+    Almacenamiento compatible con S3. Recibe un cliente con la interfaz de
+    boto3 (upload_file, head_object, get_object, delete_object); las
+    llamadas son bloqueantes y se hacen en hilos.
+    """
+
+    def __init__(self, cliente: Any, bucket: str, prefijo: str = ""):
+        self.cliente = cliente
+        self.bucket = bucket
+        self.prefijo = prefijo
+
+    def _key(self, clave: str) -> str:
+        return f"{self.prefijo}{clave[:2]}/{clave}"
+
+    async def guardar(self, archivo: ArchivoRecibido) -> bool:
+        try:
+            if await self.tamano(archivo.sha256) is not None:
+                return False
+            await anyio.to_thread.run_sync(lambda: self.cliente.upload_file(
+                archivo.ruta_temporal, self.bucket, self._key(archivo.sha256),
+                ExtraArgs={"ContentType": archivo.tipo_contenido or "application/pdf"},
+            ))
+            return True
+        finally:
+            archivo.descartar()
+
+    async def tamano(self, clave: str) -> Optional[int]:
+        try:
+            cabecera = await anyio.to_thread.run_sync(
+                lambda: self.cliente.head_object(Bucket=self.bucket, Key=self._key(clave))
+            )
+        except Exception as e:
+            if _es_no_encontrado(e):
+                return None
+            raise
+        return int(cabecera["ContentLength"])
+
+    async def leer(self, clave: str, inicio: int, fin: int) -> AsyncIterator[bytes]:
+        respuesta = await anyio.to_thread.run_sync(lambda: self.cliente.get_object(
+            Bucket=self.bucket, Key=self._key(clave), Range=f"bytes={inicio}-{fin}",
+        ))
+        cuerpo = respuesta["Body"]
+        try:
+            while True:
+                datos = await anyio.to_thread.run_sync(cuerpo.read, settings.DOCUMENTOS_CHUNK_BYTES)
+                if not datos:
+                    break
+                yield datos
+        finally:
+            cuerpo.close()
+
+    async def eliminar(self, clave: str) -> None:
+        await anyio.to_thread.run_sync(
+            lambda: self.cliente.delete_object(Bucket=self.bucket, Key=self._key(clave))
+        )
+
+
+# ============================================
+# RECEPCIÓN DE SUBIDAS
+# ============================================
+
+class _ReceptorMultipart:
+    """
+    Callbacks de python-multipart: el archivo del campo pedido va al
+    temporal (hash + tamaño al vuelo); el resto de los campos se descarta.
+    Las escrituras se acumulan en un búfer y se vuelcan en un hilo desde el
+    bucle de lectura, nunca dentro de los callbacks.
+    """
+
+    def __init__(self, campo: str, max_bytes: int, extensiones, directorio: Optional[str]):
+        self.campo = campo
+        self.max_bytes = max_bytes
+        self.extensiones = tuple(e.lower() for e in extensiones)
+        self.directorio = directorio
+        self.hash = hashlib.sha256()
+        self.tamano = 0
+        self.nombre: Optional[str] = None
+        self.tipo_contenido: Optional[str] = None
+        self.archivo = None
+        self.ruta: Optional[str] = None
+        self.terminado = False
+        self.pendiente = bytearray()
+        self._en_archivo = False
+        self._campo_bytes = 0
+        self._cabecera_nombre = b""
+        self._cabecera_valor = b""
+        self._cabeceras: Dict[bytes, bytes] = {}
+
+    # ---------- callbacks ----------
+
+    def on_part_begin(self) -> None:
+        self._cabeceras = {}
+        self._en_archivo = False
+        self._campo_bytes = 0
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._cabecera_nombre += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._cabecera_valor += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._cabeceras[self._cabecera_nombre.lower()] = self._cabecera_valor
+        self._cabecera_nombre = b""
+        self._cabecera_valor = b""
+
+    def on_headers_finished(self) -> None:
+        _, opciones = parse_options_header(self._cabeceras.get(b"content-disposition", b""))
+        campo = opciones.get(b"name", b"").decode("utf-8", "replace")
+        if campo != self.campo or b"filename" not in opciones or self.archivo is not None:
+            return
+        nombre = opciones[b"filename"].decode("utf-8", "replace")
+        if self.extensiones and not nombre.lower().endswith(self.extensiones):
+            raise SubidaRechazada(400, "Solo se permiten archivos PDF")
+        self.nombre = nombre
+        tipo = self._cabeceras.get(b"content-type")
+        self.tipo_contenido = tipo.decode("latin-1") if tipo else None
+        descriptor, self.ruta = tempfile.mkstemp(prefix="subida_", dir=self.directorio)
+        self.archivo = os.fdopen(descriptor, "wb")
+        self._en_archivo = True
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self._en_archivo:
+            self._campo_bytes += end - start
+            if self._campo_bytes > MAX_CAMPO_BYTES:
+                raise SubidaRechazada(400, "Campo de formulario demasiado grande")
+            return
+        self.tamano += end - start
+        if self.tamano > self.max_bytes:
+            raise SubidaRechazada(413, "El archivo excede el tamaño máximo permitido")
+        bloque = data[start:end]
+        self.hash.update(bloque)
+        self.pendiente += bloque
+
+    def on_part_end(self) -> None:
+        if self._en_archivo:
+            self._en_archivo = False
+            self.terminado = True
+
+    # ---------- ciclo ----------
+
+    async def volcar(self) -> None:
+        if self.pendiente:
+            datos, self.pendiente = bytes(self.pendiente), bytearray()
+            await anyio.to_thread.run_sync(self.archivo.write, datos)
+
+    def cerrar(self, descartar: bool) -> None:
+        if self.archivo is not None:
+            self.archivo.close()
+        if descartar and self.ruta:
+            try:
+                os.unlink(self.ruta)
+            except FileNotFoundError:
+                pass
+
+
+async def recibir_archivo(
+    request: Request,
+    campo: str = "file",
+    max_bytes: Optional[int] = None,
+    extensiones=None,
+    directorio: Optional[str] = None,
+) -> ArchivoRecibido:
+    """
+    Lee un multipart/form-data en streaming y deja el archivo del campo
+    `campo` en un temporal. Lanza SubidaRechazada si falta el archivo, la
+    extensión no está permitida o supera `max_bytes` (en ese caso deja de
+    leer el cuerpo de inmediato).
+    """
+    if multipart is None:
+        raise RuntimeError("python-multipart es necesario para recibir documentos")
+
+    max_bytes = settings.MAX_UPLOAD_SIZE if max_bytes is None else max_bytes
+    extensiones = settings.ALLOWED_EXTENSIONS if extensiones is None else extensiones
+
+    largo = request.headers.get("content-length")
+    if largo and largo.isdigit() and int(largo) > max_bytes + MARGEN_MULTIPART:
+        raise SubidaRechazada(413, "El archivo excede el tamaño máximo permitido")
+
+    tipo, parametros = parse_options_header(request.headers.get("content-type", ""))
+    if tipo != b"multipart/form-data" or b"boundary" not in parametros:
+        raise SubidaRechazada(400, "Se esperaba multipart/form-data")
+
+    receptor = _ReceptorMultipart(campo, max_bytes, extensiones, directorio)
+    parser = multipart.MultipartParser(parametros[b"boundary"], {
+        "on_part_begin": receptor.on_part_begin,
+        "on_part_data": receptor.on_part_data,
+        "on_part_end": receptor.on_part_end,
+        "on_header_field": receptor.on_header_field,
+        "on_header_value": receptor.on_header_value,
+        "on_header_end": receptor.on_header_end,
+        "on_headers_finished": receptor.on_headers_finished,
+    })
+
+    umbral = settings.DOCUMENTOS_BUFFER_BYTES
+    try:
+        async for bloque in request.stream():
+            parser.write(bloque)
+            if len(receptor.pendiente) >= umbral:
+                await receptor.volcar()
+        parser.finalize()
+        if receptor.archivo is None or not receptor.terminado:
+            raise SubidaRechazada(400, f"Falta el archivo en el campo '{campo}'")
+        await receptor.volcar()
+    except BaseException:
+        receptor.cerrar(descartar=True)
+        raise
+    receptor.cerrar(descartar=False)
+
+    return ArchivoRecibido(
+        ruta_temporal=receptor.ruta,
+        nombre=receptor.nombre,
+        sha256=receptor.hash.hexdigest(),
+        tamano=receptor.tamano,
+        tipo_contenido=receptor.tipo_contenido,
+    )
+
+
+# ============================================
+# DESCARGAS
+# ============================================
+
+def _rango_solicitado(valor: Optional[str], tamano: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta ``Range: bytes=a-b`` (un solo rango). Retorna None si no hay
+    rango utilizable (se responde completo) y lanza ValueError si el rango
+    no es satisfacible.
+    """
+    if not valor or not valor.startswith("bytes=") or "," in valor:
+        return None
+    inicio_txt, separador, fin_txt = valor[6:].strip().partition("-")
+    if not separador or not all(t == "" or t.isdigit() for t in (inicio_txt, fin_txt)):
+        return None
+
+    if not inicio_txt:
+        if not fin_txt:
+            return None
+        sufijo = int(fin_txt)
+        if sufijo == 0:
+            raise ValueError(valor)
+        return max(0, tamano - sufijo), tamano - 1
+
+    inicio = int(inicio_txt)
+    fin = int(fin_txt) if fin_txt else tamano - 1
+    if fin_txt and fin < inicio:
+        return None
+    if inicio >= tamano:
+        raise ValueError(valor)
+    return inicio, min(fin, tamano - 1)
+
+
+class AlmacenDocumentos:
+    """Punto de entrada: backend configurable + métricas."""
+
+    def __init__(self, backend: Optional[DocumentosBackend] = None):
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._contadores = {"subidas": 0, "deduplicadas": 0, "rechazadas": 0, "bytes_recibidos": 0,
+                            "descargas": 0, "parciales": 0, "no_modificadas": 0}
+
+    # ---------- backend ----------
+
+    @property
+    def backend(self) -> DocumentosBackend:
+        if self._backend is None:
+            self._backend = self._crear_backend_por_defecto()
+        return self._backend
+
+    def configurar_backend(self, backend: DocumentosBackend) -> None:
+        """Reemplaza el backend (usado en tests)."""
+        self._backend = backend
+
+    @staticmethod
+    def _crear_backend_por_defecto() -> DocumentosBackend:
+        if settings.DOCUMENTOS_BACKEND == "s3":
+            if boto3 is None:
+                raise RuntimeError("DOCUMENTOS_BACKEND=s3 requiere boto3")
+            cliente = boto3.client("s3", endpoint_url=settings.DOCUMENTOS_S3_ENDPOINT_URL)
+            return S3DocumentosBackend(cliente, settings.DOCUMENTOS_S3_BUCKET, settings.DOCUMENTOS_S3_PREFIJO)
+        return LocalDocumentosBackend(settings.UPLOAD_DIR)
+
+    def _contar(self, campo: str, cantidad: int = 1) -> None:
+        with self._lock:
+            self._contadores[campo] += cantidad
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": type(self.backend).__name__, **self._contadores}
+
+    # ---------- operaciones ----------
+
+    async def recibir(self, request: Request, campo: str = "file") -> ArchivoRecibido:
+        """Recibe la subida en streaming y la deja en un temporal (ver guardar)."""
+        try:
+            return await recibir_archivo(request, campo, directorio=self.backend.directorio_temporal())
+        except SubidaRechazada:
+            self._contar("rechazadas")
+            raise
+
+    async def guardar(self, archivo: ArchivoRecibido) -> bool:
+        """
+        Guarda un archivo recibido (deduplicando). Retorna False si el
+        contenido ya existía. Quien referencia el contenido debe reservarlo
+        antes (documentos_service.reservar_contenido) para que el barredor
+        de documentos no lo borre en paralelo.
+        """
+        nuevo = await self.backend.guardar(archivo)
+        self._contar("subidas")
+        self._contar("bytes_recibidos", archivo.tamano)
+        if not nuevo:
+            self._contar("deduplicadas")
+        return nuevo
+
+    async def eliminar(self, clave: str) -> None:
+        await self.backend.eliminar(clave)
+
+    async def respuesta(self, request: Request, clave: str, nombre: str) -> Response:
+        """Respuesta de descarga con ETag, caché y soporte de Range."""
+        tamano = await self.backend.tamano(clave)
+        if tamano is None:
+            return Response(status_code=404)
+
+        etag = f'"{clave}"'
+        cabeceras = {
+            "ETag": etag,
+            "Cache-Control": f"private, max-age={settings.DOCUMENTOS_CACHE_MAX_AGE}, immutable",
+            "Accept-Ranges": "bytes",
+            "Content-Disposition": f"inline; filename*=UTF-8''{quote(nombre)}",
+        }
+
+        si_no_coincide = request.headers.get("if-none-match")
+        if si_no_coincide and (si_no_coincide.strip() == "*" or etag in si_no_coincide):
+            self._contar("no_modificadas")
+            return Response(status_code=304, headers=cabeceras)
+
+        rango = None
+        si_rango = request.headers.get("if-range")
+        if not si_rango or si_rango.strip() == etag:
+            try:
+                rango = _rango_solicitado(request.headers.get("range"), tamano)
+            except ValueError:
+                return Response(status_code=416, headers={**cabeceras, "Content-Range": f"bytes */{tamano}"})
+
+        self._contar("descargas")
+        if rango is None:
+            ruta = self.backend.ruta_local(clave)
+            if ruta is not None:
+                return FileResponse(ruta, media_type="application/pdf", headers=cabeceras)
+            if tamano == 0:
+                return Response(content=b"", media_type="application/pdf", headers=cabeceras)
+            return StreamingResponse(
+                self.backend.leer(clave, 0, tamano - 1), media_type="application/pdf",
+                headers={**cabeceras, "Content-Length": str(tamano)},
+            )
+
+        inicio, fin = rango
+        self._contar("parciales")
+        return StreamingResponse(
+            self.backend.leer(clave, inicio, fin), status_code=206, media_type="application/pdf",
+            headers={
+                **cabeceras,
+                "Content-Range": f"bytes {inicio}-{fin}/{tamano}",
+                "Content-Length": str(fin - inicio + 1),
+            },
+        )
+
+
+almacen_documentos = AlmacenDocumentos()
@@ -0,0 +1,176 @@
+"""
+Calentamiento de arranque.
+
+El lifespan ya no bloquea el inicio del servidor con trabajo costoso: los
+recursos (engine, Redis) se crean perezosamente en el primer uso y este
+módulo los prepara en segundo plano, junto con la restauración de las
+colas de prioridad (app/services/snapshot_colas.py).
+
+Fases: "iniciando" -> "calentando" -> "listo" (o "degradado" si algún paso
+falló; la app sigue funcionando y el engine se reintenta en su primer uso).
+/health/startup y /health/readiness exponen este estado.
+
+Redis es la excepción: conectarlo bloquea hasta 5 s, así que nunca se hace
+desde una petición. Tras el calentamiento, mientras Redis no esté
+conectado, esta misma tarea lo reintenta cada REDIS_REINTENTO_SEGUNDOS, y
+con Redis conectado activa el caché de respuestas si había quedado
+deshabilitado (ResponseCache.verificar_redis).
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+
+from app.config import settings
+
+logger = logging.getLogger("gestion_camas.arranque")
+
+
+def _preparar_base_datos() -> None:
+    from app.core.database import get_session_direct
+    session = get_session_direct()
+    try:
+        session.execute(text("SELECT 1"))
+    finally:
+        session.close()
+
+
+def _preparar_redis() -> None:
+    from app.core.database import conectar_redis
+    if settings.REDIS_ENABLED and conectar_redis() is None:
+        raise RuntimeError("Redis no disponible")
+
+
+def _activar_cache_redis() -> None:
+    from app.core.cache import response_cache
+    response_cache.verificar_redis()
+
+
+def _restaurar_colas() -> None:
+    from app.services.snapshot_colas import snapshot_colas
+    snapshot_colas.restaurar()
+
+
+PASOS_POR_DEFECTO: List[Tuple[str, Callable[[], None]]] = [
+    ("base_datos", _preparar_base_datos),
+    ("redis", _preparar_redis),
+    ("colas", _restaurar_colas),
+]
+
+
+class EstadoArranque:
+    """Ejecuta los pasos de calentamiento y registra su resultado."""
+
+    def __init__(
+        self,
+        pasos: Optional[List[Tuple[str, Callable[[], None]]]] = None,
+        intervalo_reintento: Optional[float] = None,
+    ):
+        self._pasos = pasos if pasos is not None else PASOS_POR_DEFECTO
+        self.intervalo_reintento = intervalo_reintento or settings.REDIS_REINTENTO_SEGUNDOS
+        self.reconexiones_redis = 0
+        self.fase = "iniciando"
+        self.inicio: Optional[datetime] = None
+        self.fin: Optional[datetime] = None
+        self.componentes: Dict[str, Dict[str, Any]] = {}
+        self._tarea: Optional[asyncio.Task] = None
+
+    @property
+    def iniciado(self) -> bool:
+        """True cuando terminó el calentamiento (con o sin errores)."""
+        return self.fase in ("listo", "degradado")
+
+    async def calentar(self) -> None:
+        """Ejecuta los pasos en orden, cada uno en un hilo."""
+        self.fase = "calentando"
+        self.inicio = datetime.utcnow()
+        degradado = False
+        for nombre, paso in self._pasos:
+            comienzo = time.perf_counter()
+            try:
+                await asyncio.to_thread(paso)
+                self.componentes[nombre] = {"estado": "listo"}
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                degradado = True
+                self.componentes[nombre] = {"estado": "error", "error": str(e)}
+                logger.warning(f"⚠️  Calentamiento de {nombre} falló: {e}")
+            self.componentes[nombre]["duracion_ms"] = round((time.perf_counter() - comienzo) * 1000, 2)
+        self.fin = datetime.utcnow()
+        self.fase = "degradado" if degradado else "listo"
+        logger.info(f"Calentamiento terminado ({self.fase}) en {(self.fin - self.inicio).total_seconds():.2f} s")
+
+    async def reintentar_redis(self) -> bool:
+        """Un intento de conexión a Redis (en un hilo). True si quedó conectado."""
+        from app.core.database import conectar_redis, get_redis
+        if not settings.REDIS_ENABLED or get_redis() is not None:
+            return get_redis() is not None
+        cliente = await asyncio.to_thread(conectar_redis)
+        if cliente is None:
+            return False
+        self.reconexiones_redis += 1
+        self.componentes["redis"] = {"estado": "listo", "reconectado": datetime.utcnow().isoformat()}
+        if self.fase == "degradado" and all(c["estado"] == "listo" for c in self.componentes.values()):
+            self.fase = "listo"
+        logger.info("Redis disponible tras reintento")
+        return True
+
+    async def _vigilar_redis(self) -> None:
+        from app.core.database import get_redis
+        while settings.REDIS_ENABLED:
+            try:
+                if get_redis() is not None:
+                    # El caché de respuestas pudo resolverse antes de que Redis conectara
+                    await asyncio.to_thread(_activar_cache_redis)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️  No se pudo activar el caché en Redis: {e}")
+            await asyncio.sleep(self.intervalo_reintento)
+            if get_redis() is not None:
+                continue
+            try:
+                await self.reintentar_redis()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️  Reintento de Redis falló: {e}")
+
+    async def _ejecutar(self) -> None:
+        await self.calentar()
+        await self._vigilar_redis()
+
+    async def iniciar(self) -> None:
+        """Lanza el calentamiento en segundo plano (o lo salta si está deshabilitado)."""
+        if not settings.ARRANQUE_CALENTAMIENTO_HABILITADO:
+            self.fase = "listo"
+            return
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self._ejecutar())
+
+    async def detener(self) -> None:
+        if self._tarea is None:
+            return
+        if not self._tarea.done():
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+        self._tarea = None
+
+    def resumen(self) -> Dict[str, Any]:
+        return {
+            "fase": self.fase,
+            "inicio": self.inicio.isoformat() if self.inicio else None,
+            "fin": self.fin.isoformat() if self.fin else None,
+            "componentes": self.componentes,
+            "reconexiones_redis": self.reconexiones_redis,
+        }
+
+
+estado_arranque = EstadoArranque()
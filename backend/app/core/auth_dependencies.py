@@ -1,6 +1,11 @@
 """
 Dependencies de autenticación para FastAPI.
 Provee decoradores y dependencies para proteger endpoints.
+
+get_current_user retorna un Principal (app.core.principal) desde la caché
+de principales: en el camino común no hay consulta a la base de datos.
+Los endpoints que necesitan la fila completa del usuario usan
+get_current_usuario.
 """
 from typing import List, Optional, Callable
 from functools import wraps
@@ -10,7 +15,9 @@ from sqlmodel import Session
 
 from app.core.database import get_session
 from app.models.usuario import Usuario, PermisoEnum, RolEnum
+from app.schemas.auth_schemas import TokenPayload
 from app.services.auth_service import auth_service
+from app.core.principal import Principal, cache_principales
 from app.core.rbac_service import rbac_service
 
 
@@ -34,10 +41,26 @@ class PermissionError(HTTPException):
 # DEPENDENCIES BÁSICAS
 # ============================================
 
+def _resolver_principal(payload: TokenPayload, session: Session) -> Optional[Principal]:
+    """Principal del `sub` del token: desde la caché o, si no está, desde la BD."""
+    principal = cache_principales.obtener(payload.sub)
+    if principal is not None:
+        return principal
+
+    user = auth_service.get_user_by_id(payload.sub, session)
+    if not user:
+        return None
+    principal = Principal.desde_usuario(user)
+    # Solo se cachean usuarios activos: un desactivado se vuelve a consultar
+    if principal.is_active:
+        cache_principales.guardar(principal)
+    return principal
+
+
 async def get_current_user_optional(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     session: Session = Depends(get_session)
-) -> Optional[Usuario]:
+) -> Optional[Principal]:
     """
     Obtiene el usuario actual si está autenticado.
     No lanza error si no hay token (para endpoints públicos con contenido extra para autenticados).
@@ -51,18 +74,18 @@ async def get_current_user_optional(
     if not payload or payload.type != "access":
         return None
     
-    user = auth_service.get_user_by_id(payload.sub, session)
+    principal = _resolver_principal(payload, session)
     
-    if not user or not user.is_active:
+    if not principal or not principal.is_active:
         return None
     
-    return user
+    return principal
 
 
 async def get_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     session: Session = Depends(get_session)
-) -> Usuario:
+) -> Principal:
     """
     Obtiene el usuario actual autenticado.
     Lanza error 401 si no está autenticado.
@@ -79,12 +102,28 @@ async def get_current_user(
     if payload.type != "access":
         raise AuthError("Tipo de token inválido")
     
-    user = auth_service.get_user_by_id(payload.sub, session)
+    principal = _resolver_principal(payload, session)
     
-    if not user:
+    if not principal:
         raise AuthError("Usuario no encontrado")
     
-    if not user.is_active:
+    if not principal.is_active:
+        raise AuthError("Usuario desactivado")
+    
+    return principal
+
+
+async def get_current_usuario(
+    current_user: Principal = Depends(get_current_user),
+    session: Session = Depends(get_session)
+) -> Usuario:
+    """
+    Fila completa del usuario autenticado (perfil, cambio de contraseña).
+    Consulta la BD en cada request.
+    """
+    user = auth_service.get_user_by_id(current_user.id, session)
+    
+    if not user or not user.is_active:
         raise AuthError("Usuario desactivado")
     
     return user
@@ -217,7 +256,7 @@ def protected(
             
             if not user:
                 for arg in args:
-                    if isinstance(arg, Usuario):
+                    if isinstance(arg, (Usuario, Principal)):
                         user = arg
                         break
             
@@ -17,7 +17,7 @@ from sqlmodel import Session, select
 
 from app.config import settings
 from app.core.database import get_session_direct
-from app.core.websocket_manager import manager
+from app.core.outbox import encolar_broadcast
 from app.models.enums import EstadoCamaEnum
 from app.models.cama import Cama
 from app.models.paciente import Paciente
@@ -135,15 +135,14 @@ async def procesar_camas_en_limpieza(
                 logger.info(f"Cama {cama.identificador} liberada tras limpieza")
     
     if camas_liberadas:
-        session.commit()
-        
-        # Notificar CON reload: true para que el frontend recargue
-        await manager.broadcast({
+        # Notificar en la misma transacción CON reload: true para que el frontend recargue
+        encolar_broadcast(session, {
             "tipo": "limpieza_completada",
             "cama_ids": camas_liberadas,
             "reload": True,
             "mensaje": f"{len(camas_liberadas)} cama(s) liberada(s) tras limpieza"
         })
+        session.commit()
     
     return camas_liberadas
 
@@ -290,16 +289,15 @@ async def procesar_pacientes_espera_oxigeno(
         pacientes_procesados.append(paciente.id)
     
     if pacientes_procesados:
-        session.commit()
-        
-        # Broadcast con reload: true para que frontend se actualice
-        await manager.broadcast({
+        # Broadcast (misma transacción) con reload: true para que frontend se actualice
+        encolar_broadcast(session, {
             "tipo": "evaluacion_oxigeno_completada",
             "paciente_ids": pacientes_procesados,
             "reload": True,
             "play_sound": True,
             "mensaje": f"{len(pacientes_procesados)} paciente(s) procesado(s) tras evaluación de oxígeno"
         })
+        session.commit()
     
     return pacientes_procesados
 
@@ -515,11 +513,9 @@ async def procesar_timers_monitorizacion_observacion(session: Session) -> dict:
     total_procesados = len(timers_completados['observacion']) + len(timers_completados['monitorizacion'])
     
     if total_procesados > 0:
-        session.commit()
-        
         # Notificación de observación completada
         for item in timers_completados['observacion']:
-            await manager.broadcast({
+            encolar_broadcast(session, {
                 "tipo": "timer_observacion_completado",
                 "paciente_id": item['paciente_id'],
                 "paciente_nombre": item['nombre'],
@@ -532,7 +528,7 @@ async def procesar_timers_monitorizacion_observacion(session: Session) -> dict:
         
         # Notificación de monitorización completada
         for item in timers_completados['monitorizacion']:
-            await manager.broadcast({
+            encolar_broadcast(session, {
                 "tipo": "timer_monitorizacion_completado",
                 "paciente_id": item['paciente_id'],
                 "paciente_nombre": item['nombre'],
@@ -543,6 +539,8 @@ async def procesar_timers_monitorizacion_observacion(session: Session) -> dict:
                 "mensaje": f"Tiempo de monitorización completado para {item['nombre']}"
             })
         
+        session.commit()
+        
         logger.info(
             f"Timers procesados: {len(timers_completados['observacion'])} observación, "
             f"{len(timers_completados['monitorizacion'])} monitorización"
@@ -567,22 +565,13 @@ async def ejecutar_asignacion_automatica_todas(session: Session) -> None:
             service = AsignacionService(session)
             asignaciones = await service.ejecutar_asignacion_automatica(hospital.id)
             
-            if asignaciones:
-                exitosas = [a for a in asignaciones if a.exito]
-                if exitosas:
-                    logger.info(
-                        f"Hospital {hospital.nombre}: {len(exitosas)} asignaciones automáticas"
-                    )
-                    
-                    # Broadcast con reload: true para que frontend se actualice
-                    await manager.broadcast({
-                        "tipo": "asignacion_automatica",
-                        "hospital_id": hospital.id,
-                        "cantidad": len(exitosas),
-                        "reload": True,
-                        "play_sound": True,
-                        "mensaje": f"{len(exitosas)} asignación(es) automática(s) completada(s)"
-                    })
+            # Cada asignación encola su propia notificación (con reload y
+            # sonido) en su transacción; aquí solo se registra el resumen
+            exitosas = [a for a in asignaciones if a.exito]
+            if exitosas:
+                logger.info(
+                    f"Hospital {hospital.nombre}: {len(exitosas)} asignaciones automáticas"
+                )
                 
         except Exception as e:
             logger.error(f"Error en asignación automática para {hospital.nombre}: {e}")
\ No newline at end of file
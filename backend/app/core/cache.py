@@ -0,0 +1,646 @@
+"""
+Caché de respuestas con invalidación por tags.
+
+Cada respuesta cacheada se guarda bajo una clave derivada de la ruta, los
+parámetros del endpoint y el alcance RBAC del usuario, y se asocia a uno o
+más tags de entidad (``hospital:<id>``, ``servicio:<id>``, ``cama:<id>``...).
+Cuando una entidad cambia se invalidan todas las respuestas con su tag, sin
+recorrer el keyspace con ``KEYS``.
+
+Backends:
+- RedisCacheBackend: producción. Cada tag es un SET de Redis con las claves
+  que lo referencian; la invalidación usa SSCAN/SCAN.
+- MemoryCacheBackend: pruebas y desarrollo sin Redis (un solo proceso).
+
+La invalidación es dirigida por eventos de la sesión ORM: al confirmar una
+transacción que modificó camas, pacientes, hospitales, servicios, salas,
+eventos o configuración, se invalidan los tags correspondientes y se
+incrementan sus versiones (ETag, ver app/core/versiones.py).
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+from functools import wraps
+import asyncio
+import fnmatch
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, inspect as sa_inspect, select as sa_select
+from sqlalchemy.orm import Session as OrmSession
+
+from app.config import settings
+
+logger = logging.getLogger("gestion_camas.cache")
+
+
+PREFIJO_CLAVE = "cache:resp"
+PREFIJO_TAG = "cache:tag"
+
+# Tags globales
+TAG_HOSPITALES = "hospitales"
+TAG_ESTADISTICAS = "estadisticas"
+TAG_CONFIGURACION = "configuracion"
+# Nombres e identificadores de hospitales, servicios, salas y camas
+TAG_ESTRUCTURA = "estructura"
+
+
+def tag_hospital(hospital_id: str) -> str:
+    return f"hospital:{hospital_id}"
+
+
+def tag_servicio(servicio_id: str) -> str:
+    return f"servicio:{servicio_id}"
+
+
+def tag_cama(cama_id: str) -> str:
+    return f"cama:{cama_id}"
+
+
+def tag_paciente(paciente_id: str) -> str:
+    return f"paciente:{paciente_id}"
+
+
+def tag_pacientes_hospital(hospital_id: str) -> str:
+    """Pacientes de un hospital o derivados hacia él (lista de espera, derivaciones)."""
+    return f"pacientes:{hospital_id}"
+
+
+def tags_hospitales_en_respuesta(params: Dict[str, Any], resultado: Any) -> List[str]:
+    """Tags de cada hospital incluido en una respuesta tipo lista."""
+    tags = [TAG_HOSPITALES]
+    for item in resultado or []:
+        hospital_id = getattr(item, "id", None) or getattr(item, "hospital_id", None)
+        if hospital_id:
+            tags.append(tag_hospital(hospital_id))
+    return tags
+
+
+# ============================================
+# BACKENDS
+# ============================================
+
+class CacheBackend:
+    """Interfaz mínima de un backend de caché con tags."""
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: int, tags: Iterable[str] = ()) -> None:
+        raise NotImplementedError
+
+    def invalidar_tags(self, tags: Iterable[str]) -> int:
+        raise NotImplementedError
+
+    def invalidar_patron(self, patron: str) -> int:
+        raise NotImplementedError
+
+    def limpiar(self) -> None:
+        raise NotImplementedError
+
+
+class NullCacheBackend(CacheBackend):
+    """Backend que no guarda nada (caché deshabilitado)."""
+
+    def get(self, key: str) -> Optional[str]:
+        return None
+
+    def set(self, key: str, value: str, ttl: int, tags: Iterable[str] = ()) -> None:
+        return None
+
+    def invalidar_tags(self, tags: Iterable[str]) -> int:
+        return 0
+
+    def invalidar_patron(self, patron: str) -> int:
+        return 0
+
+    def limpiar(self) -> None:
+        return None
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Backend en memoria del proceso.
+
+    Pensado para pruebas y desarrollo local: no se comparte entre workers.
+    """
+
+    def __init__(self):
+        self._datos: Dict[str, tuple] = {}
+        self._tags: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entrada = self._datos.get(key)
+            if entrada is None:
+                return None
+            valor, expira = entrada
+            if expira < time.monotonic():
+                del self._datos[key]
+                return None
+            return valor
+
+    def set(self, key: str, value: str, ttl: int, tags: Iterable[str] = ()) -> None:
+        with self._lock:
+            self._datos[key] = (value, time.monotonic() + ttl)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+    def invalidar_tags(self, tags: Iterable[str]) -> int:
+        eliminadas = 0
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, set()):
+                    if self._datos.pop(key, None) is not None:
+                        eliminadas += 1
+        return eliminadas
+
+    def invalidar_patron(self, patron: str) -> int:
+        with self._lock:
+            claves = [k for k in self._datos if fnmatch.fnmatchcase(k, patron)]
+            for key in claves:
+                del self._datos[key]
+        return len(claves)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._datos.clear()
+            self._tags.clear()
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Backend sobre Redis.
+
+    Cada tag se guarda como un SET ``cache:tag:<tag>`` con las claves que lo
+    referencian. El SET expira un poco después que sus miembros para no dejar
+    basura si nunca se invalida.
+    """
+
+    MARGEN_TTL_TAG = 60
+    LOTE_ELIMINACION = 500
+
+    def __init__(self, client):
+        self.client = client
+
+    def _clave_tag(self, tag: str) -> str:
+        return f"{PREFIJO_TAG}:{tag}"
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            return self.client.get(key)
+        except Exception as e:
+            logger.warning(f"⚠️  Error al leer caché {key}: {e}")
+            return None
+
+    def set(self, key: str, value: str, ttl: int, tags: Iterable[str] = ()) -> None:
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.setex(key, ttl, value)
+            for tag in tags:
+                clave_tag = self._clave_tag(tag)
+                pipe.sadd(clave_tag, key)
+                pipe.expire(clave_tag, ttl + self.MARGEN_TTL_TAG)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️  Error al guardar caché {key}: {e}")
+
+    def _eliminar_en_lotes(self, claves: Iterable[str]) -> int:
+        eliminadas = 0
+        lote: List[str] = []
+        for clave in claves:
+            lote.append(clave)
+            if len(lote) >= self.LOTE_ELIMINACION:
+                eliminadas += self.client.unlink(*lote)
+                lote = []
+        if lote:
+            eliminadas += self.client.unlink(*lote)
+        return eliminadas
+
+    def invalidar_tags(self, tags: Iterable[str]) -> int:
+        eliminadas = 0
+        try:
+            for tag in tags:
+                clave_tag = self._clave_tag(tag)
+                miembros = list(self.client.sscan_iter(clave_tag, count=self.LOTE_ELIMINACION))
+                eliminadas += self._eliminar_en_lotes(miembros)
+                self.client.unlink(clave_tag)
+        except Exception as e:
+            logger.warning(f"⚠️  Error al invalidar tags {list(tags)}: {e}")
+        return eliminadas
+
+    def invalidar_patron(self, patron: str) -> int:
+        try:
+            return self._eliminar_en_lotes(
+                self.client.scan_iter(match=patron, count=self.LOTE_ELIMINACION)
+            )
+        except Exception as e:
+            logger.warning(f"⚠️  Error al invalidar patrón {patron}: {e}")
+            return 0
+
+    def limpiar(self) -> None:
+        self.invalidar_patron(f"{PREFIJO_CLAVE}:*")
+        self.invalidar_patron(f"{PREFIJO_TAG}:*")
+
+
+# ============================================
+# CACHÉ DE RESPUESTAS
+# ============================================
+
+class ResponseCache:
+    """
+    Caché de respuestas de endpoints con contadores de aciertos/fallos.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        self._backend: Optional[CacheBackend] = backend
+        self._lock = threading.Lock()
+        self._contadores: Dict[str, Dict[str, int]] = {}
+        # True si el backend por defecto quedó deshabilitado a la espera de Redis
+        self._esperando_redis = False
+
+    # ---------- backend ----------
+
+    @property
+    def backend(self) -> CacheBackend:
+        if self._backend is None:
+            self._backend = self._crear_backend_por_defecto()
+        return self._backend
+
+    def configurar_backend(self, backend: CacheBackend) -> None:
+        """Reemplaza el backend (usado en tests y al iniciar la app)."""
+        self._backend = backend
+        self._esperando_redis = False
+        self.reiniciar_contadores()
+
+    def _crear_backend_por_defecto(self) -> CacheBackend:
+        tipo = settings.CACHE_BACKEND
+        if tipo == "memoria":
+            return MemoryCacheBackend()
+        if tipo == "redis":
+            from app.core.database import get_redis
+            client = get_redis()
+            if client is not None:
+                return RedisCacheBackend(client)
+            self._esperando_redis = True
+            logger.info("ℹ️  Redis no disponible, caché de respuestas deshabilitado hasta que conecte")
+        return NullCacheBackend()
+
+    def verificar_redis(self) -> bool:
+        """
+        Activa RedisCacheBackend si el backend por defecto quedó deshabilitado
+        por falta de Redis y Redis ya está conectado. No conecta: la tarea de
+        arranque (app/core/arranque.py) lo llama periódicamente.
+
+        Las invalidaciones de este proceso mientras no había Redis se
+        perdieron, así que se descartan las respuestas cacheadas.
+        """
+        if not self._esperando_redis:
+            return False
+        from app.core.database import get_redis
+        client = get_redis()
+        if client is None:
+            return False
+        backend = RedisCacheBackend(client)
+        backend.limpiar()
+        with self._lock:
+            if not self._esperando_redis:
+                return False
+            self._backend = backend
+            self._esperando_redis = False
+        logger.info("Caché de respuestas habilitado en Redis")
+        return True
+
+    @property
+    def habilitado(self) -> bool:
+        return not isinstance(self.backend, NullCacheBackend)
+
+    # ---------- contadores ----------
+
+    def _contar(self, prefijo: str, campo: str) -> None:
+        with self._lock:
+            contador = self._contadores.setdefault(prefijo, {"hits": 0, "misses": 0})
+            contador[campo] += 1
+
+    def reiniciar_contadores(self) -> None:
+        with self._lock:
+            self._contadores = {}
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Retorna hits/misses totales y por endpoint."""
+        with self._lock:
+            por_endpoint = {k: dict(v) for k, v in self._contadores.items()}
+        hits = sum(v["hits"] for v in por_endpoint.values())
+        misses = sum(v["misses"] for v in por_endpoint.values())
+        total = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "por_endpoint": por_endpoint,
+        }
+
+    # ---------- operaciones ----------
+
+    def obtener(self, prefijo: str, key: str) -> Optional[Any]:
+        valor = self.backend.get(key)
+        if valor is None:
+            self._contar(prefijo, "misses")
+            return None
+        self._contar(prefijo, "hits")
+        return json.loads(valor)
+
+    def guardar(self, key: str, valor: Any, ttl: int, tags: Iterable[str]) -> None:
+        self.backend.set(key, json.dumps(jsonable_encoder(valor)), ttl, list(tags))
+
+    def invalidar_tags(self, *tags: str) -> int:
+        tags_validos = [t for t in tags if t]
+        if not tags_validos:
+            return 0
+        eliminadas = self.backend.invalidar_tags(tags_validos)
+        if eliminadas:
+            logger.debug(f"🧹 Caché invalidado ({eliminadas} claves) para tags {tags_validos}")
+        return eliminadas
+
+    def limpiar(self) -> None:
+        self.backend.limpiar()
+
+
+response_cache = ResponseCache()
+
+
+def invalidar_tags(*tags: str) -> int:
+    """Invalida todas las respuestas cacheadas asociadas a los tags."""
+    return response_cache.invalidar_tags(*tags)
+
+
+# ============================================
+# DECORADOR
+# ============================================
+
+def _alcance_rbac(usuario: Any) -> str:
+    """Alcance RBAC del usuario: usuarios con el mismo alcance comparten caché."""
+    if usuario is None:
+        return "publico"
+    rol = getattr(usuario, "rol", None)
+    rol = getattr(rol, "value", rol)
+    return f"{rol}|{getattr(usuario, 'hospital_id', None)}|{getattr(usuario, 'servicio_id', None)}"
+
+
+def _construir_clave(prefijo: str, params: Dict[str, Any], alcance: str) -> str:
+    payload = json.dumps(
+        {"p": jsonable_encoder(params), "s": alcance},
+        sort_keys=True,
+        default=str,
+    )
+    digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    return f"{PREFIJO_CLAVE}:{prefijo}:{digest}"
+
+
+def cachear_respuesta(
+    prefijo: str,
+    tags: Iterable[str] = (),
+    ttl: Optional[int] = None,
+    parametro_usuario: str = "current_user",
+) -> Callable:
+    """
+    Decorador de endpoints de lectura.
+
+    La clave se forma con ``prefijo`` + parámetros del endpoint + alcance RBAC
+    del usuario (rol, hospital, servicio). Los parámetros ``session`` y el
+    usuario no forman parte de la clave.
+
+    Args:
+        prefijo: Nombre lógico de la ruta (ej: "hospitales:lista")
+        tags: Plantillas de tags; se formatean con los parámetros del
+              endpoint (ej: "hospital:{hospital_id}"). También se aceptan
+              funciones ``(params, resultado) -> tags`` para tags que
+              dependen de la respuesta.
+        ttl: Tiempo de vida en segundos (None = CACHE_RESPUESTAS_TTL)
+        parametro_usuario: Nombre del parámetro con el usuario autenticado
+
+    Uso:
+        @router.get("/{hospital_id}/servicios")
+        @cachear_respuesta("hospitales:servicios", tags=["hospital:{hospital_id}"])
+        def obtener_servicios(hospital_id: str, ...):
+            ...
+    """
+    plantillas = list(tags)
+    excluidos = {"session", parametro_usuario}
+
+    def _preparar(kwargs: Dict[str, Any]):
+        params = {k: v for k, v in kwargs.items() if k not in excluidos}
+        alcance = _alcance_rbac(kwargs.get(parametro_usuario))
+        return params, _construir_clave(prefijo, params, alcance)
+
+    def _resolver_tags(params: Dict[str, Any], resultado: Any) -> List[str]:
+        resueltos: List[str] = []
+        for plantilla in plantillas:
+            if callable(plantilla):
+                resueltos.extend(plantilla(params, resultado))
+            else:
+                resueltos.append(plantilla.format(**params))
+        return resueltos
+
+    def decorador(func: Callable) -> Callable:
+        ttl_efectivo = ttl if ttl is not None else settings.CACHE_RESPUESTAS_TTL
+
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper_async(*args, **kwargs):
+                if not response_cache.habilitado:
+                    return await func(*args, **kwargs)
+                params, key = _preparar(kwargs)
+                cacheado = response_cache.obtener(prefijo, key)
+                if cacheado is not None:
+                    return cacheado
+                resultado = await func(*args, **kwargs)
+                response_cache.guardar(key, resultado, ttl_efectivo, _resolver_tags(params, resultado))
+                return resultado
+            return wrapper_async
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not response_cache.habilitado:
+                return func(*args, **kwargs)
+            params, key = _preparar(kwargs)
+            cacheado = response_cache.obtener(prefijo, key)
+            if cacheado is not None:
+                return cacheado
+            resultado = func(*args, **kwargs)
+            response_cache.guardar(key, resultado, ttl_efectivo, _resolver_tags(params, resultado))
+            return resultado
+        return wrapper
+
+    return decorador
+
+
+# ============================================
+# INVALIDACIÓN DIRIGIDA POR EVENTOS ORM
+# ============================================
+
+_CLAVE_TAGS_PENDIENTES = "_cache_tags_pendientes"
+
+# Cachés locales derivados (p. ej. el reporte de estadísticas) que se
+# descartan cuando se confirman cambios con ciertos tags
+_oyentes_invalidacion: List[Callable[[Set[str]], None]] = []
+
+
+def registrar_oyente_invalidacion(oyente: Callable[[Set[str]], None]) -> None:
+    """Llama a `oyente(tags)` tras cada commit que invalida tags. Es idempotente."""
+    if oyente not in _oyentes_invalidacion:
+        _oyentes_invalidacion.append(oyente)
+
+
+def _valores_atributo(obj: Any, atributo: str) -> Set[str]:
+    """Valor actual y anterior (si cambió en esta transacción) de un atributo."""
+    valores: Set[str] = set()
+    actual = getattr(obj, atributo, None)
+    if actual:
+        valores.add(actual)
+    try:
+        historial = sa_inspect(obj).attrs[atributo].history
+        valores.update(v for v in historial.deleted if v)
+    except Exception:
+        pass
+    return valores
+
+
+def _hospitales_de_salas(session: OrmSession, sala_ids: Set[str]) -> Dict[str, tuple]:
+    """
+    Resuelve sala_id -> (servicio_id, hospital_id). Usa la topología en
+    memoria si está cargada; si no, una sola consulta.
+    """
+    from app.models.sala import Sala
+    from app.models.servicio import Servicio
+    from app.core.topologia import topologia_actual
+
+    if not sala_ids:
+        return {}
+    topologia = topologia_actual()
+    if topologia is not None and all(s in topologia.salas for s in sala_ids):
+        return {
+            sala_id: (topologia.salas[sala_id].servicio_id, topologia.salas[sala_id].hospital_id)
+            for sala_id in sala_ids
+        }
+    filas = session.connection().execute(
+        sa_select(Sala.id, Servicio.id, Servicio.hospital_id)
+        .join(Servicio, Servicio.id == Sala.servicio_id)
+        .where(Sala.id.in_(sala_ids))
+    ).all()
+    return {sala_id: (servicio_id, hospital_id) for sala_id, servicio_id, hospital_id in filas}
+
+
+def tags_para_objetos(session: OrmSession, objetos: Iterable[Any]) -> Set[str]:
+    """
+    Calcula los tags afectados por un conjunto de objetos ORM modificados.
+    """
+    from app.models.cama import Cama
+    from app.models.paciente import Paciente
+    from app.models.hospital import Hospital
+    from app.models.servicio import Servicio
+    from app.models.sala import Sala
+    from app.models.evento_paciente import EventoPaciente
+    from app.models.configuracion import ConfiguracionSistema
+
+    tags: Set[str] = set()
+    salas_camas: Dict[str, Set[str]] = {}
+
+    for obj in objetos:
+        if isinstance(obj, Cama):
+            tags.add(tag_cama(obj.id))
+            for sala_id in _valores_atributo(obj, "sala_id"):
+                salas_camas.setdefault(sala_id, set()).add(obj.id)
+            if len(_valores_atributo(obj, "identificador")) > 1:
+                tags.add(TAG_ESTRUCTURA)
+        elif isinstance(obj, Paciente):
+            tags.update({tag_paciente(obj.id), TAG_ESTADISTICAS})
+            for atributo in ("hospital_id", "derivacion_hospital_destino_id"):
+                for h in _valores_atributo(obj, atributo):
+                    tags.update({tag_hospital(h), tag_pacientes_hospital(h)})
+        elif isinstance(obj, Hospital):
+            tags.update({TAG_HOSPITALES, TAG_ESTRUCTURA, tag_hospital(obj.id)})
+        elif isinstance(obj, Servicio):
+            tags.update({tag_servicio(obj.id), TAG_ESTRUCTURA})
+            tags.update(tag_hospital(h) for h in _valores_atributo(obj, "hospital_id"))
+        elif isinstance(obj, Sala):
+            tags.add(TAG_ESTRUCTURA)
+            salas_camas.setdefault(obj.id, set())
+        elif isinstance(obj, EventoPaciente):
+            tags.add(TAG_ESTADISTICAS)
+            tags.add(tag_paciente(obj.paciente_id))
+        elif isinstance(obj, ConfiguracionSistema):
+            tags.add(TAG_CONFIGURACION)
+
+    if salas_camas:
+        for servicio_id, hospital_id in _hospitales_de_salas(session, set(salas_camas)).values():
+            tags.add(tag_servicio(servicio_id))
+            tags.add(tag_hospital(hospital_id))
+        tags.add(TAG_ESTADISTICAS)
+
+    return tags
+
+
+def _tags_activos() -> bool:
+    """Si hay que calcular tags: caché de respuestas, versiones (ETag) u oyentes activos."""
+    from app.core.versiones import versiones_recursos
+    return response_cache.habilitado or versiones_recursos.habilitado or bool(_oyentes_invalidacion)
+
+
+def _after_flush(session: OrmSession, flush_context) -> None:
+    if not _tags_activos():
+        return
+    objetos = list(session.new) + list(session.dirty) + list(session.deleted)
+    if not objetos:
+        return
+    try:
+        tags = tags_para_objetos(session, objetos)
+    except Exception as e:
+        logger.warning(f"⚠️  No se pudieron calcular tags de caché: {e}")
+        return
+    if tags:
+        session.info.setdefault(_CLAVE_TAGS_PENDIENTES, set()).update(tags)
+
+
+def agregar_tags_pendientes(session: OrmSession, tags: Iterable[str]) -> None:
+    """
+    Registra tags a invalidar al confirmar la transacción. Para escrituras
+    Core (insert/update masivos) que no pasan por el unit of work del ORM.
+    """
+    if tags and _tags_activos():
+        session.info.setdefault(_CLAVE_TAGS_PENDIENTES, set()).update(tags)
+
+
+def _after_commit(session: OrmSession) -> None:
+    tags = session.info.pop(_CLAVE_TAGS_PENDIENTES, None)
+    if tags:
+        from app.core.versiones import versiones_recursos
+        response_cache.invalidar_tags(*tags)
+        versiones_recursos.incrementar(tags)
+        for oyente in _oyentes_invalidacion:
+            try:
+                oyente(tags)
+            except Exception as e:
+                logger.warning(f"⚠️  Error notificando invalidación de caché: {e}")
+
+
+def _after_rollback(session: OrmSession, previous_transaction) -> None:
+    session.info.pop(_CLAVE_TAGS_PENDIENTES, None)
+
+
+def registrar_invalidacion_orm() -> None:
+    """
+    Registra los listeners de sesión que invalidan el caché al confirmar
+    cambios. Es idempotente.
+    """
+    if not event.contains(OrmSession, "after_flush", _after_flush):
+        event.listen(OrmSession, "after_flush", _after_flush)
+        event.listen(OrmSession, "after_commit", _after_commit)
+        event.listen(OrmSession, "after_soft_rollback", _after_rollback)
+
+
+registrar_invalidacion_orm()
@@ -3,11 +3,13 @@ Configuración de Base de Datos con PostgreSQL.
 Gestión de conexiones, pool, réplicas y caché con Redis.
 """
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import text
 from sqlalchemy.pool import QueuePool
-from typing import Generator, Optional
+from typing import Any, Generator, Optional
 from contextlib import contextmanager
 import redis
 import logging
+import threading
 
 from app.config import settings
 
@@ -15,68 +17,96 @@ logger = logging.getLogger("gestion_camas.database")
 
 
 # ============================================
-# POSTGRESQL - ENGINE PRINCIPAL (ESCRITURA)
+# INICIALIZACIÓN PEREZOSA
 # ============================================
-
-# Configuración del pool de conexiones
-engine = create_engine(
-    settings.DATABASE_URL,
-    echo=settings.DB_ECHO,
-    poolclass=QueuePool,
-    pool_size=settings.DB_POOL_SIZE,  # Conexiones permanentes
-    max_overflow=settings.DB_MAX_OVERFLOW,  # Conexiones adicionales en picos
-    pool_timeout=settings.DB_POOL_TIMEOUT,  # Timeout para obtener conexión
-    pool_recycle=settings.DB_POOL_RECYCLE,  # Reciclar conexiones cada hora
-    pool_pre_ping=settings.DB_POOL_PRE_PING,  # Verificar conexiones antes de usar
-    # Configuración específica para PostgreSQL
-    connect_args={
-        "application_name": "gestion_camas_app",
-        "connect_timeout": 10,
-        # Para mejor performance con PostgreSQL
-        "options": "-c timezone=America/Santiago"
-    }
-)
-
-logger.info(f"✅ Engine de base de datos creado: {settings.DATABASE_URL.split('@')[1] if '@' in settings.DATABASE_URL else 'database'}")
-logger.info(f"📊 Pool configurado: size={settings.DB_POOL_SIZE}, max_overflow={settings.DB_MAX_OVERFLOW}")
-
-
-# ============================================
-# POSTGRESQL - ENGINE DE RÉPLICA (LECTURA)
-# ============================================
-
-engine_read: Optional[object] = None
-
-if settings.DATABASE_READ_REPLICA_URL:
-    engine_read = create_engine(
-        settings.DATABASE_READ_REPLICA_URL,
+# Los engines y el cliente de Redis se crean en el primer uso, no al
+# importar el módulo: importar la app no abre conexiones ni espera el
+# connect_timeout de Redis. El calentamiento de arranque (app/core/arranque.py)
+# los crea en segundo plano para que la primera petición no pague ese costo.
+# Redis nunca se conecta desde una petición: get_redis() solo retorna el
+# cliente actual (o None) y el arranque reintenta la conexión en segundo plano.
+# `engine`, `engine_read` y `redis_client` siguen disponibles como atributos
+# del módulo (ver __getattr__ al final).
+
+_lock = threading.Lock()
+_engine = None
+_engine_read = None
+_redis_lock = threading.Lock()
+_redis_client: Optional[redis.Redis] = None
+_redis_ultimo_error: Optional[str] = None
+
+
+def _crear_engine(url: str, application_name: str, options: str):
+    return create_engine(
+        url,
         echo=settings.DB_ECHO,
         poolclass=QueuePool,
-        pool_size=settings.DB_POOL_SIZE,
-        max_overflow=settings.DB_MAX_OVERFLOW,
-        pool_timeout=settings.DB_POOL_TIMEOUT,
-        pool_recycle=settings.DB_POOL_RECYCLE,
-        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_size=settings.DB_POOL_SIZE,  # Conexiones permanentes
+        max_overflow=settings.DB_MAX_OVERFLOW,  # Conexiones adicionales en picos
+        pool_timeout=settings.DB_POOL_TIMEOUT,  # Timeout para obtener conexión
+        pool_recycle=settings.DB_POOL_RECYCLE,  # Reciclar conexiones cada hora
+        pool_pre_ping=settings.DB_POOL_PRE_PING,  # Verificar conexiones antes de usar
+        # Configuración específica para PostgreSQL
         connect_args={
-            "application_name": "gestion_camas_app_read",
+            "application_name": application_name,
             "connect_timeout": 10,
-            "options": "-c timezone=America/Santiago -c default_transaction_read_only=on"
+            "options": options
         }
     )
-    logger.info("✅ Engine de réplica (lectura) creado")
-else:
-    logger.info("ℹ️  No se configuró réplica de lectura, usando engine principal")
 
 
-# ============================================
-# REDIS - CACHÉ
-# ============================================
+def obtener_engine(read_only: bool = False):
+    """
+    Engine principal (escritura) o, con read_only, el de réplica si está
+    configurada. Se crean en la primera llamada.
+    """
+    global _engine, _engine_read
+
+    if read_only and settings.DATABASE_READ_REPLICA_URL:
+        if _engine_read is None:
+            with _lock:
+                if _engine_read is None:
+                    _engine_read = _crear_engine(
+                        settings.DATABASE_READ_REPLICA_URL,
+                        "gestion_camas_app_read",
+                        "-c timezone=America/Santiago -c default_transaction_read_only=on",
+                    )
+                    logger.info("✅ Engine de réplica (lectura) creado")
+        return _engine_read
+
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = _crear_engine(
+                    settings.DATABASE_URL, "gestion_camas_app", "-c timezone=America/Santiago"
+                )
+                logger.info(f"✅ Engine de base de datos creado: {settings.DATABASE_URL.split('@')[1] if '@' in settings.DATABASE_URL else 'database'}")
+                logger.info(f"📊 Pool configurado: size={settings.DB_POOL_SIZE}, max_overflow={settings.DB_MAX_OVERFLOW}")
+    return _engine
+
+
+def conectar_redis() -> Optional[redis.Redis]:
+    """
+    Conecta Redis (bloqueante: connect + ping con timeout de 5 s). Solo se
+    llama desde el calentamiento de arranque y su reintento en segundo
+    plano, nunca desde el event loop.
+
+    Returns:
+        Cliente de Redis o None si no está disponible
+    """
+    if not settings.REDIS_ENABLED:
+        return None
+    with _redis_lock:
+        if _redis_client is not None:
+            return _redis_client
+        return _conectar_redis()
 
-redis_client: Optional[redis.Redis] = None
 
-if settings.REDIS_ENABLED:
+def _conectar_redis() -> Optional[redis.Redis]:
+    global _redis_client, _redis_ultimo_error
+
     try:
-        redis_client = redis.from_url(
+        cliente = redis.from_url(
             settings.REDIS_URL,
             encoding="utf-8",
             decode_responses=True,
@@ -86,13 +116,33 @@ if settings.REDIS_ENABLED:
             health_check_interval=30
         )
         # Verificar conexión
-        redis_client.ping()
-        logger.info("✅ Redis conectado correctamente")
+        cliente.ping()
     except Exception as e:
         logger.warning(f"⚠️  No se pudo conectar a Redis: {e}")
-        redis_client = None
-else:
-    logger.info("ℹ️  Redis deshabilitado")
+        _redis_ultimo_error = str(e)
+        return None
+
+    logger.info("✅ Redis conectado correctamente")
+    _redis_client = cliente
+    _redis_ultimo_error = None
+    return cliente
+
+
+def estado_recursos() -> dict:
+    """Qué recursos ya se inicializaron (para health y arranque)."""
+    if not settings.REDIS_ENABLED:
+        estado_redis = "deshabilitado"
+    elif _redis_client is not None:
+        estado_redis = "conectado"
+    elif _redis_ultimo_error is not None:
+        estado_redis = "no_disponible"
+    else:
+        estado_redis = "pendiente"
+    return {
+        "engine": _engine is not None,
+        "engine_read": _engine_read is not None if settings.DATABASE_READ_REPLICA_URL else "not_configured",
+        "redis": estado_redis,
+    }
 
 
 # ============================================
@@ -107,7 +157,7 @@ def create_db_and_tables() -> None:
     IMPORTANTE: En producción, usar Alembic migrations en lugar de esto.
     """
     logger.info("🔨 Creando tablas en base de datos...")
-    SQLModel.metadata.create_all(engine)
+    SQLModel.metadata.create_all(obtener_engine())
     logger.info("✅ Tablas creadas correctamente")
 
 
@@ -129,9 +179,8 @@ def get_session(read_only: bool = False) -> Generator[Session, None, None]:
             ...
     """
     # Seleccionar engine apropiado
-    selected_engine = engine
-    if read_only and engine_read is not None:
-        selected_engine = engine_read
+    selected_engine = obtener_engine(read_only=read_only)
+    if read_only and settings.DATABASE_READ_REPLICA_URL:
         logger.debug("🔍 Usando réplica de lectura")
 
     with Session(selected_engine) as session:
@@ -162,11 +211,7 @@ def get_session_direct(read_only: bool = False) -> Session:
         finally:
             session.close()
     """
-    selected_engine = engine
-    if read_only and engine_read is not None:
-        selected_engine = engine_read
-
-    return Session(selected_engine)
+    return Session(obtener_engine(read_only=read_only))
 
 
 @contextmanager
@@ -202,12 +247,16 @@ def get_session_context(read_only: bool = False):
 
 def get_redis() -> Optional[redis.Redis]:
     """
-    Obtiene el cliente de Redis.
+    Obtiene el cliente de Redis actual, sin conectar ni bloquear: lo crea
+    el calentamiento de arranque, que reintenta cada REDIS_REINTENTO_SEGUNDOS
+    mientras Redis no esté disponible (ver conectar_redis).
 
     Returns:
         Cliente de Redis o None si no está disponible
     """
-    return redis_client
+    if not settings.REDIS_ENABLED:
+        return None
+    return _redis_client
 
 
 def cache_get(key: str) -> Optional[str]:
@@ -220,6 +269,7 @@ def cache_get(key: str) -> Optional[str]:
     Returns:
         Valor del caché o None si no existe o Redis no disponible
     """
+    redis_client = get_redis()
     if redis_client is None:
         return None
 
@@ -242,6 +292,7 @@ def cache_set(key: str, value: str, ttl: int = None) -> bool:
     Returns:
         True si se guardó correctamente, False en caso contrario
     """
+    redis_client = get_redis()
     if redis_client is None:
         return False
 
@@ -265,6 +316,7 @@ def cache_delete(key: str) -> bool:
     Returns:
         True si se eliminó correctamente, False en caso contrario
     """
+    redis_client = get_redis()
     if redis_client is None:
         return False
 
@@ -280,20 +332,29 @@ def cache_invalidate_pattern(pattern: str) -> int:
     """
     Invalida todas las claves que coincidan con un patrón.
 
+    Usa SCAN de forma incremental en lugar de KEYS para no bloquear Redis.
+
     Args:
         pattern: Patrón de búsqueda (ej: "camas:*")
 
     Returns:
         Número de claves eliminadas
     """
+    redis_client = get_redis()
     if redis_client is None:
         return 0
 
     try:
-        keys = redis_client.keys(pattern)
-        if keys:
-            return redis_client.delete(*keys)
-        return 0
+        eliminadas = 0
+        lote = []
+        for key in redis_client.scan_iter(match=pattern, count=500):
+            lote.append(key)
+            if len(lote) >= 500:
+                eliminadas += redis_client.unlink(*lote)
+                lote = []
+        if lote:
+            eliminadas += redis_client.unlink(*lote)
+        return eliminadas
     except Exception as e:
         logger.warning(f"⚠️  Error al invalidar patrón de caché: {e}")
         return 0
@@ -312,14 +373,14 @@ def check_database_health() -> dict:
     """
     try:
         with get_session_context() as session:
-            session.execute("SELECT 1")
+            session.execute(text("SELECT 1"))
 
         # Verificar réplica si existe
         replica_status = "not_configured"
-        if engine_read is not None:
+        if settings.DATABASE_READ_REPLICA_URL:
             try:
-                with Session(engine_read) as session:
-                    session.execute("SELECT 1")
+                with Session(obtener_engine(read_only=True)) as session:
+                    session.execute(text("SELECT 1"))
                 replica_status = "healthy"
             except Exception:
                 replica_status = "unhealthy"
@@ -346,9 +407,10 @@ def check_redis_health() -> dict:
     Returns:
         Dict con información de salud
     """
+    redis_client = get_redis()
     if redis_client is None:
         return {
-            "status": "disabled",
+            "status": "disabled" if not settings.REDIS_ENABLED else "unavailable",
             "message": "Redis no configurado"
         }
 
@@ -379,15 +441,31 @@ def shutdown_database():
     logger.info("🔄 Cerrando conexiones a base de datos...")
 
     try:
-        engine.dispose()
-        logger.info("✅ Engine principal cerrado")
+        if _engine is not None:
+            _engine.dispose()
+            logger.info("✅ Engine principal cerrado")
 
-        if engine_read is not None:
-            engine_read.dispose()
+        if _engine_read is not None:
+            _engine_read.dispose()
             logger.info("✅ Engine de réplica cerrado")
 
-        if redis_client is not None:
-            redis_client.close()
+        if _redis_client is not None:
+            _redis_client.close()
             logger.info("✅ Redis cerrado")
     except Exception as e:
         logger.error(f"❌ Error al cerrar conexiones: {e}")
+
+
+# ============================================
+# ATRIBUTOS PEREZOSOS DEL MÓDULO
+# ============================================
+
+def __getattr__(nombre: str) -> Any:
+    """Compatibilidad: `from app.core.database import engine` crea el engine al pedirlo."""
+    if nombre == "engine":
+        return obtener_engine()
+    if nombre == "engine_read":
+        return obtener_engine(read_only=True) if settings.DATABASE_READ_REPLICA_URL else None
+    if nombre == "redis_client":
+        return get_redis()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
@@ -0,0 +1,450 @@
+"""
+Outbox transaccional de notificaciones WebSocket.
+
+Las notificaciones se escriben en la tabla notificacion_outbox dentro de la
+misma transacción que el cambio de estado. Un despachador en segundo plano
+las reclama en orden, les asigna un número de secuencia por hospital, las
+publica al gestor WebSocket y las marca como publicadas.
+
+Garantías:
+    - Una notificación solo se publica si su transacción se confirmó.
+    - Entrega al menos una vez: si el proceso cae entre publicar y marcar,
+      la notificación se vuelve a publicar con la misma secuencia, por lo
+      que el cliente puede descartar el duplicado.
+    - El costo del fan-out no se paga en la petición HTTP.
+    - Una notificación que falla OUTBOX_MAX_INTENTOS veces se descarta
+      (fallido_at) y se registra una vez en el log, para no bloquear la
+      secuencia de su hospital; el cliente ve un salto de secuencia.
+
+Uso:
+    # Antes del commit que confirma el cambio de estado. Si ese commit lo
+    # hace un servicio, se encola antes de llamarlo (o dentro del servicio).
+    encolar_broadcast(session, {"tipo": "cama_actualizada", "hospital_id": h})
+    session.commit()
+"""
+from typing import Any, Dict, List, Optional
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import asyncio
+import json
+import logging
+
+from sqlalchemy import event, delete, or_, update
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.models.outbox import NotificacionOutbox, SecuenciaOutbox
+
+logger = logging.getLogger("gestion_camas.outbox")
+
+
+CLAVE_SECUENCIA_GLOBAL = "global"
+
+_CLAVE_PENDIENTE = "_outbox_pendiente"
+
+
+# ============================================
+# ESCRITURA (LADO DE LA TRANSACCIÓN)
+# ============================================
+
+def encolar_broadcast(
+    session: Session,
+    mensaje: Dict[str, Any],
+    hospital_id: Optional[str] = None,
+    solo_hospital: bool = False,
+) -> NotificacionOutbox:
+    """
+    Agrega una notificación al outbox en la transacción actual (sin commit).
+
+    Args:
+        session: Sesión de la transacción del cambio de estado
+        mensaje: Mensaje a publicar
+        hospital_id: Hospital de la notificación (por defecto, mensaje["hospital_id"])
+        solo_hospital: Si True, se envía solo a suscriptores del hospital
+
+    Returns:
+        Registro del outbox
+    """
+    if hospital_id is None:
+        hospital_id = mensaje.get("hospital_id")
+    notificacion = NotificacionOutbox(
+        hospital_id=str(hospital_id) if hospital_id else None,
+        solo_hospital=solo_hospital and hospital_id is not None,
+        payload=json.dumps(mensaje, default=str),
+    )
+    session.add(notificacion)
+    session.info[_CLAVE_PENDIENTE] = True
+    return notificacion
+
+
+def encolar_notificacion(
+    session: Session,
+    message: Dict[str, Any],
+    notification_type: str = "info",
+    play_sound: bool = False,
+    hospital_id: Optional[str] = None,
+) -> NotificacionOutbox:
+    """
+    Equivalente transaccional de manager.send_notification.
+    """
+    notificacion = {
+        **message,
+        "notification_type": notification_type,
+        "play_sound": play_sound or notification_type == "asignacion",
+    }
+    return encolar_broadcast(
+        session,
+        notificacion,
+        hospital_id=hospital_id,
+        solo_hospital=hospital_id is not None,
+    )
+
+
+def _after_commit(session: OrmSession) -> None:
+    if session.info.pop(_CLAVE_PENDIENTE, None):
+        despachador_outbox.despertar()
+
+
+def _after_rollback(session: OrmSession, previous_transaction) -> None:
+    session.info.pop(_CLAVE_PENDIENTE, None)
+
+
+def registrar_aviso_orm() -> None:
+    """
+    Registra el listener que despierta al despachador cuando se confirma
+    una transacción con notificaciones. Es idempotente.
+    """
+    if not event.contains(OrmSession, "after_commit", _after_commit):
+        event.listen(OrmSession, "after_commit", _after_commit)
+        event.listen(OrmSession, "after_soft_rollback", _after_rollback)
+
+
+registrar_aviso_orm()
+
+
+# ============================================
+# DESPACHADOR
+# ============================================
+
+@dataclass
+class NotificacionReclamada:
+    """Copia de una notificación reclamada, publicable sin sesión abierta."""
+    id: int
+    hospital_id: Optional[str]
+    solo_hospital: bool
+    secuencia: int
+    mensaje: Dict[str, Any]
+    intentos: int = 0
+
+
+class DespachadorOutbox:
+    """
+    Publica las notificaciones pendientes del outbox en orden.
+
+    Cada ciclo tiene tres pasos, los de BD en un hilo (asyncio.to_thread)
+    para no bloquear el event loop:
+
+    1. Reclamar: en una transacción corta toma un lote pendiente con
+       FOR UPDATE SKIP LOCKED (en PostgreSQL otro despachador salta esas
+       filas en vez de esperar), asigna secuencias y marca reclamado_at.
+    2. Publicar: envía por WebSocket sin ninguna transacción ni bloqueo
+       abierto.
+    3. Confirmar: marca publicado_at en lo enviado y libera el reclamo del
+       resto si un envío falló, para reintentarlo en orden. Si la que falló
+       llegó a OUTBOX_MAX_INTENTOS, se marca fallido_at y deja de reclamarse.
+
+    Un reclamo de un despachador caído vence tras OUTBOX_RECLAMO_SEGUNDOS.
+    """
+
+    def __init__(
+        self,
+        manager=None,
+        session_factory=None,
+        lote_maximo: Optional[int] = None,
+        intervalo_segundos: Optional[float] = None,
+    ):
+        self._manager = manager
+        self._session_factory = session_factory
+        self.lote_maximo = lote_maximo or settings.OUTBOX_LOTE_MAX
+        self.intervalo_segundos = intervalo_segundos or settings.OUTBOX_INTERVALO_SEGUNDOS
+        self._tarea: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._aviso: Optional[asyncio.Event] = None
+        self.publicadas = 0
+        self.errores = 0
+        self.descartadas = 0
+
+    @property
+    def manager(self):
+        if self._manager is None:
+            from app.core.websocket_manager import manager
+            self._manager = manager
+        return self._manager
+
+    @property
+    def activo(self) -> bool:
+        return self._tarea is not None and not self._tarea.done()
+
+    def _nueva_sesion(self) -> Session:
+        if self._session_factory is not None:
+            return self._session_factory()
+        from app.core.database import get_session_direct
+        return get_session_direct()
+
+    async def iniciar(self) -> None:
+        """Inicia el despachador en el event loop actual."""
+        if self.activo:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._aviso = asyncio.Event()
+        self._tarea = asyncio.create_task(self._bucle())
+        logger.info("Despachador de outbox iniciado")
+
+    async def detener(self) -> None:
+        """Detiene el despachador tras publicar lo pendiente."""
+        if self._tarea is None:
+            return
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        self._tarea = None
+        try:
+            await self.despachar_todo()
+        except Exception as e:
+            logger.warning(f"⚠️  No se pudo vaciar el outbox al detener: {e}")
+        logger.info(f"Despachador de outbox detenido ({self.publicadas} publicadas)")
+
+    def despertar(self) -> None:
+        """Adelanta el próximo ciclo. Seguro desde cualquier hilo."""
+        if self._aviso is None or self._loop is None or self._loop.is_closed():
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._aviso.set)
+        except RuntimeError:
+            pass
+
+    async def _publicar(self, notificacion: NotificacionReclamada) -> None:
+        mensaje = {
+            **notificacion.mensaje,
+            "outbox_id": notificacion.id,
+            "secuencia": notificacion.secuencia,
+        }
+        if notificacion.solo_hospital:
+            await self.manager.broadcast_to_hospital(notificacion.hospital_id, mensaje)
+        else:
+            await self.manager.broadcast(mensaje)
+
+    @staticmethod
+    def _asignar_secuencias(session: Session, lote: List[NotificacionOutbox]) -> None:
+        claves = {n.hospital_id or CLAVE_SECUENCIA_GLOBAL for n in lote if n.secuencia is None}
+        if not claves:
+            return
+        secuencias = {
+            s.clave: s
+            for s in session.exec(
+                select(SecuenciaOutbox)
+                .where(SecuenciaOutbox.clave.in_(claves))
+                .with_for_update()
+            ).all()
+        }
+        for notificacion in lote:
+            if notificacion.secuencia is not None:
+                continue
+            clave = notificacion.hospital_id or CLAVE_SECUENCIA_GLOBAL
+            secuencia = secuencias.get(clave)
+            if secuencia is None:
+                secuencia = SecuenciaOutbox(clave=clave, ultima=0)
+                secuencias[clave] = secuencia
+            secuencia.ultima += 1
+            notificacion.secuencia = secuencia.ultima
+            session.add(secuencia)
+            session.add(notificacion)
+
+    def _reclamar_lote(self) -> List[NotificacionReclamada]:
+        """Reclama un lote pendiente en una transacción corta (hilo aparte)."""
+        ahora = datetime.utcnow()
+        vencimiento = ahora - timedelta(seconds=settings.OUTBOX_RECLAMO_SEGUNDOS)
+        session = self._nueva_sesion()
+        try:
+            lote = session.exec(
+                select(NotificacionOutbox)
+                .where(
+                    NotificacionOutbox.publicado_at == None,
+                    NotificacionOutbox.fallido_at == None,
+                    or_(
+                        NotificacionOutbox.reclamado_at == None,
+                        NotificacionOutbox.reclamado_at < vencimiento,
+                    ),
+                )
+                .order_by(NotificacionOutbox.id)
+                .limit(self.lote_maximo)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not lote:
+                session.rollback()
+                return []
+
+            self._asignar_secuencias(session, lote)
+            reclamadas = []
+            for notificacion in lote:
+                notificacion.reclamado_at = ahora
+                session.add(notificacion)
+                reclamadas.append(NotificacionReclamada(
+                    id=notificacion.id,
+                    hospital_id=notificacion.hospital_id,
+                    solo_hospital=notificacion.solo_hospital,
+                    secuencia=notificacion.secuencia,
+                    mensaje=notificacion.get_payload(),
+                    intentos=notificacion.intentos,
+                ))
+            session.commit()
+            return reclamadas
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _confirmar_lote(
+        self,
+        publicadas: List[int],
+        fallida: Optional[int],
+        liberadas: List[int],
+        descartar_fallida: bool = False,
+    ) -> None:
+        """
+        Marca lo publicado, cuenta el intento fallido (descartándola si
+        corresponde) y libera el reclamo de lo no enviado (hilo aparte).
+        """
+        session = self._nueva_sesion()
+        try:
+            if publicadas:
+                session.execute(
+                    update(NotificacionOutbox)
+                    .where(NotificacionOutbox.id.in_(publicadas))
+                    .values(publicado_at=datetime.utcnow())
+                )
+            if fallida is not None:
+                session.execute(
+                    update(NotificacionOutbox)
+                    .where(NotificacionOutbox.id == fallida)
+                    .values(
+                        intentos=NotificacionOutbox.intentos + 1,
+                        fallido_at=datetime.utcnow() if descartar_fallida else None,
+                    )
+                )
+            if liberadas:
+                session.execute(
+                    update(NotificacionOutbox)
+                    .where(NotificacionOutbox.id.in_(liberadas))
+                    .values(reclamado_at=None)
+                )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    async def despachar_lote(self) -> int:
+        """
+        Publica un lote de notificaciones pendientes.
+
+        Returns:
+            Número de notificaciones publicadas
+        """
+        lote = await asyncio.to_thread(self._reclamar_lote)
+        if not lote:
+            return 0
+
+        publicadas: List[int] = []
+        fallida: Optional[int] = None
+        descartar = False
+        for notificacion in lote:
+            try:
+                await self._publicar(notificacion)
+            except Exception as e:
+                # Se detiene el lote para no alterar el orden
+                fallida = notificacion.id
+                self.errores += 1
+                descartar = notificacion.intentos + 1 >= settings.OUTBOX_MAX_INTENTOS
+                if descartar:
+                    logger.error(
+                        f"❌ Notificación {notificacion.id} (hospital {notificacion.hospital_id}, "
+                        f"secuencia {notificacion.secuencia}) descartada tras "
+                        f"{notificacion.intentos + 1} intentos: {e}"
+                    )
+                else:
+                    logger.warning(f"⚠️  Error publicando notificación {notificacion.id}: {e}")
+                break
+            publicadas.append(notificacion.id)
+
+        liberadas = [n.id for n in lote[len(publicadas):]]
+        await asyncio.to_thread(self._confirmar_lote, publicadas, fallida, liberadas, descartar)
+        self.publicadas += len(publicadas)
+        if descartar:
+            self.descartadas += 1
+        return len(publicadas)
+
+    async def despachar_todo(self) -> int:
+        """Publica lotes hasta vaciar el outbox."""
+        total = 0
+        while True:
+            publicadas = await self.despachar_lote()
+            total += publicadas
+            if publicadas < self.lote_maximo:
+                return total
+
+    def purgar_publicadas(self, session: Session, horas: Optional[int] = None) -> int:
+        """Elimina notificaciones publicadas hace más de `horas` horas."""
+        horas = horas if horas is not None else settings.OUTBOX_RETENCION_HORAS
+        limite = datetime.utcnow() - timedelta(hours=horas)
+        resultado = session.execute(
+            delete(NotificacionOutbox).where(
+                NotificacionOutbox.publicado_at != None,
+                NotificacionOutbox.publicado_at < limite,
+            )
+        )
+        session.commit()
+        return resultado.rowcount or 0
+
+    def _purgar(self) -> None:
+        session = self._nueva_sesion()
+        try:
+            self.purgar_publicadas(session)
+        finally:
+            session.close()
+
+    async def _bucle(self) -> None:
+        ultima_purga = datetime.utcnow()
+        while True:
+            try:
+                await asyncio.wait_for(self._aviso.wait(), timeout=self.intervalo_segundos)
+            except asyncio.TimeoutError:
+                pass
+            self._aviso.clear()
+
+            try:
+                await self.despachar_todo()
+                if datetime.utcnow() - ultima_purga > timedelta(hours=1):
+                    await asyncio.to_thread(self._purgar)
+                    ultima_purga = datetime.utcnow()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errores += 1
+                logger.error(f"❌ Error en despachador de outbox: {e}")
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "activo": self.activo,
+            "publicadas": self.publicadas,
+            "errores": self.errores,
+            "descartadas": self.descartadas,
+        }
+
+
+despachador_outbox = DespachadorOutbox()
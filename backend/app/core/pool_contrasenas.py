@@ -0,0 +1,149 @@
+"""
+Pool acotado para operaciones de contraseña (bcrypt).
+
+Verificar o hashear con bcrypt toma cientos de milisegundos de CPU. Hecho
+dentro de un endpoint async bloquea el event loop: en un cambio de turno,
+cientos de logins seguidos congelan los WebSockets y el resto de la API del
+worker. Aquí esas operaciones corren en un ThreadPoolExecutor propio de
+tamaño fijo (bcrypt libera el GIL mientras calcula, así que los hilos bastan).
+
+Control de admisión: los logins se rechazan con PoolSaturado cuando ya hay
+demasiadas operaciones pendientes (en curso + en cola); el endpoint responde
+429 con Retry-After estimado a partir del tiempo medio de las operaciones.
+Las operaciones administrativas (crear usuario, cambiar contraseña) esperan
+su turno sin rechazo.
+
+Uso:
+    ok = await pool_contrasenas.ejecutar(auth_service.verify_password, plano, hash, admision=True)
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import logging
+import math
+import threading
+import time
+
+from app.config import settings
+
+logger = logging.getLogger("gestion_camas.auth")
+
+
+class PoolSaturado(Exception):
+    """No se admiten más operaciones; reintentar en `retry_after` segundos."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Pool de contraseñas saturado, reintentar en {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PoolContrasenas:
+    """
+    Ejecutor de tamaño fijo con admisión por cantidad de pendientes y
+    métricas de espera/ejecución.
+    """
+
+    # Peso del último valor en las medias móviles exponenciales
+    ALFA = 0.2
+
+    def __init__(self, hilos: Optional[int] = None, pendientes_max: Optional[int] = None):
+        self._hilos = hilos
+        self._pendientes_max = pendientes_max
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.en_curso = 0
+        self.en_cola = 0
+        self.completadas = 0
+        self.rechazadas = 0
+        self.errores = 0
+        self.espera_media = 0.0
+        self.espera_maxima = 0.0
+        self.ejecucion_media = 0.0
+
+    @property
+    def hilos(self) -> int:
+        return self._hilos or settings.AUTH_HASH_HILOS
+
+    @property
+    def pendientes_max(self) -> int:
+        return self._pendientes_max if self._pendientes_max is not None else settings.AUTH_HASH_PENDIENTES_MAX
+
+    @property
+    def pendientes(self) -> int:
+        return self.en_curso + self.en_cola
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="contrasenas")
+            return self._executor
+
+    def cerrar(self) -> None:
+        """Libera el pool de hilos."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def retry_after(self) -> int:
+        """Segundos estimados hasta que se vacíe la cola actual."""
+        ejecucion = self.ejecucion_media or 0.3
+        return max(1, math.ceil(self.pendientes * ejecucion / self.hilos))
+
+    def _ejecutar_medido(self, funcion: Callable[..., Any], encolada: float, args: tuple) -> Any:
+        inicio = time.perf_counter()
+        with self._lock:
+            self.en_cola -= 1
+            self.en_curso += 1
+            espera = inicio - encolada
+            self.espera_media += self.ALFA * (espera - self.espera_media)
+            self.espera_maxima = max(self.espera_maxima, espera)
+        try:
+            return funcion(*args)
+        except Exception:
+            with self._lock:
+                self.errores += 1
+            raise
+        finally:
+            duracion = time.perf_counter() - inicio
+            with self._lock:
+                self.en_curso -= 1
+                self.completadas += 1
+                self.ejecucion_media += self.ALFA * (duracion - self.ejecucion_media)
+
+    async def ejecutar(self, funcion: Callable[..., Any], *args: Any, admision: bool = False) -> Any:
+        """
+        Ejecuta `funcion(*args)` en el pool y espera el resultado.
+
+        Args:
+            admision: Si True (login), rechaza con PoolSaturado cuando hay
+                      `pendientes_max` operaciones pendientes.
+
+        Raises:
+            PoolSaturado: Si se rechaza por admisión
+        """
+        with self._lock:
+            if admision and self.pendientes >= self.pendientes_max:
+                self.rechazadas += 1
+                raise PoolSaturado(self.retry_after())
+            self.en_cola += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool(), self._ejecutar_medido, funcion, time.perf_counter(), args)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hilos": self.hilos,
+                "pendientes_max": self.pendientes_max,
+                "en_curso": self.en_curso,
+                "en_cola": self.en_cola,
+                "completadas": self.completadas,
+                "rechazadas": self.rechazadas,
+                "errores": self.errores,
+                "espera_media_ms": round(self.espera_media * 1000, 1),
+                "espera_maxima_ms": round(self.espera_maxima * 1000, 1),
+                "ejecucion_media_ms": round(self.ejecucion_media * 1000, 1),
+            }
+
+
+pool_contrasenas = PoolContrasenas()
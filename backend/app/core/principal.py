@@ -0,0 +1,268 @@
+"""
+Principal autenticado y su caché en memoria.
+
+Cada request autenticado resolvía el usuario en la base de datos después de
+validar el JWT. El principal es una vista compacta e inmutable del usuario
+con lo que necesitan las dependencias de autorización: id, rol, permisos
+como máscara de bits y los códigos de hospital/servicio ya normalizados.
+
+La caché es LRU con TTL, por id de usuario (el `sub` del token: todos los
+tokens de un usuario comparten principal). Se invalida explícitamente al
+cambiar rol, hospital, servicio o estado del usuario, al revocar sus tokens
+y al cambiar su contraseña; además, un listener de sesión invalida al
+confirmar cualquier cambio de esos atributos. Entre workers se sincroniza
+con un contador de versión en Redis (como la topología); el TTL acota la
+desactualización si Redis no está disponible.
+
+Uso:
+    principal = cache_principales.obtener(user_id)
+    if principal is None:
+        principal = cache_principales.guardar(Principal.desde_usuario(usuario))
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Optional
+import logging
+import threading
+import time
+
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session as OrmSession
+
+from app.config import settings
+from app.core.rbac_service import RBACService, codigos_hospital, codigos_servicio
+from app.models.usuario import Usuario, RolEnum, PermisoEnum, PERMISOS_POR_ROL
+
+logger = logging.getLogger("gestion_camas.auth")
+
+
+CLAVE_VERSION_REDIS = "principales:version"
+
+# Un bit por permiso, en el orden de declaración del enum
+BIT_PERMISO: Dict[PermisoEnum, int] = {p: 1 << i for i, p in enumerate(PermisoEnum)}
+
+
+def mascara_permisos(permisos: Iterable[PermisoEnum]) -> int:
+    """Máscara de bits de un conjunto de permisos."""
+    mascara = 0
+    for permiso in permisos:
+        mascara |= BIT_PERMISO[permiso]
+    return mascara
+
+
+MASCARA_POR_ROL: Dict[RolEnum, int] = {rol: mascara_permisos(p) for rol, p in PERMISOS_POR_ROL.items()}
+
+
+# ============================================
+# PRINCIPAL
+# ============================================
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Usuario autenticado, tal como lo ven las dependencias de autorización.
+
+    Expone la misma interfaz de permisos que Usuario (rol, hospital_id,
+    servicio_id, tiene_permiso...), así que rbac_service y los endpoints lo
+    usan sin cambios. Los endpoints que necesitan la fila completa (perfil,
+    cambio de contraseña) usan get_current_usuario.
+    """
+    id: str
+    username: str
+    rol: RolEnum
+    hospital_id: Optional[str]
+    servicio_id: Optional[str]
+    permisos_bits: int
+    # Formas aceptadas del hospital/servicio del usuario (id y código corto)
+    hospitales: FrozenSet[str]
+    servicios: FrozenSet[str]
+    # Código largo del servicio ("medicina"), para puede_ver_paciente
+    servicio_normalizado: Optional[str]
+    is_active: bool = True
+
+    @classmethod
+    def desde_usuario(cls, usuario: Usuario) -> "Principal":
+        return cls(
+            id=usuario.id,
+            username=usuario.username,
+            rol=usuario.rol,
+            hospital_id=usuario.hospital_id,
+            servicio_id=usuario.servicio_id,
+            permisos_bits=MASCARA_POR_ROL.get(usuario.rol, 0),
+            hospitales=codigos_hospital(usuario.hospital_id),
+            servicios=codigos_servicio(usuario.servicio_id),
+            servicio_normalizado=RBACService.normalizar_servicio(usuario.servicio_id),
+            is_active=usuario.is_active,
+        )
+
+    @property
+    def permisos(self) -> FrozenSet[PermisoEnum]:
+        return frozenset(p for p, bit in BIT_PERMISO.items() if self.permisos_bits & bit)
+
+    def tiene_permiso(self, permiso: PermisoEnum) -> bool:
+        return bool(self.permisos_bits & BIT_PERMISO[permiso])
+
+    def tiene_algun_permiso(self, permisos: Iterable[PermisoEnum]) -> bool:
+        return bool(self.permisos_bits & mascara_permisos(permisos))
+
+    def tiene_todos_permisos(self, permisos: Iterable[PermisoEnum]) -> bool:
+        requerida = mascara_permisos(permisos)
+        return self.permisos_bits & requerida == requerida
+
+
+# ============================================
+# CACHÉ LRU + TTL
+# ============================================
+
+class CachePrincipales:
+    """
+    Principales por id de usuario, con expiración y límite de entradas.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, maximo: Optional[int] = None):
+        self._ttl = ttl
+        self._maximo = maximo
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version_remota: Optional[int] = None
+        self._ultima_verificacion = 0.0
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl if self._ttl is not None else settings.AUTH_CACHE_PRINCIPALES_TTL
+
+    @property
+    def maximo(self) -> int:
+        return self._maximo if self._maximo is not None else settings.AUTH_CACHE_PRINCIPALES_MAX
+
+    @property
+    def habilitada(self) -> bool:
+        return self.ttl > 0 and self.maximo > 0
+
+    def obtener(self, user_id: str) -> Optional[Principal]:
+        """Principal vigente de `user_id`, o None si no está o expiró."""
+        if not self.habilitada:
+            return None
+        self._verificar_version_remota()
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(user_id)
+            if entrada is None or entrada[1] <= ahora:
+                if entrada is not None:
+                    del self._entradas[user_id]
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(user_id)
+            self.aciertos += 1
+            return entrada[0]
+
+    def guardar(self, principal: Principal) -> Principal:
+        if not self.habilitada:
+            return principal
+        with self._lock:
+            self._entradas[principal.id] = (principal, time.monotonic() + self.ttl)
+            self._entradas.move_to_end(principal.id)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+        return principal
+
+    def invalidar(self, user_id: str, publicar: bool = True) -> None:
+        """Descarta el principal de `user_id` (y avisa a otros workers)."""
+        with self._lock:
+            self._entradas.pop(user_id, None)
+            self.invalidaciones += 1
+        if publicar:
+            redis_client = self._redis()
+            if redis_client is not None:
+                try:
+                    self._version_remota = redis_client.incr(CLAVE_VERSION_REDIS)
+                except Exception as e:
+                    logger.warning(f"⚠️  No se pudo publicar invalidación de principales: {e}")
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "invalidaciones": self.invalidaciones,
+                "ttl": self.ttl,
+                "maximo": self.maximo,
+            }
+
+    @staticmethod
+    def _redis():
+        from app.core.database import get_redis
+        return get_redis()
+
+    def _verificar_version_remota(self) -> None:
+        """Vacía la caché si otro worker invalidó algún principal."""
+        ahora = time.monotonic()
+        if ahora - self._ultima_verificacion < settings.AUTH_CACHE_PRINCIPALES_VERIFICAR_SEGUNDOS:
+            return
+        self._ultima_verificacion = ahora
+        redis_client = self._redis()
+        if redis_client is None:
+            return
+        try:
+            valor = redis_client.get(CLAVE_VERSION_REDIS)
+        except Exception:
+            return
+        version = int(valor) if valor else 0
+        if self._version_remota is not None and version != self._version_remota:
+            self.limpiar()
+        self._version_remota = version
+
+
+cache_principales = CachePrincipales()
+
+
+def invalidar_principal(user_id: str) -> None:
+    """Descarta el principal cacheado de un usuario."""
+    cache_principales.invalidar(user_id)
+
+
+# ============================================
+# INVALIDACIÓN POR CAMBIOS EN USUARIOS
+# ============================================
+
+_CLAVE_USUARIOS_MODIFICADOS = "_principales_modificados"
+
+# Atributos de Usuario que forman parte del principal
+_ATRIBUTOS_PRINCIPAL = ("username", "rol", "hospital_id", "servicio_id", "is_active")
+
+
+def _after_flush(session: OrmSession, flush_context) -> None:
+    for obj in list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Usuario):
+            continue
+        estado = sa_inspect(obj)
+        if obj in session.deleted or any(estado.attrs[a].history.has_changes() for a in _ATRIBUTOS_PRINCIPAL):
+            session.info.setdefault(_CLAVE_USUARIOS_MODIFICADOS, set()).add(obj.id)
+
+
+def _after_commit(session: OrmSession) -> None:
+    for user_id in session.info.pop(_CLAVE_USUARIOS_MODIFICADOS, ()):
+        invalidar_principal(user_id)
+
+
+def _after_rollback(session: OrmSession, previous_transaction) -> None:
+    session.info.pop(_CLAVE_USUARIOS_MODIFICADOS, None)
+
+
+def registrar_invalidacion_principales() -> None:
+    """Registra los listeners de sesión. Es idempotente."""
+    if not event.contains(OrmSession, "after_flush", _after_flush):
+        event.listen(OrmSession, "after_flush", _after_flush)
+        event.listen(OrmSession, "after_commit", _after_commit)
+        event.listen(OrmSession, "after_soft_rollback", _after_rollback)
+
+
+registrar_invalidacion_principales()
@@ -2,11 +2,12 @@
 Servicio RBAC (Role-Based Access Control) Multinivel.
 Implementa la lógica de filtrado por ubicación (servicio/hospital) + rol profesional.
 """
-from typing import Optional, List
+from typing import FrozenSet, Optional, List
 from sqlmodel import Session, select, or_, and_
 from fastapi import HTTPException, status
 
 from app.models.usuario import Usuario, RolEnum, PermisoEnum
+from app.core.topologia import topologia_actual
 
 
 # ============================================
@@ -48,6 +49,21 @@ NOMBRE_SERVICIO_TO_CODIGO = {
 }
 
 
+
+def codigos_hospital(hospital_id: Optional[str]) -> FrozenSet[str]:
+    """Formas equivalentes de un hospital: tal cual y en código corto."""
+    if not hospital_id:
+        return frozenset()
+    return frozenset((hospital_id, CODIGO_HOSPITAL_MAP.get(hospital_id, hospital_id)))
+
+
+def codigos_servicio(servicio_id: Optional[str]) -> FrozenSet[str]:
+    """Formas equivalentes de un servicio: tal cual y en código corto."""
+    if not servicio_id:
+        return frozenset()
+    return frozenset((servicio_id, CODIGO_SERVICIO_MAP.get(servicio_id, servicio_id)))
+
+
 # ============================================
 # MAPEO DE SERVICIOS POR ROL
 # ============================================
@@ -134,17 +150,17 @@ class RBACService:
         if not user.hospital_id:
             return True
 
-        # Normalizar código del usuario (convertir formato largo a corto si aplica)
-        user_hospital_codigo = CODIGO_HOSPITAL_MAP.get(user.hospital_id, user.hospital_id)
-
-        # Normalizar código del hospital objetivo
-        hospital_id_normalizado = CODIGO_HOSPITAL_MAP.get(hospital_id, hospital_id)
+        # Con la topología cargada, ambos lados se resuelven al UUID del hospital
+        topologia = topologia_actual()
+        if topologia is not None:
+            user_hospital_uuid = topologia.resolver_hospital_id(user.hospital_id)
+            hospital_uuid = topologia.resolver_hospital_id(hospital_id)
+            if user_hospital_uuid and hospital_uuid:
+                return user_hospital_uuid == hospital_uuid
 
-        # Verificar que coincida el hospital (comparar ambos formatos)
-        return (user.hospital_id == hospital_id or
-                user_hospital_codigo == hospital_id or
-                user.hospital_id == hospital_id_normalizado or
-                user_hospital_codigo == hospital_id_normalizado)
+        # Comparar ambos formatos (largo y corto); el principal los trae precalculados
+        codigos = getattr(user, "hospitales", None) or codigos_hospital(user.hospital_id)
+        return hospital_id in codigos or CODIGO_HOSPITAL_MAP.get(hospital_id, hospital_id) in codigos
 
     @staticmethod
     def puede_acceder_servicio(user: Usuario, servicio_id: str) -> bool:
@@ -170,14 +186,9 @@ class RBACService:
             if not user.servicio_id:
                 return True  # Sin servicio asignado = sin restricción
 
-            # Normalizar códigos
-            user_servicio_codigo = CODIGO_SERVICIO_MAP.get(user.servicio_id, user.servicio_id)
-            servicio_id_normalizado = CODIGO_SERVICIO_MAP.get(servicio_id, servicio_id)
-
-            return (user.servicio_id == servicio_id or
-                    user_servicio_codigo == servicio_id or
-                    user.servicio_id == servicio_id_normalizado or
-                    user_servicio_codigo == servicio_id_normalizado)
+            # Comparar ambos formatos (largo y corto)
+            codigos = getattr(user, "servicios", None) or codigos_servicio(user.servicio_id)
+            return servicio_id in codigos or CODIGO_SERVICIO_MAP.get(servicio_id, servicio_id) in codigos
 
         # Por defecto, sin restricción
         return True
@@ -244,7 +255,7 @@ class RBACService:
                 return True
 
             # Normalizar servicios para comparación
-            servicio_usuario = RBACService.normalizar_servicio(user.servicio_id)
+            servicio_usuario = getattr(user, "servicio_normalizado", None) or RBACService.normalizar_servicio(user.servicio_id)
             servicio_origen = RBACService.normalizar_servicio(paciente_origen_servicio)
             servicio_destino = RBACService.normalizar_servicio(paciente_destino_servicio)
 
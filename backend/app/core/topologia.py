@@ -0,0 +1,519 @@
+"""
+Topología hospitalaria en memoria.
+
+La estructura Hospital → Servicio → Sala → Cama y sus atributos estáticos
+(código, tipo, teléfono, sala individual...) solo cambian por configuración.
+Este módulo mantiene una instantánea inmutable de esa estructura, con índices
+por id y por código, para que las rutas calientes no tengan que consultar la
+base de datos ni cargar relaciones lazy.
+
+La instantánea se reemplaza de forma atómica (se construye completa y luego
+se intercambia la referencia). Se marca como obsoleta cuando una transacción
+confirma cambios estructurales, y entre workers se sincroniza mediante un
+contador de versión en Redis.
+
+Uso:
+    topologia = obtener_topologia(session)
+    tipos = topologia.tipos_servicio_hospital(hospital_id)
+"""
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+from datetime import datetime
+import logging
+import threading
+import time
+
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.models.enums import TipoServicioEnum
+
+logger = logging.getLogger("gestion_camas.topologia")
+
+
+CLAVE_VERSION_REDIS = "topologia:version"
+
+NIVEL_COMPLEJIDAD_TIPO_SERVICIO = {
+    TipoServicioEnum.UCI: 3,
+    TipoServicioEnum.UTI: 2,
+}
+
+
+# ============================================
+# NODOS INMUTABLES
+# ============================================
+
+class _NodoInmutable:
+    """Base de los nodos: atributos fijos con __slots__ y sin mutación."""
+
+    __slots__ = ()
+
+    def __init__(self, **valores):
+        for nombre in self.__slots__:
+            object.__setattr__(self, nombre, valores.get(nombre))
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError(f"{type(self).__name__} es inmutable")
+
+    def __delattr__(self, nombre):
+        raise AttributeError(f"{type(self).__name__} es inmutable")
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(id={getattr(self, 'id', None)})"
+
+
+class HospitalNodo(_NodoInmutable):
+    __slots__ = (
+        "id", "nombre", "codigo", "es_central",
+        "telefono_urgencias", "telefono_ambulatorio", "servicio_ids",
+    )
+
+
+class ServicioNodo(_NodoInmutable):
+    __slots__ = ("id", "nombre", "codigo", "tipo", "hospital_id", "telefono", "sala_ids")
+
+
+class SalaNodo(_NodoInmutable):
+    __slots__ = ("id", "numero", "servicio_id", "hospital_id", "es_individual", "cama_ids")
+
+    @property
+    def nombre(self) -> str:
+        return f"Sala {self.numero}"
+
+
+class CamaNodo(_NodoInmutable):
+    __slots__ = ("id", "numero", "letra", "identificador", "sala_id", "servicio_id", "hospital_id")
+
+
+class CapacidadHospital(_NodoInmutable):
+    """Fila de la matriz de capacidades: qué puede recibir un hospital."""
+
+    __slots__ = (
+        "hospital_id", "complejidad_maxima", "tipos_servicio",
+        "tipos_con_sala_individual", "pediatria", "obstetricia",
+    )
+
+    def a_dict(self) -> Dict[str, object]:
+        return {
+            "hospital_id": self.hospital_id,
+            "complejidad_maxima": self.complejidad_maxima,
+            "tipos_servicio": sorted(t.value for t in self.tipos_servicio),
+            "tipos_con_sala_individual": sorted(t.value for t in self.tipos_con_sala_individual),
+            "pediatria": self.pediatria,
+            "obstetricia": self.obstetricia,
+        }
+
+
+# ============================================
+# INSTANTÁNEA
+# ============================================
+
+class Topologia:
+    """
+    Instantánea inmutable de la red hospitalaria.
+
+    Todos los índices se construyen una sola vez en ``cargar_desde_db``.
+    """
+
+    __slots__ = (
+        "version", "cargada_en",
+        "hospitales", "servicios", "salas", "camas",
+        "_hospital_por_codigo", "_cama_por_identificador",
+        "_tipos_por_hospital", "_salas_individuales_por_hospital", "_capacidades",
+    )
+
+    def __init__(
+        self,
+        hospitales: Dict[str, HospitalNodo],
+        servicios: Dict[str, ServicioNodo],
+        salas: Dict[str, SalaNodo],
+        camas: Dict[str, CamaNodo],
+        version: int = 0,
+    ):
+        self.version = version
+        self.cargada_en = datetime.utcnow()
+        self.hospitales = hospitales
+        self.servicios = servicios
+        self.salas = salas
+        self.camas = camas
+
+        self._hospital_por_codigo = {h.codigo: h for h in hospitales.values() if h.codigo}
+        self._cama_por_identificador = {c.identificador: c for c in camas.values()}
+
+        tipos: Dict[str, set] = {}
+        individuales: Dict[str, set] = {}
+        for servicio in servicios.values():
+            tipos.setdefault(servicio.hospital_id, set()).add(servicio.tipo)
+        for sala in salas.values():
+            if sala.es_individual:
+                servicio = servicios.get(sala.servicio_id)
+                if servicio:
+                    individuales.setdefault(sala.hospital_id, set()).add(servicio.tipo)
+        self._tipos_por_hospital = {h: frozenset(t) for h, t in tipos.items()}
+        self._salas_individuales_por_hospital = {h: frozenset(t) for h, t in individuales.items()}
+
+        self._capacidades = {}
+        for hospital_id in hospitales:
+            tipos_hospital = self._tipos_por_hospital.get(hospital_id, frozenset())
+            self._capacidades[hospital_id] = CapacidadHospital(
+                hospital_id=hospital_id,
+                complejidad_maxima=max(
+                    (NIVEL_COMPLEJIDAD_TIPO_SERVICIO.get(t, 1) for t in tipos_hospital), default=0
+                ),
+                tipos_servicio=tipos_hospital,
+                tipos_con_sala_individual=self._salas_individuales_por_hospital.get(hospital_id, frozenset()),
+                pediatria=TipoServicioEnum.PEDIATRIA in tipos_hospital,
+                obstetricia=TipoServicioEnum.OBSTETRICIA in tipos_hospital,
+            )
+
+    # ---------- construcción ----------
+
+    @classmethod
+    def cargar_desde_db(cls, session: Session, version: int = 0) -> "Topologia":
+        """Construye la instantánea con cuatro consultas de columnas."""
+        from app.models.hospital import Hospital
+        from app.models.servicio import Servicio
+        from app.models.sala import Sala
+        from app.models.cama import Cama
+
+        filas_hospitales = session.exec(select(
+            Hospital.id, Hospital.nombre, Hospital.codigo, Hospital.es_central,
+            Hospital.telefono_urgencias, Hospital.telefono_ambulatorio,
+        )).all()
+        filas_servicios = session.exec(select(
+            Servicio.id, Servicio.nombre, Servicio.codigo, Servicio.tipo,
+            Servicio.hospital_id, Servicio.telefono,
+        )).all()
+        filas_salas = session.exec(select(
+            Sala.id, Sala.numero, Sala.servicio_id, Sala.es_individual,
+        )).all()
+        filas_camas = session.exec(select(
+            Cama.id, Cama.numero, Cama.letra, Cama.identificador, Cama.sala_id,
+        ).order_by(Cama.identificador)).all()
+
+        servicios_por_hospital: Dict[str, list] = {}
+        for fila in filas_servicios:
+            servicios_por_hospital.setdefault(fila[4], []).append(fila[0])
+        hospital_de_servicio = {fila[0]: fila[4] for fila in filas_servicios}
+
+        salas_por_servicio: Dict[str, list] = {}
+        for fila in filas_salas:
+            salas_por_servicio.setdefault(fila[2], []).append(fila[0])
+        servicio_de_sala = {fila[0]: fila[2] for fila in filas_salas}
+
+        camas_por_sala: Dict[str, list] = {}
+        for fila in filas_camas:
+            camas_por_sala.setdefault(fila[4], []).append(fila[0])
+
+        hospitales = {
+            f[0]: HospitalNodo(
+                id=f[0], nombre=f[1], codigo=f[2], es_central=f[3],
+                telefono_urgencias=f[4], telefono_ambulatorio=f[5],
+                servicio_ids=tuple(servicios_por_hospital.get(f[0], ())),
+            )
+            for f in filas_hospitales
+        }
+        servicios = {
+            f[0]: ServicioNodo(
+                id=f[0], nombre=f[1], codigo=f[2], tipo=f[3], hospital_id=f[4],
+                telefono=f[5], sala_ids=tuple(salas_por_servicio.get(f[0], ())),
+            )
+            for f in filas_servicios
+        }
+        salas = {
+            f[0]: SalaNodo(
+                id=f[0], numero=f[1], servicio_id=f[2],
+                hospital_id=hospital_de_servicio.get(f[2]),
+                es_individual=f[3],
+                cama_ids=tuple(camas_por_sala.get(f[0], ())),
+            )
+            for f in filas_salas
+        }
+        camas = {}
+        for f in filas_camas:
+            servicio_id = servicio_de_sala.get(f[4])
+            camas[f[0]] = CamaNodo(
+                id=f[0], numero=f[1], letra=f[2], identificador=f[3], sala_id=f[4],
+                servicio_id=servicio_id,
+                hospital_id=hospital_de_servicio.get(servicio_id),
+            )
+
+        return cls(hospitales, servicios, salas, camas, version=version)
+
+    # ---------- hospitales ----------
+
+    def hospital(self, hospital_id: str) -> Optional[HospitalNodo]:
+        return self.hospitales.get(hospital_id)
+
+    def hospital_por_codigo(self, codigo: str) -> Optional[HospitalNodo]:
+        return self._hospital_por_codigo.get(codigo)
+
+    def resolver_hospital_id(self, valor: Optional[str]) -> Optional[str]:
+        """
+        Convierte un UUID, código corto ("PM") o código largo ("puerto_montt")
+        al UUID del hospital. Retorna None si no se reconoce.
+        """
+        if not valor:
+            return None
+        if valor in self.hospitales:
+            return valor
+        # Import diferido: rbac_service depende de este módulo
+        from app.core.rbac_service import CODIGO_HOSPITAL_MAP
+        codigo = CODIGO_HOSPITAL_MAP.get(valor, valor)
+        hospital = self._hospital_por_codigo.get(codigo)
+        return hospital.id if hospital else None
+
+    # ---------- servicios ----------
+
+    def servicio(self, servicio_id: str) -> Optional[ServicioNodo]:
+        return self.servicios.get(servicio_id)
+
+    def nombre_servicio(self, servicio_id: Optional[str], por_defecto: str = "Desconocido") -> str:
+        servicio = self.servicios.get(servicio_id) if servicio_id else None
+        return servicio.nombre if servicio else por_defecto
+
+    def servicios_de_hospital(self, hospital_id: Optional[str] = None) -> Tuple[ServicioNodo, ...]:
+        if hospital_id is None:
+            return tuple(self.servicios.values())
+        hospital = self.hospitales.get(hospital_id)
+        if not hospital:
+            return ()
+        return tuple(self.servicios[s] for s in hospital.servicio_ids)
+
+    def tipos_servicio_hospital(self, hospital_id: str) -> FrozenSet[TipoServicioEnum]:
+        return self._tipos_por_hospital.get(hospital_id, frozenset())
+
+    def complejidad_maxima_hospital(self, hospital_id: str) -> int:
+        """Nivel máximo de complejidad del hospital (0 sin servicios, 1-3)."""
+        capacidad = self._capacidades.get(hospital_id)
+        return capacidad.complejidad_maxima if capacidad else 0
+
+    def tiene_sala_individual(self, hospital_id: str, tipos: Iterable[TipoServicioEnum]) -> bool:
+        """Indica si el hospital tiene salas individuales en alguno de los tipos."""
+        disponibles = self._salas_individuales_por_hospital.get(hospital_id, frozenset())
+        return any(t in disponibles for t in tipos)
+
+    # ---------- capacidades ----------
+
+    def capacidad_hospital(self, hospital_id: str) -> Optional[CapacidadHospital]:
+        return self._capacidades.get(hospital_id)
+
+    def matriz_capacidades(self) -> Dict[str, CapacidadHospital]:
+        """Capacidad de cada hospital de la red, por id."""
+        return dict(self._capacidades)
+
+    # ---------- salas y camas ----------
+
+    def sala(self, sala_id: str) -> Optional[SalaNodo]:
+        return self.salas.get(sala_id)
+
+    def cama(self, cama_id: str) -> Optional[CamaNodo]:
+        return self.camas.get(cama_id)
+
+    def cama_por_identificador(self, identificador: str) -> Optional[CamaNodo]:
+        return self._cama_por_identificador.get(identificador)
+
+    def servicio_de_cama(self, cama_id: Optional[str]) -> Optional[ServicioNodo]:
+        cama = self.camas.get(cama_id) if cama_id else None
+        return self.servicios.get(cama.servicio_id) if cama else None
+
+    def hospital_de_cama(self, cama_id: Optional[str]) -> Optional[str]:
+        cama = self.camas.get(cama_id) if cama_id else None
+        return cama.hospital_id if cama else None
+
+    def camas_de_hospital(self, hospital_id: str) -> Tuple[CamaNodo, ...]:
+        return tuple(c for c in self.camas.values() if c.hospital_id == hospital_id)
+
+    def resumen(self) -> Dict[str, object]:
+        return {
+            "version": self.version,
+            "cargada_en": self.cargada_en.isoformat(),
+            "hospitales": len(self.hospitales),
+            "servicios": len(self.servicios),
+            "salas": len(self.salas),
+            "camas": len(self.camas),
+        }
+
+
+# ============================================
+# GESTOR DE LA INSTANTÁNEA
+# ============================================
+
+class GestorTopologia:
+    """
+    Mantiene la instantánea vigente y la recarga cuando queda obsoleta.
+    """
+
+    def __init__(self):
+        self._actual: Optional[Topologia] = None
+        self._obsoleta = True
+        self._lock = threading.Lock()
+        # Cada invalidación incrementa la generación; recargar() solo marca
+        # vigente lo cargado si no hubo invalidaciones durante la carga
+        self._generacion = 0
+        self._lock_generacion = threading.Lock()
+        self._version_local = 0
+        self._version_remota: Optional[int] = None
+        self._ultima_verificacion = 0.0
+
+    @property
+    def actual(self) -> Optional[Topologia]:
+        """Instantánea vigente (puede ser None si aún no se cargó)."""
+        if self._obsoleta:
+            return None
+        return self._actual
+
+    def obtener(self, session: Session) -> Topologia:
+        """
+        Retorna la instantánea vigente, recargándola con ``session`` si está
+        obsoleta o si otro worker publicó una versión más nueva.
+        """
+        self._verificar_version_remota()
+        topologia = self._actual
+        if topologia is not None and not self._obsoleta:
+            return topologia
+        return self.recargar(session)
+
+    def recargar(self, session: Session) -> Topologia:
+        """Reconstruye la instantánea y la publica de forma atómica."""
+        with self._lock:
+            generacion = self._generacion
+            self._version_local += 1
+            nueva = Topologia.cargar_desde_db(session, version=self._version_local)
+            with self._lock_generacion:
+                self._actual = nueva
+                # Una invalidación concurrente deja la instantánea obsoleta
+                self._obsoleta = self._generacion != generacion
+        logger.info(
+            f"🗺️  Topología cargada v{nueva.version}: {len(nueva.hospitales)} hospitales, "
+            f"{len(nueva.servicios)} servicios, {len(nueva.camas)} camas"
+        )
+        return nueva
+
+    def invalidar(self, publicar: bool = True) -> None:
+        """Marca la instantánea como obsoleta (y avisa a otros workers)."""
+        self._marcar_obsoleta()
+        if publicar:
+            redis_client = self._redis()
+            if redis_client is not None:
+                try:
+                    self._version_remota = redis_client.incr(CLAVE_VERSION_REDIS)
+                except Exception as e:
+                    logger.warning(f"⚠️  No se pudo publicar versión de topología: {e}")
+
+    def _marcar_obsoleta(self) -> None:
+        with self._lock_generacion:
+            self._generacion += 1
+            self._obsoleta = True
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._actual = None
+            self._marcar_obsoleta()
+
+    @staticmethod
+    def _redis():
+        from app.core.database import get_redis
+        return get_redis()
+
+    def _verificar_version_remota(self) -> None:
+        ahora = time.monotonic()
+        if ahora - self._ultima_verificacion < settings.TOPOLOGIA_VERIFICAR_SEGUNDOS:
+            return
+        self._ultima_verificacion = ahora
+        redis_client = self._redis()
+        if redis_client is None:
+            return
+        try:
+            valor = redis_client.get(CLAVE_VERSION_REDIS)
+        except Exception:
+            return
+        version = int(valor) if valor else 0
+        if self._version_remota is not None and version != self._version_remota:
+            self._marcar_obsoleta()
+        self._version_remota = version
+
+
+gestor_topologia = GestorTopologia()
+
+
+def obtener_topologia(session: Session) -> Topologia:
+    """Instantánea vigente de la topología (la carga si hace falta)."""
+    return gestor_topologia.obtener(session)
+
+
+def topologia_actual() -> Optional[Topologia]:
+    """Instantánea vigente sin acceso a BD; None si no está cargada."""
+    return gestor_topologia.actual
+
+
+def invalidar_topologia() -> None:
+    """Marca la topología como obsoleta para recargarla en el próximo uso."""
+    gestor_topologia.invalidar()
+
+
+# ============================================
+# INVALIDACIÓN POR CAMBIOS ESTRUCTURALES
+# ============================================
+
+_CLAVE_CAMBIO_TOPOLOGIA = "_topologia_modificada"
+
+# Atributos que forman parte de la topología, por modelo. El estado operativo
+# (estado de cama, sexo asignado de sala...) no invalida la instantánea.
+_ATRIBUTOS_ESTRUCTURALES = {
+    "Hospital": ("nombre", "codigo", "es_central", "telefono_urgencias", "telefono_ambulatorio"),
+    "Servicio": ("nombre", "codigo", "tipo", "hospital_id", "telefono"),
+    "Sala": ("numero", "servicio_id", "es_individual"),
+    "Cama": ("numero", "letra", "identificador", "sala_id"),
+}
+
+
+def _es_cambio_estructural(obj, nuevo_o_eliminado: bool) -> bool:
+    from app.models.hospital import Hospital
+    from app.models.servicio import Servicio
+    from app.models.sala import Sala
+    from app.models.cama import Cama
+
+    if not isinstance(obj, (Hospital, Servicio, Sala, Cama)):
+        return False
+    if nuevo_o_eliminado:
+        return True
+    estado = sa_inspect(obj)
+    return any(
+        estado.attrs[a].history.has_changes()
+        for a in _ATRIBUTOS_ESTRUCTURALES[type(obj).__name__]
+    )
+
+
+def _after_flush(session: OrmSession, flush_context) -> None:
+    if session.info.get(_CLAVE_CAMBIO_TOPOLOGIA):
+        return
+    for obj in list(session.new) + list(session.deleted):
+        if _es_cambio_estructural(obj, True):
+            session.info[_CLAVE_CAMBIO_TOPOLOGIA] = True
+            return
+    for obj in session.dirty:
+        if _es_cambio_estructural(obj, False):
+            session.info[_CLAVE_CAMBIO_TOPOLOGIA] = True
+            return
+
+
+def _after_commit(session: OrmSession) -> None:
+    if session.info.pop(_CLAVE_CAMBIO_TOPOLOGIA, False):
+        invalidar_topologia()
+
+
+def _after_rollback(session: OrmSession, previous_transaction) -> None:
+    session.info.pop(_CLAVE_CAMBIO_TOPOLOGIA, None)
+
+
+def registrar_invalidacion_topologia() -> None:
+    """Registra los listeners de sesión. Es idempotente."""
+    if not event.contains(OrmSession, "after_flush", _after_flush):
+        event.listen(OrmSession, "after_flush", _after_flush)
+        event.listen(OrmSession, "after_commit", _after_commit)
+        event.listen(OrmSession, "after_soft_rollback", _after_rollback)
+
+
+registrar_invalidacion_topologia()
@@ -0,0 +1,255 @@
+"""
+Versiones de recursos para GET condicionales (ETag / If-None-Match).
+
+Cada tag de entidad del caché de respuestas (``hospital:<id>``,
+``pacientes:<id>``, ``hospitales``, ``estructura``...) tiene un contador de
+versión que se incrementa al confirmar una transacción que lo afecta (los
+mismos listeners ORM que invalidan el caché). Los endpoints de lectura que
+los clientes vuelven a pedir tras cada evento ``reload`` calculan un ETag
+fuerte con las versiones de sus tags, el alcance RBAC del usuario y los
+query params: si coincide con ``If-None-Match`` responden 304 sin ejecutar
+el endpoint, leyendo solo las versiones.
+
+Almacenamiento:
+- Redis (HINCRBY sobre un hash): compartido entre workers.
+- Memoria: solo con CACHE_BACKEND=memoria (un proceso, desarrollo y tests).
+  Con CACHE_BACKEND=redis y Redis caído los ETag se desactivan: un contador
+  local no vería las escrituras de otros workers y daría 304 obsoletos.
+
+Cada almacén tiene una época aleatoria que forma parte del ETag, para que
+un reinicio de los contadores no haga coincidir ETags antiguos.
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import hashlib
+import logging
+import threading
+import time
+import uuid
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlmodel import Session
+
+from app.config import settings
+from app.core.auth_dependencies import get_current_user
+from app.core.database import get_session
+
+logger = logging.getLogger("gestion_camas.cache")
+
+
+CLAVE_VERSIONES_REDIS = "versiones:recursos"
+CLAVE_EPOCA_REDIS = "versiones:epoca"
+
+
+# ============================================
+# ALMACENES
+# ============================================
+
+class MemoriaVersiones:
+    """Contadores en memoria del proceso."""
+
+    def __init__(self):
+        self.epoca = uuid.uuid4().hex[:12]
+        self._versiones: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, claves: List[str]) -> List[int]:
+        with self._lock:
+            return [self._versiones.get(c, 0) for c in claves]
+
+    def incrementar(self, claves: Iterable[str]) -> None:
+        with self._lock:
+            for clave in claves:
+                self._versiones[clave] = self._versiones.get(clave, 0) + 1
+
+
+class RedisVersiones:
+    """Contadores en un hash de Redis, compartidos entre workers."""
+
+    def __init__(self, client):
+        self.client = client
+        self.client.set(CLAVE_EPOCA_REDIS, uuid.uuid4().hex[:12], nx=True)
+        self.epoca = self.client.get(CLAVE_EPOCA_REDIS)
+
+    def obtener(self, claves: List[str]) -> List[int]:
+        return [int(v) if v else 0 for v in self.client.hmget(CLAVE_VERSIONES_REDIS, claves)]
+
+    def incrementar(self, claves: Iterable[str]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for clave in claves:
+            pipe.hincrby(CLAVE_VERSIONES_REDIS, clave, 1)
+        pipe.execute()
+
+
+# ============================================
+# VERSIONES DE RECURSOS
+# ============================================
+
+class VersionesRecursos:
+    """
+    Contadores de versión por tag y métricas de renders evitados.
+    """
+
+    def __init__(self):
+        self._almacen = None
+        self._configurado = False
+        self._lock = threading.Lock()
+        self._contadores: Dict[str, Dict[str, int]] = {}
+
+    # ---------- almacén ----------
+
+    @property
+    def almacen(self):
+        if self._almacen is None and not self._configurado:
+            # Se reintenta en cada uso mientras Redis no esté disponible
+            self._almacen = self._crear_almacen_por_defecto()
+        return self._almacen
+
+    def configurar_almacen(self, almacen) -> None:
+        """Reemplaza el almacén (None deshabilita los ETag). Usado en tests."""
+        self._almacen = almacen
+        self._configurado = True
+        self.reiniciar_contadores()
+
+    @staticmethod
+    def _crear_almacen_por_defecto():
+        if not settings.ETAG_HABILITADO:
+            return None
+        tipo = settings.CACHE_BACKEND
+        if tipo == "memoria":
+            return MemoriaVersiones()
+        if tipo == "redis":
+            from app.core.database import get_redis
+            client = get_redis()
+            if client is not None:
+                try:
+                    return RedisVersiones(client)
+                except Exception as e:
+                    logger.warning(f"⚠️  No se pudo iniciar versiones en Redis: {e}")
+        return None
+
+    @property
+    def habilitado(self) -> bool:
+        return self.almacen is not None
+
+    # ---------- versiones ----------
+
+    def incrementar(self, tags: Iterable[str]) -> None:
+        """Incrementa la versión de los tags (al confirmar una transacción)."""
+        almacen = self.almacen
+        tags = [t for t in tags if t]
+        if almacen is None or not tags:
+            return
+        try:
+            almacen.incrementar(tags)
+        except Exception as e:
+            logger.warning(f"⚠️  No se pudieron incrementar versiones {tags}: {e}")
+
+    def etag(self, recurso: str, tags: List[str], extra: str = "") -> Optional[str]:
+        """
+        ETag fuerte del recurso según las versiones actuales de sus tags.
+        None si las versiones no están disponibles.
+        """
+        almacen = self.almacen
+        if almacen is None:
+            return None
+        try:
+            versiones = almacen.obtener(tags)
+        except Exception as e:
+            logger.warning(f"⚠️  No se pudieron leer versiones {tags}: {e}")
+            return None
+        firma = f"{recurso}|{almacen.epoca}|{','.join(map(str, versiones))}|{extra}"
+        return f'"{hashlib.sha1(firma.encode("utf-8")).hexdigest()}"'
+
+    # ---------- métricas ----------
+
+    def registrar(self, recurso: str, evitado: bool) -> None:
+        campo = "renders_evitados" if evitado else "renders_completos"
+        with self._lock:
+            contador = self._contadores.setdefault(recurso, {"renders_evitados": 0, "renders_completos": 0})
+            contador[campo] += 1
+
+    def reiniciar_contadores(self) -> None:
+        with self._lock:
+            self._contadores = {}
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Renders evitados (304) y completos, totales y por recurso."""
+        with self._lock:
+            por_recurso = {k: dict(v) for k, v in self._contadores.items()}
+        evitados = sum(v["renders_evitados"] for v in por_recurso.values())
+        completos = sum(v["renders_completos"] for v in por_recurso.values())
+        total = evitados + completos
+        return {
+            "almacen": type(self._almacen).__name__ if self._almacen is not None else None,
+            "renders_evitados": evitados,
+            "renders_completos": completos,
+            "ratio_evitados": round(evitados / total, 4) if total else 0.0,
+            "por_recurso": por_recurso,
+        }
+
+
+versiones_recursos = VersionesRecursos()
+
+
+# ============================================
+# DEPENDENCIA DE ENDPOINTS
+# ============================================
+
+def _coincide(si_no_coincide: str, etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110 §13.1.2)."""
+    candidatos = [c.strip() for c in si_no_coincide.split(",")]
+    return "*" in candidatos or any(c.removeprefix("W/") == etag for c in candidatos)
+
+
+def etag_condicional(
+    recurso: str,
+    tags: Callable[[Dict[str, Any], Session], List[str]],
+    granularidad_segundos: Optional[int] = None,
+) -> Callable:
+    """
+    Dependencia de GET condicional para endpoints de lectura.
+
+    Calcula el ETag antes de ejecutar el endpoint; si coincide con
+    If-None-Match responde 304 (HTTPException sin cuerpo). Si no, lo agrega
+    a la respuesta con ``Cache-Control: private, no-cache``.
+
+    Args:
+        recurso: Nombre lógico del recurso (métricas)
+        tags: Función ``(path_params, session) -> tags`` de los que depende
+              la respuesta
+        granularidad_segundos: Para respuestas con campos que dependen del
+              reloj (minutos de espera): el ETag cambia también en cada
+              intervalo, así que a lo sumo se renderiza una vez por intervalo
+
+    Uso:
+        @router.get("/{hospital_id}/camas", dependencies=[Depends(
+            etag_condicional("camas", lambda p, s: [tag_hospital(p["hospital_id"])])
+        )])
+    """
+    def dependencia(
+        request: Request,
+        response: Response,
+        current_user=Depends(get_current_user),
+        session: Session = Depends(get_session),
+    ) -> None:
+        if not versiones_recursos.habilitado:
+            return
+        from app.core.cache import _alcance_rbac
+
+        extra = f"{_alcance_rbac(current_user)}|{request.url.query}"
+        if granularidad_segundos:
+            extra += f"|{int(time.time() // granularidad_segundos)}"
+        etag = versiones_recursos.etag(recurso, tags(request.path_params, session), extra)
+        if etag is None:
+            return
+
+        cabeceras = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        si_no_coincide = request.headers.get("if-none-match")
+        if si_no_coincide and _coincide(si_no_coincide, etag):
+            versiones_recursos.registrar(recurso, evitado=True)
+            raise HTTPException(status_code=304, headers=cabeceras)
+
+        versiones_recursos.registrar(recurso, evitado=False)
+        response.headers.update(cabeceras)
+
+    return dependencia
@@ -22,6 +22,11 @@ from app.models.cama import Cama
 from app.models.paciente import Paciente
 from app.models.evento_paciente import EventoPaciente
 from app.models.configuracion import ConfiguracionSistema, LogActividad
+from app.models.outbox import NotificacionOutbox, SecuenciaOutbox
+from app.models.estadistica_diaria import EstadisticaDiaria, CoberturaRollup
+from app.models.ocupacion import OcupacionServicio, OcupacionHoraria, CoberturaOcupacionHoraria
+from app.models.estancia_servicio import EstanciaServicio
+from app.models.documento import DocumentoPendienteBorrado
 from app.models.usuario import Usuario, RefreshToken, RolEnum, PermisoEnum
 
 __all__ = [
@@ -45,4 +50,13 @@ __all__ = [
     "EventoPaciente",
     "ConfiguracionSistema",
     "LogActividad",
+    "NotificacionOutbox",
+    "SecuenciaOutbox",
+    "EstadisticaDiaria",
+    "CoberturaRollup",
+    "OcupacionServicio",
+    "OcupacionHoraria",
+    "CoberturaOcupacionHoraria",
+    "EstanciaServicio",
+    "DocumentoPendienteBorrado",
 ]
\ No newline at end of file
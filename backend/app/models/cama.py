@@ -2,6 +2,7 @@
 Modelo de Cama.
 """
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index, text
 from typing import Optional, List, TYPE_CHECKING
 from datetime import datetime
 import uuid
@@ -21,6 +22,22 @@ class Cama(SQLModel, table=True):
     Gestiona el estado y asignaciones de pacientes.
     """
     __tablename__ = "cama"
+
+    # Índices parciales (ver migración 004)
+    __table_args__ = (
+        Index(
+            "ix_cama_en_limpieza",
+            "limpieza_inicio",
+            postgresql_where=text("estado = 'EN_LIMPIEZA'"),
+            sqlite_where=text("estado = 'EN_LIMPIEZA'"),
+        ),
+        Index(
+            "ix_cama_libre_desde",
+            "estado_updated_at",
+            postgresql_where=text("estado = 'LIBRE'"),
+            sqlite_where=text("estado = 'LIBRE'"),
+        ),
+    )
     
     id: str = Field(
         default_factory=lambda: str(uuid.uuid4()), 
@@ -0,0 +1,22 @@
+"""
+Modelo de documentos pendientes de borrado.
+"""
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+
+
+class DocumentoPendienteBorrado(SQLModel, table=True):
+    """
+    Contenido de documento (por hash) que dejó de usar algún paciente.
+
+    Se registra en la misma transacción que reemplaza el documento; el
+    barredor de documentos (ver documentos_service) vuelve a contar las
+    referencias y solo borra el contenido si nadie lo usa. Una subida del
+    mismo contenido elimina la marca antes de guardar el archivo.
+    """
+    __tablename__ = "documento_pendiente_borrado"
+
+    # SHA-256 del contenido (clave en el backend de documentos)
+    clave: str = Field(primary_key=True)
+
+    marcado_at: datetime = Field(default_factory=datetime.utcnow, index=True)
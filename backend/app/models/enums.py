@@ -93,6 +93,14 @@ class EstadoCamaEnum(str, Enum):
     RESERVADA = "RESERVADA"
 
 
+class OperacionCamaEnum(str, Enum):
+    """Transición de estado aplicable en operaciones masivas sobre camas."""
+    BLOQUEAR = "BLOQUEAR"
+    DESBLOQUEAR = "DESBLOQUEAR"
+    INICIAR_LIMPIEZA = "INICIAR_LIMPIEZA"
+    FINALIZAR_LIMPIEZA = "FINALIZAR_LIMPIEZA"
+
+
 class EstadoListaEsperaEnum(str, Enum):
     """Estado del paciente en lista de espera."""
     ESPERANDO = "ESPERANDO"
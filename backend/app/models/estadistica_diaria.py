@@ -0,0 +1,72 @@
+"""
+Modelos de agregados diarios de estadísticas (rollups).
+"""
+from sqlmodel import SQLModel, Field
+from sqlalchemy import UniqueConstraint
+from typing import Optional
+from datetime import datetime
+
+
+class EstadisticaDiaria(SQLModel, table=True):
+    """
+    Agregado de eventos por día clínico.
+
+    Cada fila acumula, para una combinación (día clínico, hospital, servicio
+    origen, servicio destino, tipo de evento, métrica):
+    - metrica "eventos": cantidad de eventos del tipo.
+    - otras métricas (p. ej. "espera_cama"): duraciones que terminan con
+      ese tipo de evento (cantidad, suma, suma de cuadrados, mínimo, máximo).
+
+    Se mantiene de forma incremental al escribir eventos y se reconstruye
+    con scripts/backfill_estadisticas.py.
+    """
+    __tablename__ = "estadistica_diaria"
+
+    __table_args__ = (
+        UniqueConstraint(
+            "dia_clinico", "hospital_id", "servicio_origen_id", "servicio_destino_id",
+            "tipo_evento", "metrica",
+            name="uq_estadistica_diaria_clave",
+        ),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    # ============================================
+    # CLAVE
+    # ============================================
+    dia_clinico: datetime = Field(index=True)
+    hospital_id: str = Field(index=True)
+    # "" cuando el evento no tiene servicio (la clave única no admite NULL)
+    servicio_origen_id: str = Field(default="")
+    servicio_destino_id: str = Field(default="")
+    tipo_evento: str
+    metrica: str = Field(default="eventos")
+
+    # ============================================
+    # AGREGADOS
+    # ============================================
+    cantidad: int = Field(default=0)
+    duracion_suma: Optional[float] = Field(default=None)
+    duracion_suma_cuadrados: Optional[float] = Field(default=None)
+    duracion_min: Optional[float] = Field(default=None)
+    duracion_max: Optional[float] = Field(default=None)
+
+    def __repr__(self) -> str:
+        return (
+            f"EstadisticaDiaria(dia={self.dia_clinico}, hospital={self.hospital_id}, "
+            f"tipo={self.tipo_evento}, metrica={self.metrica}, cantidad={self.cantidad})"
+        )
+
+
+class CoberturaRollup(SQLModel, table=True):
+    """
+    Desde qué día clínico los rollups están completos.
+
+    Los días anteriores (o sin cobertura) se calculan desde eventos crudos.
+    """
+    __tablename__ = "cobertura_rollup"
+
+    id: int = Field(default=1, primary_key=True)
+    desde: datetime
+    actualizado_at: datetime = Field(default_factory=datetime.utcnow)
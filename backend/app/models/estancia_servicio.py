@@ -0,0 +1,49 @@
+"""
+Modelo de estancia de un paciente en un servicio.
+Materializa la trazabilidad que antes se reconstruía desde los eventos.
+"""
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
+from typing import Optional
+from datetime import datetime
+
+
+class EstanciaServicio(SQLModel, table=True):
+    """
+    Estancia de un paciente en un servicio.
+
+    Empieza con un evento de llegada con servicio destino (cama asignada,
+    traslado o derivación completada) y termina con el siguiente evento de
+    borde del paciente (llegada a otro servicio o egreso). salida es NULL
+    mientras la estancia está en curso.
+
+    La mantiene el escritor de eventos (ver estancias_service);
+    scripts/reconstruir_estancias.py la recalcula desde evento_paciente.
+    """
+    __tablename__ = "estancia_servicio"
+
+    __table_args__ = (
+        Index("ix_estancia_servicio_paciente_entrada", "paciente_id", "entrada"),
+        Index("ix_estancia_servicio_servicio_salida", "servicio_id", "salida"),
+        Index("ix_estancia_servicio_hospital_salida", "hospital_id", "salida"),
+    )
+
+    # Sin clave foránea: evento_paciente puede estar particionada (PK id, timestamp)
+    evento_entrada_id: str = Field(primary_key=True)
+    paciente_id: str = Field(foreign_key="paciente.id")
+    hospital_id: str
+    servicio_id: str
+    cama_id: Optional[str] = Field(default=None)
+
+    tipo_entrada: str
+    entrada: datetime
+    evento_salida_id: Optional[str] = Field(default=None)
+    tipo_salida: Optional[str] = Field(default=None)
+    salida: Optional[datetime] = Field(default=None)
+    duracion_segundos: Optional[float] = Field(default=None)
+
+    def __repr__(self) -> str:
+        return (
+            f"EstanciaServicio(paciente={self.paciente_id}, servicio={self.servicio_id}, "
+            f"entrada={self.entrada}, salida={self.salida})"
+        )
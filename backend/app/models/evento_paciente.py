@@ -3,6 +3,7 @@ Modelo de Evento de Paciente.
 Registra todos los cambios de estado y eventos importantes del paciente.
 """
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from typing import Optional, TYPE_CHECKING
 from datetime import datetime, timedelta
 import uuid
@@ -26,6 +27,12 @@ class EventoPaciente(SQLModel, table=True):
     """
     __tablename__ = "evento_paciente"
 
+    # Índices compuestos (ver migración 004)
+    __table_args__ = (
+        Index("ix_evento_paciente_tipo_timestamp", "tipo_evento", "timestamp"),
+        Index("ix_evento_paciente_paciente_timestamp", "paciente_id", "timestamp"),
+    )
+
     id: str = Field(
         default_factory=lambda: str(uuid.uuid4()),
         primary_key=True
@@ -0,0 +1,68 @@
+"""
+Modelos de ocupación: contadores actuales por servicio y series horarias
+históricas.
+"""
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+
+
+class OcupacionServicio(SQLModel, table=True):
+    """
+    Cantidad de camas de un servicio en cada estado.
+
+    Se mantiene en la misma transacción que cambia el estado de las camas
+    (ver ocupacion_service) y se reconcilia periódicamente contra la tabla
+    cama. Hospital y red se obtienen sumando servicios.
+    """
+    __tablename__ = "ocupacion_servicio"
+
+    servicio_id: str = Field(primary_key=True)
+    estado: str = Field(primary_key=True)
+    hospital_id: str = Field(index=True)
+    cantidad: int = Field(default=0)
+    actualizado_at: datetime = Field(default_factory=datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return f"OcupacionServicio(servicio={self.servicio_id}, estado={self.estado}, cantidad={self.cantidad})"
+
+
+class OcupacionHoraria(SQLModel, table=True):
+    """
+    Ocupación reconstruida desde eventos para una hora de un día clínico
+    cerrado.
+
+    nivel es "servicio", "hospital" o "red" (grupo_id vacío). promedio es la
+    cantidad de camas ocupadas ponderada por tiempo dentro de la hora y
+    maximo el pico. Solo se guardan horas con ocupación (sin fila = 0).
+    Caché de ocupacion_historica; se invalida si llegan eventos atrasados.
+    """
+    __tablename__ = "ocupacion_horaria"
+
+    # Clave (nivel, hora, grupo): las lecturas son rangos de horas de un nivel
+    nivel: str = Field(primary_key=True)
+    hora: datetime = Field(primary_key=True)
+    grupo_id: str = Field(primary_key=True)
+    hospital_id: Optional[str] = Field(default=None)
+    promedio: float = Field(default=0.0)
+    maximo: int = Field(default=0)
+
+    def __repr__(self) -> str:
+        return (
+            f"OcupacionHoraria(nivel={self.nivel}, grupo={self.grupo_id}, hora={self.hora}, "
+            f"promedio={self.promedio}, maximo={self.maximo})"
+        )
+
+
+class CoberturaOcupacionHoraria(SQLModel, table=True):
+    """
+    Rango [desde, hasta) de días clínicos ya calculados en ocupacion_horaria.
+
+    Es contiguo: las consultas fuera del rango lo extienden.
+    """
+    __tablename__ = "cobertura_ocupacion_horaria"
+
+    id: int = Field(default=1, primary_key=True)
+    desde: datetime
+    hasta: datetime
+    actualizado_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,83 @@
+"""
+Modelos del outbox transaccional de notificaciones.
+"""
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index, text
+from typing import Optional
+from datetime import datetime
+import json
+
+
+class NotificacionOutbox(SQLModel, table=True):
+    """
+    Notificación WebSocket pendiente de publicar.
+
+    Se escribe en la misma transacción que el cambio de estado que la
+    origina, de modo que solo se publica si ese cambio se confirma.
+    El despachador la publica y la marca como publicada.
+    """
+    __tablename__ = "notificacion_outbox"
+
+    __table_args__ = (
+        Index(
+            "ix_notificacion_outbox_pendientes",
+            "id",
+            postgresql_where=text("publicado_at IS NULL AND fallido_at IS NULL"),
+            sqlite_where=text("publicado_at IS NULL AND fallido_at IS NULL"),
+        ),
+    )
+
+    # Autoincremental: define el orden de publicación
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    # Hospital al que pertenece la notificación (clave de la secuencia)
+    hospital_id: Optional[str] = Field(default=None, index=True)
+
+    # True: solo a suscriptores del hospital; False: a todos los clientes
+    solo_hospital: bool = Field(default=False)
+
+    # Mensaje serializado como JSON
+    payload: str
+
+    # Número de secuencia por hospital, asignado al publicar
+    secuencia: Optional[int] = Field(default=None)
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    # Momento en que un despachador la reclamó para publicarla (vence tras
+    # OUTBOX_RECLAMO_SEGUNDOS si el despachador cae antes de confirmarla)
+    reclamado_at: Optional[datetime] = Field(default=None)
+
+    publicado_at: Optional[datetime] = Field(default=None, index=True)
+    intentos: int = Field(default=0)
+
+    # Descartada tras OUTBOX_MAX_INTENTOS envíos fallidos: el despachador la
+    # salta (queda para diagnóstico; su secuencia no se vuelve a usar)
+    fallido_at: Optional[datetime] = Field(default=None)
+
+    def get_payload(self) -> dict:
+        """Obtiene el mensaje como diccionario."""
+        try:
+            return json.loads(self.payload)
+        except json.JSONDecodeError:
+            return {}
+
+    def __repr__(self) -> str:
+        return f"NotificacionOutbox(id={self.id}, hospital_id={self.hospital_id}, secuencia={self.secuencia})"
+
+
+class SecuenciaOutbox(SQLModel, table=True):
+    """
+    Último número de secuencia publicado por hospital.
+
+    Los clientes usan la secuencia para detectar huecos y descartar
+    duplicados (la entrega es al menos una vez).
+    """
+    __tablename__ = "secuencia_outbox"
+
+    # hospital_id, o "global" para notificaciones sin hospital
+    clave: str = Field(primary_key=True)
+    ultima: int = Field(default=0)
+
+    def __repr__(self) -> str:
+        return f"SecuenciaOutbox(clave={self.clave}, ultima={self.ultima})"
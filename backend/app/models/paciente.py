@@ -2,6 +2,7 @@
 Modelo de Paciente.
 """
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index, text
 from typing import Optional, TYPE_CHECKING
 from datetime import datetime
 import uuid
@@ -30,6 +31,53 @@ class Paciente(SQLModel, table=True):
     Contiene toda la información clínica y de asignación.
     """
     __tablename__ = "paciente"
+
+    # Índices compuestos/parciales (ver migración 004)
+    __table_args__ = (
+        Index(
+            "ix_paciente_lista_espera_prioridad",
+            "hospital_id", text("prioridad_calculada DESC"),
+            postgresql_where=text("en_lista_espera"),
+            sqlite_where=text("en_lista_espera"),
+        ),
+        Index(
+            "ix_paciente_espera_cama_destino",
+            "hospital_id", "cama_destino_id",
+            postgresql_where=text("en_lista_espera AND cama_destino_id IS NOT NULL"),
+            sqlite_where=text("en_lista_espera AND cama_destino_id IS NOT NULL"),
+        ),
+        Index(
+            "ix_paciente_derivacion_destino_estado",
+            "derivacion_hospital_destino_id", "derivacion_estado",
+            postgresql_where=text("derivacion_hospital_destino_id IS NOT NULL"),
+            sqlite_where=text("derivacion_hospital_destino_id IS NOT NULL"),
+        ),
+        Index(
+            "ix_paciente_observacion_activa",
+            "observacion_inicio",
+            postgresql_where=text("observacion_inicio IS NOT NULL"),
+            sqlite_where=text("observacion_inicio IS NOT NULL"),
+        ),
+        Index(
+            "ix_paciente_monitorizacion_activa",
+            "monitorizacion_inicio",
+            postgresql_where=text("monitorizacion_inicio IS NOT NULL"),
+            sqlite_where=text("monitorizacion_inicio IS NOT NULL"),
+        ),
+        Index(
+            "ix_paciente_espera_oxigeno",
+            "oxigeno_desactivado_at",
+            postgresql_where=text("esperando_evaluacion_oxigeno AND oxigeno_desactivado_at IS NOT NULL"),
+            sqlite_where=text("esperando_evaluacion_oxigeno AND oxigeno_desactivado_at IS NOT NULL"),
+        ),
+        # Conteo de casos especiales por valor (ver migración 008)
+        Index(
+            "ix_paciente_casos_especiales",
+            "hospital_id", "casos_especiales",
+            postgresql_where=text("casos_especiales IS NOT NULL"),
+            sqlite_where=text("casos_especiales IS NOT NULL"),
+        ),
+    )
     
     id: str = Field(
         default_factory=lambda: str(uuid.uuid4()), 
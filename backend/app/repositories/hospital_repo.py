@@ -40,12 +40,13 @@ class HospitalRepository(BaseRepository[Hospital]):
         query = select(Hospital).where(Hospital.es_central == True)
         return self.session.exec(query).first()
     
-    def obtener_camas_hospital(self, hospital_id: str) -> List[Cama]:
+    def obtener_camas_hospital(self, hospital_id: str, filtro=None) -> List[Cama]:
         """
         Obtiene todas las camas de un hospital.
         
         Args:
             hospital_id: ID del hospital
+            filtro: Predicado adicional sobre Cama/Sala/Servicio (alcance RBAC)
         
         Returns:
             Lista de camas
@@ -57,6 +58,8 @@ class HospitalRepository(BaseRepository[Hospital]):
             .where(Servicio.hospital_id == hospital_id)
             .order_by(Cama.identificador)
         )
+        if filtro is not None:
+            query = query.where(filtro)
         return list(self.session.exec(query).all())
     
     def obtener_servicios_hospital(self, hospital_id: str) -> List[Servicio]:
@@ -1,10 +1,10 @@
 """
 Schemas de Cama.
 """
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
-from app.models.enums import EstadoCamaEnum, TipoServicioEnum, SexoEnum
+from app.models.enums import EstadoCamaEnum, OperacionCamaEnum, TipoServicioEnum, SexoEnum
 from app.schemas.paciente import PacienteResponse
 
 
@@ -40,6 +40,40 @@ class CamaBloquearRequest(BaseModel):
     bloquear: bool
 
 
+class OperacionCamasRequest(BaseModel):
+    """Una transición aplicada a las camas seleccionadas por id, sala o servicio."""
+    operacion: OperacionCamaEnum
+    cama_ids: List[str] = []
+    sala_ids: List[str] = []
+    servicio_ids: List[str] = []
+    mensaje: Optional[str] = None
+
+
+class CamasLoteRequest(BaseModel):
+    """Request para operaciones masivas sobre camas."""
+    operaciones: List[OperacionCamasRequest] = Field(..., min_length=1)
+    todo_o_nada: bool = False
+
+
+class ResultadoCamaLote(BaseModel):
+    """Resultado de una operación sobre una cama."""
+    operacion: OperacionCamaEnum
+    cama_id: str
+    exito: bool
+    identificador: Optional[str] = None
+    estado_anterior: Optional[EstadoCamaEnum] = None
+    estado_nuevo: Optional[EstadoCamaEnum] = None
+    motivo: Optional[str] = None
+
+
+class CamasLoteResponse(BaseModel):
+    """Schema de respuesta de operaciones masivas sobre camas."""
+    aplicado: bool
+    modificadas: int
+    omitidas: int
+    resultados: List[ResultadoCamaLote]
+
+
 class CamaBusquedaRequest(BaseModel):
     """Request para buscar camas disponibles."""
     hospital_id: str
@@ -2,7 +2,7 @@
 Schemas de Paciente.
 """
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from datetime import datetime
 
 from app.models.enums import (
@@ -82,6 +82,31 @@ class PacienteCreate(BaseModel):
         return v
 
 
+class PacienteLoteRequest(BaseModel):
+    """Schema para el ingreso masivo; cada fila se valida como PacienteCreate."""
+    pacientes: List[Dict[str, Any]] = Field(..., min_length=1)
+
+
+class ResultadoFilaLote(BaseModel):
+    """Resultado de una fila del ingreso masivo."""
+    indice: int
+    exito: bool
+    paciente_id: Optional[str] = None
+    run: Optional[str] = None
+    prioridad: Optional[float] = None
+    error: Optional[str] = None
+    advertencia: Optional[str] = None
+
+
+class PacienteLoteResponse(BaseModel):
+    """Schema de respuesta del ingreso masivo."""
+    total: int
+    creados: int
+    errores: int
+    por_hospital: Dict[str, int] = {}
+    resultados: List[ResultadoFilaLote]
+
+
 class PacienteUpdate(BaseModel):
     """Schema para actualizar un paciente (reevaluación)."""
     
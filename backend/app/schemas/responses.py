@@ -2,7 +2,7 @@
 Schemas de Respuestas Comunes.
 """
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 
 class MessageResponse(BaseModel):
@@ -65,6 +65,8 @@ class TiempoEstadisticaResponse(BaseModel):
     maximo: float
     minimo: float
     cantidad: int
+    # Solo si se solicitan (ej: {"p50": 3600.0, "p90": 14400.0})
+    percentiles: Optional[Dict[str, float]] = None
 
 
 class IngresosEgresosResponse(BaseModel):
@@ -78,6 +80,7 @@ class TasaOcupacionResponse(BaseModel):
     tasa_ocupacion: float
     camas_ocupadas: int
     camas_totales: int
+    por_estado: Optional[Dict[str, int]] = None
 
 
 class FlujoResponse(BaseModel):
@@ -14,9 +14,10 @@ import logging
 
 from app.models.paciente import Paciente
 from app.models.cama import Cama
-from app.models.enums import EstadoCamaEnum
+from app.models.enums import EstadoCamaEnum, TipoEventoEnum
 from app.repositories.paciente_repo import PacienteRepository
 from app.repositories.cama_repo import CamaRepository
+from app.core.outbox import encolar_broadcast, encolar_notificacion
 from app.core.exceptions import (
     ValidationError,
     PacienteNotFoundError,
@@ -25,6 +26,7 @@ from app.core.exceptions import (
 
 # NUEVO IMPORT
 from app.services.compatibilidad_service import verificar_y_actualizar_sexo_sala_al_egreso
+from app.services.evento_writer import escritor_eventos
 
 logger = logging.getLogger("gestion_camas.alta")
 
@@ -74,7 +76,16 @@ class AltaService:
             return False
         
         return True
-    
+
+    def _registrar_egreso(self, paciente: Paciente, cama_id: Optional[str]) -> None:
+        """
+        Registra el alta (cierra la hospitalización) y el egreso de la red.
+        Se insertan con el commit del cambio de estado.
+        """
+        eventos = escritor_eventos(self.session)
+        for tipo in (TipoEventoEnum.ALTA_COMPLETADA, TipoEventoEnum.EGRESO_ALTA):
+            eventos.agregar(tipo, paciente.id, paciente.hospital_id, cama_origen_id=cama_id)
+
     def iniciar_alta(self, paciente_id: str) -> ResultadoAlta:
         """
         Inicia el proceso de alta.
@@ -117,6 +128,15 @@ class AltaService:
         paciente.alta_solicitada = True
         self.session.add(paciente)
         
+        escritor_eventos(self.session).agregar(
+            TipoEventoEnum.ALTA_INICIADA, paciente.id, paciente.hospital_id,
+            cama_origen_id=cama.id,
+        )
+        encolar_broadcast(self.session, {
+            "tipo": "alta_iniciada",
+            "paciente_id": paciente_id,
+            "cama_id": cama.id
+        })
         self.session.commit()
         
         logger.info(f"Alta iniciada para {paciente.nombre}")
@@ -173,6 +193,16 @@ class AltaService:
         paciente.alta_solicitada = False
         self.session.add(paciente)
         
+        self._registrar_egreso(paciente, cama_id)
+        encolar_notificacion(
+            self.session,
+            {
+                "tipo": "alta_completada",
+                "paciente_id": paciente_id,
+                "cama_id": cama_id
+            },
+            notification_type="success"
+        )
         self.session.commit()
         
         logger.info(f"Alta ejecutada para {paciente.nombre}")
@@ -214,6 +244,14 @@ class AltaService:
         paciente.alta_solicitada = False
         self.session.add(paciente)
         
+        escritor_eventos(self.session).agregar(
+            TipoEventoEnum.ALTA_CANCELADA, paciente.id, paciente.hospital_id,
+            cama_origen_id=cama.id,
+        )
+        encolar_broadcast(self.session, {
+            "tipo": "alta_cancelada",
+            "paciente_id": paciente_id
+        })
         self.session.commit()
         
         logger.info(f"Alta cancelada para {paciente.nombre}")
@@ -254,12 +292,18 @@ class AltaService:
                 # NUEVO: Actualizar sexo de sala
                 verificar_y_actualizar_sexo_sala_al_egreso(self.session, cama)
         
+        self._registrar_egreso(paciente, cama_id)
+
         # Desasociar paciente
         paciente.cama_id = None
         paciente.cama_destino_id = None
         paciente.en_lista_espera = False
         self.session.add(paciente)
         
+        encolar_broadcast(self.session, {
+            "tipo": "egreso_manual",
+            "paciente_id": paciente_id
+        })
         self.session.commit()
         
         logger.info(f"Egreso manual para {paciente.nombre}")
@@ -0,0 +1,229 @@
+"""
+Analítica de distribución de duraciones (percentiles, histogramas, desgloses).
+
+Los promedios esconden la cola larga, que es lo que se gestiona: este módulo
+toma las duraciones emparejadas por motor_duraciones para una ventana y
+calcula percentiles, histograma y desgloses por hospital y servicio.
+
+Usa NumPy cuando está instalado (cálculo vectorizado, un arreglo por
+columna). Sin NumPy se usa una implementación en Python puro con la misma
+definición de percentil (interpolación lineal entre rangos, como
+numpy.percentile por defecto).
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlmodel import Session
+
+from app.services.motor_duraciones import METRICAS_DURACION, consulta_pares
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional
+    np = None
+
+
+PERCENTILES_POR_DEFECTO: Tuple[float, ...] = (50, 90, 95, 99)
+BINS_POR_DEFECTO = 10
+SIN_GRUPO = "sin_asignar"
+
+
+def etiqueta_percentil(p: float) -> str:
+    """50 -> "p50", 99.9 -> "p99.9"."""
+    return f"p{p:g}"
+
+
+# ============================================
+# CARGA
+# ============================================
+
+def cargar_duraciones(
+    session: Session,
+    nombre_metrica: str,
+    fecha_inicio: Optional[datetime] = None,
+    fecha_fin: Optional[datetime] = None,
+    hospital_id: Optional[str] = None,
+) -> Tuple[Any, Any, Any]:
+    """
+    Duraciones (segundos) de la ventana con el hospital y servicio del
+    evento de cierre. El servicio es el de destino si existe (llegadas) y
+    si no el de origen (salidas).
+
+    Returns:
+        (duraciones, hospitales, servicios): arreglos NumPy o listas
+    """
+    metrica = METRICAS_DURACION[nombre_metrica]
+    pares = consulta_pares(
+        metrica, session.get_bind().dialect.name, fecha_inicio, fecha_fin, hospital_id
+    ).subquery()
+    filas = session.execute(
+        select(
+            pares.c.duracion,
+            func.coalesce(pares.c.hospital_id, SIN_GRUPO),
+            func.coalesce(pares.c.servicio_destino_id, pares.c.servicio_origen_id, SIN_GRUPO),
+        )
+    ).all()
+
+    duraciones = [float(f[0]) for f in filas]
+    hospitales = [f[1] for f in filas]
+    servicios = [f[2] for f in filas]
+    if np is not None:
+        return (
+            np.asarray(duraciones, dtype=np.float64),
+            np.asarray(hospitales, dtype=object),
+            np.asarray(servicios, dtype=object),
+        )
+    return duraciones, hospitales, servicios
+
+
+# ============================================
+# CÁLCULO
+# ============================================
+
+def _percentil_lineal(ordenados: List[float], p: float) -> float:
+    k = (len(ordenados) - 1) * p / 100.0
+    inferior = int(k)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (k - inferior)
+
+
+def calcular_percentiles(valores, percentiles: Sequence[float] = PERCENTILES_POR_DEFECTO) -> Dict[str, float]:
+    """Percentiles {"p50": ..., "p90": ...} por interpolación lineal."""
+    if len(valores) == 0:
+        return {}
+    if np is not None:
+        resultado = np.percentile(np.asarray(valores, dtype=np.float64), list(percentiles))
+        return {etiqueta_percentil(p): float(v) for p, v in zip(percentiles, resultado)}
+    ordenados = sorted(valores)
+    return {etiqueta_percentil(p): _percentil_lineal(ordenados, p) for p in percentiles}
+
+
+def calcular_histograma(valores, bins: int = BINS_POR_DEFECTO) -> Dict[str, List[float]]:
+    """
+    Histograma de `bins` intervalos de igual ancho entre mínimo y máximo.
+
+    Returns:
+        {"limites": [bins + 1 valores], "conteos": [bins valores]}
+    """
+    if len(valores) == 0:
+        return {"limites": [], "conteos": []}
+    if np is not None:
+        conteos, limites = np.histogram(np.asarray(valores, dtype=np.float64), bins=bins)
+        return {"limites": [float(x) for x in limites], "conteos": [int(x) for x in conteos]}
+
+    minimo, maximo = min(valores), max(valores)
+    if minimo == maximo:
+        # Mismo criterio que numpy.histogram para rangos degenerados
+        minimo, maximo = minimo - 0.5, maximo + 0.5
+    ancho = (maximo - minimo) / bins
+    limites = [minimo + i * ancho for i in range(bins)] + [maximo]
+    conteos = [0] * bins
+    for valor in valores:
+        conteos[min(int((valor - minimo) / ancho), bins - 1)] += 1
+    return {"limites": limites, "conteos": conteos}
+
+
+def describir(
+    valores,
+    percentiles: Sequence[float] = PERCENTILES_POR_DEFECTO,
+    bins: Optional[int] = BINS_POR_DEFECTO,
+) -> Dict[str, Any]:
+    """
+    Resumen de una distribución: cantidad, promedio, mínimo, máximo,
+    desviación estándar, percentiles y (si bins) histograma.
+    """
+    cantidad = len(valores)
+    if not cantidad:
+        resumen = {"cantidad": 0, "promedio": 0, "minimo": 0, "maximo": 0, "desviacion": 0, "percentiles": {}}
+    elif np is not None:
+        arreglo = np.asarray(valores, dtype=np.float64)
+        resumen = {
+            "cantidad": cantidad,
+            "promedio": float(arreglo.mean()),
+            "minimo": float(arreglo.min()),
+            "maximo": float(arreglo.max()),
+            "desviacion": float(arreglo.std()),
+            "percentiles": calcular_percentiles(arreglo, percentiles),
+        }
+    else:
+        promedio = sum(valores) / cantidad
+        resumen = {
+            "cantidad": cantidad,
+            "promedio": promedio,
+            "minimo": min(valores),
+            "maximo": max(valores),
+            "desviacion": (sum((v - promedio) ** 2 for v in valores) / cantidad) ** 0.5,
+            "percentiles": calcular_percentiles(valores, percentiles),
+        }
+    if bins:
+        resumen["histograma"] = calcular_histograma(valores, bins)
+    return resumen
+
+
+def desglosar(
+    valores,
+    grupos,
+    percentiles: Sequence[float] = PERCENTILES_POR_DEFECTO,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Resumen (sin histograma) por grupo. Con NumPy se ordena una sola vez por
+    grupo y se separan los tramos contiguos.
+    """
+    if len(valores) == 0:
+        return {}
+    if np is not None:
+        grupos = np.asarray(grupos, dtype=object).astype(str)
+        orden = np.argsort(grupos, kind="stable")
+        claves, inicios = np.unique(grupos[orden], return_index=True)
+        tramos = np.split(np.asarray(valores, dtype=np.float64)[orden], inicios[1:])
+        return {
+            str(clave): describir(tramo, percentiles, bins=None)
+            for clave, tramo in zip(claves, tramos)
+        }
+
+    por_grupo: Dict[str, List[float]] = {}
+    for valor, grupo in zip(valores, grupos):
+        por_grupo.setdefault(str(grupo), []).append(valor)
+    return {clave: describir(por_grupo[clave], percentiles, bins=None) for clave in sorted(por_grupo)}
+
+
+# ============================================
+# API
+# ============================================
+
+def percentiles_metrica(
+    session: Session,
+    nombre_metrica: str,
+    fecha_inicio: Optional[datetime],
+    fecha_fin: Optional[datetime],
+    percentiles: Sequence[float] = PERCENTILES_POR_DEFECTO,
+    hospital_id: Optional[str] = None,
+) -> Dict[str, float]:
+    """Percentiles de una métrica de duración en la ventana."""
+    duraciones, _, _ = cargar_duraciones(session, nombre_metrica, fecha_inicio, fecha_fin, hospital_id)
+    return calcular_percentiles(duraciones, percentiles)
+
+
+def analizar(
+    session: Session,
+    nombre_metrica: str,
+    fecha_inicio: Optional[datetime],
+    fecha_fin: Optional[datetime],
+    hospital_id: Optional[str] = None,
+    percentiles: Sequence[float] = PERCENTILES_POR_DEFECTO,
+    bins: int = BINS_POR_DEFECTO,
+) -> Dict[str, Any]:
+    """
+    Distribución completa de una métrica: resumen global con histograma y
+    desgloses por hospital y por servicio.
+    """
+    duraciones, hospitales, servicios = cargar_duraciones(
+        session, nombre_metrica, fecha_inicio, fecha_fin, hospital_id
+    )
+    return {
+        "metrica": nombre_metrica,
+        "global": describir(duraciones, percentiles, bins),
+        "por_hospital": desglosar(duraciones, hospitales, percentiles),
+        "por_servicio": desglosar(duraciones, servicios, percentiles),
+    }
@@ -20,11 +20,11 @@ from app.models.sala import Sala
 from app.models.servicio import Servicio
 from app.models.hospital import Hospital
 from app.core.eventos_audibles import crear_evento_asignacion
-import asyncio
 from app.models.enums import (
     EstadoCamaEnum,
     EstadoListaEsperaEnum,
     ComplejidadEnum,
+    TipoEventoEnum,
     TipoServicioEnum,
     TipoAislamientoEnum,
     TipoEnfermedadEnum,
@@ -57,7 +57,9 @@ from app.services.compatibilidad_service import (
     _obtener_nivel_complejidad,
 )
 
-from app.core.websocket_manager import manager
+from app.core.outbox import encolar_broadcast
+from app.core.topologia import obtener_topologia
+from app.services.evento_writer import escritor_eventos
 
 logger = logging.getLogger("gestion_camas.asignacion")
 
@@ -463,10 +465,9 @@ class AsignacionService:
         complejidad = self.calcular_complejidad(paciente)
         servicios_requeridos = MAPEO_COMPLEJIDAD_SERVICIO.get(complejidad, [])
 
-        # Buscar servicios del hospital
-        query = select(Servicio).where(Servicio.hospital_id == hospital_id)
-        servicios = self.session.exec(query).all()
-        tipos_servicios = [s.tipo for s in servicios]
+        # Tipos de servicio del hospital (desde la topología en memoria)
+        topologia = obtener_topologia(self.session)
+        tipos_servicios = [s.tipo for s in topologia.servicios_de_hospital(hospital_id)]
 
         # Verificar si tiene al menos un servicio compatible
         servicios_disponibles = [s for s in servicios_requeridos if s in tipos_servicios]
@@ -743,12 +744,13 @@ class AsignacionService:
         # antes de que el paciente llegue físicamente
         verificar_y_actualizar_sexo_sala_al_ingreso(self.session, cama, paciente)
 
-        self.session.commit()
-
-        logger.info(f"Cama {cama.identificador} asignada a {paciente.nombre}")
+        escritor_eventos(self.session).agregar(
+            TipoEventoEnum.CAMA_ASIGNADA, paciente.id, hospital_id,
+            cama_origen_id=paciente.cama_id, cama_destino_id=cama_id,
+        )
 
         # ============================================
-        # BROADCAST TTS
+        # NOTIFICACIÓN TTS (outbox, misma transacción)
         # ============================================
         try:
             evento_tts = crear_evento_asignacion(
@@ -763,29 +765,21 @@ class AsignacionService:
                 paciente_id=str(paciente.id),
                 cama_id=str(cama.id)
             )
-            
-            # Broadcast asíncrono
-            try:
-                loop = asyncio.get_event_loop()
-                loop.create_task(manager.broadcast(evento_tts))
-            except RuntimeError:
-                asyncio.run(manager.broadcast(evento_tts))
-                
-            logger.info(f"Evento TTS de asignación emitido")
+            encolar_broadcast(self.session, evento_tts)
         except Exception as e:
-            logger.warning(f"Error emitiendo evento TTS: {e}")
+            logger.warning(f"Error construyendo evento TTS: {e}")
             # Fallback sin TTS
-            try:
-                loop = asyncio.get_event_loop()
-                loop.create_task(manager.broadcast({
-                    "tipo": "asignacion_completada",
-                    "hospital_id": hospital_id,
-                    "reload": True,
-                    "play_sound": True
-                }))
-            except:
-                pass
-        
+            encolar_broadcast(self.session, {
+                "tipo": "asignacion_completada",
+                "hospital_id": hospital_id,
+                "reload": True,
+                "play_sound": True
+            })
+
+        self.session.commit()
+
+        logger.info(f"Cama {cama.identificador} asignada a {paciente.nombre}")
+
         return ResultadoAsignacion(
             exito=True,
             mensaje=f"Cama {cama.identificador} asignada",
@@ -876,7 +870,11 @@ class AsignacionService:
         # Limpiar flag de espera de oxígeno
         paciente.esperando_evaluacion_oxigeno = False
         paciente.oxigeno_desactivado_at = None
-        
+
+        eventos = escritor_eventos(self.session)
+        for tipo in (TipoEventoEnum.TRASLADO_INICIADO, TipoEventoEnum.BUSQUEDA_CAMA_INICIADA):
+            eventos.agregar(tipo, paciente.id, paciente.hospital_id, cama_origen_id=paciente.cama_id)
+
         self.agregar_a_cola(paciente)
         
         self.session.commit()
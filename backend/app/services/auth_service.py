@@ -10,6 +10,8 @@ from sqlmodel import Session, select
 import secrets
 
 from app.config import settings
+from app.core.pool_contrasenas import pool_contrasenas
+from app.core.principal import invalidar_principal
 from app.models.usuario import Usuario, RefreshToken, RolEnum
 from app.schemas.auth_schemas import TokenPayload
 
@@ -38,6 +40,24 @@ class AuthService:
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """Verifica una contraseña contra su hash."""
         return pwd_context.verify(plain_password, hashed_password)
+
+    async def hash_password_async(self, password: str) -> str:
+        """Hashea una contraseña en el pool de contraseñas (sin bloquear el event loop)."""
+        return await pool_contrasenas.ejecutar(self.hash_password, password)
+    
+    async def verify_password_async(
+        self,
+        plain_password: str,
+        hashed_password: str,
+        admision: bool = False
+    ) -> bool:
+        """
+        Verifica una contraseña en el pool de contraseñas.
+        Con admision=True lanza PoolSaturado si el pool está lleno.
+        """
+        return await pool_contrasenas.ejecutar(
+            self.verify_password, plain_password, hashed_password, admision=admision
+        )
     
     # ============================================
     # JWT TOKENS
@@ -148,6 +168,7 @@ class AuthService:
             count += 1
         
         session.commit()
+        invalidar_principal(user_id)
         return count
     
     # ============================================
@@ -161,23 +182,47 @@ class AuthService:
         session: Session
     ) -> Optional[Usuario]:
         """Autentica un usuario por username/password."""
-        # Buscar por username o email
+        user = self._buscar_para_login(username, session)
+        
+        if not user or not self.verify_password(password, user.hashed_password):
+            return None
+        
+        return self._registrar_login(user, session)
+    
+    async def authenticate_user_async(
+        self,
+        username: str,
+        password: str,
+        session: Session
+    ) -> Optional[Usuario]:
+        """
+        Autentica un usuario verificando bcrypt en el pool de contraseñas.
+        
+        Raises:
+            PoolSaturado: Si el pool no admite más logins
+        """
+        user = self._buscar_para_login(username, session)
+        
+        if not user or not await self.verify_password_async(password, user.hashed_password, admision=True):
+            return None
+        
+        return self._registrar_login(user, session)
+    
+    def _buscar_para_login(self, username: str, session: Session) -> Optional[Usuario]:
+        """Usuario activo por username o email."""
         statement = select(Usuario).where(
             (Usuario.username == username.lower()) | 
             (Usuario.email == username.lower())
         )
         user = session.exec(statement).first()
         
-        if not user:
-            return None
-        
-        if not user.is_active:
+        if not user or not user.is_active:
             return None
         
-        if not self.verify_password(password, user.hashed_password):
-            return None
-        
-        # Actualizar último login
+        return user
+    
+    def _registrar_login(self, user: Usuario, session: Session) -> Usuario:
+        """Actualiza el último login."""
         user.last_login = datetime.utcnow()
         session.add(user)
         session.commit()
@@ -215,10 +260,44 @@ class AuthService:
         created_by: Optional[str] = None
     ) -> Usuario:
         """Crea un nuevo usuario."""
+        return self._guardar_usuario_nuevo(
+            username, email, self.hash_password(password), nombre_completo,
+            rol, session, hospital_id, servicio_id
+        )
+    
+    async def create_user_async(
+        self,
+        username: str,
+        email: str,
+        password: str,
+        nombre_completo: str,
+        rol: RolEnum,
+        session: Session,
+        hospital_id: Optional[str] = None,
+        servicio_id: Optional[str] = None,
+        created_by: Optional[str] = None
+    ) -> Usuario:
+        """Crea un nuevo usuario hasheando la contraseña en el pool."""
+        return self._guardar_usuario_nuevo(
+            username, email, await self.hash_password_async(password), nombre_completo,
+            rol, session, hospital_id, servicio_id
+        )
+    
+    def _guardar_usuario_nuevo(
+        self,
+        username: str,
+        email: str,
+        hashed_password: str,
+        nombre_completo: str,
+        rol: RolEnum,
+        session: Session,
+        hospital_id: Optional[str],
+        servicio_id: Optional[str]
+    ) -> Usuario:
         user = Usuario(
             username=username.lower(),
             email=email.lower(),
-            hashed_password=self.hash_password(password),
+            hashed_password=hashed_password,
             nombre_completo=nombre_completo,
             rol=rol,
             hospital_id=hospital_id,
@@ -239,10 +318,23 @@ class AuthService:
         session: Session
     ) -> bool:
         """Actualiza la contraseña de un usuario."""
-        user.hashed_password = self.hash_password(new_password)
+        return self._guardar_password(user, self.hash_password(new_password), session)
+    
+    async def update_password_async(
+        self,
+        user: Usuario,
+        new_password: str,
+        session: Session
+    ) -> bool:
+        """Actualiza la contraseña de un usuario hasheando en el pool."""
+        return self._guardar_password(user, await self.hash_password_async(new_password), session)
+    
+    def _guardar_password(self, user: Usuario, hashed_password: str, session: Session) -> bool:
+        user.hashed_password = hashed_password
         user.updated_at = datetime.utcnow()
         session.add(user)
         session.commit()
+        invalidar_principal(user.id)
         return True
     
     # ============================================
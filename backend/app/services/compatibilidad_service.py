@@ -12,7 +12,7 @@ al completar traslado.
 
 Ubicación: app/services/compatibilidad_service.py
 """
-from typing import Optional, Tuple, List, Union
+from typing import Dict, Optional, Tuple, List, Union
 from sqlmodel import Session, select
 from datetime import datetime
 import logging
@@ -34,6 +34,9 @@ from app.models.enums import (
 
 logger = logging.getLogger("gestion_camas.compatibilidad")
 
+# Servicios cuyas salas no requieren compatibilidad de sexo
+TIPOS_SERVICIO_SALA_INDIVIDUAL = [TipoServicioEnum.UCI, TipoServicioEnum.UTI, TipoServicioEnum.AISLAMIENTO]
+
 
 # ============================================
 # FUNCIONES HELPER PARA MANEJO DE SEXO
@@ -188,7 +191,7 @@ class CompatibilidadService:
         # Verificar tipo de servicio
         if sala.servicio:
             servicio_tipo = sala.servicio.tipo
-            if servicio_tipo in [TipoServicioEnum.UCI, TipoServicioEnum.UTI, TipoServicioEnum.AISLAMIENTO]:
+            if servicio_tipo in TIPOS_SERVICIO_SALA_INDIVIDUAL:
                 return True
         
         return False
@@ -328,6 +331,57 @@ class CompatibilidadService:
         
         return sexo_encontrado
     
+    def actualizar_sexo_salas(self, salas: List[Sala]) -> Dict[str, Optional[str]]:
+        """
+        Equivalente por lotes de actualizar_sexo_sala: dos consultas para
+        todas las salas (pacientes en cama y asignaciones pendientes) en
+        vez de una por cama.
+
+        Returns:
+            Nuevo sexo asignado por sala_id
+        """
+        from app.core.topologia import obtener_topologia
+
+        topologia = obtener_topologia(self.session)
+        compartidas = []
+        resultado: Dict[str, Optional[str]] = {}
+        for sala in salas:
+            servicio = topologia.servicio(sala.servicio_id)
+            if sala.es_individual or (servicio and servicio.tipo in TIPOS_SERVICIO_SALA_INDIVIDUAL):
+                resultado[sala.id] = None
+            else:
+                compartidas.append(sala)
+
+        ids = [sala.id for sala in compartidas]
+        fisicos: Dict[str, str] = {}
+        pendientes: Dict[str, str] = {}
+        if ids:
+            filas = self.session.exec(
+                select(Cama.sala_id, Paciente.sexo)
+                .join(Paciente, Paciente.cama_id == Cama.id)
+                .where(Cama.sala_id.in_(ids), Cama.estado.in_(ESTADOS_CAMA_OCUPADA), Paciente.sexo != None)  # noqa: E711
+            ).all()
+            for sala_id, sexo in filas:
+                fisicos.setdefault(sala_id, _normalizar_sexo(sexo))
+            filas = self.session.exec(
+                select(Cama.sala_id, Paciente.sexo)
+                .join(Paciente, Paciente.cama_destino_id == Cama.id)
+                .where(Cama.sala_id.in_(ids), Paciente.sexo != None)  # noqa: E711
+            ).all()
+            for sala_id, sexo in filas:
+                pendientes.setdefault(sala_id, _normalizar_sexo(sexo))
+
+        for sala in compartidas:
+            resultado[sala.id] = fisicos.get(sala.id) or pendientes.get(sala.id)
+
+        for sala in salas:
+            if sala.sexo_asignado != resultado[sala.id]:
+                sala.sexo_asignado = resultado[sala.id]
+                self.session.add(sala)
+
+        logger.debug(f"Sexo actualizado en {len(salas)} salas")
+        return resultado
+
     # ============================================
     # VERIFICACIÓN DE AISLAMIENTO
     # ============================================
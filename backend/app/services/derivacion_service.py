@@ -8,17 +8,14 @@ from sqlmodel import Session, select
 from dataclasses import dataclass
 from datetime import datetime
 import logging
-import asyncio
 
 from app.models.paciente import Paciente
 from app.models.cama import Cama
-from app.models.hospital import Hospital
-from app.models.servicio import Servicio
-from app.models.sala import Sala
 from app.models.enums import (
     EstadoCamaEnum,
     TipoPacienteEnum,
     EstadoListaEsperaEnum,
+    TipoEventoEnum,
     TipoServicioEnum,
     TipoEnfermedadEnum,
     ComplejidadEnum,
@@ -33,7 +30,9 @@ from app.core.exceptions import (
     PacienteNotFoundError,
     HospitalNotFoundError,
 )
-from app.core.websocket_manager import manager
+from app.core.outbox import encolar_broadcast, encolar_notificacion
+from app.core.topologia import CapacidadHospital, obtener_topologia
+from app.services.evento_writer import escritor_eventos
 
 # NUEVO IMPORT TTS
 from app.core.eventos_audibles import crear_evento_derivacion_aceptada
@@ -62,6 +61,8 @@ class ResultadoVerificacionDerivacion:
     mensaje: str
     motivos_rechazo: List[str] = None
     hospital_destino_nombre: str = None
+    hospital_destino_id: Optional[str] = None
+    capacidad: Optional[CapacidadHospital] = None
     
     def __post_init__(self):
         if self.motivos_rechazo is None:
@@ -129,115 +130,84 @@ class DerivacionService:
         Returns:
             Nivel numérico (0-3)
         """
-        query = select(Servicio).where(Servicio.hospital_id == hospital_id)
-        servicios = self.session.exec(query).all()
-        
-        nivel_max = 0
-        for servicio in servicios:
-            if servicio.tipo == TipoServicioEnum.UCI:
-                nivel_max = max(nivel_max, 3)
-            elif servicio.tipo == TipoServicioEnum.UTI:
-                nivel_max = max(nivel_max, 2)
-            else:
-                nivel_max = max(nivel_max, 1)
-        
-        return nivel_max
+        return obtener_topologia(self.session).complejidad_maxima_hospital(hospital_id)
     
     # ============================================
     # VERIFICACIÓN DE VIABILIDAD
     # ============================================
     
-    def verificar_viabilidad_derivacion(
-        self,
-        paciente_id: str,
-        hospital_destino_id: str
-    ) -> ResultadoVerificacionDerivacion:
+    def _contexto_viabilidad(self, paciente: Paciente) -> dict:
         """
-        Verifica si una derivación es viable antes de solicitarla.
-        
-        PROBLEMA 2: Incluye verificación de pausa de oxígeno.
-        
-        Verifica que el hospital destino tenga el tipo de cama que 
-        requiere el paciente según sus requerimientos.
-        
-        Args:
-            paciente_id: ID del paciente
-            hospital_destino_id: ID del hospital destino
-        
-        Returns:
-            ResultadoVerificacionDerivacion con la viabilidad y motivos
+        Datos del paciente que no dependen del hospital destino; se calculan
+        una vez aunque se evalúe contra toda la red.
         """
-        paciente = self.paciente_repo.obtener_por_id(paciente_id)
-        if not paciente:
-            raise PacienteNotFoundError(paciente_id)
-        
-        hospital_destino = self.hospital_repo.obtener_por_id(hospital_destino_id)
-        if not hospital_destino:
-            raise HospitalNotFoundError(hospital_destino_id)
-        
+        topologia = obtener_topologia(self.session)
+        complejidad_paciente = self._obtener_complejidad_paciente(paciente)
+
+        complejidad_cama_actual = None
+        if paciente.esperando_evaluacion_oxigeno and paciente.cama_id:
+            servicio_actual = topologia.servicio_de_cama(paciente.cama_id)
+            if servicio_actual is not None:
+                if servicio_actual.tipo == TipoServicioEnum.UCI:
+                    complejidad_cama_actual = ComplejidadEnum.ALTA
+                elif servicio_actual.tipo == TipoServicioEnum.UTI:
+                    complejidad_cama_actual = ComplejidadEnum.MEDIA
+                else:
+                    complejidad_cama_actual = ComplejidadEnum.BAJA
+
+        return {
+            "complejidad": complejidad_paciente,
+            "nivel": self._obtener_nivel_complejidad(complejidad_paciente),
+            "complejidad_cama_actual": complejidad_cama_actual,
+            "servicios_compatibles": MAPEO_COMPLEJIDAD_SERVICIO.get(complejidad_paciente, []),
+            "requiere_sala_individual": paciente.tipo_aislamiento in AISLAMIENTOS_SALA_INDIVIDUAL,
+        }
+
+    def _evaluar_viabilidad(
+        self,
+        paciente: Paciente,
+        contexto: dict,
+        capacidad: Optional[CapacidadHospital],
+    ) -> List[str]:
+        """Motivos de rechazo del paciente contra una fila de la matriz de capacidades."""
         motivos_rechazo = []
-        
+        nivel_hospital = capacidad.complejidad_maxima if capacidad else 0
+        tipos_individuales = capacidad.tipos_con_sala_individual if capacidad else frozenset()
+
         # ============================================
         # PROBLEMA 2: VERIFICAR PAUSA DE OXÍGENO
         # ============================================
-        if paciente.esperando_evaluacion_oxigeno and paciente.cama_id:
-            # Obtener cama actual
-            cama_actual = self.cama_repo.obtener_por_id(paciente.cama_id)
-            
-            if cama_actual:
-                complejidad_cama_actual = self._obtener_complejidad_cama(cama_actual)
-                nivel_cama_actual = self._obtener_nivel_complejidad(complejidad_cama_actual)
-                
-                # Obtener complejidad máxima del hospital destino
-                nivel_hospital_destino = self._obtener_complejidad_maxima_hospital(hospital_destino_id)
-                
-                # Si el nivel destino es menor que el actual, bloquear
-                if nivel_hospital_destino < nivel_cama_actual:
-                    motivos_rechazo.append(
-                        f"El paciente está en pausa de evaluación de oxígeno. "
-                        f"Actualmente en cama de complejidad {complejidad_cama_actual.value.upper()} "
-                        f"y el hospital destino ofrece complejidad menor. "
-                        f"Debe esperar a que termine la pausa o que se cancele."
-                    )
-                    logger.info(
-                        f"Derivación bloqueada por pausa de oxígeno: {paciente.nombre} "
-                        f"(cama {complejidad_cama_actual.value} -> hospital nivel {nivel_hospital_destino})"
-                    )
-        
+        complejidad_cama_actual = contexto["complejidad_cama_actual"]
+        if complejidad_cama_actual is not None:
+            nivel_cama_actual = self._obtener_nivel_complejidad(complejidad_cama_actual)
+            # Si el nivel destino es menor que el actual, bloquear
+            if nivel_hospital < nivel_cama_actual:
+                motivos_rechazo.append(
+                    f"El paciente está en pausa de evaluación de oxígeno. "
+                    f"Actualmente en cama de complejidad {complejidad_cama_actual.value.upper()} "
+                    f"y el hospital destino ofrece complejidad menor. "
+                    f"Debe esperar a que termine la pausa o que se cancele."
+                )
+                logger.info(
+                    f"Derivación bloqueada por pausa de oxígeno: {paciente.nombre} "
+                    f"(cama {complejidad_cama_actual.value} -> hospital nivel {nivel_hospital})"
+                )
+
         # Verificar complejidad requerida
-        complejidad_paciente = self._obtener_complejidad_paciente(paciente)
-        nivel_paciente = self._obtener_nivel_complejidad(complejidad_paciente)
-        nivel_hospital = self._obtener_complejidad_maxima_hospital(hospital_destino_id)
-        
-        if nivel_hospital < nivel_paciente:
+        complejidad_paciente = contexto["complejidad"]
+        if nivel_hospital < contexto["nivel"]:
             motivos_rechazo.append(
                 f"El hospital destino no tiene camas de complejidad suficiente. "
                 f"Paciente requiere {complejidad_paciente.value.upper()} pero hospital "
                 f"solo ofrece hasta nivel {nivel_hospital}."
             )
-        
-        # Verificar aislamientos específicos
-        if paciente.tipo_aislamiento in AISLAMIENTOS_SALA_INDIVIDUAL:
-            # Obtener servicios compatibles con la complejidad del paciente
-            servicios_compatibles = MAPEO_COMPLEJIDAD_SERVICIO.get(complejidad_paciente, [])
-
-            # Verificar si hay salas individuales en servicios compatibles
-            query = select(Sala).join(Servicio).where(
-                Servicio.hospital_id == hospital_destino_id,
-                Servicio.tipo.in_(servicios_compatibles),
-                Sala.es_individual == True
-            )
-            salas_individuales_compatibles = self.session.exec(query).all()
 
-            if not salas_individuales_compatibles:
+        # Verificar aislamientos específicos
+        if contexto["requiere_sala_individual"]:
+            servicios_compatibles = contexto["servicios_compatibles"]
+            if not any(t in tipos_individuales for t in servicios_compatibles):
                 # Verificar si el problema es falta de salas individuales o falta de servicios
-                query_cualquier_sala = select(Sala).join(Servicio).where(
-                    Servicio.hospital_id == hospital_destino_id,
-                    Sala.es_individual == True
-                )
-                cualquier_sala_individual = self.session.exec(query_cualquier_sala).all()
-
-                if not cualquier_sala_individual:
+                if not tipos_individuales:
                     motivos_rechazo.append(
                         f"El hospital destino no tiene salas individuales "
                         f"requeridas para aislamiento {paciente.tipo_aislamiento.value}"
@@ -249,15 +219,85 @@ class DerivacionService:
                         f"({', '.join(servicios_nombres)}) para paciente con aislamiento "
                         f"{paciente.tipo_aislamiento.value} y complejidad {complejidad_paciente.value}"
                     )
+
+        return motivos_rechazo
+
+    def verificar_viabilidad_derivacion(
+        self,
+        paciente_id: str,
+        hospital_destino_id: str
+    ) -> ResultadoVerificacionDerivacion:
+        """
+        Verifica si una derivación es viable antes de solicitarla.
+        
+        PROBLEMA 2: Incluye verificación de pausa de oxígeno.
+        
+        Verifica que el hospital destino tenga el tipo de cama que 
+        requiere el paciente según sus requerimientos, usando la matriz
+        de capacidades de la topología (sin consultas por hospital).
+        
+        Args:
+            paciente_id: ID del paciente
+            hospital_destino_id: ID del hospital destino
+        
+        Returns:
+            ResultadoVerificacionDerivacion con la viabilidad y motivos
+        """
+        paciente = self.paciente_repo.obtener_por_id(paciente_id)
+        if not paciente:
+            raise PacienteNotFoundError(paciente_id)
+        
+        topologia = obtener_topologia(self.session)
+        hospital_destino = topologia.hospital(hospital_destino_id)
+        if not hospital_destino:
+            raise HospitalNotFoundError(hospital_destino_id)
         
+        motivos_rechazo = self._evaluar_viabilidad(
+            paciente,
+            self._contexto_viabilidad(paciente),
+            topologia.capacidad_hospital(hospital_destino_id),
+        )
         es_viable = len(motivos_rechazo) == 0
         
         return ResultadoVerificacionDerivacion(
             es_viable=es_viable,
             mensaje="Derivación viable" if es_viable else "Derivación no viable",
             motivos_rechazo=motivos_rechazo,
-            hospital_destino_nombre=hospital_destino.nombre
+            hospital_destino_nombre=hospital_destino.nombre,
+            hospital_destino_id=hospital_destino_id,
         )
+
+    def verificar_viabilidad_red(self, paciente_id: str) -> List[ResultadoVerificacionDerivacion]:
+        """
+        Verifica la viabilidad de derivar al paciente a cada hospital de la
+        red (excepto el suyo) en una sola pasada sobre la matriz de capacidades.
+
+        Returns:
+            Un resultado por hospital, viables primero y luego por nombre
+        """
+        paciente = self.paciente_repo.obtener_por_id(paciente_id)
+        if not paciente:
+            raise PacienteNotFoundError(paciente_id)
+
+        topologia = obtener_topologia(self.session)
+        contexto = self._contexto_viabilidad(paciente)
+        resultados = []
+        for hospital_id, capacidad in topologia.matriz_capacidades().items():
+            if hospital_id == paciente.hospital_id:
+                continue
+            motivos_rechazo = self._evaluar_viabilidad(paciente, contexto, capacidad)
+            es_viable = len(motivos_rechazo) == 0
+            resultados.append(ResultadoVerificacionDerivacion(
+                es_viable=es_viable,
+                mensaje="Derivación viable" if es_viable else "Derivación no viable",
+                motivos_rechazo=motivos_rechazo,
+                hospital_destino_nombre=topologia.hospital(hospital_id).nombre,
+                hospital_destino_id=hospital_id,
+                capacidad=capacidad,
+            ))
+
+        resultados.sort(key=lambda r: (not r.es_viable, r.hospital_destino_nombre or ""))
+        return resultados
     
     # ============================================
     # SOLICITUD DE DERIVACIÓN
@@ -363,6 +403,25 @@ class DerivacionService:
             paciente.documento_derivacion_id = documento_id
 
         self.session.add(paciente)
+
+        escritor_eventos(self.session).agregar(
+            TipoEventoEnum.DERIVACION_SOLICITADA, paciente.id, paciente.hospital_id,
+            cama_origen_id=cama_origen_id, hospital_destino_id=hospital_destino_id,
+            metadata={"motivo": motivo},
+        )
+
+        # Aviso al hospital destino, en la misma transacción
+        encolar_notificacion(
+            self.session,
+            {
+                "tipo": "derivacion_solicitada",
+                "paciente_id": paciente.id,
+                "paciente_nombre": paciente.nombre,
+                "hospital_destino_id": hospital_destino_id,
+            },
+            notification_type="info",
+            hospital_id=hospital_destino_id
+        )
         self.session.commit()
 
         mensaje_resultado = f"Derivación solicitada a {hospital_destino.nombre}"
@@ -500,10 +559,17 @@ class DerivacionService:
             logger.info(f"Derivación aceptada (sin cama reservada): {paciente.nombre}")
 
         self.session.add(paciente)
-        self.session.commit()
+
+        # El hospital del evento es el destino: ahí ingresa el paciente
+        escritor_eventos(self.session).agregar(
+            TipoEventoEnum.DERIVACION_ACEPTADA, paciente.id, paciente.hospital_id,
+            cama_origen_id=paciente.cama_origen_derivacion_id,
+            cama_destino_id=paciente.cama_destino_id if tiene_cama_reservada else None,
+            hospital_destino_id=paciente.hospital_id,
+        )
 
         # ============================================
-        # BROADCAST TTS
+        # NOTIFICACIÓN TTS (outbox, misma transacción)
         # ============================================
         try:
             evento_tts = crear_evento_derivacion_aceptada(
@@ -518,29 +584,18 @@ class DerivacionService:
                 paciente_id=str(paciente.id),
                 derivacion_id=str(paciente.id)  # Usamos paciente_id como referencia
             )
-
-            # Broadcast asíncrono
-            try:
-                loop = asyncio.get_event_loop()
-                loop.create_task(manager.broadcast(evento_tts))
-            except RuntimeError:
-                # Si no hay event loop, crear uno nuevo
-                asyncio.run(manager.broadcast(evento_tts))
-
-            logger.info(f"Evento TTS de derivación aceptada emitido")
+            encolar_broadcast(self.session, evento_tts)
         except Exception as e:
-            logger.warning(f"Error emitiendo evento TTS: {e}")
+            logger.warning(f"Error construyendo evento TTS: {e}")
             # Fallback sin TTS
-            try:
-                loop = asyncio.get_event_loop()
-                loop.create_task(manager.broadcast({
-                    "tipo": "derivacion_aceptada",
-                    "hospital_id": hospital_origen_id,
-                    "reload": True,
-                    "play_sound": True
-                }))
-            except:
-                pass
+            encolar_broadcast(self.session, {
+                "tipo": "derivacion_aceptada",
+                "hospital_id": hospital_origen_id,
+                "reload": True,
+                "play_sound": True
+            })
+
+        self.session.commit()
 
         return ResultadoDerivacion(
             exito=True,
@@ -575,6 +630,13 @@ class DerivacionService:
         if paciente.derivacion_estado != "pendiente":
             raise ValidationError("La derivación no está pendiente")
 
+        escritor_eventos(self.session).agregar(
+            TipoEventoEnum.DERIVACION_RECHAZADA, paciente.id, paciente.hospital_id,
+            cama_origen_id=paciente.cama_origen_derivacion_id,
+            hospital_destino_id=paciente.derivacion_hospital_destino_id,
+            metadata={"motivo": motivo_rechazo},
+        )
+
         # Guardar info antes de limpiar
         tenia_cama_origen = paciente.cama_origen_derivacion_id is not None
         hospital_origen_id = None
@@ -711,7 +773,16 @@ class DerivacionService:
                 # Actualizar sexo de sala
                 from app.services.compatibilidad_service import verificar_y_actualizar_sexo_sala_al_egreso
                 verificar_y_actualizar_sexo_sala_al_egreso(self.session, cama_origen)
-        
+
+                # El paciente ya pertenece al destino: el egreso es del
+                # hospital de la cama de origen
+                hospital_origen_id = obtener_topologia(self.session).hospital_de_cama(cama_origen.id)
+                if hospital_origen_id:
+                    escritor_eventos(self.session).agregar(
+                        TipoEventoEnum.DERIVACION_EGRESO_CONFIRMADO, paciente.id, hospital_origen_id,
+                        cama_origen_id=cama_origen.id, hospital_destino_id=paciente.hospital_id,
+                    )
+
         self.session.commit()
         
         logger.info(f"Egreso confirmado para derivación de {paciente.nombre}")
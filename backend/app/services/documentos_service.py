@@ -0,0 +1,231 @@
+"""
+Borrado diferido de documentos direccionados por contenido.
+
+Varios pacientes pueden compartir el mismo contenido (ver
+app/core/almacenamiento.py), así que reemplazar un documento no lo borra de
+inmediato: borrar en línea competía con una subida concurrente del mismo
+contenido, que encontraba el archivo, descartaba su temporal y referenciaba
+el hash mientras otra petición contaba 0 referencias y lo eliminaba.
+
+Protocolo:
+    - Al reemplazar un documento, marcar_para_borrado() registra la clave en
+      documento_pendiente_borrado, en la misma transacción que cambia
+      Paciente.documento_adjunto.
+    - Antes de guardar una subida, reservar_contenido() elimina la marca de
+      su clave en la transacción de la subida. Esa fila queda bloqueada
+      hasta el commit, de modo que subida y barrido no pueden intercalarse.
+    - El barredor (BarredorDocumentos) toma cada marca con más de
+      DOCUMENTOS_BARRIDO_GRACIA segundos eliminándola (mismo bloqueo), vuelve
+      a contar las referencias y solo borra el contenido si no hay ninguna.
+      Si el borrado falla, el rollback restaura la marca y se reintenta en
+      el siguiente barrido.
+
+Uso:
+    reservar_contenido(session, archivo.sha256)
+    await almacen_documentos.guardar(archivo)
+    marcar_para_borrado(session, clave_anterior)
+    session.commit()
+"""
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import logging
+
+from sqlalchemy import delete, func, select
+from sqlmodel import Session
+
+from app.config import settings
+from app.core.almacenamiento import AlmacenDocumentos, almacen_documentos
+from app.models.documento import DocumentoPendienteBorrado
+from app.models.paciente import Paciente
+
+logger = logging.getLogger("gestion_camas.documentos")
+
+
+TABLA_PENDIENTES = DocumentoPendienteBorrado.__table__
+
+
+# ============================================
+# MARCAS
+# ============================================
+
+def marcar_para_borrado(session: Session, clave: str) -> None:
+    """Registra el contenido como candidato a borrado (sin commit)."""
+    fila = {"clave": clave, "marcado_at": datetime.utcnow()}
+    dialecto = session.get_bind().dialect.name
+    if dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+    elif dialecto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+    else:
+        session.merge(DocumentoPendienteBorrado(**fila))
+        return
+
+    stmt = insert_dialecto(TABLA_PENDIENTES).values(fila)
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=["clave"], set_={"marcado_at": stmt.excluded.marcado_at},
+    ))
+
+
+def reservar_contenido(session: Session, clave: str) -> None:
+    """
+    Retira la marca de borrado del contenido que se va a referenciar (sin
+    commit). Si el barredor está procesando la clave, espera a que termine:
+    después de esto guardar() vuelve a escribir el archivo si fue borrado.
+    """
+    session.execute(delete(TABLA_PENDIENTES).where(TABLA_PENDIENTES.c.clave == clave))
+
+
+def contar_referencias(session: Session, clave: str) -> int:
+    """Pacientes cuyo documento apunta al contenido `clave`."""
+    return session.execute(
+        select(func.count()).select_from(Paciente)
+        .where(Paciente.documento_adjunto.startswith(f"{clave}_", autoescape=True))
+    ).scalar_one()
+
+
+# ============================================
+# BARRIDO
+# ============================================
+
+def _candidatos(session: Session, limite: datetime, lote: int) -> List[str]:
+    claves = session.execute(
+        select(TABLA_PENDIENTES.c.clave)
+        .where(TABLA_PENDIENTES.c.marcado_at <= limite)
+        .order_by(TABLA_PENDIENTES.c.marcado_at)
+        .limit(lote)
+    ).scalars().all()
+    session.rollback()
+    return list(claves)
+
+
+def _tomar(session: Session, clave: str, limite: datetime) -> Optional[int]:
+    """
+    Elimina la marca (bloqueándola hasta el commit) y cuenta las
+    referencias. None si una subida o un nuevo reemplazo la tomó antes.
+    """
+    tomada = session.execute(
+        delete(TABLA_PENDIENTES)
+        .where(TABLA_PENDIENTES.c.clave == clave, TABLA_PENDIENTES.c.marcado_at <= limite)
+    ).rowcount
+    if not tomada:
+        session.rollback()
+        return None
+    return contar_referencias(session, clave)
+
+
+async def barrer(
+    session: Session,
+    almacen: Optional[AlmacenDocumentos] = None,
+    gracia_segundos: Optional[float] = None,
+    lote: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Procesa las marcas vencidas: borra el contenido sin referencias y
+    descarta las marcas del contenido que volvió a usarse.
+    """
+    almacen = almacen or almacen_documentos
+    gracia = settings.DOCUMENTOS_BARRIDO_GRACIA if gracia_segundos is None else gracia_segundos
+    limite = datetime.utcnow() - timedelta(seconds=gracia)
+    resultado = {"revisados": 0, "eliminados": 0, "en_uso": 0, "errores": 0}
+
+    claves = await asyncio.to_thread(_candidatos, session, limite, lote or settings.DOCUMENTOS_BARRIDO_LOTE)
+    for clave in claves:
+        referencias = await asyncio.to_thread(_tomar, session, clave, limite)
+        if referencias is None:
+            continue
+        resultado["revisados"] += 1
+        if referencias:
+            resultado["en_uso"] += 1
+        else:
+            try:
+                await almacen.eliminar(clave)
+            except Exception as e:
+                await asyncio.to_thread(session.rollback)
+                resultado["errores"] += 1
+                logger.warning(f"No se pudo eliminar el documento {clave}: {e}")
+                continue
+            resultado["eliminados"] += 1
+        await asyncio.to_thread(session.commit)
+
+    return resultado
+
+
+class BarredorDocumentos:
+    """Ejecuta barrer() periódicamente en segundo plano."""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        intervalo_segundos: Optional[float] = None,
+    ):
+        self._session_factory = session_factory
+        self.intervalo_segundos = intervalo_segundos or settings.DOCUMENTOS_BARRIDO_INTERVALO
+        self._tarea: Optional[asyncio.Task] = None
+        self.ejecuciones = 0
+        self.eliminados = 0
+        self.errores = 0
+        self.ultima: Optional[datetime] = None
+
+    @property
+    def activo(self) -> bool:
+        return self._tarea is not None and not self._tarea.done()
+
+    def _nueva_sesion(self) -> Session:
+        if self._session_factory is not None:
+            return self._session_factory()
+        from app.core.database import get_session_direct
+        return get_session_direct()
+
+    async def barrer_ahora(self) -> Dict[str, int]:
+        session = self._nueva_sesion()
+        try:
+            resultado = await barrer(session)
+        finally:
+            await asyncio.to_thread(session.close)
+        self.ejecuciones += 1
+        self.eliminados += resultado["eliminados"]
+        self.errores += resultado["errores"]
+        self.ultima = datetime.utcnow()
+        return resultado
+
+    async def iniciar(self) -> None:
+        """Inicia el barrido periódico en el event loop actual."""
+        if self.activo:
+            return
+        self._tarea = asyncio.create_task(self._bucle())
+        logger.info("Barredor de documentos iniciado")
+
+    async def detener(self) -> None:
+        if self._tarea is None:
+            return
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        self._tarea = None
+        logger.info("Barredor de documentos detenido")
+
+    async def _bucle(self) -> None:
+        while True:
+            try:
+                await self.barrer_ahora()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errores += 1
+                logger.error(f"❌ Error barriendo documentos: {e}")
+            await asyncio.sleep(self.intervalo_segundos)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "activo": self.activo,
+            "ejecuciones": self.ejecuciones,
+            "eliminados": self.eliminados,
+            "errores": self.errores,
+            "ultima": self.ultima.isoformat() if self.ultima else None,
+        }
+
+
+barredor_documentos = BarredorDocumentos()
@@ -3,10 +3,12 @@ Servicio de estadísticas para el sistema de gestión de camas.
 Calcula todas las métricas y estadísticas solicitadas.
 """
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Any
+from functools import wraps
+from typing import Dict, List, Optional, Sequence, Tuple, Any
 from sqlmodel import Session, select, func, and_, or_
-from sqlalchemy import distinct
+from sqlalchemy.orm import aliased
 from collections import defaultdict
+import json
 
 from app.models.paciente import Paciente
 from app.models.cama import Cama
@@ -14,14 +16,89 @@ from app.models.hospital import Hospital
 from app.models.servicio import Servicio
 from app.models.sala import Sala
 from app.models.evento_paciente import EventoPaciente
+from app.models.estancia_servicio import EstanciaServicio
+from app.core.topologia import obtener_topologia
+from app.services import analitica_duraciones, motor_duraciones, ocupacion_service, rollup_service
+from app.services.motor_duraciones import METRICAS_DURACION
 from app.models.enums import (
     TipoEventoEnum,
     EstadoCamaEnum,
     TipoPacienteEnum,
-    ESTADOS_CAMA_OCUPADA,
 )
 
 
+TIPOS_INGRESO_DIRECTO = [TipoEventoEnum.INGRESO_URGENCIA, TipoEventoEnum.INGRESO_AMBULATORIO]
+
+TIPOS_LLEGADA_SERVICIO = [
+    TipoEventoEnum.CAMA_ASIGNADA,
+    TipoEventoEnum.TRASLADO_COMPLETADO,
+    TipoEventoEnum.DERIVACION_COMPLETADA,
+]
+
+TIPOS_SALIDA_SERVICIO = [
+    TipoEventoEnum.TRASLADO_COMPLETADO,
+    TipoEventoEnum.ALTA_COMPLETADA,
+    TipoEventoEnum.DERIVACION_EGRESO_CONFIRMADO,
+    TipoEventoEnum.FALLECIDO_EGRESADO,
+]
+
+
+def _lista_json(valor: Optional[str]) -> list:
+    """Lista JSON almacenada en texto (mismo criterio que Paciente.get_requerimientos_lista)."""
+    if not valor:
+        return []
+    try:
+        parsed = json.loads(valor)
+        return parsed if isinstance(parsed, list) else []
+    except (json.JSONDecodeError, TypeError):
+        return []
+
+
+def _metadata(valor: Optional[str]) -> dict:
+    """Metadata JSON de un evento (mismo criterio que EventoPaciente.get_metadata)."""
+    if not valor:
+        return {}
+    try:
+        return json.loads(valor)
+    except json.JSONDecodeError:
+        return {}
+
+
+def _con_percentiles(
+    session: Session,
+    resumen: Dict[str, Any],
+    nombre_metrica: str,
+    fecha_inicio: Optional[datetime],
+    fecha_fin: Optional[datetime],
+    percentiles: Optional[Sequence[float]],
+    hospital_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Agrega percentiles al resumen de una métrica de duración. Los rollups
+    no guardan distribuciones, así que se calculan sobre los eventos de la
+    misma ventana.
+    """
+    if percentiles:
+        resumen["percentiles"] = analitica_duraciones.percentiles_metrica(
+            session, nombre_metrica, fecha_inicio, fecha_fin, percentiles, hospital_id
+        )
+    return resumen
+
+
+def _calculo(funcion):
+    """
+    Expone un cálculo síncrono como método estático async (la API de los
+    endpoints) y deja la versión síncrona en `.sincrono`, para llamarla
+    desde hilos sin crear un event loop (ver reporte_estadisticas).
+    """
+    @wraps(funcion)
+    async def _async(*args, **kwargs):
+        return funcion(*args, **kwargs)
+
+    _async.sincrono = funcion
+    return staticmethod(_async)
+
+
 class EstadisticasService:
     """
     Servicio para calcular estadísticas del sistema.
@@ -54,8 +131,8 @@ class EstadisticasService:
     # INGRESOS Y EGRESOS DIARIOS
     # ============================================
 
-    @staticmethod
-    async def calcular_ingresos_red(
+    @_calculo
+    def calcular_ingresos_red(
         session: Session,
         fecha_inicio: datetime,
         fecha_fin: datetime
@@ -64,21 +141,13 @@ class EstadisticasService:
         Calcula los ingresos totales de la red (suma de todos los hospitales).
         Son pacientes nuevos por urgencia o ambulatorio en cualquier hospital.
         """
-        statement = select(func.count(distinct(EventoPaciente.paciente_id))).where(
-            and_(
-                EventoPaciente.tipo_evento.in_([
-                    TipoEventoEnum.INGRESO_URGENCIA,
-                    TipoEventoEnum.INGRESO_AMBULATORIO
-                ]),
-                EventoPaciente.timestamp >= fecha_inicio,
-                EventoPaciente.timestamp < fecha_fin
-            )
+        total = rollup_service.contar_pacientes(
+            session, TIPOS_INGRESO_DIRECTO, fecha_inicio, fecha_fin
         )
-        total = session.exec(statement).first() or 0
         return {"total": total}
 
-    @staticmethod
-    async def calcular_ingresos_hospital(
+    @_calculo
+    def calcular_ingresos_hospital(
         session: Session,
         hospital_id: str,
         fecha_inicio: datetime,
@@ -89,29 +158,15 @@ class EstadisticasService:
         Incluye: urgencias, ambulatorios, derivados aceptados.
         """
         # Ingresos directos (urgencia, ambulatorio)
-        statement_directos = select(func.count(distinct(EventoPaciente.paciente_id))).where(
-            and_(
-                EventoPaciente.hospital_id == hospital_id,
-                EventoPaciente.tipo_evento.in_([
-                    TipoEventoEnum.INGRESO_URGENCIA,
-                    TipoEventoEnum.INGRESO_AMBULATORIO
-                ]),
-                EventoPaciente.timestamp >= fecha_inicio,
-                EventoPaciente.timestamp < fecha_fin
-            )
+        ingresos_directos = rollup_service.contar_pacientes(
+            session, TIPOS_INGRESO_DIRECTO, fecha_inicio, fecha_fin, hospital_id=hospital_id
         )
-        ingresos_directos = session.exec(statement_directos).first() or 0
 
         # Derivados aceptados (este hospital acepta al paciente)
-        statement_derivados = select(func.count(distinct(EventoPaciente.paciente_id))).where(
-            and_(
-                EventoPaciente.hospital_id == hospital_id,
-                EventoPaciente.tipo_evento == TipoEventoEnum.DERIVACION_ACEPTADA,
-                EventoPaciente.timestamp >= fecha_inicio,
-                EventoPaciente.timestamp < fecha_fin
-            )
+        ingresos_derivados = rollup_service.contar_pacientes(
+            session, [TipoEventoEnum.DERIVACION_ACEPTADA], fecha_inicio, fecha_fin,
+            hospital_id=hospital_id
         )
-        ingresos_derivados = session.exec(statement_derivados).first() or 0
 
         total = ingresos_directos + ingresos_derivados
         return {
@@ -120,8 +175,8 @@ class EstadisticasService:
             "ingresos_derivados": ingresos_derivados
         }
 
-    @staticmethod
-    async def calcular_ingresos_servicio(
+    @_calculo
+    def calcular_ingresos_servicio(
         session: Session,
         servicio_id: str,
         fecha_inicio: datetime,
@@ -131,32 +186,15 @@ class EstadisticasService:
         Calcula los ingresos de un servicio específico.
         Incluye: pacientes que llegan al servicio (urgencias, ambulatorios, derivados, traslados).
         """
-        # Obtener todas las camas del servicio
-        statement_camas = select(Cama).join(Sala).where(Sala.servicio_id == servicio_id)
-        camas = session.exec(statement_camas).all()
-        camas_ids = [cama.id for cama in camas]
-
-        if not camas_ids:
-            return {"total_ingresos_servicio": 0}
-
-        # Contar eventos de llegada a camas del servicio
-        statement = select(func.count(distinct(EventoPaciente.paciente_id))).where(
-            and_(
-                EventoPaciente.cama_destino_id.in_(camas_ids),
-                EventoPaciente.tipo_evento.in_([
-                    TipoEventoEnum.CAMA_ASIGNADA,
-                    TipoEventoEnum.TRASLADO_COMPLETADO,
-                    TipoEventoEnum.DERIVACION_COMPLETADA
-                ]),
-                EventoPaciente.timestamp >= fecha_inicio,
-                EventoPaciente.timestamp < fecha_fin
-            )
+        # Pacientes que llegan a camas del servicio (servicio_destino_id)
+        total = rollup_service.contar_pacientes(
+            session, TIPOS_LLEGADA_SERVICIO, fecha_inicio, fecha_fin,
+            servicio_destino_id=servicio_id
         )
-        total = session.exec(statement).first() or 0
         return {"total_ingresos_servicio": total}
 
-    @staticmethod
-    async def calcular_egresos_red(
+    @_calculo
+    def calcular_egresos_red(
         session: Session,
         fecha_inicio: datetime,
         fecha_fin: datetime
@@ -165,21 +203,14 @@ class EstadisticasService:
         Calcula los egresos totales de la red.
         Son pacientes que salen definitivamente (altas, fallecidos).
         """
-        statement = select(func.count(distinct(EventoPaciente.paciente_id))).where(
-            and_(
-                EventoPaciente.tipo_evento.in_([
-                    TipoEventoEnum.EGRESO_ALTA,
-                    TipoEventoEnum.EGRESO_FALLECIDO
-                ]),
-                EventoPaciente.timestamp >= fecha_inicio,
-                EventoPaciente.timestamp < fecha_fin
-            )
+        total = rollup_service.contar_pacientes(
+            session, [TipoEventoEnum.EGRESO_ALTA, TipoEventoEnum.EGRESO_FALLECIDO],
+            fecha_inicio, fecha_fin
         )
-        total = session.exec(statement).first() or 0
         return {"total": total}
 
-    @staticmethod
-    async def calcular_egresos_hospital(
+    @_calculo
+    def calcular_egresos_hospital(
         session: Session,
         hospital_id: str,
         fecha_inicio: datetime,
@@ -190,29 +221,16 @@ class EstadisticasService:
         Incluye: altas, fallecidos, derivaciones confirmadas (salen del hospital).
         """
         # Altas y fallecidos
-        statement_finales = select(func.count(distinct(EventoPaciente.paciente_id))).where(
-            and_(
-                EventoPaciente.hospital_id == hospital_id,
-                EventoPaciente.tipo_evento.in_([
-                    TipoEventoEnum.ALTA_COMPLETADA,
-                    TipoEventoEnum.FALLECIDO_EGRESADO
-                ]),
-                EventoPaciente.timestamp >= fecha_inicio,
-                EventoPaciente.timestamp < fecha_fin
-            )
+        egresos_finales = rollup_service.contar_pacientes(
+            session, [TipoEventoEnum.ALTA_COMPLETADA, TipoEventoEnum.FALLECIDO_EGRESADO],
+            fecha_inicio, fecha_fin, hospital_id=hospital_id
         )
-        egresos_finales = session.exec(statement_finales).first() or 0
 
         # Derivaciones confirmadas (paciente sale del hospital)
-        statement_derivados = select(func.count(distinct(EventoPaciente.paciente_id))).where(
-            and_(
-                EventoPaciente.hospital_id == hospital_id,
-                EventoPaciente.tipo_evento == TipoEventoEnum.DERIVACION_EGRESO_CONFIRMADO,
-                EventoPaciente.timestamp >= fecha_inicio,
-                EventoPaciente.timestamp < fecha_fin
-            )
+        egresos_derivados = rollup_service.contar_pacientes(
+            session, [TipoEventoEnum.DERIVACION_EGRESO_CONFIRMADO],
+            fecha_inicio, fecha_fin, hospital_id=hospital_id
         )
-        egresos_derivados = session.exec(statement_derivados).first() or 0
 
         total = egresos_finales + egresos_derivados
         return {
@@ -221,8 +239,8 @@ class EstadisticasService:
             "egresos_derivados": egresos_derivados
         }
 
-    @staticmethod
-    async def calcular_egresos_servicio(
+    @_calculo
+    def calcular_egresos_servicio(
         session: Session,
         servicio_id: str,
         fecha_inicio: datetime,
@@ -232,532 +250,264 @@ class EstadisticasService:
         Calcula los egresos de un servicio específico.
         Incluye: pacientes que salen del servicio (traslados, altas, derivaciones, fallecidos).
         """
-        # Obtener todas las camas del servicio
-        statement_camas = select(Cama).join(Sala).where(Sala.servicio_id == servicio_id)
-        camas = session.exec(statement_camas).all()
-        camas_ids = [cama.id for cama in camas]
-
-        if not camas_ids:
-            return {"total_egresos_servicio": 0}
-
-        # Contar eventos de salida desde camas del servicio
-        statement = select(func.count(distinct(EventoPaciente.paciente_id))).where(
-            and_(
-                EventoPaciente.cama_origen_id.in_(camas_ids),
-                EventoPaciente.tipo_evento.in_([
-                    TipoEventoEnum.TRASLADO_COMPLETADO,
-                    TipoEventoEnum.ALTA_COMPLETADA,
-                    TipoEventoEnum.DERIVACION_EGRESO_CONFIRMADO,
-                    TipoEventoEnum.FALLECIDO_EGRESADO
-                ]),
-                EventoPaciente.timestamp >= fecha_inicio,
-                EventoPaciente.timestamp < fecha_fin
-            )
+        # Pacientes que salen desde camas del servicio (servicio_origen_id)
+        total = rollup_service.contar_pacientes(
+            session, TIPOS_SALIDA_SERVICIO, fecha_inicio, fecha_fin,
+            servicio_origen_id=servicio_id
         )
-        total = session.exec(statement).first() or 0
         return {"total_egresos_servicio": total}
 
     # ============================================
     # TIEMPOS PROMEDIO/MÁXIMO/MÍNIMO
     # ============================================
+    # Las duraciones se atribuyen al día clínico del evento que las cierra
+    # (ver app/services/rollup_service.py).
 
-    @staticmethod
-    async def calcular_tiempo_espera_cama(
+    @_calculo
+    def calcular_tiempo_espera_cama(
         session: Session,
         fecha_inicio: Optional[datetime] = None,
-        fecha_fin: Optional[datetime] = None
-    ) -> Dict[str, float]:
+        fecha_fin: Optional[datetime] = None,
+        percentiles: Optional[Sequence[float]] = None
+    ) -> Dict[str, Any]:
         """
         Calcula el tiempo promedio/máximo/mínimo de espera de cama.
         Desde que se inicia búsqueda hasta que se asigna cama.
         """
-        # Buscar pares de eventos: BUSQUEDA_CAMA_INICIADA -> CAMA_ASIGNADA
-        query = select(EventoPaciente).where(
-            EventoPaciente.tipo_evento.in_([
-                TipoEventoEnum.BUSQUEDA_CAMA_INICIADA,
-                TipoEventoEnum.CAMA_ASIGNADA
-            ])
-        )
-
-        if fecha_inicio:
-            query = query.where(EventoPaciente.timestamp >= fecha_inicio)
-        if fecha_fin:
-            query = query.where(EventoPaciente.timestamp < fecha_fin)
-
-        query = query.order_by(EventoPaciente.paciente_id, EventoPaciente.timestamp)
-        eventos = session.exec(query).all()
+        resumen = rollup_service.resumen_duracion(session, "espera_cama", fecha_inicio, fecha_fin)
+        return _con_percentiles(session, resumen, "espera_cama", fecha_inicio, fecha_fin, percentiles)
 
-        # Agrupar por paciente y calcular duraciones
-        duraciones = []
-        eventos_por_paciente = defaultdict(list)
-
-        for evento in eventos:
-            eventos_por_paciente[evento.paciente_id].append(evento)
-
-        for paciente_id, eventos_paciente in eventos_por_paciente.items():
-            inicio = None
-            for evento in eventos_paciente:
-                if evento.tipo_evento == TipoEventoEnum.BUSQUEDA_CAMA_INICIADA:
-                    inicio = evento.timestamp
-                elif evento.tipo_evento == TipoEventoEnum.CAMA_ASIGNADA and inicio:
-                    duracion = (evento.timestamp - inicio).total_seconds()
-                    duraciones.append(duracion)
-                    inicio = None
-
-        if not duraciones:
-            return {"promedio": 0, "maximo": 0, "minimo": 0, "cantidad": 0}
-
-        return {
-            "promedio": sum(duraciones) / len(duraciones),
-            "maximo": max(duraciones),
-            "minimo": min(duraciones),
-            "cantidad": len(duraciones)
-        }
-
-    @staticmethod
-    async def calcular_tiempo_derivacion_pendiente(
+    @_calculo
+    def calcular_tiempo_derivacion_pendiente(
         session: Session,
         fecha_inicio: Optional[datetime] = None,
-        fecha_fin: Optional[datetime] = None
-    ) -> Dict[str, float]:
+        fecha_fin: Optional[datetime] = None,
+        percentiles: Optional[Sequence[float]] = None
+    ) -> Dict[str, Any]:
         """
         Calcula el tiempo de espera en derivación pendiente.
         Desde DERIVACION_SOLICITADA hasta DERIVACION_ACEPTADA/RECHAZADA.
         """
-        query = select(EventoPaciente).where(
-            EventoPaciente.tipo_evento.in_([
-                TipoEventoEnum.DERIVACION_SOLICITADA,
-                TipoEventoEnum.DERIVACION_ACEPTADA,
-                TipoEventoEnum.DERIVACION_RECHAZADA
-            ])
-        )
-
-        if fecha_inicio:
-            query = query.where(EventoPaciente.timestamp >= fecha_inicio)
-        if fecha_fin:
-            query = query.where(EventoPaciente.timestamp < fecha_fin)
-
-        query = query.order_by(EventoPaciente.paciente_id, EventoPaciente.timestamp)
-        eventos = session.exec(query).all()
-
-        duraciones = []
-        eventos_por_paciente = defaultdict(list)
-
-        for evento in eventos:
-            eventos_por_paciente[evento.paciente_id].append(evento)
+        resumen = rollup_service.resumen_duracion(session, "derivacion_pendiente", fecha_inicio, fecha_fin)
+        return _con_percentiles(session, resumen, "derivacion_pendiente", fecha_inicio, fecha_fin, percentiles)
 
-        for paciente_id, eventos_paciente in eventos_por_paciente.items():
-            inicio = None
-            for evento in eventos_paciente:
-                if evento.tipo_evento == TipoEventoEnum.DERIVACION_SOLICITADA:
-                    inicio = evento.timestamp
-                elif evento.tipo_evento in [TipoEventoEnum.DERIVACION_ACEPTADA, TipoEventoEnum.DERIVACION_RECHAZADA] and inicio:
-                    duracion = (evento.timestamp - inicio).total_seconds()
-                    duraciones.append(duracion)
-                    inicio = None
-
-        if not duraciones:
-            return {"promedio": 0, "maximo": 0, "minimo": 0, "cantidad": 0}
-
-        return {
-            "promedio": sum(duraciones) / len(duraciones),
-            "maximo": max(duraciones),
-            "minimo": min(duraciones),
-            "cantidad": len(duraciones)
-        }
-
-    @staticmethod
-    async def calcular_tiempo_traslado_saliente(
+    @_calculo
+    def calcular_tiempo_traslado_saliente(
         session: Session,
         fecha_inicio: Optional[datetime] = None,
-        fecha_fin: Optional[datetime] = None
-    ) -> Dict[str, float]:
+        fecha_fin: Optional[datetime] = None,
+        percentiles: Optional[Sequence[float]] = None
+    ) -> Dict[str, Any]:
         """
         Tiempo de paciente hospitalizado en espera de cama.
         Desde TRASLADO_INICIADO hasta TRASLADO_COMPLETADO.
         """
-        query = select(EventoPaciente).where(
-            EventoPaciente.tipo_evento.in_([
-                TipoEventoEnum.TRASLADO_INICIADO,
-                TipoEventoEnum.TRASLADO_COMPLETADO
-            ])
-        )
-
-        if fecha_inicio:
-            query = query.where(EventoPaciente.timestamp >= fecha_inicio)
-        if fecha_fin:
-            query = query.where(EventoPaciente.timestamp < fecha_fin)
-
-        query = query.order_by(EventoPaciente.paciente_id, EventoPaciente.timestamp)
-        eventos = session.exec(query).all()
-
-        duraciones = []
-        eventos_por_paciente = defaultdict(list)
-
-        for evento in eventos:
-            eventos_por_paciente[evento.paciente_id].append(evento)
-
-        for paciente_id, eventos_paciente in eventos_por_paciente.items():
-            inicio = None
-            for evento in eventos_paciente:
-                if evento.tipo_evento == TipoEventoEnum.TRASLADO_INICIADO:
-                    inicio = evento.timestamp
-                elif evento.tipo_evento == TipoEventoEnum.TRASLADO_COMPLETADO and inicio:
-                    duracion = (evento.timestamp - inicio).total_seconds()
-                    duraciones.append(duracion)
-                    inicio = None
-
-        if not duraciones:
-            return {"promedio": 0, "maximo": 0, "minimo": 0, "cantidad": 0}
-
-        return {
-            "promedio": sum(duraciones) / len(duraciones),
-            "maximo": max(duraciones),
-            "minimo": min(duraciones),
-            "cantidad": len(duraciones)
-        }
+        resumen = rollup_service.resumen_duracion(session, "traslado_saliente", fecha_inicio, fecha_fin)
+        return _con_percentiles(session, resumen, "traslado_saliente", fecha_inicio, fecha_fin, percentiles)
 
-    @staticmethod
-    async def calcular_tiempo_confirmacion_traslado(
+    @_calculo
+    def calcular_tiempo_confirmacion_traslado(
         session: Session,
         fecha_inicio: Optional[datetime] = None,
-        fecha_fin: Optional[datetime] = None
-    ) -> Dict[str, float]:
+        fecha_fin: Optional[datetime] = None,
+        percentiles: Optional[Sequence[float]] = None
+    ) -> Dict[str, Any]:
         """
         Tiempo en estado "cama en espera" (confirmación de traslado).
         Desde CAMA_EN_ESPERA_INICIO hasta CAMA_EN_ESPERA_FIN.
         """
-        query = select(EventoPaciente).where(
-            EventoPaciente.tipo_evento.in_([
-                TipoEventoEnum.CAMA_EN_ESPERA_INICIO,
-                TipoEventoEnum.CAMA_EN_ESPERA_FIN
-            ])
-        )
-
-        if fecha_inicio:
-            query = query.where(EventoPaciente.timestamp >= fecha_inicio)
-        if fecha_fin:
-            query = query.where(EventoPaciente.timestamp < fecha_fin)
-
-        query = query.order_by(EventoPaciente.paciente_id, EventoPaciente.timestamp)
-        eventos = session.exec(query).all()
-
-        duraciones = []
-        eventos_por_paciente = defaultdict(list)
-
-        for evento in eventos:
-            eventos_por_paciente[evento.paciente_id].append(evento)
-
-        for paciente_id, eventos_paciente in eventos_por_paciente.items():
-            inicio = None
-            for evento in eventos_paciente:
-                if evento.tipo_evento == TipoEventoEnum.CAMA_EN_ESPERA_INICIO:
-                    inicio = evento.timestamp
-                elif evento.tipo_evento == TipoEventoEnum.CAMA_EN_ESPERA_FIN and inicio:
-                    duracion = (evento.timestamp - inicio).total_seconds()
-                    duraciones.append(duracion)
-                    inicio = None
-
-        if not duraciones:
-            return {"promedio": 0, "maximo": 0, "minimo": 0, "cantidad": 0}
+        resumen = rollup_service.resumen_duracion(session, "confirmacion_traslado", fecha_inicio, fecha_fin)
+        return _con_percentiles(session, resumen, "confirmacion_traslado", fecha_inicio, fecha_fin, percentiles)
 
-        return {
-            "promedio": sum(duraciones) / len(duraciones),
-            "maximo": max(duraciones),
-            "minimo": min(duraciones),
-            "cantidad": len(duraciones)
-        }
-
-    @staticmethod
-    async def calcular_tiempo_alta(
+    @_calculo
+    def calcular_tiempo_alta(
         session: Session,
         fecha_inicio: Optional[datetime] = None,
-        fecha_fin: Optional[datetime] = None
+        fecha_fin: Optional[datetime] = None,
+        percentiles: Optional[Sequence[float]] = None
     ) -> Dict[str, Any]:
         """
         Calcula tiempos relacionados con altas.
         """
-        # Alta sugerida (ALTA_SUGERIDA -> ALTA_INICIADA)
-        query_sugerida = select(EventoPaciente).where(
-            EventoPaciente.tipo_evento.in_([
-                TipoEventoEnum.ALTA_SUGERIDA,
-                TipoEventoEnum.ALTA_INICIADA
-            ])
-        )
-        if fecha_inicio:
-            query_sugerida = query_sugerida.where(EventoPaciente.timestamp >= fecha_inicio)
-        if fecha_fin:
-            query_sugerida = query_sugerida.where(EventoPaciente.timestamp < fecha_fin)
-        query_sugerida = query_sugerida.order_by(EventoPaciente.paciente_id, EventoPaciente.timestamp)
-        eventos_sugerida = session.exec(query_sugerida).all()
-
-        duraciones_sugerida = []
-        eventos_por_paciente = defaultdict(list)
-        for evento in eventos_sugerida:
-            eventos_por_paciente[evento.paciente_id].append(evento)
-
-        for paciente_id, eventos_paciente in eventos_por_paciente.items():
-            inicio = None
-            for evento in eventos_paciente:
-                if evento.tipo_evento == TipoEventoEnum.ALTA_SUGERIDA:
-                    inicio = evento.timestamp
-                elif evento.tipo_evento == TipoEventoEnum.ALTA_INICIADA and inicio:
-                    duracion = (evento.timestamp - inicio).total_seconds()
-                    duraciones_sugerida.append(duracion)
-                    inicio = None
-
-        # Alta completada (ALTA_INICIADA -> ALTA_COMPLETADA)
-        query_completada = select(EventoPaciente).where(
-            EventoPaciente.tipo_evento.in_([
-                TipoEventoEnum.ALTA_INICIADA,
-                TipoEventoEnum.ALTA_COMPLETADA
-            ])
-        )
-        if fecha_inicio:
-            query_completada = query_completada.where(EventoPaciente.timestamp >= fecha_inicio)
-        if fecha_fin:
-            query_completada = query_completada.where(EventoPaciente.timestamp < fecha_fin)
-        query_completada = query_completada.order_by(EventoPaciente.paciente_id, EventoPaciente.timestamp)
-        eventos_completada = session.exec(query_completada).all()
-
-        duraciones_completada = []
-        eventos_por_paciente = defaultdict(list)
-        for evento in eventos_completada:
-            eventos_por_paciente[evento.paciente_id].append(evento)
-
-        for paciente_id, eventos_paciente in eventos_por_paciente.items():
-            inicio = None
-            for evento in eventos_paciente:
-                if evento.tipo_evento == TipoEventoEnum.ALTA_INICIADA:
-                    inicio = evento.timestamp
-                elif evento.tipo_evento == TipoEventoEnum.ALTA_COMPLETADA and inicio:
-                    duracion = (evento.timestamp - inicio).total_seconds()
-                    duraciones_completada.append(duracion)
-                    inicio = None
-
+        # ALTA_SUGERIDA -> ALTA_INICIADA, ALTA_INICIADA -> ALTA_COMPLETADA
         return {
-            "alta_sugerida": {
-                "promedio": sum(duraciones_sugerida) / len(duraciones_sugerida) if duraciones_sugerida else 0,
-                "maximo": max(duraciones_sugerida) if duraciones_sugerida else 0,
-                "minimo": min(duraciones_sugerida) if duraciones_sugerida else 0,
-                "cantidad": len(duraciones_sugerida)
-            },
-            "alta_completada": {
-                "promedio": sum(duraciones_completada) / len(duraciones_completada) if duraciones_completada else 0,
-                "maximo": max(duraciones_completada) if duraciones_completada else 0,
-                "minimo": min(duraciones_completada) if duraciones_completada else 0,
-                "cantidad": len(duraciones_completada)
-            }
+            nombre: _con_percentiles(
+                session,
+                rollup_service.resumen_duracion(session, nombre, fecha_inicio, fecha_fin),
+                nombre, fecha_inicio, fecha_fin, percentiles,
+            )
+            for nombre in ("alta_sugerida", "alta_completada")
         }
 
-    @staticmethod
-    async def calcular_tiempo_fallecido(
+    @_calculo
+    def calcular_tiempo_fallecido(
         session: Session,
         fecha_inicio: Optional[datetime] = None,
-        fecha_fin: Optional[datetime] = None
-    ) -> Dict[str, float]:
+        fecha_fin: Optional[datetime] = None,
+        percentiles: Optional[Sequence[float]] = None
+    ) -> Dict[str, Any]:
         """
         Tiempo desde que se marca como fallecido hasta que egresa.
         Desde FALLECIDO_MARCADO hasta FALLECIDO_EGRESADO.
         """
-        query = select(EventoPaciente).where(
-            EventoPaciente.tipo_evento.in_([
-                TipoEventoEnum.FALLECIDO_MARCADO,
-                TipoEventoEnum.FALLECIDO_EGRESADO
-            ])
-        )
-
-        if fecha_inicio:
-            query = query.where(EventoPaciente.timestamp >= fecha_inicio)
-        if fecha_fin:
-            query = query.where(EventoPaciente.timestamp < fecha_fin)
-
-        query = query.order_by(EventoPaciente.paciente_id, EventoPaciente.timestamp)
-        eventos = session.exec(query).all()
-
-        duraciones = []
-        eventos_por_paciente = defaultdict(list)
-
-        for evento in eventos:
-            eventos_por_paciente[evento.paciente_id].append(evento)
+        resumen = rollup_service.resumen_duracion(session, "fallecido", fecha_inicio, fecha_fin)
+        return _con_percentiles(session, resumen, "fallecido", fecha_inicio, fecha_fin, percentiles)
 
-        for paciente_id, eventos_paciente in eventos_por_paciente.items():
-            inicio = None
-            for evento in eventos_paciente:
-                if evento.tipo_evento == TipoEventoEnum.FALLECIDO_MARCADO:
-                    inicio = evento.timestamp
-                elif evento.tipo_evento == TipoEventoEnum.FALLECIDO_EGRESADO and inicio:
-                    duracion = (evento.timestamp - inicio).total_seconds()
-                    duraciones.append(duracion)
-                    inicio = None
-
-        if not duraciones:
-            return {"promedio": 0, "maximo": 0, "minimo": 0, "cantidad": 0}
-
-        return {
-            "promedio": sum(duraciones) / len(duraciones),
-            "maximo": max(duraciones),
-            "minimo": min(duraciones),
-            "cantidad": len(duraciones)
-        }
-
-    @staticmethod
-    async def calcular_tiempo_hospitalizacion(
+    @_calculo
+    def calcular_tiempo_hospitalizacion(
         session: Session,
         hospital_id: Optional[str] = None,
         solo_casos_especiales: Optional[bool] = None,
         fecha_inicio: Optional[datetime] = None,
-        fecha_fin: Optional[datetime] = None
-    ) -> Dict[str, float]:
+        fecha_fin: Optional[datetime] = None,
+        percentiles: Optional[Sequence[float]] = None
+    ) -> Dict[str, Any]:
         """
         Calcula tiempo de hospitalización.
         Desde primer ingreso hasta egreso final.
+
+        Con hospital_id se mide la estancia en ese hospital (una derivación
+        aceptada abre una nueva); sin él, desde el primer ingreso en
+        cualquier hospital de la red hasta el egreso final.
         """
-        # Buscar eventos de ingreso y egreso
-        query = select(EventoPaciente).where(
-            EventoPaciente.tipo_evento.in_([
-                TipoEventoEnum.INGRESO_URGENCIA,
-                TipoEventoEnum.INGRESO_AMBULATORIO,
-                TipoEventoEnum.DERIVACION_ACEPTADA,
-                TipoEventoEnum.ALTA_COMPLETADA,
-                TipoEventoEnum.FALLECIDO_EGRESADO
-            ])
-        )
+        nombre = "hospitalizacion" if hospital_id else "hospitalizacion_red"
+        if solo_casos_especiales is None:
+            resumen = rollup_service.resumen_duracion(
+                session, nombre, fecha_inicio, fecha_fin, hospital_id=hospital_id
+            )
+            return _con_percentiles(
+                session, resumen, nombre, fecha_inicio, fecha_fin, percentiles, hospital_id
+            )
 
-        if hospital_id:
-            query = query.where(EventoPaciente.hospital_id == hospital_id)
-        if fecha_inicio:
-            query = query.where(EventoPaciente.timestamp >= fecha_inicio)
-        if fecha_fin:
-            query = query.where(EventoPaciente.timestamp < fecha_fin)
-
-        query = query.order_by(EventoPaciente.paciente_id, EventoPaciente.timestamp)
-        eventos = session.exec(query).all()
-
-        duraciones = []
-        eventos_por_paciente = defaultdict(list)
-
-        for evento in eventos:
-            eventos_por_paciente[evento.paciente_id].append(evento)
-
-        for paciente_id, eventos_paciente in eventos_por_paciente.items():
-            # Filtrar por casos especiales si se especifica
-            if solo_casos_especiales is not None:
-                paciente = session.get(Paciente, paciente_id)
-                if paciente:
-                    tiene_casos_especiales = paciente.tiene_casos_especiales()
-                    if solo_casos_especiales and not tiene_casos_especiales:
-                        continue
-                    if not solo_casos_especiales and tiene_casos_especiales:
-                        continue
-
-            primer_ingreso = None
-            for evento in eventos_paciente:
-                if evento.tipo_evento in [TipoEventoEnum.INGRESO_URGENCIA, TipoEventoEnum.INGRESO_AMBULATORIO, TipoEventoEnum.DERIVACION_ACEPTADA]:
-                    if primer_ingreso is None:
-                        primer_ingreso = evento.timestamp
-                elif evento.tipo_evento in [TipoEventoEnum.ALTA_COMPLETADA, TipoEventoEnum.FALLECIDO_EGRESADO] and primer_ingreso:
-                    duracion = (evento.timestamp - primer_ingreso).total_seconds()
-                    duraciones.append(duracion)
-                    primer_ingreso = None
+        # El filtro por casos especiales depende del estado actual del
+        # paciente, por lo que no se agrega en los rollups. casos_especiales
+        # es texto JSON: se evalúa una vez por valor distinto y se filtra en SQL.
+        metrica = METRICAS_DURACION[nombre]
+        pares = motor_duraciones.consulta_pares(
+            metrica, session.get_bind().dialect.name, fecha_inicio, fecha_fin, hospital_id
+        ).subquery("pares")
+        valores = session.exec(
+            select(Paciente.casos_especiales)
+            .where(Paciente.id.in_(select(pares.c.paciente_id)))
+            .distinct()
+        ).all()
+        coinciden = [v for v in valores if bool(_lista_json(v)) == solo_casos_especiales]
+        condicion = [
+            Paciente.id.is_(None),  # Paciente eliminado: cuenta en ambos filtros
+            Paciente.casos_especiales.in_([v for v in coinciden if v is not None]),
+        ]
+        if None in coinciden:
+            condicion.append(Paciente.casos_especiales.is_(None))
+        duraciones = list(session.exec(
+            select(pares.c.duracion)
+            .select_from(pares.outerjoin(Paciente, Paciente.id == pares.c.paciente_id))
+            .where(or_(*condicion))
+        ).all())
 
         if not duraciones:
             return {"promedio": 0, "maximo": 0, "minimo": 0, "cantidad": 0}
 
-        return {
+        resumen = {
             "promedio": sum(duraciones) / len(duraciones),
             "maximo": max(duraciones),
             "minimo": min(duraciones),
             "cantidad": len(duraciones)
         }
+        if percentiles:
+            resumen["percentiles"] = analitica_duraciones.calcular_percentiles(duraciones, percentiles)
+        return resumen
+
+    @_calculo
+    def calcular_estancia_servicios(
+        session: Session,
+        hospital_id: Optional[str] = None,
+        servicio_id: Optional[str] = None,
+        fecha_inicio: Optional[datetime] = None,
+        fecha_fin: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Tiempo de estancia por servicio (segundos), sobre las estancias que
+        terminaron en la ventana.
+        """
+        e = EstanciaServicio
+        query = select(
+            e.servicio_id,
+            e.hospital_id,
+            func.count(),
+            func.avg(e.duracion_segundos),
+            func.max(e.duracion_segundos),
+            func.min(e.duracion_segundos),
+        ).where(e.salida.isnot(None))
+        if fecha_inicio is not None:
+            query = query.where(e.salida >= fecha_inicio)
+        if fecha_fin is not None:
+            query = query.where(e.salida < fecha_fin)
+        if hospital_id:
+            query = query.where(e.hospital_id == hospital_id)
+        if servicio_id:
+            query = query.where(e.servicio_id == servicio_id)
+
+        topologia = obtener_topologia(session)
+        resultados = [
+            {
+                "servicio_id": servicio,
+                "servicio_nombre": topologia.nombre_servicio(servicio),
+                "hospital_id": hospital,
+                "promedio": float(promedio or 0),
+                "maximo": float(maximo or 0),
+                "minimo": float(minimo or 0),
+                "cantidad": cantidad,
+            }
+            for servicio, hospital, cantidad, promedio, maximo, minimo in session.exec(
+                query.group_by(e.servicio_id, e.hospital_id)
+            ).all()
+        ]
+        resultados.sort(key=lambda x: (-x["promedio"], x["servicio_nombre"] or ""))
+        return resultados
 
     # ============================================
     # TASAS DE OCUPACIÓN
     # ============================================
 
-    @staticmethod
-    async def calcular_tasa_ocupacion_hospital(
+    @_calculo
+    def calcular_tasa_ocupacion_hospital(
         session: Session,
         hospital_id: str
-    ) -> Dict[str, float]:
+    ) -> Dict[str, Any]:
         """
-        Calcula la tasa de ocupación de un hospital.
+        Calcula la tasa de ocupación de un hospital (contadores de ocupación).
         """
-        # Obtener todas las camas del hospital
-        statement = (
-            select(Cama)
-            .join(Sala)
-            .join(Servicio)
-            .where(Servicio.hospital_id == hospital_id)
+        return ocupacion_service.resumen_ocupacion(
+            ocupacion_service.conteos(session, hospital_id=hospital_id)
         )
-        camas = session.exec(statement).all()
 
-        total_camas = len(camas)
-        if total_camas == 0:
-            return {"tasa_ocupacion": 0, "camas_ocupadas": 0, "camas_totales": 0}
-
-        camas_ocupadas = sum(1 for cama in camas if cama.esta_ocupada)
-        tasa = (camas_ocupadas / total_camas) * 100
-
-        return {
-            "tasa_ocupacion": round(tasa, 2),
-            "camas_ocupadas": camas_ocupadas,
-            "camas_totales": total_camas
-        }
-
-    @staticmethod
-    async def calcular_tasa_ocupacion_servicio(
+    @_calculo
+    def calcular_tasa_ocupacion_servicio(
         session: Session,
         servicio_id: str
-    ) -> Dict[str, float]:
+    ) -> Dict[str, Any]:
         """
-        Calcula la tasa de ocupación de un servicio.
+        Calcula la tasa de ocupación de un servicio (contadores de ocupación).
         """
-        statement = select(Cama).join(Sala).where(Sala.servicio_id == servicio_id)
-        camas = session.exec(statement).all()
-
-        total_camas = len(camas)
-        if total_camas == 0:
-            return {"tasa_ocupacion": 0, "camas_ocupadas": 0, "camas_totales": 0}
-
-        camas_ocupadas = sum(1 for cama in camas if cama.esta_ocupada)
-        tasa = (camas_ocupadas / total_camas) * 100
-
-        return {
-            "tasa_ocupacion": round(tasa, 2),
-            "camas_ocupadas": camas_ocupadas,
-            "camas_totales": total_camas
-        }
+        return ocupacion_service.resumen_ocupacion(
+            ocupacion_service.conteos(session, servicio_id=servicio_id)
+        )
 
-    @staticmethod
-    async def calcular_tasa_ocupacion_red(
+    @_calculo
+    def calcular_tasa_ocupacion_red(
         session: Session
-    ) -> Dict[str, float]:
+    ) -> Dict[str, Any]:
         """
-        Calcula la tasa de ocupación de toda la red.
+        Calcula la tasa de ocupación de toda la red (contadores de ocupación).
         """
-        statement = select(Cama)
-        camas = session.exec(statement).all()
-
-        total_camas = len(camas)
-        if total_camas == 0:
-            return {"tasa_ocupacion": 0, "camas_ocupadas": 0, "camas_totales": 0}
-
-        camas_ocupadas = sum(1 for cama in camas if cama.esta_ocupada)
-        tasa = (camas_ocupadas / total_camas) * 100
-
-        return {
-            "tasa_ocupacion": round(tasa, 2),
-            "camas_ocupadas": camas_ocupadas,
-            "camas_totales": total_camas
-        }
+        return ocupacion_service.resumen_ocupacion(ocupacion_service.conteos(session))
 
     # ============================================
     # FLUJOS Y DEMANDA
     # ============================================
 
-    @staticmethod
-    async def calcular_flujos_mas_repetidos(
+    @_calculo
+    def calcular_flujos_mas_repetidos(
         session: Session,
         fecha_inicio: datetime,
         fecha_fin: datetime,
@@ -765,94 +515,122 @@ class EstadisticasService:
     ) -> List[Dict[str, Any]]:
         """
         Determina los flujos más repetidos (traslados y derivaciones).
+
+        El conteo se agrupa en la base de datos: traslados por par de
+        servicios y derivaciones por (hospital destino, metadata), que tiene
+        pocos valores distintos. Los nombres se resuelven una vez por par.
         """
-        # Traslados internos
-        query_traslados = select(EventoPaciente).where(
-            and_(
+        flujos = defaultdict(int)
+
+        # Traslados internos: GROUP BY ids y luego nombres de servicio
+        pares = (
+            select(
+                EventoPaciente.servicio_origen_id.label("origen_id"),
+                EventoPaciente.servicio_destino_id.label("destino_id"),
+                func.count().label("cantidad"),
+            )
+            .where(
                 EventoPaciente.tipo_evento == TipoEventoEnum.TRASLADO_COMPLETADO,
                 EventoPaciente.timestamp >= fecha_inicio,
-                EventoPaciente.timestamp < fecha_fin
+                EventoPaciente.timestamp < fecha_fin,
+                EventoPaciente.servicio_origen_id.isnot(None),
+                EventoPaciente.servicio_destino_id.isnot(None),
             )
+            .group_by(EventoPaciente.servicio_origen_id, EventoPaciente.servicio_destino_id)
+            .subquery()
         )
-        eventos_traslados = session.exec(query_traslados).all()
-
-        # Contar flujos
-        flujos = defaultdict(int)
-
-        for evento in eventos_traslados:
-            if evento.servicio_origen_id and evento.servicio_destino_id:
-                servicio_origen = session.get(Servicio, evento.servicio_origen_id)
-                servicio_destino = session.get(Servicio, evento.servicio_destino_id)
-
-                if servicio_origen and servicio_destino:
-                    flujo = f"{servicio_origen.nombre} -> {servicio_destino.nombre}"
-                    flujos[flujo] += 1
-
-        # Derivaciones
-        query_derivaciones = select(EventoPaciente).where(
-            and_(
+        servicio_origen = aliased(Servicio)
+        servicio_destino = aliased(Servicio)
+        filas_traslados = session.exec(
+            select(servicio_origen.nombre, servicio_destino.nombre, pares.c.cantidad)
+            .select_from(pares)
+            .join(servicio_origen, servicio_origen.id == pares.c.origen_id)
+            .join(servicio_destino, servicio_destino.id == pares.c.destino_id)
+        ).all()
+        for nombre_origen, nombre_destino, cantidad in filas_traslados:
+            flujos[f"{nombre_origen} -> {nombre_destino}"] += cantidad
+
+        # Derivaciones: el hospital de origen viaja en la metadata JSON
+        filas_derivaciones = session.exec(
+            select(
+                EventoPaciente.hospital_destino_id,
+                EventoPaciente.datos_adicionales,
+                func.count(),
+            )
+            .where(
                 EventoPaciente.tipo_evento == TipoEventoEnum.DERIVACION_COMPLETADA,
                 EventoPaciente.timestamp >= fecha_inicio,
-                EventoPaciente.timestamp < fecha_fin
+                EventoPaciente.timestamp < fecha_fin,
+                EventoPaciente.hospital_destino_id.isnot(None),
             )
-        )
-        eventos_derivaciones = session.exec(query_derivaciones).all()
-
-        for evento in eventos_derivaciones:
-            if evento.hospital_destino_id:
-                metadata = evento.get_metadata()
-                hospital_origen_id = metadata.get("hospital_origen")
-                if hospital_origen_id:
-                    hospital_origen = session.get(Hospital, hospital_origen_id)
-                    hospital_destino = session.get(Hospital, evento.hospital_destino_id)
-
-                    if hospital_origen and hospital_destino:
-                        flujo = f"{hospital_origen.nombre} -> {hospital_destino.nombre} (Derivación)"
-                        flujos[flujo] += 1
-
-        # Ordenar por frecuencia
-        flujos_ordenados = sorted(flujos.items(), key=lambda x: x[1], reverse=True)[:limite]
+            .group_by(EventoPaciente.hospital_destino_id, EventoPaciente.datos_adicionales)
+        ).all()
+        pares_hospitales = defaultdict(int)
+        for hospital_destino_id, datos, cantidad in filas_derivaciones:
+            hospital_origen_id = _metadata(datos).get("hospital_origen")
+            if hospital_origen_id:
+                pares_hospitales[(hospital_origen_id, hospital_destino_id)] += cantidad
+
+        if pares_hospitales:
+            ids = {h for par in pares_hospitales for h in par}
+            nombres = dict(session.exec(
+                select(Hospital.id, Hospital.nombre).where(Hospital.id.in_(ids))
+            ).all())
+            for (origen_id, destino_id), cantidad in pares_hospitales.items():
+                if origen_id in nombres and destino_id in nombres:
+                    flujo = f"{nombres[origen_id]} -> {nombres[destino_id]} (Derivación)"
+                    flujos[flujo] += cantidad
+
+        # Ordenar por frecuencia (empates por nombre, para un orden estable)
+        flujos_ordenados = sorted(flujos.items(), key=lambda x: (-x[1], x[0]))[:limite]
 
         return [
             {"flujo": flujo, "cantidad": cantidad}
             for flujo, cantidad in flujos_ordenados
         ]
 
-    @staticmethod
-    async def calcular_servicios_mayor_demanda(
+    @_calculo
+    def calcular_servicios_mayor_demanda(
         session: Session
     ) -> List[Dict[str, Any]]:
         """
         Determina servicios con mayor demanda.
         Basado en tasa de ocupación y pacientes en espera compatibles.
-        """
-        servicios = session.exec(select(Servicio)).all()
 
-        resultados = []
-        for servicio in servicios:
-            # Calcular tasa de ocupación
-            tasa_ocupacion = await EstadisticasService.calcular_tasa_ocupacion_servicio(
-                session, servicio.id
+        Una consulta agrupada para la lista de espera por hospital y otra
+        para los contadores de ocupación, sin importar el número de servicios.
+        """
+        # Contar pacientes en espera por hospital
+        # (la compatibilidad con el servicio requeriría lógica más compleja)
+        espera = (
+            select(Paciente.hospital_id, func.count().label("cantidad"))
+            .where(Paciente.en_lista_espera == True)
+            .group_by(Paciente.hospital_id)
+            .subquery()
+        )
+        servicios = session.exec(
+            select(
+                Servicio.id,
+                Servicio.nombre,
+                Servicio.hospital_id,
+                func.coalesce(espera.c.cantidad, 0),
             )
+            .outerjoin(espera, espera.c.hospital_id == Servicio.hospital_id)
+        ).all()
+        ocupacion = ocupacion_service.conteos_por_servicio(session)
 
-            # Contar pacientes en espera compatibles con el servicio
-            # (esto requeriría lógica de compatibilidad más compleja)
-            pacientes_espera = session.exec(
-                select(Paciente).where(
-                    and_(
-                        Paciente.en_lista_espera == True,
-                        Paciente.hospital_id == servicio.hospital_id
-                    )
-                )
-            ).all()
-
+        resultados = []
+        for servicio_id, nombre, hospital_id, pacientes_espera in servicios:
+            tasa_ocupacion = ocupacion_service.resumen_ocupacion(
+                ocupacion.get(servicio_id, {})
+            )["tasa_ocupacion"]
             resultados.append({
-                "servicio_id": servicio.id,
-                "servicio_nombre": servicio.nombre,
-                "hospital_id": servicio.hospital_id,
-                "tasa_ocupacion": tasa_ocupacion["tasa_ocupacion"],
-                "pacientes_en_espera": len(pacientes_espera),
-                "demanda_score": tasa_ocupacion["tasa_ocupacion"] + (len(pacientes_espera) * 10)
+                "servicio_id": servicio_id,
+                "servicio_nombre": nombre,
+                "hospital_id": hospital_id,
+                "tasa_ocupacion": tasa_ocupacion,
+                "pacientes_en_espera": pacientes_espera,
+                "demanda_score": tasa_ocupacion + (pacientes_espera * 10)
             })
 
         # Ordenar por demanda
@@ -864,37 +642,43 @@ class EstadisticasService:
     # CASOS ESPECIALES
     # ============================================
 
-    @staticmethod
-    async def calcular_casos_especiales(
+    @_calculo
+    def calcular_casos_especiales(
         session: Session,
         hospital_id: Optional[str] = None
     ) -> Dict[str, int]:
         """
         Cuenta pacientes con casos especiales.
+
+        Agrupa por el valor almacenado (índice parcial
+        ix_paciente_casos_especiales): hay pocas combinaciones distintas, así
+        que cada una se interpreta una sola vez y se pondera por su conteo.
         """
-        query = select(Paciente).where(Paciente.casos_especiales.isnot(None))
+        query = (
+            select(Paciente.casos_especiales, func.count())
+            .where(Paciente.casos_especiales.isnot(None))
+            .group_by(Paciente.casos_especiales)
+        )
 
         if hospital_id:
             query = query.where(Paciente.hospital_id == hospital_id)
 
-        pacientes = session.exec(query).all()
-
         # Contar por tipo
         total = 0
         cardiocirugia = 0
         caso_social = 0
         caso_socio_judicial = 0
 
-        for paciente in pacientes:
-            casos = paciente.get_requerimientos_lista("casos_especiales")
+        for valor, cantidad in session.exec(query).all():
+            casos = _lista_json(valor)
             if casos:
-                total += 1
+                total += cantidad
                 if "cardiocirugía" in casos or "Cardiocirugía" in casos:
-                    cardiocirugia += 1
+                    cardiocirugia += cantidad
                 if "caso social" in casos or "Caso social" in casos:
-                    caso_social += 1
+                    caso_social += cantidad
                 if "caso socio-judicial" in casos or "Caso socio-judicial" in casos:
-                    caso_socio_judicial += 1
+                    caso_socio_judicial += cantidad
 
         return {
             "total": total,
@@ -907,8 +691,8 @@ class EstadisticasService:
     # SUBUTILIZACIÓN
     # ============================================
 
-    @staticmethod
-    async def calcular_camas_subutilizadas(
+    @_calculo
+    def calcular_camas_subutilizadas(
         session: Session,
         hospital_id: Optional[str] = None,
         dias: int = 1
@@ -929,13 +713,13 @@ class EstadisticasService:
             query = query.join(Sala).join(Servicio).where(Servicio.hospital_id == hospital_id)
 
         camas = session.exec(query).all()
+        topologia = obtener_topologia(session)
 
         resultados = []
         for cama in camas:
             tiempo_libre = (datetime.utcnow() - cama.estado_updated_at).total_seconds() / 3600  # horas
 
-            sala = session.get(Sala, cama.sala_id) if cama.sala_id else None
-            servicio = session.get(Servicio, sala.servicio_id) if sala and sala.servicio_id else None
+            servicio = topologia.servicio_de_cama(cama.id)
 
             resultados.append({
                 "cama_id": cama.id,
@@ -949,23 +733,20 @@ class EstadisticasService:
 
         return resultados
 
-    @staticmethod
-    async def calcular_servicios_subutilizados(
+    @_calculo
+    def calcular_servicios_subutilizados(
         session: Session,
         hospital_id: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
         Identifica servicios con mayor tasa de camas libres al final del día clínico.
         """
-        servicios_query = select(Servicio)
-        if hospital_id:
-            servicios_query = servicios_query.where(Servicio.hospital_id == hospital_id)
-
-        servicios = session.exec(servicios_query).all()
+        servicios = obtener_topologia(session).servicios_de_hospital(hospital_id)
+        por_servicio = ocupacion_service.conteos_por_servicio(session, hospital_id)
 
         resultados = []
         for servicio in servicios:
-            tasa = await EstadisticasService.calcular_tasa_ocupacion_servicio(session, servicio.id)
+            tasa = ocupacion_service.resumen_ocupacion(por_servicio.get(servicio.id, {}))
 
             if tasa["camas_totales"] > 0:
                 tasa_libre = 100 - tasa["tasa_ocupacion"]
@@ -989,63 +770,39 @@ class EstadisticasService:
     # TRAZABILIDAD
     # ============================================
 
-    @staticmethod
-    async def obtener_trazabilidad_paciente(
+    @_calculo
+    def obtener_trazabilidad_paciente(
         session: Session,
         paciente_id: str
     ) -> List[Dict[str, Any]]:
         """
         Obtiene la trazabilidad completa de un paciente.
-        Muestra todos los servicios por donde ha pasado con tiempos.
+        Muestra todos los servicios por donde ha pasado con tiempos
+        (estancias materializadas en estancia_servicio).
         """
-        # Obtener todos los eventos del paciente ordenados cronológicamente
-        query = select(EventoPaciente).where(
-            EventoPaciente.paciente_id == paciente_id
-        ).order_by(EventoPaciente.timestamp)
-
-        eventos = session.exec(query).all()
+        estancias = session.exec(
+            select(EstanciaServicio)
+            .where(EstanciaServicio.paciente_id == paciente_id)
+            .order_by(EstanciaServicio.entrada, EstanciaServicio.evento_entrada_id)
+        ).all()
+        topologia = obtener_topologia(session)
+        ahora = datetime.utcnow()
 
         trazabilidad = []
-        servicio_actual = None
-        entrada_servicio = None
-
-        for evento in eventos:
-            # Detectar entrada a un servicio
-            if evento.tipo_evento in [TipoEventoEnum.CAMA_ASIGNADA, TipoEventoEnum.TRASLADO_COMPLETADO, TipoEventoEnum.DERIVACION_COMPLETADA]:
-                if evento.servicio_destino_id:
-                    # Si había un servicio previo, cerrar su registro
-                    if servicio_actual and entrada_servicio:
-                        servicio = session.get(Servicio, servicio_actual)
-                        duracion = (evento.timestamp - entrada_servicio).total_seconds()
-                        dias = int(duracion // 86400)
-                        horas = int((duracion % 86400) // 3600)
-
-                        trazabilidad.append({
-                            "servicio_nombre": servicio.nombre if servicio else "Desconocido",
-                            "entrada": entrada_servicio.isoformat(),
-                            "salida": evento.timestamp.isoformat(),
-                            "duracion_dias": dias,
-                            "duracion_horas": horas,
-                            "duracion_total_segundos": int(duracion)
-                        })
-
-                    # Iniciar nuevo servicio
-                    servicio_actual = evento.servicio_destino_id
-                    entrada_servicio = evento.timestamp
-
-        # Cerrar el servicio actual si existe
-        if servicio_actual and entrada_servicio:
-            servicio = session.get(Servicio, servicio_actual)
-            duracion = (datetime.utcnow() - entrada_servicio).total_seconds()
-            dias = int(duracion // 86400)
-            horas = int((duracion % 86400) // 3600)
+        for estancia in estancias:
+            if estancia.salida is not None:
+                duracion = estancia.duracion_segundos
+                salida = estancia.salida.isoformat()
+            else:
+                duracion = (ahora - estancia.entrada).total_seconds()
+                salida = "Actual"
 
             trazabilidad.append({
-                "servicio_nombre": servicio.nombre if servicio else "Desconocido",
-                "entrada": entrada_servicio.isoformat(),
-                "salida": "Actual",
-                "duracion_dias": dias,
-                "duracion_horas": horas,
+                "servicio_nombre": topologia.nombre_servicio(estancia.servicio_id),
+                "entrada": estancia.entrada.isoformat(),
+                "salida": salida,
+                "duracion_dias": int(duracion // 86400),
+                "duracion_horas": int((duracion % 86400) // 3600),
                 "duracion_total_segundos": int(duracion)
             })
 
@@ -0,0 +1,207 @@
+"""
+Estancias por servicio (tabla estancia_servicio).
+
+Una estancia va desde un evento de llegada con servicio destino hasta el
+siguiente evento de borde del mismo paciente (llegada a otro servicio o
+egreso), el mismo criterio que la exportación de estancias y la ocupación
+histórica. Con la tabla materializada, la trazabilidad de un paciente es
+una lectura por índice y los tiempos de estancia son agregados simples.
+
+- aplicar_eventos(): mantenimiento incremental desde insertar_filas, en la
+  transacción del llamador. Por paciente, recalcula solo desde el borde más
+  antiguo del lote: lo normal es cerrar la estancia abierta y abrir la
+  siguiente; un evento atrasado rehace las estancias posteriores.
+- reconstruir_estancias(): recalcula todo (o algunos pacientes) con LEAD()
+  en la base. Necesario tras escribir_eventos_masivo, que no mantiene la
+  tabla (scripts/reconstruir_estancias.py).
+"""
+import logging
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import String, cast, delete, func, insert, or_, select, update
+from sqlmodel import Session
+
+from app.models.estancia_servicio import EstanciaServicio
+from app.models.evento_paciente import EventoPaciente
+from app.services.estadisticas_service import TIPOS_LLEGADA_SERVICIO, TIPOS_SALIDA_SERVICIO
+from app.services.motor_duraciones import segundos_entre
+
+logger = logging.getLogger("gestion_camas.estancias")
+
+
+TABLA = EstanciaServicio.__table__
+TABLA_EVENTOS = EventoPaciente.__table__
+
+TIPOS_BORDE = tuple(dict.fromkeys(TIPOS_LLEGADA_SERVICIO + TIPOS_SALIDA_SERVICIO))
+
+
+def _tipo(valor: Any) -> Any:
+    return valor.value if isinstance(valor, Enum) else valor
+
+
+def _abre_estancia(borde: Dict[str, Any]) -> bool:
+    return borde["tipo_evento"] in TIPOS_LLEGADA_SERVICIO and bool(borde["servicio_destino_id"])
+
+
+def _cierre(entrada: datetime, borde: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Columnas de salida de una estancia cerrada por `borde` (None: en curso)."""
+    if borde is None:
+        return {"evento_salida_id": None, "tipo_salida": None, "salida": None, "duracion_segundos": None}
+    return {
+        "evento_salida_id": borde["id"],
+        "tipo_salida": _tipo(borde["tipo_evento"]),
+        "salida": borde["timestamp"],
+        "duracion_segundos": (borde["timestamp"] - entrada).total_seconds(),
+    }
+
+
+def estancias_de_bordes(bordes: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Estancias (filas de estancia_servicio) de los bordes de un paciente,
+    ordenados por (timestamp, id). La última queda abierta.
+    """
+    estancias = []
+    for i, borde in enumerate(bordes):
+        if not _abre_estancia(borde):
+            continue
+        siguiente = bordes[i + 1] if i + 1 < len(bordes) else None
+        estancias.append({
+            "evento_entrada_id": borde["id"],
+            "paciente_id": borde["paciente_id"],
+            "hospital_id": borde["hospital_id"],
+            "servicio_id": borde["servicio_destino_id"],
+            "cama_id": borde["cama_destino_id"],
+            "tipo_entrada": _tipo(borde["tipo_evento"]),
+            "entrada": borde["timestamp"],
+            **_cierre(borde["timestamp"], siguiente),
+        })
+    return estancias
+
+
+# ============================================
+# MANTENIMIENTO INCREMENTAL
+# ============================================
+
+def aplicar_eventos(session: Session, filas: Iterable[Dict[str, Any]]) -> int:
+    """
+    Actualiza estancia_servicio con eventos recién insertados (visibles en
+    la transacción de `session`). No confirma la transacción.
+
+    Returns:
+        Número de estancias escritas (nuevas o rehechas)
+    """
+    desde_por_paciente: Dict[str, datetime] = {}
+    for fila in filas:
+        if fila["tipo_evento"] not in TIPOS_BORDE:
+            continue
+        paciente_id = fila["paciente_id"]
+        if paciente_id not in desde_por_paciente or fila["timestamp"] < desde_por_paciente[paciente_id]:
+            desde_por_paciente[paciente_id] = fila["timestamp"]
+    if not desde_por_paciente:
+        return 0
+
+    pacientes = list(desde_por_paciente)
+    desde = min(desde_por_paciente.values())
+    e, t = TABLA_EVENTOS, TABLA
+
+    bordes_por_paciente: Dict[str, List[Dict[str, Any]]] = {p: [] for p in pacientes}
+    for borde in session.execute(
+        select(
+            e.c.id, e.c.paciente_id, e.c.hospital_id, e.c.servicio_destino_id,
+            e.c.cama_destino_id, e.c.tipo_evento, e.c.timestamp,
+        ).where(
+            e.c.paciente_id.in_(pacientes),
+            e.c.tipo_evento.in_(TIPOS_BORDE),
+            e.c.timestamp >= desde,
+        ).order_by(e.c.paciente_id, e.c.timestamp, e.c.id)
+    ).mappings():
+        if borde["timestamp"] >= desde_por_paciente[borde["paciente_id"]]:
+            bordes_por_paciente[borde["paciente_id"]].append(dict(borde))
+
+    # Estancias que pueden cambiar: abiertas o cerradas después de `desde`
+    afectadas = session.execute(
+        select(t.c.evento_entrada_id, t.c.paciente_id, t.c.entrada, t.c.salida).where(
+            t.c.paciente_id.in_(pacientes),
+            or_(t.c.salida.is_(None), t.c.salida >= desde),
+        )
+    ).all()
+
+    borrar: List[str] = []
+    anteriores: Dict[str, Any] = {}
+    for estancia in afectadas:
+        desde_paciente = desde_por_paciente[estancia.paciente_id]
+        if estancia.entrada >= desde_paciente:
+            borrar.append(estancia.evento_entrada_id)
+        elif estancia.salida is None or estancia.salida >= desde_paciente:
+            previa = anteriores.get(estancia.paciente_id)
+            if previa is None or (estancia.entrada, estancia.evento_entrada_id) > (previa.entrada, previa.evento_entrada_id):
+                anteriores[estancia.paciente_id] = estancia
+
+    if borrar:
+        session.execute(delete(t).where(t.c.evento_entrada_id.in_(borrar)))
+    for paciente_id, anterior in anteriores.items():
+        bordes = bordes_por_paciente[paciente_id]
+        session.execute(
+            update(t)
+            .where(t.c.evento_entrada_id == anterior.evento_entrada_id)
+            .values(**_cierre(anterior.entrada, bordes[0] if bordes else None))
+        )
+
+    nuevas = [estancia for p in pacientes for estancia in estancias_de_bordes(bordes_por_paciente[p])]
+    if nuevas:
+        session.execute(insert(t), nuevas)
+    return len(nuevas) + len(anteriores)
+
+
+# ============================================
+# RECONSTRUCCIÓN
+# ============================================
+
+def reconstruir_estancias(session: Session, paciente_ids: Optional[Sequence[str]] = None) -> int:
+    """
+    Recalcula estancia_servicio desde evento_paciente (todos los pacientes
+    o solo `paciente_ids`) con una sola sentencia INSERT ... SELECT.
+    No confirma la transacción.
+
+    Returns:
+        Número de estancias escritas
+    """
+    e, t = TABLA_EVENTOS, TABLA
+    ventana = {"partition_by": e.c.paciente_id, "order_by": (e.c.timestamp, e.c.id)}
+    bordes = select(
+        e.c.id, e.c.paciente_id, e.c.hospital_id, e.c.servicio_destino_id,
+        e.c.cama_destino_id, e.c.tipo_evento, e.c.timestamp,
+        func.lead(e.c.id, type_=e.c.id.type).over(**ventana).label("salida_id"),
+        func.lead(e.c.tipo_evento, type_=e.c.tipo_evento.type).over(**ventana).label("tipo_salida"),
+        func.lead(e.c.timestamp, type_=e.c.timestamp.type).over(**ventana).label("salida"),
+    ).where(e.c.tipo_evento.in_(TIPOS_BORDE))
+    borrado = delete(t)
+    if paciente_ids is not None:
+        bordes = bordes.where(e.c.paciente_id.in_(list(paciente_ids)))
+        borrado = borrado.where(t.c.paciente_id.in_(list(paciente_ids)))
+    b = bordes.subquery("bordes")
+
+    dialecto = session.get_bind().dialect.name
+    consulta = select(
+        b.c.id, b.c.paciente_id, b.c.hospital_id, b.c.servicio_destino_id, b.c.cama_destino_id,
+        cast(b.c.tipo_evento, String), b.c.timestamp,
+        b.c.salida_id, cast(b.c.tipo_salida, String), b.c.salida,
+        segundos_entre(b.c.timestamp, b.c.salida, dialecto),
+    ).where(
+        b.c.tipo_evento.in_(TIPOS_LLEGADA_SERVICIO),
+        b.c.servicio_destino_id.is_not(None),
+    )
+
+    session.execute(borrado)
+    escritas = session.execute(insert(t).from_select(
+        [
+            "evento_entrada_id", "paciente_id", "hospital_id", "servicio_id", "cama_id",
+            "tipo_entrada", "entrada",
+            "evento_salida_id", "tipo_salida", "salida", "duracion_segundos",
+        ],
+        consulta,
+    )).rowcount
+    logger.info(f"Estancias por servicio reconstruidas: {escritas}")
+    return escritas
@@ -4,14 +4,12 @@ Registra todos los cambios de estado importantes para análisis estadístico.
 """
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
-from sqlmodel import Session, select
-from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
 
-from app.models.evento_paciente import EventoPaciente
+from app.config import settings
 from app.models.enums import TipoEventoEnum
 from app.models.paciente import Paciente
-from app.models.cama import Cama
-from app.models.servicio import Servicio
+from app.services.evento_writer import escritor_eventos, construir_fila_evento, cola_eventos
 
 
 class EventoService:
@@ -21,6 +19,12 @@ class EventoService:
     Este servicio es responsable de registrar todos los eventos importantes
     que ocurren en el sistema para permitir trazabilidad completa y
     cálculos estadísticos precisos.
+
+    Los servicios de asignación, traslado, alta y derivación son síncronos
+    y registran sus eventos directamente con escritor_eventos(), en la misma
+    transacción que el cambio de estado; por eso EVENTOS_MODO_ASINCRONO solo
+    aplica a quienes llaman a estos métodos. Los ingresos y fallecimientos
+    todavía no registran eventos.
     """
 
     @staticmethod
@@ -48,6 +52,9 @@ class EventoService:
         """
         Obtiene el servicio_id de una cama.
 
+        Usa la topología en memoria y el caché del escritor de eventos
+        de la sesión, por lo que no consulta la BD en el caso común.
+
         Args:
             session: Sesión de base de datos
             cama_id: ID de la cama
@@ -55,16 +62,7 @@ class EventoService:
         Returns:
             ID del servicio o None
         """
-        if not cama_id:
-            return None
-
-        cama = session.get(Cama, cama_id)
-        if cama and cama.sala_id:
-            from app.models.sala import Sala
-            sala = session.get(Sala, cama.sala_id)
-            if sala:
-                return sala.servicio_id
-        return None
+        return escritor_eventos(session).servicio_de_cama(cama_id)
 
     @staticmethod
     async def registrar_evento(
@@ -79,10 +77,16 @@ class EventoService:
         hospital_destino_id: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
         timestamp: Optional[datetime] = None,
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra un evento del paciente en el sistema.
 
+        El evento no se confirma por sí solo: queda pendiente en la
+        transacción del llamador y se inserta junto con los demás eventos
+        de la petición (un único INSERT multi-fila) cuando el llamador hace
+        commit. Si la transacción se revierte, el evento se descarta.
+        Con EVENTOS_MODO_ASINCRONO se encola y se escribe en segundo plano.
+
         Args:
             session: Sesión de base de datos
             tipo_evento: Tipo de evento
@@ -97,26 +101,13 @@ class EventoService:
             timestamp: Timestamp del evento (opcional, usa datetime.utcnow si no se proporciona)
 
         Returns:
-            EventoPaciente creado
+            Fila del evento (dict con todas las columnas, incluido su id).
+            No se devuelve un EventoPaciente porque la fila aún no existe en
+            la base de datos: se inserta al confirmar (o la escribe la cola).
         """
-        if timestamp is None:
-            timestamp = datetime.utcnow()
-
-        # Calcular día clínico
-        dia_clinico = EventoService.calcular_dia_clinico(timestamp)
-
-        # Si no se proporciona servicio_origen_id pero sí cama_origen_id, obtenerlo
-        if servicio_origen_id is None and cama_origen_id is not None:
-            servicio_origen_id = await EventoService.obtener_servicio_de_cama(session, cama_origen_id)
-
-        # Si no se proporciona servicio_destino_id pero sí cama_destino_id, obtenerlo
-        if servicio_destino_id is None and cama_destino_id is not None:
-            servicio_destino_id = await EventoService.obtener_servicio_de_cama(session, cama_destino_id)
-
-        # Crear evento
-        evento = EventoPaciente(
+        escritor = escritor_eventos(session)
+        campos = dict(
             tipo_evento=tipo_evento,
-            timestamp=timestamp,
             paciente_id=paciente_id,
             hospital_id=hospital_id,
             servicio_origen_id=servicio_origen_id,
@@ -124,29 +115,28 @@ class EventoService:
             cama_origen_id=cama_origen_id,
             cama_destino_id=cama_destino_id,
             hospital_destino_id=hospital_destino_id,
-            dia_clinico=dia_clinico,
+            metadata=metadata,
+            timestamp=timestamp,
         )
 
-        # Establecer metadata si se proporciona
-        if metadata:
-            evento.set_metadata(metadata)
+        if settings.EVENTOS_MODO_ASINCRONO and cola_eventos.activa:
+            if servicio_origen_id is None:
+                campos["servicio_origen_id"] = escritor.servicio_de_cama(cama_origen_id)
+            if servicio_destino_id is None:
+                campos["servicio_destino_id"] = escritor.servicio_de_cama(cama_destino_id)
+            fila = construir_fila_evento(**campos)
+            await cola_eventos.encolar(fila)
+        else:
+            fila = escritor.agregar(**campos)
 
-        # Guardar en base de datos
-        try:
-            session.add(evento)
-            session.commit()
-            session.refresh(evento)
-            return evento
-        except IntegrityError as e:
-            session.rollback()
-            raise ValueError(f"Error al registrar evento: {str(e)}")
+        return fila
 
     @staticmethod
     async def registrar_ingreso(
         session: Session,
         paciente: Paciente,
         tipo_ingreso: str = "urgencia"
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra un ingreso de paciente.
 
@@ -156,7 +146,7 @@ class EventoService:
             tipo_ingreso: Tipo de ingreso (urgencia/ambulatorio)
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         tipo_evento = (
             TipoEventoEnum.INGRESO_URGENCIA if tipo_ingreso == "urgencia"
@@ -183,7 +173,7 @@ class EventoService:
         session: Session,
         paciente: Paciente,
         cama_id: str
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra la asignación de una cama a un paciente.
 
@@ -193,7 +183,7 @@ class EventoService:
             cama_id: ID de la cama asignada
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         return await EventoService.registrar_evento(
             session=session,
@@ -207,7 +197,7 @@ class EventoService:
     async def registrar_busqueda_cama(
         session: Session,
         paciente: Paciente
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra el inicio de búsqueda de cama para un paciente.
 
@@ -216,7 +206,7 @@ class EventoService:
             paciente: Paciente
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         metadata = {}
         if paciente.cama_id:
@@ -237,7 +227,7 @@ class EventoService:
         paciente: Paciente,
         cama_origen_id: str,
         cama_destino_id: str
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra el inicio de un traslado.
 
@@ -248,7 +238,7 @@ class EventoService:
             cama_destino_id: ID de la cama destino
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         return await EventoService.registrar_evento(
             session=session,
@@ -265,7 +255,7 @@ class EventoService:
         paciente: Paciente,
         cama_origen_id: str,
         cama_destino_id: str
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra la confirmación de un traslado.
 
@@ -276,7 +266,7 @@ class EventoService:
             cama_destino_id: ID de la cama destino
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         return await EventoService.registrar_evento(
             session=session,
@@ -293,7 +283,7 @@ class EventoService:
         paciente: Paciente,
         cama_origen_id: str,
         cama_destino_id: str
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra la finalización de un traslado.
 
@@ -304,7 +294,7 @@ class EventoService:
             cama_destino_id: ID de la cama destino
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         return await EventoService.registrar_evento(
             session=session,
@@ -320,7 +310,7 @@ class EventoService:
         session: Session,
         paciente: Paciente,
         cama_id: str
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra el inicio de estado "cama en espera".
 
@@ -330,7 +320,7 @@ class EventoService:
             cama_id: ID de la cama
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         return await EventoService.registrar_evento(
             session=session,
@@ -345,7 +335,7 @@ class EventoService:
         session: Session,
         paciente: Paciente,
         cama_id: str
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra el fin de estado "cama en espera".
 
@@ -355,7 +345,7 @@ class EventoService:
             cama_id: ID de la cama
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         return await EventoService.registrar_evento(
             session=session,
@@ -371,7 +361,7 @@ class EventoService:
         paciente: Paciente,
         hospital_destino_id: str,
         cama_origen_id: Optional[str] = None
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra una solicitud de derivación.
 
@@ -382,7 +372,7 @@ class EventoService:
             cama_origen_id: ID de la cama origen (opcional)
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         return await EventoService.registrar_evento(
             session=session,
@@ -399,7 +389,7 @@ class EventoService:
         paciente: Paciente,
         hospital_destino_id: str,
         cama_destino_id: Optional[str] = None
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra la aceptación de una derivación.
 
@@ -410,7 +400,7 @@ class EventoService:
             cama_destino_id: ID de la cama asignada (opcional)
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         return await EventoService.registrar_evento(
             session=session,
@@ -427,7 +417,7 @@ class EventoService:
         paciente: Paciente,
         hospital_destino_id: str,
         motivo: Optional[str] = None
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra el rechazo de una derivación.
 
@@ -438,7 +428,7 @@ class EventoService:
             motivo: Motivo del rechazo (opcional)
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         metadata = {}
         if motivo:
@@ -459,7 +449,7 @@ class EventoService:
         paciente: Paciente,
         hospital_destino_id: str,
         cama_origen_id: str
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra la confirmación de egreso por derivación.
 
@@ -470,7 +460,7 @@ class EventoService:
             cama_origen_id: ID de la cama origen
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         return await EventoService.registrar_evento(
             session=session,
@@ -487,7 +477,7 @@ class EventoService:
         paciente: Paciente,
         hospital_origen_id: str,
         cama_destino_id: str
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra la finalización completa de una derivación.
 
@@ -498,7 +488,7 @@ class EventoService:
             cama_destino_id: ID de la cama destino
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         return await EventoService.registrar_evento(
             session=session,
@@ -514,7 +504,7 @@ class EventoService:
         session: Session,
         paciente: Paciente,
         cama_id: str
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra una sugerencia de alta.
 
@@ -524,7 +514,7 @@ class EventoService:
             cama_id: ID de la cama
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         return await EventoService.registrar_evento(
             session=session,
@@ -540,7 +530,7 @@ class EventoService:
         paciente: Paciente,
         cama_id: str,
         motivo: Optional[str] = None
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra el inicio de un alta.
 
@@ -551,7 +541,7 @@ class EventoService:
             motivo: Motivo del alta (opcional)
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         metadata = {}
         if motivo:
@@ -571,7 +561,7 @@ class EventoService:
         session: Session,
         paciente: Paciente,
         cama_id: str
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra la finalización de un alta.
 
@@ -581,7 +571,7 @@ class EventoService:
             cama_id: ID de la cama
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         return await EventoService.registrar_evento(
             session=session,
@@ -597,7 +587,7 @@ class EventoService:
         paciente: Paciente,
         cama_id: str,
         causa: Optional[str] = None
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra cuando se marca un paciente como fallecido.
 
@@ -608,7 +598,7 @@ class EventoService:
             causa: Causa del fallecimiento (opcional)
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         metadata = {}
         if causa:
@@ -628,7 +618,7 @@ class EventoService:
         session: Session,
         paciente: Paciente,
         cama_id: str
-    ) -> EventoPaciente:
+    ) -> Dict[str, Any]:
         """
         Registra el egreso de un paciente fallecido.
 
@@ -638,7 +628,7 @@ class EventoService:
             cama_id: ID de la cama
 
         Returns:
-            EventoPaciente creado
+            Fila del evento pendiente (ver registrar_evento)
         """
         return await EventoService.registrar_evento(
             session=session,
@@ -0,0 +1,610 @@
+"""
+Escritor de eventos de pacientes por lotes.
+
+Los flujos clínicos (derivación, traslado, alta...) registran varios eventos
+por petición. En lugar de un commit por evento, el escritor los acumula en la
+transacción del llamador y los inserta con un único INSERT multi-fila justo
+antes del commit. Los servicio_id de origen/destino se resuelven desde la
+topología en memoria, con un caché por sesión como respaldo.
+
+Modos:
+    - Transaccional (por defecto): los eventos se confirman junto con el
+      cambio de estado que los origina; si la transacción se revierte,
+      los eventos pendientes se descartan.
+    - Asíncrono (EVENTOS_MODO_ASINCRONO): los eventos se encolan en una cola
+      acotada y un consumidor los escribe en lotes con su propia sesión.
+    - Masivo (escribir_eventos_masivo): para backfills; usa COPY en
+      PostgreSQL e INSERT por lotes en otros motores. No actualiza los
+      rollups diarios ni las estancias por servicio: ejecutar
+      scripts/backfill_estadisticas.py y scripts/reconstruir_estancias.py
+      después.
+
+En todos los modos, los eventos de borde atrasados recortan la caché de
+ocupación histórica (ver ocupacion_historica).
+
+Uso:
+    escritor = escritor_eventos(session)
+    escritor.agregar(TipoEventoEnum.CAMA_ASIGNADA, paciente.id, paciente.hospital_id,
+                     cama_destino_id=cama.id)
+    session.commit()  # inserta los eventos pendientes en una sola sentencia
+"""
+from typing import Any, Dict, Iterable, List, Optional
+from datetime import datetime
+from enum import Enum
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import uuid
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session
+
+from app.config import settings
+from app.models.evento_paciente import EventoPaciente
+from app.models.enums import TipoEventoEnum
+
+logger = logging.getLogger("gestion_camas.eventos")
+
+
+TABLA_EVENTOS = EventoPaciente.__table__
+COLUMNAS_EVENTO = [columna.name for columna in TABLA_EVENTOS.columns]
+
+_CLAVE_ESCRITOR = "_escritor_eventos"
+
+
+# ============================================
+# CONSTRUCCIÓN DE FILAS
+# ============================================
+
+def construir_fila_evento(
+    tipo_evento: TipoEventoEnum,
+    paciente_id: str,
+    hospital_id: str,
+    servicio_origen_id: Optional[str] = None,
+    servicio_destino_id: Optional[str] = None,
+    cama_origen_id: Optional[str] = None,
+    cama_destino_id: Optional[str] = None,
+    hospital_destino_id: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    timestamp: Optional[datetime] = None,
+    duracion_segundos: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Construye la fila de un evento lista para insertar (todas las columnas).
+    """
+    if timestamp is None:
+        timestamp = datetime.utcnow()
+    return {
+        "id": str(uuid.uuid4()),
+        "tipo_evento": tipo_evento,
+        "timestamp": timestamp,
+        "paciente_id": paciente_id,
+        "hospital_id": hospital_id,
+        "servicio_origen_id": servicio_origen_id,
+        "servicio_destino_id": servicio_destino_id,
+        "cama_origen_id": cama_origen_id,
+        "cama_destino_id": cama_destino_id,
+        "hospital_destino_id": hospital_destino_id,
+        "datos_adicionales": json.dumps(metadata) if metadata else None,
+        "dia_clinico": EventoPaciente.calcular_dia_clinico(timestamp),
+        "duracion_segundos": duracion_segundos,
+    }
+
+
+def _tags_de_filas(filas: Iterable[Dict[str, Any]]) -> set:
+    from app.core.cache import TAG_ESTADISTICAS, tag_paciente
+
+    tags = {TAG_ESTADISTICAS}
+    tags.update(tag_paciente(fila["paciente_id"]) for fila in filas)
+    return tags
+
+
+def insertar_filas(session: Session, filas: List[Dict[str, Any]]) -> int:
+    """
+    Inserta filas de eventos con un INSERT multi-fila, actualiza los rollups
+    diarios y las estancias por servicio y registra la invalidación de caché
+    correspondiente. No confirma la transacción.
+    """
+    from app.core.cache import agregar_tags_pendientes
+    from app.services.estancias_service import aplicar_eventos
+    from app.services.ocupacion_historica import invalidar_por_eventos
+    from app.services.rollup_service import actualizar_rollups
+
+    if not filas:
+        return 0
+    session.execute(insert(TABLA_EVENTOS), filas)
+    actualizar_rollups(session, filas)
+    aplicar_eventos(session, filas)
+    invalidar_por_eventos(session, filas)
+    agregar_tags_pendientes(session, _tags_de_filas(filas))
+    return len(filas)
+
+
+# ============================================
+# ESCRITOR TRANSACCIONAL
+# ============================================
+
+class EscritorEventos:
+    """
+    Acumula eventos en la transacción de una sesión y los inserta en lote.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+        self._pendientes: List[Dict[str, Any]] = []
+        self._servicios_por_cama: Dict[str, Optional[str]] = {}
+
+    @property
+    def pendientes(self) -> int:
+        return len(self._pendientes)
+
+    def servicio_de_cama(self, cama_id: Optional[str]) -> Optional[str]:
+        """
+        Resuelve el servicio_id de una cama: topología en memoria, luego
+        caché de la sesión y, como último recurso, una consulta.
+        """
+        if not cama_id:
+            return None
+        if cama_id in self._servicios_por_cama:
+            return self._servicios_por_cama[cama_id]
+
+        from app.core.topologia import obtener_topologia
+        from app.models.cama import Cama
+        from app.models.sala import Sala
+
+        servicio_id = None
+        try:
+            servicio = obtener_topologia(self.session).servicio_de_cama(cama_id)
+            servicio_id = servicio.id if servicio else None
+        except Exception as e:
+            logger.debug(f"Topología no disponible para resolver cama {cama_id}: {e}")
+        if servicio_id is None:
+            servicio_id = self.session.execute(
+                select(Sala.servicio_id)
+                .join(Cama, Cama.sala_id == Sala.id)
+                .where(Cama.id == cama_id)
+            ).scalar_one_or_none()
+
+        self._servicios_por_cama[cama_id] = servicio_id
+        return servicio_id
+
+    def agregar(
+        self,
+        tipo_evento: TipoEventoEnum,
+        paciente_id: str,
+        hospital_id: str,
+        servicio_origen_id: Optional[str] = None,
+        servicio_destino_id: Optional[str] = None,
+        cama_origen_id: Optional[str] = None,
+        cama_destino_id: Optional[str] = None,
+        hospital_destino_id: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        timestamp: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """
+        Agrega un evento pendiente. Se inserta al confirmar la transacción
+        (o al llamar a vaciar()).
+
+        Returns:
+            Fila del evento (incluye su id)
+        """
+        if servicio_origen_id is None and cama_origen_id is not None:
+            servicio_origen_id = self.servicio_de_cama(cama_origen_id)
+        if servicio_destino_id is None and cama_destino_id is not None:
+            servicio_destino_id = self.servicio_de_cama(cama_destino_id)
+
+        fila = construir_fila_evento(
+            tipo_evento=tipo_evento,
+            paciente_id=paciente_id,
+            hospital_id=hospital_id,
+            servicio_origen_id=servicio_origen_id,
+            servicio_destino_id=servicio_destino_id,
+            cama_origen_id=cama_origen_id,
+            cama_destino_id=cama_destino_id,
+            hospital_destino_id=hospital_destino_id,
+            metadata=metadata,
+            timestamp=timestamp,
+        )
+        self._pendientes.append(fila)
+        return fila
+
+    def vaciar(self) -> int:
+        """
+        Inserta los eventos pendientes en la transacción actual.
+
+        Primero hace flush del unit of work para que existan las filas
+        referenciadas (p. ej. un paciente recién creado).
+
+        Returns:
+            Número de eventos insertados
+        """
+        if not self._pendientes:
+            return 0
+        filas, self._pendientes = self._pendientes, []
+        self.session.flush()
+        return insertar_filas(self.session, filas)
+
+    def descartar(self) -> None:
+        """Descarta los eventos pendientes (rollback)."""
+        self._pendientes = []
+
+
+def escritor_eventos(session: Session) -> EscritorEventos:
+    """Obtiene (o crea) el escritor de eventos asociado a la sesión."""
+    escritor = session.info.get(_CLAVE_ESCRITOR)
+    if escritor is None:
+        escritor = EscritorEventos(session)
+        session.info[_CLAVE_ESCRITOR] = escritor
+    return escritor
+
+
+def _before_commit(session: OrmSession) -> None:
+    escritor = session.info.get(_CLAVE_ESCRITOR)
+    if escritor is not None and escritor.pendientes:
+        escritor.vaciar()
+
+
+def _after_rollback(session: OrmSession, previous_transaction) -> None:
+    escritor = session.info.get(_CLAVE_ESCRITOR)
+    if escritor is not None:
+        escritor.descartar()
+
+
+def registrar_escritura_orm() -> None:
+    """
+    Registra los listeners que vacían los eventos pendientes antes del
+    commit y los descartan en rollback. Es idempotente.
+    """
+    if not event.contains(OrmSession, "before_commit", _before_commit):
+        event.listen(OrmSession, "before_commit", _before_commit)
+        event.listen(OrmSession, "after_soft_rollback", _after_rollback)
+
+
+registrar_escritura_orm()
+
+
+# ============================================
+# ESCRITURA MASIVA (BACKFILLS)
+# ============================================
+
+def _valor_copy(valor: Any) -> Any:
+    if valor is None:
+        return r"\N"
+    if isinstance(valor, Enum):
+        return valor.value
+    if isinstance(valor, datetime):
+        return valor.isoformat(sep=" ")
+    return valor
+
+
+def _copiar_postgres(session: Session, filas: List[Dict[str, Any]]) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for fila in filas:
+        writer.writerow([_valor_copy(fila.get(columna)) for columna in COLUMNAS_EVENTO])
+    buffer.seek(0)
+
+    sql = (
+        f"COPY {TABLA_EVENTOS.name} ({', '.join(COLUMNAS_EVENTO)}) "
+        r"FROM STDIN WITH (FORMAT csv, NULL '\N')"
+    )
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+
+def escribir_eventos_masivo(
+    session: Session,
+    filas: Iterable[Dict[str, Any]],
+    tamano_lote: int = 5000,
+) -> int:
+    """
+    Escribe un volumen grande de eventos (backfill) en lotes.
+
+    En PostgreSQL con psycopg2 usa COPY; en otros motores, INSERT
+    multi-fila. No confirma la transacción.
+
+    Args:
+        session: Sesión de base de datos
+        filas: Filas construidas con construir_fila_evento
+        tamano_lote: Filas por sentencia
+
+    Returns:
+        Número de eventos escritos
+    """
+    from app.services.ocupacion_historica import invalidar_por_eventos
+
+    usar_copy = session.get_bind().dialect.driver == "psycopg2"
+    total = 0
+    lote: List[Dict[str, Any]] = []
+
+    def escribir(lote: List[Dict[str, Any]]) -> None:
+        if usar_copy:
+            _copiar_postgres(session, lote)
+        else:
+            session.execute(insert(TABLA_EVENTOS), lote)
+        invalidar_por_eventos(session, lote)
+
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano_lote:
+            escribir(lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        escribir(lote)
+        total += len(lote)
+
+    if total:
+        from app.core.cache import TAG_ESTADISTICAS, agregar_tags_pendientes
+        agregar_tags_pendientes(session, {TAG_ESTADISTICAS})
+    return total
+
+
+# ============================================
+# MODO ASÍNCRONO (COLA ACOTADA)
+# ============================================
+
+_COLUMNAS_FECHA = ("timestamp", "dia_clinico")
+
+
+def _fila_a_json(fila: Dict[str, Any]) -> str:
+    return json.dumps({
+        columna: valor.value if isinstance(valor, Enum)
+        else valor.isoformat() if isinstance(valor, datetime) else valor
+        for columna, valor in fila.items()
+    })
+
+
+def _fila_desde_json(linea: str) -> Dict[str, Any]:
+    fila = json.loads(linea)
+    fila["tipo_evento"] = TipoEventoEnum(fila["tipo_evento"])
+    for columna in _COLUMNAS_FECHA:
+        if fila.get(columna):
+            fila[columna] = datetime.fromisoformat(fila[columna])
+    return fila
+
+
+class ColaEventos:
+    """
+    Cola acotada de eventos con un consumidor que escribe en lotes.
+
+    Cuando la cola está llena, encolar() espera (backpressure) en lugar de
+    descartar eventos. Cada lote se confirma en su propia transacción; si
+    falla, se conserva y se reintenta con espera exponencial (hasta
+    EVENTOS_REINTENTO_MAX_SEGUNDOS) mientras los productores esperan.
+
+    Si al detener la base de datos sigue sin aceptar los eventos tras
+    EVENTOS_DETENER_ESPERA_SEGUNDOS, lo pendiente se vuelca a un archivo
+    JSONL en EVENTOS_DESBORDE_DIRECTORIO y se reproduce al iniciar.
+    """
+
+    def __init__(
+        self,
+        tamano_maximo: Optional[int] = None,
+        lote_maximo: Optional[int] = None,
+        intervalo_segundos: Optional[float] = None,
+        session_factory=None,
+        directorio_desborde: Optional[str] = None,
+    ):
+        self.tamano_maximo = tamano_maximo or settings.EVENTOS_COLA_MAX
+        self.lote_maximo = lote_maximo or settings.EVENTOS_LOTE_MAX
+        self.intervalo_segundos = intervalo_segundos or settings.EVENTOS_FLUSH_SEGUNDOS
+        self.directorio_desborde = directorio_desborde or settings.EVENTOS_DESBORDE_DIRECTORIO
+        self._session_factory = session_factory
+        self._cola: Optional[asyncio.Queue] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._deteniendo: Optional[asyncio.Event] = None
+        self._escribiendo = False
+        # Lote tomado de la cola que aún no se confirmó
+        self._en_curso: Optional[List[Dict[str, Any]]] = None
+        self.escritos = 0
+        self.reintentos = 0
+        self.desbordados = 0
+        self.reproducidos = 0
+
+    @property
+    def activa(self) -> bool:
+        return self._tarea is not None and not self._tarea.done()
+
+    def _nueva_sesion(self) -> Session:
+        if self._session_factory is not None:
+            return self._session_factory()
+        from app.core.database import engine
+        return Session(engine)
+
+    async def iniciar(self) -> None:
+        """Inicia el consumidor en el event loop actual."""
+        if self.activa:
+            return
+        self._cola = asyncio.Queue(maxsize=self.tamano_maximo)
+        self._deteniendo = asyncio.Event()
+        self._tarea = asyncio.create_task(self._consumir())
+        logger.info(f"Cola de eventos iniciada (máx {self.tamano_maximo}, lote {self.lote_maximo})")
+
+    async def encolar(self, fila: Dict[str, Any]) -> None:
+        """Encola un evento; espera si la cola está llena."""
+        await self._cola.put(fila)
+
+    async def detener(self, espera_segundos: Optional[float] = None) -> None:
+        """
+        Detiene el consumidor tras escribir todo lo encolado. Si no termina
+        dentro de la espera, vuelca lo pendiente al directorio de desborde.
+        """
+        if self._tarea is None:
+            return
+        espera = settings.EVENTOS_DETENER_ESPERA_SEGUNDOS if espera_segundos is None else espera_segundos
+        try:
+            await asyncio.wait_for(self._cola.join(), timeout=espera)
+        except asyncio.TimeoutError:
+            pass
+        # Una escritura en curso no se cancela (su hilo podría confirmarla
+        # igual): termina o, si falla, el consumidor sale sin reintentar.
+        self._deteniendo.set()
+        if not self._escribiendo:
+            self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        self._tarea = None
+
+        pendientes = list(self._en_curso or [])
+        self._en_curso = None
+        while not self._cola.empty():
+            pendientes.append(self._cola.get_nowait())
+            self._cola.task_done()
+        if pendientes:
+            await asyncio.to_thread(self._desbordar, pendientes)
+        logger.info(
+            f"Cola de eventos detenida ({self.escritos} escritos, {self.desbordados} desbordados)"
+        )
+
+    async def _tomar_lote(self) -> List[Dict[str, Any]]:
+        lote = [await self._cola.get()]
+        limite = asyncio.get_running_loop().time() + self.intervalo_segundos
+        while len(lote) < self.lote_maximo:
+            restante = limite - asyncio.get_running_loop().time()
+            if restante <= 0:
+                break
+            try:
+                lote.append(await asyncio.wait_for(self._cola.get(), timeout=restante))
+            except asyncio.TimeoutError:
+                break
+        return lote
+
+    def _escribir_lote(self, lote: List[Dict[str, Any]], omitir_existentes: bool = False) -> None:
+        """
+        Escribe las filas en una sola transacción (en sentencias de hasta
+        lote_maximo filas). omitir_existentes descarta las que ya están en
+        la tabla, para reproducir un desborde que quedó a medio confirmar.
+        """
+        session = self._nueva_sesion()
+        try:
+            if omitir_existentes:
+                existentes = set()
+                for inicio in range(0, len(lote), self.lote_maximo):
+                    ids = [fila["id"] for fila in lote[inicio:inicio + self.lote_maximo]]
+                    existentes.update(session.execute(
+                        select(TABLA_EVENTOS.c.id).where(TABLA_EVENTOS.c.id.in_(ids))
+                    ).scalars())
+                lote = [fila for fila in lote if fila["id"] not in existentes]
+            for inicio in range(0, len(lote), self.lote_maximo):
+                insertar_filas(session, lote[inicio:inicio + self.lote_maximo])
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    async def _escribir_con_reintentos(self, lote: List[Dict[str, Any]], omitir_existentes: bool = False) -> bool:
+        """
+        Escribe el lote; si falla lo conserva y reintenta sin límite. Retorna
+        False si se pidió detener antes de lograrlo.
+        """
+        intento = 0
+        while True:
+            self._escribiendo = True
+            try:
+                await asyncio.to_thread(self._escribir_lote, lote, omitir_existentes)
+                return True
+            except Exception as e:
+                error = e
+            finally:
+                self._escribiendo = False
+            intento += 1
+            self.reintentos += 1
+            espera = min(settings.EVENTOS_REINTENTO_MAX_SEGUNDOS, 0.1 * 2 ** (intento - 1))
+            if intento == 1 or espera == settings.EVENTOS_REINTENTO_MAX_SEGUNDOS:
+                logger.error(
+                    f"❌ No se pudo escribir lote de {len(lote)} eventos (intento {intento}, "
+                    f"reintento en {espera:.1f} s): {error}"
+                )
+            try:
+                await asyncio.wait_for(self._deteniendo.wait(), timeout=espera)
+                return False
+            except asyncio.TimeoutError:
+                pass
+
+    # ---------- desborde a disco ----------
+
+    def _desbordar(self, filas: List[Dict[str, Any]]) -> None:
+        os.makedirs(self.directorio_desborde, exist_ok=True)
+        nombre = f"eventos_{datetime.utcnow():%Y%m%d%H%M%S}_{uuid.uuid4().hex[:8]}.jsonl"
+        ruta = os.path.join(self.directorio_desborde, nombre)
+        temporal = f"{ruta}.tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            for fila in filas:
+                archivo.write(_fila_a_json(fila) + "\n")
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, ruta)
+        self.desbordados += len(filas)
+        logger.error(f"❌ {len(filas)} eventos sin escribir volcados a {ruta}; se reproducen al iniciar")
+
+    def _archivos_desborde(self) -> List[str]:
+        if not os.path.isdir(self.directorio_desborde):
+            return []
+        return sorted(
+            os.path.join(self.directorio_desborde, nombre)
+            for nombre in os.listdir(self.directorio_desborde)
+            if nombre.endswith(".jsonl")
+        )
+
+    @staticmethod
+    def _leer_desborde(ruta: str) -> List[Dict[str, Any]]:
+        with open(ruta, encoding="utf-8") as archivo:
+            return [_fila_desde_json(linea) for linea in archivo if linea.strip()]
+
+    async def _reproducir_desbordes(self) -> bool:
+        """
+        Escribe los eventos volcados en detenciones anteriores (cada archivo
+        en una transacción). Retorna False si se pidió detener antes.
+        """
+        for ruta in await asyncio.to_thread(self._archivos_desborde):
+            filas = await asyncio.to_thread(self._leer_desborde, ruta)
+            if not await self._escribir_con_reintentos(filas, omitir_existentes=True):
+                return False
+            await asyncio.to_thread(os.remove, ruta)
+            self.reproducidos += len(filas)
+            self.escritos += len(filas)
+            logger.info(f"Reproducidos {len(filas)} eventos de {ruta}")
+            if self._deteniendo.is_set():
+                return False
+        return True
+
+    async def _consumir(self) -> None:
+        if not await self._reproducir_desbordes():
+            return
+        while True:
+            lote = await self._tomar_lote()
+            self._en_curso = lote
+            if not await self._escribir_con_reintentos(lote):
+                # detener() vuelca el lote en curso junto con lo encolado
+                return
+            self._en_curso = None
+            self.escritos += len(lote)
+            for _ in lote:
+                self._cola.task_done()
+            if self._deteniendo.is_set():
+                return
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "activa": self.activa,
+            "en_cola": self._cola.qsize() if self._cola is not None else 0,
+            "escritos": self.escritos,
+            "reintentos": self.reintentos,
+            "desbordados": self.desbordados,
+            "reproducidos": self.reproducidos,
+        }
+
+
+cola_eventos = ColaEventos()
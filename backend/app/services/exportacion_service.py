@@ -0,0 +1,362 @@
+"""
+Exportación masiva de eventos de pacientes y estancias por servicio.
+
+Pensada para análisis fuera de línea: exportar un año de eventos no debe
+cargarlo en memoria ni retener una conexión del pool más de lo necesario.
+
+    - Las filas se leen con un cursor del lado del servidor (yield_per) y se
+      procesan por lotes; la memoria es constante respecto del rango.
+    - La sesión se abre cuando empieza a consumirse la exportación y se
+      cierra apenas se agota el cursor (o si el cliente se desconecta).
+    - Cada lote se serializa y se entrega como un bloque de bytes: CSV,
+      NDJSON o Parquet (un row group por lote; requiere pyarrow).
+
+Exportaciones:
+    - eventos: filas de evento_paciente del rango, por timestamp.
+    - estancias: estancias por servicio derivadas de los eventos de llegada
+      (CAMA_ASIGNADA, TRASLADO_COMPLETADO, DERIVACION_COMPLETADA), cerradas
+      por el siguiente evento de llegada o salida del mismo paciente.
+
+Uso:
+    for bloque in exportar("eventos", "csv", fecha_inicio, fecha_fin):
+        archivo.write(bloque)
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import csv
+import io
+import json
+import logging
+
+from sqlalchemy import func, select
+from sqlalchemy.sql import Select
+from sqlmodel import Session
+
+from app.config import settings
+from app.core.exceptions import ValidationError
+from app.core.topologia import obtener_topologia
+from app.models.evento_paciente import EventoPaciente
+from app.services.estadisticas_service import TIPOS_LLEGADA_SERVICIO, TIPOS_SALIDA_SERVICIO
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional (solo formato parquet)
+    pa = None
+    pq = None
+
+logger = logging.getLogger("gestion_camas.exportacion")
+
+
+TABLA_EVENTOS = EventoPaciente.__table__
+
+FORMATOS: Dict[str, Tuple[str, str]] = {
+    # formato -> (media type, extensión)
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+# ============================================
+# DEFINICIÓN DE EXPORTACIONES
+# ============================================
+
+@dataclass(frozen=True)
+class Exportacion:
+    """
+    Una exportación: columnas (nombre, tipo Python) y la consulta que las
+    produce. `completar` deriva columnas por fila (p. ej. nombres desde la
+    topología) sin consultas adicionales.
+    """
+    nombre: str
+    columnas: Tuple[Tuple[str, type], ...]
+    consulta: Callable[[Optional[datetime], Optional[datetime], Optional[str]], Select]
+    completar: Optional[Callable[[Dict[str, Any], Any], Dict[str, Any]]] = None
+
+    @property
+    def nombres_columnas(self) -> List[str]:
+        return [nombre for nombre, _ in self.columnas]
+
+
+def _tipo_columna(columna) -> type:
+    try:
+        tipo = columna.type.python_type
+    except NotImplementedError:
+        return str
+    return tipo if tipo in (datetime, int, float) else str
+
+
+def consulta_eventos(
+    fecha_inicio: Optional[datetime],
+    fecha_fin: Optional[datetime],
+    hospital_id: Optional[str] = None,
+) -> Select:
+    """Eventos del rango [fecha_inicio, fecha_fin) ordenados por timestamp."""
+    t = TABLA_EVENTOS
+    consulta = select(t)
+    if fecha_inicio is not None:
+        consulta = consulta.where(t.c.timestamp >= fecha_inicio)
+    if fecha_fin is not None:
+        consulta = consulta.where(t.c.timestamp < fecha_fin)
+    if hospital_id is not None:
+        consulta = consulta.where(t.c.hospital_id == hospital_id)
+    return consulta.order_by(t.c.timestamp, t.c.id)
+
+
+def consulta_estancias(
+    fecha_inicio: Optional[datetime],
+    fecha_fin: Optional[datetime],
+    hospital_id: Optional[str] = None,
+) -> Select:
+    """
+    Estancias con entrada en [fecha_inicio, fecha_fin). La salida es el
+    siguiente borde (llegada o salida) del paciente, obtenido con LEAD();
+    puede caer fuera del rango o no existir (estancia en curso).
+    """
+    t = TABLA_EVENTOS
+    tipos_borde = list(dict.fromkeys(TIPOS_LLEGADA_SERVICIO + TIPOS_SALIDA_SERVICIO))
+    ventana = {"partition_by": t.c.paciente_id, "order_by": (t.c.timestamp, t.c.id)}
+
+    bordes = select(
+        t.c.id,
+        t.c.paciente_id,
+        t.c.hospital_id,
+        t.c.servicio_destino_id,
+        t.c.tipo_evento,
+        t.c.timestamp,
+        func.lead(t.c.timestamp, type_=t.c.timestamp.type).over(**ventana).label("salida"),
+        func.lead(t.c.tipo_evento, type_=t.c.tipo_evento.type).over(**ventana).label("tipo_salida"),
+    ).where(t.c.tipo_evento.in_(tipos_borde))
+    # LEAD solo mira hacia adelante: los eventos previos al rango no aportan
+    if fecha_inicio is not None:
+        bordes = bordes.where(t.c.timestamp >= fecha_inicio)
+    bordes = bordes.subquery("bordes")
+
+    consulta = select(
+        bordes.c.paciente_id,
+        bordes.c.hospital_id,
+        bordes.c.servicio_destino_id.label("servicio_id"),
+        bordes.c.id.label("evento_entrada_id"),
+        bordes.c.tipo_evento.label("tipo_entrada"),
+        bordes.c.timestamp.label("entrada"),
+        bordes.c.salida,
+        bordes.c.tipo_salida,
+    ).where(
+        bordes.c.tipo_evento.in_(TIPOS_LLEGADA_SERVICIO),
+        bordes.c.servicio_destino_id.is_not(None),
+    )
+    if fecha_fin is not None:
+        consulta = consulta.where(bordes.c.timestamp < fecha_fin)
+    if hospital_id is not None:
+        consulta = consulta.where(bordes.c.hospital_id == hospital_id)
+    return consulta.order_by(bordes.c.paciente_id, bordes.c.timestamp, bordes.c.id)
+
+
+def _completar_estancia(fila: Dict[str, Any], topologia) -> Dict[str, Any]:
+    fila["servicio_nombre"] = topologia.nombre_servicio(fila["servicio_id"])
+    fila["duracion_segundos"] = (
+        (fila["salida"] - fila["entrada"]).total_seconds() if fila["salida"] is not None else None
+    )
+    return fila
+
+
+EXPORTACIONES: Dict[str, Exportacion] = {
+    "eventos": Exportacion(
+        "eventos",
+        tuple((c.name, _tipo_columna(c)) for c in TABLA_EVENTOS.columns),
+        consulta_eventos,
+    ),
+    "estancias": Exportacion(
+        "estancias",
+        (
+            ("paciente_id", str),
+            ("hospital_id", str),
+            ("servicio_id", str),
+            ("servicio_nombre", str),
+            ("evento_entrada_id", str),
+            ("tipo_entrada", str),
+            ("entrada", datetime),
+            ("salida", datetime),
+            ("tipo_salida", str),
+            ("duracion_segundos", float),
+        ),
+        consulta_estancias,
+        _completar_estancia,
+    ),
+}
+
+
+# ============================================
+# LECTURA POR LOTES
+# ============================================
+
+def sesion_lectura() -> Session:
+    """Sesión de lectura (réplica si existe); la cierra quien la usa."""
+    from app.core.database import get_session_direct
+    return get_session_direct(read_only=True)
+
+
+def leer_lotes(
+    exportacion: Exportacion,
+    fecha_inicio: Optional[datetime],
+    fecha_fin: Optional[datetime],
+    hospital_id: Optional[str] = None,
+    session_factory: Optional[Callable[[], Session]] = None,
+    tamano_lote: Optional[int] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Lotes de filas (dicts) leídos con un cursor del lado del servidor.
+    La sesión vive solo mientras dura el cursor.
+    """
+    tamano_lote = tamano_lote or settings.EXPORTACION_TAMANO_LOTE
+    session = (session_factory or sesion_lectura)()
+    try:
+        topologia = obtener_topologia(session) if exportacion.completar else None
+        consulta = exportacion.consulta(fecha_inicio, fecha_fin, hospital_id)
+        resultado = session.execute(consulta.execution_options(yield_per=tamano_lote))
+        total = 0
+        for lote in resultado.mappings().partitions():
+            filas = [dict(fila) for fila in lote]
+            if exportacion.completar:
+                filas = [exportacion.completar(fila, topologia) for fila in filas]
+            total += len(filas)
+            yield filas
+        logger.info(f"Exportación {exportacion.nombre}: {total} filas leídas")
+    finally:
+        session.close()
+
+
+# ============================================
+# SERIALIZACIÓN
+# ============================================
+
+def _valor_texto(valor: Any) -> Any:
+    if isinstance(valor, Enum):
+        return valor.value
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return valor
+
+
+def _serializar_csv(columnas: Sequence[str], lotes: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    for lote in lotes:
+        for fila in lote:
+            escritor.writerow(_valor_texto(fila.get(c)) for c in columnas)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        # Solo encabezado (exportación vacía)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _serializar_ndjson(columnas: Sequence[str], lotes: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    for lote in lotes:
+        yield "".join(
+            json.dumps({c: _valor_texto(fila.get(c)) for c in columnas}, ensure_ascii=False) + "\n"
+            for fila in lote
+        ).encode("utf-8")
+
+
+class _SumideroParquet:
+    """Destino de ParquetWriter que acumula bytes para entregarlos por lote."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._posicion = 0
+        self.closed = False
+
+    def write(self, datos) -> int:
+        self._buffer += datos
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self) -> int:
+        return self._posicion
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def vaciar(self) -> bytes:
+        datos = bytes(self._buffer)
+        self._buffer.clear()
+        return datos
+
+
+def _esquema_arrow(columnas: Sequence[Tuple[str, type]]):
+    tipos = {datetime: pa.timestamp("us"), int: pa.int64(), float: pa.float64()}
+    return pa.schema([(nombre, tipos.get(tipo, pa.string())) for nombre, tipo in columnas])
+
+
+def _serializar_parquet(
+    columnas: Sequence[Tuple[str, type]],
+    lotes: Iterator[List[Dict[str, Any]]],
+) -> Iterator[bytes]:
+    esquema = _esquema_arrow(columnas)
+    sumidero = _SumideroParquet()
+    escritor = pq.ParquetWriter(sumidero, esquema)
+    try:
+        for lote in lotes:
+            filas = [
+                {c: (v.value if isinstance(v, Enum) else v) for c, v in fila.items()}
+                for fila in lote
+            ]
+            escritor.write_table(pa.Table.from_pylist(filas, schema=esquema))
+            yield sumidero.vaciar()
+    finally:
+        escritor.close()
+    yield sumidero.vaciar()
+
+
+# ============================================
+# API
+# ============================================
+
+def validar_exportacion(tipo: str, formato: str) -> Exportacion:
+    """Valida tipo y formato antes de empezar a transmitir."""
+    if tipo not in EXPORTACIONES:
+        raise ValidationError(f"Exportación desconocida: {tipo}. Opciones: {', '.join(EXPORTACIONES)}")
+    if formato not in FORMATOS:
+        raise ValidationError(f"Formato desconocido: {formato}. Opciones: {', '.join(FORMATOS)}")
+    if formato == "parquet" and pq is None:
+        raise ValidationError("El formato parquet requiere pyarrow instalado")
+    return EXPORTACIONES[tipo]
+
+
+def exportar(
+    tipo: str,
+    formato: str,
+    fecha_inicio: Optional[datetime],
+    fecha_fin: Optional[datetime],
+    hospital_id: Optional[str] = None,
+    session_factory: Optional[Callable[[], Session]] = None,
+    tamano_lote: Optional[int] = None,
+) -> Iterator[bytes]:
+    """
+    Bloques de bytes de la exportación en el formato pedido.
+
+    Valida de inmediato (ValidationError); la lectura empieza recién cuando
+    se consume el primer bloque.
+    """
+    exportacion = validar_exportacion(tipo, formato)
+    lotes = leer_lotes(exportacion, fecha_inicio, fecha_fin, hospital_id, session_factory, tamano_lote)
+    if formato == "csv":
+        return _serializar_csv(exportacion.nombres_columnas, lotes)
+    if formato == "ndjson":
+        return _serializar_ndjson(exportacion.nombres_columnas, lotes)
+    return _serializar_parquet(exportacion.columnas, lotes)
+
+
+def nombre_archivo(tipo: str, formato: str, fecha_inicio: Optional[datetime], fecha_fin: Optional[datetime]) -> str:
+    """p. ej. eventos_20250101_20250201.csv"""
+    partes = [tipo] + [f.strftime("%Y%m%d") for f in (fecha_inicio, fecha_fin) if f is not None]
+    return f"{'_'.join(partes)}.{FORMATOS[formato][1]}"
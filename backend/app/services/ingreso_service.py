@@ -0,0 +1,317 @@
+"""
+Servicio de Ingreso de Pacientes.
+
+Construcción de pacientes nuevos (urgencia o ambulatorio) a partir de
+PacienteCreate, compartida por el endpoint individual y el ingreso masivo.
+
+El ingreso masivo (censo de urgencias, lote del HIS) valida cada fila por
+separado, inserta todas las válidas en una sola transacción, calcula sus
+prioridades antes del flush, las encola de una vez y emite una notificación
+agregada por hospital en lugar de un broadcast por paciente. Una fila
+inválida se reporta con su índice sin abortar el resto del lote.
+"""
+from typing import Any, Dict, List, Optional
+from dataclasses import dataclass, field
+from datetime import datetime
+import json
+import logging
+
+from pydantic import ValidationError as PydanticValidationError
+from sqlmodel import Session
+
+from app.core.outbox import encolar_broadcast, encolar_notificacion
+from app.core.rbac_service import rbac_service
+from app.core.topologia import obtener_topologia
+from app.models.enums import EdadCategoriaEnum, EstadoListaEsperaEnum, TipoPacienteEnum
+from app.models.paciente import Paciente
+from app.models.usuario import Usuario
+from app.schemas.paciente import PacienteCreate
+from app.services.asignacion_service import AsignacionService
+from app.services.derivacion_service import DerivacionService
+from app.services.prioridad_service import PrioridadService, gestor_colas_global
+
+logger = logging.getLogger("gestion_camas.pacientes")
+
+
+TIPOS_PACIENTE_INGRESO = (TipoPacienteEnum.URGENCIA, TipoPacienteEnum.AMBULATORIO)
+
+
+# ============================================
+# CONSTRUCCIÓN DE PACIENTES
+# ============================================
+
+def determinar_edad_categoria(edad: int) -> EdadCategoriaEnum:
+    """Determina la categoría de edad."""
+    if edad < 15:
+        return EdadCategoriaEnum.PEDIATRICO
+    elif edad < 60:
+        return EdadCategoriaEnum.ADULTO
+    else:
+        return EdadCategoriaEnum.ADULTO_MAYOR
+
+
+def construir_paciente(datos: PacienteCreate, asignacion: AsignacionService) -> Paciente:
+    """
+    Crea (sin persistir) un paciente en lista de espera con su complejidad
+    calculada y los timers de observación/monitorización iniciados.
+    """
+    ahora = datetime.utcnow()
+    paciente = Paciente(
+        nombre=datos.nombre,
+        run=datos.run,
+        sexo=datos.sexo,
+        edad=datos.edad,
+        edad_categoria=determinar_edad_categoria(datos.edad),
+        es_embarazada=datos.es_embarazada,
+        diagnostico=datos.diagnostico,
+        tipo_enfermedad=datos.tipo_enfermedad,
+        tipo_aislamiento=datos.tipo_aislamiento,
+        notas_adicionales=datos.notas_adicionales,
+        requerimientos_no_definen=json.dumps(datos.requerimientos_no_definen),
+        requerimientos_baja=json.dumps(datos.requerimientos_baja),
+        requerimientos_uti=json.dumps(datos.requerimientos_uti),
+        requerimientos_uci=json.dumps(datos.requerimientos_uci),
+        casos_especiales=json.dumps(datos.casos_especiales),
+        motivo_observacion=datos.motivo_observacion,
+        justificacion_observacion=datos.justificacion_observacion,
+        motivo_monitorizacion=datos.motivo_monitorizacion,
+        justificacion_monitorizacion=datos.justificacion_monitorizacion,
+        procedimiento_invasivo=datos.procedimiento_invasivo,
+        preparacion_quirurgica_detalle=datos.preparacion_quirurgica_detalle,
+        tipo_paciente=datos.tipo_paciente,
+        hospital_id=datos.hospital_id,
+        en_lista_espera=True,
+        timestamp_lista_espera=ahora,
+        observacion_tiempo_horas=datos.observacion_tiempo_horas,
+        monitorizacion_tiempo_horas=datos.monitorizacion_tiempo_horas,
+        motivo_ingreso_ambulatorio=datos.motivo_ingreso_ambulatorio,
+    )
+
+    paciente.complejidad_requerida = asignacion.calcular_complejidad(paciente)
+
+    # Timer de observación clínica
+    if datos.observacion_tiempo_horas and datos.observacion_tiempo_horas > 0:
+        paciente.observacion_inicio = ahora
+        logger.info(
+            f"Timer de observación iniciado para {paciente.nombre}: "
+            f"{datos.observacion_tiempo_horas} horas"
+        )
+
+    # Timer de monitorización
+    if datos.monitorizacion_tiempo_horas and datos.monitorizacion_tiempo_horas > 0:
+        paciente.monitorizacion_inicio = ahora
+        logger.info(
+            f"Timer de monitorización iniciado para {paciente.nombre}: "
+            f"{datos.monitorizacion_tiempo_horas} horas"
+        )
+
+    return paciente
+
+
+# ============================================
+# INGRESO MASIVO
+# ============================================
+
+@dataclass
+class ResultadoFilaIngreso:
+    """Resultado de una fila del lote."""
+    indice: int
+    exito: bool
+    paciente_id: Optional[str] = None
+    run: Optional[str] = None
+    prioridad: Optional[float] = None
+    error: Optional[str] = None
+    advertencia: Optional[str] = None
+
+
+@dataclass
+class ResultadoIngresoLote:
+    """Resultado del ingreso masivo."""
+    resultados: List[ResultadoFilaIngreso] = field(default_factory=list)
+    por_hospital: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def creados(self) -> int:
+        return sum(1 for r in self.resultados if r.exito)
+
+    @property
+    def errores(self) -> int:
+        return sum(1 for r in self.resultados if not r.exito)
+
+
+def _describir_error_validacion(error: PydanticValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in detalle['loc']) or 'fila'}: {detalle['msg']}"
+        for detalle in error.errors()
+    )
+
+
+class IngresoLoteService:
+    """Ingreso de N pacientes en una transacción."""
+
+    def __init__(self, session: Session):
+        self.session = session
+        self.asignacion = AsignacionService(session)
+        self.prioridad = PrioridadService(session)
+
+    def _validar(self, indice: int, fila: Any, usuario: Usuario, runs: Dict[str, int]) -> Any:
+        """PacienteCreate de la fila, o el ResultadoFilaIngreso con el error."""
+        run = fila.get("run") if isinstance(fila, dict) else None
+        try:
+            datos = PacienteCreate.model_validate(fila)
+        except PydanticValidationError as e:
+            return ResultadoFilaIngreso(indice, False, run=run, error=_describir_error_validacion(e))
+
+        if datos.tipo_paciente not in TIPOS_PACIENTE_INGRESO:
+            return ResultadoFilaIngreso(
+                indice, False, run=datos.run,
+                error="Solo se permite registrar pacientes de tipo Urgencia o Ambulatorio",
+            )
+
+        hospital = obtener_topologia(self.session).hospital(datos.hospital_id)
+        if hospital is None:
+            return ResultadoFilaIngreso(indice, False, run=datos.run, error="Hospital no encontrado")
+        if not rbac_service.puede_acceder_hospital(usuario, hospital.codigo):
+            return ResultadoFilaIngreso(
+                indice, False, run=datos.run,
+                error=f"No tienes permisos para registrar pacientes en {hospital.nombre}",
+            )
+
+        if datos.run in runs:
+            return ResultadoFilaIngreso(
+                indice, False, run=datos.run, error=f"RUN repetido en el lote (fila {runs[datos.run]})",
+            )
+        runs[datos.run] = indice
+        return datos
+
+    def _insertar(self, pendientes: List[tuple], resultados: Dict[int, ResultadoFilaIngreso]) -> List[tuple]:
+        """
+        Inserta todos los pacientes con un solo flush. Si falla, reintenta
+        fila por fila con savepoints para aislar las filas problemáticas.
+        """
+        self.session.add_all([paciente for _, paciente, _ in pendientes])
+        try:
+            self.session.flush()
+            return pendientes
+        except Exception as e:
+            logger.warning(f"Ingreso masivo: el flush conjunto falló ({e}); se reintenta por fila")
+            self.session.rollback()
+
+        insertados = []
+        for indice, paciente, datos in pendientes:
+            try:
+                with self.session.begin_nested():
+                    self.session.add(paciente)
+            except Exception as e:
+                resultados[indice] = ResultadoFilaIngreso(
+                    indice, False, run=datos.run, error=f"Error al guardar: {getattr(e, 'orig', e)}",
+                )
+                continue
+            insertados.append((indice, paciente, datos))
+        return insertados
+
+    def ingresar(self, filas: List[Any], usuario: Usuario) -> ResultadoIngresoLote:
+        """
+        Valida, inserta y encola un lote de pacientes.
+
+        Args:
+            filas: Datos de cada paciente (mismo formato que PacienteCreate)
+            usuario: Usuario que registra (permisos por hospital)
+
+        Returns:
+            ResultadoIngresoLote con un resultado por fila, en el orden recibido
+        """
+        resultados: Dict[int, ResultadoFilaIngreso] = {}
+        pendientes = []
+        runs: Dict[str, int] = {}
+
+        for indice, fila in enumerate(filas):
+            validado = self._validar(indice, fila, usuario, runs)
+            if isinstance(validado, ResultadoFilaIngreso):
+                resultados[indice] = validado
+                continue
+            paciente = construir_paciente(validado, self.asignacion)
+            # Pacientes nuevos, sin cama: la prioridad no requiere consultas
+            paciente.prioridad_calculada = self.prioridad.calcular_prioridad(paciente)
+            paciente.estado_lista_espera = EstadoListaEsperaEnum.ESPERANDO
+            pendientes.append((indice, paciente, validado))
+
+        insertados = self._insertar(pendientes, resultados) if pendientes else []
+
+        por_hospital: Dict[str, List[str]] = {}
+        for indice, paciente, datos in insertados:
+            por_hospital.setdefault(paciente.hospital_id, []).append(paciente.id)
+            resultados[indice] = ResultadoFilaIngreso(
+                indice, True, paciente_id=paciente.id, run=paciente.run,
+                prioridad=paciente.prioridad_calculada,
+            )
+
+        # Una notificación por hospital en la misma transacción
+        for hospital_id, paciente_ids in por_hospital.items():
+            encolar_broadcast(self.session, {
+                "tipo": "pacientes_creados",
+                "hospital_id": hospital_id,
+                "cantidad": len(paciente_ids),
+                "paciente_ids": paciente_ids,
+                "reload": True,
+            })
+        self.session.commit()
+
+        # Colas en memoria: solo lo confirmado, un heapify por hospital
+        entradas_por_hospital: Dict[str, List[tuple]] = {}
+        for _, paciente, _ in insertados:
+            entradas_por_hospital.setdefault(paciente.hospital_id, []).append(
+                (paciente.id, paciente.prioridad_calculada)
+            )
+        for hospital_id, entradas in entradas_por_hospital.items():
+            gestor_colas_global.obtener_cola(hospital_id).agregar_varios(entradas)
+
+        self._solicitar_derivaciones(insertados, resultados)
+
+        resultado = ResultadoIngresoLote(
+            resultados=[resultados[i] for i in sorted(resultados)],
+            por_hospital={h: len(ids) for h, ids in por_hospital.items()},
+        )
+        logger.info(
+            f"Ingreso masivo: {resultado.creados} pacientes creados, {resultado.errores} filas con error "
+            f"({len(por_hospital)} hospitales)"
+        )
+        return resultado
+
+    def _solicitar_derivaciones(self, insertados: List[tuple], resultados: Dict[int, ResultadoFilaIngreso]) -> None:
+        """Derivaciones pedidas en el lote; un error no anula el ingreso de la fila."""
+        con_derivacion = [fila for fila in insertados if fila[2].derivacion_hospital_destino_id]
+        if not con_derivacion:
+            return
+
+        servicio = DerivacionService(self.session)
+        por_destino: Dict[str, List[str]] = {}
+        for indice, paciente, datos in con_derivacion:
+            try:
+                resultado = servicio.solicitar_derivacion(
+                    paciente.id,
+                    datos.derivacion_hospital_destino_id,
+                    datos.derivacion_motivo or "Derivación solicitada al registrar paciente",
+                )
+            except Exception as e:
+                self.session.rollback()
+                resultados[indice].advertencia = f"Derivación no solicitada: {e}"
+                continue
+            if resultado.exito:
+                por_destino.setdefault(datos.derivacion_hospital_destino_id, []).append(paciente.id)
+            else:
+                resultados[indice].advertencia = f"Derivación no solicitada: {resultado.mensaje}"
+
+        for hospital_id, paciente_ids in por_destino.items():
+            encolar_notificacion(
+                self.session,
+                {
+                    "tipo": "derivaciones_solicitadas",
+                    "hospital_destino_id": hospital_id,
+                    "cantidad": len(paciente_ids),
+                    "paciente_ids": paciente_ids,
+                },
+                notification_type="info",
+                hospital_id=hospital_id,
+            )
+        self.session.commit()
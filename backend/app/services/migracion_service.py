@@ -0,0 +1,408 @@
+"""
+Migración masiva entre bases de datos (SQLite -> PostgreSQL).
+
+Reemplaza la copia fila a fila con el ORM de scripts/migrate_sqlite_to_postgres.py:
+
+- Lectura por lotes con paginación por clave primaria (keyset): memoria
+  acotada y un punto de reanudación exacto.
+- Carga con COPY en PostgreSQL (psycopg2) o INSERT executemany en otros
+  motores. Cada lote y su checkpoint se confirman en la misma transacción
+  del destino, así que una migración interrumpida se reanuda desde el
+  último lote confirmado sin duplicar ni perder filas.
+- Las tablas sin dependencias pendientes (claves foráneas entre las tablas
+  de MIGRATION_ORDER) se migran en paralelo.
+- La verificación compara, por tabla, la cantidad de filas y un checksum
+  del contenido (suma de SHA-256 de cada fila canónica, independiente del
+  orden y de la collation de cada motor).
+
+Uso:
+    migrador = MigradorDatos(engine_sqlite, engine_postgres, hilos=4)
+    migrador.migrar()
+    migrador.verificar()
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, Iterator, List, Optional, Set
+import hashlib
+import io
+import json
+import logging
+import threading
+import time
+
+from sqlalchemy import (
+    BigInteger, Boolean, Column, DateTime, MetaData, String, Table, Text,
+    func, insert, select, tuple_,
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+
+# Importar todos los modelos para registrar sus tablas en SQLModel.metadata
+import app.models  # noqa: F401
+
+logger = logging.getLogger("gestion_camas.migracion")
+
+
+# Orden de migración (respetando foreign keys); las dependencias reales se
+# obtienen de las claves foráneas entre estas tablas.
+MIGRATION_ORDER: List[str] = [
+    "hospital",
+    "servicio",
+    "sala",
+    "cama",
+    "paciente",
+    "usuarios",
+    "refresh_tokens",
+    "configuracionsistema",
+    "logactividad",
+    "evento_paciente",
+    "estancia_servicio",
+    "notificacion_outbox",
+    "secuencia_outbox",
+    "estadistica_diaria",
+    "ocupacion_servicio",
+    "ocupacion_horaria",
+    "cobertura_ocupacion_horaria",
+    "cobertura_rollup",
+]
+
+TAMANO_LOTE_DEFECTO = 5000
+
+_metadata_checkpoint = MetaData()
+TABLA_CHECKPOINT = Table(
+    "migracion_checkpoint",
+    _metadata_checkpoint,
+    Column("tabla", String(100), primary_key=True),
+    Column("ultima_clave", Text, nullable=True),
+    Column("filas", BigInteger, nullable=False, default=0),
+    Column("completada", Boolean, nullable=False, default=False),
+    Column("actualizado", DateTime, nullable=False),
+)
+
+
+@dataclass
+class ResultadoTabla:
+    """Resultado de migrar una tabla."""
+    tabla: str
+    filas: int = 0
+    lotes: int = 0
+    reanudada: bool = False
+    omitida: bool = False
+    duracion: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class VerificacionTabla:
+    """Comparación origen/destino de una tabla."""
+    tabla: str
+    filas_origen: int
+    filas_destino: int
+    checksum_origen: str
+    checksum_destino: str
+    detalles: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.filas_origen == self.filas_destino and self.checksum_origen == self.checksum_destino
+
+
+# ============================================
+# DEPENDENCIAS
+# ============================================
+
+def dependencias(tablas: List[str]) -> Dict[str, Set[str]]:
+    """Tablas de las que depende cada una (FK), restringido a `tablas`."""
+    incluidas = set(tablas)
+    resultado: Dict[str, Set[str]] = {}
+    for nombre in tablas:
+        tabla = SQLModel.metadata.tables[nombre]
+        resultado[nombre] = {
+            fk.column.table.name for fk in tabla.foreign_keys
+            if fk.column.table.name in incluidas and fk.column.table.name != nombre
+        }
+    return resultado
+
+
+# ============================================
+# CLAVES Y VALORES
+# ============================================
+
+def _codificar_clave(valores: List[Any]) -> str:
+    return json.dumps([
+        {"$dt": v.isoformat()} if isinstance(v, datetime) else v.value if isinstance(v, Enum) else v
+        for v in valores
+    ])
+
+
+def _decodificar_clave(texto: str) -> List[Any]:
+    return [
+        datetime.fromisoformat(v["$dt"]) if isinstance(v, dict) and "$dt" in v else v
+        for v in json.loads(texto)
+    ]
+
+
+def _canonico(valor: Any) -> str:
+    """Representación estable de un valor para el checksum."""
+    if valor is None:
+        return "\x00"
+    if isinstance(valor, Enum):
+        return f"e:{valor.name}"
+    if isinstance(valor, bool):
+        return "b:1" if valor else "b:0"
+    if isinstance(valor, datetime):
+        return f"t:{valor.replace(tzinfo=None).isoformat()}"
+    if isinstance(valor, date):
+        return f"d:{valor.isoformat()}"
+    if isinstance(valor, float):
+        return f"n:{valor!r}"
+    if isinstance(valor, int):
+        return f"n:{float(valor)!r}"
+    return f"s:{valor}"
+
+
+def _campo_copy(valor: Any) -> str:
+    """Campo CSV para COPY: sin comillas es NULL, entre comillas es valor."""
+    if valor is None:
+        return ""
+    if isinstance(valor, bool):
+        valor = "t" if valor else "f"
+    elif isinstance(valor, datetime):
+        valor = valor.isoformat(sep=" ")
+    return '"' + str(valor).replace('"', '""') + '"'
+
+
+# ============================================
+# MIGRADOR
+# ============================================
+
+class MigradorDatos:
+    """Copia tablas de `origen` a `destino` por lotes, en paralelo y reanudable."""
+
+    def __init__(
+        self,
+        origen: Engine,
+        destino: Engine,
+        tablas: Optional[List[str]] = None,
+        tamano_lote: int = TAMANO_LOTE_DEFECTO,
+        hilos: int = 4,
+    ):
+        self.origen = origen
+        self.destino = destino
+        self.tablas = [t for t in (tablas or MIGRATION_ORDER) if t in SQLModel.metadata.tables]
+        self.tamano_lote = tamano_lote
+        self.hilos = max(1, hilos)
+        self.usar_copy = destino.dialect.driver == "psycopg2"
+        self._lock = threading.Lock()
+
+    # ---------- checkpoints ----------
+
+    def preparar(self) -> None:
+        """Crea la tabla de checkpoints en el destino si no existe."""
+        _metadata_checkpoint.create_all(self.destino)
+
+    def checkpoints(self) -> Dict[str, Dict[str, Any]]:
+        self.preparar()
+        with self.destino.connect() as conexion:
+            filas = conexion.execute(select(TABLA_CHECKPOINT)).mappings().all()
+        return {fila["tabla"]: dict(fila) for fila in filas}
+
+    def reiniciar_checkpoints(self) -> None:
+        """Olvida el progreso (no borra datos ya copiados)."""
+        self.preparar()
+        with self.destino.begin() as conexion:
+            conexion.execute(TABLA_CHECKPOINT.delete())
+
+    @staticmethod
+    def _guardar_checkpoint(conexion: Connection, tabla: str, ultima: Optional[str], filas: int, completada: bool) -> None:
+        valores = {"ultima_clave": ultima, "filas": filas, "completada": completada, "actualizado": datetime.utcnow()}
+        actualizado = conexion.execute(
+            TABLA_CHECKPOINT.update().where(TABLA_CHECKPOINT.c.tabla == tabla).values(**valores)
+        )
+        if not actualizado.rowcount:
+            conexion.execute(insert(TABLA_CHECKPOINT).values(tabla=tabla, **valores))
+
+    # ---------- lectura ----------
+
+    def _lotes(self, engine: Engine, tabla: Table, desde: Optional[List[Any]] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Filas de `tabla` en lotes ordenados por clave primaria (keyset)."""
+        pk = list(tabla.primary_key.columns)
+        ultima = desde
+        while True:
+            consulta = select(tabla).order_by(*pk).limit(self.tamano_lote)
+            if ultima is not None:
+                if len(pk) == 1:
+                    consulta = consulta.where(pk[0] > ultima[0])
+                else:
+                    consulta = consulta.where(tuple_(*pk) > tuple_(*ultima))
+            with engine.connect() as conexion:
+                filas = [dict(fila) for fila in conexion.execute(consulta).mappings()]
+            if not filas:
+                return
+            yield filas
+            if len(filas) < self.tamano_lote:
+                return
+            ultima = [filas[-1][c.name] for c in pk]
+
+    # ---------- escritura ----------
+
+    def _copiar(self, conexion: Connection, tabla: Table, filas: List[Dict[str, Any]]) -> None:
+        dialecto = self.destino.dialect
+        columnas = [c for c in tabla.columns]
+        procesadores = [c.type.dialect_impl(dialecto).bind_processor(dialecto) for c in columnas]
+
+        buffer = io.StringIO()
+        for fila in filas:
+            campos = []
+            for columna, procesar in zip(columnas, procesadores):
+                valor = fila[columna.name]
+                if procesar is not None and valor is not None:
+                    valor = procesar(valor)
+                campos.append(_campo_copy(valor))
+            buffer.write(",".join(campos))
+            buffer.write("\n")
+        buffer.seek(0)
+
+        nombres = ", ".join(dialecto.identifier_preparer.quote(c.name) for c in columnas)
+        sql = f"COPY {dialecto.identifier_preparer.format_table(tabla)} ({nombres}) FROM STDIN WITH (FORMAT csv)"
+        cursor = conexion.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(sql, buffer)
+        finally:
+            cursor.close()
+
+    def _escribir(self, conexion: Connection, tabla: Table, filas: List[Dict[str, Any]]) -> None:
+        if self.usar_copy:
+            self._copiar(conexion, tabla, filas)
+        else:
+            conexion.execute(insert(tabla), filas)
+
+    # ---------- migración ----------
+
+    def migrar_tabla(self, nombre: str) -> ResultadoTabla:
+        """Migra una tabla desde su último checkpoint."""
+        inicio = time.perf_counter()
+        tabla = SQLModel.metadata.tables[nombre]
+        pk = list(tabla.primary_key.columns)
+        resultado = ResultadoTabla(tabla=nombre)
+
+        with self.destino.connect() as conexion:
+            checkpoint = conexion.execute(
+                select(TABLA_CHECKPOINT).where(TABLA_CHECKPOINT.c.tabla == nombre)
+            ).mappings().first()
+
+        if checkpoint and checkpoint["completada"]:
+            resultado.omitida = True
+            resultado.filas = checkpoint["filas"]
+            return resultado
+
+        desde = None
+        filas_previas = 0
+        if checkpoint and checkpoint["ultima_clave"]:
+            desde = _decodificar_clave(checkpoint["ultima_clave"])
+            filas_previas = checkpoint["filas"]
+            resultado.reanudada = True
+            logger.info(f"   ↪️  {nombre}: reanudando tras {filas_previas} filas")
+
+        ultima = checkpoint["ultima_clave"] if checkpoint else None
+        for filas in self._lotes(self.origen, tabla, desde):
+            ultima = _codificar_clave([filas[-1][c.name] for c in pk])
+            with self.destino.begin() as conexion:
+                self._escribir(conexion, tabla, filas)
+                self._guardar_checkpoint(conexion, nombre, ultima, filas_previas + resultado.filas + len(filas), False)
+            resultado.filas += len(filas)
+            resultado.lotes += 1
+
+        with self.destino.begin() as conexion:
+            self._guardar_checkpoint(conexion, nombre, ultima, filas_previas + resultado.filas, True)
+
+        resultado.filas += filas_previas
+        resultado.duracion = time.perf_counter() - inicio
+        logger.info(f"   ✅ {nombre}: {resultado.filas} filas en {resultado.lotes} lotes ({resultado.duracion:.2f} s)")
+        return resultado
+
+    def migrar(self) -> Dict[str, ResultadoTabla]:
+        """
+        Migra todas las tablas. Una tabla empieza cuando terminaron las
+        tablas de las que depende; las independientes corren en paralelo.
+        Si una tabla falla, las que dependen de ella no se migran.
+        """
+        self.preparar()
+        pendientes = dependencias(self.tablas)
+        resultados: Dict[str, ResultadoTabla] = {}
+        terminadas: Set[str] = set()
+        fallidas: Set[str] = set()
+
+        with ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="migracion") as ejecutor:
+            en_curso = {}
+
+            def lanzar_listas():
+                for nombre in self.tablas:
+                    if nombre in resultados or nombre in en_curso.values():
+                        continue
+                    deps = pendientes[nombre]
+                    if deps & fallidas:
+                        resultados[nombre] = ResultadoTabla(
+                            tabla=nombre, error=f"depende de tablas con error: {sorted(deps & fallidas)}"
+                        )
+                        fallidas.add(nombre)
+                    elif deps <= terminadas:
+                        en_curso[ejecutor.submit(self.migrar_tabla, nombre)] = nombre
+
+            lanzar_listas()
+            while en_curso:
+                listos, _ = wait(list(en_curso), return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    nombre = en_curso.pop(futuro)
+                    try:
+                        resultados[nombre] = futuro.result()
+                        terminadas.add(nombre)
+                    except Exception as e:
+                        logger.error(f"   ❌ {nombre}: {e}")
+                        resultados[nombre] = ResultadoTabla(tabla=nombre, error=str(e))
+                        fallidas.add(nombre)
+                lanzar_listas()
+
+        return {nombre: resultados[nombre] for nombre in self.tablas if nombre in resultados}
+
+    # ---------- verificación ----------
+
+    def _checksum(self, engine: Engine, tabla: Table) -> tuple:
+        """(filas, checksum) del contenido de la tabla, independiente del orden."""
+        columnas = [c.name for c in tabla.columns]
+        total = 0
+        suma = 0
+        for filas in self._lotes(engine, tabla):
+            for fila in filas:
+                contenido = "\x1f".join(_canonico(fila[c]) for c in columnas)
+                suma += int.from_bytes(hashlib.sha256(contenido.encode("utf-8")).digest(), "big")
+                total += 1
+        return total, format(suma % (1 << 256), "064x")
+
+    def verificar_tabla(self, nombre: str) -> VerificacionTabla:
+        tabla = SQLModel.metadata.tables[nombre]
+        filas_origen, checksum_origen = self._checksum(self.origen, tabla)
+        filas_destino, checksum_destino = self._checksum(self.destino, tabla)
+        return VerificacionTabla(nombre, filas_origen, filas_destino, checksum_origen, checksum_destino)
+
+    def verificar(self) -> Dict[str, VerificacionTabla]:
+        """Compara filas y checksum de cada tabla (en paralelo)."""
+        with ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="verificacion") as ejecutor:
+            futuros = {nombre: ejecutor.submit(self.verificar_tabla, nombre) for nombre in self.tablas}
+        return {nombre: futuro.result() for nombre, futuro in futuros.items()}
+
+    def contar_origen(self) -> Dict[str, int]:
+        """Filas por tabla en el origen (COUNT, sin cargar filas)."""
+        conteos = {}
+        with self.origen.connect() as conexion:
+            for nombre in self.tablas:
+                tabla = SQLModel.metadata.tables[nombre]
+                try:
+                    conteos[nombre] = conexion.execute(select(func.count()).select_from(tabla)).scalar_one()
+                except Exception as e:
+                    logger.warning(f"   ⚠️  {nombre}: Error al contar - {e}")
+                    conexion.rollback()
+                    conteos[nombre] = 0
+        return conteos
@@ -0,0 +1,338 @@
+"""
+Motor de duraciones entre eventos pareados.
+
+Expresa "tiempo desde el evento A hasta el siguiente evento B del mismo
+paciente" con funciones de ventana evaluadas en la base de datos, de modo
+que ni la memoria ni la latencia de la aplicación crecen con el tamaño de
+la ventana consultada:
+
+    - Último inicio (p. ej. espera de cama): LAG() sobre los eventos de la
+      métrica del paciente; un fin se empareja si el evento anterior es un
+      inicio.
+    - Primer inicio (hospitalización): SUM() acumulado de fines define
+      episodios; un fin se empareja con el MIN() de los inicios de su episodio.
+
+emparejar_duraciones() es la implementación de referencia en Python, usada
+en tests para contrastar resultados.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Float, case, cast, func, select
+from sqlalchemy.sql import Select
+from sqlmodel import Session
+
+from app.models.enums import TipoEventoEnum
+from app.models.evento_paciente import EventoPaciente
+
+
+TABLA_EVENTOS = EventoPaciente.__table__
+
+
+# ============================================
+# MÉTRICAS DE DURACIÓN
+# ============================================
+
+@dataclass(frozen=True)
+class MetricaDuracion:
+    """
+    Duración entre un evento de inicio y uno de fin del mismo paciente.
+
+    Attributes:
+        nombre: Nombre de la métrica (columna metrica del rollup)
+        inicios: Tipos de evento que abren el intervalo
+        fines: Tipos de evento que lo cierran
+        primer_inicio: Si True se mide desde el primer inicio abierto
+            (hospitalización); si no, desde el último.
+        por_hospital: Si True el intervalo se empareja dentro del mismo hospital
+        en_rollups: Si False no se agrega en estadistica_diaria y se
+            calcula siempre desde eventos crudos
+    """
+    nombre: str
+    inicios: FrozenSet[TipoEventoEnum]
+    fines: FrozenSet[TipoEventoEnum]
+    primer_inicio: bool = False
+    por_hospital: bool = False
+    en_rollups: bool = True
+
+    @property
+    def tipos(self) -> FrozenSet[TipoEventoEnum]:
+        return self.inicios | self.fines
+
+
+METRICAS_DURACION: Dict[str, MetricaDuracion] = {
+    m.nombre: m for m in (
+        MetricaDuracion(
+            "espera_cama",
+            frozenset({TipoEventoEnum.BUSQUEDA_CAMA_INICIADA}),
+            frozenset({TipoEventoEnum.CAMA_ASIGNADA}),
+        ),
+        MetricaDuracion(
+            "derivacion_pendiente",
+            frozenset({TipoEventoEnum.DERIVACION_SOLICITADA}),
+            frozenset({TipoEventoEnum.DERIVACION_ACEPTADA, TipoEventoEnum.DERIVACION_RECHAZADA}),
+        ),
+        MetricaDuracion(
+            "traslado_saliente",
+            frozenset({TipoEventoEnum.TRASLADO_INICIADO}),
+            frozenset({TipoEventoEnum.TRASLADO_COMPLETADO}),
+        ),
+        MetricaDuracion(
+            "confirmacion_traslado",
+            frozenset({TipoEventoEnum.CAMA_EN_ESPERA_INICIO}),
+            frozenset({TipoEventoEnum.CAMA_EN_ESPERA_FIN}),
+        ),
+        MetricaDuracion(
+            "alta_sugerida",
+            frozenset({TipoEventoEnum.ALTA_SUGERIDA}),
+            frozenset({TipoEventoEnum.ALTA_INICIADA}),
+        ),
+        MetricaDuracion(
+            "alta_completada",
+            frozenset({TipoEventoEnum.ALTA_INICIADA}),
+            frozenset({TipoEventoEnum.ALTA_COMPLETADA}),
+        ),
+        MetricaDuracion(
+            "fallecido",
+            frozenset({TipoEventoEnum.FALLECIDO_MARCADO}),
+            frozenset({TipoEventoEnum.FALLECIDO_EGRESADO}),
+        ),
+        MetricaDuracion(
+            "hospitalizacion",
+            frozenset({
+                TipoEventoEnum.INGRESO_URGENCIA,
+                TipoEventoEnum.INGRESO_AMBULATORIO,
+                TipoEventoEnum.DERIVACION_ACEPTADA,
+            }),
+            frozenset({TipoEventoEnum.ALTA_COMPLETADA, TipoEventoEnum.FALLECIDO_EGRESADO}),
+            primer_inicio=True,
+            por_hospital=True,
+        ),
+        # Hospitalización vista desde la red: desde el primer ingreso en
+        # cualquier hospital hasta el egreso final, aunque haya derivaciones.
+        # Cruza hospitales, así que no se guarda en los rollups (agregados
+        # por hospital): se calcula en SQL sobre los eventos crudos.
+        MetricaDuracion(
+            "hospitalizacion_red",
+            frozenset({
+                TipoEventoEnum.INGRESO_URGENCIA,
+                TipoEventoEnum.INGRESO_AMBULATORIO,
+                TipoEventoEnum.DERIVACION_ACEPTADA,
+            }),
+            frozenset({TipoEventoEnum.ALTA_COMPLETADA, TipoEventoEnum.FALLECIDO_EGRESADO}),
+            primer_inicio=True,
+            en_rollups=False,
+        ),
+    )
+}
+
+
+def emparejar_duraciones(eventos: Iterable[Any], metrica: MetricaDuracion) -> List[Tuple[Any, float]]:
+    """
+    Empareja eventos de inicio y fin por paciente.
+
+    Args:
+        eventos: Eventos ordenados por paciente y timestamp (cualquier objeto
+            con paciente_id, hospital_id, tipo_evento y timestamp)
+        metrica: Métrica a calcular
+
+    Returns:
+        Lista de (evento_fin, duración en segundos)
+    """
+    pares: List[Tuple[Any, float]] = []
+    inicios: Dict[Tuple[str, Optional[str]], datetime] = {}
+
+    for evento in eventos:
+        clave = (evento.paciente_id, evento.hospital_id if metrica.por_hospital else None)
+        if evento.tipo_evento in metrica.inicios:
+            if not (metrica.primer_inicio and clave in inicios):
+                inicios[clave] = evento.timestamp
+        elif evento.tipo_evento in metrica.fines and clave in inicios:
+            pares.append((evento, (evento.timestamp - inicios.pop(clave)).total_seconds()))
+
+    return pares
+
+
+
+# ============================================
+# CONSULTAS SQL
+# ============================================
+
+def segundos_entre(inicio, fin, dialecto: str):
+    """Expresión SQL con los segundos entre dos columnas timestamp."""
+    if dialecto == "sqlite":
+        return func.round((func.julianday(fin) - func.julianday(inicio)) * 86400.0, 3)
+    return cast(func.extract("epoch", fin - inicio), Float)
+
+
+def _dialecto(session: Session) -> str:
+    return session.get_bind().dialect.name
+
+
+def consulta_pares(
+    metrica: MetricaDuracion,
+    dialecto: str,
+    fecha_inicio: Optional[datetime] = None,
+    fecha_fin: Optional[datetime] = None,
+    hospital_id: Optional[str] = None,
+    evento_ids: Optional[Sequence[str]] = None,
+) -> Select:
+    """
+    Consulta de los eventos de cierre emparejados, con su duración.
+
+    Columnas: id, paciente_id, hospital_id, servicio_origen_id,
+    servicio_destino_id, tipo_evento, timestamp, dia_clinico, duracion.
+
+    Args:
+        metrica: Métrica a calcular
+        dialecto: Dialecto SQL del motor (sqlite, postgresql)
+        fecha_inicio: Solo cierres con timestamp >= fecha_inicio
+        fecha_fin: Solo cierres con timestamp < fecha_fin
+        hospital_id: Solo cierres de este hospital
+        evento_ids: Solo estos eventos de cierre (mantenimiento incremental)
+    """
+    e = TABLA_EVENTOS
+    inicios, fines = list(metrica.inicios), list(metrica.fines)
+
+    # Pacientes con algún cierre en la ventana: acota las particiones
+    cierres = select(e.c.paciente_id).where(e.c.tipo_evento.in_(fines))
+    if fecha_inicio is not None:
+        cierres = cierres.where(e.c.timestamp >= fecha_inicio)
+    if fecha_fin is not None:
+        cierres = cierres.where(e.c.timestamp < fecha_fin)
+    if hospital_id:
+        cierres = cierres.where(e.c.hospital_id == hospital_id)
+    if evento_ids is not None:
+        cierres = cierres.where(e.c.id.in_(list(evento_ids)))
+
+    historial = [e.c.tipo_evento.in_(list(metrica.tipos)), e.c.paciente_id.in_(cierres)]
+    if fecha_fin is not None:
+        historial.append(e.c.timestamp < fecha_fin)
+    if hospital_id and metrica.por_hospital:
+        historial.append(e.c.hospital_id == hospital_id)
+
+    columnas = [
+        e.c.id, e.c.paciente_id, e.c.hospital_id, e.c.servicio_origen_id,
+        e.c.servicio_destino_id, e.c.tipo_evento, e.c.timestamp, e.c.dia_clinico,
+    ]
+    particion = [e.c.paciente_id] + ([e.c.hospital_id] if metrica.por_hospital else [])
+    orden = [e.c.timestamp, e.c.id]
+
+    if metrica.primer_inicio:
+        episodio = func.coalesce(
+            func.sum(case((e.c.tipo_evento.in_(fines), 1), else_=0)).over(
+                partition_by=particion, order_by=orden, rows=(None, -1)
+            ),
+            0,
+        )
+        episodios = select(*columnas, episodio.label("episodio")).where(*historial).subquery()
+        v = episodios.c
+        particion_episodio = [v.paciente_id] + ([v.hospital_id] if metrica.por_hospital else []) + [v.episodio]
+        inicio = func.min(case((v.tipo_evento.in_(inicios), v.timestamp))).over(
+            partition_by=particion_episodio
+        )
+        ventana = select(episodios, inicio.label("inicio")).subquery()
+        emparejado = ventana.c.inicio.isnot(None)
+    else:
+        ventana = select(
+            *columnas,
+            func.lag(e.c.tipo_evento, type_=e.c.tipo_evento.type)
+            .over(partition_by=particion, order_by=orden).label("tipo_previo"),
+            func.lag(e.c.timestamp, type_=e.c.timestamp.type)
+            .over(partition_by=particion, order_by=orden).label("inicio"),
+        ).where(*historial).subquery()
+        emparejado = ventana.c.tipo_previo.in_(inicios)
+
+    v = ventana.c
+    consulta = select(
+        v.id, v.paciente_id, v.hospital_id, v.servicio_origen_id, v.servicio_destino_id,
+        v.tipo_evento, v.timestamp, v.dia_clinico,
+        segundos_entre(v.inicio, v.timestamp, dialecto).label("duracion"),
+    ).where(v.tipo_evento.in_(fines), emparejado)
+    if fecha_inicio is not None:
+        consulta = consulta.where(v.timestamp >= fecha_inicio)
+    if hospital_id:
+        consulta = consulta.where(v.hospital_id == hospital_id)
+    if evento_ids is not None:
+        consulta = consulta.where(v.id.in_(list(evento_ids)))
+    return consulta
+
+
+def obtener_pares(
+    session: Session,
+    metrica: MetricaDuracion,
+    fecha_inicio: Optional[datetime] = None,
+    fecha_fin: Optional[datetime] = None,
+    hospital_id: Optional[str] = None,
+    evento_ids: Optional[Sequence[str]] = None,
+) -> List[Any]:
+    """Filas de cierre emparejadas (ver consulta_pares)."""
+    return session.execute(
+        consulta_pares(metrica, _dialecto(session), fecha_inicio, fecha_fin, hospital_id, evento_ids)
+    ).all()
+
+
+def resumir_duraciones(
+    session: Session,
+    metrica: MetricaDuracion,
+    fecha_inicio: Optional[datetime] = None,
+    fecha_fin: Optional[datetime] = None,
+    hospital_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Agregados de una métrica de duración calculados en la base de datos.
+    Los percentiles se calculan en analitica_duraciones.percentiles_metrica.
+
+    Returns:
+        cantidad, suma, suma_cuadrados, minimo y maximo
+    """
+    pares = consulta_pares(
+        metrica, _dialecto(session), fecha_inicio, fecha_fin, hospital_id
+    ).subquery()
+    d = pares.c.duracion
+    cantidad, suma, suma_cuadrados, minimo, maximo = session.execute(
+        select(func.count(d), func.sum(d), func.sum(d * d), func.min(d), func.max(d))
+    ).one()
+
+    return {
+        "cantidad": cantidad or 0,
+        "suma": float(suma or 0.0),
+        "suma_cuadrados": float(suma_cuadrados or 0.0),
+        "minimo": minimo,
+        "maximo": maximo,
+    }
+
+
+def agregar_por_dia(
+    session: Session,
+    metrica: MetricaDuracion,
+    fecha_inicio: Optional[datetime] = None,
+    fecha_fin: Optional[datetime] = None,
+    evento_ids: Optional[Sequence[str]] = None,
+) -> List[Any]:
+    """
+    Agregados por clave de rollup (día clínico, hospital, servicios y tipo
+    del evento de cierre): cantidad, suma, suma de cuadrados, mínimo, máximo.
+    """
+    pares = consulta_pares(
+        metrica, _dialecto(session), fecha_inicio, fecha_fin, evento_ids=evento_ids
+    ).subquery()
+    c = pares.c
+    clave = [
+        c.dia_clinico,
+        c.hospital_id,
+        func.coalesce(c.servicio_origen_id, ""),
+        func.coalesce(c.servicio_destino_id, ""),
+        c.tipo_evento,
+    ]
+    return session.execute(
+        select(
+            *clave,
+            func.count(c.duracion),
+            func.sum(c.duracion),
+            func.sum(c.duracion * c.duracion),
+            func.min(c.duracion),
+            func.max(c.duracion),
+        ).group_by(*clave)
+    ).all()
@@ -0,0 +1,527 @@
+"""
+Series históricas de ocupación de camas reconstruidas desde eventos.
+
+La ocupación actual vive en los contadores (ocupacion_service); para
+planificar capacidad se necesita la curva en el tiempo. Se reconstruye desde
+evento_paciente con un barrido (sweep-line) de una sola pasada:
+
+    - Estado inicial: el último evento de borde de cada paciente antes del
+      inicio. Si es una llegada con servicio destino, el paciente ocupa una
+      cama de ese servicio.
+    - Barrido: los eventos de borde del rango ordenados por (timestamp, id).
+      Cada borde saca al paciente de su servicio y una llegada con servicio
+      destino lo ubica en el nuevo. Es la misma definición de estancia que
+      la exportación de estancias (hasta el siguiente borde del paciente).
+    - Remuestreo: el barrido acumula por hora el área (camas x segundos) y
+      el pico de cada servicio, hospital y de la red. Las resoluciones
+      pedidas (múltiplos de una hora) se componen desde las horas.
+
+Caché:
+    Las horas de días clínicos cerrados se guardan en ocupacion_horaria, con
+    el rango contiguo calculado en cobertura_ocupacion_horaria. Una consulta
+    solo barre los días que faltan y el día clínico en curso. Los eventos de
+    borde anteriores al día en curso (cargas atrasadas, backfills) recortan
+    la cobertura desde su día clínico.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+import math
+import re
+
+from sqlalchemy import delete, func, insert, select, text, update
+from sqlalchemy.sql import Select
+from sqlmodel import Session
+
+from app.config import settings
+from app.core.exceptions import ValidationError
+from app.core.topologia import obtener_topologia
+from app.models.evento_paciente import EventoPaciente
+from app.models.ocupacion import CoberturaOcupacionHoraria, OcupacionHoraria
+from app.services.estadisticas_service import TIPOS_LLEGADA_SERVICIO, TIPOS_SALIDA_SERVICIO
+
+logger = logging.getLogger("gestion_camas.ocupacion_historica")
+
+
+TIPOS_BORDE = tuple(dict.fromkeys(TIPOS_LLEGADA_SERVICIO + TIPOS_SALIDA_SERVICIO))
+
+NIVEL_SERVICIO = "servicio"
+NIVEL_HOSPITAL = "hospital"
+NIVEL_RED = "red"
+NIVELES = (NIVEL_SERVICIO, NIVEL_HOSPITAL, NIVEL_RED)
+
+HORA = timedelta(hours=1)
+UNIDADES_RESOLUCION = {"h": timedelta(hours=1), "d": timedelta(days=1), "w": timedelta(weeks=1)}
+
+TABLA_EVENTOS = EventoPaciente.__table__
+TABLA_HORAS = OcupacionHoraria.__table__
+TABLA_COBERTURA = CoberturaOcupacionHoraria.__table__
+
+Clave = Tuple[str, str]
+
+
+def parsear_resolucion(valor: str) -> timedelta:
+    """"1h", "6h", "1d", "1w" -> timedelta; ValidationError si no es válida."""
+    coincidencia = re.fullmatch(r"\s*(\d+)\s*([hdw])\s*", (valor or "").lower())
+    if not coincidencia or int(coincidencia.group(1)) == 0:
+        raise ValidationError(f"Resolución inválida: {valor} (use p. ej. 1h, 6h, 1d, 1w)")
+    return int(coincidencia.group(1)) * UNIDADES_RESOLUCION[coincidencia.group(2)]
+
+
+def _hora(momento: datetime) -> datetime:
+    return momento.replace(minute=0, second=0, microsecond=0)
+
+
+def _hora_siguiente(momento: datetime) -> datetime:
+    """Primer inicio de hora >= momento."""
+    hora = _hora(momento)
+    return hora if hora == momento else hora + HORA
+
+
+def _dia_siguiente(momento: datetime) -> datetime:
+    """Primer inicio de día clínico >= momento."""
+    dia = EventoPaciente.calcular_dia_clinico(momento)
+    return dia if dia == momento else dia + timedelta(days=1)
+
+
+# ============================================
+# CONSULTAS
+# ============================================
+
+def consulta_estado_inicial(momento: datetime) -> Select:
+    """
+    Pacientes ubicados en un servicio en `momento`: su último borde anterior
+    es una llegada con servicio destino.
+    """
+    t = TABLA_EVENTOS
+    ultimos = select(
+        t.c.paciente_id,
+        t.c.tipo_evento,
+        t.c.servicio_destino_id,
+        t.c.hospital_id,
+        func.row_number().over(
+            partition_by=t.c.paciente_id,
+            order_by=(t.c.timestamp.desc(), t.c.id.desc()),
+        ).label("orden"),
+    ).where(
+        t.c.tipo_evento.in_(TIPOS_BORDE),
+        t.c.timestamp < momento,
+    ).subquery("ultimos")
+
+    return select(
+        ultimos.c.paciente_id,
+        ultimos.c.servicio_destino_id,
+        ultimos.c.hospital_id,
+    ).where(
+        ultimos.c.orden == 1,
+        ultimos.c.tipo_evento.in_(TIPOS_LLEGADA_SERVICIO),
+        ultimos.c.servicio_destino_id.is_not(None),
+    )
+
+
+def consulta_bordes(inicio: datetime, fin: datetime) -> Select:
+    """Eventos de borde de [inicio, fin) en el orden del barrido."""
+    t = TABLA_EVENTOS
+    return select(
+        t.c.paciente_id,
+        t.c.tipo_evento,
+        t.c.servicio_destino_id,
+        t.c.hospital_id,
+        t.c.timestamp,
+    ).where(
+        t.c.tipo_evento.in_(TIPOS_BORDE),
+        t.c.timestamp >= inicio,
+        t.c.timestamp < fin,
+    ).order_by(t.c.timestamp, t.c.id)
+
+
+# ============================================
+# BARRIDO
+# ============================================
+
+class BarridoOcupacion:
+    """
+    Barrido de eventos de borde que acumula la ocupación por hora.
+
+    Cada movimiento de un paciente actualiza tres claves: su servicio, su
+    hospital y la red. Al cruzar el fin de una hora se emite, para cada
+    clave que tuvo camas ocupadas, el promedio ponderado por tiempo y el
+    pico de esa hora.
+    """
+
+    def __init__(
+        self,
+        inicio: datetime,
+        limite: datetime,
+        hospital_de_servicio: Callable[[str], Optional[str]],
+    ):
+        self.hora = _hora(inicio)
+        self.limite = limite
+        self.hospital_de_servicio = hospital_de_servicio
+        self.ubicacion: Dict[str, Tuple[str, Optional[str]]] = {}
+        self.conteo: Dict[Clave, int] = {}
+        self.hospital_de_clave: Dict[Clave, Optional[str]] = {}
+        # Acumulados de la hora en curso
+        self.area: Dict[Clave, float] = defaultdict(float)
+        self.ultimo: Dict[Clave, datetime] = {}
+        self.maximo: Dict[Clave, int] = {}
+        self.filas: List[Dict[str, Any]] = []
+
+    def _mover(self, servicio_id: str, hospital_id: Optional[str], delta: int, momento: datetime) -> None:
+        claves = (
+            ((NIVEL_SERVICIO, servicio_id), hospital_id),
+            ((NIVEL_HOSPITAL, hospital_id or ""), hospital_id),
+            ((NIVEL_RED, ""), None),
+        )
+        for clave, hospital_clave in claves:
+            cantidad = self.conteo.get(clave, 0)
+            self.area[clave] += cantidad * (momento - self.ultimo.get(clave, self.hora)).total_seconds()
+            self.ultimo[clave] = momento
+            cantidad += delta
+            if cantidad:
+                self.conteo[clave] = cantidad
+            else:
+                del self.conteo[clave]
+            if momento == self.hora:
+                # Cambios en el instante inicial redefinen la ocupación de partida
+                if cantidad:
+                    self.maximo[clave] = cantidad
+                else:
+                    self.maximo.pop(clave, None)
+            elif cantidad > self.maximo.get(clave, 0):
+                self.maximo[clave] = cantidad
+            self.hospital_de_clave.setdefault(clave, hospital_clave)
+
+    def _cerrar_hora(self) -> None:
+        fin = min(self.hora + HORA, self.limite)
+        segundos = (fin - self.hora).total_seconds()
+        for clave, maximo in self.maximo.items():
+            area = self.area.get(clave, 0.0) + (
+                self.conteo.get(clave, 0) * (fin - self.ultimo.get(clave, self.hora)).total_seconds()
+            )
+            self.filas.append({
+                "nivel": clave[0],
+                "grupo_id": clave[1],
+                "hora": self.hora,
+                "hospital_id": self.hospital_de_clave.get(clave),
+                "promedio": area / segundos,
+                "maximo": maximo,
+            })
+        self.hora += HORA
+        self.area.clear()
+        self.ultimo.clear()
+        self.maximo = dict(self.conteo)
+
+    def avanzar(self, momento: datetime) -> None:
+        """Cierra las horas que terminan antes de `momento`."""
+        while momento >= self.hora + HORA and self.hora < self.limite:
+            self._cerrar_hora()
+
+    def ubicar(self, paciente_id: str, servicio_id: str, hospital_evento: Optional[str], momento: datetime) -> None:
+        """Mueve al paciente a un servicio (sale del anterior si lo tenía)."""
+        self.salir(paciente_id, momento)
+        hospital_id = self.hospital_de_servicio(servicio_id) or hospital_evento
+        self.ubicacion[paciente_id] = (servicio_id, hospital_id)
+        self._mover(servicio_id, hospital_id, 1, momento)
+
+    def salir(self, paciente_id: str, momento: datetime) -> None:
+        anterior = self.ubicacion.pop(paciente_id, None)
+        if anterior is not None:
+            self._mover(anterior[0], anterior[1], -1, momento)
+
+    def aplicar(
+        self,
+        paciente_id: str,
+        tipo_evento: Any,
+        servicio_destino_id: Optional[str],
+        hospital_id: Optional[str],
+        momento: datetime,
+    ) -> None:
+        """Procesa un evento de borde (en orden cronológico)."""
+        self.avanzar(momento)
+        if tipo_evento in TIPOS_LLEGADA_SERVICIO and servicio_destino_id:
+            self.ubicar(paciente_id, servicio_destino_id, hospital_id, momento)
+        else:
+            self.salir(paciente_id, momento)
+
+    def terminar(self) -> List[Dict[str, Any]]:
+        """Cierra las horas restantes hasta el límite y devuelve las filas."""
+        while self.hora < self.limite:
+            self._cerrar_hora()
+        return self.filas
+
+
+def barrer(session: Session, inicio: datetime, limite: datetime, topologia=None) -> List[Dict[str, Any]]:
+    """
+    Ocupación por hora de [inicio, limite) para todos los servicios,
+    hospitales y la red (solo horas con ocupación).
+    """
+    topologia = topologia or obtener_topologia(session)
+
+    def hospital_de_servicio(servicio_id: str) -> Optional[str]:
+        servicio = topologia.servicio(servicio_id)
+        return servicio.hospital_id if servicio else None
+
+    barrido = BarridoOcupacion(inicio, limite, hospital_de_servicio)
+    inicio = barrido.hora
+    for paciente_id, servicio_id, hospital_id in session.execute(consulta_estado_inicial(inicio)):
+        barrido.ubicar(paciente_id, servicio_id, hospital_id, inicio)
+    bordes = session.execute(
+        consulta_bordes(inicio, limite).execution_options(yield_per=settings.EXPORTACION_TAMANO_LOTE)
+    )
+    for fila in bordes:
+        barrido.aplicar(*fila)
+    return barrido.terminar()
+
+
+# ============================================
+# CACHÉ DE DÍAS CERRADOS
+# ============================================
+
+def obtener_cobertura(session: Session) -> Optional[Tuple[datetime, datetime]]:
+    """Rango [desde, hasta) de días clínicos en caché (o None)."""
+    fila = session.execute(
+        select(TABLA_COBERTURA.c.desde, TABLA_COBERTURA.c.hasta).where(TABLA_COBERTURA.c.id == 1)
+    ).first()
+    return (fila[0], fila[1]) if fila else None
+
+
+def _faltantes(
+    cobertura: Optional[Tuple[datetime, datetime]],
+    desde: datetime,
+    hasta: datetime,
+) -> List[Tuple[datetime, datetime]]:
+    """Rangos a calcular para cubrir [desde, hasta) manteniendo la cobertura contigua."""
+    if cobertura is None:
+        return [(desde, hasta)]
+    rangos = []
+    if desde < cobertura[0]:
+        rangos.append((desde, cobertura[0]))
+    if hasta > cobertura[1]:
+        rangos.append((cobertura[1], hasta))
+    return rangos
+
+
+def asegurar_cache(session: Session, desde: datetime, hasta: datetime, topologia=None) -> int:
+    """
+    Calcula y guarda las horas que faltan de los días clínicos [desde, hasta).
+
+    En PostgreSQL la tabla se bloquea durante el cálculo para que dos
+    consultas concurrentes no llenen el mismo rango ni se crucen con una
+    invalidación. Confirma la transacción.
+
+    Returns:
+        Filas escritas
+    """
+    if desde >= hasta or not _faltantes(obtener_cobertura(session), desde, hasta):
+        return 0
+
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text("LOCK TABLE ocupacion_horaria IN SHARE ROW EXCLUSIVE MODE"))
+    cobertura = obtener_cobertura(session)
+
+    escritas = 0
+    for inicio, fin in _faltantes(cobertura, desde, hasta):
+        filas = barrer(session, inicio, fin, topologia)
+        session.execute(delete(TABLA_HORAS).where(TABLA_HORAS.c.hora >= inicio, TABLA_HORAS.c.hora < fin))
+        for posicion in range(0, len(filas), 5000):
+            session.execute(insert(TABLA_HORAS), filas[posicion:posicion + 5000])
+        escritas += len(filas)
+
+    ahora = datetime.utcnow()
+    if cobertura is None:
+        session.execute(insert(TABLA_COBERTURA).values(id=1, desde=desde, hasta=hasta, actualizado_at=ahora))
+    else:
+        session.execute(
+            update(TABLA_COBERTURA)
+            .where(TABLA_COBERTURA.c.id == 1)
+            .values(desde=min(desde, cobertura[0]), hasta=max(hasta, cobertura[1]), actualizado_at=ahora)
+        )
+    session.commit()
+    logger.info(f"Ocupación horaria calculada para {desde:%Y-%m-%d} a {hasta:%Y-%m-%d}: {escritas} filas")
+    return escritas
+
+
+def invalidar_desde(session: Session, momento: datetime) -> None:
+    """
+    Descarta la caché desde el día clínico de `momento`. No confirma la
+    transacción.
+    """
+    cobertura = obtener_cobertura(session)
+    if cobertura is None or momento >= cobertura[1]:
+        return
+    dia = EventoPaciente.calcular_dia_clinico(momento)
+    if dia <= cobertura[0]:
+        session.execute(delete(TABLA_HORAS))
+        session.execute(delete(TABLA_COBERTURA))
+    else:
+        session.execute(delete(TABLA_HORAS).where(TABLA_HORAS.c.hora >= dia))
+        session.execute(
+            update(TABLA_COBERTURA)
+            .where(TABLA_COBERTURA.c.id == 1)
+            .values(hasta=dia, actualizado_at=datetime.utcnow())
+        )
+    logger.info(f"Caché de ocupación horaria invalidada desde {dia:%Y-%m-%d}")
+
+
+def invalidar_por_eventos(session: Session, filas: Iterable[Dict[str, Any]]) -> None:
+    """
+    Recorta la caché si hay eventos de borde anteriores al día clínico en
+    curso (los eventos del día en curso nunca están en caché).
+    """
+    momento = min(
+        (fila["timestamp"] for fila in filas if fila["tipo_evento"] in TIPOS_BORDE),
+        default=None,
+    )
+    if momento is not None and momento < EventoPaciente.calcular_dia_clinico(datetime.utcnow()):
+        invalidar_desde(session, momento)
+
+
+def _leer_cache(
+    session: Session,
+    nivel: str,
+    inicio: datetime,
+    fin: datetime,
+    hospital_id: Optional[str],
+    servicio_id: Optional[str],
+) -> List[Tuple[str, datetime, float, int]]:
+    t = TABLA_HORAS
+    query = select(t.c.grupo_id, t.c.hora, t.c.promedio, t.c.maximo).where(
+        t.c.nivel == nivel, t.c.hora >= inicio, t.c.hora < fin
+    )
+    if servicio_id:
+        query = query.where(t.c.grupo_id == servicio_id)
+    if hospital_id:
+        query = query.where(t.c.hospital_id == hospital_id)
+    return [tuple(fila) for fila in session.execute(query)]
+
+
+# ============================================
+# SERIES
+# ============================================
+
+def _grupos_en_alcance(topologia, nivel: str, hospital_id: Optional[str], servicio_id: Optional[str]) -> Dict[str, str]:
+    """{grupo_id: nombre} de los grupos que la serie debe incluir aunque estén vacíos."""
+    if nivel == NIVEL_RED:
+        return {"": "Red"}
+    if nivel == NIVEL_HOSPITAL:
+        hospitales = [hospital_id] if hospital_id else list(topologia.hospitales)
+        return {h: topologia.hospital(h).nombre for h in hospitales if topologia.hospital(h)}
+    if servicio_id:
+        return {servicio_id: topologia.nombre_servicio(servicio_id)}
+    return {s.id: s.nombre for s in topologia.servicios_de_hospital(hospital_id)}
+
+
+def serie_ocupacion(
+    session: Session,
+    fecha_inicio: datetime,
+    fecha_fin: datetime,
+    resolucion: str = "1d",
+    nivel: str = NIVEL_SERVICIO,
+    hospital_id: Optional[str] = None,
+    servicio_id: Optional[str] = None,
+    ahora: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Serie de ocupación (camas ocupadas) por grupo del nivel pedido.
+
+    Cada punto tiene el promedio ponderado por tiempo y el pico del
+    intervalo. Los intervalos se alinean a la hora de fecha_inicio y la
+    serie termina en min(fecha_fin, ahora).
+
+    Args:
+        session: Sesión de base de datos
+        fecha_inicio: Inicio de la serie
+        fecha_fin: Fin de la serie (se redondea a la hora siguiente)
+        resolucion: Ancho de cada punto, múltiplo de una hora ("1h", "1d", "1w")
+        nivel: "servicio", "hospital" o "red"
+        hospital_id: Filtra servicios u hospitales de un hospital
+        servicio_id: Un solo servicio (nivel "servicio")
+        ahora: Momento actual (para tests)
+
+    Returns:
+        {"nivel", "resolucion", "desde", "hasta", "inicios", "series"}
+    """
+    if nivel not in NIVELES:
+        raise ValidationError(f"Nivel inválido: {nivel} (use {', '.join(NIVELES)})")
+    if nivel == NIVEL_RED and hospital_id:
+        raise ValidationError("El nivel red no admite filtro por hospital")
+    if servicio_id and nivel != NIVEL_SERVICIO:
+        raise ValidationError("El filtro por servicio requiere nivel servicio")
+    ancho = parsear_resolucion(resolucion)
+
+    ahora = ahora or datetime.utcnow()
+    inicio = _hora(fecha_inicio)
+    limite = min(_hora_siguiente(fecha_fin), ahora)
+    if limite <= inicio:
+        raise ValidationError("El rango de fechas está vacío")
+    puntos = math.ceil((limite - inicio) / ancho)
+    if puntos > settings.OCUPACION_HISTORICA_MAX_PUNTOS:
+        raise ValidationError(
+            f"La serie tendría {puntos} puntos (máximo {settings.OCUPACION_HISTORICA_MAX_PUNTOS}); "
+            "use una resolución mayor"
+        )
+
+    topologia = obtener_topologia(session)
+    inicio_hoy = EventoPaciente.calcular_dia_clinico(ahora)
+
+    # Días cerrados: desde la caché (calculando los que falten)
+    horas: List[Tuple[str, datetime, float, int]] = []
+    fin_cerrado = min(limite, inicio_hoy)
+    if inicio < fin_cerrado:
+        asegurar_cache(
+            session,
+            EventoPaciente.calcular_dia_clinico(inicio),
+            min(_dia_siguiente(fin_cerrado), inicio_hoy),
+            topologia,
+        )
+        horas.extend(_leer_cache(session, nivel, inicio, fin_cerrado, hospital_id, servicio_id))
+
+    # Día en curso: barrido directo
+    inicio_abierto = max(inicio, inicio_hoy)
+    if inicio_abierto < limite:
+        for fila in barrer(session, inicio_abierto, limite, topologia):
+            if fila["nivel"] != nivel:
+                continue
+            if servicio_id and fila["grupo_id"] != servicio_id:
+                continue
+            if hospital_id and fila["hospital_id"] != hospital_id:
+                continue
+            horas.append((fila["grupo_id"], fila["hora"], fila["promedio"], fila["maximo"]))
+
+    # Remuestreo: área y pico por punto
+    inicios = [inicio + i * ancho for i in range(puntos)]
+    duraciones = [(min(t + ancho, limite) - t).total_seconds() for t in inicios]
+    nombres = _grupos_en_alcance(topologia, nivel, hospital_id, servicio_id)
+    areas: Dict[str, List[float]] = {g: [0.0] * puntos for g in nombres}
+    maximos: Dict[str, List[int]] = {g: [0] * puntos for g in nombres}
+    for grupo_id, hora, promedio, maximo in horas:
+        if grupo_id not in areas:
+            areas[grupo_id] = [0.0] * puntos
+            maximos[grupo_id] = [0] * puntos
+        i = (hora - inicio) // ancho
+        areas[grupo_id][i] += promedio * (min(hora + HORA, limite) - hora).total_seconds()
+        maximos[grupo_id][i] = max(maximos[grupo_id][i], maximo)
+
+    series = [
+        {
+            "id": grupo_id or NIVEL_RED,
+            "nombre": nombres.get(grupo_id) or (
+                topologia.nombre_servicio(grupo_id) if nivel == NIVEL_SERVICIO else grupo_id
+            ),
+            "promedio": [round(a / d, 3) for a, d in zip(areas[grupo_id], duraciones)],
+            "maximo": maximos[grupo_id],
+        }
+        for grupo_id in areas
+    ]
+    series.sort(key=lambda s: (s["nombre"], s["id"]))
+
+    return {
+        "nivel": nivel,
+        "resolucion": resolucion,
+        "desde": inicio,
+        "hasta": limite,
+        "inicios": inicios,
+        "series": series,
+    }
@@ -0,0 +1,410 @@
+"""
+Contadores de ocupación de camas por servicio, hospital y red.
+
+La tabla ocupacion_servicio guarda cuántas camas de cada servicio hay en
+cada EstadoCamaEnum. Las consultas de ocupación leen esos contadores (una
+fila por servicio y estado) en vez de cargar todas las camas.
+
+Mantenimiento:
+    - Todo cambio de estado de una cama pasa por el flush de la sesión: un
+      listener after_flush calcula los deltas de las camas nuevas, borradas
+      o con estado/sala modificados y los aplica a los contadores en la
+      misma transacción (UPDATE cantidad = cantidad + delta). Si la
+      transacción se revierte, los contadores también.
+    - Las claves se actualizan en orden para no generar deadlocks entre
+      transacciones concurrentes.
+    - reconciliar() recalcula los contadores desde la tabla cama y corrige
+      desvíos (p. ej. cambios hechos con SQL directo). ReconciliadorOcupacion
+      lo ejecuta periódicamente.
+
+Uso:
+    resumen = resumen_ocupacion(conteos(session, hospital_id=hospital_id))
+"""
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Optional, Tuple
+import asyncio
+import logging
+
+from sqlalchemy import delete, event, func, insert, inspect as sa_inspect, select, text, update
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session
+
+from app.config import settings
+from app.core.topologia import topologia_actual
+from app.models.cama import Cama
+from app.models.enums import ESTADOS_CAMA_OCUPADA
+from app.models.ocupacion import OcupacionServicio
+from app.models.sala import Sala
+from app.models.servicio import Servicio
+
+logger = logging.getLogger("gestion_camas.ocupacion")
+
+
+TABLA_OCUPACION = OcupacionServicio.__table__
+
+ESTADOS_OCUPADA = frozenset(e.value for e in ESTADOS_CAMA_OCUPADA)
+
+# (servicio_id, estado) -> (hospital_id, delta)
+Deltas = Dict[Tuple[str, str], Tuple[str, int]]
+
+
+def _valor_estado(estado: Any) -> Optional[str]:
+    return estado.value if isinstance(estado, Enum) else estado
+
+
+# ============================================
+# MANTENIMIENTO INCREMENTAL
+# ============================================
+
+def _ubicacion(session: OrmSession, sala_id: Optional[str], cache: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """(servicio_id, hospital_id) de una sala, desde la topología o la BD."""
+    if not sala_id:
+        return None
+    if sala_id not in cache:
+        topologia = topologia_actual()
+        sala = topologia.sala(sala_id) if topologia is not None else None
+        if sala is not None:
+            cache[sala_id] = (sala.servicio_id, sala.hospital_id)
+        else:
+            # Sala creada en esta transacción o topología no cargada
+            fila = session.connection().execute(
+                select(Sala.servicio_id, Servicio.hospital_id)
+                .join(Servicio, Servicio.id == Sala.servicio_id)
+                .where(Sala.id == sala_id)
+            ).first()
+            cache[sala_id] = tuple(fila) if fila else None
+    return cache[sala_id]
+
+
+def _anterior(atributo) -> Any:
+    historia = atributo.history
+    return historia.deleted[0] if historia.deleted else atributo.value
+
+
+def calcular_deltas(session: OrmSession) -> Deltas:
+    """Deltas de ocupación de las camas pendientes en el flush actual."""
+    deltas: Deltas = {}
+    ubicaciones: Dict[str, Any] = {}
+
+    def sumar(sala_id, estado, delta: int) -> None:
+        ubicacion = _ubicacion(session, sala_id, ubicaciones)
+        estado = _valor_estado(estado)
+        if ubicacion is None or estado is None:
+            return
+        servicio_id, hospital_id = ubicacion
+        _, actual = deltas.get((servicio_id, estado), (hospital_id, 0))
+        deltas[(servicio_id, estado)] = (hospital_id, actual + delta)
+
+    for obj in session.new:
+        if isinstance(obj, Cama):
+            sumar(obj.sala_id, obj.estado, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Cama):
+            atributos = sa_inspect(obj).attrs
+            sumar(_anterior(atributos.sala_id), _anterior(atributos.estado), -1)
+    for obj in session.dirty:
+        if not isinstance(obj, Cama) or obj in session.deleted:
+            continue
+        atributos = sa_inspect(obj).attrs
+        if not (atributos.estado.history.has_changes() or atributos.sala_id.history.has_changes()):
+            continue
+        antes = (_anterior(atributos.sala_id), _valor_estado(_anterior(atributos.estado)))
+        despues = (obj.sala_id, _valor_estado(obj.estado))
+        if antes != despues:
+            sumar(*antes, -1)
+            sumar(*despues, 1)
+
+    return {clave: valor for clave, valor in deltas.items() if valor[1] != 0}
+
+
+def aplicar_deltas(conexion, deltas: Deltas) -> None:
+    """Suma los deltas a los contadores (INSERT ... ON CONFLICT), en orden de clave."""
+    if not deltas:
+        return
+    ahora = datetime.utcnow()
+    filas = [
+        {
+            "servicio_id": servicio_id,
+            "estado": estado,
+            "hospital_id": hospital_id,
+            "cantidad": delta,
+            "actualizado_at": ahora,
+        }
+        for (servicio_id, estado), (hospital_id, delta) in sorted(deltas.items())
+    ]
+
+    dialecto = conexion.dialect.name
+    if dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+    elif dialecto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+    else:
+        _aplicar_generico(conexion, filas)
+        return
+
+    stmt = insert_dialecto(TABLA_OCUPACION).values(filas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["servicio_id", "estado"],
+        set_={
+            "cantidad": TABLA_OCUPACION.c.cantidad + stmt.excluded.cantidad,
+            "hospital_id": stmt.excluded.hospital_id,
+            "actualizado_at": stmt.excluded.actualizado_at,
+        },
+    )
+    conexion.execute(stmt)
+
+
+def _aplicar_generico(conexion, filas) -> None:
+    t = TABLA_OCUPACION
+    for fila in filas:
+        resultado = conexion.execute(
+            update(t)
+            .where(t.c.servicio_id == fila["servicio_id"], t.c.estado == fila["estado"])
+            .values(cantidad=t.c.cantidad + fila["cantidad"], actualizado_at=fila["actualizado_at"])
+        )
+        if not resultado.rowcount:
+            conexion.execute(insert(t).values(**fila))
+
+
+def _after_flush(session: OrmSession, flush_context) -> None:
+    deltas = calcular_deltas(session)
+    if deltas:
+        aplicar_deltas(session.connection(), deltas)
+
+
+def _valor_asignado(target, value, oldvalue, initiator):
+    return value
+
+
+def registrar_contadores_ocupacion() -> None:
+    """
+    Registra el listener de flush y pide a SQLAlchemy que cargue el valor
+    anterior de estado/sala_id al asignarlos (aunque estén expirados), para
+    poder restarlo del contador correcto. Es idempotente.
+    """
+    if not event.contains(OrmSession, "after_flush", _after_flush):
+        event.listen(OrmSession, "after_flush", _after_flush)
+    for atributo in (Cama.estado, Cama.sala_id):
+        if not event.contains(atributo, "set", _valor_asignado):
+            event.listen(atributo, "set", _valor_asignado, active_history=True, retval=True)
+
+
+registrar_contadores_ocupacion()
+
+
+# ============================================
+# CONSULTAS
+# ============================================
+
+def conteos(
+    session: Session,
+    hospital_id: Optional[str] = None,
+    servicio_id: Optional[str] = None,
+) -> Dict[str, int]:
+    """Camas por estado de la red, un hospital o un servicio."""
+    t = TABLA_OCUPACION
+    consulta = select(t.c.estado, func.sum(t.c.cantidad)).group_by(t.c.estado)
+    if hospital_id is not None:
+        consulta = consulta.where(t.c.hospital_id == hospital_id)
+    if servicio_id is not None:
+        consulta = consulta.where(t.c.servicio_id == servicio_id)
+    return {estado: int(cantidad) for estado, cantidad in session.execute(consulta) if cantidad}
+
+
+def _conteos_agrupados(session: Session, columna, hospital_id: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+    t = TABLA_OCUPACION
+    consulta = select(columna, t.c.estado, func.sum(t.c.cantidad)).group_by(columna, t.c.estado)
+    if hospital_id is not None:
+        consulta = consulta.where(t.c.hospital_id == hospital_id)
+    resultado: Dict[str, Dict[str, int]] = {}
+    for clave, estado, cantidad in session.execute(consulta):
+        if cantidad:
+            resultado.setdefault(clave, {})[estado] = int(cantidad)
+    return resultado
+
+
+def conteos_por_hospital(session: Session) -> Dict[str, Dict[str, int]]:
+    """{hospital_id: {estado: cantidad}} en una sola consulta."""
+    return _conteos_agrupados(session, TABLA_OCUPACION.c.hospital_id)
+
+
+def conteos_por_servicio(session: Session, hospital_id: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+    """{servicio_id: {estado: cantidad}} en una sola consulta."""
+    return _conteos_agrupados(session, TABLA_OCUPACION.c.servicio_id, hospital_id)
+
+
+def resumen_ocupacion(por_estado: Dict[str, int]) -> Dict[str, Any]:
+    """Tasa de ocupación a partir de los conteos por estado."""
+    camas_totales = sum(por_estado.values())
+    if camas_totales == 0:
+        return {"tasa_ocupacion": 0, "camas_ocupadas": 0, "camas_totales": 0, "por_estado": {}}
+    camas_ocupadas = sum(n for estado, n in por_estado.items() if estado in ESTADOS_OCUPADA)
+    return {
+        "tasa_ocupacion": round(camas_ocupadas / camas_totales * 100, 2),
+        "camas_ocupadas": camas_ocupadas,
+        "camas_totales": camas_totales,
+        "por_estado": dict(por_estado),
+    }
+
+
+# ============================================
+# RECONCILIACIÓN
+# ============================================
+
+def contar_desde_camas(session: Session) -> Deltas:
+    """Conteos exactos desde la tabla cama: (servicio, estado) -> (hospital, cantidad)."""
+    filas = session.execute(
+        select(Servicio.id, Cama.estado, Servicio.hospital_id, func.count())
+        .select_from(Cama)
+        .join(Sala, Sala.id == Cama.sala_id)
+        .join(Servicio, Servicio.id == Sala.servicio_id)
+        .group_by(Servicio.id, Cama.estado, Servicio.hospital_id)
+    ).all()
+    return {
+        (servicio_id, _valor_estado(estado)): (hospital_id, int(cantidad))
+        for servicio_id, estado, hospital_id, cantidad in filas
+    }
+
+
+def reconciliar(session: Session) -> Dict[str, Any]:
+    """
+    Compara los contadores con la tabla cama y los reemplaza si difieren.
+
+    En PostgreSQL bloquea los contadores mientras cuenta: las transacciones
+    que cambian camas esperan para aplicar sus deltas, y como las que aún
+    no confirman no se ven en el conteo, sus deltas quedan bien sobre el
+    valor corregido.
+    """
+    t = TABLA_OCUPACION
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text("LOCK TABLE ocupacion_servicio IN SHARE ROW EXCLUSIVE MODE"))
+
+    reales = contar_desde_camas(session)
+    actuales = {
+        (servicio_id, estado): (hospital_id, int(cantidad))
+        for servicio_id, estado, hospital_id, cantidad in session.execute(
+            select(t.c.servicio_id, t.c.estado, t.c.hospital_id, t.c.cantidad).where(t.c.cantidad != 0)
+        )
+    }
+    diferencias = sorted(
+        clave for clave in set(reales) | set(actuales) if reales.get(clave) != actuales.get(clave)
+    )
+
+    if diferencias:
+        ahora = datetime.utcnow()
+        session.execute(delete(t))
+        if reales:
+            session.execute(insert(t), [
+                {
+                    "servicio_id": servicio_id,
+                    "estado": estado,
+                    "hospital_id": hospital_id,
+                    "cantidad": cantidad,
+                    "actualizado_at": ahora,
+                }
+                for (servicio_id, estado), (hospital_id, cantidad) in sorted(reales.items())
+            ])
+        logger.warning(
+            f"⚠️  Contadores de ocupación corregidos: {len(diferencias)} desvíos "
+            f"(p. ej. {diferencias[0]}: {actuales.get(diferencias[0])} -> {reales.get(diferencias[0])})"
+        )
+    session.commit()
+
+    return {"claves": len(reales), "corregidos": len(diferencias)}
+
+
+class ReconciliadorOcupacion:
+    """Ejecuta reconciliar() periódicamente en segundo plano."""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        intervalo_segundos: Optional[float] = None,
+    ):
+        self._session_factory = session_factory
+        self.intervalo_segundos = intervalo_segundos or settings.OCUPACION_RECONCILIACION_INTERVALO
+        self._tarea: Optional[asyncio.Task] = None
+        self.ejecuciones = 0
+        self.corregidos = 0
+        self.errores = 0
+        self.ultima: Optional[datetime] = None
+
+    @property
+    def activo(self) -> bool:
+        return self._tarea is not None and not self._tarea.done()
+
+    def _nueva_sesion(self) -> Session:
+        if self._session_factory is not None:
+            return self._session_factory()
+        from app.core.database import get_session_direct
+        return get_session_direct()
+
+    def reconciliar_ahora(self) -> Dict[str, Any]:
+        session = self._nueva_sesion()
+        try:
+            resultado = reconciliar(session)
+        finally:
+            session.close()
+        self.ejecuciones += 1
+        self.corregidos += resultado["corregidos"]
+        self.ultima = datetime.utcnow()
+        return resultado
+
+    async def iniciar(self) -> None:
+        """Inicia la reconciliación periódica en el event loop actual."""
+        if self.activo:
+            return
+        self._tarea = asyncio.create_task(self._bucle())
+        logger.info("Reconciliador de ocupación iniciado")
+
+    async def detener(self) -> None:
+        if self._tarea is None:
+            return
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        self._tarea = None
+        logger.info("Reconciliador de ocupación detenido")
+
+    async def _bucle(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.reconciliar_ahora)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errores += 1
+                logger.error(f"❌ Error reconciliando ocupación: {e}")
+            await asyncio.sleep(self.intervalo_segundos)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "activo": self.activo,
+            "ejecuciones": self.ejecuciones,
+            "corregidos": self.corregidos,
+            "errores": self.errores,
+            "ultima": self.ultima.isoformat() if self.ultima else None,
+        }
+
+
+reconciliador_ocupacion = ReconciliadorOcupacion()
+
+
+def metricas_tiempo_real(session: Session) -> Dict[str, Any]:
+    """Ocupación actual de la red y por hospital, para /health/metrics."""
+    por_hospital = conteos_por_hospital(session)
+    red: Dict[str, int] = {}
+    for por_estado in por_hospital.values():
+        for estado, cantidad in por_estado.items():
+            red[estado] = red.get(estado, 0) + cantidad
+    return {
+        "red": resumen_ocupacion(red),
+        "por_hospital": {
+            hospital_id: resumen_ocupacion(por_estado)["tasa_ocupacion"]
+            for hospital_id, por_estado in por_hospital.items()
+        },
+        "reconciliacion": reconciliador_ocupacion.estadisticas(),
+    }
@@ -0,0 +1,267 @@
+"""
+Servicio de Operaciones Masivas sobre Camas.
+
+Aplica una lista de transiciones de estado (bloquear, desbloquear, iniciar
+y finalizar limpieza) a camas seleccionadas por id, sala o servicio en una
+sola transacción: una consulta con bloqueo para cargar las camas, un
+recálculo por lotes del sexo de las salas afectadas y un único broadcast.
+
+Las camas se modifican como atributos ORM (no UPDATE masivo) para que los
+contadores de ocupación se mantengan a través de los eventos de flush.
+"""
+from typing import Dict, List, Optional, Set
+from dataclasses import dataclass, field
+from datetime import datetime
+import logging
+
+from sqlmodel import Session, select
+
+from app.core.outbox import encolar_broadcast
+from app.core.rbac_service import rbac_service
+from app.core.topologia import obtener_topologia
+from app.models.cama import Cama
+from app.models.enums import EstadoCamaEnum, OperacionCamaEnum
+from app.models.sala import Sala
+from app.models.usuario import PermisoEnum, Usuario
+from app.services.compatibilidad_service import CompatibilidadService
+
+logger = logging.getLogger("gestion_camas.camas")
+
+
+# Permiso requerido por operación
+PERMISO_OPERACION = {
+    OperacionCamaEnum.BLOQUEAR: PermisoEnum.CAMA_BLOQUEAR,
+    OperacionCamaEnum.DESBLOQUEAR: PermisoEnum.CAMA_BLOQUEAR,
+    OperacionCamaEnum.INICIAR_LIMPIEZA: PermisoEnum.LIMPIEZA_MARCAR,
+    OperacionCamaEnum.FINALIZAR_LIMPIEZA: PermisoEnum.LIMPIEZA_COMPLETAR,
+}
+
+# Estado destino y mensaje por defecto
+DESTINO_OPERACION = {
+    OperacionCamaEnum.BLOQUEAR: (EstadoCamaEnum.BLOQUEADA, "Bloqueada"),
+    OperacionCamaEnum.DESBLOQUEAR: (EstadoCamaEnum.LIBRE, None),
+    OperacionCamaEnum.INICIAR_LIMPIEZA: (EstadoCamaEnum.EN_LIMPIEZA, "En limpieza"),
+    OperacionCamaEnum.FINALIZAR_LIMPIEZA: (EstadoCamaEnum.LIBRE, None),
+}
+
+# Estados desde los que se puede iniciar limpieza (cama sin paciente ni reserva)
+ESTADOS_INICIO_LIMPIEZA = [EstadoCamaEnum.LIBRE, EstadoCamaEnum.BLOQUEADA]
+
+
+class OperacionNoPermitidaError(Exception):
+    """El usuario no tiene el permiso requerido por una operación."""
+    pass
+
+
+class LoteDemasiadoGrandeError(Exception):
+    """La selección supera el máximo de camas por lote."""
+    pass
+
+
+# ============================================
+# RESULTADOS
+# ============================================
+
+@dataclass
+class ResultadoCamaOperacion:
+    """Resultado de una operación sobre una cama."""
+    operacion: str
+    cama_id: str
+    exito: bool
+    identificador: Optional[str] = None
+    estado_anterior: Optional[str] = None
+    estado_nuevo: Optional[str] = None
+    motivo: Optional[str] = None
+
+
+@dataclass
+class ResultadoOperacionesCamas:
+    """Resultado del lote de operaciones."""
+    resultados: List[ResultadoCamaOperacion] = field(default_factory=list)
+    aplicado: bool = True
+
+    @property
+    def modificadas(self) -> int:
+        return sum(1 for r in self.resultados if r.exito)
+
+    @property
+    def omitidas(self) -> int:
+        return sum(1 for r in self.resultados if not r.exito)
+
+
+# ============================================
+# SERVICIO
+# ============================================
+
+class OperacionesCamasService:
+    """Transiciones de estado sobre conjuntos de camas en una transacción."""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def _resolver_camas(
+        self,
+        cama_ids: List[str],
+        sala_ids: List[str],
+        servicio_ids: List[str],
+    ) -> List[str]:
+        """IDs de cama seleccionados (sin repetir, en orden) vía topología."""
+        topologia = obtener_topologia(self.session)
+        ids: List[str] = list(cama_ids)
+        for servicio_id in servicio_ids:
+            servicio = topologia.servicio(servicio_id)
+            if servicio:
+                sala_ids = list(sala_ids) + list(servicio.sala_ids)
+        for sala_id in sala_ids:
+            sala = topologia.sala(sala_id)
+            if sala:
+                ids.extend(sala.cama_ids)
+        return list(dict.fromkeys(ids))
+
+    def _motivo_rechazo(
+        self,
+        operacion: OperacionCamaEnum,
+        cama: Cama,
+        usuario: Usuario,
+        hospital_id: Optional[str],
+    ) -> Optional[str]:
+        """Motivo por el que la operación no aplica a la cama, o None."""
+        if hospital_id is None:
+            return "No se pudo determinar el hospital de la cama"
+
+        if operacion in (OperacionCamaEnum.BLOQUEAR, OperacionCamaEnum.DESBLOQUEAR):
+            if not rbac_service.puede_bloquear_camas(usuario, hospital_id):
+                return "No tienes permisos para bloquear camas en este hospital"
+        else:
+            hospital = obtener_topologia(self.session).hospital(hospital_id)
+            if not rbac_service.puede_acceder_hospital(usuario, hospital.codigo if hospital else hospital_id):
+                return "No tienes acceso a este hospital"
+
+        estado = cama.estado
+        if operacion == OperacionCamaEnum.BLOQUEAR and estado != EstadoCamaEnum.LIBRE:
+            return "Solo se pueden bloquear camas libres"
+        if operacion == OperacionCamaEnum.DESBLOQUEAR and estado != EstadoCamaEnum.BLOQUEADA:
+            return "La cama no está bloqueada"
+        if operacion == OperacionCamaEnum.INICIAR_LIMPIEZA:
+            if estado == EstadoCamaEnum.EN_LIMPIEZA:
+                return "La cama ya está en limpieza"
+            if estado not in ESTADOS_INICIO_LIMPIEZA:
+                return "Solo se puede iniciar limpieza en camas libres o bloqueadas"
+        if operacion == OperacionCamaEnum.FINALIZAR_LIMPIEZA and estado != EstadoCamaEnum.EN_LIMPIEZA:
+            return "La cama no está en limpieza"
+        return None
+
+    def aplicar(
+        self,
+        operaciones: List[Dict],
+        usuario: Usuario,
+        todo_o_nada: bool = False,
+        max_camas: Optional[int] = None,
+    ) -> ResultadoOperacionesCamas:
+        """
+        Aplica las operaciones en orden dentro de una transacción.
+
+        Args:
+            operaciones: Dicts con operacion, cama_ids, sala_ids, servicio_ids y mensaje opcional
+            usuario: Usuario que opera (permisos por operación y hospital)
+            todo_o_nada: Si alguna cama no admite su operación, no se aplica nada
+            max_camas: Máximo de camas seleccionadas (sumando operaciones)
+
+        Returns:
+            ResultadoOperacionesCamas con un resultado por cama y operación
+
+        Raises:
+            OperacionNoPermitidaError: Si falta el permiso de alguna operación
+            LoteDemasiadoGrandeError: Si la selección supera max_camas
+        """
+        for op in operaciones:
+            operacion = OperacionCamaEnum(op["operacion"])
+            if not usuario.tiene_permiso(PERMISO_OPERACION[operacion]):
+                raise OperacionNoPermitidaError(
+                    f"No tienes permisos para la operación '{operacion.value}'"
+                )
+
+        seleccion = [
+            self._resolver_camas(op.get("cama_ids") or [], op.get("sala_ids") or [], op.get("servicio_ids") or [])
+            for op in operaciones
+        ]
+        if max_camas is not None and sum(len(ids) for ids in seleccion) > max_camas:
+            raise LoteDemasiadoGrandeError(f"El lote supera el máximo de {max_camas} camas")
+        todos_ids = list(dict.fromkeys(i for ids in seleccion for i in ids))
+
+        # Una sola consulta, con bloqueo de filas en PostgreSQL
+        camas: Dict[str, Cama] = {}
+        if todos_ids:
+            consulta = select(Cama).where(Cama.id.in_(todos_ids)).with_for_update()
+            camas = {c.id: c for c in self.session.exec(consulta).all()}
+
+        topologia = obtener_topologia(self.session)
+        resultado = ResultadoOperacionesCamas()
+        ahora = datetime.utcnow()
+        salas_afectadas: Set[str] = set()
+        hospitales: Set[str] = set()
+
+        for op, ids in zip(operaciones, seleccion):
+            operacion = OperacionCamaEnum(op["operacion"])
+            estado_destino, mensaje_defecto = DESTINO_OPERACION[operacion]
+            mensaje = op.get("mensaje") or mensaje_defecto
+
+            for cama_id in ids:
+                cama = camas.get(cama_id)
+                if cama is None:
+                    resultado.resultados.append(ResultadoCamaOperacion(
+                        operacion.value, cama_id, False, motivo="Cama no encontrada",
+                    ))
+                    continue
+
+                hospital_id = topologia.hospital_de_cama(cama_id)
+                estado_anterior = cama.estado
+                motivo = self._motivo_rechazo(operacion, cama, usuario, hospital_id)
+                if motivo:
+                    resultado.resultados.append(ResultadoCamaOperacion(
+                        operacion.value, cama_id, False, identificador=cama.identificador,
+                        estado_anterior=estado_anterior.value, motivo=motivo,
+                    ))
+                    continue
+
+                # Misma semántica que CamaRepository.cambiar_estado
+                cama.estado = estado_destino
+                cama.mensaje_estado = mensaje
+                cama.estado_updated_at = ahora
+                if estado_destino == EstadoCamaEnum.EN_LIMPIEZA:
+                    cama.limpieza_inicio = ahora
+                elif estado_destino == EstadoCamaEnum.LIBRE:
+                    cama.limpieza_inicio = None
+                self.session.add(cama)
+
+                salas_afectadas.add(cama.sala_id)
+                hospitales.add(hospital_id)
+                resultado.resultados.append(ResultadoCamaOperacion(
+                    operacion.value, cama_id, True, identificador=cama.identificador,
+                    estado_anterior=estado_anterior.value, estado_nuevo=estado_destino.value,
+                ))
+
+        if todo_o_nada and resultado.omitidas:
+            self.session.rollback()
+            resultado.aplicado = False
+            logger.info(f"Operaciones masivas descartadas: {resultado.omitidas} camas no admiten la operación")
+            return resultado
+
+        if salas_afectadas:
+            salas = self.session.exec(select(Sala).where(Sala.id.in_(salas_afectadas))).all()
+            CompatibilidadService(self.session).actualizar_sexo_salas(list(salas))
+
+        cama_ids = list(dict.fromkeys(r.cama_id for r in resultado.resultados if r.exito))
+        if cama_ids:
+            encolar_broadcast(
+                self.session,
+                {"tipo": "camas_actualizadas", "cama_ids": cama_ids, "reload": True},
+                hospital_id=next(iter(hospitales)) if len(hospitales) == 1 else None,
+            )
+        self.session.commit()
+
+        logger.info(
+            f"Operaciones masivas: {resultado.modificadas} cambios aplicados, "
+            f"{resultado.omitidas} omitidos ({len(salas_afectadas)} salas)"
+        )
+        return resultado
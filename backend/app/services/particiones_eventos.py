@@ -0,0 +1,497 @@
+"""
+Particionado mensual de evento_paciente (PostgreSQL).
+
+evento_paciente crece sin límite y casi todas las lecturas filtran por
+rango de timestamp. En PostgreSQL la tabla se particiona por RANGE sobre
+"timestamp", una partición por mes más una partición DEFAULT que recibe lo
+que cae fuera de los meses creados:
+
+    evento_paciente                 (padre, PK (id, timestamp))
+      evento_paciente_p2026_01      [2026-01-01, 2026-02-01)
+      evento_paciente_p2026_02      ...
+      evento_paciente_default
+
+Así el planificador descarta las particiones fuera del rango consultado y
+el VACUUM/ANALYZE se limita a las particiones que aún reciben escrituras.
+
+Mantenimiento periódico (MantenedorParticiones):
+- Crea las particiones de los próximos EVENTOS_PARTICIONES_FUTURAS meses
+  (moviendo a ellas lo que haya caído en DEFAULT).
+- Con EVENTOS_RETENCION_MESES > 0, saca del padre los meses anteriores al
+  horizonte de retención:
+    "tabla":   DETACH y ATTACH a evento_paciente_archivo (sin copiar filas).
+    "parquet": exporta el mes a EVENTOS_ARCHIVO_DIRECTORIO, verifica el
+               número de filas y elimina la partición.
+  Los agregados históricos siguen disponibles en estadistica_diaria.
+- VACUUM (ANALYZE) de la partición DEFAULT y de los meses recientes.
+
+En SQLite evento_paciente es una tabla simple y todo esto es un no-op.
+"""
+import asyncio
+import logging
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import Session
+
+from app.config import settings
+from app.core.exceptions import ValidationError
+
+logger = logging.getLogger("gestion_camas.particiones")
+
+
+TABLA = "evento_paciente"
+TABLA_ARCHIVO = "evento_paciente_archivo"
+PARTICION_DEFAULT = f"{TABLA}_default"
+
+DESTINOS_ARCHIVO = ("tabla", "parquet")
+
+_LIMITES = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+# ============================================
+# MESES Y NOMBRES
+# ============================================
+
+def inicio_mes(fecha: datetime) -> datetime:
+    return datetime(fecha.year, fecha.month, 1)
+
+
+def sumar_meses(mes: datetime, meses: int) -> datetime:
+    """Primer día del mes desplazado `meses` meses desde `mes`."""
+    indice = mes.year * 12 + mes.month - 1 + meses
+    return datetime(indice // 12, indice % 12 + 1, 1)
+
+
+def meses_entre(desde: datetime, hasta: datetime) -> List[datetime]:
+    """Inicios de mes que cubren [desde, hasta], ambos meses incluidos."""
+    meses = []
+    mes = inicio_mes(desde)
+    while mes <= hasta:
+        meses.append(mes)
+        mes = sumar_meses(mes, 1)
+    return meses
+
+
+def nombre_particion(mes: datetime, tabla: str = TABLA) -> str:
+    """p. ej. evento_paciente_p2026_01"""
+    return f"{tabla}_p{mes:%Y_%m}"
+
+
+def _literal(fecha: datetime) -> str:
+    return fecha.strftime("'%Y-%m-%d %H:%M:%S'")
+
+
+def _limites_sql(mes: datetime) -> str:
+    return f"FROM ({_literal(mes)}) TO ({_literal(sumar_meses(mes, 1))})"
+
+
+# ============================================
+# CATÁLOGO
+# ============================================
+
+def _es_postgresql(conexion: Connection) -> bool:
+    return conexion.dialect.name == "postgresql"
+
+
+def es_particionada(conexion: Connection, tabla: str = TABLA) -> bool:
+    """True si `tabla` es una tabla particionada de PostgreSQL."""
+    if not _es_postgresql(conexion):
+        return False
+    return conexion.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:tabla)"),
+        {"tabla": tabla},
+    ).scalar() == "p"
+
+
+def particiones(conexion: Connection, tabla: str = TABLA) -> List[Tuple[str, Optional[datetime], Optional[datetime]]]:
+    """
+    Particiones de `tabla` como (nombre, desde, hasta) ordenadas por desde;
+    la partición DEFAULT va al final con desde = hasta = None.
+    """
+    filas = conexion.execute(text(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:tabla)
+        """
+    ), {"tabla": tabla}).all()
+
+    rangos, default = [], []
+    for nombre, limites in filas:
+        encontrado = _LIMITES.search(limites or "")
+        if encontrado is None:
+            default.append((nombre, None, None))
+            continue
+        desde, hasta = (datetime.fromisoformat(v) for v in encontrado.groups())
+        rangos.append((nombre, desde, hasta))
+    rangos.sort(key=lambda p: p[1])
+    return rangos + default
+
+
+def _definiciones(conexion: Connection, tabla: str) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """Índices (salvo la PK) y claves foráneas de `tabla`, como (nombre, SQL)."""
+    pk = f"{tabla}_pkey"
+    indices = [
+        (nombre, definicion.replace(" ON ONLY ", " ON "))
+        for nombre, definicion in conexion.execute(
+            text("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = :tabla AND indexname <> :pk"),
+            {"tabla": tabla, "pk": pk},
+        ).all()
+    ]
+    foraneas = conexion.execute(text(
+        """
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(:tabla) AND contype = 'f'
+        """
+    ), {"tabla": tabla}).all()
+    return indices, [tuple(f) for f in foraneas]
+
+
+def _recrear(conexion: Connection, tabla: str, indices, foraneas, particionada: bool) -> None:
+    for nombre, definicion in indices:
+        if particionada and definicion.startswith("CREATE UNIQUE") and '"timestamp"' not in definicion:
+            # Un índice único de una tabla particionada debe incluir la clave de partición
+            logger.warning(f"Índice único {nombre} omitido: no incluye timestamp")
+            continue
+        conexion.execute(text(definicion))
+    for nombre, definicion in foraneas:
+        conexion.execute(text(f'ALTER TABLE {tabla} ADD CONSTRAINT "{nombre}" {definicion}'))
+
+
+# ============================================
+# CONVERSIÓN (migración 010)
+# ============================================
+
+def particionar(conexion: Connection, meses_futuros: Optional[int] = None, ahora: Optional[datetime] = None) -> bool:
+    """
+    Convierte evento_paciente en una tabla particionada por mes, con los
+    mismos índices y claves foráneas. Copia las filas dentro de la
+    transacción de `conexion` (bloquea la tabla mientras dura).
+
+    Retorna False si no aplica (otro motor o ya particionada).
+    """
+    if not _es_postgresql(conexion) or es_particionada(conexion):
+        return False
+    meses_futuros = settings.EVENTOS_PARTICIONES_FUTURAS if meses_futuros is None else meses_futuros
+    ahora = ahora or datetime.utcnow()
+
+    conexion.execute(text(f"LOCK TABLE {TABLA} IN ACCESS EXCLUSIVE MODE"))
+    indices, foraneas = _definiciones(conexion, TABLA)
+    minimo = conexion.execute(text(f'SELECT min("timestamp") FROM {TABLA}')).scalar()
+
+    nueva = f"{TABLA}_particionada"
+    conexion.execute(text(
+        f'CREATE TABLE {nueva} (LIKE {TABLA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE ("timestamp")'
+    ))
+    conexion.execute(text(f'ALTER TABLE {nueva} ADD CONSTRAINT {nueva}_pkey PRIMARY KEY (id, "timestamp")'))
+    for mes in meses_entre(min(minimo or ahora, ahora), sumar_meses(inicio_mes(ahora), meses_futuros)):
+        conexion.execute(text(
+            f"CREATE TABLE {nombre_particion(mes)} PARTITION OF {nueva} FOR VALUES {_limites_sql(mes)}"
+        ))
+    conexion.execute(text(f"CREATE TABLE {PARTICION_DEFAULT} PARTITION OF {nueva} DEFAULT"))
+
+    copiadas = conexion.execute(text(f"INSERT INTO {nueva} SELECT * FROM {TABLA}")).rowcount
+    conexion.execute(text(f"DROP TABLE {TABLA}"))
+    conexion.execute(text(f"ALTER TABLE {nueva} RENAME TO {TABLA}"))
+    conexion.execute(text(f"ALTER TABLE {TABLA} RENAME CONSTRAINT {nueva}_pkey TO {TABLA}_pkey"))
+    _recrear(conexion, TABLA, indices, foraneas, particionada=True)
+
+    logger.info(f"{TABLA} particionada por mes: {copiadas} eventos copiados")
+    return True
+
+
+def desparticionar(conexion: Connection) -> bool:
+    """
+    Inverso de particionar(): vuelve a una tabla simple con PK (id) e
+    incluye las filas archivadas en evento_paciente_archivo. Los meses
+    exportados a Parquet no se recuperan.
+    """
+    if not es_particionada(conexion):
+        return False
+
+    conexion.execute(text(f"LOCK TABLE {TABLA} IN ACCESS EXCLUSIVE MODE"))
+    indices, foraneas = _definiciones(conexion, TABLA)
+    nueva = f"{TABLA}_simple"
+    conexion.execute(text(f"CREATE TABLE {nueva} (LIKE {TABLA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conexion.execute(text(f"INSERT INTO {nueva} SELECT * FROM {TABLA}"))
+    if es_particionada(conexion, TABLA_ARCHIVO):
+        conexion.execute(text(f"INSERT INTO {nueva} SELECT * FROM {TABLA_ARCHIVO}"))
+        conexion.execute(text(f"DROP TABLE {TABLA_ARCHIVO}"))
+
+    conexion.execute(text(f"DROP TABLE {TABLA}"))
+    conexion.execute(text(f"ALTER TABLE {nueva} RENAME TO {TABLA}"))
+    conexion.execute(text(f"ALTER TABLE {TABLA} ADD CONSTRAINT {TABLA}_pkey PRIMARY KEY (id)"))
+    _recrear(conexion, TABLA, indices, foraneas, particionada=False)
+
+    logger.info(f"{TABLA} vuelve a ser una tabla simple")
+    return True
+
+
+# ============================================
+# PARTICIONES FUTURAS
+# ============================================
+
+def crear_particion(conexion: Connection, mes: datetime) -> bool:
+    """
+    Crea la partición del mes si no existe. Las filas de ese mes que hayan
+    caído en DEFAULT se mueven a la nueva partición antes de adjuntarla.
+    """
+    mes = inicio_mes(mes)
+    nombre = nombre_particion(mes)
+    if any(p[0] == nombre for p in particiones(conexion)):
+        return False
+
+    conexion.execute(text(f"LOCK TABLE {PARTICION_DEFAULT} IN ACCESS EXCLUSIVE MODE"))
+    conexion.execute(text(f"CREATE TABLE {nombre} (LIKE {TABLA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    movidas = conexion.execute(text(
+        f"""
+        WITH movidas AS (
+            DELETE FROM {PARTICION_DEFAULT}
+            WHERE "timestamp" >= :desde AND "timestamp" < :hasta
+            RETURNING *
+        )
+        INSERT INTO {nombre} SELECT * FROM movidas
+        """
+    ), {"desde": mes, "hasta": sumar_meses(mes, 1)}).rowcount
+    conexion.execute(text(f"ALTER TABLE {TABLA} ATTACH PARTITION {nombre} FOR VALUES {_limites_sql(mes)}"))
+
+    logger.info(f"Partición {nombre} creada ({movidas} eventos movidos desde DEFAULT)")
+    return True
+
+
+def asegurar_particiones_futuras(
+    conexion: Connection,
+    meses: Optional[int] = None,
+    ahora: Optional[datetime] = None,
+) -> List[str]:
+    """Crea las particiones del mes actual y de los `meses` siguientes."""
+    meses = settings.EVENTOS_PARTICIONES_FUTURAS if meses is None else meses
+    actual = inicio_mes(ahora or datetime.utcnow())
+    return [
+        nombre_particion(mes)
+        for mes in meses_entre(actual, sumar_meses(actual, meses))
+        if crear_particion(conexion, mes)
+    ]
+
+
+# ============================================
+# ARCHIVADO
+# ============================================
+
+def _asegurar_tabla_archivo(conexion: Connection) -> None:
+    if es_particionada(conexion, TABLA_ARCHIVO):
+        return
+    conexion.execute(text(
+        f'CREATE TABLE {TABLA_ARCHIVO} (LIKE {TABLA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE ("timestamp")'
+    ))
+    conexion.execute(text(f'ALTER TABLE {TABLA_ARCHIVO} ADD PRIMARY KEY (id, "timestamp")'))
+
+
+def _archivar_en_tabla(conexion: Connection, nombre: str, desde: datetime) -> None:
+    _asegurar_tabla_archivo(conexion)
+    conexion.execute(text(f"ALTER TABLE {TABLA} DETACH PARTITION {nombre}"))
+    conexion.execute(text(
+        f"ALTER TABLE {TABLA_ARCHIVO} ATTACH PARTITION {nombre} FOR VALUES {_limites_sql(desde)}"
+    ))
+
+
+def _exportar_parquet(engine: Engine, nombre: str, desde: datetime, hasta: datetime, directorio: Path) -> Path:
+    """Escribe el mes en `directorio`/<partición>.parquet (vía archivo temporal)."""
+    from app.services.exportacion_service import exportar
+
+    directorio.mkdir(parents=True, exist_ok=True)
+    destino = directorio / f"{nombre}.parquet"
+    temporal = directorio / f".{nombre}.parquet.tmp"
+    bloques = exportar("eventos", "parquet", desde, hasta, session_factory=lambda: Session(engine))
+    with open(temporal, "wb") as archivo:
+        for bloque in bloques:
+            archivo.write(bloque)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, destino)
+    return destino
+
+
+def _archivar_en_parquet(engine: Engine, nombre: str, desde: datetime, hasta: datetime, directorio: Path) -> Path:
+    from app.services.exportacion_service import pq
+
+    destino = _exportar_parquet(engine, nombre, desde, hasta, directorio)
+    exportadas = pq.read_metadata(destino).num_rows
+    with engine.begin() as conexion:
+        conexion.execute(text(f"ALTER TABLE {TABLA} DETACH PARTITION {nombre}"))
+        filas = conexion.execute(text(f"SELECT count(*) FROM {nombre}")).scalar()
+        if filas != exportadas:
+            # Llegaron eventos retroactivos durante la exportación: se revierte el DETACH
+            raise RuntimeError(f"{nombre}: {filas} filas en la partición y {exportadas} exportadas")
+        conexion.execute(text(f"DROP TABLE {nombre}"))
+    return destino
+
+
+def archivar_particiones(
+    engine: Engine,
+    antes_de: datetime,
+    destino: Optional[str] = None,
+    directorio: Optional[str] = None,
+) -> List[str]:
+    """
+    Archiva las particiones mensuales que terminan en o antes de `antes_de`,
+    una transacción por partición. Retorna los nombres archivados.
+    """
+    destino = destino or settings.EVENTOS_ARCHIVO_DESTINO
+    if destino not in DESTINOS_ARCHIVO:
+        raise ValidationError(f"Destino de archivo desconocido: {destino}. Opciones: {', '.join(DESTINOS_ARCHIVO)}")
+    if destino == "parquet":
+        from app.services.exportacion_service import pq
+        if pq is None:
+            raise ValidationError("El archivado en Parquet requiere pyarrow instalado")
+    carpeta = Path(directorio or settings.EVENTOS_ARCHIVO_DIRECTORIO)
+
+    with engine.connect() as conexion:
+        vencidas = [p for p in particiones(conexion) if p[2] is not None and p[2] <= antes_de]
+
+    archivadas = []
+    for nombre, desde, hasta in vencidas:
+        if destino == "tabla":
+            with engine.begin() as conexion:
+                _archivar_en_tabla(conexion, nombre, desde)
+            logger.info(f"Partición {nombre} movida a {TABLA_ARCHIVO}")
+        else:
+            archivo = _archivar_en_parquet(engine, nombre, desde, hasta, carpeta)
+            logger.info(f"Partición {nombre} archivada en {archivo}")
+        archivadas.append(nombre)
+    return archivadas
+
+
+# ============================================
+# VACUUM ACOTADO
+# ============================================
+
+def particiones_calientes(conexion: Connection, meses: int = 1, ahora: Optional[datetime] = None) -> List[str]:
+    """DEFAULT y las particiones que cubren desde `meses` meses atrás hasta el mes actual."""
+    actual = inicio_mes(ahora or datetime.utcnow())
+    desde = sumar_meses(actual, -meses)
+    hasta = sumar_meses(actual, 1)
+    return [
+        nombre for nombre, inicio, fin in particiones(conexion)
+        if inicio is None or (inicio < hasta and fin > desde)
+    ]
+
+
+def vacuum_particiones_calientes(engine: Engine, meses: int = 1, ahora: Optional[datetime] = None) -> List[str]:
+    """
+    VACUUM (ANALYZE) solo de las particiones que reciben escrituras; los
+    meses cerrados no cambian y no necesitan mantenimiento recurrente.
+    """
+    with engine.connect() as conexion:
+        nombres = particiones_calientes(conexion, meses, ahora)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        for nombre in nombres:
+            conexion.execute(text(f"VACUUM (ANALYZE) {nombre}"))
+    return nombres
+
+
+# ============================================
+# MANTENIMIENTO
+# ============================================
+
+def mantener(engine: Optional[Engine] = None, ahora: Optional[datetime] = None) -> Dict[str, Any]:
+    """Particiones futuras, archivado por retención y VACUUM acotado."""
+    if engine is None:
+        from app.core.database import engine
+    ahora = ahora or datetime.utcnow()
+
+    with engine.begin() as conexion:
+        if not es_particionada(conexion):
+            return {"particionada": False}
+        creadas = asegurar_particiones_futuras(conexion, ahora=ahora)
+
+    archivadas = []
+    if settings.EVENTOS_RETENCION_MESES > 0:
+        horizonte = sumar_meses(inicio_mes(ahora), -settings.EVENTOS_RETENCION_MESES)
+        archivadas = archivar_particiones(engine, horizonte)
+
+    return {
+        "particionada": True,
+        "creadas": creadas,
+        "archivadas": archivadas,
+        "vacuum": vacuum_particiones_calientes(engine, ahora=ahora),
+    }
+
+
+class MantenedorParticiones:
+    """Ejecuta mantener() periódicamente en segundo plano."""
+
+    def __init__(
+        self,
+        engine_factory: Optional[Callable[[], Engine]] = None,
+        intervalo_segundos: Optional[float] = None,
+    ):
+        self._engine_factory = engine_factory
+        self.intervalo_segundos = intervalo_segundos or settings.EVENTOS_MANTENIMIENTO_INTERVALO
+        self._tarea: Optional[asyncio.Task] = None
+        self.ejecuciones = 0
+        self.errores = 0
+        self.ultima: Optional[datetime] = None
+        self.ultimo_resultado: Optional[Dict[str, Any]] = None
+
+    @property
+    def activo(self) -> bool:
+        return self._tarea is not None and not self._tarea.done()
+
+    def mantener_ahora(self) -> Dict[str, Any]:
+        engine = self._engine_factory() if self._engine_factory is not None else None
+        resultado = mantener(engine)
+        self.ejecuciones += 1
+        self.ultima = datetime.utcnow()
+        self.ultimo_resultado = resultado
+        return resultado
+
+    async def iniciar(self) -> None:
+        """Inicia el mantenimiento periódico en el event loop actual."""
+        if self.activo:
+            return
+        self._tarea = asyncio.create_task(self._bucle())
+        logger.info("Mantenimiento de particiones iniciado")
+
+    async def detener(self) -> None:
+        if self._tarea is None:
+            return
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        self._tarea = None
+        logger.info("Mantenimiento de particiones detenido")
+
+    async def _bucle(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.mantener_ahora)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errores += 1
+                logger.error(f"❌ Error manteniendo particiones de eventos: {e}")
+            await asyncio.sleep(self.intervalo_segundos)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "activo": self.activo,
+            "ejecuciones": self.ejecuciones,
+            "errores": self.errores,
+            "ultima": self.ultima.isoformat() if self.ultima else None,
+            "ultimo_resultado": self.ultimo_resultado,
+        }
+
+
+mantenedor_particiones = MantenedorParticiones()
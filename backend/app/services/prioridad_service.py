@@ -136,7 +136,15 @@ class ColaPrioridad:
         timestamp = datetime.utcnow().isoformat()
         heapq.heappush(self._heap, (-prioridad, timestamp, paciente_id))
         self._pacientes[paciente_id] = prioridad
-    
+
+    def agregar_varios(self, entradas: List[Tuple[str, float]]) -> None:
+        """Agrega varios pacientes (paciente_id, prioridad) con un solo heapify."""
+        timestamp = datetime.utcnow().isoformat()
+        for paciente_id, prioridad in entradas:
+            self._heap.append((-prioridad, timestamp, paciente_id))
+            self._pacientes[paciente_id] = prioridad
+        heapq.heapify(self._heap)
+
     def remover(self, paciente_id: str) -> bool:
         """Remueve un paciente de la cola."""
         if paciente_id not in self._pacientes:
@@ -182,6 +190,32 @@ class ColaPrioridad:
         """Obtiene todos los pacientes ordenados por prioridad."""
         items = [(pid, prio) for pid, prio in self._pacientes.items()]
         return sorted(items, key=lambda x: x[1], reverse=True)
+    
+    def exportar(self) -> List[Tuple[str, float, str]]:
+        """
+        Entradas vigentes (paciente_id, prioridad, timestamp) en orden de
+        extracción, para el snapshot de colas.
+        """
+        vigentes: Dict[str, Tuple[float, str]] = {}
+        for neg_prioridad, timestamp, paciente_id in self._heap:
+            prioridad = self._pacientes.get(paciente_id)
+            if prioridad is None or -neg_prioridad != prioridad:
+                continue
+            actual = vigentes.get(paciente_id)
+            if actual is None or timestamp > actual[1]:
+                vigentes[paciente_id] = (prioridad, timestamp)
+        entradas = [(pid, prio, ts) for pid, (prio, ts) in vigentes.items()]
+        entradas.sort(key=lambda e: (-e[1], e[2]))
+        return entradas
+    
+    @classmethod
+    def desde_entradas(cls, hospital_id: str, entradas) -> "ColaPrioridad":
+        """Reconstruye una cola a partir de exportar() sin recalcular prioridades."""
+        cola = cls(hospital_id)
+        cola._heap = [(-prioridad, timestamp, paciente_id) for paciente_id, prioridad, timestamp in entradas]
+        heapq.heapify(cola._heap)
+        cola._pacientes = {paciente_id: prioridad for paciente_id, prioridad, _ in entradas}
+        return cola
 
 
 # ============================================
@@ -218,6 +252,17 @@ class GestorColas:
             session.add(paciente)
         
         session.commit()
+    
+    def exportar(self) -> Dict[str, List[Tuple[str, float, str]]]:
+        """Estado de todas las colas (ver ColaPrioridad.exportar)."""
+        return {hospital_id: cola.exportar() for hospital_id, cola in list(self._colas.items())}
+    
+    def reemplazar(self, colas: Dict[str, ColaPrioridad]) -> None:
+        """Sustituye todas las colas de una vez (restauración de snapshot)."""
+        self._colas = dict(colas)
+    
+    def total_pacientes(self) -> int:
+        return sum(cola.tamano() for cola in list(self._colas.values()))
 
 
 # Instancia global
@@ -0,0 +1,232 @@
+"""
+Reporte de estadísticas completas (/estadisticas/avanzadas/completas).
+
+El reporte se arma como un trabajo de secciones independientes:
+    - Cada sección (ingresos, tiempos, ocupación, flujos...) se calcula en un
+      pool de hilos con su propia sesión de lectura, en paralelo.
+    - El resultado se guarda en un caché local por (dias, alcance) con un TTL
+      corto, pensado para dashboards que consultan periódicamente. Se
+      descarta al confirmar cambios con el tag de estadísticas.
+    - Single-flight: peticiones concurrentes con la misma clave esperan la
+      misma ejecución en vez de lanzar una nueva.
+
+Uso:
+    reporte = await generador_reporte.obtener(dias=7)
+    async for nombre, datos in generador_reporte.secciones_a_medida(dias=7):
+        ...
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+import asyncio
+import logging
+import threading
+import time
+
+from sqlmodel import Session
+
+from app.config import settings
+from app.core.cache import TAG_ESTADISTICAS, registrar_oyente_invalidacion
+from app.services.estadisticas_service import EstadisticasService
+
+logger = logging.getLogger("gestion_camas.estadisticas")
+
+
+Seccion = Callable[[Session, datetime, datetime], Any]
+
+# Campo de EstadisticasCompletasResponse -> cálculo (síncrono: corre en el pool)
+SECCIONES: Dict[str, Seccion] = {
+    "ingresos_red": lambda s, fi, ff: EstadisticasService.calcular_ingresos_red.sincrono(s, fi, ff),
+    "egresos_red": lambda s, fi, ff: EstadisticasService.calcular_egresos_red.sincrono(s, fi, ff),
+    "tiempo_espera_cama": lambda s, fi, ff: EstadisticasService.calcular_tiempo_espera_cama.sincrono(s, fi, ff),
+    "tiempo_derivacion_pendiente": lambda s, fi, ff: EstadisticasService.calcular_tiempo_derivacion_pendiente.sincrono(s, fi, ff),
+    "tiempo_traslado_saliente": lambda s, fi, ff: EstadisticasService.calcular_tiempo_traslado_saliente.sincrono(s, fi, ff),
+    "tiempo_confirmacion_traslado": lambda s, fi, ff: EstadisticasService.calcular_tiempo_confirmacion_traslado.sincrono(s, fi, ff),
+    "tiempo_alta": lambda s, fi, ff: EstadisticasService.calcular_tiempo_alta.sincrono(s, fi, ff),
+    "tiempo_fallecido": lambda s, fi, ff: EstadisticasService.calcular_tiempo_fallecido.sincrono(s, fi, ff),
+    "tiempo_hospitalizacion_red": lambda s, fi, ff: EstadisticasService.calcular_tiempo_hospitalizacion.sincrono(s, None, None, fi, ff),
+    "tasa_ocupacion_red": lambda s, fi, ff: EstadisticasService.calcular_tasa_ocupacion_red.sincrono(s),
+    "flujos_mas_repetidos": lambda s, fi, ff: EstadisticasService.calcular_flujos_mas_repetidos.sincrono(s, fi, ff),
+    "servicios_mayor_demanda": lambda s, fi, ff: EstadisticasService.calcular_servicios_mayor_demanda.sincrono(s),
+    "casos_especiales": lambda s, fi, ff: EstadisticasService.calcular_casos_especiales.sincrono(s),
+    "camas_subutilizadas": lambda s, fi, ff: EstadisticasService.calcular_camas_subutilizadas.sincrono(s),
+    "servicios_subutilizados": lambda s, fi, ff: EstadisticasService.calcular_servicios_subutilizados.sincrono(s),
+}
+
+
+class GeneradorReporte:
+    """
+    Calcula el reporte completo en paralelo, con caché local y single-flight.
+    """
+
+    def __init__(
+        self,
+        secciones: Optional[Dict[str, Seccion]] = None,
+        session_factory: Optional[Callable[[], Session]] = None,
+        hilos: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ):
+        self.secciones = secciones if secciones is not None else SECCIONES
+        self._session_factory = session_factory
+        self.hilos = hilos or settings.ESTADISTICAS_REPORTE_HILOS
+        self.ttl = ttl if ttl is not None else settings.ESTADISTICAS_REPORTE_TTL
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._cache: Dict[Tuple[int, str], Tuple[float, Dict[str, Any]]] = {}
+        self._en_curso: Dict[Tuple[int, str], Tuple[int, asyncio.Future]] = {}
+        # Se incrementa en cada invalidación: un cálculo iniciado antes no se cachea
+        self._generacion = 0
+        self.calculos = 0
+        self.aciertos = 0
+        self.compartidos = 0
+
+    # ---------- infraestructura ----------
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.hilos, thread_name_prefix="reporte-estadisticas"
+                )
+            return self._executor
+
+    def _nueva_sesion(self) -> Session:
+        if self._session_factory is not None:
+            return self._session_factory()
+        from app.core.database import get_session_direct
+        return get_session_direct(read_only=True)
+
+    def _ejecutar_seccion(self, nombre: str, fecha_inicio: datetime, fecha_fin: datetime) -> Any:
+        """Ejecuta una sección en un hilo del pool, con su propia sesión."""
+        session = self._nueva_sesion()
+        try:
+            return self.secciones[nombre](session, fecha_inicio, fecha_fin)
+        finally:
+            session.close()
+
+    @staticmethod
+    def _ventana(dias: int) -> Tuple[datetime, datetime]:
+        fecha_fin = datetime.utcnow()
+        return fecha_fin - timedelta(days=dias), fecha_fin
+
+    def invalidar(self) -> None:
+        """
+        Descarta los reportes cacheados. Los cálculos en curso terminan,
+        pero ya no se cachean ni se comparten con peticiones nuevas.
+        """
+        with self._lock:
+            self._cache.clear()
+            self._generacion += 1
+
+    def cerrar(self) -> None:
+        """Libera el pool de hilos."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    # ---------- cálculo ----------
+
+    async def _calcular(self, dias: int) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        pool = self._pool()
+        fecha_inicio, fecha_fin = self._ventana(dias)
+        inicio = time.perf_counter()
+
+        nombres = list(self.secciones)
+        resultados = await asyncio.gather(*(
+            loop.run_in_executor(pool, self._ejecutar_seccion, nombre, fecha_inicio, fecha_fin)
+            for nombre in nombres
+        ))
+
+        self.calculos += 1
+        logger.debug(
+            f"Reporte de estadísticas ({dias} días) calculado en "
+            f"{(time.perf_counter() - inicio) * 1000:.0f} ms"
+        )
+        return dict(zip(nombres, resultados))
+
+    async def obtener(self, dias: int, alcance: str = "publico") -> Dict[str, Any]:
+        """
+        Retorna el reporte para (dias, alcance), desde caché si está vigente.
+        Si ya hay un cálculo en curso para la misma clave, lo espera.
+        """
+        clave = (dias, alcance)
+        with self._lock:
+            cacheado = self._cache.get(clave)
+            if cacheado is not None and cacheado[0] > time.monotonic():
+                self.aciertos += 1
+                return cacheado[1]
+
+        # La tarea no depende de la petición que la lanzó: si ese cliente se
+        # desconecta, las demás peticiones siguen esperando el mismo cálculo
+        generacion = self._generacion
+        en_curso = self._en_curso.get(clave)
+        if en_curso is None or en_curso[0] != generacion:
+            tarea = asyncio.ensure_future(self._calcular_y_guardar(clave, generacion))
+            self._en_curso[clave] = (generacion, tarea)
+            tarea.add_done_callback(lambda t: self._terminar(clave, t))
+        else:
+            tarea = en_curso[1]
+            self.compartidos += 1
+        return await asyncio.shield(tarea)
+
+    def _terminar(self, clave: Tuple[int, str], tarea: asyncio.Future) -> None:
+        en_curso = self._en_curso.get(clave)
+        if en_curso is not None and en_curso[1] is tarea:
+            del self._en_curso[clave]
+
+    async def _calcular_y_guardar(self, clave: Tuple[int, str], generacion: int) -> Dict[str, Any]:
+        reporte = await self._calcular(clave[0])
+        with self._lock:
+            if generacion == self._generacion:
+                self._cache[clave] = (time.monotonic() + self.ttl, reporte)
+        return reporte
+
+    async def secciones_a_medida(self, dias: int, alcance: str = "publico") -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Entrega (nombre, datos) a medida que cada sección termina.
+        Si hay un reporte vigente en caché, lo entrega completo.
+        """
+        with self._lock:
+            cacheado = self._cache.get((dias, alcance))
+        if cacheado is not None and cacheado[0] > time.monotonic():
+            for nombre, datos in cacheado[1].items():
+                yield nombre, datos
+            return
+
+        loop = asyncio.get_running_loop()
+        pool = self._pool()
+        fecha_inicio, fecha_fin = self._ventana(dias)
+
+        async def _seccion(nombre: str):
+            datos = await loop.run_in_executor(pool, self._ejecutar_seccion, nombre, fecha_inicio, fecha_fin)
+            return nombre, datos
+
+        tareas = [asyncio.ensure_future(_seccion(nombre)) for nombre in self.secciones]
+        try:
+            for completada in asyncio.as_completed(tareas):
+                yield await completada
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "calculos": self.calculos,
+            "aciertos": self.aciertos,
+            "compartidos": self.compartidos,
+            "en_curso": len(self._en_curso),
+        }
+
+
+generador_reporte = GeneradorReporte()
+
+
+def _invalidar_reporte(tags) -> None:
+    """Los cambios que invalidan las estadísticas cacheadas invalidan también el reporte."""
+    if TAG_ESTADISTICAS in tags:
+        generador_reporte.invalidar()
+
+
+registrar_oyente_invalidacion(_invalidar_reporte)
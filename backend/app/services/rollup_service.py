@@ -0,0 +1,556 @@
+"""
+Agregados diarios de estadísticas (rollups) por día clínico.
+
+Las estadísticas de tiempos se calculan sumando filas de estadistica_diaria
+para los días clínicos cerrados y escaneando eventos crudos solo para el
+resto de la ventana (el día clínico en curso y los extremos que no cubren un
+día completo). Ingresos y egresos cuentan pacientes distintos en la ventana
+y se leen de eventos crudos (ver contar_pacientes).
+
+Mantenimiento:
+    - Incremental: el escritor de eventos llama a actualizar_rollups() en la
+      misma transacción en que inserta los eventos (upsert por clave).
+    - Reconstrucción: scripts/backfill_estadisticas.py llama a
+      reconstruir_rollups(), que recalcula los días desde eventos crudos y
+      registra desde qué día los rollups están completos (CoberturaRollup).
+      Mientras no exista cobertura, todo se calcula desde eventos crudos.
+
+Duraciones:
+    Una duración se atribuye al día clínico, hospital y servicios del evento
+    que la cierra (p. ej. CAMA_ASIGNADA para espera de cama). El inicio se
+    busca en el historial completo del paciente, no solo en la ventana. El
+    emparejamiento se hace en SQL (ver motor_duraciones).
+
+    Si llega un inicio con timestamp anterior a un cierre ya registrado
+    (evento fuera de orden), se reagrega la métrica en el día de ese cierre.
+
+    Las métricas con en_rollups=False (hospitalizacion_red) no se agregan y
+    resumen_duracion() las calcula siempre desde eventos crudos.
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+from sqlalchemy import bindparam, case, delete, distinct, func, insert, select, text
+from sqlmodel import Session
+
+from app.models.enums import TipoEventoEnum
+from app.models.estadistica_diaria import EstadisticaDiaria, CoberturaRollup
+from app.models.evento_paciente import EventoPaciente
+from app.services import motor_duraciones
+from app.services.motor_duraciones import METRICAS_DURACION, MetricaDuracion
+
+logger = logging.getLogger("gestion_camas.rollups")
+
+
+METRICA_EVENTOS = "eventos"
+
+TABLA_ROLLUP = EstadisticaDiaria.__table__
+COLUMNAS_CLAVE = (
+    "dia_clinico", "hospital_id", "servicio_origen_id", "servicio_destino_id",
+    "tipo_evento", "metrica",
+)
+
+
+# ============================================
+# ACUMULACIÓN
+# ============================================
+
+def _valor_tipo(tipo: Any) -> str:
+    return tipo.value if isinstance(tipo, TipoEventoEnum) else str(tipo)
+
+
+def _dia_de(evento: Any) -> datetime:
+    return evento.dia_clinico or EventoPaciente.calcular_dia_clinico(evento.timestamp)
+
+
+def _clave(evento: Any, metrica: str) -> Tuple:
+    return (
+        _dia_de(evento),
+        evento.hospital_id,
+        evento.servicio_origen_id or "",
+        evento.servicio_destino_id or "",
+        _valor_tipo(evento.tipo_evento),
+        metrica,
+    )
+
+
+class Acumulador:
+    """Acumula cantidades y duraciones por clave de rollup."""
+
+    def __init__(self):
+        self.filas: Dict[Tuple, Dict[str, Any]] = {}
+
+    def _fila(self, clave: Tuple) -> Dict[str, Any]:
+        fila = self.filas.get(clave)
+        if fila is None:
+            fila = dict(zip(COLUMNAS_CLAVE, clave))
+            fila.update(cantidad=0, duracion_suma=None, duracion_suma_cuadrados=None,
+                        duracion_min=None, duracion_max=None)
+            self.filas[clave] = fila
+        return fila
+
+    def agregar_evento(self, evento: Any) -> None:
+        self._fila(_clave(evento, METRICA_EVENTOS))["cantidad"] += 1
+
+    def agregar_duraciones(self, metrica: str, agregados: Iterable[Any]) -> None:
+        """Suma agregados de motor_duraciones.agregar_por_dia()."""
+        for dia, hospital_id, origen, destino, tipo, n, suma, suma2, minimo, maximo in agregados:
+            fila = self._fila((dia, hospital_id, origen, destino, _valor_tipo(tipo), metrica))
+            fila["cantidad"] += n
+            fila["duracion_suma"] = (fila["duracion_suma"] or 0.0) + suma
+            fila["duracion_suma_cuadrados"] = (fila["duracion_suma_cuadrados"] or 0.0) + suma2
+            fila["duracion_min"] = minimo if fila["duracion_min"] is None else min(fila["duracion_min"], minimo)
+            fila["duracion_max"] = maximo if fila["duracion_max"] is None else max(fila["duracion_max"], maximo)
+
+    def ordenadas(self) -> List[Dict[str, Any]]:
+        return [self.filas[clave] for clave in sorted(self.filas)]
+
+
+def _metricas_rollup() -> List[MetricaDuracion]:
+    """Métricas de duración que se agregan en estadistica_diaria."""
+    return [metrica for metrica in METRICAS_DURACION.values() if metrica.en_rollups]
+
+
+def _upsert(session: Session, filas: List[Dict[str, Any]]) -> None:
+    """Suma las filas a los rollups existentes (INSERT ... ON CONFLICT)."""
+    if not filas:
+        return
+
+    dialecto = session.get_bind().dialect.name
+    if dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+    elif dialecto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+    else:
+        _upsert_generico(session, filas)
+        return
+
+    stmt = insert_dialecto(TABLA_ROLLUP).values(filas)
+    t, e = TABLA_ROLLUP.c, stmt.excluded
+
+    def sumar(columna: str):
+        return func.coalesce(t[columna] + e[columna], t[columna], e[columna])
+
+    def extremo(columna: str, menor: bool):
+        mejor = e[columna] < t[columna] if menor else e[columna] > t[columna]
+        return case(
+            (t[columna].is_(None), e[columna]),
+            (e[columna].is_(None), t[columna]),
+            (mejor, e[columna]),
+            else_=t[columna],
+        )
+
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(COLUMNAS_CLAVE),
+        set_={
+            "cantidad": t.cantidad + e.cantidad,
+            "duracion_suma": sumar("duracion_suma"),
+            "duracion_suma_cuadrados": sumar("duracion_suma_cuadrados"),
+            "duracion_min": extremo("duracion_min", menor=True),
+            "duracion_max": extremo("duracion_max", menor=False),
+        },
+    )
+    session.execute(stmt)
+
+
+def _upsert_generico(session: Session, filas: List[Dict[str, Any]]) -> None:
+    for fila in filas:
+        existente = session.execute(
+            select(EstadisticaDiaria).where(
+                *[getattr(EstadisticaDiaria, c) == fila[c] for c in COLUMNAS_CLAVE]
+            )
+        ).scalars().first()
+        if existente is None:
+            session.add(EstadisticaDiaria(**fila))
+            continue
+        existente.cantidad += fila["cantidad"]
+        if fila["duracion_suma"] is not None:
+            existente.duracion_suma = (existente.duracion_suma or 0.0) + fila["duracion_suma"]
+            existente.duracion_suma_cuadrados = (
+                (existente.duracion_suma_cuadrados or 0.0) + fila["duracion_suma_cuadrados"]
+            )
+            existente.duracion_min = min(v for v in (existente.duracion_min, fila["duracion_min"]) if v is not None)
+            existente.duracion_max = max(v for v in (existente.duracion_max, fila["duracion_max"]) if v is not None)
+        session.add(existente)
+    session.flush()
+
+
+# ============================================
+# MANTENIMIENTO INCREMENTAL
+# ============================================
+
+def actualizar_rollups(session: Session, filas: List[Dict[str, Any]]) -> None:
+    """
+    Actualiza los rollups con eventos recién insertados (misma transacción).
+
+    Args:
+        session: Sesión de la transacción que insertó los eventos
+        filas: Filas insertadas (ver construir_fila_evento)
+    """
+    if not filas:
+        return
+
+    acumulador = Acumulador()
+    eventos = [SimpleNamespace(**fila) for fila in filas]
+    for evento in eventos:
+        acumulador.agregar_evento(evento)
+
+    # Cierres ya registrados cuyo emparejamiento cambia por un inicio tardío
+    reagregar = {}
+    for metrica in _metricas_rollup():
+        dias = _dias_con_inicio_tardio(session, metrica, eventos)
+        if dias:
+            reagregar[metrica.nombre] = dias
+    if reagregar:
+        _bloquear_rollups(session)
+
+    # Duraciones que cierran eventos de este lote
+    for metrica in _metricas_rollup():
+        cierres = [evento.id for evento in eventos if evento.tipo_evento in metrica.fines]
+        if cierres:
+            acumulador.agregar_duraciones(
+                metrica.nombre, motor_duraciones.agregar_por_dia(session, metrica, evento_ids=cierres)
+            )
+
+    _upsert(session, acumulador.ordenadas())
+
+    for nombre, dias in reagregar.items():
+        for dia in sorted(dias):
+            _reemplazar_metrica_dia(session, METRICAS_DURACION[nombre], dia)
+        logger.info(f"Rollup {nombre} reagregado por inicio tardío: {sorted(dias)}")
+
+
+def _dias_con_inicio_tardio(session: Session, metrica: MetricaDuracion, eventos: List[Any]) -> set:
+    """
+    Días clínicos de cierres ya registrados que siguen a un inicio del lote.
+
+    Una duración se acredita al día del cierre cuando este se inserta; si el
+    inicio llega después (timestamp anterior al cierre), el agregado de ese
+    día queda sin la duración o con una duración distinta.
+    """
+    inicios = [evento for evento in eventos if evento.tipo_evento in metrica.inicios]
+    if not inicios:
+        return set()
+
+    ids_lote = [evento.id for evento in eventos]
+    cierres = session.execute(
+        select(EventoPaciente.paciente_id, EventoPaciente.hospital_id, EventoPaciente.timestamp)
+        .where(
+            EventoPaciente.paciente_id.in_({evento.paciente_id for evento in inicios}),
+            EventoPaciente.tipo_evento.in_(list(metrica.fines)),
+            EventoPaciente.timestamp > min(evento.timestamp for evento in inicios),
+            EventoPaciente.id.notin_(ids_lote),
+        )
+    ).all()
+
+    dias = set()
+    for inicio in inicios:
+        posteriores = [
+            ts for paciente_id, hospital_id, ts in cierres
+            if paciente_id == inicio.paciente_id
+            and ts > inicio.timestamp
+            and (not metrica.por_hospital or hospital_id == inicio.hospital_id)
+        ]
+        if posteriores:
+            # Solo cambia el primer cierre posterior al inicio
+            dias.add(EventoPaciente.calcular_dia_clinico(min(posteriores)))
+    return dias
+
+
+def _reemplazar_metrica_dia(session: Session, metrica: MetricaDuracion, dia: datetime) -> None:
+    """Recalcula desde eventos crudos los rollups de una métrica en un día clínico."""
+    acumulador = Acumulador()
+    acumulador.agregar_duraciones(
+        metrica.nombre, motor_duraciones.agregar_por_dia(session, metrica, dia, dia + timedelta(days=1))
+    )
+    session.execute(
+        delete(EstadisticaDiaria).where(
+            EstadisticaDiaria.metrica == metrica.nombre,
+            EstadisticaDiaria.dia_clinico == dia,
+        )
+    )
+    filas = acumulador.ordenadas()
+    if filas:
+        session.execute(insert(TABLA_ROLLUP), filas)
+
+
+def _bloquear_rollups(session: Session) -> None:
+    """
+    Serializa con el mantenimiento incremental de otras transacciones al
+    reemplazar filas (en PostgreSQL): un upsert confirmado entre la lectura
+    de eventos y el borrado se perdería.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text("LOCK TABLE estadistica_diaria IN SHARE ROW EXCLUSIVE MODE"))
+
+
+# ============================================
+# LECTURA
+# ============================================
+
+def _inicio_dia_siguiente(momento: datetime) -> datetime:
+    """Primer inicio de día clínico >= momento."""
+    dia = EventoPaciente.calcular_dia_clinico(momento)
+    return dia if dia == momento else dia + timedelta(days=1)
+
+
+def obtener_cobertura(session: Session) -> Optional[datetime]:
+    """Día clínico desde el cual los rollups están completos (o None)."""
+    cobertura = session.get(CoberturaRollup, 1)
+    return cobertura.desde if cobertura else None
+
+
+def dividir_ventana(
+    session: Session,
+    fecha_inicio: Optional[datetime],
+    fecha_fin: Optional[datetime],
+    ahora: Optional[datetime] = None,
+) -> Tuple[Optional[Tuple[datetime, datetime]], List[Tuple[Optional[datetime], Optional[datetime]]]]:
+    """
+    Divide una ventana [fecha_inicio, fecha_fin) en días clínicos cerrados
+    cubiertos por rollups y tramos que deben leerse de eventos crudos.
+
+    Returns:
+        (rango de rollups o None, lista de rangos crudos)
+    """
+    desde = obtener_cobertura(session)
+    if desde is None:
+        return None, [(fecha_inicio, fecha_fin)]
+
+    inicio_hoy = EventoPaciente.calcular_dia_clinico(ahora or datetime.utcnow())
+    primer_dia = max(_inicio_dia_siguiente(fecha_inicio), desde) if fecha_inicio else desde
+    ultimo_dia = min(EventoPaciente.calcular_dia_clinico(fecha_fin), inicio_hoy) if fecha_fin else inicio_hoy
+
+    if primer_dia >= ultimo_dia:
+        return None, [(fecha_inicio, fecha_fin)]
+
+    crudos = []
+    if fecha_inicio is None or fecha_inicio < primer_dia:
+        crudos.append((fecha_inicio, primer_dia))
+    if fecha_fin is None or ultimo_dia < fecha_fin:
+        crudos.append((ultimo_dia, fecha_fin))
+    return (primer_dia, ultimo_dia), crudos
+
+
+def _filtro_rango(columna, inicio: Optional[datetime], fin: Optional[datetime]) -> list:
+    condiciones = []
+    if inicio is not None:
+        condiciones.append(columna >= inicio)
+    if fin is not None:
+        condiciones.append(columna < fin)
+    return condiciones
+
+
+def contar_pacientes(
+    session: Session,
+    tipos: Sequence[TipoEventoEnum],
+    fecha_inicio: Optional[datetime],
+    fecha_fin: Optional[datetime],
+    hospital_id: Optional[str] = None,
+    servicio_origen_id: Optional[str] = None,
+    servicio_destino_id: Optional[str] = None,
+) -> int:
+    """
+    Cuenta pacientes distintos con eventos de ciertos tipos en una ventana.
+
+    Se lee siempre de eventos crudos: un paciente con eventos en varios días
+    o claves de rollup se contaría más de una vez al sumar conteos diarios.
+    """
+    query = select(func.count(distinct(EventoPaciente.paciente_id))).where(
+        EventoPaciente.tipo_evento.in_(list(tipos)),
+        *_filtro_rango(EventoPaciente.timestamp, fecha_inicio, fecha_fin),
+    )
+    if hospital_id:
+        query = query.where(EventoPaciente.hospital_id == hospital_id)
+    if servicio_origen_id:
+        query = query.where(EventoPaciente.servicio_origen_id == servicio_origen_id)
+    if servicio_destino_id:
+        query = query.where(EventoPaciente.servicio_destino_id == servicio_destino_id)
+    return int(session.execute(query).scalar() or 0)
+
+
+def resumen_duracion(
+    session: Session,
+    nombre_metrica: str,
+    fecha_inicio: Optional[datetime],
+    fecha_fin: Optional[datetime],
+    hospital_id: Optional[str] = None,
+) -> Dict[str, float]:
+    """
+    Promedio, máximo, mínimo y cantidad de una métrica de duración.
+    """
+    metrica = METRICAS_DURACION[nombre_metrica]
+    if metrica.en_rollups:
+        rango_rollup, rangos_crudos = dividir_ventana(session, fecha_inicio, fecha_fin)
+    else:
+        rango_rollup, rangos_crudos = None, [(fecha_inicio, fecha_fin)]
+
+    cantidad, suma = 0, 0.0
+    minimo: Optional[float] = None
+    maximo: Optional[float] = None
+
+    if rango_rollup:
+        query = select(
+            func.coalesce(func.sum(EstadisticaDiaria.cantidad), 0),
+            func.sum(EstadisticaDiaria.duracion_suma),
+            func.min(EstadisticaDiaria.duracion_min),
+            func.max(EstadisticaDiaria.duracion_max),
+        ).where(
+            EstadisticaDiaria.metrica == metrica.nombre,
+            *_filtro_rango(EstadisticaDiaria.dia_clinico, *rango_rollup),
+        )
+        if hospital_id:
+            query = query.where(EstadisticaDiaria.hospital_id == hospital_id)
+        n, s, mn, mx = session.execute(query).one()
+        if n:
+            cantidad, suma, minimo, maximo = int(n), float(s or 0.0), mn, mx
+
+    for inicio, fin in rangos_crudos:
+        crudo = motor_duraciones.resumir_duraciones(session, metrica, inicio, fin, hospital_id)
+        if not crudo["cantidad"]:
+            continue
+        cantidad += crudo["cantidad"]
+        suma += crudo["suma"]
+        minimo = crudo["minimo"] if minimo is None else min(minimo, crudo["minimo"])
+        maximo = crudo["maximo"] if maximo is None else max(maximo, crudo["maximo"])
+
+    if not cantidad:
+        return {"promedio": 0, "maximo": 0, "minimo": 0, "cantidad": 0}
+    return {
+        "promedio": suma / cantidad,
+        "maximo": maximo,
+        "minimo": minimo,
+        "cantidad": cantidad,
+    }
+
+
+# ============================================
+# RECONSTRUCCIÓN (BACKFILL)
+# ============================================
+
+def completar_dia_clinico(session: Session, tamano_lote: int = 5000) -> int:
+    """Calcula dia_clinico en eventos antiguos que no lo tienen."""
+    total = 0
+    while True:
+        filas = session.execute(
+            select(EventoPaciente.id, EventoPaciente.timestamp)
+            .where(EventoPaciente.dia_clinico.is_(None))
+            .limit(tamano_lote)
+        ).all()
+        if not filas:
+            return total
+        tabla = EventoPaciente.__table__
+        session.execute(
+            tabla.update()
+            .where(tabla.c.id == bindparam("b_id"))
+            .values(dia_clinico=bindparam("b_dia")),
+            [{"b_id": i, "b_dia": EventoPaciente.calcular_dia_clinico(ts)} for i, ts in filas],
+        )
+        session.commit()
+        total += len(filas)
+
+
+def _acumular_rango(session: Session, acumulador: Acumulador, inicio: datetime, fin: datetime) -> None:
+    """Acumula conteos y duraciones de eventos cuyo día clínico cae en [inicio, fin)."""
+    conteos = session.execute(
+        select(
+            EventoPaciente.dia_clinico,
+            EventoPaciente.hospital_id,
+            func.coalesce(EventoPaciente.servicio_origen_id, ""),
+            func.coalesce(EventoPaciente.servicio_destino_id, ""),
+            EventoPaciente.tipo_evento,
+            func.count(EventoPaciente.id),
+        )
+        .where(EventoPaciente.dia_clinico >= inicio, EventoPaciente.dia_clinico < fin)
+        .group_by(
+            EventoPaciente.dia_clinico,
+            EventoPaciente.hospital_id,
+            func.coalesce(EventoPaciente.servicio_origen_id, ""),
+            func.coalesce(EventoPaciente.servicio_destino_id, ""),
+            EventoPaciente.tipo_evento,
+        )
+    ).all()
+    for dia, hospital_id, origen, destino, tipo, n in conteos:
+        fila = acumulador._fila((dia, hospital_id, origen, destino, _valor_tipo(tipo), METRICA_EVENTOS))
+        fila["cantidad"] += n
+
+    for metrica in _metricas_rollup():
+        acumulador.agregar_duraciones(
+            metrica.nombre, motor_duraciones.agregar_por_dia(session, metrica, inicio, fin)
+        )
+
+
+def reconstruir_rollups(
+    session: Session,
+    desde: Optional[datetime] = None,
+    dias_por_lote: int = 31,
+) -> Dict[str, Any]:
+    """
+    Recalcula los rollups desde eventos crudos y registra la cobertura.
+
+    Los días cerrados se reconstruyen por lotes sin bloquear escrituras.
+    El día en curso se reconstruye al final bajo un bloqueo de la tabla de
+    rollups (en PostgreSQL), para no perder ni duplicar eventos que se
+    confirmen durante la reconstrucción.
+
+    Args:
+        session: Sesión de base de datos
+        desde: Primer día a reconstruir (por defecto, el del evento más antiguo)
+        dias_por_lote: Días cerrados por transacción
+
+    Returns:
+        Resumen con días y filas escritas
+    """
+    completar_dia_clinico(session)
+
+    if desde is None:
+        desde = session.execute(select(func.min(EventoPaciente.dia_clinico))).scalar()
+        if desde is None:
+            desde = EventoPaciente.calcular_dia_clinico(datetime.utcnow())
+    desde = EventoPaciente.calcular_dia_clinico(desde)
+    inicio_hoy = EventoPaciente.calcular_dia_clinico(datetime.utcnow())
+
+    filas_escritas = 0
+    dia = desde
+    while dia < inicio_hoy:
+        hasta = min(dia + timedelta(days=dias_por_lote), inicio_hoy)
+        filas_escritas += _reemplazar_rango(session, dia, hasta)
+        session.commit()
+        dia = hasta
+
+    # Día en curso: bajo bloqueo para serializar con el mantenimiento incremental
+    _bloquear_rollups(session)
+    filas_escritas += _reemplazar_rango(session, inicio_hoy, inicio_hoy + timedelta(days=1))
+
+    cobertura = session.get(CoberturaRollup, 1) or CoberturaRollup(id=1, desde=desde)
+    cobertura.desde = desde
+    cobertura.actualizado_at = datetime.utcnow()
+    session.add(cobertura)
+    session.commit()
+
+    resumen = {
+        "desde": desde.isoformat(),
+        "dias": (inicio_hoy - desde).days + 1,
+        "filas": filas_escritas,
+    }
+    logger.info(f"Rollups reconstruidos: {resumen}")
+    return resumen
+
+
+def _reemplazar_rango(session: Session, inicio: datetime, fin: datetime) -> int:
+    """Reemplaza los rollups de [inicio, fin) por agregados desde eventos crudos."""
+    acumulador = Acumulador()
+    _acumular_rango(session, acumulador, inicio, fin)
+
+    session.execute(
+        delete(EstadisticaDiaria).where(
+            EstadisticaDiaria.dia_clinico >= inicio,
+            EstadisticaDiaria.dia_clinico < fin,
+        )
+    )
+    filas = acumulador.ordenadas()
+    if filas:
+        session.execute(insert(TABLA_ROLLUP), filas)
+    return len(filas)
@@ -0,0 +1,273 @@
+"""
+Snapshot de las colas de prioridad (gestor_colas_global).
+
+Las colas viven en memoria; al reiniciar un worker había que recalcular la
+prioridad de cada paciente en espera (sincronizar_colas_iniciales), lo que
+es lento y por eso estaba desactivado en el arranque. Este módulo:
+
+- guarda periódicamente (y al apagar) el estado exacto de las colas:
+  paciente, prioridad y timestamp de ingreso, que define el desempate;
+- al arrancar lo restaura y aplica el delta contra la BD con una sola
+  consulta sobre el índice parcial de lista de espera
+  (id, hospital_id, prioridad_calculada WHERE en_lista_espera):
+    * pacientes que ya no están en espera se descartan;
+    * si la prioridad persistida cambió después del snapshot, se usa la
+      de la BD;
+    * los que faltan en el snapshot entran con su prioridad_calculada;
+    * solo los que nunca tuvieron prioridad calculada (0) se recalculan.
+
+El snapshot se guarda en Redis (compartido entre workers) si está
+disponible y además en COLAS_SNAPSHOT_RUTA. Sin snapshot, la restauración
+usa directamente las prioridades persistidas.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.models.paciente import Paciente
+from app.services.prioridad_service import ColaPrioridad, PrioridadService, gestor_colas_global
+
+logger = logging.getLogger("gestion_camas.prioridad")
+
+
+CLAVE_REDIS = "colas:snapshot"
+VERSION_FORMATO = 1
+
+
+# ============================================
+# SERIALIZACIÓN
+# ============================================
+
+def serializar(colas: Dict[str, List[Tuple[str, float, str]]]) -> str:
+    return json.dumps({
+        "version": VERSION_FORMATO,
+        "generado": datetime.utcnow().isoformat(),
+        "colas": {hospital_id: [list(e) for e in entradas] for hospital_id, entradas in colas.items()},
+    }, separators=(",", ":"))
+
+
+def deserializar(contenido: str) -> Optional[Dict[str, Any]]:
+    try:
+        datos = json.loads(contenido)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(datos, dict) or datos.get("version") != VERSION_FORMATO:
+        return None
+    return datos
+
+
+# ============================================
+# GESTOR DE SNAPSHOTS
+# ============================================
+
+class SnapshotColas:
+    """Guarda y restaura gestor_colas_global; guardado periódico en segundo plano."""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        ruta: Optional[str] = None,
+        intervalo_segundos: Optional[float] = None,
+    ):
+        self._session_factory = session_factory
+        self.ruta = ruta if ruta is not None else settings.COLAS_SNAPSHOT_RUTA
+        self.intervalo_segundos = intervalo_segundos or settings.COLAS_SNAPSHOT_INTERVALO
+        self._tarea: Optional[asyncio.Task] = None
+        self.guardados = 0
+        self.errores = 0
+        self.ultimo_guardado: Optional[datetime] = None
+        self.ultima_restauracion: Optional[Dict[str, Any]] = None
+        # No se guarda nada antes de restaurar: se pisaría un snapshot bueno con colas vacías
+        self.restaurado = False
+
+    @property
+    def activo(self) -> bool:
+        return self._tarea is not None and not self._tarea.done()
+
+    def _nueva_sesion(self) -> Session:
+        if self._session_factory is not None:
+            return self._session_factory()
+        from app.core.database import get_session_direct
+        return get_session_direct()
+
+    @staticmethod
+    def _redis():
+        from app.core.database import get_redis
+        return get_redis()
+
+    # ---------- guardar ----------
+
+    def guardar(self) -> int:
+        """Escribe el snapshot actual. Retorna el número de pacientes."""
+        colas = gestor_colas_global.exportar()
+        contenido = serializar(colas)
+
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                redis_client.set(CLAVE_REDIS, contenido)
+            except Exception as e:
+                logger.warning(f"⚠️  No se pudo guardar el snapshot de colas en Redis: {e}")
+
+        if self.ruta:
+            directorio = os.path.dirname(self.ruta) or "."
+            os.makedirs(directorio, exist_ok=True)
+            descriptor, temporal = tempfile.mkstemp(prefix=".colas_", dir=directorio)
+            with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+                f.write(contenido)
+            os.replace(temporal, self.ruta)
+
+        self.guardados += 1
+        self.ultimo_guardado = datetime.utcnow()
+        return sum(len(entradas) for entradas in colas.values())
+
+    # ---------- cargar ----------
+
+    def cargar(self) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Snapshot más reciente disponible y su origen ("redis" o "archivo")."""
+        candidatos = []
+
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                datos = deserializar(redis_client.get(CLAVE_REDIS))
+                if datos:
+                    candidatos.append((datos, "redis"))
+            except Exception as e:
+                logger.warning(f"⚠️  No se pudo leer el snapshot de colas desde Redis: {e}")
+
+        if self.ruta and os.path.exists(self.ruta):
+            with open(self.ruta, encoding="utf-8") as f:
+                datos = deserializar(f.read())
+            if datos:
+                candidatos.append((datos, "archivo"))
+
+        if not candidatos:
+            return None, None
+        return max(candidatos, key=lambda c: c[0].get("generado", ""))
+
+    # ---------- restaurar ----------
+
+    def restaurar(self, session: Optional[Session] = None) -> Dict[str, Any]:
+        """
+        Reconstruye gestor_colas_global desde el snapshot + delta de la BD.
+        Retorna un resumen con los conteos de cada caso.
+        """
+        inicio = time.perf_counter()
+        propia = session is None
+        session = session or self._nueva_sesion()
+        try:
+            snapshot, origen = self.cargar()
+            previas: Dict[str, Tuple[str, float, str]] = {}
+            if snapshot:
+                for hospital_id, entradas in snapshot.get("colas", {}).items():
+                    for paciente_id, prioridad, timestamp in entradas:
+                        previas[paciente_id] = (hospital_id, prioridad, timestamp)
+
+            filas = session.exec(
+                select(Paciente.id, Paciente.hospital_id, Paciente.prioridad_calculada)
+                .where(Paciente.en_lista_espera == True)  # noqa: E712
+            ).all()
+
+            ahora = datetime.utcnow().isoformat()
+            por_hospital: Dict[str, List[Tuple[str, float, str]]] = {}
+            resumen = {"origen": origen or "bd", "restaurados": 0, "actualizados": 0,
+                       "nuevos": 0, "recalculados": 0, "descartados": 0}
+            sin_prioridad: List[str] = []
+
+            for paciente_id, hospital_id, prioridad in filas:
+                previa = previas.pop(paciente_id, None)
+                if previa is not None and previa[0] == hospital_id and previa[1] == prioridad:
+                    por_hospital.setdefault(hospital_id, []).append((paciente_id, previa[1], previa[2]))
+                    resumen["restaurados"] += 1
+                elif prioridad:
+                    por_hospital.setdefault(hospital_id, []).append((paciente_id, prioridad, ahora))
+                    resumen["actualizados" if previa is not None else "nuevos"] += 1
+                else:
+                    sin_prioridad.append(paciente_id)
+            resumen["descartados"] = len(previas)
+
+            if sin_prioridad:
+                servicio = PrioridadService(session)
+                pacientes = session.exec(select(Paciente).where(Paciente.id.in_(sin_prioridad))).all()
+                for paciente in pacientes:
+                    prioridad = servicio.calcular_prioridad(paciente)
+                    paciente.prioridad_calculada = prioridad
+                    session.add(paciente)
+                    por_hospital.setdefault(paciente.hospital_id, []).append((paciente.id, prioridad, ahora))
+                session.commit()
+                resumen["recalculados"] = len(pacientes)
+
+            gestor_colas_global.reemplazar({
+                hospital_id: ColaPrioridad.desde_entradas(hospital_id, entradas)
+                for hospital_id, entradas in por_hospital.items()
+            })
+        finally:
+            if propia:
+                session.close()
+
+        self.restaurado = True
+        resumen["pacientes"] = gestor_colas_global.total_pacientes()
+        resumen["duracion_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        self.ultima_restauracion = resumen
+        logger.info(f"📋 Colas restauradas ({resumen['origen']}): {resumen}")
+        return resumen
+
+    # ---------- ciclo ----------
+
+    async def iniciar(self) -> None:
+        """Inicia el guardado periódico en el event loop actual."""
+        if self.activo:
+            return
+        self._tarea = asyncio.create_task(self._bucle())
+        logger.info("Snapshot de colas iniciado")
+
+    async def detener(self, guardar: bool = True) -> None:
+        if self._tarea is None:
+            return
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        self._tarea = None
+        if guardar and self.restaurado:
+            try:
+                await asyncio.to_thread(self.guardar)
+            except Exception as e:
+                logger.error(f"❌ Error guardando snapshot de colas al detener: {e}")
+        logger.info("Snapshot de colas detenido")
+
+    async def _bucle(self) -> None:
+        while True:
+            await asyncio.sleep(self.intervalo_segundos)
+            if not self.restaurado:
+                continue
+            try:
+                await asyncio.to_thread(self.guardar)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errores += 1
+                logger.error(f"❌ Error guardando snapshot de colas: {e}")
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "activo": self.activo,
+            "restaurado": self.restaurado,
+            "guardados": self.guardados,
+            "errores": self.errores,
+            "ultimo_guardado": self.ultimo_guardado.isoformat() if self.ultimo_guardado else None,
+            "ultima_restauracion": self.ultima_restauracion,
+        }
+
+
+snapshot_colas = SnapshotColas()
@@ -13,13 +13,13 @@ from sqlmodel import Session
 from dataclasses import dataclass
 from datetime import datetime
 import logging
-import asyncio
 
 from app.models.paciente import Paciente
 from app.models.cama import Cama
 from app.models.enums import (
     EstadoCamaEnum,
     EstadoListaEsperaEnum,
+    TipoEventoEnum,
     TipoPacienteEnum,
 )
 from app.repositories.paciente_repo import PacienteRepository
@@ -30,7 +30,7 @@ from app.core.exceptions import (
     CamaNotFoundError,
     EstadoInvalidoError,
 )
-from app.core.websocket_manager import manager
+from app.core.outbox import encolar_broadcast, encolar_notificacion
 
 from app.services.compatibilidad_service import (
     CompatibilidadService,
@@ -40,6 +40,7 @@ from app.services.compatibilidad_service import (
 )
 
 from app.core.eventos_audibles import crear_evento_traslado_completado
+from app.services.evento_writer import escritor_eventos
 
 logger = logging.getLogger("gestion_camas.traslado")
 
@@ -247,12 +248,29 @@ class TrasladoService:
             paciente.derivacion_motivo_rechazo = None
         
         self.session.add(paciente)
-        self.session.commit()
-        
-        logger.info(f"Traslado completado: {paciente.nombre} -> {cama_destino.identificador}")
-        
+
+        # ============================================
+        # EVENTOS (se insertan con el commit)
         # ============================================
-        # BROADCAST TTS
+        eventos = escritor_eventos(self.session)
+        if cama_origen_id:
+            eventos.agregar(
+                TipoEventoEnum.TRASLADO_COMPLETADO, paciente.id, hospital_id,
+                cama_origen_id=cama_origen_id, cama_destino_id=cama_destino.id,
+            )
+        elif es_derivado:
+            eventos.agregar(
+                TipoEventoEnum.DERIVACION_COMPLETADA, paciente.id, hospital_id,
+                cama_destino_id=cama_destino.id,
+            )
+        if not es_compatible:
+            eventos.agregar(
+                TipoEventoEnum.CAMA_EN_ESPERA_INICIO, paciente.id, hospital_id,
+                cama_destino_id=cama_destino.id, metadata={"problemas": problemas},
+            )
+
+        # ============================================
+        # NOTIFICACIÓN TTS (outbox, misma transacción)
         # ============================================
         try:
             evento_tts = crear_evento_traslado_completado(
@@ -265,29 +283,30 @@ class TrasladoService:
                 hospital_id=hospital_id,
                 paciente_id=str(paciente.id)
             )
-            
-            # Broadcast asíncrono
-            try:
-                loop = asyncio.get_event_loop()
-                loop.create_task(manager.broadcast(evento_tts))
-            except RuntimeError:
-                # Si no hay event loop, crear uno nuevo
-                asyncio.run(manager.broadcast(evento_tts))
-                
-            logger.info(f"Evento TTS de traslado completado emitido")
+            encolar_broadcast(self.session, evento_tts)
         except Exception as e:
-            logger.warning(f"Error emitiendo evento TTS: {e}")
+            logger.warning(f"Error construyendo evento TTS: {e}")
             # Fallback sin TTS
-            try:
-                loop = asyncio.get_event_loop()
-                loop.create_task(manager.broadcast({
-                    "tipo": "traslado_completado",
-                    "hospital_id": hospital_id,
-                    "reload": True,
-                    "play_sound": True
-                }))
-            except:
-                pass
+            encolar_broadcast(self.session, {
+                "tipo": "traslado_completado",
+                "hospital_id": hospital_id,
+                "reload": True,
+                "play_sound": True
+            })
+        encolar_notificacion(
+            self.session,
+            {
+                "tipo": "traslado_completado",
+                "paciente_id": paciente_id,
+                "cama_destino_id": cama_destino.id,
+                "reload": True,
+            },
+            notification_type="success"
+        )
+
+        self.session.commit()
+        
+        logger.info(f"Traslado completado: {paciente.nombre} -> {cama_destino.identificador}")
         
         return ResultadoTraslado(
             exito=True,
@@ -453,7 +472,6 @@ class TrasladoService:
                         paciente.timestamp_lista_espera = datetime.utcnow()
 
                     self.session.add(paciente)
-                    self.session.commit()
 
                     # CRÍTICO: Verificar si está en cola de prioridad en memoria
                     # Si no está, agregarlo (puede haberse removido al asignar cama)
@@ -462,15 +480,15 @@ class TrasladoService:
 
                     cola = gestor_colas_global.obtener_cola(paciente.hospital_id)
                     if not cola.contiene(paciente.id):
-                        # No está en cola, agregarlo
+                        # No está en cola, agregarlo (confirma todo en un commit)
                         asignacion_service = AsignacionService(self.session)
                         asignacion_service.agregar_a_cola(paciente)
-                        self.session.commit()
                         logger.info(
                             f"Traslado cancelado para {paciente.nombre} - "
                             f"cama origen a TRASLADO_SALIENTE, paciente agregado a lista de espera"
                         )
                     else:
+                        self.session.commit()
                         logger.info(
                             f"Traslado cancelado para {paciente.nombre} - "
                             f"cama origen a TRASLADO_SALIENTE, paciente permanece en lista de espera"
@@ -520,12 +538,11 @@ class TrasladoService:
             # Marcar que requiere nueva cama
             paciente.requiere_nueva_cama = True
             self.session.add(paciente)
-            self.session.commit()
 
             # Agregar nuevamente a lista de espera para buscar cama
+            # (confirma la cancelación y el reingreso en un solo commit)
             asignacion_service = AsignacionService(self.session)
             asignacion_service.agregar_a_cola(paciente)
-            self.session.commit()
 
             logger.info(
                 f"Traslado cancelado para {paciente.nombre} (paciente nuevo sin cama origen) - "
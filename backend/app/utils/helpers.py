@@ -18,31 +18,34 @@ def calcular_estadisticas_camas(camas: List[Any]) -> Dict[str, int]:
     Returns:
         Diccionario con conteos por estado
     """
-    stats = {
-        "total": len(camas),
-        "libres": 0,
-        "ocupadas": 0,
-        "traslado_entrante": 0,
-        "en_limpieza": 0,
-        "bloqueadas": 0,
-        "fallecido": 0,
-    }
-    
+    por_estado: Dict[str, int] = {}
     for cama in camas:
-        if cama.estado == EstadoCamaEnum.LIBRE:
-            stats["libres"] += 1
-        elif cama.estado == EstadoCamaEnum.BLOQUEADA:
-            stats["bloqueadas"] += 1
-        elif cama.estado == EstadoCamaEnum.EN_LIMPIEZA:
-            stats["en_limpieza"] += 1
-        elif cama.estado == EstadoCamaEnum.TRASLADO_ENTRANTE:
-            stats["traslado_entrante"] += 1
-        elif cama.estado == EstadoCamaEnum.FALLECIDO:
-            stats["fallecido"] += 1
-            stats["ocupadas"] += 1
-        elif cama.estado in ESTADOS_CAMA_OCUPADA:
-            stats["ocupadas"] += 1
+        estado = getattr(cama.estado, "value", cama.estado)
+        por_estado[estado] = por_estado.get(estado, 0) + 1
+    return estadisticas_desde_conteos(por_estado)
+
+
+def estadisticas_desde_conteos(por_estado: Dict[str, int]) -> Dict[str, int]:
+    """
+    Igual que calcular_estadisticas_camas, a partir de la cantidad de camas
+    por estado (p. ej. los contadores de ocupacion_service).
     
+    Args:
+        por_estado: {estado: cantidad}
+    
+    Returns:
+        Diccionario con conteos por estado
+    """
+    ocupadas = {e.value for e in ESTADOS_CAMA_OCUPADA}
+    stats = {
+        "total": sum(por_estado.values()),
+        "libres": por_estado.get(EstadoCamaEnum.LIBRE.value, 0),
+        "ocupadas": sum(n for estado, n in por_estado.items() if estado in ocupadas),
+        "traslado_entrante": por_estado.get(EstadoCamaEnum.TRASLADO_ENTRANTE.value, 0),
+        "en_limpieza": por_estado.get(EstadoCamaEnum.EN_LIMPIEZA.value, 0),
+        "bloqueadas": por_estado.get(EstadoCamaEnum.BLOQUEADA.value, 0),
+        "fallecido": por_estado.get(EstadoCamaEnum.FALLECIDO.value, 0),
+    }
     return stats
 
 
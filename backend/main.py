@@ -4,16 +4,22 @@ Sistema de Gestión de Camas Hospitalarias.
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import asyncio
-import os
 
 from app.config import settings
 from app.api.router import api_router
 from app.core.database import create_db_and_tables, get_session_direct
 from app.core.background_tasks import proceso_automatico
-from app.services.prioridad_service import sincronizar_colas_iniciales
+from app.core.arranque import estado_arranque
+from app.services.snapshot_colas import snapshot_colas
+from app.services.evento_writer import cola_eventos
+from app.core.outbox import despachador_outbox
+from app.core.pool_contrasenas import pool_contrasenas
+from app.services.reporte_estadisticas import generador_reporte
+from app.services.ocupacion_service import reconciliador_ocupacion
+from app.services.particiones_eventos import mantenedor_particiones
+from app.services.documentos_service import barredor_documentos
 from app.utils.logger import logger
 
 
@@ -32,13 +38,26 @@ async def lifespan(app: FastAPI):
     #     from app.utils.init_data import inicializar_datos
     #     inicializar_datos(session)
     #     logger.info("Datos iniciales cargados")
-    #
-    #     # Sincronizar colas de prioridad
-    #     sincronizar_colas_iniciales(session)
-    #     logger.info("Colas de prioridad sincronizadas")
     # finally:
     #     session.close()
 
+    # Engine, Redis y colas de prioridad (snapshot + delta) se preparan en
+    # segundo plano; /api/health/startup indica cuándo terminó.
+    await estado_arranque.iniciar()
+    if settings.COLAS_SNAPSHOT_HABILITADO:
+        await snapshot_colas.iniciar()
+
+    if settings.EVENTOS_MODO_ASINCRONO:
+        await cola_eventos.iniciar()
+    if settings.OUTBOX_DESPACHADOR_HABILITADO:
+        await despachador_outbox.iniciar()
+    if settings.OCUPACION_RECONCILIACION_HABILITADA:
+        await reconciliador_ocupacion.iniciar()
+    if settings.EVENTOS_MANTENIMIENTO_HABILITADO:
+        await mantenedor_particiones.iniciar()
+    if settings.DOCUMENTOS_BARRIDO_HABILITADO:
+        await barredor_documentos.iniciar()
+
     logger.info("Aplicación iniciada correctamente")
 
     # # Iniciar proceso automático en background
@@ -54,6 +73,15 @@ async def lifespan(app: FastAPI):
     #     await task
     # except asyncio.CancelledError:
     #     pass
+    await estado_arranque.detener()
+    await barredor_documentos.detener()
+    await snapshot_colas.detener()
+    await mantenedor_particiones.detener()
+    await reconciliador_ocupacion.detener()
+    await despachador_outbox.detener()
+    await cola_eventos.detener()
+    generador_reporte.cerrar()
+    pool_contrasenas.cerrar()
     logger.info("Aplicación detenida")
 
 
@@ -76,14 +104,6 @@ def create_app() -> FastAPI:
         allow_headers=settings.CORS_ALLOW_HEADERS,
     )
     
-    # Montar directorio de uploads
-    if os.path.exists(settings.UPLOAD_DIR):
-        app.mount(
-            "/uploads", 
-            StaticFiles(directory=settings.UPLOAD_DIR), 
-            name="uploads"
-        )
-    
     # Incluir routers
     app.include_router(api_router, prefix="/api")
     
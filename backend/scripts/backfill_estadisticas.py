@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Reconstrucción de agregados diarios de estadísticas (rollups)
+Sistema de Gestión de Camas Hospitalarias
+
+Recalcula la tabla estadistica_diaria desde evento_paciente y registra
+desde qué día clínico los rollups están completos. Ejecutar después de
+aplicar la migración 006 y tras cargas masivas de eventos.
+
+Uso:
+    python scripts/backfill_estadisticas.py
+    python scripts/backfill_estadisticas.py --desde 2025-01-01
+"""
+
+import sys
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+# Agregar el directorio raíz al PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import logging
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s | %(levelname)-8s | %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+from app.core.database import get_session_direct
+from app.services.rollup_service import reconstruir_rollups
+
+
+def main():
+    """Función principal del script de reconstrucción."""
+    parser = argparse.ArgumentParser(description="Reconstruye los rollups diarios de estadísticas")
+    parser.add_argument(
+        "--desde",
+        type=lambda valor: datetime.strptime(valor, "%Y-%m-%d"),
+        default=None,
+        help="Primer día clínico a reconstruir (YYYY-MM-DD). Por defecto, el evento más antiguo.",
+    )
+    parser.add_argument(
+        "--dias-por-lote",
+        type=int,
+        default=31,
+        help="Días cerrados reconstruidos por transacción",
+    )
+    args = parser.parse_args()
+
+    logger.info("=" * 60)
+    logger.info("📊 RECONSTRUCCIÓN DE ROLLUPS DE ESTADÍSTICAS")
+    logger.info("=" * 60)
+
+    session = get_session_direct()
+    try:
+        resumen = reconstruir_rollups(session, desde=args.desde, dias_por_lote=args.dias_por_lote)
+    finally:
+        session.close()
+
+    logger.info(f"✅ {resumen['dias']} días reconstruidos desde {resumen['desde']} "
+                f"({resumen['filas']} filas)")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        logger.warning("\n⚠️  Reconstrucción interrumpida por el usuario")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"\n❌ Error inesperado: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Benchmark de login (bcrypt) vs latencia del resto de la API
+Sistema de Gestión de Camas Hospitalarias
+
+Simula un cambio de turno: lanza N logins concurrentes contra la app en
+proceso (sin servidor HTTP) mientras una sonda consulta /health cada 20 ms,
+y compara dos modos:
+    - en_loop: bcrypt se verifica dentro del event loop (comportamiento anterior)
+    - pool:    bcrypt se verifica en el pool de contraseñas, con admisión (429)
+
+Usa una base SQLite temporal con usuarios sintéticos.
+
+Uso:
+    python scripts/benchmark_login.py
+    python scripts/benchmark_login.py --logins 200 --concurrencia 50
+    python scripts/benchmark_login.py --hilos 4 --pendientes-max 64 --modo pool
+"""
+
+import sys
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+# Agregar el directorio raíz al PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import logging
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s | %(levelname)-8s | %(message)s'
+)
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+import httpx
+from sqlalchemy import create_engine, insert
+from sqlmodel import Session, SQLModel
+
+import app.models  # noqa: F401  (registra todas las tablas)
+from app.config import settings
+from app.core.database import get_session
+from app.core.pool_contrasenas import pool_contrasenas
+from app.models.usuario import RolEnum, Usuario
+from app.services.auth_service import auth_service
+
+settings.REDIS_ENABLED = False
+
+from main import app
+
+
+CONTRASENA = "Turno2026!"
+
+
+def sembrar(engine, usuarios: int) -> None:
+    """Crea `usuarios` usuarios con la misma contraseña (un solo hash)."""
+    hashed = auth_service.hash_password(CONTRASENA)
+    with Session(engine) as session:
+        session.execute(insert(Usuario), [
+            {
+                "id": f"bench-{i}",
+                "username": f"usuario{i}",
+                "email": f"usuario{i}@bench.cl",
+                "hashed_password": hashed,
+                "nombre_completo": f"Usuario {i}",
+                "rol": RolEnum.ENFERMERA,
+                "is_active": True,
+                "is_verified": True,
+            }
+            for i in range(usuarios)
+        ])
+        session.commit()
+
+
+def percentil(valores, p: float) -> float:
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+async def escenario(logins: int, concurrencia: int, usuarios: int) -> dict:
+    """Logins concurrentes + sonda de latencia; retorna las métricas."""
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        latencias = []
+        activo = True
+
+        async def sonda():
+            while activo:
+                inicio = time.perf_counter()
+                await cliente.get("/health")
+                latencias.append(time.perf_counter() - inicio)
+                await asyncio.sleep(0.02)
+
+        semaforo = asyncio.Semaphore(concurrencia)
+        codigos = {}
+
+        async def login(i: int):
+            async with semaforo:
+                response = await cliente.post("/api/auth/login", json={
+                    "username": f"usuario{i % usuarios}", "password": CONTRASENA,
+                })
+                codigos[response.status_code] = codigos.get(response.status_code, 0) + 1
+
+        tarea_sonda = asyncio.create_task(sonda())
+        await asyncio.sleep(0.2)
+        base = list(latencias)
+        inicio = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(logins)))
+        duracion = time.perf_counter() - inicio
+        activo = False
+        await tarea_sonda
+
+    carga = latencias[len(base):]
+    return {
+        "duracion": duracion,
+        "codigos": codigos,
+        "logins_s": codigos.get(200, 0) / duracion,
+        "sonda_base_ms": percentil(base, 50) * 1000,
+        "sonda_p50_ms": percentil(carga, 50) * 1000,
+        "sonda_p95_ms": percentil(carga, 95) * 1000,
+        "sonda_max_ms": max(carga, default=0) * 1000,
+        "muestras": len(carga),
+    }
+
+
+def main():
+    """Función principal del benchmark."""
+    parser = argparse.ArgumentParser(description="Mide throughput de login vs latencia de la API")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--usuarios", type=int, default=200)
+    parser.add_argument("--hilos", type=int, default=None, help="Hilos del pool (por defecto AUTH_HASH_HILOS)")
+    parser.add_argument("--pendientes-max", type=int, default=None, help="Admisión (por defecto AUTH_HASH_PENDIENTES_MAX)")
+    parser.add_argument("--modo", choices=["ambos", "en_loop", "pool"], default="ambos")
+    args = parser.parse_args()
+
+    if args.hilos:
+        settings.AUTH_HASH_HILOS = args.hilos
+    if args.pendientes_max is not None:
+        settings.AUTH_HASH_PENDIENTES_MAX = args.pendientes_max
+
+    logger.info("=" * 60)
+    logger.info("⏱️  BENCHMARK DE LOGIN")
+    logger.info("=" * 60)
+
+    engine = create_engine(
+        f"sqlite:///{tempfile.mkdtemp(prefix='benchmark_login_')}/bench.db",
+        connect_args={"check_same_thread": False},
+    )
+    SQLModel.metadata.create_all(engine)
+    sembrar(engine, args.usuarios)
+
+    def sesion():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = sesion
+
+    verificar_en_pool = auth_service.verify_password_async
+
+    async def verificar_en_loop(plain_password, hashed_password, admision=False):
+        return auth_service.verify_password(plain_password, hashed_password)
+
+    modos = ["en_loop", "pool"] if args.modo == "ambos" else [args.modo]
+    for modo in modos:
+        auth_service.verify_password_async = verificar_en_loop if modo == "en_loop" else verificar_en_pool
+        resultado = asyncio.run(escenario(args.logins, args.concurrencia, args.usuarios))
+        pool_contrasenas.cerrar()
+        logger.info(f"▶ {modo}: {args.logins} logins, concurrencia {args.concurrencia}")
+        logger.info(f"  duración {resultado['duracion']:.2f} s | {resultado['logins_s']:.1f} logins/s | "
+                    f"respuestas {resultado['codigos']}")
+        logger.info(f"  /health base {resultado['sonda_base_ms']:.1f} ms | p50 {resultado['sonda_p50_ms']:.1f} ms | "
+                    f"p95 {resultado['sonda_p95_ms']:.1f} ms | máx {resultado['sonda_max_ms']:.1f} ms "
+                    f"({resultado['muestras']} muestras)")
+    auth_service.verify_password_async = verificar_en_pool
+    logger.info(f"📊 Pool: {pool_contrasenas.estadisticas()}")
+
+    app.dependency_overrides.clear()
+    engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        logger.warning("\n⚠️  Benchmark interrumpido por el usuario")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"\n❌ Error inesperado: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
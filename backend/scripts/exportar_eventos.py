@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Exportación masiva de eventos y estancias por servicio
+Sistema de Gestión de Camas Hospitalarias
+
+Escribe los eventos de pacientes (o las estancias por servicio derivadas
+de ellos) de un rango de fechas en CSV, NDJSON o Parquet, leyendo por lotes
+con memoria constante.
+
+Uso:
+    python scripts/exportar_eventos.py --desde 2025-01-01 --hasta 2026-01-01 -o eventos.csv
+    python scripts/exportar_eventos.py estancias --formato parquet --desde 2025-01-01 -o estancias.parquet
+    python scripts/exportar_eventos.py --formato ndjson --desde 2025-06-01 > eventos.ndjson
+"""
+
+import sys
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+# Agregar el directorio raíz al PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import logging
+
+# Configurar logging (a stderr: stdout puede ser la exportación)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s | %(levelname)-8s | %(message)s',
+    stream=sys.stderr,
+)
+logger = logging.getLogger(__name__)
+
+from app.core.exceptions import ValidationError
+from app.services.exportacion_service import EXPORTACIONES, FORMATOS, exportar
+
+
+def _fecha(valor: str) -> datetime:
+    return datetime.strptime(valor, "%Y-%m-%d")
+
+
+def main():
+    """Función principal del script de exportación."""
+    parser = argparse.ArgumentParser(description="Exporta eventos de pacientes o estancias por servicio")
+    parser.add_argument("tipo", nargs="?", default="eventos", choices=list(EXPORTACIONES))
+    parser.add_argument("--formato", default="csv", choices=list(FORMATOS))
+    parser.add_argument("--desde", type=_fecha, default=None, help="Inicio del rango (YYYY-MM-DD)")
+    parser.add_argument("--hasta", type=_fecha, default=None, help="Fin del rango, exclusivo (YYYY-MM-DD)")
+    parser.add_argument("--hospital", default=None, help="ID del hospital (por defecto, toda la red)")
+    parser.add_argument("--tamano-lote", type=int, default=None, help="Filas por lote del cursor")
+    parser.add_argument("-o", "--salida", type=Path, default=None, help="Archivo de salida (por defecto, stdout)")
+    args = parser.parse_args()
+
+    try:
+        bloques = exportar(
+            args.tipo, args.formato, args.desde, args.hasta, args.hospital,
+            tamano_lote=args.tamano_lote,
+        )
+    except ValidationError as e:
+        logger.error(f"❌ {e.message}")
+        return 1
+
+    destino = args.salida.open("wb") if args.salida else sys.stdout.buffer
+    total = 0
+    try:
+        for bloque in bloques:
+            destino.write(bloque)
+            total += len(bloque)
+    finally:
+        if args.salida:
+            destino.close()
+
+    logger.info(f"✅ Exportación {args.tipo} ({args.formato}): {total / 1024:.1f} KiB")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        logger.warning("\n⚠️  Exportación interrumpida por el usuario")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"\n❌ Error inesperado: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Mantenimiento de particiones mensuales de evento_paciente
+Sistema de Gestión de Camas Hospitalarias
+
+Crea las particiones de los próximos meses, archiva los meses anteriores
+al horizonte de retención y ejecuta VACUUM (ANALYZE) sobre las particiones
+recientes. Es lo mismo que hace periódicamente la aplicación
+(EVENTOS_MANTENIMIENTO_HABILITADO); útil desde cron o tras la migración 010.
+
+Uso:
+    python scripts/mantener_particiones.py
+    python scripts/mantener_particiones.py --retencion 24 --destino parquet --directorio /srv/archivo_eventos
+    python scripts/mantener_particiones.py --listar
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Agregar el directorio raíz al PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import logging
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s | %(levelname)-8s | %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+from app.config import settings
+from app.core.database import engine
+from app.core.exceptions import ValidationError
+from app.services import particiones_eventos
+
+
+def main():
+    """Función principal del script de mantenimiento."""
+    parser = argparse.ArgumentParser(description="Mantiene las particiones mensuales de evento_paciente")
+    parser.add_argument("--futuras", type=int, default=None, help="Meses a crear por adelantado")
+    parser.add_argument("--retencion", type=int, default=None, help="Meses a conservar en la tabla principal (0 = no archivar)")
+    parser.add_argument("--destino", choices=particiones_eventos.DESTINOS_ARCHIVO, default=None)
+    parser.add_argument("--directorio", default=None, help="Directorio de los archivos Parquet")
+    parser.add_argument("--listar", action="store_true", help="Solo lista las particiones")
+    args = parser.parse_args()
+
+    for opcion, ajuste in (
+        ("futuras", "EVENTOS_PARTICIONES_FUTURAS"),
+        ("retencion", "EVENTOS_RETENCION_MESES"),
+        ("destino", "EVENTOS_ARCHIVO_DESTINO"),
+        ("directorio", "EVENTOS_ARCHIVO_DIRECTORIO"),
+    ):
+        if getattr(args, opcion) is not None:
+            setattr(settings, ajuste, getattr(args, opcion))
+
+    with engine.connect() as conexion:
+        if not particiones_eventos.es_particionada(conexion):
+            logger.warning("⚠️  evento_paciente no está particionada (requiere PostgreSQL y la migración 010)")
+            return 1
+        if args.listar:
+            for tabla in (particiones_eventos.TABLA, particiones_eventos.TABLA_ARCHIVO):
+                for nombre, desde, hasta in particiones_eventos.particiones(conexion, tabla):
+                    rango = f"{desde:%Y-%m-%d} → {hasta:%Y-%m-%d}" if desde else "DEFAULT"
+                    logger.info(f"  {tabla:<24} {nombre:<32} {rango}")
+            return 0
+
+    try:
+        resultado = particiones_eventos.mantener(engine)
+    except ValidationError as e:
+        logger.error(f"❌ {e.message}")
+        return 1
+
+    logger.info(f"✅ Particiones creadas: {', '.join(resultado['creadas']) or 'ninguna'}")
+    logger.info(f"✅ Particiones archivadas: {', '.join(resultado['archivadas']) or 'ninguna'}")
+    logger.info(f"✅ VACUUM (ANALYZE): {', '.join(resultado['vacuum'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        logger.warning("\n⚠️  Mantenimiento interrumpido por el usuario")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"\n❌ Error inesperado: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -4,28 +4,35 @@ Script de Migración de SQLite a PostgreSQL
 Sistema de Gestión de Camas Hospitalarias
 
 Este script migra todos los datos de la base de datos SQLite existente
-a la nueva base de datos PostgreSQL.
+a la nueva base de datos PostgreSQL usando app/services/migracion_service.py:
+lectura por lotes, carga con COPY, tablas independientes en paralelo,
+checkpoints para reanudar y verificación con checksums por tabla.
 
 Uso:
     python scripts/migrate_sqlite_to_postgres.py
+    python scripts/migrate_sqlite_to_postgres.py --hilos 8 --lote 10000 --si
+    python scripts/migrate_sqlite_to_postgres.py --solo-verificar
+
+Si la migración se interrumpe, volver a ejecutarla continúa desde el
+último lote confirmado (usar --reiniciar para empezar de cero).
 
 Requisitos:
     - Base de datos SQLite existente en gestion_camas.db
-    - PostgreSQL configurado y corriendo
+    - PostgreSQL configurado y corriendo, con el esquema creado
     - Variables de entorno configuradas (.env)
 """
 
+import argparse
 import sys
-import os
 from pathlib import Path
 
 # Agregar el directorio raíz al PYTHONPATH
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from sqlmodel import create_engine, Session, select
+from sqlmodel import create_engine, Session
 from sqlalchemy import inspect, text
 import logging
-from typing import List, Dict, Any
+from typing import Dict
 from datetime import datetime
 
 # Configurar logging
@@ -38,14 +45,12 @@ logger = logging.getLogger(__name__)
 # Importar configuración
 from app.config import settings
 
-# Importar todos los modelos
-from app.models.usuario import Usuario, RefreshToken
-from app.models.hospital import Hospital
-from app.models.servicio import Servicio
-from app.models.sala import Sala
-from app.models.cama import Cama
-from app.models.paciente import Paciente
-from app.models.configuracion import ConfiguracionSistema, LogActividad
+from app.services.migracion_service import (
+    MIGRATION_ORDER,
+    TAMANO_LOTE_DEFECTO,
+    MigradorDatos,
+    ResultadoTabla,
+)
 
 
 # ============================================
@@ -58,27 +63,14 @@ SQLITE_URL = "sqlite:///./gestion_camas.db"
 # URL de PostgreSQL (desde configuración)
 POSTGRES_URL = settings.DATABASE_URL
 
-# Orden de migración (respetando foreign keys)
-MIGRATION_ORDER = [
-    ("hospital", Hospital),
-    ("servicio", Servicio),
-    ("sala", Sala),
-    ("cama", Cama),
-    ("paciente", Paciente),
-    ("usuario", Usuario),
-    ("refreshtoken", RefreshToken),
-    ("configuracionsistema", ConfiguracionSistema),
-    ("logactividad", LogActividad),
-]
-
 
 # ============================================
 # FUNCIONES DE MIGRACIÓN
 # ============================================
 
-def verificar_sqlite_existe() -> bool:
+def verificar_sqlite_existe(sqlite_url: str) -> bool:
     """Verifica que la base de datos SQLite existe."""
-    sqlite_path = Path("gestion_camas.db")
+    sqlite_path = Path(sqlite_url.replace("sqlite:///", "", 1))
     if not sqlite_path.exists():
         logger.error(f"❌ No se encontró la base de datos SQLite en: {sqlite_path.absolute()}")
         return False
@@ -86,7 +78,7 @@ def verificar_sqlite_existe() -> bool:
     return True
 
 
-def conectar_bases_datos():
+def conectar_bases_datos(sqlite_url: str, postgres_url: str, hilos: int):
     """
     Crea conexiones a ambas bases de datos.
 
@@ -97,114 +89,23 @@ def conectar_bases_datos():
 
     # SQLite (origen)
     sqlite_engine = create_engine(
-        SQLITE_URL,
+        sqlite_url,
         echo=False,
         connect_args={"check_same_thread": False}
     )
 
-    # PostgreSQL (destino)
+    # PostgreSQL (destino): una conexión por hilo más la de checkpoints
     postgres_engine = create_engine(
-        POSTGRES_URL,
+        postgres_url,
         echo=False,
-        pool_pre_ping=True
+        pool_pre_ping=True,
+        pool_size=hilos + 1,
     )
 
     logger.info("✅ Conexiones establecidas")
     return sqlite_engine, postgres_engine
 
 
-def obtener_estadisticas_sqlite(sqlite_engine) -> Dict[str, int]:
-    """
-    Obtiene estadísticas de la base de datos SQLite.
-
-    Args:
-        sqlite_engine: Engine de SQLite
-
-    Returns:
-        Dict con conteos por tabla
-    """
-    logger.info("📊 Obteniendo estadísticas de SQLite...")
-    stats = {}
-
-    with Session(sqlite_engine) as session:
-        for table_name, model in MIGRATION_ORDER:
-            try:
-                count = session.exec(select(model)).all()
-                stats[table_name] = len(count)
-                logger.info(f"   {table_name}: {len(count)} registros")
-            except Exception as e:
-                logger.warning(f"   ⚠️  {table_name}: Error al contar - {e}")
-                stats[table_name] = 0
-
-    return stats
-
-
-def migrar_tabla(
-    table_name: str,
-    model: Any,
-    sqlite_session: Session,
-    postgres_session: Session
-) -> int:
-    """
-    Migra una tabla específica de SQLite a PostgreSQL.
-
-    Args:
-        table_name: Nombre de la tabla
-        model: Modelo SQLModel
-        sqlite_session: Sesión de SQLite
-        postgres_session: Sesión de PostgreSQL
-
-    Returns:
-        Número de registros migrados
-    """
-    logger.info(f"🔄 Migrando tabla: {table_name}...")
-
-    try:
-        # Obtener todos los registros de SQLite
-        registros = sqlite_session.exec(select(model)).all()
-
-        if not registros:
-            logger.info(f"   ℹ️  Tabla vacía, saltando")
-            return 0
-
-        # Insertar en PostgreSQL
-        migrados = 0
-        errores = 0
-
-        for registro in registros:
-            try:
-                # Crear una copia del registro
-                registro_dict = registro.dict()
-
-                # Crear nuevo registro
-                nuevo_registro = model(**registro_dict)
-
-                # Agregar a PostgreSQL
-                postgres_session.add(nuevo_registro)
-                migrados += 1
-
-                # Commit cada 100 registros para evitar transacciones muy grandes
-                if migrados % 100 == 0:
-                    postgres_session.commit()
-                    logger.info(f"   ⏳ {migrados}/{len(registros)} migrados...")
-
-            except Exception as e:
-                errores += 1
-                logger.warning(f"   ⚠️  Error al migrar registro: {e}")
-                postgres_session.rollback()
-
-        # Commit final
-        postgres_session.commit()
-
-        logger.info(f"   ✅ {migrados} registros migrados ({errores} errores)")
-        return migrados
-
-    except Exception as e:
-        logger.error(f"   ❌ Error al migrar tabla {table_name}: {e}")
-        postgres_session.rollback()
-        return 0
-
-
 def actualizar_secuencias_postgres(postgres_engine):
     """
     Actualiza las secuencias de PostgreSQL para que continúen desde el último ID.
@@ -241,13 +142,9 @@ def actualizar_secuencias_postgres(postgres_engine):
     logger.info("✅ Secuencias actualizadas")
 
 
-def verificar_integridad(sqlite_engine, postgres_engine) -> bool:
+def verificar_integridad(migrador: MigradorDatos) -> bool:
     """
-    Verifica que los datos se migraron correctamente.
-
-    Args:
-        sqlite_engine: Engine de SQLite
-        postgres_engine: Engine de PostgreSQL
+    Compara filas y checksum de contenido de cada tabla entre origen y destino.
 
     Returns:
         True si la verificación pasa, False en caso contrario
@@ -255,35 +152,43 @@ def verificar_integridad(sqlite_engine, postgres_engine) -> bool:
     logger.info("🔍 Verificando integridad de datos migrados...")
 
     todo_ok = True
+    for table_name, verificacion in migrador.verificar().items():
+        if verificacion.ok:
+            logger.info(
+                f"   ✅ {table_name}: {verificacion.filas_origen} registros "
+                f"(checksum {verificacion.checksum_origen[:12]})"
+            )
+        else:
+            logger.error(
+                f"   ❌ {table_name}: SQLite={verificacion.filas_origen} "
+                f"({verificacion.checksum_origen[:12]}), "
+                f"PostgreSQL={verificacion.filas_destino} ({verificacion.checksum_destino[:12]})"
+            )
+            todo_ok = False
 
-    with Session(sqlite_engine) as sqlite_session, Session(postgres_engine) as postgres_session:
-        for table_name, model in MIGRATION_ORDER:
-            try:
-                count_sqlite = len(sqlite_session.exec(select(model)).all())
-                count_postgres = len(postgres_session.exec(select(model)).all())
-
-                if count_sqlite == count_postgres:
-                    logger.info(f"   ✅ {table_name}: {count_sqlite} registros")
-                else:
-                    logger.error(
-                        f"   ❌ {table_name}: SQLite={count_sqlite}, "
-                        f"PostgreSQL={count_postgres}"
-                    )
-                    todo_ok = False
+    return todo_ok
 
-            except Exception as e:
-                logger.error(f"   ❌ Error al verificar {table_name}: {e}")
-                todo_ok = False
 
-    return todo_ok
+def parsear_argumentos(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Migra gestion_camas.db (SQLite) a PostgreSQL")
+    parser.add_argument("--origen", default=SQLITE_URL, help="URL de la base SQLite de origen")
+    parser.add_argument("--destino", default=POSTGRES_URL, help="URL de la base PostgreSQL de destino")
+    parser.add_argument("--hilos", type=int, default=4, help="Tablas migradas en paralelo")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE_DEFECTO, help="Filas por lote")
+    parser.add_argument("--tablas", nargs="+", choices=MIGRATION_ORDER, help="Migrar solo estas tablas")
+    parser.add_argument("--reiniciar", action="store_true", help="Ignorar checkpoints previos")
+    parser.add_argument("--solo-verificar", action="store_true", help="Solo comparar origen y destino")
+    parser.add_argument("--si", action="store_true", help="No pedir confirmación")
+    return parser.parse_args(argv)
 
 
 # ============================================
 # FUNCIÓN PRINCIPAL
 # ============================================
 
-def main():
+def main(argv=None):
     """Función principal del script de migración."""
+    args = parsear_argumentos(argv)
 
     logger.info("=" * 60)
     logger.info("🏥 MIGRACIÓN DE SQLITE A POSTGRESQL")
@@ -292,19 +197,29 @@ def main():
     logger.info("")
 
     # Paso 1: Verificar que SQLite existe
-    if not verificar_sqlite_existe():
+    if not verificar_sqlite_existe(args.origen):
         logger.error("❌ Abortando migración")
         return 1
 
     # Paso 2: Conectar a bases de datos
     try:
-        sqlite_engine, postgres_engine = conectar_bases_datos()
+        sqlite_engine, postgres_engine = conectar_bases_datos(args.origen, args.destino, args.hilos)
     except Exception as e:
         logger.error(f"❌ Error al conectar a bases de datos: {e}")
         return 1
 
+    migrador = MigradorDatos(
+        sqlite_engine, postgres_engine, tablas=args.tablas, tamano_lote=args.lote, hilos=args.hilos,
+    )
+
+    if args.solo_verificar:
+        return 0 if verificar_integridad(migrador) else 1
+
     # Paso 3: Obtener estadísticas
-    stats_sqlite = obtener_estadisticas_sqlite(sqlite_engine)
+    logger.info("📊 Obteniendo estadísticas de SQLite...")
+    stats_sqlite: Dict[str, int] = migrador.contar_origen()
+    for table_name, count in stats_sqlite.items():
+        logger.info(f"   {table_name}: {count} registros")
     total_registros = sum(stats_sqlite.values())
 
     if total_registros == 0:
@@ -314,37 +229,48 @@ def main():
     logger.info(f"📊 Total de registros a migrar: {total_registros}")
     logger.info("")
 
+    if args.reiniciar:
+        migrador.reiniciar_checkpoints()
+    pendientes = {t: c for t, c in migrador.checkpoints().items() if t in migrador.tablas}
+    if pendientes:
+        logger.info("↪️  Checkpoints previos encontrados, se reanudará:")
+        for table_name, checkpoint in pendientes.items():
+            estado = "completa" if checkpoint["completada"] else f"{checkpoint['filas']} filas"
+            logger.info(f"   {table_name}: {estado}")
+        logger.info("")
+
     # Paso 4: Confirmar migración
-    print("⚠️  IMPORTANTE: Esta operación insertará datos en PostgreSQL")
-    print("   Asegúrate de que la base de datos PostgreSQL esté vacía o")
-    print("   que no haya conflictos de IDs.")
-    print("")
-    respuesta = input("¿Deseas continuar con la migración? (si/no): ")
-
-    if respuesta.lower() not in ['si', 's', 'yes', 'y']:
-        logger.info("❌ Migración cancelada por el usuario")
-        return 0
+    if not args.si:
+        print("⚠️  IMPORTANTE: Esta operación insertará datos en PostgreSQL")
+        print("   Asegúrate de que la base de datos PostgreSQL esté vacía o")
+        print("   que no haya conflictos de IDs.")
+        print("")
+        respuesta = input("¿Deseas continuar con la migración? (si/no): ")
+
+        if respuesta.lower() not in ['si', 's', 'yes', 'y']:
+            logger.info("❌ Migración cancelada por el usuario")
+            return 0
 
     logger.info("")
-    logger.info("🚀 Iniciando migración...")
+    logger.info(f"🚀 Iniciando migración ({args.hilos} hilos, lotes de {args.lote})...")
     logger.info("")
 
     # Paso 5: Migrar tablas
     inicio = datetime.now()
-    total_migrados = 0
-
-    with Session(sqlite_engine) as sqlite_session, Session(postgres_engine) as postgres_session:
-        for table_name, model in MIGRATION_ORDER:
-            migrados = migrar_tabla(table_name, model, sqlite_session, postgres_session)
-            total_migrados += migrados
-            logger.info("")
+    resultados: Dict[str, ResultadoTabla] = migrador.migrar()
+    total_migrados = sum(r.filas for r in resultados.values() if not r.error)
+    errores = [r for r in resultados.values() if r.error]
+    for resultado in errores:
+        logger.error(f"   ❌ {resultado.tabla}: {resultado.error}")
+    logger.info("")
 
     # Paso 6: Actualizar secuencias
-    actualizar_secuencias_postgres(postgres_engine)
-    logger.info("")
+    if postgres_engine.dialect.name == "postgresql":
+        actualizar_secuencias_postgres(postgres_engine)
+        logger.info("")
 
     # Paso 7: Verificar integridad
-    integridad_ok = verificar_integridad(sqlite_engine, postgres_engine)
+    integridad_ok = not errores and verificar_integridad(migrador)
     logger.info("")
 
     # Paso 8: Resultados finales
@@ -371,7 +297,7 @@ def main():
     else:
         logger.error("")
         logger.error("❌ La migración completó con errores")
-        logger.error("   Revisa los logs anteriores para más detalles")
+        logger.error("   Volver a ejecutar el script reanuda desde el último lote confirmado")
         return 1
 
 
@@ -380,7 +306,7 @@ if __name__ == "__main__":
         exit_code = main()
         sys.exit(exit_code)
     except KeyboardInterrupt:
-        logger.warning("\n⚠️  Migración interrumpida por el usuario")
+        logger.warning("\n⚠️  Migración interrumpida por el usuario (se puede reanudar)")
         sys.exit(1)
     except Exception as e:
         logger.error(f"\n❌ Error inesperado: {e}")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Reconstrucción de estancias por servicio (estancia_servicio)
+Sistema de Gestión de Camas Hospitalarias
+
+Recalcula la tabla estancia_servicio desde evento_paciente. El escritor de
+eventos la mantiene al día; ejecutar después de cargas con
+escribir_eventos_masivo o si se corrigen eventos a mano.
+
+Uso:
+    python scripts/reconstruir_estancias.py
+    python scripts/reconstruir_estancias.py --paciente <id> --paciente <id>
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Agregar el directorio raíz al PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import logging
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s | %(levelname)-8s | %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+from app.core.database import get_session_direct
+from app.services.estancias_service import reconstruir_estancias
+
+
+def main():
+    """Función principal del script de reconstrucción."""
+    parser = argparse.ArgumentParser(description="Reconstruye las estancias por servicio")
+    parser.add_argument(
+        "--paciente",
+        action="append",
+        default=None,
+        help="ID de paciente a reconstruir (repetible). Por defecto, todos.",
+    )
+    args = parser.parse_args()
+
+    logger.info("=" * 60)
+    logger.info("🛏️  RECONSTRUCCIÓN DE ESTANCIAS POR SERVICIO")
+    logger.info("=" * 60)
+
+    session = get_session_direct()
+    try:
+        escritas = reconstruir_estancias(session, args.paciente)
+        session.commit()
+    finally:
+        session.close()
+
+    logger.info(f"✅ {escritas} estancias reconstruidas")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        logger.warning("\n⚠️  Reconstrucción interrumpida por el usuario")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"\n❌ Error inesperado: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
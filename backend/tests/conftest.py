@@ -6,9 +6,25 @@ from fastapi.testclient import TestClient
 from sqlmodel import SQLModel, Session, create_engine
 from sqlmodel.pool import StaticPool
 
+from app.config import settings
 from app.core.database import get_session
+from app.core.principal import cache_principales
+from app.core.topologia import gestor_topologia
 from main import app
 
+# Las notificaciones quedan en el outbox de la BD de test; el despachador
+# se prueba aparte con su propia sesión.
+settings.OUTBOX_DESPACHADOR_HABILITADO = False
+# Los contadores de ocupación se reconcilian explícitamente en los tests.
+settings.OCUPACION_RECONCILIACION_HABILITADA = False
+# El mantenimiento de particiones de eventos se prueba contra PostgreSQL.
+settings.EVENTOS_MANTENIMIENTO_HABILITADO = False
+# El barrido de documentos reemplazados se ejecuta explícitamente en los tests.
+settings.DOCUMENTOS_BARRIDO_HABILITADO = False
+# Sin calentamiento ni snapshots de colas en segundo plano (se prueban aparte).
+settings.ARRANQUE_CALENTAMIENTO_HABILITADO = False
+settings.COLAS_SNAPSHOT_HABILITADO = False
+
 
 # Engine para tests (SQLite en memoria)
 @pytest.fixture(name="engine")
@@ -20,6 +36,8 @@ def engine_fixture():
         poolclass=StaticPool,
     )
     SQLModel.metadata.create_all(engine)
+    gestor_topologia.limpiar()
+    cache_principales.limpiar()
     yield engine
     SQLModel.metadata.drop_all(engine)
 
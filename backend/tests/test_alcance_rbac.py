@@ -0,0 +1,164 @@
+"""
+Tests del alcance RBAC compilado a SQL: los predicados de pacientes y camas
+deben dar exactamente lo mismo que los filtros fila a fila en Python, y los
+listados deben devolver solo lo visible.
+"""
+import itertools
+
+import pytest
+from sqlmodel import select
+
+from app.core.alcance_rbac import predicado_camas, predicado_pacientes
+from app.core.principal import Principal
+from app.core.rbac_service import CODIGO_SERVICIO_MAP, rbac_service
+from app.models.cama import Cama
+from app.models.enums import TipoPacienteEnum, TipoServicioEnum
+from app.models.paciente import Paciente
+from app.models.sala import Sala
+from app.models.servicio import Servicio
+from app.models.usuario import RolEnum, Usuario
+
+
+SERVICIOS = [
+    ("Medicina", "Med", TipoServicioEnum.MEDICINA),
+    ("Cirugía", "Cirug", TipoServicioEnum.CIRUGIA),
+    ("Obstetricia", "Obst", TipoServicioEnum.OBSTETRICIA),
+    ("Servicio Raro", "RARO", TipoServicioEnum.MEDICINA),
+]
+
+DESTINOS = [None, "Medicina", "medicina", "Med", "Cirugía", "cirugia", "Obstetricia", "UCI", "uci", "otro"]
+
+ROLES = [
+    RolEnum.PROGRAMADOR, RolEnum.GESTOR_CAMAS, RolEnum.MEDICO, RolEnum.URGENCIAS,
+    RolEnum.AMBULATORIO, RolEnum.VISUALIZADOR,
+]
+SERVICIOS_USUARIO = [None, "medicina", "Med", "Medicina", "cirugia", "obstetricia", "urgencias", "ambulatorio", "servicio raro"]
+
+
+def _origen_python(session, paciente):
+    """Servicio de origen como lo calculaba la lista de espera."""
+    if paciente.cama_id:
+        cama = session.get(Cama, paciente.cama_id)
+        if cama and cama.sala and cama.sala.servicio:
+            return cama.sala.servicio.nombre
+        return None
+    if paciente.tipo_paciente == TipoPacienteEnum.URGENCIA:
+        return "Urgencias"
+    if paciente.tipo_paciente == TipoPacienteEnum.AMBULATORIO:
+        return "Ambulatorio"
+    return None
+
+
+def _usuario(rol, servicio_id=None, hospital_id=None):
+    return Usuario(
+        username="u", email="u@test.cl", hashed_password="x", nombre_completo="U",
+        rol=rol, servicio_id=servicio_id, hospital_id=hospital_id,
+    )
+
+
+@pytest.fixture
+def red(session, crear_hospital, crear_servicio, crear_sala, crear_cama, crear_paciente):
+    hospital = crear_hospital()
+    otro = crear_hospital(nombre="Otro", codigo="OTR")
+    camas = []
+    for i, (nombre, codigo, tipo) in enumerate(SERVICIOS):
+        sala = crear_sala(crear_servicio(hospital.id, nombre=nombre, codigo=codigo, tipo=tipo).id)
+        camas.append(crear_cama(sala.id, numero=100 + i, identificador=f"{codigo}-1"))
+
+    tipos = list(TipoPacienteEnum)
+    for n, (cama, destino) in enumerate(itertools.product([None] + camas, DESTINOS)):
+        crear_paciente(
+            hospital.id if n % 5 else otro.id,
+            run=f"{3000000 + n}-K",
+            tipo_paciente=tipos[n % len(tipos)],
+            cama_id=cama.id if cama else None,
+            servicio_destino=destino,
+        )
+    return {"hospital": hospital, "otro": otro, "camas": camas}
+
+
+class TestPredicados:
+    """Tests de equivalencia con los filtros en Python."""
+
+    def test_pacientes_igual_que_puede_ver_paciente(self, session, red):
+        pacientes = session.exec(select(Paciente)).all()
+        origenes = {p.id: _origen_python(session, p) for p in pacientes}
+        hospitales = [None, red["hospital"].id]
+
+        for rol, servicio_id, hospital_id in itertools.product(ROLES, SERVICIOS_USUARIO, hospitales):
+            usuario = _usuario(rol, servicio_id, hospital_id)
+            esperados = {
+                p.id for p in pacientes
+                if rbac_service.puede_ver_paciente(usuario, origenes[p.id], p.servicio_destino, p.hospital_id)
+            }
+            for sujeto in (usuario, Principal.desde_usuario(usuario)):
+                filtro = predicado_pacientes(sujeto)
+                query = select(Paciente.id)
+                if filtro is not None:
+                    query = query.where(filtro)
+                assert set(session.exec(query).all()) == esperados, (rol, servicio_id, hospital_id)
+
+    def test_restringido_ve_un_subconjunto(self, session, red):
+        """Test que el predicado realmente restringe a un médico de Medicina."""
+        filtro = predicado_pacientes(_usuario(RolEnum.MEDICO, "medicina"))
+        total = len(session.exec(select(Paciente.id)).all())
+        visibles = len(session.exec(select(Paciente.id).where(filtro)).all())
+        assert 0 < visibles < total
+
+    def test_camas_igual_que_filtro_por_servicio(self, session, red):
+        filas = session.exec(
+            select(Cama, Servicio).select_from(Cama)
+            .join(Sala, Cama.sala_id == Sala.id).join(Servicio, Sala.servicio_id == Servicio.id)
+        ).all()
+        servicios_usuario = SERVICIOS_USUARIO + [s.id for _, s in filas[:1]]
+        for servicio_id in servicios_usuario:
+            usuario = _usuario(RolEnum.ENFERMERA, servicio_id)
+            codigo_usuario = CODIGO_SERVICIO_MAP.get(servicio_id, servicio_id)
+            esperadas = {
+                cama.id for cama, servicio in filas
+                if not servicio_id or servicio_id == servicio.id
+                or codigo_usuario == servicio.codigo or servicio_id == servicio.codigo
+            }
+            filtro = predicado_camas(usuario)
+            query = (
+                select(Cama.id).select_from(Cama)
+                .join(Sala, Cama.sala_id == Sala.id).join(Servicio, Sala.servicio_id == Servicio.id)
+            )
+            if filtro is not None:
+                query = query.where(filtro)
+            assert set(session.exec(query).all()) == esperadas, servicio_id
+
+
+class TestEndpoints:
+    """Tests de los listados con el alcance aplicado en la consulta."""
+
+    def _como(self, usuario):
+        from main import app
+        from app.core.auth_dependencies import get_current_user
+        app.dependency_overrides[get_current_user] = lambda: Principal.desde_usuario(usuario)
+
+    def test_lista_espera_solo_visibles(self, session, client, red):
+        hospital = red["hospital"]
+        for paciente in session.exec(select(Paciente).where(Paciente.hospital_id == hospital.id)).all():
+            paciente.en_lista_espera = True
+            paciente.derivacion_estado = "aceptada"
+            session.add(paciente)
+        session.commit()
+
+        self._como(_usuario(RolEnum.URGENCIAS, "urgencias"))
+        response = client.get(f"/api/hospitales/{hospital.id}/lista-espera")
+        assert response.status_code == 200
+
+        esperados = {
+            p.id for p in session.exec(select(Paciente).where(Paciente.hospital_id == hospital.id)).all()
+            if _origen_python(session, p) == "Urgencias"
+        }
+        recibidos = response.json()["pacientes"]
+        assert {p["paciente_id"] for p in recibidos} == esperados
+        assert [p["posicion"] for p in recibidos] == list(range(1, len(esperados) + 1))
+
+    def test_camas_por_servicio(self, session, client, red):
+        self._como(_usuario(RolEnum.ENFERMERA, "cirugia"))
+        response = client.get(f"/api/hospitales/{red['hospital'].id}/camas")
+        assert response.status_code == 200
+        assert [c["identificador"] for c in response.json()] == ["Cirug-1"]
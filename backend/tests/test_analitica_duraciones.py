@@ -0,0 +1,133 @@
+"""
+Tests para la analítica de distribución de duraciones.
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.estadisticas import _parsear_percentiles
+from app.models.enums import TipoEventoEnum
+from app.services import analitica_duraciones
+from app.services.analitica_duraciones import (
+    calcular_histograma,
+    calcular_percentiles,
+    desglosar,
+    describir,
+)
+from app.services.estadisticas_service import EstadisticasService
+from app.services.evento_writer import construir_fila_evento, escribir_eventos_masivo
+
+
+def _percentil(ordenados, p):
+    k = (len(ordenados) - 1) * p / 100
+    i = int(k)
+    j = min(i + 1, len(ordenados) - 1)
+    return ordenados[i] + (ordenados[j] - ordenados[i]) * (k - i)
+
+
+@pytest.fixture
+def esperas(session, hospital_con_camas, crear_hospital, crear_paciente):
+    """Esperas de cama de 10, 20, ..., 100 minutos repartidas en dos hospitales."""
+    hospitales = [hospital_con_camas["hospital"].id, crear_hospital(nombre="Otro", codigo="OT").id]
+    inicio = datetime.utcnow() - timedelta(days=1)
+    filas = []
+    for n in range(10):
+        hospital_id = hospitales[n % 2]
+        paciente_id = crear_paciente(hospital_id, run=f"{n}-7").id
+        filas.append(construir_fila_evento(
+            TipoEventoEnum.BUSQUEDA_CAMA_INICIADA, paciente_id, hospital_id, timestamp=inicio,
+        ))
+        filas.append(construir_fila_evento(
+            TipoEventoEnum.CAMA_ASIGNADA, paciente_id, hospital_id,
+            timestamp=inicio + timedelta(minutes=10 * (n + 1)),
+        ))
+    escribir_eventos_masivo(session, filas)
+    session.commit()
+    return hospitales
+
+
+class TestCalculo:
+    """Tests de percentiles, histograma y desgloses."""
+
+    def test_percentiles_interpolacion_lineal(self):
+        """Test percentiles contra la definición de interpolación lineal."""
+        valores = [random.Random(34).expovariate(1 / 3600) for _ in range(501)]
+        ordenados = sorted(valores)
+
+        resultado = calcular_percentiles(valores, (0, 50, 90, 99.9, 100))
+
+        assert set(resultado) == {"p0", "p50", "p90", "p99.9", "p100"}
+        for p in (0, 50, 90, 99.9, 100):
+            assert resultado[f"p{p:g}"] == pytest.approx(_percentil(ordenados, p))
+
+    def test_histograma_cubre_todos_los_valores(self):
+        """Test que el histograma tiene bins+1 límites y cuenta todos los valores."""
+        valores = [float(v) for v in range(100)]
+
+        histograma = calcular_histograma(valores, bins=4)
+
+        assert histograma["conteos"] == [25, 25, 25, 25]
+        assert histograma["limites"][0] == 0 and histograma["limites"][-1] == 99
+        assert calcular_histograma([5.0, 5.0], bins=2)["conteos"] == [0, 2]
+
+    def test_desglose_por_grupo(self):
+        """Test que cada grupo se resume con sus propios valores."""
+        valores = [1.0, 100.0, 2.0, 200.0, 3.0]
+        grupos = ["a", "b", "a", "b", "a"]
+
+        desglose = desglosar(valores, grupos, (50,))
+
+        assert sorted(desglose) == ["a", "b"]
+        assert desglose["a"]["cantidad"] == 3
+        assert desglose["a"]["percentiles"]["p50"] == pytest.approx(2.0)
+        assert desglose["b"]["maximo"] == pytest.approx(200.0)
+        assert "histograma" not in desglose["a"]
+
+    def test_describir_vacio(self):
+        """Test resumen de una distribución vacía."""
+        resumen = describir([], (50,), bins=5)
+
+        assert resumen["cantidad"] == 0
+        assert resumen["percentiles"] == {}
+        assert resumen["histograma"] == {"limites": [], "conteos": []}
+
+
+class TestIntegracion:
+    """Tests sobre eventos reales."""
+
+    def test_analizar_desglosa_por_hospital(self, session, esperas):
+        """Test distribución global y por hospital de la espera de cama."""
+        resultado = analitica_duraciones.analizar(session, "espera_cama", None, None, percentiles=(50,), bins=5)
+
+        assert resultado["global"]["cantidad"] == 10
+        assert resultado["global"]["percentiles"]["p50"] == pytest.approx(55 * 60)
+        assert sum(resultado["global"]["histograma"]["conteos"]) == 10
+        assert {h: d["cantidad"] for h, d in resultado["por_hospital"].items()} == {
+            esperas[0]: 5, esperas[1]: 5,
+        }
+
+    def test_servicio_incluye_percentiles_solicitados(self, session, esperas):
+        """Test que el servicio agrega percentiles solo si se piden."""
+        fecha_fin = datetime.utcnow()
+        fecha_inicio = fecha_fin - timedelta(days=7)
+
+        sin = asyncio.run(EstadisticasService.calcular_tiempo_espera_cama(session, fecha_inicio, fecha_fin))
+        con = asyncio.run(EstadisticasService.calcular_tiempo_espera_cama(
+            session, fecha_inicio, fecha_fin, percentiles=[50, 90]
+        ))
+
+        assert "percentiles" not in sin
+        assert con["cantidad"] == 10
+        assert con["percentiles"]["p90"] == pytest.approx(_percentil([60 * m for m in range(10, 101, 10)], 90))
+
+    def test_parametro_percentiles_invalido(self):
+        """Test validación del parámetro de percentiles."""
+        assert _parsear_percentiles("50, 90") == [50.0, 90.0]
+        assert _parsear_percentiles(None) is None
+        for invalido in ("abc", "150", "-1"):
+            with pytest.raises(HTTPException) as error:
+                _parsear_percentiles(invalido)
+            assert error.value.status_code == 400
@@ -0,0 +1,221 @@
+"""
+Tests del arranque perezoso: recursos creados en el primer uso, snapshot de
+colas con delta contra la BD y probes de startup/readiness.
+"""
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.config import settings
+from app.core import arranque, cache, database
+from app.core.arranque import EstadoArranque, estado_arranque
+from app.services.prioridad_service import PrioridadService, gestor_colas_global
+from app.services.snapshot_colas import SnapshotColas
+
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def colas_limpias():
+    gestor_colas_global.reemplazar({})
+    yield gestor_colas_global
+    gestor_colas_global.reemplazar({})
+
+
+class TestRecursosPerezosos:
+    """Tests de la inicialización en el primer uso."""
+
+    def test_importar_la_app_no_crea_conexiones(self):
+        codigo = (
+            "import main\n"
+            "from app.core import database\n"
+            "print(database._engine is None, database._redis_client is None, database._redis_ultimo_error is None)\n"
+        )
+        salida = subprocess.run(
+            [sys.executable, "-c", codigo], cwd=BACKEND, capture_output=True, text=True, timeout=60,
+        )
+        assert salida.stdout.split()[-3:] == ["True", "True", "True"], salida.stderr
+
+    @pytest.fixture
+    def redis_intermitente(self, monkeypatch):
+        """from_url que falla hasta que el test marque Redis como disponible."""
+        estado = {"disponible": False, "intentos": 0}
+
+        class Cliente:
+            def ping(self):
+                return True
+
+            def scan_iter(self, **kwargs):
+                return iter(())
+
+        def from_url(*args, **kwargs):
+            estado["intentos"] += 1
+            if not estado["disponible"]:
+                raise ConnectionError("sin redis")
+            return Cliente()
+
+        monkeypatch.setattr(settings, "REDIS_ENABLED", True)
+        monkeypatch.setattr(database, "_redis_client", None)
+        monkeypatch.setattr(database, "_redis_ultimo_error", None)
+        monkeypatch.setattr(database.redis, "from_url", from_url)
+        return estado
+
+    def test_get_redis_nunca_conecta(self, redis_intermitente):
+        assert database.get_redis() is None
+        assert database.get_redis() is None
+        assert redis_intermitente["intentos"] == 0
+
+        assert database.conectar_redis() is None
+        assert redis_intermitente["intentos"] == 1
+        assert database.get_redis() is None
+        assert database.estado_recursos()["redis"] == "no_disponible"
+
+    def test_reintento_en_segundo_plano(self, redis_intermitente):
+        estado = EstadoArranque(pasos=[("redis", arranque._preparar_redis)], intervalo_reintento=0.01)
+
+        async def escenario():
+            tarea = asyncio.create_task(estado._ejecutar())
+            while estado.fase != "degradado":
+                await asyncio.sleep(0.01)
+            redis_intermitente["disponible"] = True
+            while not estado.reconexiones_redis:
+                await asyncio.sleep(0.01)
+            tarea.cancel()
+
+        asyncio.run(asyncio.wait_for(escenario(), timeout=5))
+
+        assert estado.fase == "listo"
+        assert estado.reconexiones_redis == 1
+        assert estado.componentes["redis"]["estado"] == "listo"
+        assert database.estado_recursos()["redis"] == "conectado"
+
+    def test_cache_resuelto_antes_de_redis_se_activa(self, redis_intermitente, monkeypatch):
+        respuestas = cache.ResponseCache()
+        monkeypatch.setattr(cache, "response_cache", respuestas)
+        monkeypatch.setattr(settings, "CACHE_BACKEND", "redis")
+        assert not respuestas.habilitado
+
+        estado = EstadoArranque(pasos=[("redis", arranque._preparar_redis)], intervalo_reintento=0.01)
+
+        async def escenario():
+            tarea = asyncio.create_task(estado._ejecutar())
+            while estado.fase != "degradado":
+                await asyncio.sleep(0.01)
+            redis_intermitente["disponible"] = True
+            while not respuestas.habilitado:
+                await asyncio.sleep(0.01)
+            tarea.cancel()
+
+        asyncio.run(asyncio.wait_for(escenario(), timeout=5))
+
+        assert isinstance(respuestas.backend, cache.RedisCacheBackend)
+
+
+class TestSnapshotColas:
+    """Tests del snapshot + delta de las colas de prioridad."""
+
+    @pytest.fixture
+    def snapshot(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "REDIS_ENABLED", False)
+        return SnapshotColas(ruta=str(tmp_path / "colas.json"))
+
+    def _en_espera(self, session, crear_paciente, hospital_id, run, prioridad=0.0):
+        paciente = crear_paciente(hospital_id, run=run, en_lista_espera=True)
+        if prioridad:
+            paciente.prioridad_calculada = prioridad
+            session.add(paciente)
+            session.commit()
+        return paciente
+
+    def test_restaura_y_aplica_delta(self, session, crear_hospital, crear_paciente, colas_limpias, snapshot, monkeypatch):
+        hospital = crear_hospital()
+        servicio = PrioridadService(session)
+        a = self._en_espera(session, crear_paciente, hospital.id, "1-1")
+        b = self._en_espera(session, crear_paciente, hospital.id, "2-2")
+        c = self._en_espera(session, crear_paciente, hospital.id, "3-3")
+        for paciente in (a, b, c):
+            servicio.agregar_a_cola(paciente)
+        cola_original = gestor_colas_global.obtener_cola(hospital.id).exportar()
+        assert snapshot.guardar() == 3
+
+        # Cambios posteriores al snapshot, hechos por otro worker
+        c.en_lista_espera = False
+        b.prioridad_calculada = 999.0
+        session.add_all([b, c])
+        session.commit()
+        d = self._en_espera(session, crear_paciente, hospital.id, "4-4")
+
+        calculos = []
+        original = PrioridadService.calcular_prioridad
+        monkeypatch.setattr(
+            PrioridadService, "calcular_prioridad",
+            lambda self, paciente, *args: calculos.append(paciente.id) or original(self, paciente, *args),
+        )
+        gestor_colas_global.reemplazar({})
+        resumen = snapshot.restaurar(session)
+
+        assert resumen["origen"] == "archivo"
+        assert (resumen["restaurados"], resumen["actualizados"], resumen["descartados"]) == (1, 1, 1)
+        assert resumen["recalculados"] == 1
+        assert calculos == [d.id]
+
+        cola = gestor_colas_global.obtener_cola(hospital.id)
+        assert cola.obtener_siguiente() == b.id
+        assert not cola.contiene(c.id)
+        assert cola.contiene(d.id)
+        # A conserva su entrada original (prioridad y timestamp de desempate)
+        assert [e for e in cola.exportar() if e[0] == a.id] == [e for e in cola_original if e[0] == a.id]
+        session.refresh(d)
+        assert d.prioridad_calculada == cola.obtener_prioridad(d.id) > 0
+
+    def test_sin_snapshot_usa_prioridades_persistidas(self, session, crear_hospital, crear_paciente, colas_limpias, snapshot):
+        hospital = crear_hospital()
+        a = self._en_espera(session, crear_paciente, hospital.id, "1-1", prioridad=150.0)
+        b = self._en_espera(session, crear_paciente, hospital.id, "2-2", prioridad=220.0)
+
+        resumen = snapshot.restaurar(session)
+
+        assert resumen["origen"] == "bd"
+        assert (resumen["nuevos"], resumen["recalculados"]) == (2, 0)
+        cola = gestor_colas_global.obtener_cola(hospital.id)
+        assert cola.obtener_todos_ordenados() == [(b.id, 220.0), (a.id, 150.0)]
+
+    def test_no_guarda_antes_de_restaurar(self, snapshot, colas_limpias):
+        asyncio.run(snapshot.iniciar())
+        asyncio.run(snapshot.detener())
+        assert snapshot.guardados == 0
+
+
+class TestProbes:
+    """Tests de /health/startup y /health/readiness durante el calentamiento."""
+
+    def test_calentamiento_registra_pasos(self):
+        def falla():
+            raise RuntimeError("sin conexión")
+
+        estado = EstadoArranque(pasos=[("ok", lambda: None), ("redis", falla)])
+        asyncio.run(estado.calentar())
+
+        assert estado.fase == "degradado"
+        assert estado.iniciado
+        assert estado.componentes["ok"]["estado"] == "listo"
+        assert estado.componentes["redis"] == {
+            "estado": "error", "error": "sin conexión", "duracion_ms": estado.componentes["redis"]["duracion_ms"],
+        }
+
+    def test_probes_reflejan_el_calentamiento(self, client, monkeypatch):
+        monkeypatch.setattr(estado_arranque, "fase", "calentando")
+
+        assert client.get("/api/health/startup").status_code == 503
+        response = client.get("/api/health/readiness")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming_up"
+
+        monkeypatch.setattr(estado_arranque, "fase", "listo")
+        response = client.get("/api/health/startup")
+        assert response.status_code == 200
+        assert response.json()["status"] == "started"
@@ -0,0 +1,146 @@
+"""
+Tests para el caché de respuestas con invalidación por tags.
+"""
+import pytest
+from fastapi import status
+
+from app.core.cache import (
+    response_cache,
+    cachear_respuesta,
+    invalidar_tags,
+    MemoryCacheBackend,
+    NullCacheBackend,
+)
+
+
+@pytest.fixture
+def cache_memoria():
+    """Activa el backend en memoria durante el test."""
+    response_cache.configurar_backend(MemoryCacheBackend())
+    yield response_cache
+    response_cache.configurar_backend(NullCacheBackend())
+
+
+class TestMemoryCacheBackend:
+    """Tests del backend en memoria."""
+
+    def test_set_get_e_invalidacion_por_tag(self):
+        """Test que invalidar un tag elimina solo sus claves."""
+        backend = MemoryCacheBackend()
+        backend.set("a", "1", 60, ["hospital:1"])
+        backend.set("b", "2", 60, ["hospital:2"])
+
+        assert backend.invalidar_tags(["hospital:1"]) == 1
+        assert backend.get("a") is None
+        assert backend.get("b") == "2"
+
+    def test_expiracion(self):
+        """Test que las claves expiran según su TTL."""
+        backend = MemoryCacheBackend()
+        backend.set("a", "1", -1)
+        assert backend.get("a") is None
+
+    def test_invalidar_patron(self):
+        """Test invalidación por patrón."""
+        backend = MemoryCacheBackend()
+        backend.set("cache:resp:x:1", "1", 60)
+        backend.set("cache:resp:y:1", "1", 60)
+        assert backend.invalidar_patron("cache:resp:x:*") == 1
+        assert backend.get("cache:resp:y:1") == "1"
+
+
+class TestCachearRespuesta:
+    """Tests del decorador de endpoints."""
+
+    def test_hit_miss_y_alcance_rbac(self, cache_memoria):
+        """Test que la clave distingue parámetros y alcance RBAC."""
+        from app.models.usuario import Usuario, RolEnum
+
+        llamadas = []
+
+        @cachear_respuesta("test:endpoint", tags=["hospital:{hospital_id}"])
+        def endpoint(hospital_id: str, current_user=None, session=None):
+            llamadas.append(hospital_id)
+            return {"hospital_id": hospital_id, "n": len(llamadas)}
+
+        medico = Usuario(username="m", email="m@x.cl", nombre_completo="M",
+                         rol=RolEnum.MEDICO, hospital_id="H1")
+        gestor = Usuario(username="g", email="g@x.cl", nombre_completo="G",
+                         rol=RolEnum.GESTOR_CAMAS, hospital_id="H1")
+
+        assert endpoint(hospital_id="H1", current_user=medico, session=object())["n"] == 1
+        assert endpoint(hospital_id="H1", current_user=medico, session=object())["n"] == 1
+        assert endpoint(hospital_id="H1", current_user=gestor, session=object())["n"] == 2
+        assert endpoint(hospital_id="H2", current_user=medico, session=object())["n"] == 3
+
+        stats = cache_memoria.estadisticas()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 3
+
+        invalidar_tags("hospital:H1")
+        assert endpoint(hospital_id="H1", current_user=medico, session=object())["n"] == 4
+
+    def test_endpoint_async(self, cache_memoria):
+        """Test que el decorador soporta endpoints async."""
+        import asyncio
+
+        llamadas = []
+
+        @cachear_respuesta("test:async")
+        async def endpoint(dias: int = 7):
+            llamadas.append(dias)
+            return {"dias": dias}
+
+        asyncio.run(endpoint(dias=7))
+        asyncio.run(endpoint(dias=7))
+        assert llamadas == [7]
+
+    def test_deshabilitado_no_cachea(self):
+        """Test que sin backend el endpoint se ejecuta siempre."""
+        llamadas = []
+
+        @cachear_respuesta("test:null")
+        def endpoint():
+            llamadas.append(1)
+            return {}
+
+        endpoint()
+        endpoint()
+        assert len(llamadas) == 2
+
+
+class TestInvalidacionORM:
+    """Tests de invalidación al confirmar cambios en la sesión."""
+
+    def test_telefonos_se_invalidan_al_modificar_hospital(self, client, session, cache_memoria, hospital_con_camas):
+        """Test que un commit sobre el hospital invalida su respuesta cacheada."""
+        hospital = hospital_con_camas["hospital"]
+        url = f"/api/hospitales/{hospital.id}/telefonos"
+
+        response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["telefono_urgencias"] is None
+        client.get(url)
+        assert cache_memoria.estadisticas()["hits"] == 1
+
+        hospital.telefono_urgencias = "652000000"
+        session.add(hospital)
+        session.commit()
+
+        response = client.get(url)
+        assert response.json()["telefono_urgencias"] == "652000000"
+
+    def test_cambio_de_cama_invalida_hospital(self, client, session, cache_memoria, hospital_con_camas):
+        """Test que cambiar el estado de una cama invalida los tags del hospital."""
+        from app.models.enums import EstadoCamaEnum
+        from app.repositories.cama_repo import CamaRepository
+
+        hospital = hospital_con_camas["hospital"]
+        cama = hospital_con_camas["camas"][0]
+        url = f"/api/hospitales/{hospital.id}/servicios-telefonos"
+
+        assert client.get(url).json()[0]["camas_libres"] == 4
+
+        CamaRepository(session).cambiar_estado(cama, EstadoCamaEnum.BLOQUEADA)
+
+        assert client.get(url).json()[0]["camas_libres"] == 3
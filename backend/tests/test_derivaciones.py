@@ -4,7 +4,12 @@ Tests para endpoints de derivaciones.
 import pytest
 from fastapi import status
 
-from app.models.enums import EstadoCamaEnum
+from app.models.enums import (
+    ComplejidadEnum,
+    EstadoCamaEnum,
+    TipoAislamientoEnum,
+    TipoServicioEnum,
+)
 
 
 class TestDerivaciones:
@@ -152,3 +157,55 @@ class TestDerivaciones:
         # Verificar que cama está en limpieza
         session.refresh(cama)
         assert cama.estado == EstadoCamaEnum.EN_LIMPIEZA
+
+
+class TestViabilidadRed:
+    """Tests de la verificación de viabilidad contra toda la red."""
+
+    @pytest.fixture
+    def red(self, crear_hospital, crear_servicio, crear_sala):
+        origen = crear_hospital(nombre="Origen", codigo="OR")
+        crear_servicio(origen.id, nombre="Medicina", codigo="MEDO")
+        alta = crear_hospital(nombre="Alta complejidad", codigo="AC")
+        crear_servicio(alta.id, nombre="Medicina", codigo="MEDA")
+        uci = crear_servicio(alta.id, nombre="UCI", codigo="UCIA", tipo=TipoServicioEnum.UCI)
+        crear_sala(uci.id, es_individual=True)
+        basico = crear_hospital(nombre="Básico", codigo="BA")
+        crear_servicio(basico.id, nombre="Medicina", codigo="MEDB")
+        return {"origen": origen, "alta": alta, "basico": basico}
+
+    def test_evalua_todos_los_hospitales_en_una_llamada(self, client, red, crear_paciente):
+        paciente = crear_paciente(
+            red["origen"].id,
+            complejidad_requerida=ComplejidadEnum.ALTA,
+            tipo_aislamiento=TipoAislamientoEnum.AEREO,
+        )
+
+        response = client.get(f"/api/derivaciones/{paciente.id}/viabilidad-red")
+
+        assert response.status_code == status.HTTP_200_OK
+        hospitales = response.json()["hospitales"]
+        assert [h["hospital_id"] for h in hospitales] == [red["alta"].id, red["basico"].id]
+        alta, basico = hospitales
+        assert alta["es_viable"] and alta["motivos_rechazo"] == []
+        assert alta["capacidad"]["complejidad_maxima"] == 3
+        assert not basico["es_viable"]
+        assert len(basico["motivos_rechazo"]) == 2
+
+    def test_coincide_con_la_verificacion_individual(self, client, red, crear_paciente):
+        paciente = crear_paciente(red["origen"].id, complejidad_requerida=ComplejidadEnum.ALTA)
+
+        lote = {
+            h["hospital_id"]: h
+            for h in client.get(f"/api/derivaciones/{paciente.id}/viabilidad-red").json()["hospitales"]
+        }
+        for hospital in (red["alta"], red["basico"]):
+            individual = client.get(
+                f"/api/derivaciones/{paciente.id}/verificar-viabilidad/{hospital.id}"
+            ).json()
+            assert individual["es_viable"] == lote[hospital.id]["es_viable"]
+            assert individual["motivos_rechazo"] == lote[hospital.id]["motivos_rechazo"]
+        assert lote[red["alta"].id]["es_viable"] and not lote[red["basico"].id]["es_viable"]
+
+    def test_paciente_inexistente(self, client):
+        assert client.get("/api/derivaciones/no-existe/viabilidad-red").status_code == 404
@@ -0,0 +1,267 @@
+"""
+Tests del almacenamiento de documentos: subida en streaming con corte por
+tamaño, deduplicación por contenido, descargas con Range/ETag y el backend
+compatible con S3 (con un cliente en memoria).
+"""
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+
+from app.config import settings
+from app.core.almacenamiento import (
+    ArchivoRecibido,
+    LocalDocumentosBackend,
+    S3DocumentosBackend,
+    almacen_documentos,
+    separar_nombre_documento,
+)
+from app.models.documento import DocumentoPendienteBorrado
+from app.services.documentos_service import barrer
+
+
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 400 + b"\n%%EOF"
+
+
+class _NoEncontrado(Exception):
+    response = {"Error": {"Code": "404"}}
+
+
+class ClienteS3Memoria:
+    """Sustituto local de boto3.client("s3")."""
+
+    def __init__(self):
+        self.objetos = {}
+        self.subidas = 0
+
+    def upload_file(self, ruta, bucket, key, ExtraArgs=None):
+        with open(ruta, "rb") as f:
+            self.objetos[(bucket, key)] = f.read()
+        self.subidas += 1
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objetos:
+            raise _NoEncontrado()
+        return {"ContentLength": len(self.objetos[(Bucket, Key)])}
+
+    def get_object(self, Bucket, Key, Range=None):
+        datos = self.objetos[(Bucket, Key)]
+        if Range:
+            inicio, fin = Range[6:].split("-")
+            datos = datos[int(inicio):int(fin) + 1]
+        return {"Body": io.BytesIO(datos)}
+
+    def delete_object(self, Bucket, Key):
+        self.objetos.pop((Bucket, Key), None)
+
+
+@pytest.fixture
+def hospital(crear_hospital):
+    return crear_hospital()
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    backend = LocalDocumentosBackend(str(tmp_path))
+    almacen_documentos.configurar_backend(backend)
+    yield backend
+    almacen_documentos.configurar_backend(None)
+
+
+def _subir(client, paciente_id, contenido=PDF, nombre="epicrisis.pdf"):
+    return client.post(
+        f"/api/pacientes/{paciente_id}/documento",
+        files={"file": (nombre, contenido, "application/pdf")},
+    )
+
+
+def _barrer(session):
+    return asyncio.run(barrer(session, gracia_segundos=0))
+
+
+def _archivos(directorio):
+    return sorted(
+        os.path.join(raiz, nombre)
+        for raiz, _, nombres in os.walk(os.path.join(directorio, "cas"))
+        for nombre in nombres
+    )
+
+
+class TestSubida:
+    """Tests del endpoint de subida."""
+
+    def test_guarda_por_hash(self, client, almacen, hospital, crear_paciente):
+        paciente = crear_paciente(hospital.id)
+
+        response = _subir(client, paciente.id)
+
+        assert response.status_code == 200
+        datos = response.json()["data"]
+        clave = hashlib.sha256(PDF).hexdigest()
+        assert datos["filename"] == f"{clave}_epicrisis.pdf"
+        assert datos["tamano"] == len(PDF)
+        with open(almacen.ruta_local(clave), "rb") as f:
+            assert f.read() == PDF
+        assert os.listdir(almacen.directorio_temporal()) == []
+
+    def test_deduplica_entre_pacientes(self, client, session, almacen, hospital, crear_paciente):
+        a = crear_paciente(hospital.id, run="11111111-1")
+        b = crear_paciente(hospital.id, run="22222222-2")
+
+        assert _subir(client, a.id).status_code == 200
+        assert _subir(client, b.id, nombre="copia.pdf").status_code == 200
+
+        assert len(_archivos(almacen.directorio)) == 1
+        estadisticas = almacen_documentos.estadisticas()
+        assert estadisticas["deduplicadas"] >= 1
+
+        # Reemplazar el de A no borra el contenido que B sigue usando
+        assert _subir(client, a.id, contenido=PDF + b"v2").status_code == 200
+        assert _barrer(session)["en_uso"] == 1
+        assert len(_archivos(almacen.directorio)) == 2
+        # Reemplazar el de B sí, porque ya nadie lo referencia
+        assert _subir(client, b.id, contenido=PDF + b"v3").status_code == 200
+        assert os.path.exists(almacen.ruta_local(hashlib.sha256(PDF).hexdigest()))
+        assert _barrer(session)["eliminados"] == 1
+        assert not os.path.exists(almacen.ruta_local(hashlib.sha256(PDF).hexdigest()))
+
+    def test_corta_al_superar_el_maximo(self, client, almacen, hospital, crear_paciente, monkeypatch):
+        paciente = crear_paciente(hospital.id)
+        monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1024)
+
+        response = _subir(client, paciente.id)
+
+        assert response.status_code == 413
+        assert _archivos(almacen.directorio) == []
+        assert os.listdir(almacen.directorio_temporal()) == []
+
+    def test_rechaza_no_pdf(self, client, almacen, hospital, crear_paciente):
+        paciente = crear_paciente(hospital.id)
+        response = _subir(client, paciente.id, nombre="foto.png")
+        assert response.status_code == 400
+
+
+class TestBarrido:
+    """Tests del borrado diferido del contenido reemplazado."""
+
+    def test_respeta_la_gracia(self, client, session, almacen, hospital, crear_paciente):
+        paciente = crear_paciente(hospital.id)
+        _subir(client, paciente.id)
+        _subir(client, paciente.id, contenido=PDF + b"v2")
+
+        resultado = asyncio.run(barrer(session, gracia_segundos=3600))
+
+        assert resultado["revisados"] == 0
+        assert session.get(DocumentoPendienteBorrado, hashlib.sha256(PDF).hexdigest()) is not None
+        assert len(_archivos(almacen.directorio)) == 2
+
+    def test_subida_del_mismo_contenido_retira_la_marca(self, client, session, almacen, hospital, crear_paciente):
+        a = crear_paciente(hospital.id, run="11111111-1")
+        b = crear_paciente(hospital.id, run="22222222-2")
+        clave = hashlib.sha256(PDF).hexdigest()
+        _subir(client, a.id)
+        _subir(client, a.id, contenido=PDF + b"v2")
+        assert session.get(DocumentoPendienteBorrado, clave) is not None
+
+        # Otra subida vuelve a usar el contenido marcado antes del barrido
+        assert _subir(client, b.id).status_code == 200
+
+        assert session.get(DocumentoPendienteBorrado, clave) is None
+        assert _barrer(session)["revisados"] == 0
+        assert os.path.exists(almacen.ruta_local(clave))
+
+    def test_contenido_barrido_se_vuelve_a_guardar(self, client, session, almacen, hospital, crear_paciente):
+        paciente = crear_paciente(hospital.id)
+        clave = hashlib.sha256(PDF).hexdigest()
+        _subir(client, paciente.id)
+        _subir(client, paciente.id, contenido=PDF + b"v2")
+        assert _barrer(session)["eliminados"] == 1
+
+        assert _subir(client, paciente.id).status_code == 200
+
+        with open(almacen.ruta_local(clave), "rb") as f:
+            assert f.read() == PDF
+
+    def test_error_al_eliminar_conserva_la_marca(self, client, session, almacen, hospital, crear_paciente, monkeypatch):
+        paciente = crear_paciente(hospital.id)
+        clave = hashlib.sha256(PDF).hexdigest()
+        _subir(client, paciente.id)
+        _subir(client, paciente.id, contenido=PDF + b"v2")
+
+        async def fallar(clave):
+            raise OSError("disco no disponible")
+
+        monkeypatch.setattr(almacen, "eliminar", fallar)
+        assert _barrer(session)["errores"] == 1
+        assert session.get(DocumentoPendienteBorrado, clave) is not None
+        assert os.path.exists(almacen.ruta_local(clave))
+
+
+class TestDescarga:
+    """Tests de /api/documentos con Range, ETag y caché."""
+
+    @pytest.fixture
+    def documento(self, client, almacen, hospital, crear_paciente):
+        paciente = crear_paciente(hospital.id)
+        return _subir(client, paciente.id, nombre="informe alta.pdf").json()["data"]["filename"]
+
+    def test_completo_con_cabeceras_de_cache(self, client, documento):
+        response = client.get(f"/api/documentos/{documento}")
+
+        assert response.status_code == 200
+        assert response.content == PDF
+        assert response.headers["etag"] == f'"{separar_nombre_documento(documento)[0]}"'
+        assert "immutable" in response.headers["cache-control"]
+        assert response.headers["accept-ranges"] == "bytes"
+        assert "informe%20alta.pdf" in response.headers["content-disposition"]
+
+    def test_rango(self, client, documento):
+        response = client.get(f"/api/documentos/{documento}", headers={"Range": "bytes=100-199"})
+        assert response.status_code == 206
+        assert response.content == PDF[100:200]
+        assert response.headers["content-range"] == f"bytes 100-199/{len(PDF)}"
+
+        response = client.get(f"/api/documentos/{documento}", headers={"Range": "bytes=-6"})
+        assert response.content == PDF[-6:]
+
+        response = client.get(f"/api/documentos/{documento}", headers={"Range": f"bytes={len(PDF)}-"})
+        assert response.status_code == 416
+
+    def test_if_none_match_responde_304(self, client, documento):
+        etag = client.get(f"/api/documentos/{documento}").headers["etag"]
+        response = client.get(f"/api/documentos/{documento}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+
+class TestBackendS3:
+    """Tests del backend S3 sobre un cliente en memoria."""
+
+    def _recibido(self, tmp_path, contenido):
+        ruta = tmp_path / f"subida_{len(contenido)}"
+        ruta.write_bytes(contenido)
+        return ArchivoRecibido(str(ruta), "a.pdf", hashlib.sha256(contenido).hexdigest(), len(contenido))
+
+    def test_guardar_deduplica_y_lee_rangos(self, tmp_path):
+        cliente = ClienteS3Memoria()
+        backend = S3DocumentosBackend(cliente, "documentos", prefijo="pdf/")
+
+        async def escenario():
+            primero = self._recibido(tmp_path, PDF)
+            nuevo = await backend.guardar(primero)
+            repetido = await backend.guardar(self._recibido(tmp_path, PDF))
+            tamano = await backend.tamano(primero.sha256)
+            parcial = b"".join([b async for b in backend.leer(primero.sha256, 10, 19)])
+            await backend.eliminar(primero.sha256)
+            return primero, nuevo, repetido, tamano, parcial, await backend.tamano(primero.sha256)
+
+        primero, nuevo, repetido, tamano, parcial, despues = asyncio.run(escenario())
+
+        assert (nuevo, repetido) == (True, False)
+        assert cliente.subidas == 1
+        assert not os.path.exists(primero.ruta_temporal)
+        assert tamano == len(PDF)
+        assert parcial == PDF[10:20]
+        assert despues is None
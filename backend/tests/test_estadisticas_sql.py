@@ -0,0 +1,227 @@
+"""
+Tests de equivalencia de las estadísticas agregadas en SQL (flujos, demanda
+y casos especiales) contra la implementación anterior, que recorría las
+filas en Python.
+"""
+import asyncio
+import json
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import select
+
+from app.models.enums import EstadoCamaEnum, TipoEventoEnum
+from app.models.evento_paciente import EventoPaciente
+from app.models.hospital import Hospital
+from app.models.paciente import Paciente
+from app.models.servicio import Servicio
+from app.services import evento_writer
+from app.services.estadisticas_service import EstadisticasService
+
+
+INICIO = datetime(2026, 1, 1)
+FIN = datetime(2026, 2, 1)
+
+CASOS = [
+    None,
+    "[]",
+    "no es json",
+    '{"tipo": "caso social"}',
+    json.dumps(["cardiocirugía"]),
+    json.dumps(["Cardiocirugía", "caso social"]),
+    json.dumps(["Caso social"], ensure_ascii=False),
+    json.dumps(["caso socio-judicial", "Cardiocirugía"], ensure_ascii=False),
+    json.dumps(["Caso socio-judicial"]),
+    json.dumps(["otro"]),
+]
+
+
+# ============================================
+# IMPLEMENTACIÓN DE REFERENCIA (fila a fila)
+# ============================================
+
+def _flujos_referencia(session, fecha_inicio, fecha_fin, limite=10):
+    flujos = defaultdict(int)
+    for evento in session.exec(select(EventoPaciente).where(
+        EventoPaciente.tipo_evento == TipoEventoEnum.TRASLADO_COMPLETADO,
+        EventoPaciente.timestamp >= fecha_inicio,
+        EventoPaciente.timestamp < fecha_fin,
+    )).all():
+        if evento.servicio_origen_id and evento.servicio_destino_id:
+            origen = session.get(Servicio, evento.servicio_origen_id)
+            destino = session.get(Servicio, evento.servicio_destino_id)
+            if origen and destino:
+                flujos[f"{origen.nombre} -> {destino.nombre}"] += 1
+
+    for evento in session.exec(select(EventoPaciente).where(
+        EventoPaciente.tipo_evento == TipoEventoEnum.DERIVACION_COMPLETADA,
+        EventoPaciente.timestamp >= fecha_inicio,
+        EventoPaciente.timestamp < fecha_fin,
+    )).all():
+        if evento.hospital_destino_id:
+            hospital_origen_id = evento.get_metadata().get("hospital_origen")
+            if hospital_origen_id:
+                origen = session.get(Hospital, hospital_origen_id)
+                destino = session.get(Hospital, evento.hospital_destino_id)
+                if origen and destino:
+                    flujos[f"{origen.nombre} -> {destino.nombre} (Derivación)"] += 1
+
+    ordenados = sorted(flujos.items(), key=lambda x: x[1], reverse=True)[:limite]
+    return [{"flujo": flujo, "cantidad": cantidad} for flujo, cantidad in ordenados]
+
+
+def _demanda_referencia(session):
+    resultados = []
+    for servicio in session.exec(select(Servicio)).all():
+        tasa = asyncio.run(EstadisticasService.calcular_tasa_ocupacion_servicio(session, servicio.id))
+        espera = session.exec(select(Paciente).where(
+            Paciente.en_lista_espera == True,
+            Paciente.hospital_id == servicio.hospital_id,
+        )).all()
+        resultados.append({
+            "servicio_id": servicio.id,
+            "servicio_nombre": servicio.nombre,
+            "hospital_id": servicio.hospital_id,
+            "tasa_ocupacion": tasa["tasa_ocupacion"],
+            "pacientes_en_espera": len(espera),
+            "demanda_score": tasa["tasa_ocupacion"] + len(espera) * 10,
+        })
+    resultados.sort(key=lambda x: x["demanda_score"], reverse=True)
+    return resultados
+
+
+def _casos_referencia(session, hospital_id=None):
+    query = select(Paciente).where(Paciente.casos_especiales.isnot(None))
+    if hospital_id:
+        query = query.where(Paciente.hospital_id == hospital_id)
+    conteo = {"total": 0, "cardiocirugia": 0, "caso_social": 0, "caso_socio_judicial": 0}
+    for paciente in session.exec(query).all():
+        casos = paciente.get_requerimientos_lista("casos_especiales")
+        if casos:
+            conteo["total"] += 1
+            if "cardiocirugía" in casos or "Cardiocirugía" in casos:
+                conteo["cardiocirugia"] += 1
+            if "caso social" in casos or "Caso social" in casos:
+                conteo["caso_social"] += 1
+            if "caso socio-judicial" in casos or "Caso socio-judicial" in casos:
+                conteo["caso_socio_judicial"] += 1
+    return conteo
+
+
+# ============================================
+# DATOS SEMBRADOS
+# ============================================
+
+@pytest.fixture
+def red_sembrada(session, crear_hospital, crear_servicio, crear_sala, crear_cama, crear_paciente):
+    """Tres hospitales con servicios de nombres repetidos, camas, pacientes y eventos aleatorios."""
+    azar = random.Random(37)
+    hospitales = [crear_hospital(nombre=f"Hospital {i}", codigo=f"H{i}") for i in range(3)]
+    servicios = []
+    for hospital in hospitales:
+        for nombre, codigo in (("Medicina", "MED"), ("Cirugía", "CIR"), ("UCI", "UCI")):
+            servicio = crear_servicio(hospital.id, nombre=nombre, codigo=codigo)
+            servicios.append(servicio)
+            sala = crear_sala(servicio.id)
+            for n in range(azar.randint(0, 4)):
+                crear_cama(
+                    sala.id,
+                    numero=n + 1,
+                    identificador=f"{hospital.codigo}-{codigo}-{n}",
+                    estado=azar.choice(list(EstadoCamaEnum)),
+                )
+
+    pacientes = []
+    for i in range(60):
+        pacientes.append(crear_paciente(
+            azar.choice(hospitales).id,
+            run=f"{1000000 + i}-K",
+            en_lista_espera=azar.random() < 0.4,
+            casos_especiales=azar.choice(CASOS),
+        ))
+
+    metadatas = [
+        None,
+        "no es json",
+        json.dumps({"otro": 1}),
+        json.dumps({"hospital_origen": "inexistente"}),
+    ] + [json.dumps({"hospital_origen": h.id}) for h in hospitales] * 3
+    filas = []
+    for _ in range(600):
+        paciente = azar.choice(pacientes)
+        timestamp = INICIO + timedelta(minutes=azar.randint(-5000, 50000))
+        if azar.random() < 0.7:
+            origen = azar.choice(servicios) if azar.random() < 0.95 else None
+            filas.append(evento_writer.construir_fila_evento(
+                TipoEventoEnum.TRASLADO_COMPLETADO,
+                paciente.id,
+                paciente.hospital_id,
+                servicio_origen_id=origen.id if origen else None,
+                servicio_destino_id=azar.choice(servicios).id,
+                timestamp=timestamp,
+            ))
+        else:
+            destino = azar.choice(hospitales) if azar.random() < 0.9 else None
+            fila = evento_writer.construir_fila_evento(
+                TipoEventoEnum.DERIVACION_COMPLETADA,
+                paciente.id,
+                paciente.hospital_id,
+                hospital_destino_id=destino.id if destino else None,
+                timestamp=timestamp,
+            )
+            fila["datos_adicionales"] = azar.choice(metadatas)
+            filas.append(fila)
+    evento_writer.escribir_eventos_masivo(session, filas)
+    session.commit()
+    return {"hospitales": hospitales, "servicios": servicios}
+
+
+# ============================================
+# TESTS
+# ============================================
+
+class TestEquivalencia:
+    """Tests de igualdad de resultados con la implementación fila a fila."""
+
+    def test_flujos(self, session, red_sembrada):
+        """Test que los flujos agrupados en SQL coinciden con el conteo en Python."""
+        nuevos = asyncio.run(EstadisticasService.calcular_flujos_mas_repetidos(session, INICIO, FIN, limite=1000))
+        referencia = _flujos_referencia(session, INICIO, FIN, limite=1000)
+
+        assert any("(Derivación)" in f["flujo"] for f in nuevos)
+        assert sorted(nuevos, key=lambda f: f["flujo"]) == sorted(referencia, key=lambda f: f["flujo"])
+        # Orden por frecuencia con desempate determinista por nombre
+        assert nuevos == sorted(nuevos, key=lambda f: (-f["cantidad"], f["flujo"]))
+
+    def test_flujos_limite(self, session, red_sembrada):
+        """Test que el límite corta en las mismas frecuencias."""
+        nuevos = asyncio.run(EstadisticasService.calcular_flujos_mas_repetidos(session, INICIO, FIN, limite=5))
+        referencia = _flujos_referencia(session, INICIO, FIN, limite=5)
+
+        assert len(nuevos) == 5
+        assert [f["cantidad"] for f in nuevos] == [f["cantidad"] for f in referencia]
+
+    def test_flujos_ventana_vacia(self, session, red_sembrada):
+        """Test que una ventana sin eventos no produce flujos."""
+        fin = INICIO - timedelta(days=30)
+        assert asyncio.run(EstadisticasService.calcular_flujos_mas_repetidos(session, fin - timedelta(days=1), fin)) == []
+
+    def test_demanda(self, session, red_sembrada):
+        """Test que la demanda con consultas agrupadas coincide, incluido el orden."""
+        nuevos = asyncio.run(EstadisticasService.calcular_servicios_mayor_demanda(session))
+
+        assert len(nuevos) == len(red_sembrada["servicios"])
+        assert nuevos == _demanda_referencia(session)
+
+    def test_casos_especiales(self, session, red_sembrada):
+        """Test que el conteo por valor coincide en la red y por hospital."""
+        total = asyncio.run(EstadisticasService.calcular_casos_especiales(session))
+        assert total["total"] > 0
+        assert total == _casos_referencia(session)
+
+        for hospital in red_sembrada["hospitales"]:
+            assert asyncio.run(
+                EstadisticasService.calcular_casos_especiales(session, hospital.id)
+            ) == _casos_referencia(session, hospital.id)
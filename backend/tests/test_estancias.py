@@ -0,0 +1,229 @@
+"""
+Tests de estancias por servicio (estancia_servicio): mantenimiento
+incremental desde el escritor de eventos, reconstrucción, trazabilidad y
+tiempos de estancia.
+"""
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import select
+
+from app.models.enums import TipoEventoEnum
+from app.models.estancia_servicio import EstanciaServicio
+from app.models.paciente import Paciente
+from app.services import estancias_service, evento_writer, motor_duraciones
+from app.services.estadisticas_service import EstadisticasService
+from app.services.exportacion_service import consulta_estancias
+from app.services.motor_duraciones import METRICAS_DURACION
+
+
+T0 = datetime(2026, 3, 2, 9, 0)
+
+
+def _fila(tipo, paciente, servicio=None, minutos=0, cama=None):
+    return evento_writer.construir_fila_evento(
+        tipo, paciente.id, paciente.hospital_id,
+        servicio_destino_id=servicio.id if servicio else None,
+        cama_destino_id=cama.id if cama else None,
+        timestamp=T0 + timedelta(minutes=minutos),
+    )
+
+
+def _tabla(session):
+    """Estancias materializadas como tuplas comparables."""
+    return sorted(
+        (e.evento_entrada_id, e.servicio_id, e.entrada, e.salida, e.tipo_salida,
+         round(e.duracion_segundos, 3) if e.duracion_segundos is not None else None)
+        for e in session.exec(select(EstanciaServicio)).all()
+    )
+
+
+def _referencia_lead(session):
+    """Estancias según la consulta LEAD() de la exportación."""
+    return sorted(
+        (f.evento_entrada_id, f.servicio_id, f.entrada, f.salida,
+         f.tipo_salida.value if f.tipo_salida is not None else None,
+         round((f.salida - f.entrada).total_seconds(), 3) if f.salida is not None else None)
+        for f in session.execute(consulta_estancias(None, None)).all()
+    )
+
+
+@pytest.fixture
+def red(session, crear_hospital, crear_servicio, crear_sala, crear_cama, crear_paciente):
+    hospital = crear_hospital()
+    servicios = [
+        crear_servicio(hospital.id, nombre=nombre, codigo=codigo)
+        for nombre, codigo in (("Medicina", "MED"), ("Cirugía", "CIR"), ("UCI", "UCI"))
+    ]
+    cama = crear_cama(crear_sala(servicios[0].id).id)
+    pacientes = [crear_paciente(hospital.id, run=f"{2000000 + i}-K") for i in range(8)]
+    return {"hospital": hospital, "servicios": servicios, "cama": cama, "pacientes": pacientes}
+
+
+class TestMantenimiento:
+    """Tests del mantenimiento incremental desde insertar_filas."""
+
+    def test_recorrido_completo(self, session, red):
+        """Test de llegada, traslado y alta de un paciente."""
+        paciente = red["pacientes"][0]
+        medicina, cirugia, _ = red["servicios"]
+
+        evento_writer.insertar_filas(session, [
+            _fila(TipoEventoEnum.INGRESO_URGENCIA, paciente),
+            _fila(TipoEventoEnum.CAMA_ASIGNADA, paciente, medicina, 10, cama=red["cama"]),
+        ])
+        session.commit()
+        abierta = session.exec(select(EstanciaServicio)).one()
+        assert abierta.servicio_id == medicina.id
+        assert abierta.cama_id == red["cama"].id
+        assert abierta.salida is None
+
+        evento_writer.insertar_filas(session, [_fila(TipoEventoEnum.TRASLADO_COMPLETADO, paciente, cirugia, 130)])
+        evento_writer.insertar_filas(session, [_fila(TipoEventoEnum.ALTA_COMPLETADA, paciente, minutos=250)])
+        session.commit()
+
+        estancias = session.exec(select(EstanciaServicio).order_by(EstanciaServicio.entrada)).all()
+        assert [(e.servicio_id, e.duracion_segundos, e.tipo_salida) for e in estancias] == [
+            (medicina.id, 7200.0, "TRASLADO_COMPLETADO"),
+            (cirugia.id, 7200.0, "ALTA_COMPLETADA"),
+        ]
+
+    def test_evento_atrasado_rehace_estancias(self, session, red):
+        """Test que un traslado retroactivo parte la estancia que lo contiene."""
+        paciente = red["pacientes"][0]
+        medicina, cirugia, _ = red["servicios"]
+        evento_writer.insertar_filas(session, [
+            _fila(TipoEventoEnum.CAMA_ASIGNADA, paciente, medicina, 0),
+            _fila(TipoEventoEnum.ALTA_COMPLETADA, paciente, minutos=300),
+        ])
+        session.commit()
+
+        evento_writer.insertar_filas(session, [_fila(TipoEventoEnum.TRASLADO_COMPLETADO, paciente, cirugia, 60)])
+        session.commit()
+
+        estancias = session.exec(select(EstanciaServicio).order_by(EstanciaServicio.entrada)).all()
+        assert [(e.servicio_id, e.salida) for e in estancias] == [
+            (medicina.id, T0 + timedelta(minutes=60)),
+            (cirugia.id, T0 + timedelta(minutes=300)),
+        ]
+
+    def test_lotes_desordenados_igual_a_reconstruccion(self, session, red):
+        """Test que lotes en orden aleatorio dejan lo mismo que LEAD() y que la reconstrucción."""
+        azar = random.Random(40)
+        tipos = [
+            TipoEventoEnum.CAMA_ASIGNADA, TipoEventoEnum.TRASLADO_COMPLETADO,
+            TipoEventoEnum.DERIVACION_COMPLETADA, TipoEventoEnum.ALTA_COMPLETADA,
+            TipoEventoEnum.FALLECIDO_EGRESADO, TipoEventoEnum.BUSQUEDA_CAMA_INICIADA,
+        ]
+        filas = []
+        for _ in range(300):
+            servicio = azar.choice(red["servicios"] + [None])
+            filas.append(_fila(
+                azar.choice(tipos), azar.choice(red["pacientes"]), servicio,
+                minutos=azar.randint(0, 5000),
+            ))
+        azar.shuffle(filas)
+        while filas:
+            lote = filas[:azar.randint(1, 12)]
+            del filas[:len(lote)]
+            evento_writer.insertar_filas(session, lote)
+            session.commit()
+
+        incremental = _tabla(session)
+        assert len(incremental) > 50
+        assert incremental == _referencia_lead(session)
+
+        estancias_service.reconstruir_estancias(session)
+        session.commit()
+        assert _tabla(session) == incremental
+
+    def test_masivo_requiere_reconstruccion(self, session, red):
+        """Test que la escritura masiva no mantiene la tabla y la reconstrucción por paciente sí."""
+        uno, otro = red["pacientes"][:2]
+        medicina = red["servicios"][0]
+        evento_writer.escribir_eventos_masivo(session, [
+            _fila(TipoEventoEnum.CAMA_ASIGNADA, uno, medicina, 0),
+            _fila(TipoEventoEnum.CAMA_ASIGNADA, otro, medicina, 5),
+        ])
+        session.commit()
+        assert session.exec(select(EstanciaServicio)).all() == []
+
+        assert estancias_service.reconstruir_estancias(session, [uno.id]) == 1
+        session.commit()
+        assert [e.paciente_id for e in session.exec(select(EstanciaServicio)).all()] == [uno.id]
+
+
+class TestEstadisticas:
+    """Tests de trazabilidad y tiempos calculados desde estancia_servicio."""
+
+    def test_trazabilidad(self, session, red):
+        """Test que la trazabilidad lee las estancias, con la abierta como 'Actual'."""
+        paciente = red["pacientes"][0]
+        medicina, cirugia, _ = red["servicios"]
+        evento_writer.insertar_filas(session, [
+            _fila(TipoEventoEnum.CAMA_ASIGNADA, paciente, medicina, 0),
+            _fila(TipoEventoEnum.TRASLADO_COMPLETADO, paciente, cirugia, 26 * 60 + 30),
+        ])
+        session.commit()
+
+        trazabilidad = asyncio.run(EstadisticasService.obtener_trazabilidad_paciente(session, paciente.id))
+
+        assert [t["servicio_nombre"] for t in trazabilidad] == ["Medicina", "Cirugía"]
+        assert trazabilidad[0]["salida"] == (T0 + timedelta(minutes=26 * 60 + 30)).isoformat()
+        assert (trazabilidad[0]["duracion_dias"], trazabilidad[0]["duracion_horas"]) == (1, 2)
+        assert trazabilidad[1]["salida"] == "Actual"
+
+    def test_estancia_por_servicio(self, session, red, client):
+        """Test del agregado por servicio y de su endpoint."""
+        medicina, cirugia, _ = red["servicios"]
+        filas = []
+        for i, paciente in enumerate(red["pacientes"][:3]):
+            filas += [
+                _fila(TipoEventoEnum.CAMA_ASIGNADA, paciente, medicina, 0),
+                _fila(TipoEventoEnum.TRASLADO_COMPLETADO, paciente, cirugia, 60 * (i + 1)),
+            ]
+        evento_writer.insertar_filas(session, filas)
+        session.commit()
+
+        resultado = asyncio.run(EstadisticasService.calcular_estancia_servicios(
+            session, fecha_inicio=T0, fecha_fin=T0 + timedelta(days=1)
+        ))
+        assert resultado == [{
+            "servicio_id": medicina.id, "servicio_nombre": "Medicina", "hospital_id": red["hospital"].id,
+            "promedio": 7200.0, "maximo": 10800.0, "minimo": 3600.0, "cantidad": 3,
+        }]
+
+        response = client.get("/api/estadisticas/tiempos/estancia-servicio", params={"dias": 10000})
+        assert response.status_code == 200
+        assert [r["cantidad"] for r in response.json()] == [3]
+
+    def test_hospitalizacion_casos_especiales(self, session, red):
+        """Test que el filtro por casos especiales en SQL coincide con el filtro por paciente."""
+        casos = [None, "[]", json.dumps(["caso social"]), "no es json"]
+        filas = []
+        for i, paciente in enumerate(red["pacientes"]):
+            paciente.casos_especiales = casos[i % len(casos)]
+            session.add(paciente)
+            filas += [
+                _fila(TipoEventoEnum.INGRESO_URGENCIA, paciente, minutos=i),
+                _fila(TipoEventoEnum.ALTA_COMPLETADA, paciente, minutos=100 + 10 * i),
+            ]
+        evento_writer.insertar_filas(session, filas)
+        session.commit()
+
+        fin = T0 + timedelta(days=1)
+        metrica = METRICAS_DURACION["hospitalizacion"]
+        for solo in (True, False):
+            esperadas = sorted(
+                par.duracion for par in motor_duraciones.obtener_pares(session, metrica, T0, fin)
+                if session.get(Paciente, par.paciente_id).tiene_casos_especiales() == solo
+            )
+            resumen = asyncio.run(EstadisticasService.calcular_tiempo_hospitalizacion(
+                session, solo_casos_especiales=solo, fecha_inicio=T0, fecha_fin=fin, percentiles=[50]
+            ))
+            assert resumen["cantidad"] == len(esperadas) > 0
+            assert resumen["maximo"] == pytest.approx(esperadas[-1])
+            assert resumen["minimo"] == pytest.approx(esperadas[0])
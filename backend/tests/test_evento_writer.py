@@ -0,0 +1,319 @@
+"""
+Tests para el escritor de eventos por lotes.
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.models.evento_paciente import EventoPaciente
+from app.models.enums import EstadoCamaEnum, TipoEventoEnum
+from app.services.evento_service import EventoService
+from app.services.evento_writer import (
+    ColaEventos,
+    construir_fila_evento,
+    escribir_eventos_masivo,
+    escritor_eventos,
+)
+
+
+@pytest.fixture
+def contar_inserts(engine):
+    """Cuenta las sentencias INSERT sobre evento_paciente."""
+    sentencias = []
+
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO evento_paciente"):
+            sentencias.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _antes)
+    yield sentencias
+    event.remove(engine, "before_cursor_execute", _antes)
+
+
+@pytest.fixture
+def paciente_en_cama(session, hospital_con_camas, crear_paciente):
+    """Paciente con cama asignada."""
+    cama = hospital_con_camas["camas"][0]
+    paciente = crear_paciente(hospital_con_camas["hospital"].id, cama_id=cama.id)
+    return paciente, hospital_con_camas
+
+
+class TestEscritorEventos:
+    """Tests del modo transaccional."""
+
+    def test_eventos_de_una_peticion_en_un_insert(self, session, paciente_en_cama, contar_inserts):
+        """Test que varios eventos se insertan en una sola sentencia al confirmar."""
+        paciente, datos = paciente_en_cama
+        origen, destino = datos["camas"][0].id, datos["camas"][1].id
+
+        asyncio.run(EventoService.registrar_traslado_iniciado(session, paciente, origen, destino))
+        asyncio.run(EventoService.registrar_traslado_confirmado(session, paciente, origen, destino))
+        asyncio.run(EventoService.registrar_traslado_completado(session, paciente, origen, destino))
+
+        assert session.exec(select(EventoPaciente)).all() == []
+        session.commit()
+
+        assert len(contar_inserts) == 1
+        eventos = session.exec(select(EventoPaciente)).all()
+        assert len(eventos) == 3
+        assert {e.servicio_origen_id for e in eventos} == {datos["servicio"].id}
+        assert all(e.dia_clinico is not None for e in eventos)
+
+    def test_rollback_descarta_pendientes(self, session, paciente_en_cama):
+        """Test que los eventos pendientes se descartan en rollback."""
+        paciente, datos = paciente_en_cama
+
+        asyncio.run(EventoService.registrar_alta_iniciada(session, paciente, datos["camas"][0].id, "mejoría"))
+        session.rollback()
+        session.commit()
+
+        assert session.exec(select(EventoPaciente)).all() == []
+
+    def test_paciente_nuevo_en_la_misma_transaccion(self, session, hospital_con_camas):
+        """Test que el flush previo inserta el paciente antes que sus eventos."""
+        from app.models.paciente import Paciente
+        from app.models.enums import (
+            SexoEnum, EdadCategoriaEnum, TipoEnfermedadEnum, TipoAislamientoEnum,
+            ComplejidadEnum, TipoPacienteEnum,
+        )
+
+        paciente = Paciente(
+            nombre="Nuevo", run="2-7", edad=30, es_embarazada=False, diagnostico="Dx",
+            sexo=SexoEnum.MUJER, edad_categoria=EdadCategoriaEnum.ADULTO,
+            tipo_enfermedad=TipoEnfermedadEnum.MEDICA, tipo_aislamiento=TipoAislamientoEnum.NINGUNO,
+            complejidad_requerida=ComplejidadEnum.BAJA, tipo_paciente=TipoPacienteEnum.URGENCIA,
+            hospital_id=hospital_con_camas["hospital"].id,
+        )
+        session.add(paciente)
+        escritor_eventos(session).agregar(
+            TipoEventoEnum.INGRESO_URGENCIA, paciente.id, paciente.hospital_id,
+            metadata={"diagnostico": "Dx"},
+        )
+        session.commit()
+
+        evento = session.exec(select(EventoPaciente)).one()
+        assert evento.paciente_id == paciente.id
+        assert evento.get_metadata() == {"diagnostico": "Dx"}
+
+    def test_servicio_de_cama_sin_consultas_repetidas(self, session, paciente_en_cama, engine):
+        """Test que el servicio de una cama se resuelve una sola vez por sesión."""
+        _, datos = paciente_en_cama
+        escritor = escritor_eventos(session)
+        cama_id = datos["camas"][0].id
+
+        assert escritor.servicio_de_cama(cama_id) == datos["servicio"].id
+
+        consultas = []
+
+        def _antes(conn, cursor, statement, *args):
+            consultas.append(statement)
+
+        event.listen(engine, "before_cursor_execute", _antes)
+        try:
+            assert escritor.servicio_de_cama(cama_id) == datos["servicio"].id
+        finally:
+            event.remove(engine, "before_cursor_execute", _antes)
+        assert consultas == []
+
+
+class TestFlujos:
+    """Tests de los eventos que registran los flujos clínicos."""
+
+    def _tipos(self, session):
+        eventos = session.exec(select(EventoPaciente).order_by(EventoPaciente.timestamp)).all()
+        return [e.tipo_evento for e in eventos]
+
+    def test_traslado_y_alta_registran_eventos(self, session, paciente_en_cama):
+        """Test que búsqueda, asignación, traslado y alta dejan su rastro en la misma transacción."""
+        from app.services.alta_service import AltaService
+        from app.services.asignacion_service import AsignacionService
+        from app.services.traslado_service import TrasladoService
+
+        paciente, datos = paciente_en_cama
+        origen, destino = datos["camas"][0], datos["camas"][1]
+        origen.estado = EstadoCamaEnum.OCUPADA
+        session.add(origen)
+        session.commit()
+
+        AsignacionService(session).iniciar_busqueda_cama(paciente.id)
+        AsignacionService(session).asignar_cama(paciente.id, destino.id)
+        TrasladoService(session).completar_traslado(paciente.id)
+        AltaService(session).iniciar_alta(paciente.id)
+        AltaService(session).ejecutar_alta(paciente.id)
+
+        # CAMA_EN_ESPERA_INICIO solo si el paciente no es compatible al llegar
+        tipos = [t for t in self._tipos(session) if t != TipoEventoEnum.CAMA_EN_ESPERA_INICIO]
+        assert tipos == [
+            TipoEventoEnum.TRASLADO_INICIADO,
+            TipoEventoEnum.BUSQUEDA_CAMA_INICIADA,
+            TipoEventoEnum.CAMA_ASIGNADA,
+            TipoEventoEnum.TRASLADO_COMPLETADO,
+            TipoEventoEnum.ALTA_INICIADA,
+            TipoEventoEnum.ALTA_COMPLETADA,
+            TipoEventoEnum.EGRESO_ALTA,
+        ]
+        completado = session.exec(
+            select(EventoPaciente).where(EventoPaciente.tipo_evento == TipoEventoEnum.TRASLADO_COMPLETADO)
+        ).one()
+        assert (completado.cama_origen_id, completado.cama_destino_id) == (origen.id, destino.id)
+        assert completado.servicio_destino_id == datos["servicio"].id
+
+    def test_derivacion_registra_solicitud_y_rechazo(
+        self, session, paciente_en_cama, crear_hospital, crear_servicio, crear_sala, crear_cama,
+    ):
+        """Test que la solicitud y el rechazo se registran en el hospital de origen."""
+        from app.services.derivacion_service import DerivacionService
+
+        paciente, datos = paciente_en_cama
+        destino = crear_hospital(nombre="Destino", codigo="DE")
+        sala = crear_sala(crear_servicio(destino.id, codigo="MD").id)
+        crear_cama(sala.id, numero=1, identificador="MD-1")
+        servicio = DerivacionService(session)
+        assert servicio.solicitar_derivacion(paciente.id, destino.id, "Complejidad").exito
+        servicio.rechazar_derivacion(paciente.id, "Sin cupo")
+
+        eventos = session.exec(select(EventoPaciente).order_by(EventoPaciente.timestamp)).all()
+        assert [e.tipo_evento for e in eventos] == [
+            TipoEventoEnum.DERIVACION_SOLICITADA, TipoEventoEnum.DERIVACION_RECHAZADA,
+        ]
+        assert {(e.hospital_id, e.hospital_destino_id) for e in eventos} == {
+            (datos["hospital"].id, destino.id)
+        }
+
+    def test_registrar_evento_devuelve_la_fila(self, session, paciente_en_cama):
+        """Test que registrar_evento devuelve la fila pendiente, no un modelo sin persistir."""
+        paciente, datos = paciente_en_cama
+
+        fila = asyncio.run(EventoService.registrar_asignacion_cama(session, paciente, datos["camas"][1].id))
+        session.commit()
+
+        assert fila["tipo_evento"] == TipoEventoEnum.CAMA_ASIGNADA
+        assert session.get(EventoPaciente, fila["id"]) is not None
+
+
+class TestEscrituraMasiva:
+    """Tests de escritura masiva para backfills."""
+
+    def test_escribe_en_lotes(self, session, paciente_en_cama, contar_inserts):
+        """Test que el backfill escribe por lotes del tamaño indicado."""
+        paciente, _ = paciente_en_cama
+        filas = (
+            construir_fila_evento(TipoEventoEnum.CAMA_ASIGNADA, paciente.id, paciente.hospital_id)
+            for _ in range(25)
+        )
+
+        assert escribir_eventos_masivo(session, filas, tamano_lote=10) == 25
+        session.commit()
+
+        assert len(contar_inserts) == 3
+        assert len(session.exec(select(EventoPaciente)).all()) == 25
+
+
+class TestColaEventos:
+    """Tests del modo asíncrono con cola acotada."""
+
+    def test_consumidor_escribe_todo_al_detener(self, engine, session, paciente_en_cama):
+        """Test que detener() escribe lo encolado en lotes durables."""
+        paciente, _ = paciente_en_cama
+        cola = ColaEventos(
+            tamano_maximo=5, lote_maximo=4, intervalo_segundos=0.01,
+            session_factory=lambda: Session(engine),
+        )
+
+        async def flujo():
+            await cola.iniciar()
+            for _ in range(10):
+                await cola.encolar(construir_fila_evento(
+                    TipoEventoEnum.BUSQUEDA_CAMA_INICIADA, paciente.id, paciente.hospital_id,
+                ))
+            await cola.detener()
+
+        asyncio.run(flujo())
+
+        assert cola.escritos == 10
+        assert cola.desbordados == 0
+        assert len(session.exec(select(EventoPaciente)).all()) == 10
+
+    def test_lote_fallido_se_reintenta_sin_descartar(self, engine, session, paciente_en_cama, tmp_path, monkeypatch):
+        paciente, _ = paciente_en_cama
+        monkeypatch.setattr(settings, "EVENTOS_REINTENTO_MAX_SEGUNDOS", 0.01)
+        fallos = {"restantes": 5}
+
+        def sesion():
+            if fallos["restantes"]:
+                fallos["restantes"] -= 1
+                raise ConnectionError("base de datos no disponible")
+            return Session(engine)
+
+        cola = ColaEventos(
+            tamano_maximo=5, lote_maximo=4, intervalo_segundos=0.01,
+            session_factory=sesion, directorio_desborde=str(tmp_path),
+        )
+
+        async def flujo():
+            await cola.iniciar()
+            for _ in range(6):
+                await cola.encolar(construir_fila_evento(
+                    TipoEventoEnum.BUSQUEDA_CAMA_INICIADA, paciente.id, paciente.hospital_id,
+                ))
+            await cola.detener()
+
+        asyncio.run(flujo())
+
+        assert cola.reintentos == 5
+        assert (cola.escritos, cola.desbordados) == (6, 0)
+        assert len(session.exec(select(EventoPaciente)).all()) == 6
+
+    def test_desborda_al_detener_y_reproduce_al_iniciar(self, engine, session, paciente_en_cama, tmp_path, monkeypatch):
+        paciente, _ = paciente_en_cama
+        monkeypatch.setattr(settings, "EVENTOS_REINTENTO_MAX_SEGUNDOS", 0.01)
+        disponible = {"valor": False}
+
+        def sesion():
+            if not disponible["valor"]:
+                raise ConnectionError("base de datos no disponible")
+            return Session(engine)
+
+        def nueva_cola():
+            return ColaEventos(
+                tamano_maximo=10, lote_maximo=4, intervalo_segundos=0.01,
+                session_factory=sesion, directorio_desborde=str(tmp_path),
+            )
+
+        filas = [
+            construir_fila_evento(TipoEventoEnum.BUSQUEDA_CAMA_INICIADA, paciente.id, paciente.hospital_id)
+            for _ in range(7)
+        ]
+        cola = nueva_cola()
+
+        async def caida():
+            await cola.iniciar()
+            for fila in filas:
+                await cola.encolar(fila)
+            await cola.detener(espera_segundos=0.1)
+
+        asyncio.run(caida())
+
+        assert (cola.escritos, cola.desbordados) == (0, 7)
+        assert len(list(tmp_path.glob("*.jsonl"))) == 1
+        assert session.exec(select(EventoPaciente)).all() == []
+
+        disponible["valor"] = True
+        siguiente = nueva_cola()
+
+        async def reinicio():
+            await siguiente.iniciar()
+            while not siguiente.reproducidos:
+                await asyncio.sleep(0.01)
+            await siguiente.detener()
+
+        asyncio.run(asyncio.wait_for(reinicio(), timeout=5))
+
+        assert siguiente.reproducidos == 7
+        assert list(tmp_path.glob("*.jsonl")) == []
+        escritos = session.exec(select(EventoPaciente)).all()
+        assert sorted(e.id for e in escritos) == sorted(f["id"] for f in filas)
+        assert all(e.tipo_evento == TipoEventoEnum.BUSQUEDA_CAMA_INICIADA for e in escritos)
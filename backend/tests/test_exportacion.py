@@ -0,0 +1,185 @@
+"""
+Tests para la exportación masiva de eventos y estancias.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session
+
+from app.core.exceptions import ValidationError
+from app.models.enums import TipoEventoEnum
+from app.services.evento_writer import construir_fila_evento, escribir_eventos_masivo
+from app.services.exportacion_service import exportar
+
+
+BASE = datetime(2025, 3, 1, 8, 0)
+
+
+class SesionRegistrada(Session):
+    """Sesión que registra si fue cerrada."""
+    cerradas = 0
+
+    def close(self):
+        SesionRegistrada.cerradas += 1
+        super().close()
+
+
+@pytest.fixture
+def fabrica(engine):
+    SesionRegistrada.cerradas = 0
+    return lambda: SesionRegistrada(engine)
+
+
+@pytest.fixture
+def recorridos(session, hospital_con_camas, crear_servicio, crear_paciente):
+    """Dos pacientes: uno pasa por dos servicios y se va de alta, otro sigue hospitalizado."""
+    hospital = hospital_con_camas["hospital"]
+    medicina = hospital_con_camas["servicio"]
+    uci = crear_servicio(hospital.id, nombre="UCI", codigo="UCI")
+    uno = crear_paciente(hospital.id, run="1-9").id
+    dos = crear_paciente(hospital.id, run="2-7").id
+
+    filas = [
+        construir_fila_evento(TipoEventoEnum.INGRESO_URGENCIA, uno, hospital.id, timestamp=BASE),
+        construir_fila_evento(
+            TipoEventoEnum.CAMA_ASIGNADA, uno, hospital.id,
+            servicio_destino_id=medicina.id, timestamp=BASE + timedelta(hours=1),
+        ),
+        construir_fila_evento(
+            TipoEventoEnum.TRASLADO_COMPLETADO, uno, hospital.id,
+            servicio_origen_id=medicina.id, servicio_destino_id=uci.id, timestamp=BASE + timedelta(hours=25),
+        ),
+        construir_fila_evento(
+            TipoEventoEnum.ALTA_COMPLETADA, uno, hospital.id,
+            servicio_origen_id=uci.id, timestamp=BASE + timedelta(hours=73),
+        ),
+        construir_fila_evento(
+            TipoEventoEnum.CAMA_ASIGNADA, dos, hospital.id,
+            servicio_destino_id=uci.id, timestamp=BASE + timedelta(hours=2),
+        ),
+    ]
+    escribir_eventos_masivo(session, filas)
+    session.commit()
+    return {"filas": filas, "medicina": medicina, "uci": uci, "uno": uno, "dos": dos}
+
+
+def _leer_csv(bloques):
+    return list(csv.DictReader(io.StringIO(b"".join(bloques).decode("utf-8"))))
+
+
+class TestEventos:
+    """Tests de exportación de eventos."""
+
+    def test_csv_por_lotes_igual_a_lote_unico(self, recorridos, fabrica):
+        """Test que el tamaño de lote no cambia el resultado y cada lote es un bloque."""
+        bloques = list(exportar("eventos", "csv", BASE, BASE + timedelta(days=5), session_factory=fabrica, tamano_lote=2))
+        unico = list(exportar("eventos", "csv", BASE, BASE + timedelta(days=5), session_factory=fabrica))
+
+        assert len(bloques) == 3
+        assert b"".join(bloques) == b"".join(unico)
+        filas = _leer_csv(bloques)
+        assert [f["id"] for f in filas] == [
+            f["id"] for f in sorted(recorridos["filas"], key=lambda f: (f["timestamp"], f["id"]))
+        ]
+        assert filas[0]["tipo_evento"] == "INGRESO_URGENCIA"
+        assert filas[0]["timestamp"] == BASE.isoformat()
+
+    def test_rango_y_hospital(self, recorridos, hospital_con_camas, fabrica):
+        """Test filtro de rango semiabierto y de hospital."""
+        hospital_id = hospital_con_camas["hospital"].id
+
+        filas = _leer_csv(exportar(
+            "eventos", "csv", BASE + timedelta(hours=1), BASE + timedelta(hours=25), hospital_id,
+            session_factory=fabrica,
+        ))
+        otro = _leer_csv(exportar("eventos", "csv", BASE, None, "otro-hospital", session_factory=fabrica))
+
+        assert [f["tipo_evento"] for f in filas] == ["CAMA_ASIGNADA", "CAMA_ASIGNADA"]
+        assert otro == []
+
+    def test_sesion_se_cierra_al_agotar_o_abandonar(self, recorridos, fabrica):
+        """Test que la sesión se abre al consumir y se cierra al terminar o al abandonar."""
+        bloques = exportar("eventos", "ndjson", BASE, None, session_factory=fabrica, tamano_lote=1)
+        assert SesionRegistrada.cerradas == 0
+
+        primero = next(bloques)
+        bloques.close()
+
+        assert json.loads(primero)["tipo_evento"] == "INGRESO_URGENCIA"
+        assert SesionRegistrada.cerradas == 1
+
+    def test_validacion(self):
+        """Test que tipo y formato se validan antes de leer."""
+        with pytest.raises(ValidationError):
+            exportar("eventos", "xlsx", None, None)
+        with pytest.raises(ValidationError):
+            exportar("camas", "csv", None, None)
+
+
+class TestEstancias:
+    """Tests de estancias por servicio."""
+
+    def test_estancias_ndjson(self, recorridos, fabrica):
+        """Test que las estancias se cierran con la siguiente llegada o salida."""
+        lineas = b"".join(exportar("estancias", "ndjson", BASE, None, session_factory=fabrica)).splitlines()
+        estancias = [json.loads(linea) for linea in lineas]
+
+        por_paciente = {}
+        for estancia in estancias:
+            por_paciente.setdefault(estancia["paciente_id"], []).append(estancia)
+        medicina, uci = por_paciente[recorridos["uno"]]
+        (en_curso,) = por_paciente[recorridos["dos"]]
+
+        assert (medicina["servicio_nombre"], medicina["duracion_segundos"]) == ("Medicina", 24 * 3600)
+        assert uci["tipo_salida"] == "ALTA_COMPLETADA"
+        assert uci["duracion_segundos"] == 48 * 3600
+        assert en_curso["servicio_id"] == recorridos["uci"].id
+        assert en_curso["salida"] is None and en_curso["duracion_segundos"] is None
+
+    def test_salida_fuera_del_rango(self, recorridos, fabrica):
+        """Test que una estancia iniciada en el rango conserva su salida posterior."""
+        filas = _leer_csv(exportar("estancias", "csv", BASE, BASE + timedelta(hours=3), session_factory=fabrica))
+
+        assert len(filas) == 2
+        medicina = next(f for f in filas if f["paciente_id"] == recorridos["uno"])
+        assert medicina["salida"] == (BASE + timedelta(hours=25)).isoformat()
+
+    def test_parquet(self, recorridos, fabrica):
+        """Test exportación parquet con un row group por lote."""
+        pq = pytest.importorskip("pyarrow.parquet")
+
+        datos = b"".join(exportar("estancias", "parquet", BASE, None, session_factory=fabrica, tamano_lote=2))
+        archivo = pq.ParquetFile(io.BytesIO(datos))
+
+        assert archivo.metadata.num_rows == 3
+        assert archivo.num_row_groups == 2
+        assert sorted(archivo.read().column("duracion_segundos").to_pylist(), key=str) == [
+            172800.0, 86400.0, None,
+        ]
+
+
+class TestEndpoint:
+    """Tests del endpoint /api/exportacion."""
+
+    def test_descarga_csv(self, client, recorridos, fabrica):
+        """Test que el endpoint transmite el CSV como adjunto."""
+        from app.api.exportacion import get_fabrica_sesiones
+        from app.core.auth_dependencies import get_current_user
+        from app.models.usuario import Usuario, RolEnum
+        from main import app
+
+        directivo = Usuario(username="d", email="d@x.cl", nombre_completo="D", rol=RolEnum.DIRECTIVO_RED)
+        app.dependency_overrides[get_current_user] = lambda: directivo
+        app.dependency_overrides[get_fabrica_sesiones] = lambda: fabrica
+
+        response = client.get("/api/exportacion/eventos", params={"fecha_inicio": BASE.isoformat(), "dias": 1})
+        invalido = client.get("/api/exportacion/eventos", params={"formato": "xlsx"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert "attachment" in response.headers["content-disposition"]
+        assert len(_leer_csv([response.content])) == 5
+        assert invalido.status_code == 400
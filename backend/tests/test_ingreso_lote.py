@@ -0,0 +1,157 @@
+"""
+Tests del ingreso masivo de pacientes: validación por fila, inserción en
+una transacción, encolado en bloque y notificación agregada por hospital.
+"""
+import json
+
+import pytest
+from sqlmodel import select
+
+from app.config import settings
+from app.core.principal import Principal
+from app.models.outbox import NotificacionOutbox
+from app.models.paciente import Paciente
+from app.models.usuario import RolEnum, Usuario
+from app.services.ingreso_service import IngresoLoteService
+from app.services.prioridad_service import gestor_colas_global
+
+
+def _fila(hospital_id, run, **extra):
+    return {
+        "nombre": f"Paciente {run}",
+        "run": run,
+        "sexo": "HOMBRE",
+        "edad": 45,
+        "diagnostico": "Dolor torácico",
+        "tipo_enfermedad": "MEDICA",
+        "tipo_paciente": "URGENCIA",
+        "hospital_id": hospital_id,
+        **extra,
+    }
+
+
+def _usuario(rol=RolEnum.PROGRAMADOR, hospital_id=None):
+    return Usuario(
+        username="u", email="u@test.cl", hashed_password="x", nombre_completo="U",
+        rol=rol, hospital_id=hospital_id,
+    )
+
+
+@pytest.fixture
+def hospitales(crear_hospital):
+    return crear_hospital(nombre="Norte", codigo="NO"), crear_hospital(nombre="Sur", codigo="SU")
+
+
+@pytest.fixture
+def como():
+    from main import app
+    from app.core.auth_dependencies import get_current_user
+
+    def _como(usuario):
+        app.dependency_overrides[get_current_user] = lambda: Principal.desde_usuario(usuario)
+    return _como
+
+
+@pytest.fixture
+def colas_limpias():
+    gestor_colas_global.reemplazar({})
+    yield gestor_colas_global
+    gestor_colas_global.reemplazar({})
+
+
+class TestIngresoLote:
+    """Tests del endpoint /pacientes/lote."""
+
+    def test_inserta_validos_y_reporta_errores_por_fila(self, client, session, hospitales, como, colas_limpias):
+        norte, sur = hospitales
+        como(_usuario())
+        filas = [
+            _fila(norte.id, "11111111-1", requerimientos_uci=["vmi"]),
+            _fila(norte.id, "22222222-2"),
+            _fila(sur.id, "33333333-3", tipo_paciente="HOSPITALIZADO"),
+            _fila(sur.id, "44444444-4", edad=300),
+            _fila(sur.id, "55555555-5"),
+            _fila(norte.id, "22222222-2"),
+            _fila("no-existe", "66666666-6"),
+        ]
+
+        response = client.post("/api/pacientes/lote", json={"pacientes": filas})
+
+        assert response.status_code == 200
+        datos = response.json()
+        assert (datos["total"], datos["creados"], datos["errores"]) == (7, 3, 4)
+        assert datos["por_hospital"] == {norte.id: 2, sur.id: 1}
+        resultados = datos["resultados"]
+        assert [r["indice"] for r in resultados] == list(range(7))
+        assert [r["exito"] for r in resultados] == [True, True, False, False, True, False, False]
+        assert "Urgencia o Ambulatorio" in resultados[2]["error"]
+        assert resultados[3]["error"].startswith("edad:")
+        assert "repetido" in resultados[5]["error"]
+        assert resultados[6]["error"] == "Hospital no encontrado"
+
+        pacientes = {p.run: p for p in session.exec(select(Paciente)).all()}
+        assert set(pacientes) == {"11111111-1", "22222222-2", "55555555-5"}
+        critico = pacientes["11111111-1"]
+        assert critico.en_lista_espera and critico.complejidad_requerida.value == "ALTA"
+        assert critico.prioridad_calculada == resultados[0]["prioridad"] > pacientes["22222222-2"].prioridad_calculada
+
+        cola = gestor_colas_global.obtener_cola(norte.id)
+        assert cola.obtener_siguiente() == critico.id
+        assert cola.tamano() == 2
+
+        mensajes = [json.loads(n.payload) for n in session.exec(select(NotificacionOutbox)).all()]
+        assert sorted((m["tipo"], m["hospital_id"], m["cantidad"]) for m in mensajes) == sorted([
+            ("pacientes_creados", norte.id, 2), ("pacientes_creados", sur.id, 1),
+        ])
+
+    def test_permisos_por_hospital(self, client, hospitales, como, colas_limpias):
+        norte, sur = hospitales
+        como(_usuario(RolEnum.URGENCIAS, hospital_id="NO"))
+
+        response = client.post("/api/pacientes/lote", json={"pacientes": [
+            _fila(norte.id, "11111111-1"), _fila(sur.id, "22222222-2"),
+        ]})
+
+        resultados = response.json()["resultados"]
+        assert resultados[0]["exito"]
+        assert resultados[1]["error"] == "No tienes permisos para registrar pacientes en Sur"
+
+    def test_sin_permiso_de_creacion(self, client, hospitales, como):
+        como(_usuario(RolEnum.VISUALIZADOR))
+        response = client.post("/api/pacientes/lote", json={"pacientes": [_fila(hospitales[0].id, "11111111-1")]})
+        assert response.status_code == 403
+
+    def test_lote_demasiado_grande(self, client, hospitales, como, monkeypatch):
+        como(_usuario())
+        monkeypatch.setattr(settings, "PACIENTES_LOTE_MAX", 1)
+        filas = [_fila(hospitales[0].id, "11111111-1"), _fila(hospitales[0].id, "22222222-2")]
+        assert client.post("/api/pacientes/lote", json={"pacientes": filas}).status_code == 413
+
+
+class TestInsercionAislada:
+    """Tests del reintento por fila cuando falla el flush conjunto."""
+
+    def test_una_fila_que_falla_al_guardar_no_anula_el_resto(self, session, hospitales, colas_limpias):
+        norte, _ = hospitales
+        servicio = IngresoLoteService(session)
+        # Fuerza un choque de clave primaria en la segunda fila
+        original = servicio.prioridad.calcular_prioridad
+        ids = iter(["fijo", "fijo", None])
+
+        def calcular(paciente, *args):
+            fijo = next(ids)
+            if fijo:
+                paciente.id = fijo
+            return original(paciente, *args)
+
+        servicio.prioridad.calcular_prioridad = calcular
+
+        resultado = servicio.ingresar(
+            [_fila(norte.id, "11111111-1"), _fila(norte.id, "22222222-2"), _fila(norte.id, "33333333-3")],
+            _usuario(),
+        )
+
+        assert [r.exito for r in resultado.resultados] == [True, False, True]
+        assert resultado.resultados[1].error.startswith("Error al guardar")
+        assert {p.run for p in session.exec(select(Paciente)).all()} == {"11111111-1", "33333333-3"}
+        assert gestor_colas_global.obtener_cola(norte.id).tamano() == 2
@@ -0,0 +1,118 @@
+"""
+Tests para el motor de duraciones en SQL, contrastado con la referencia en Python.
+"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import analitica_duraciones
+from app.services.evento_writer import construir_fila_evento, escribir_eventos_masivo
+from app.services.motor_duraciones import (
+    METRICAS_DURACION,
+    emparejar_duraciones,
+    obtener_pares,
+    resumir_duraciones,
+)
+
+
+BASE = datetime(2025, 3, 1, 8, 0)
+
+
+@pytest.fixture
+def eventos_aleatorios(session, hospital_con_camas, crear_hospital, crear_paciente):
+    """Secuencias aleatorias (con empates de timestamp) de todas las métricas."""
+    hospitales = [hospital_con_camas["hospital"].id, crear_hospital(nombre="Otro", codigo="OT").id]
+    pacientes = [crear_paciente(hospitales[0], run=f"{n}-9").id for n in range(8)]
+    tipos = sorted({t for m in METRICAS_DURACION.values() for t in m.tipos}, key=lambda t: t.value)
+
+    azar = random.Random(31)
+    filas = []
+    for paciente_id in pacientes:
+        minuto = 0
+        for _ in range(60):
+            # Avances de 0 minutos generan empates resueltos por id
+            minuto += azar.choice((0, 1, 7, 45, 300))
+            filas.append(construir_fila_evento(
+                azar.choice(tipos),
+                paciente_id,
+                azar.choice(hospitales),
+                timestamp=BASE + timedelta(minutes=minuto),
+            ))
+    escribir_eventos_masivo(session, filas)
+    session.commit()
+    return filas
+
+
+def _referencia(filas, metrica, fecha_inicio=None, fecha_fin=None):
+    ordenadas = sorted(filas, key=lambda f: (f["paciente_id"], f["timestamp"], f["id"]))
+    eventos = [type("Evento", (), fila) for fila in ordenadas]
+    return {
+        evento.id: segundos
+        for evento, segundos in emparejar_duraciones(eventos, metrica)
+        if (fecha_inicio is None or evento.timestamp >= fecha_inicio)
+        and (fecha_fin is None or evento.timestamp < fecha_fin)
+    }
+
+
+class TestEquivalencia:
+    """Tests SQL (LAG / SUM OVER) contra la implementación de referencia."""
+
+    @pytest.mark.parametrize("nombre", sorted(METRICAS_DURACION))
+    def test_pares_iguales_a_referencia(self, session, eventos_aleatorios, nombre):
+        """Test que cada métrica empareja los mismos cierres con la misma duración."""
+        metrica = METRICAS_DURACION[nombre]
+        fecha_inicio, fecha_fin = BASE + timedelta(hours=20), BASE + timedelta(days=4)
+
+        esperado = _referencia(eventos_aleatorios, metrica, fecha_inicio, fecha_fin)
+        obtenido = {
+            fila.id: fila.duracion
+            for fila in obtener_pares(session, metrica, fecha_inicio, fecha_fin)
+        }
+
+        assert esperado
+        assert obtenido == pytest.approx(esperado)
+
+    def test_filtro_hospital_en_metrica_por_hospital(self, session, eventos_aleatorios, hospital_con_camas):
+        """Test que hospitalización empareja dentro del hospital filtrado."""
+        metrica = METRICAS_DURACION["hospitalizacion"]
+        hospital_id = hospital_con_camas["hospital"].id
+        propias = [f for f in eventos_aleatorios if f["hospital_id"] == hospital_id]
+
+        obtenido = {f.id: f.duracion for f in obtener_pares(session, metrica, hospital_id=hospital_id)}
+
+        assert obtenido == pytest.approx(_referencia(propias, metrica))
+
+
+class TestResumen:
+    """Tests de agregados y percentiles."""
+
+    def test_resumen_y_percentiles(self, session, eventos_aleatorios):
+        """Test agregados y percentiles con interpolación lineal."""
+        metrica = METRICAS_DURACION["espera_cama"]
+        duraciones = sorted(_referencia(eventos_aleatorios, metrica).values())
+
+        resumen = resumir_duraciones(session, metrica)
+        percentiles = analitica_duraciones.percentiles_metrica(
+            session, "espera_cama", None, None, (0, 50, 90, 100)
+        )
+
+        assert resumen["cantidad"] == len(duraciones)
+        assert resumen["suma"] == pytest.approx(sum(duraciones))
+        assert resumen["minimo"] == pytest.approx(duraciones[0])
+        assert resumen["maximo"] == pytest.approx(duraciones[-1])
+        k = (len(duraciones) - 1) * 0.9
+        p90 = duraciones[int(k)] + (duraciones[int(k) + 1] - duraciones[int(k)]) * (k - int(k))
+        assert percentiles["p50"] == pytest.approx(
+            duraciones[(len(duraciones) - 1) // 2] if len(duraciones) % 2 else
+            (duraciones[len(duraciones) // 2 - 1] + duraciones[len(duraciones) // 2]) / 2
+        )
+        assert percentiles["p90"] == pytest.approx(p90)
+        assert percentiles["p100"] == pytest.approx(duraciones[-1])
+
+    def test_sin_eventos(self, session):
+        """Test resumen vacío."""
+        resumen = resumir_duraciones(session, METRICAS_DURACION["fallecido"])
+
+        assert resumen["cantidad"] == 0
+        assert resumen["maximo"] is None
@@ -0,0 +1,122 @@
+"""
+Tests para los contadores de ocupación por servicio.
+"""
+import asyncio
+import random
+
+from sqlalchemy import text
+
+from app.models.enums import EstadoCamaEnum
+from app.services import ocupacion_service
+from app.services.estadisticas_service import EstadisticasService
+
+
+def _contadores(session):
+    return {
+        clave: cantidad
+        for clave, (_, cantidad) in ocupacion_service.contar_desde_camas(session).items()
+    }, {
+        (servicio_id, estado): cantidad
+        for servicio_id, por_estado in ocupacion_service.conteos_por_servicio(session).items()
+        for estado, cantidad in por_estado.items()
+    }
+
+
+class TestMantenimiento:
+    """Tests de actualización en la misma transacción que el cambio de estado."""
+
+    def test_camas_nuevas_y_transiciones(self, session, hospital_con_camas):
+        """Test que crear camas y cambiar su estado actualiza los contadores."""
+        hospital_id = hospital_con_camas["hospital"].id
+        cama = hospital_con_camas["camas"][0]
+        assert ocupacion_service.conteos(session, hospital_id=hospital_id) == {"LIBRE": 4}
+
+        cama.estado = EstadoCamaEnum.OCUPADA
+        session.add(cama)
+        session.commit()
+
+        assert ocupacion_service.conteos(session, hospital_id=hospital_id) == {"LIBRE": 3, "OCUPADA": 1}
+        resumen = asyncio.run(EstadisticasService.calcular_tasa_ocupacion_hospital(session, hospital_id))
+        assert (resumen["tasa_ocupacion"], resumen["camas_ocupadas"], resumen["camas_totales"]) == (25.0, 1, 4)
+
+    def test_valor_anterior_expirado(self, session, hospital_con_camas):
+        """Test que se resta el estado anterior aunque la cama esté expirada tras un commit."""
+        cama = hospital_con_camas["camas"][1]
+        session.expire(cama)
+
+        cama.estado = EstadoCamaEnum.EN_LIMPIEZA
+        session.commit()
+
+        assert ocupacion_service.conteos(session) == {"LIBRE": 3, "EN_LIMPIEZA": 1}
+
+    def test_rollback_descarta_deltas(self, session, hospital_con_camas):
+        """Test que revertir la transacción revierte también los contadores."""
+        cama = hospital_con_camas["camas"][0]
+        cama.estado = EstadoCamaEnum.BLOQUEADA
+        session.add(cama)
+        session.flush()
+        assert ocupacion_service.conteos(session) == {"LIBRE": 3, "BLOQUEADA": 1}
+
+        session.rollback()
+
+        assert ocupacion_service.conteos(session) == {"LIBRE": 4}
+
+    def test_borrado_y_cambio_de_sala(self, session, hospital_con_camas, crear_servicio, crear_sala):
+        """Test que borrar una cama o moverla de servicio mueve sus contadores."""
+        camas = hospital_con_camas["camas"]
+        uci = crear_servicio(hospital_con_camas["hospital"].id, nombre="UCI", codigo="UCI")
+        sala_uci = crear_sala(uci.id, numero=2)
+
+        session.delete(camas[0])
+        camas[1].sala_id = sala_uci.id
+        camas[1].estado = EstadoCamaEnum.OCUPADA
+        session.add(camas[1])
+        session.commit()
+
+        assert ocupacion_service.conteos(session, servicio_id=hospital_con_camas["servicio"].id) == {"LIBRE": 2}
+        assert ocupacion_service.conteos(session, servicio_id=uci.id) == {"OCUPADA": 1}
+
+    def test_transiciones_aleatorias_igual_a_recuento(self, session, hospital_con_camas):
+        """Test que tras muchas transiciones los contadores coinciden con la tabla cama."""
+        azar = random.Random(36)
+        camas = hospital_con_camas["camas"]
+        for _ in range(60):
+            cama = azar.choice(camas)
+            cama.estado = azar.choice(list(EstadoCamaEnum))
+            session.add(cama)
+            if azar.random() < 0.3:
+                session.commit()
+            else:
+                session.flush()
+        session.commit()
+
+        reales, contadores = _contadores(session)
+        assert contadores == reales
+
+
+class TestReconciliacion:
+    """Tests de reconciliación contra la tabla cama."""
+
+    def test_corrige_cambios_fuera_del_orm(self, session, hospital_con_camas):
+        """Test que un UPDATE directo se detecta y se corrige."""
+        session.execute(text("UPDATE cama SET estado = 'OCUPADA'"))
+        session.commit()
+        assert ocupacion_service.conteos(session) == {"LIBRE": 4}
+
+        resultado = ocupacion_service.reconciliar(session)
+
+        assert resultado["corregidos"] == 2
+        assert ocupacion_service.conteos(session) == {"OCUPADA": 4}
+        assert ocupacion_service.reconciliar(session)["corregidos"] == 0
+
+    def test_servicios_subutilizados_desde_contadores(self, session, hospital_con_camas):
+        """Test que servicios subutilizados usa los contadores por servicio."""
+        cama = hospital_con_camas["camas"][0]
+        cama.estado = EstadoCamaEnum.OCUPADA
+        session.add(cama)
+        session.commit()
+
+        (servicio,) = asyncio.run(EstadisticasService.calcular_servicios_subutilizados(session))
+
+        assert servicio["servicio_id"] == hospital_con_camas["servicio"].id
+        assert (servicio["camas_libres"], servicio["camas_totales"], servicio["tasa_libre"]) == (3, 4, 75.0)
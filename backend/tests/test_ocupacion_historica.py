@@ -0,0 +1,239 @@
+"""
+Tests para las series históricas de ocupación (barrido de eventos y caché
+de días cerrados).
+"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import select
+
+from app.core.exceptions import ValidationError
+from app.models.enums import TipoEventoEnum
+from app.models.ocupacion import OcupacionHoraria
+from app.services import ocupacion_historica
+from app.services.evento_writer import construir_fila_evento, escribir_eventos_masivo
+from app.services.ocupacion_historica import BarridoOcupacion, serie_ocupacion
+
+
+BASE = datetime(2025, 3, 3, 8, 0)  # inicio de un día clínico
+AHORA = BASE + timedelta(days=5, hours=6)
+
+LLEGADAS = (TipoEventoEnum.CAMA_ASIGNADA, TipoEventoEnum.TRASLADO_COMPLETADO, TipoEventoEnum.DERIVACION_COMPLETADA)
+SALIDAS = (TipoEventoEnum.ALTA_COMPLETADA, TipoEventoEnum.FALLECIDO_EGRESADO, TipoEventoEnum.DERIVACION_EGRESO_CONFIRMADO)
+
+
+def _filas_por_clave(filas):
+    return {(f["nivel"], f["grupo_id"], f["hora"]): (round(f["promedio"], 6), f["maximo"]) for f in filas}
+
+
+def _ocupacion_referencia(eventos, inicio, fin):
+    """Promedio por hora y servicio sumando solapes de estancias (sin barrido)."""
+    estancias = []
+    actual = {}
+    for paciente_id, tipo, destino, momento in sorted(eventos, key=lambda e: e[3]):
+        if paciente_id in actual:
+            servicio_id, entrada = actual.pop(paciente_id)
+            estancias.append((servicio_id, entrada, momento))
+        if tipo in LLEGADAS and destino:
+            actual[paciente_id] = (destino, momento)
+    estancias.extend((s, entrada, datetime.max) for s, entrada in actual.values())
+
+    promedios = {}
+    hora = inicio
+    while hora < fin:
+        fin_hora = hora + timedelta(hours=1)
+        for servicio_id, entrada, salida in estancias:
+            solape = (min(salida, fin_hora) - max(entrada, hora)).total_seconds()
+            if solape > 0:
+                promedios[(servicio_id, hora)] = promedios.get((servicio_id, hora), 0) + solape / 3600
+        hora = fin_hora
+    return promedios
+
+
+@pytest.fixture
+def red(session, crear_hospital, crear_servicio, crear_paciente):
+    """Dos hospitales con dos servicios cada uno y 30 pacientes."""
+    hospitales = [crear_hospital(nombre=f"Hospital {i}", codigo=f"H{i}") for i in range(2)]
+    servicios = [
+        crear_servicio(h.id, nombre=f"{nombre} {h.codigo}", codigo=f"{codigo}{h.codigo}")
+        for h in hospitales
+        for nombre, codigo in (("Medicina", "MED"), ("Cirugía", "CIR"))
+    ]
+    pacientes = [crear_paciente(hospitales[i % 2].id, run=f"{2000000 + i}-5") for i in range(30)]
+    return {"hospitales": hospitales, "servicios": servicios, "pacientes": pacientes}
+
+
+def _sembrar_eventos(session, red, semilla=38, cantidad=240):
+    """Llegadas, traslados y salidas aleatorias entre BASE - 1 día y AHORA."""
+    azar = random.Random(semilla)
+    eventos = []
+    filas = []
+    rango = int((AHORA - BASE).total_seconds()) + 86400
+    for _ in range(cantidad):
+        paciente = azar.choice(red["pacientes"])
+        momento = BASE - timedelta(days=1) + timedelta(seconds=azar.randint(0, rango - 1))
+        tipo = azar.choice(LLEGADAS + SALIDAS)
+        destino = azar.choice(red["servicios"]).id if tipo in LLEGADAS and azar.random() < 0.95 else None
+        eventos.append((paciente.id, tipo, destino, momento))
+        filas.append(construir_fila_evento(
+            tipo, paciente.id, paciente.hospital_id, servicio_destino_id=destino, timestamp=momento,
+        ))
+    escribir_eventos_masivo(session, filas)
+    session.commit()
+    return eventos
+
+
+class TestBarrido:
+    """Tests del barrido por hora sin base de datos."""
+
+    def test_traslado_entre_servicios(self):
+        """Test que un traslado a media hora reparte el promedio entre servicios."""
+        barrido = BarridoOcupacion(BASE, BASE + timedelta(hours=8), lambda s: "H1")
+        barrido.aplicar("p1", TipoEventoEnum.CAMA_ASIGNADA, "S1", "H1", BASE + timedelta(hours=2))
+        barrido.aplicar("p1", TipoEventoEnum.TRASLADO_COMPLETADO, "S2", "H1", BASE + timedelta(hours=4, minutes=30))
+        barrido.aplicar("p1", TipoEventoEnum.ALTA_COMPLETADA, None, "H1", BASE + timedelta(hours=6))
+        filas = _filas_por_clave(barrido.terminar())
+
+        hora = lambda h: BASE + timedelta(hours=h)
+        assert filas[("servicio", "S1", hora(2))] == (1.0, 1)
+        assert filas[("servicio", "S1", hora(4))] == (0.5, 1)
+        assert filas[("servicio", "S2", hora(4))] == (0.5, 1)
+        assert filas[("servicio", "S2", hora(5))] == (1.0, 1)
+        # El hospital y la red no cambian con un traslado interno
+        assert [filas[("red", "", hora(h))] for h in range(2, 6)] == [(1.0, 1)] * 4
+        assert ("servicio", "S2", hora(6)) not in filas
+        assert ("red", "", hora(1)) not in filas
+
+    def test_pico_dentro_de_la_hora(self):
+        """Test que el máximo registra picos aunque el promedio sea bajo."""
+        barrido = BarridoOcupacion(BASE, BASE + timedelta(hours=1), lambda s: "H1")
+        barrido.ubicar("p1", "S1", "H1", BASE)
+        barrido.aplicar("p2", TipoEventoEnum.CAMA_ASIGNADA, "S1", "H1", BASE + timedelta(minutes=30))
+        barrido.aplicar("p2", TipoEventoEnum.ALTA_COMPLETADA, None, "H1", BASE + timedelta(minutes=36))
+        filas = _filas_por_clave(barrido.terminar())
+
+        assert filas[("servicio", "S1", BASE)] == (1.1, 2)
+        assert filas[("hospital", "H1", BASE)] == (1.1, 2)
+
+    def test_resolucion_invalida(self):
+        """Test que solo se aceptan múltiplos de una hora."""
+        assert ocupacion_historica.parsear_resolucion("6h") == timedelta(hours=6)
+        assert ocupacion_historica.parsear_resolucion("1w") == timedelta(weeks=1)
+        for valor in ("15m", "0d", "", "dia"):
+            with pytest.raises(ValidationError):
+                ocupacion_historica.parsear_resolucion(valor)
+
+
+class TestSerie:
+    """Tests de series contra una reconstrucción independiente."""
+
+    def test_coincide_con_referencia(self, session, red):
+        """Test que el barrido horario coincide con la suma de solapes de estancias."""
+        eventos = _sembrar_eventos(session, red)
+        serie = serie_ocupacion(session, BASE, AHORA, "1h", ahora=AHORA)
+        referencia = _ocupacion_referencia(eventos, BASE, AHORA)
+
+        assert len(serie["inicios"]) == 5 * 24 + 6
+        assert {s["id"] for s in serie["series"]} == {s.id for s in red["servicios"]}
+        for s in serie["series"]:
+            esperado = [referencia.get((s["id"], hora), 0) for hora in serie["inicios"]]
+            assert s["promedio"] == pytest.approx(esperado, abs=1e-3)
+
+    def test_resolucion_diaria_y_niveles(self, session, red):
+        """Test que los días promedian las horas y la red suma los servicios."""
+        _sembrar_eventos(session, red)
+        horaria = serie_ocupacion(session, BASE, AHORA, "1h", ahora=AHORA)
+        diaria = serie_ocupacion(session, BASE, AHORA, "1d", ahora=AHORA)
+        red_diaria = serie_ocupacion(session, BASE, AHORA, "1d", nivel="red", ahora=AHORA)
+
+        assert len(diaria["inicios"]) == 6
+        for por_hora, por_dia in zip(horaria["series"], diaria["series"]):
+            assert por_dia["promedio"][0] == pytest.approx(sum(por_hora["promedio"][:24]) / 24, abs=1e-3)
+            assert por_dia["maximo"][0] == max(por_hora["maximo"][:24])
+            # El último día está abierto: 6 horas transcurridas
+            assert por_dia["promedio"][5] == pytest.approx(sum(por_hora["promedio"][120:]) / 6, abs=1e-3)
+        total = [sum(s["promedio"][i] for s in diaria["series"]) for i in range(6)]
+        assert red_diaria["series"][0]["promedio"] == pytest.approx(total, abs=1e-2)
+
+    def test_filtros(self, session, red):
+        """Test de filtros por hospital y servicio, y validaciones."""
+        _sembrar_eventos(session, red)
+        hospital = red["hospitales"][0]
+        por_hospital = serie_ocupacion(session, BASE, AHORA, "1d", hospital_id=hospital.id, ahora=AHORA)
+        por_servicio = serie_ocupacion(
+            session, BASE, AHORA, "1d", servicio_id=red["servicios"][0].id, ahora=AHORA
+        )
+
+        assert {s["id"] for s in por_hospital["series"]} == {
+            s.id for s in red["servicios"] if s.hospital_id == hospital.id
+        }
+        assert [s["id"] for s in por_servicio["series"]] == [red["servicios"][0].id]
+        with pytest.raises(ValidationError):
+            serie_ocupacion(session, BASE, AHORA, "1d", nivel="red", hospital_id=hospital.id, ahora=AHORA)
+        with pytest.raises(ValidationError):
+            serie_ocupacion(session, BASE, BASE + timedelta(days=365), "1h", ahora=AHORA + timedelta(days=365))
+
+
+class TestCache:
+    """Tests de la caché de días clínicos cerrados."""
+
+    def test_dias_cerrados_no_se_recalculan(self, session, red, monkeypatch):
+        """Test que una segunda consulta solo barre el día en curso."""
+        _sembrar_eventos(session, red)
+        primera = serie_ocupacion(session, BASE, AHORA, "6h", nivel="hospital", ahora=AHORA)
+        assert ocupacion_historica.obtener_cobertura(session) == (BASE, BASE + timedelta(days=5))
+        assert session.exec(select(OcupacionHoraria)).first() is not None
+
+        rangos = []
+        original = ocupacion_historica.barrer
+
+        def barrer_contado(session, inicio, limite, topologia=None):
+            rangos.append((inicio, limite))
+            return original(session, inicio, limite, topologia)
+
+        monkeypatch.setattr(ocupacion_historica, "barrer", barrer_contado)
+        segunda = serie_ocupacion(session, BASE, AHORA, "6h", nivel="hospital", ahora=AHORA)
+
+        assert segunda == primera
+        assert rangos == [(BASE + timedelta(days=5), AHORA)]
+
+    def test_evento_atrasado_invalida(self, session, red):
+        """Test que un evento de borde atrasado recorta la cobertura y se refleja."""
+        _sembrar_eventos(session, red)
+        serie_ocupacion(session, BASE, AHORA, "1d", ahora=AHORA)
+
+        paciente = red["pacientes"][0]
+        servicio = red["servicios"][0]
+        momento = BASE + timedelta(days=2, hours=3)
+        escribir_eventos_masivo(session, [construir_fila_evento(
+            TipoEventoEnum.CAMA_ASIGNADA, paciente.id, paciente.hospital_id,
+            servicio_destino_id=servicio.id, timestamp=momento,
+        )])
+        session.commit()
+        assert ocupacion_historica.obtener_cobertura(session) == (BASE, BASE + timedelta(days=2))
+
+        desde_cache = serie_ocupacion(session, BASE, AHORA, "1d", ahora=AHORA)
+        session.execute(OcupacionHoraria.__table__.delete())
+        session.execute(ocupacion_historica.TABLA_COBERTURA.delete())
+        session.commit()
+        assert desde_cache == serie_ocupacion(session, BASE, AHORA, "1d", ahora=AHORA)
+
+
+class TestApi:
+    """Tests del endpoint /estadisticas/ocupacion/historica."""
+
+    def test_endpoint(self, client, red):
+        """Test que el endpoint devuelve la serie y 400 con parámetros inválidos."""
+        response = client.get(
+            "/api/estadisticas/ocupacion/historica",
+            params={"dias": 2, "resolucion": "6h", "nivel": "hospital"},
+        )
+        assert response.status_code == 200
+        datos = response.json()
+        assert datos["nivel"] == "hospital"
+        assert {s["id"] for s in datos["series"]} == {h.id for h in red["hospitales"]}
+        assert all(len(s["promedio"]) == len(datos["inicios"]) for s in datos["series"])
+
+        invalido = client.get("/api/estadisticas/ocupacion/historica", params={"resolucion": "15m"})
+        assert invalido.status_code == 400
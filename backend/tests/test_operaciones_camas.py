@@ -0,0 +1,181 @@
+"""
+Tests de operaciones masivas sobre camas: selección por id, sala o servicio,
+una transacción, recálculo del sexo de salas por lote y un único broadcast.
+"""
+import json
+
+import pytest
+from sqlmodel import select
+
+from app.config import settings
+from app.core.principal import Principal
+from app.models.cama import Cama
+from app.models.enums import EstadoCamaEnum, SexoEnum
+from app.models.outbox import NotificacionOutbox
+from app.models.sala import Sala
+from app.models.usuario import RolEnum, Usuario
+from app.services.compatibilidad_service import CompatibilidadService
+
+
+def _usuario(rol=RolEnum.PROGRAMADOR, hospital_id=None):
+    return Usuario(
+        username="u", email="u@test.cl", hashed_password="x", nombre_completo="U",
+        rol=rol, hospital_id=hospital_id,
+    )
+
+
+@pytest.fixture
+def como():
+    from main import app
+    from app.core.auth_dependencies import get_current_user
+
+    def _como(usuario):
+        app.dependency_overrides[get_current_user] = lambda: Principal.desde_usuario(usuario)
+    return _como
+
+
+def _estados(session, camas):
+    session.expire_all()
+    return [session.get(Cama, c.id).estado for c in camas]
+
+
+def _broadcasts(session):
+    return [json.loads(n.payload) for n in session.exec(select(NotificacionOutbox)).all()]
+
+
+class TestOperacionesCamasLote:
+    """Tests del endpoint /camas/lote."""
+
+    def test_bloquea_un_servicio_completo_en_una_transaccion(self, client, session, hospital_con_camas, como):
+        como(_usuario())
+        camas = hospital_con_camas["camas"]
+        camas[3].estado = EstadoCamaEnum.OCUPADA
+        session.add(camas[3])
+        session.commit()
+
+        response = client.post("/api/camas/lote", json={"operaciones": [
+            {"operacion": "BLOQUEAR", "servicio_ids": [hospital_con_camas["servicio"].id], "mensaje": "Mantención"},
+        ]})
+
+        assert response.status_code == 200
+        datos = response.json()
+        assert (datos["aplicado"], datos["modificadas"], datos["omitidas"]) == (True, 3, 1)
+        omitida = next(r for r in datos["resultados"] if not r["exito"])
+        assert omitida["cama_id"] == camas[3].id
+        assert omitida["motivo"] == "Solo se pueden bloquear camas libres"
+
+        assert _estados(session, camas) == [EstadoCamaEnum.BLOQUEADA] * 3 + [EstadoCamaEnum.OCUPADA]
+        assert session.get(Cama, camas[0].id).mensaje_estado == "Mantención"
+
+        mensajes = _broadcasts(session)
+        assert len(mensajes) == 1
+        assert mensajes[0]["tipo"] == "camas_actualizadas"
+        assert mensajes[0]["cama_ids"] == [c.id for c in camas[:3]]
+
+    def test_operaciones_encadenadas_sobre_las_mismas_camas(self, client, session, hospital_con_camas, como):
+        como(_usuario())
+        camas = hospital_con_camas["camas"]
+        sala_id = hospital_con_camas["sala"].id
+
+        response = client.post("/api/camas/lote", json={"operaciones": [
+            {"operacion": "INICIAR_LIMPIEZA", "sala_ids": [sala_id]},
+            {"operacion": "FINALIZAR_LIMPIEZA", "cama_ids": [camas[0].id, camas[1].id]},
+        ]})
+
+        assert response.json()["modificadas"] == 6
+        assert _estados(session, camas) == [EstadoCamaEnum.LIBRE] * 2 + [EstadoCamaEnum.EN_LIMPIEZA] * 2
+        assert session.get(Cama, camas[0].id).limpieza_inicio is None
+        assert session.get(Cama, camas[2].id).limpieza_inicio is not None
+        assert len(_broadcasts(session)) == 1
+
+    def test_todo_o_nada_no_aplica_cambios(self, client, session, hospital_con_camas, como):
+        como(_usuario())
+        camas = hospital_con_camas["camas"]
+
+        response = client.post("/api/camas/lote", json={"todo_o_nada": True, "operaciones": [
+            {"operacion": "DESBLOQUEAR", "cama_ids": [camas[0].id]},
+            {"operacion": "BLOQUEAR", "cama_ids": [camas[1].id, "no-existe"]},
+        ]})
+
+        assert response.status_code == 409
+        detalle = response.json()["detail"]
+        assert detalle["aplicado"] is False and detalle["omitidas"] == 2
+        assert _estados(session, camas) == [EstadoCamaEnum.LIBRE] * 4
+        assert _broadcasts(session) == []
+
+    def test_omite_camas_de_hospitales_sin_acceso(
+        self, client, session, hospital_con_camas, crear_hospital, crear_servicio, crear_sala, crear_cama, como,
+    ):
+        otro = crear_hospital(nombre="Otro", codigo="OT")
+        sala = crear_sala(crear_servicio(otro.id, nombre="Medicina", codigo="MO").id, numero=1)
+        ajena = crear_cama(sala.id, numero=1, identificador="MO-1", estado=EstadoCamaEnum.EN_LIMPIEZA)
+        propia = hospital_con_camas["camas"][0]
+        propia.estado = EstadoCamaEnum.EN_LIMPIEZA
+        session.add(propia)
+        session.commit()
+        como(_usuario(RolEnum.LIMPIEZA, hospital_id="HC"))
+
+        response = client.post("/api/camas/lote", json={"operaciones": [
+            {"operacion": "FINALIZAR_LIMPIEZA", "cama_ids": [propia.id, ajena.id]},
+        ]})
+
+        resultados = response.json()["resultados"]
+        assert [r["exito"] for r in resultados] == [True, False]
+        assert resultados[1]["motivo"] == "No tienes acceso a este hospital"
+        assert _estados(session, [propia, ajena]) == [EstadoCamaEnum.LIBRE, EstadoCamaEnum.EN_LIMPIEZA]
+        assert _broadcasts(session)[0]["cama_ids"] == [propia.id]
+
+    def test_sin_permiso_de_la_operacion(self, client, hospital_con_camas, como):
+        como(_usuario(RolEnum.LIMPIEZA, hospital_id="HC"))
+        response = client.post("/api/camas/lote", json={"operaciones": [
+            {"operacion": "BLOQUEAR", "cama_ids": [hospital_con_camas["camas"][0].id]},
+        ]})
+        assert response.status_code == 403
+
+    def test_lote_demasiado_grande(self, client, hospital_con_camas, como, monkeypatch):
+        como(_usuario())
+        monkeypatch.setattr(settings, "CAMAS_LOTE_MAX", 3)
+        response = client.post("/api/camas/lote", json={"operaciones": [
+            {"operacion": "BLOQUEAR", "sala_ids": [hospital_con_camas["sala"].id]},
+        ]})
+        assert response.status_code == 413
+
+
+class TestSexoSalasPorLote:
+    """Tests del recálculo del sexo de varias salas con consultas agrupadas."""
+
+    def test_equivale_al_recalculo_por_sala(
+        self, session, hospital_con_camas, crear_sala, crear_cama, crear_paciente,
+    ):
+        hospital = hospital_con_camas["hospital"]
+        servicio = hospital_con_camas["servicio"]
+        ocupada = hospital_con_camas["camas"][0]
+        ocupada.estado = EstadoCamaEnum.OCUPADA
+        session.add(ocupada)
+        crear_paciente(hospital.id, run="1-1", sexo=SexoEnum.MUJER, cama_id=ocupada.id)
+
+        con_llegada = crear_sala(servicio.id, numero=2)
+        destino = crear_cama(con_llegada.id, numero=201, identificador="MED-201")
+        crear_paciente(hospital.id, run="2-2", sexo=SexoEnum.HOMBRE, cama_destino_id=destino.id)
+
+        vacia = crear_sala(servicio.id, numero=3)
+        vacia.sexo_asignado = "mujer"
+        individual = crear_sala(servicio.id, numero=4, es_individual=True)
+        individual.sexo_asignado = "hombre"
+        session.add_all([vacia, individual])
+        session.commit()
+
+        salas = session.exec(select(Sala)).all()
+        resultado = CompatibilidadService(session).actualizar_sexo_salas(list(salas))
+
+        assert resultado == {
+            hospital_con_camas["sala"].id: "MUJER",
+            con_llegada.id: "HOMBRE",
+            vacia.id: None,
+            individual.id: None,
+        }
+        session.commit()
+        esperado = {sala.id: sala.sexo_asignado for sala in salas}
+        for sala in salas:
+            CompatibilidadService(session).actualizar_sexo_sala(sala)
+        assert {sala.id: sala.sexo_asignado for sala in salas} == esperado
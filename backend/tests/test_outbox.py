@@ -0,0 +1,219 @@
+"""
+Tests para el outbox transaccional de notificaciones.
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import status
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.core.outbox import (
+    DespachadorOutbox,
+    encolar_broadcast,
+    encolar_notificacion,
+)
+from app.models.outbox import NotificacionOutbox, SecuenciaOutbox
+
+
+class ManagerFalso:
+    """Gestor WebSocket que registra los mensajes publicados."""
+
+    def __init__(self, fallar_en: int = None):
+        self.mensajes = []
+        self.fallar_en = fallar_en
+
+    async def broadcast(self, message: dict) -> None:
+        if self.fallar_en is not None and len(self.mensajes) == self.fallar_en:
+            self.fallar_en = None
+            raise ConnectionError("socket caído")
+        self.mensajes.append(("todos", message))
+
+    async def broadcast_to_hospital(self, hospital_id: str, message: dict) -> None:
+        self.mensajes.append((hospital_id, message))
+
+
+@pytest.fixture
+def despachador(engine):
+    """Despachador con sesión propia sobre la BD de test."""
+    manager = ManagerFalso()
+    return DespachadorOutbox(manager=manager, session_factory=lambda: Session(engine), lote_maximo=10)
+
+
+class TestEscrituraOutbox:
+    """Tests del lado transaccional."""
+
+    def test_rollback_descarta_notificacion(self, session):
+        """Test que una notificación no sobrevive al rollback de su transacción."""
+        encolar_broadcast(session, {"tipo": "cama_actualizada", "hospital_id": "H1"})
+        session.rollback()
+
+        assert session.exec(select(NotificacionOutbox)).all() == []
+
+    def test_notificacion_tipada(self, session):
+        """Test que encolar_notificacion replica el formato de send_notification."""
+        encolar_notificacion(session, {"tipo": "asignacion_manual"}, notification_type="asignacion",
+                             hospital_id="H1")
+        session.commit()
+
+        fila = session.exec(select(NotificacionOutbox)).one()
+        assert fila.solo_hospital
+        assert fila.get_payload() == {
+            "tipo": "asignacion_manual", "notification_type": "asignacion", "play_sound": True,
+        }
+
+
+class TestDespachador:
+    """Tests de publicación, orden y secuencias."""
+
+    def test_publica_en_orden_con_secuencia_por_hospital(self, session, despachador):
+        """Test orden de publicación y secuencias independientes por hospital."""
+        for n in range(3):
+            encolar_broadcast(session, {"tipo": "t", "n": n, "hospital_id": "H1"})
+            encolar_broadcast(session, {"tipo": "t", "n": n, "hospital_id": "H2"}, solo_hospital=True)
+        encolar_broadcast(session, {"tipo": "config"})
+        session.commit()
+
+        assert asyncio.run(despachador.despachar_todo()) == 7
+
+        mensajes = despachador.manager.mensajes
+        h1 = [m for destino, m in mensajes if m.get("hospital_id") == "H1"]
+        h2 = [(destino, m) for destino, m in mensajes if m.get("hospital_id") == "H2"]
+        assert [m["secuencia"] for m in h1] == [1, 2, 3]
+        assert [m["n"] for m in h1] == [0, 1, 2]
+        assert all(destino == "H2" for destino, _ in h2)
+        assert [m["secuencia"] for _, m in h2] == [1, 2, 3]
+        assert [m["outbox_id"] for _, m in mensajes] == sorted(m["outbox_id"] for _, m in mensajes)
+
+        session.expire_all()
+        assert session.get(SecuenciaOutbox, "global").ultima == 1
+        assert all(f.publicado_at for f in session.exec(select(NotificacionOutbox)).all())
+        assert asyncio.run(despachador.despachar_todo()) == 0
+
+    def test_fallo_reintenta_con_misma_secuencia(self, session, engine):
+        """Test entrega al menos una vez: tras un fallo se reintenta sin perder orden."""
+        manager = ManagerFalso(fallar_en=1)
+        despachador = DespachadorOutbox(manager=manager, session_factory=lambda: Session(engine))
+        for n in range(3):
+            encolar_broadcast(session, {"n": n, "hospital_id": "H1"})
+        session.commit()
+
+        assert asyncio.run(despachador.despachar_lote()) == 1
+        assert asyncio.run(despachador.despachar_lote()) == 2
+
+        assert [(m["n"], m["secuencia"]) for _, m in manager.mensajes] == [(0, 1), (1, 2), (2, 3)]
+        session.expire_all()
+        fallida = session.exec(select(NotificacionOutbox).where(NotificacionOutbox.secuencia == 2)).one()
+        assert fallida.intentos == 1
+
+    def test_notificacion_que_siempre_falla_se_descarta(self, session, engine, monkeypatch, caplog):
+        """Test que una notificación envenenada no bloquea la secuencia de su hospital."""
+        monkeypatch.setattr(settings, "OUTBOX_MAX_INTENTOS", 3)
+
+        class ManagerQueRechaza(ManagerFalso):
+            async def broadcast(self, message: dict) -> None:
+                if message.get("veneno"):
+                    raise ValueError("mensaje inválido")
+                await super().broadcast(message)
+
+        manager = ManagerQueRechaza()
+        despachador = DespachadorOutbox(manager=manager, session_factory=lambda: Session(engine))
+        encolar_broadcast(session, {"n": 0, "veneno": True, "hospital_id": "H1"})
+        encolar_broadcast(session, {"n": 1, "hospital_id": "H1"})
+        session.commit()
+
+        for _ in range(3):
+            assert asyncio.run(despachador.despachar_lote()) == 0
+        assert asyncio.run(despachador.despachar_lote()) == 1
+
+        assert [(m["n"], m["secuencia"]) for _, m in manager.mensajes] == [(1, 2)]
+        assert despachador.estadisticas()["descartadas"] == 1
+        assert len([r for r in caplog.records if "descartada" in r.getMessage()]) == 1
+        session.expire_all()
+        veneno = session.exec(select(NotificacionOutbox).where(NotificacionOutbox.secuencia == 1)).one()
+        assert (veneno.intentos, veneno.publicado_at) == (3, None)
+        assert veneno.fallido_at is not None
+        assert asyncio.run(despachador.despachar_todo()) == 0
+
+
+    def test_reclama_y_confirma_antes_de_publicar(self, session, engine):
+        """Test que el lote queda reclamado y confirmado antes de los envíos."""
+        vistas = []
+
+        class ManagerQueLee(ManagerFalso):
+            async def broadcast(self, message: dict) -> None:
+                # Otra conexión ya ve la secuencia y el reclamo confirmados
+                with Session(engine) as otra:
+                    fila = otra.get(NotificacionOutbox, message["outbox_id"])
+                    vistas.append((fila.secuencia, fila.reclamado_at is not None, fila.publicado_at))
+                await super().broadcast(message)
+
+        despachador = DespachadorOutbox(manager=ManagerQueLee(), session_factory=lambda: Session(engine))
+        encolar_broadcast(session, {"tipo": "t"})
+        session.commit()
+
+        assert asyncio.run(despachador.despachar_lote()) == 1
+        assert vistas == [(1, True, None)]
+
+    def test_reclamo_vigente_se_salta_y_el_vencido_se_retoma(self, session, despachador):
+        """Test que otro despachador no publica un lote reclamado hasta que vence."""
+        encolar_broadcast(session, {"n": 0})
+        reclamada = encolar_broadcast(session, {"n": 1})
+        reclamada.reclamado_at = datetime.utcnow()
+        session.commit()
+
+        assert asyncio.run(despachador.despachar_todo()) == 1
+        assert [m["n"] for _, m in despachador.manager.mensajes] == [0]
+
+        reclamada.reclamado_at = datetime.utcnow() - timedelta(minutes=5)
+        session.add(reclamada)
+        session.commit()
+
+        assert asyncio.run(despachador.despachar_todo()) == 1
+        assert [m["n"] for _, m in despachador.manager.mensajes] == [0, 1]
+
+
+class TestHandlers:
+    """Tests de integración con endpoints."""
+
+    def test_bloquear_cama_deja_notificacion_en_outbox(self, client, session, hospital_con_camas):
+        """Test que el endpoint escribe la notificación en vez de publicarla inline."""
+        from app.core.auth_dependencies import get_current_user
+        from app.models.usuario import Usuario, RolEnum
+        from main import app
+
+        cama = hospital_con_camas["camas"][0]
+        jefe = Usuario(username="j", email="j@x.cl", nombre_completo="J", rol=RolEnum.JEFE_SERVICIO)
+        app.dependency_overrides[get_current_user] = lambda: jefe
+
+        response = client.post(f"/api/camas/{cama.id}/bloquear", json={"bloquear": True})
+        assert response.status_code == status.HTTP_200_OK
+
+        fila = session.exec(select(NotificacionOutbox)).one()
+        assert fila.get_payload()["cama_id"] == cama.id
+        assert fila.publicado_at is None
+
+    def test_servicio_confirma_notificacion_en_su_commit(self, client, session, hospital_con_camas, crear_paciente):
+        """Test que el alta encola su notificación sin un commit adicional."""
+        from app.core.auth_dependencies import get_current_user
+        from app.models.enums import EstadoCamaEnum
+        from app.models.usuario import Usuario, RolEnum
+        from main import app
+
+        cama = hospital_con_camas["camas"][0]
+        cama.estado = EstadoCamaEnum.OCUPADA
+        session.add(cama)
+        paciente = crear_paciente(hospital_con_camas["hospital"].id, run="1-9", cama_id=cama.id)
+        medico = Usuario(username="m", email="m@x.cl", nombre_completo="M", rol=RolEnum.PROGRAMADOR)
+        app.dependency_overrides[get_current_user] = lambda: medico
+
+        commits = []
+        event.listen(session, "after_commit", lambda s: commits.append(1))
+        response = client.post(f"/api/altas/{paciente.id}/iniciar")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(commits) == 1
+        fila = session.exec(select(NotificacionOutbox)).one()
+        assert fila.get_payload() == {"tipo": "alta_iniciada", "paciente_id": paciente.id, "cama_id": cama.id}
@@ -0,0 +1,117 @@
+"""
+Tests del pool de contraseñas: bcrypt fuera del event loop, control de
+admisión del login (429 + Retry-After) y métricas de cola.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.pool_contrasenas import PoolContrasenas, PoolSaturado, pool_contrasenas
+from app.models.usuario import RolEnum
+from app.services.auth_service import auth_service
+
+
+class TestPool:
+    """Tests del ejecutor acotado."""
+
+    def test_no_bloquea_el_event_loop(self):
+        """Test que el loop sigue atendiendo mientras corre una operación lenta."""
+        pool = PoolContrasenas(hilos=1, pendientes_max=4)
+
+        async def escenario():
+            ticks = 0
+
+            async def latido():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            tarea = asyncio.create_task(latido())
+            resultado = await pool.ejecutar(time.sleep, 0.3)
+            tarea.cancel()
+            return resultado, ticks
+
+        try:
+            resultado, ticks = asyncio.run(escenario())
+        finally:
+            pool.cerrar()
+        assert resultado is None
+        assert ticks >= 10
+
+    def test_admision_rechaza_sobre_el_limite(self):
+        """Test que el login se rechaza con la cola llena y lo administrativo espera."""
+        pool = PoolContrasenas(hilos=1, pendientes_max=2)
+        liberar = threading.Event()
+
+        async def escenario():
+            ocupadas = [asyncio.ensure_future(pool.ejecutar(liberar.wait, admision=True)) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            assert pool.estadisticas()["en_curso"] == 1
+            assert pool.estadisticas()["en_cola"] == 1
+
+            with pytest.raises(PoolSaturado) as error:
+                await pool.ejecutar(liberar.wait, admision=True)
+            administrativa = asyncio.ensure_future(pool.ejecutar(lambda: "hash"))
+
+            liberar.set()
+            await asyncio.gather(*ocupadas)
+            return error.value.retry_after, await administrativa
+
+        try:
+            retry_after, resultado = asyncio.run(escenario())
+        finally:
+            pool.cerrar()
+        assert retry_after >= 1
+        assert resultado == "hash"
+        estadisticas = pool.estadisticas()
+        assert (estadisticas["completadas"], estadisticas["rechazadas"]) == (3, 1)
+        assert (estadisticas["en_curso"], estadisticas["en_cola"]) == (0, 0)
+        assert estadisticas["espera_maxima_ms"] > 0
+
+    def test_errores_se_propagan(self):
+        pool = PoolContrasenas(hilos=1, pendientes_max=1)
+
+        def falla():
+            raise ValueError("hash inválido")
+
+        try:
+            with pytest.raises(ValueError):
+                asyncio.run(pool.ejecutar(falla, admision=True))
+        finally:
+            pool.cerrar()
+        assert pool.estadisticas()["errores"] == 1
+        assert pool.pendientes == 0
+
+
+class TestLogin:
+    """Tests del endpoint de login sobre el pool."""
+
+    @pytest.fixture
+    def usuario(self, session):
+        return auth_service.create_user(
+            username="enfermera", email="enfermera@test.cl", password="Clave1234",
+            nombre_completo="Enfermera Test", rol=RolEnum.ENFERMERA, session=session,
+        )
+
+    def test_login_verifica_en_el_pool(self, client, usuario):
+        completadas = pool_contrasenas.completadas
+        response = client.post("/api/auth/login", json={"username": "enfermera", "password": "Clave1234"})
+
+        assert response.status_code == 200
+        assert response.json()["tokens"]["access_token"]
+        assert pool_contrasenas.completadas == completadas + 1
+
+        response = client.post("/api/auth/login", json={"username": "enfermera", "password": "otra"})
+        assert response.status_code == 401
+
+    def test_login_saturado_responde_429(self, client, usuario, monkeypatch):
+        """Test del 429 con Retry-After cuando el pool no admite más logins."""
+        monkeypatch.setattr(pool_contrasenas, "_pendientes_max", 0)
+
+        response = client.post("/api/auth/login", json={"username": "enfermera", "password": "Clave1234"})
+
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
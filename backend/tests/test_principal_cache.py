@@ -0,0 +1,170 @@
+"""
+Tests del principal autenticado y su caché: equivalencia con Usuario en
+permisos y RBAC, resolución sin BD en el camino común, invalidación y
+límites LRU/TTL.
+"""
+import pytest
+
+from app.core import principal as modulo_principal
+from app.core.principal import CachePrincipales, Principal, cache_principales
+from app.core.rbac_service import rbac_service
+from app.models.usuario import PermisoEnum, RolEnum, Usuario
+from app.services.auth_service import auth_service
+
+
+def _usuario(session=None, rol=RolEnum.MEDICO, hospital_id="puerto_montt", servicio_id="medicina", username="medico"):
+    usuario = Usuario(
+        username=username, email=f"{username}@test.cl", hashed_password="x",
+        nombre_completo="Usuario Test", rol=rol, hospital_id=hospital_id, servicio_id=servicio_id,
+    )
+    if session is not None:
+        session.add(usuario)
+        session.commit()
+        session.refresh(usuario)
+    return usuario
+
+
+def _cabeceras(usuario):
+    return {"Authorization": f"Bearer {auth_service.create_access_token(usuario)}"}
+
+
+class TestPrincipal:
+    """Tests de equivalencia entre Principal y Usuario."""
+
+    def test_permisos_por_rol(self):
+        """Test que la máscara de bits da los mismos permisos que PERMISOS_POR_ROL."""
+        for rol in RolEnum:
+            usuario = _usuario(rol=rol)
+            principal = Principal.desde_usuario(usuario)
+            assert principal.permisos == usuario.permisos
+            for permiso in PermisoEnum:
+                assert principal.tiene_permiso(permiso) == usuario.tiene_permiso(permiso)
+            muestra = list(PermisoEnum)[::7]
+            assert principal.tiene_algun_permiso(muestra) == usuario.tiene_algun_permiso(muestra)
+            assert principal.tiene_todos_permisos(muestra) == usuario.tiene_todos_permisos(muestra)
+            assert principal.tiene_todos_permisos([]) is True
+
+    def test_rbac_igual_que_usuario(self):
+        """Test que los códigos precalculados no cambian las decisiones RBAC."""
+        hospitales = ["puerto_montt", "PM", "llanquihue", "LL", "otro", None]
+        servicios = ["medicina", "Med", "Medicina", "urgencias", "obstetricia", "UCI", None]
+        for rol in (RolEnum.MEDICO, RolEnum.GESTOR_CAMAS, RolEnum.DIRECTIVO_RED, RolEnum.URGENCIAS):
+            for hospital_usuario in hospitales:
+                for servicio_usuario in servicios:
+                    usuario = _usuario(rol=rol, hospital_id=hospital_usuario, servicio_id=servicio_usuario)
+                    principal = Principal.desde_usuario(usuario)
+                    for hospital in hospitales[:-1]:
+                        assert (rbac_service.puede_acceder_hospital(principal, hospital)
+                                == rbac_service.puede_acceder_hospital(usuario, hospital))
+                    for servicio in servicios[:-1]:
+                        assert (rbac_service.puede_acceder_servicio(principal, servicio)
+                                == rbac_service.puede_acceder_servicio(usuario, servicio))
+                        assert (rbac_service.puede_ver_paciente(principal, servicio, "Cirugía", "PM")
+                                == rbac_service.puede_ver_paciente(usuario, servicio, "Cirugía", "PM"))
+
+    def test_inmutable(self):
+        principal = Principal.desde_usuario(_usuario())
+        with pytest.raises(AttributeError):
+            principal.rol = RolEnum.PROGRAMADOR
+
+
+class TestCache:
+    """Tests de la caché LRU + TTL."""
+
+    def test_lru_acotada(self):
+        cache = CachePrincipales(ttl=60, maximo=2)
+        a, b, c = (Principal.desde_usuario(_usuario(username=n)) for n in "abc")
+        for p in (a, b):
+            cache.guardar(p)
+        assert cache.obtener(a.id) is a  # a pasa a ser la más reciente
+        cache.guardar(c)
+
+        assert cache.obtener(b.id) is None
+        assert cache.obtener(a.id) is a and cache.obtener(c.id) is c
+        assert cache.estadisticas()["entradas"] == 2
+
+    def test_expira_por_ttl(self, monkeypatch):
+        reloj = [1000.0]
+        monkeypatch.setattr(modulo_principal.time, "monotonic", lambda: reloj[0])
+        cache = CachePrincipales(ttl=30, maximo=10)
+        principal = cache.guardar(Principal.desde_usuario(_usuario()))
+
+        reloj[0] += 29
+        assert cache.obtener(principal.id) is principal
+        reloj[0] += 2
+        assert cache.obtener(principal.id) is None
+
+    def test_ttl_cero_deshabilita(self):
+        cache = CachePrincipales(ttl=0, maximo=10)
+        principal = cache.guardar(Principal.desde_usuario(_usuario()))
+        assert cache.obtener(principal.id) is None
+
+
+class TestGetCurrentUser:
+    """Tests de la dependencia get_current_user con la caché."""
+
+    @pytest.fixture
+    def consultas(self, monkeypatch):
+        """Cuenta las lecturas de usuario por id."""
+        contador = []
+        original = auth_service.get_user_by_id
+
+        def contar(user_id, session):
+            contador.append(user_id)
+            return original(user_id, session)
+
+        monkeypatch.setattr(auth_service, "get_user_by_id", contar)
+        return contador
+
+    def test_sin_bd_en_el_camino_comun(self, session, client, consultas):
+        """Test que solo el primer request consulta la BD."""
+        usuario = _usuario(session)
+        for _ in range(3):
+            response = client.get("/api/auth/me/permisos", headers=_cabeceras(usuario))
+            assert response.status_code == 200
+        assert consultas == [usuario.id]
+        assert sorted(response.json()) == sorted(p.value for p in usuario.permisos)
+
+    def test_perfil_lee_la_fila_completa(self, session, client):
+        usuario = _usuario(session)
+        response = client.get("/api/auth/me", headers=_cabeceras(usuario))
+        assert response.status_code == 200
+        assert response.json()["email"] == "medico@test.cl"
+
+    def test_desactivacion_invalida(self, session, client):
+        """Test que desactivar al usuario (commit ORM) corta el acceso de inmediato."""
+        usuario = _usuario(session)
+        cabeceras = _cabeceras(usuario)
+        assert client.get("/api/auth/me/permisos", headers=cabeceras).status_code == 200
+
+        usuario.is_active = False
+        session.add(usuario)
+        session.commit()
+
+        response = client.get("/api/auth/me/permisos", headers=cabeceras)
+        assert response.status_code == 401
+        assert cache_principales.obtener(usuario.id) is None
+
+    def test_cambio_de_rol_invalida(self, session, client):
+        usuario = _usuario(session)
+        cabeceras = _cabeceras(usuario)
+        client.get("/api/auth/me/permisos", headers=cabeceras)
+
+        usuario.rol = RolEnum.VISUALIZADOR
+        session.add(usuario)
+        session.commit()
+
+        response = client.get("/api/auth/me/permisos", headers=cabeceras)
+        esperados = _usuario(rol=RolEnum.VISUALIZADOR).permisos
+        assert sorted(response.json()) == sorted(p.value for p in esperados)
+
+    def test_revocar_tokens_invalida(self, session, client, consultas):
+        usuario = _usuario(session)
+        client.get("/api/auth/me/permisos", headers=_cabeceras(usuario))
+        assert cache_principales.obtener(usuario.id) is not None
+
+        auth_service.revoke_all_user_tokens(usuario.id, session)
+
+        assert cache_principales.obtener(usuario.id) is None
+        client.get("/api/auth/me/permisos", headers=_cabeceras(usuario))
+        assert consultas == [usuario.id, usuario.id]
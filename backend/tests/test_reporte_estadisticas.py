@@ -0,0 +1,145 @@
+"""
+Tests para el reporte concurrente de estadísticas completas.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from sqlmodel import Session
+
+from app.models.enums import TipoEventoEnum
+from app.schemas.responses import EstadisticasCompletasResponse
+from app.services import reporte_estadisticas
+from app.services.evento_writer import escritor_eventos
+from app.services.reporte_estadisticas import GeneradorReporte
+
+
+class SeccionLenta:
+    """Sección que registra hilos y sesiones y tarda un poco."""
+
+    def __init__(self, valor, demora=0.05, error=None):
+        self.valor = valor
+        self.demora = demora
+        self.error = error
+        self.llamadas = []
+        self._lock = threading.Lock()
+
+    def __call__(self, session, fecha_inicio, fecha_fin):
+        with self._lock:
+            self.llamadas.append((threading.current_thread().name, id(session)))
+        time.sleep(self.demora)
+        if self.error:
+            raise self.error
+        return self.valor
+
+
+@pytest.fixture
+def secciones():
+    return {"a": SeccionLenta(1), "b": SeccionLenta(2), "c": SeccionLenta(3)}
+
+
+@pytest.fixture
+def generador(engine, secciones):
+    generador = GeneradorReporte(secciones=secciones, session_factory=lambda: Session(engine), hilos=3)
+    yield generador
+    generador.cerrar()
+
+
+class TestSingleFlight:
+    """Tests de de-duplicación y caché."""
+
+    def test_peticiones_concurrentes_comparten_calculo(self, generador, secciones):
+        """Test que N peticiones simultáneas disparan un solo cálculo."""
+        async def _cinco():
+            return await asyncio.gather(*(generador.obtener(7) for _ in range(5)))
+
+        reportes = asyncio.run(_cinco())
+
+        assert all(r == {"a": 1, "b": 2, "c": 3} for r in reportes)
+        assert all(len(s.llamadas) == 1 for s in secciones.values())
+        assert generador.compartidos == 4
+
+    def test_cache_por_clave_y_ttl(self, generador, secciones):
+        """Test que el caché es por (dias, alcance) y expira con el TTL."""
+        asyncio.run(generador.obtener(7))
+        asyncio.run(generador.obtener(7))
+        assert generador.aciertos == 1
+
+        asyncio.run(generador.obtener(30))
+        asyncio.run(generador.obtener(7, alcance="hospital-1"))
+        assert generador.calculos == 3
+
+        generador.ttl = 0
+        generador.invalidar()
+        asyncio.run(generador.obtener(7))
+        assert generador.calculos == 4
+
+    def test_commit_de_eventos_invalida_el_reporte(self, monkeypatch, session, generador,
+                                                   hospital_con_camas, crear_paciente):
+        """Test que confirmar eventos (tag de estadísticas) descarta el reporte cacheado."""
+        monkeypatch.setattr(reporte_estadisticas, "generador_reporte", generador)
+        asyncio.run(generador.obtener(7))
+        asyncio.run(generador.obtener(7))
+        assert generador.calculos == 1
+
+        hospital = hospital_con_camas["hospital"]
+        paciente = crear_paciente(hospital.id)
+        escritor_eventos(session).agregar(TipoEventoEnum.INGRESO_URGENCIA, paciente.id, hospital.id)
+        session.commit()
+
+        asyncio.run(generador.obtener(7))
+        assert generador.calculos == 2
+
+    def test_calculo_invalidado_durante_la_ejecucion_no_se_cachea(self, generador):
+        """Test que un reporte iniciado antes de una invalidación no queda en caché."""
+        async def _invalidar_a_mitad():
+            calculo = asyncio.ensure_future(generador.obtener(7))
+            await asyncio.sleep(0.01)
+            generador.invalidar()
+            await calculo
+
+        asyncio.run(_invalidar_a_mitad())
+        asyncio.run(generador.obtener(7))
+        assert generador.calculos == 2
+
+    def test_error_no_queda_cacheado(self, engine):
+        """Test que un fallo se propaga y la siguiente petición recalcula."""
+        fallida = SeccionLenta(None, error=RuntimeError("bd caída"))
+        generador = GeneradorReporte(secciones={"x": fallida}, session_factory=lambda: Session(engine))
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(generador.obtener(7))
+        fallida.error = None
+        assert asyncio.run(generador.obtener(7)) == {"x": None}
+        generador.cerrar()
+
+
+class TestConcurrencia:
+    """Tests de ejecución paralela por secciones."""
+
+    def test_secciones_en_hilos_con_sesion_propia(self, generador, secciones):
+        """Test que cada sección usa su propia sesión en el pool de hilos."""
+        asyncio.run(generador.obtener(7))
+
+        llamadas = [llamada for s in secciones.values() for llamada in s.llamadas]
+        assert all(hilo.startswith("reporte-estadisticas") for hilo, _ in llamadas)
+        assert len({sesion for _, sesion in llamadas}) == 3
+
+    def test_stream_entrega_todas_las_secciones(self, generador):
+        """Test que la variante incremental entrega cada sección una vez."""
+        async def _recoger():
+            return [item async for item in generador.secciones_a_medida(7)]
+
+        assert sorted(asyncio.run(_recoger())) == [("a", 1), ("b", 2), ("c", 3)]
+
+    def test_reporte_real_valida_esquema(self, engine, hospital_con_camas):
+        """Test que las secciones reales arman una respuesta válida."""
+        generador = GeneradorReporte(session_factory=lambda: Session(engine), hilos=1)
+
+        reporte = asyncio.run(generador.obtener(7))
+        generador.cerrar()
+
+        respuesta = EstadisticasCompletasResponse(**reporte)
+        assert respuesta.tasa_ocupacion_red is not None
+        assert respuesta.ingresos_red.total == 0
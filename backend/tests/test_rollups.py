@@ -0,0 +1,206 @@
+"""
+Tests para los agregados diarios de estadísticas (rollups).
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import select
+
+from app.models.estadistica_diaria import EstadisticaDiaria, CoberturaRollup
+from app.models.evento_paciente import EventoPaciente
+from app.models.enums import TipoEventoEnum
+from app.services import rollup_service
+from app.services.estadisticas_service import EstadisticasService
+from app.services.evento_writer import escritor_eventos
+
+
+HOY = EventoPaciente.calcular_dia_clinico(datetime.utcnow())
+
+
+@pytest.fixture
+def historial(session, hospital_con_camas, crear_paciente):
+    """Eventos de tres pacientes repartidos en los últimos días clínicos y hoy."""
+    hospital = hospital_con_camas["hospital"]
+    camas = hospital_con_camas["camas"]
+    escritor = escritor_eventos(session)
+
+    for n, dias_atras in enumerate((4, 2, 0)):
+        paciente = crear_paciente(hospital.id, run=f"{n + 10}-K")
+        inicio = HOY - timedelta(days=dias_atras) + timedelta(minutes=30)
+        escritor.agregar(TipoEventoEnum.INGRESO_URGENCIA, paciente.id, hospital.id, timestamp=inicio)
+        escritor.agregar(TipoEventoEnum.BUSQUEDA_CAMA_INICIADA, paciente.id, hospital.id,
+                         timestamp=inicio + timedelta(minutes=5))
+        # La asignación cae al día clínico siguiente para los pacientes antiguos
+        asignacion = inicio + timedelta(hours=30 if dias_atras else 1, minutes=n)
+        escritor.agregar(TipoEventoEnum.CAMA_ASIGNADA, paciente.id, hospital.id,
+                         cama_destino_id=camas[n].id, timestamp=asignacion)
+        escritor.agregar(TipoEventoEnum.TRASLADO_COMPLETADO, paciente.id, hospital.id,
+                         cama_origen_id=camas[n].id, cama_destino_id=camas[3].id,
+                         timestamp=asignacion + timedelta(minutes=10))
+    session.commit()
+    return hospital_con_camas
+
+
+def _estadisticas(session, datos):
+    fecha_inicio, fecha_fin = HOY - timedelta(days=10), HOY + timedelta(days=1)
+    servicio_id = datos["servicio"].id
+    return (
+        asyncio.run(EstadisticasService.calcular_ingresos_red(session, fecha_inicio, fecha_fin)),
+        asyncio.run(EstadisticasService.calcular_ingresos_hospital(
+            session, datos["hospital"].id, fecha_inicio, fecha_fin)),
+        asyncio.run(EstadisticasService.calcular_ingresos_servicio(session, servicio_id, fecha_inicio, fecha_fin)),
+        asyncio.run(EstadisticasService.calcular_egresos_servicio(session, servicio_id, fecha_inicio, fecha_fin)),
+        asyncio.run(EstadisticasService.calcular_tiempo_espera_cama(session, fecha_inicio, fecha_fin)),
+        # Ventana que corta un día a mitad: tramo crudo + rollups
+        asyncio.run(EstadisticasService.calcular_tiempo_espera_cama(
+            session, HOY - timedelta(days=3, hours=-2), None)),
+    )
+
+
+def _filas_rollup(session):
+    return sorted(
+        (f.dia_clinico, f.servicio_origen_id, f.servicio_destino_id, f.tipo_evento, f.metrica,
+         f.cantidad, f.duracion_suma, f.duracion_min, f.duracion_max)
+        for f in session.exec(select(EstadisticaDiaria)).all()
+    )
+
+
+class TestMantenimiento:
+    """Tests del mantenimiento incremental y la reconstrucción."""
+
+    def test_incremental_coincide_con_reconstruccion(self, session, historial):
+        """Test que los upserts al escribir eventos dan lo mismo que el backfill."""
+        incremental = _filas_rollup(session)
+        assert incremental
+
+        rollup_service.reconstruir_rollups(session)
+        session.expire_all()
+
+        assert _filas_rollup(session) == incremental
+        assert session.get(CoberturaRollup, 1).desde == HOY - timedelta(days=4)
+
+    def test_duracion_se_atribuye_al_dia_del_cierre(self, session, historial):
+        """Test que la espera de cama se registra en el día de CAMA_ASIGNADA."""
+        filas = session.exec(
+            select(EstadisticaDiaria).where(EstadisticaDiaria.metrica == "espera_cama")
+        ).all()
+
+        assert sorted(f.dia_clinico for f in filas) == [HOY - timedelta(days=3), HOY - timedelta(days=1), HOY]
+        assert all(f.tipo_evento == TipoEventoEnum.CAMA_ASIGNADA.value for f in filas)
+
+
+class TestLectura:
+    """Tests de lectura combinada rollups + eventos crudos."""
+
+    def test_sin_cobertura_lee_eventos_crudos(self, session):
+        """Test que sin backfill toda la ventana se lee desde eventos crudos."""
+        rango, crudos = rollup_service.dividir_ventana(session, HOY - timedelta(days=5), None)
+
+        assert rango is None
+        assert crudos == [(HOY - timedelta(days=5), None)]
+
+    def test_dividir_ventana(self, session):
+        """Test que solo los días cerrados y completos se leen de rollups."""
+        session.add(CoberturaRollup(id=1, desde=HOY - timedelta(days=30)))
+        session.commit()
+
+        inicio = HOY - timedelta(days=5, hours=3)
+        rango, crudos = rollup_service.dividir_ventana(session, inicio, HOY + timedelta(hours=2))
+
+        assert rango == (HOY - timedelta(days=5), HOY)
+        assert crudos == [(inicio, HOY - timedelta(days=5)), (HOY, HOY + timedelta(hours=2))]
+
+    def test_resultados_iguales_con_y_sin_rollups(self, session, historial):
+        """Test equivalencia de endpoints antes y después del backfill."""
+        crudo = _estadisticas(session, historial)
+        assert crudo[0] == {"total": 3}
+        assert crudo[4]["cantidad"] == 3
+
+        rollup_service.reconstruir_rollups(session)
+        assert _estadisticas(session, historial) == crudo
+
+        # Sin eventos crudos de los días cerrados, solo los rollups pueden
+        # responder los tiempos (ingresos y egresos se leen siempre crudos)
+        session.execute(EventoPaciente.__table__.delete().where(
+            EventoPaciente.dia_clinico >= HOY - timedelta(days=2),
+            EventoPaciente.dia_clinico < HOY,
+        ))
+        session.commit()
+
+        assert _estadisticas(session, historial)[4:] == crudo[4:]
+
+    def test_ingresos_y_egresos_cuentan_pacientes_distintos(self, session, historial):
+        """Test que un paciente con varios eventos en la ventana cuenta una vez."""
+        hospital = historial["hospital"]
+        camas = historial["camas"]
+        paciente_id = session.exec(select(EventoPaciente.paciente_id)).first()
+        escritor = escritor_eventos(session)
+        escritor.agregar(TipoEventoEnum.INGRESO_AMBULATORIO, paciente_id, hospital.id,
+                         timestamp=HOY - timedelta(days=1, hours=-1))
+        escritor.agregar(TipoEventoEnum.TRASLADO_COMPLETADO, paciente_id, hospital.id,
+                         cama_origen_id=camas[0].id, cama_destino_id=camas[3].id,
+                         timestamp=HOY - timedelta(days=1, hours=-2))
+        session.commit()
+        rollup_service.reconstruir_rollups(session)
+
+        estadisticas = _estadisticas(session, historial)
+
+        assert estadisticas[0] == {"total": 3}
+        assert estadisticas[3] == {"total_egresos_servicio": 3}
+
+    def test_hospitalizacion_red_cruza_hospitales(self, session, hospital_con_camas, crear_hospital,
+                                                  crear_paciente):
+        """Test que la hospitalización de la red va del primer ingreso al egreso final."""
+        origen = hospital_con_camas["hospital"]
+        destino = crear_hospital(nombre="Hospital Destino", codigo="HD")
+        paciente = crear_paciente(origen.id, run="21-K")
+        ingreso = HOY - timedelta(days=3) + timedelta(hours=1)
+        escritor = escritor_eventos(session)
+        escritor.agregar(TipoEventoEnum.INGRESO_URGENCIA, paciente.id, origen.id, timestamp=ingreso)
+        escritor.agregar(TipoEventoEnum.DERIVACION_ACEPTADA, paciente.id, destino.id,
+                         timestamp=ingreso + timedelta(hours=5))
+        escritor.agregar(TipoEventoEnum.ALTA_COMPLETADA, paciente.id, destino.id,
+                         timestamp=ingreso + timedelta(hours=29))
+        session.commit()
+
+        red = asyncio.run(EstadisticasService.calcular_tiempo_hospitalizacion(session))
+        local = asyncio.run(EstadisticasService.calcular_tiempo_hospitalizacion(
+            session, hospital_id=destino.id))
+
+        assert (red["cantidad"], red["maximo"]) == (1, 29 * 3600)
+        assert (local["cantidad"], local["maximo"]) == (1, 24 * 3600)
+        assert not session.exec(
+            select(EstadisticaDiaria).where(EstadisticaDiaria.metrica == "hospitalizacion_red")
+        ).all()
+
+
+class TestInicioTardio:
+    """Tests de eventos de inicio que llegan después de su cierre."""
+
+    def test_reagrega_el_dia_del_cierre(self, session, hospital_con_camas, crear_paciente):
+        """Test que un inicio tardío acredita la duración al día del cierre."""
+        hospital = hospital_con_camas["hospital"]
+        paciente = crear_paciente(hospital.id, run="20-K")
+        asignacion = HOY - timedelta(days=2) + timedelta(hours=3)
+        escritor = escritor_eventos(session)
+        escritor.agregar(TipoEventoEnum.CAMA_ASIGNADA, paciente.id, hospital.id,
+                         cama_destino_id=hospital_con_camas["camas"][0].id, timestamp=asignacion)
+        session.commit()
+        assert not session.exec(
+            select(EstadisticaDiaria).where(EstadisticaDiaria.metrica == "espera_cama")
+        ).all()
+
+        escritor.agregar(TipoEventoEnum.BUSQUEDA_CAMA_INICIADA, paciente.id, hospital.id,
+                         timestamp=asignacion - timedelta(hours=2))
+        session.commit()
+
+        fila = session.exec(
+            select(EstadisticaDiaria).where(EstadisticaDiaria.metrica == "espera_cama")
+        ).one()
+        assert (fila.dia_clinico, fila.cantidad, fila.duracion_suma) == (HOY - timedelta(days=2), 1, 7200.0)
+
+        incremental = _filas_rollup(session)
+        rollup_service.reconstruir_rollups(session)
+        session.expire_all()
+        assert _filas_rollup(session) == incremental
@@ -0,0 +1,137 @@
+"""
+Tests para la topología hospitalaria en memoria.
+"""
+import pytest
+
+from app.core.topologia import gestor_topologia, obtener_topologia, topologia_actual
+from app.models.enums import EstadoCamaEnum, TipoServicioEnum
+
+
+class TestTopologia:
+    """Tests de carga, índices e invalidación de la topología."""
+
+    def test_carga_e_indices(self, session, hospital_con_camas):
+        """Test que la instantánea indexa hospitales, servicios, salas y camas."""
+        hospital = hospital_con_camas["hospital"]
+        servicio = hospital_con_camas["servicio"]
+        cama = hospital_con_camas["camas"][0]
+
+        topologia = obtener_topologia(session)
+
+        assert topologia.hospital_por_codigo("HC").id == hospital.id
+        assert topologia.resolver_hospital_id(hospital.id) == hospital.id
+        assert topologia.resolver_hospital_id("HC") == hospital.id
+        assert topologia.resolver_hospital_id("no-existe") is None
+        assert [s.id for s in topologia.servicios_de_hospital(hospital.id)] == [servicio.id]
+        assert topologia.servicio_de_cama(cama.id).id == servicio.id
+        assert topologia.hospital_de_cama(cama.id) == hospital.id
+        assert topologia.cama_por_identificador("MED-101").id == cama.id
+        assert len(topologia.camas_de_hospital(hospital.id)) == 4
+
+    def test_codigo_largo_se_resuelve(self, session, crear_hospital):
+        """Test que los códigos largos de usuario se resuelven al UUID."""
+        hospital = crear_hospital(nombre="Puerto Montt", codigo="PM")
+        assert obtener_topologia(session).resolver_hospital_id("puerto_montt") == hospital.id
+
+    def test_nodos_inmutables(self, session, hospital_con_camas):
+        """Test que los nodos no se pueden modificar."""
+        topologia = obtener_topologia(session)
+        nodo = topologia.hospital(hospital_con_camas["hospital"].id)
+        with pytest.raises(AttributeError):
+            nodo.nombre = "Otro"
+
+    def test_complejidad_maxima(self, session, crear_hospital, crear_servicio, crear_sala):
+        """Test nivel de complejidad y salas individuales por hospital."""
+        hospital = crear_hospital(nombre="H", codigo="H1")
+        crear_servicio(hospital.id, nombre="Medicina", codigo="Med")
+        uci = crear_servicio(hospital.id, nombre="UCI", codigo="UCI", tipo=TipoServicioEnum.UCI)
+        crear_sala(uci.id, es_individual=True)
+
+        topologia = obtener_topologia(session)
+        assert topologia.complejidad_maxima_hospital(hospital.id) == 3
+        assert topologia.complejidad_maxima_hospital("otro") == 0
+        assert topologia.tiene_sala_individual(hospital.id, [TipoServicioEnum.UCI])
+        assert not topologia.tiene_sala_individual(hospital.id, [TipoServicioEnum.MEDICINA])
+
+    def test_cambio_estructural_invalida(self, session, hospital_con_camas, crear_cama):
+        """Test que crear una cama deja la instantánea obsoleta y se recarga."""
+        version = obtener_topologia(session).version
+
+        crear_cama(hospital_con_camas["sala"].id, numero=200, identificador="MED-200")
+        assert topologia_actual() is None
+
+        nueva = obtener_topologia(session)
+        assert nueva.version > version
+        assert nueva.cama_por_identificador("MED-200") is not None
+
+    def test_invalidacion_durante_la_carga_no_se_pierde(self, session, hospital_con_camas, monkeypatch):
+        """Test que una invalidación concurrente a recargar() deja la instantánea obsoleta."""
+        from app.core.topologia import Topologia
+
+        cargar = Topologia.cargar_desde_db
+
+        def cargar_e_invalidar(session, version):
+            topologia = cargar(session, version=version)
+            gestor_topologia.invalidar(publicar=False)
+            return topologia
+
+        monkeypatch.setattr(Topologia, "cargar_desde_db", staticmethod(cargar_e_invalidar))
+        primera = gestor_topologia.recargar(session)
+        assert topologia_actual() is None
+
+        monkeypatch.setattr(Topologia, "cargar_desde_db", staticmethod(cargar))
+        assert obtener_topologia(session).version > primera.version
+        assert topologia_actual() is not None
+
+    def test_cambio_de_estado_no_invalida(self, session, hospital_con_camas):
+        """Test que cambiar el estado de una cama no recarga la topología."""
+        from app.repositories.cama_repo import CamaRepository
+
+        topologia = obtener_topologia(session)
+        CamaRepository(session).cambiar_estado(hospital_con_camas["camas"][0], EstadoCamaEnum.BLOQUEADA)
+
+        assert topologia_actual() is topologia
+
+    def test_sexo_de_sala_no_invalida(self, session, hospital_con_camas):
+        """Test que el sexo asignado (estado operativo) no recarga la topología."""
+        topologia = obtener_topologia(session)
+        sala = hospital_con_camas["sala"]
+
+        sala.sexo_asignado = "mujer"
+        session.add(sala)
+        session.commit()
+
+        assert topologia_actual() is topologia
+        assert gestor_topologia.obtener(session).version == topologia.version
+
+    def test_cambio_de_sala_individual_invalida(self, session, hospital_con_camas):
+        """Test que un atributo estructural de la sala sí recarga la topología."""
+        obtener_topologia(session)
+        sala = hospital_con_camas["sala"]
+
+        sala.es_individual = True
+        session.add(sala)
+        session.commit()
+
+        assert topologia_actual() is None
+        assert obtener_topologia(session).sala(sala.id).es_individual
+
+    def test_matriz_de_capacidades(self, session, crear_hospital, crear_servicio, crear_sala):
+        """Test que la matriz resume la capacidad de cada hospital y se reconstruye al cambiar."""
+        hospital = crear_hospital(nombre="H", codigo="H1")
+        vacio = crear_hospital(nombre="Sin servicios", codigo="H2")
+        crear_servicio(hospital.id, nombre="Pediatría", codigo="PED", tipo=TipoServicioEnum.PEDIATRIA)
+        uti = crear_servicio(hospital.id, nombre="UTI", codigo="UTI", tipo=TipoServicioEnum.UTI)
+        crear_sala(uti.id, es_individual=True)
+
+        capacidad = obtener_topologia(session).capacidad_hospital(hospital.id)
+        assert capacidad.complejidad_maxima == 2
+        assert capacidad.tipos_con_sala_individual == {TipoServicioEnum.UTI}
+        assert capacidad.pediatria and not capacidad.obstetricia
+        assert obtener_topologia(session).capacidad_hospital(vacio.id).a_dict() == {
+            "hospital_id": vacio.id, "complejidad_maxima": 0, "tipos_servicio": [],
+            "tipos_con_sala_individual": [], "pediatria": False, "obstetricia": False,
+        }
+
+        crear_servicio(vacio.id, nombre="Obstetricia", codigo="OBS", tipo=TipoServicioEnum.OBSTETRICIA)
+        assert obtener_topologia(session).matriz_capacidades()[vacio.id].obstetricia
@@ -0,0 +1,151 @@
+"""
+Tests de GET condicionales: versiones por recurso incrementadas al confirmar
+escrituras, ETag fuerte y 304 con If-None-Match.
+"""
+import time
+
+import pytest
+
+from app.core.principal import Principal
+from app.core.versiones import MemoriaVersiones, versiones_recursos
+from app.models.enums import EstadoCamaEnum
+from app.models.usuario import RolEnum, Usuario
+from app.repositories.cama_repo import CamaRepository
+
+
+def _usuario(rol=RolEnum.PROGRAMADOR, hospital_id=None):
+    return Usuario(
+        username="u", email="u@test.cl", hashed_password="x", nombre_completo="U",
+        rol=rol, hospital_id=hospital_id,
+    )
+
+
+@pytest.fixture
+def versiones_memoria():
+    """Activa las versiones en memoria durante el test."""
+    versiones_recursos.configurar_almacen(MemoriaVersiones())
+    yield versiones_recursos
+    versiones_recursos.configurar_almacen(None)
+
+
+@pytest.fixture
+def como():
+    from main import app
+    from app.core.auth_dependencies import get_current_user
+
+    def _como(usuario):
+        app.dependency_overrides[get_current_user] = lambda: Principal.desde_usuario(usuario)
+    return _como
+
+
+def _condicional(client, url, etag):
+    return client.get(url, headers={"If-None-Match": etag})
+
+
+class TestGetCondicional:
+    """Tests de ETag / If-None-Match en las vistas que se recargan tras eventos."""
+
+    def test_camas_304_hasta_que_cambia_una_cama(self, client, session, hospital_con_camas, como, versiones_memoria):
+        como(_usuario())
+        url = f"/api/hospitales/{hospital_con_camas['hospital'].id}/camas"
+
+        response = client.get(url)
+        etag = response.headers["etag"]
+        assert response.status_code == 200 and len(response.json()) == 4
+        assert response.headers["cache-control"] == "private, no-cache"
+
+        no_modificado = _condicional(client, url, etag)
+        assert no_modificado.status_code == 304
+        assert no_modificado.content == b""
+        assert no_modificado.headers["etag"] == etag
+        assert _condicional(client, url, f'"otro", W/{etag}').status_code == 304
+
+        CamaRepository(session).cambiar_estado(hospital_con_camas["camas"][0], EstadoCamaEnum.BLOQUEADA)
+
+        response = _condicional(client, url, etag)
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()[0]["estado"] == "BLOQUEADA"
+
+        stats = versiones_memoria.estadisticas()["por_recurso"]["camas"]
+        assert stats == {"renders_evitados": 2, "renders_completos": 2}
+
+    def test_camas_se_renderizan_al_pasar_el_minuto(
+        self, client, hospital_con_camas, como, versiones_memoria, monkeypatch,
+    ):
+        """Los tiempos restantes de los timers no quedan congelados tras un 304."""
+        como(_usuario())
+        url = f"/api/hospitales/{hospital_con_camas['hospital'].id}/camas"
+        inicio = (time.time() // 60) * 60
+        monkeypatch.setattr("app.core.versiones.time.time", lambda: inicio)
+        etag = client.get(url).headers["etag"]
+        assert _condicional(client, url, etag).status_code == 304
+
+        monkeypatch.setattr("app.core.versiones.time.time", lambda: inicio + 60)
+
+        response = _condicional(client, url, etag)
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    def test_versiones_por_recurso(
+        self, client, session, hospital_con_camas, crear_hospital, crear_paciente, como, versiones_memoria,
+    ):
+        como(_usuario())
+        hospital = hospital_con_camas["hospital"]
+        otro = crear_hospital(nombre="Otro", codigo="OT")
+        lista = f"/api/hospitales/{hospital.id}/lista-espera"
+        derivados = f"/api/derivaciones/hospital/{hospital.id}"
+        etag_lista = client.get(lista).headers["etag"]
+        etag_derivados = client.get(derivados).headers["etag"]
+
+        # Un cambio solo de camas no afecta la lista de espera ni las derivaciones
+        CamaRepository(session).cambiar_estado(hospital_con_camas["camas"][0], EstadoCamaEnum.EN_LIMPIEZA)
+        assert _condicional(client, lista, etag_lista).status_code == 304
+        assert _condicional(client, derivados, etag_derivados).status_code == 304
+
+        # Un paciente derivado desde otro hospital cambia las derivaciones del destino
+        crear_paciente(
+            otro.id, run="1-1", derivacion_hospital_destino_id=hospital.id, derivacion_estado="pendiente",
+        )
+        response = _condicional(client, derivados, etag_derivados)
+        assert response.status_code == 200 and len(response.json()) == 1
+        assert _condicional(client, lista, etag_lista).status_code == 200
+
+    def test_etag_distingue_alcance_rbac_y_minuto(
+        self, client, hospital_con_camas, como, versiones_memoria, monkeypatch,
+    ):
+        como(_usuario())
+        url = f"/api/hospitales/{hospital_con_camas['hospital'].id}/lista-espera"
+        etag = client.get(url).headers["etag"]
+
+        como(_usuario(RolEnum.DIRECTIVO_RED))
+        assert _condicional(client, url, etag).status_code == 200
+
+        como(_usuario())
+        assert _condicional(client, url, etag).status_code == 304
+        monkeypatch.setattr("app.core.versiones.time.time", lambda: 10 ** 10)
+        assert _condicional(client, url, etag).status_code == 200
+
+    def test_lista_de_hospitales(self, client, session, hospital_con_camas, como, versiones_memoria):
+        como(_usuario())
+        etag = client.get("/api/hospitales").headers["etag"]
+        assert _condicional(client, "/api/hospitales", etag).status_code == 304
+
+        hospital = hospital_con_camas["hospital"]
+        hospital.telefono_urgencias = "652000000"
+        session.add(hospital)
+        session.commit()
+
+        response = _condicional(client, "/api/hospitales", etag)
+        assert response.status_code == 200
+        assert response.json()[0]["telefono_urgencias"] == "652000000"
+
+    def test_sin_versiones_no_hay_etag(self, client, hospital_con_camas, como):
+        versiones_recursos.configurar_almacen(None)
+        como(_usuario())
+        url = f"/api/hospitales/{hospital_con_camas['hospital'].id}/camas"
+
+        response = _condicional(client, url, '"x"')
+
+        assert response.status_code == 200
+        assert "etag" not in response.headers